@@ -0,0 +1,12 @@
+"""
+Python tooling for the self-hosted AI Coding Platform.
+
+The modules in this package run next to the Ollama and OpenHands containers
+(or inside the OpenHands workspace) and provide the performance-oriented
+helpers the shell scripts in ``scripts/`` cannot: context retrieval for
+prompts, caching layers and operational services.
+
+NOTE: This project runs on Oracle Cloud via Coolify (instance-hulyaekiz)
+"""
+
+__version__ = "0.1.0"
@@ -0,0 +1,519 @@
+"""
+Conversation-affinity scheduling for the LLM gateway.
+
+An agent session resends its whole conversation on every turn, so all but
+the newest messages are a prefix Ollama has already evaluated. Ollama keeps
+that KV cache per parallel slot and reuses it when the next request of the
+conversation lands in the same slot of the same loaded model - which
+interleaved sessions and mixed options defeat, making every turn pay the
+full prefill. The scheduler, plugged into the tracing LLM gateway
+(aicoding.tracing.LLMGateway), keeps the prefixes warm:
+- load options (``num_ctx`` and the others in aicoding.models.LOAD_OPTIONS)
+  are normalized per model, and so for every session: ``num_ctx`` to the
+  catalog value, the others to the first value seen, so no request reloads
+  the model and empties the caches
+- a session is pinned on its first request to the least loaded Ollama node
+  and stays there (unpinned when the node fails)
+- at most ``slots`` requests (the node's ``OLLAMA_NUM_PARALLEL``) run on a
+  node at once; the others queue in the gateway, and a free slot goes to the
+  oldest request whose session's cache is still held by an idle slot, then
+  to the oldest request - unless the oldest has waited ``max_wait`` seconds,
+  which bounds how long a session can be passed over
+- with more sessions than slots, the next turn of a session usually arrives
+  after its slot went to someone else; a finished session's slot is kept
+  for it (at most ``max_hold`` seconds) when it usually returns sooner than
+  the prefill its cache spares would take at the measured speed
+- which slot holds which session follows Ollama's own choice: a session's
+  request finds its slot free, a new session takes over the least recently
+  used idle one
+
+The load options can come from a tuning profile (aicoding.tuner) instead:
+its per-model options are pinned from the start, and its
+``OLLAMA_NUM_PARALLEL`` is the slot count.
+
+Savings are measured, not assumed: Ollama reports the prompt tokens it
+evaluated (``prompt_eval_count``); on a miss that is the whole prompt, which
+calibrates the per-model ratio to the local token estimate
+(aicoding.token_budget), and on a hit the calibrated prompt size minus the
+evaluated tokens is what the cache saved.
+
+Usage:
+    python -m aicoding.affinity serve --upstream http://ollama:11434 --slots 2
+    python -m aicoding.affinity serve --profile /var/lib/ai-coding-platform/tuning/profile.json
+    python -m aicoding.affinity status --url http://localhost:11435
+"""
+
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import requests
+
+from aicoding.models import LOAD_OPTIONS, get_profile, normalize_model_name
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import (
+    AFFINITY_MAX_HOLD_SECONDS, AFFINITY_MAX_WAIT_SECONDS, LLM_GATEWAY_PORT, OLLAMA_HOST, OLLAMA_NUM_PARALLEL,
+    TRACING_DIR,
+)
+from aicoding.token_budget import MESSAGE_OVERHEAD_TOKENS, get_counter
+from aicoding.tracing import GATEWAY_STATUS_PATH, TRACER, LLMGateway, message_text
+from aicoding.tuner import TuningError, profile_options, read_profile
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+# Sessions remembered (pins and statistics), least recently seen dropped first
+MAX_SESSIONS = 10000
+
+# Sessions listed by ``status``, most tokens saved first
+STATUS_SESSIONS = 20
+
+# Weight of the newest gap between a session's turns in its moving average
+GAP_SMOOTHING = 0.3
+
+# A slot is kept for at most this many times the session's usual gap
+HOLD_GAP_FACTOR = 2.0
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+@dataclass
+class Ticket:
+    """A chat or generate request admitted by the scheduler."""
+
+    session: Optional[str]
+    model: str
+    # Local estimate of the prompt tokens
+    estimate: int
+    upstream: str = ""
+    # Whether the session's cache was held by the slot it got
+    hit: bool = False
+    # Whether the scheduler rewrote the request's options
+    normalized: bool = False
+    queued: float = field(default_factory=time.monotonic)
+    waited: float = 0.0
+    ready: threading.Event = field(default_factory=threading.Event, repr=False)
+
+
+@dataclass
+class AffinityStats:
+    """Counters of the scheduler, or of one session."""
+
+    requests: int = 0
+    hits: int = 0
+    normalized: int = 0
+    # Prompt tokens Ollama evaluated, and the ones its cache spared
+    evaluated_tokens: int = 0
+    saved_tokens: int = 0
+    wait_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.requests if self.requests else 0.0
+
+    @property
+    def saved_share(self) -> float:
+        """Share of the prompt tokens that were not evaluated."""
+        total = self.evaluated_tokens + self.saved_tokens
+        return self.saved_tokens / total if total else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(asdict(self), wait_seconds=round(self.wait_seconds, 3), hit_rate=round(self.hit_rate, 4),
+                    saved_share=round(self.saved_share, 4))
+
+
+@dataclass
+class _Session:
+    stats: AffinityStats = field(default_factory=AffinityStats)
+    released: Optional[float] = None
+    # Seconds from a reply to the session's next request (moving average)
+    gap: Optional[float] = None
+    # Tokens of the conversation its slot caches after the last reply
+    cached_tokens: int = 0
+
+
+@dataclass
+class _Node:
+    upstream: str
+    slots: int
+    # Sessions whose prefix a slot caches, least recently used first
+    holders: "OrderedDict[str, None]" = field(default_factory=OrderedDict)
+    # Idle slots kept for their session's next turn, until a monotonic deadline
+    reserved: Dict[str, float] = field(default_factory=dict)
+    running: List[Ticket] = field(default_factory=list)
+    waiting: List[Ticket] = field(default_factory=list)
+    sessions: int = 0
+
+    def busy(self, session: Optional[str]) -> bool:
+        return any(ticket.session == session for ticket in self.running)
+
+    def cached(self, ticket: Ticket) -> bool:
+        return ticket.session in self.holders and not self.busy(ticket.session)
+
+
+# ============================================================================
+# Scheduler
+# ============================================================================
+
+class AffinityScheduler:
+    """
+    Admits chat and generate requests so conversations reuse Ollama's caches.
+
+    ``admit`` blocks until the request may run and says where;
+    ``release`` must follow with Ollama's final stats.
+    """
+
+    def __init__(self, upstreams: Sequence[str] = (OLLAMA_HOST,), slots: int = OLLAMA_NUM_PARALLEL,
+                 max_wait: float = AFFINITY_MAX_WAIT_SECONDS, max_hold: float = AFFINITY_MAX_HOLD_SECONDS,
+                 max_sessions: int = MAX_SESSIONS,
+                 options: Optional[Mapping[str, Mapping[str, Any]]] = None) -> None:
+        """
+        Args:
+            upstreams: Ollama base URLs (nodes)
+            slots: Requests each node serves at once (its ``OLLAMA_NUM_PARALLEL``)
+            max_wait: Seconds after which a queued request is served before cached sessions
+            max_hold: Longest a slot is kept idle for its session's next turn (0: never)
+            max_sessions: Sessions remembered for pinning and statistics
+            options: Load options per model to pin from the start (a tuning profile's)
+        """
+        if not upstreams or slots < 1:
+            raise ValueError("at least one upstream and one slot are needed")
+        self.nodes = [_Node(upstream.rstrip("/"), slots) for upstream in upstreams]
+        self.max_wait = max_wait
+        self.max_hold = max_hold
+        self.max_sessions = max_sessions
+        self.totals = AffinityStats()
+        # Load options per model that every request is given
+        self.options: Dict[str, Dict[str, Any]] = {
+            normalize_model_name(model): {name: value for name, value in pinned.items() if name in LOAD_OPTIONS}
+            for model, pinned in (options or {}).items()}
+        self._lock = threading.Lock()
+        self._pins: "OrderedDict[str, _Node]" = OrderedDict()
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        # Per model, over the misses: estimated and evaluated prompt tokens, prefill seconds
+        self._calibration: Dict[str, List[float]] = {}
+
+    @property
+    def upstreams(self) -> List[str]:
+        return [node.upstream for node in self.nodes]
+
+    def normalize(self, payload: Dict[str, Any]) -> bool:
+        """
+        Give a request its model's load options.
+
+        ``num_ctx`` is pinned to the catalog value (aicoding.models), the
+        other load options to the first value a request sent; sampling
+        options are left alone.
+
+        Returns:
+            Whether ``payload`` was changed
+        """
+        model = normalize_model_name(str(payload.get("model", "")))
+        options = payload.get("options")
+        if not isinstance(options, dict):
+            options = {}
+        pinned = self.options.setdefault(model, {})
+        pinned.setdefault("num_ctx", get_profile(model).num_ctx)
+        changed = False
+        for name in LOAD_OPTIONS:
+            if name in options:
+                pinned.setdefault(name, options[name])
+            if name in pinned and options.get(name) != pinned[name]:
+                options[name] = pinned[name]
+                changed = True
+        if changed:
+            payload["options"] = options
+        return changed
+
+    def estimate(self, model: str, payload: Mapping[str, Any]) -> int:
+        """Prompt tokens of a request by the model's local token counter."""
+        count = get_counter(model)
+        messages = payload.get("messages")
+        if isinstance(messages, list):
+            return sum(count(message_text(message.get("content"))) + MESSAGE_OVERHEAD_TOKENS
+                       for message in messages if isinstance(message, dict))
+        return count(message_text(payload.get("system"))) + count(message_text(payload.get("prompt")))
+
+    def admit(self, session: Optional[str], payload: Dict[str, Any]) -> Ticket:
+        """
+        Queue a request until a slot of its session's node is given to it.
+
+        Args:
+            session: Session (conversation) id; None for requests without one
+            payload: Ollama chat or generate request; its options may be rewritten
+
+        Returns:
+            Ticket with the upstream to send the request to
+        """
+        with self._lock:
+            normalized = self.normalize(payload)
+            model = normalize_model_name(str(payload.get("model", "")))
+            ticket = Ticket(session, model, self.estimate(model, payload), normalized=normalized)
+            if session is not None:
+                state = self._session(session)
+                if state.released is not None:
+                    gap = ticket.queued - state.released
+                    state.gap = gap if state.gap is None else (1 - GAP_SMOOTHING) * state.gap + GAP_SMOOTHING * gap
+                    state.released = None
+            node = self._node_for(session)
+            ticket.upstream = node.upstream
+            node.waiting.append(ticket)
+            self._dispatch(node)
+        ticket.ready.wait()
+        return ticket
+
+    def release(self, ticket: Ticket, stats: Mapping[str, Any], failed: bool = False) -> None:
+        """
+        Free the ticket's slot and account for the request.
+
+        The slot is kept for the session's next turn when the session
+        usually returns sooner than the prefill its cache saves would take.
+
+        Args:
+            ticket: Ticket returned by ``admit``
+            stats: Ollama's final reply object (empty when there was none)
+            failed: The upstream was unreachable or failed; the session is unpinned
+        """
+        with self._lock:
+            node = next(node for node in self.nodes if node.upstream == ticket.upstream)
+            node.running.remove(ticket)
+            if failed and ticket.session is not None:
+                node.holders.pop(ticket.session, None)
+                if self._pins.get(ticket.session) is node:
+                    del self._pins[ticket.session]
+                    node.sessions -= 1
+            self._account(ticket, stats)
+            hold = self._hold_seconds(ticket, node)
+            if hold > 0:
+                node.reserved[ticket.session] = time.monotonic() + hold
+                timer = threading.Timer(hold, self._wake, [node])
+                timer.daemon = True
+                timer.start()
+            self._dispatch(node)
+
+    def _session(self, session: str) -> _Session:
+        state = self._sessions.pop(session, None) or _Session()
+        self._sessions[session] = state
+        if len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return state
+
+    def _node_for(self, session: Optional[str]) -> _Node:
+        node = self._pins.get(session) if session is not None else None
+        if node is not None:
+            self._pins.move_to_end(session)
+            return node
+        node = min(self.nodes, key=lambda item: (len(item.running) + len(item.waiting), item.sessions))
+        if session is not None:
+            self._pins[session] = node
+            node.sessions += 1
+            if len(self._pins) > self.max_sessions:
+                _, forgotten = self._pins.popitem(last=False)
+                forgotten.sessions -= 1
+        return node
+
+    def _hold_seconds(self, ticket: Ticket, node: _Node) -> float:
+        state = self._sessions.get(ticket.session) if ticket.session is not None else None
+        calibration = self._calibration.get(ticket.model)
+        if state is None or state.gap is None or not calibration or ticket.session not in node.holders:
+            return 0.0
+        # Prefill the cache spares the next turn, at the measured speed
+        saved = state.cached_tokens * calibration[2] / calibration[1] if calibration[1] else 0.0
+        if state.gap >= saved:
+            return 0.0
+        return min(self.max_hold, saved, HOLD_GAP_FACTOR * state.gap)
+
+    def _wake(self, node: _Node) -> None:
+        with self._lock:
+            self._dispatch(node)
+
+    def _choose(self, node: _Node, free: int) -> Optional[Ticket]:
+        oldest = node.waiting[0]
+        hit = next((ticket for ticket in node.waiting if ticket.session is not None and node.cached(ticket)), None)
+        if hit is not None and hit is not oldest and time.monotonic() - oldest.queued < self.max_wait:
+            return hit
+        if hit is oldest or free > len(node.reserved):
+            return oldest
+        return hit
+
+    def _dispatch(self, node: _Node) -> None:
+        now = time.monotonic()
+        for session, deadline in list(node.reserved.items()):
+            if deadline <= now or session not in node.holders:
+                del node.reserved[session]
+        if node.waiting and now - node.waiting[0].queued >= self.max_wait:
+            # Overdue requests are not kept waiting for other sessions' turns
+            node.reserved.clear()
+        while node.waiting and len(node.running) < node.slots:
+            ticket = self._choose(node, node.slots - len(node.running))
+            if ticket is None:
+                break
+            node.waiting.remove(ticket)
+            node.reserved.pop(ticket.session, None)
+            ticket.hit = ticket.session is not None and node.cached(ticket)
+            if not ticket.hit:
+                # The slot Ollama picks for a new prefix: the least recently used idle one
+                if len(node.holders) >= node.slots:
+                    idle = next((session for session in node.holders
+                                 if not node.busy(session) and session not in node.reserved), None)
+                    if idle is not None:
+                        del node.holders[idle]
+                if ticket.session is not None and not node.busy(ticket.session):
+                    node.holders[ticket.session] = None
+            if ticket.session in node.holders:
+                node.holders.move_to_end(ticket.session)
+            ticket.waited = now - ticket.queued
+            node.running.append(ticket)
+            ticket.ready.set()
+
+    def _account(self, ticket: Ticket, stats: Mapping[str, Any]) -> None:
+        if "prompt_eval_count" not in stats:
+            return
+        evaluated = int(stats.get("prompt_eval_count") or 0)
+        calibration = self._calibration.setdefault(ticket.model, [0, 0, 0.0])
+        if not ticket.hit:
+            # A miss evaluates the whole prompt (Ollama may still find a shorter shared prefix,
+            # which only makes the ratio - and the savings - smaller)
+            calibration[0] += ticket.estimate
+            calibration[1] += evaluated
+            calibration[2] += float(stats.get("prompt_eval_duration") or 0) / 1e9
+        prompt = round(ticket.estimate * calibration[1] / calibration[0]) if calibration[0] else ticket.estimate
+        saved = max(0, prompt - evaluated) if ticket.hit else 0
+        records = [self.totals]
+        if ticket.session is not None:
+            state = self._session(ticket.session)
+            state.released = time.monotonic()
+            state.cached_tokens = prompt + int(stats.get("eval_count") or 0)
+            records.append(state.stats)
+        for record in records:
+            record.requests += 1
+            record.hits += ticket.hit
+            record.normalized += ticket.normalized
+            record.evaluated_tokens += evaluated
+            record.saved_tokens += saved
+            record.wait_seconds += ticket.waited
+
+    def session_stats(self, session: str) -> Optional[AffinityStats]:
+        """Counters of one session (None once forgotten)."""
+        with self._lock:
+            state = self._sessions.get(session)
+            return state.stats if state else None
+
+    def status(self) -> Dict[str, Any]:
+        """Nodes, pinned options, totals and the sessions that saved most."""
+        now = time.monotonic()
+        with self._lock:
+            sessions = sorted(self._sessions.items(), key=lambda item: item[1].stats.saved_tokens, reverse=True)
+            return {
+                "nodes": [{"upstream": node.upstream, "slots": node.slots, "running": len(node.running),
+                           "waiting": len(node.waiting), "sessions": node.sessions, "cached": list(node.holders),
+                           "reserved": sum(deadline > now for deadline in node.reserved.values())}
+                          for node in self.nodes],
+                "options": {model: dict(options) for model, options in self.options.items()},
+                "totals": self.totals.to_dict(),
+                "sessions": {session: state.stats.to_dict() for session, state in sessions[:STATUS_SESSIONS]
+                             if state.stats.requests},
+            }
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def _print_status(status: Dict[str, Any]) -> None:
+    totals = status["totals"]
+    print(f"Requests: {totals['requests']}  cache hits: {totals['hits']} ({totals['hit_rate']:.0%})  "
+          f"normalized: {totals['normalized']}  queued: {totals['wait_seconds']:.1f} s")
+    print(f"Prompt tokens evaluated: {totals['evaluated_tokens']}  saved by the cache: {totals['saved_tokens']} "
+          f"({totals['saved_share']:.0%})")
+    print()
+    print(f"{'node':<32} {'slots':>5} {'running':>7} {'waiting':>7} {'sessions':>8}")
+    for node in status["nodes"]:
+        print(f"{node['upstream']:<32} {node['slots']:>5} {node['running']:>7} {node['waiting']:>7} "
+              f"{node['sessions']:>8}")
+    for model, options in status["options"].items():
+        print(f"{model}: " + ", ".join(f"{name}={value}" for name, value in options.items()))
+    if status["sessions"]:
+        print()
+        print(f"{'session':<28} {'requests':>8} {'hits':>5} {'evaluated':>10} {'saved':>9}")
+        for session, stats in status["sessions"].items():
+            print(f"{session:<28} {stats['requests']:>8} {stats['hits']:>5} {stats['evaluated_tokens']:>10} "
+                  f"{stats['saved_tokens']:>9}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Conversation-affinity scheduling for the LLM gateway")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Serve the LLM gateway with affinity scheduling")
+    serve.add_argument("--upstream", action="append", help="Ollama node (repeat for several; default: OLLAMA_HOST)")
+    serve.add_argument("--slots", type=int, default=None,
+                       help="Requests per node at once (default: the profile's or OLLAMA_NUM_PARALLEL)")
+    serve.add_argument("--profile", type=Path, default=None,
+                       help="Tuning profile (aicoding.tuner) whose load options are pinned")
+    serve.add_argument("--max-wait", type=float, default=AFFINITY_MAX_WAIT_SECONDS,
+                       help="Seconds a queued request may be passed over")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=LLM_GATEWAY_PORT)
+    serve.add_argument("--trace-dir", type=Path, default=TRACING_DIR)
+    serve.add_argument("--sample-rate", type=float, default=None, help="Share of sessions traced")
+    status = sub.add_parser("status", help="Scheduler state and tokens saved of a running gateway")
+    status.add_argument("--url", default=f"http://localhost:{LLM_GATEWAY_PORT}")
+    status.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    if args.command == "serve":
+        if args.sample_rate is not None and not 0.0 <= args.sample_rate <= 1.0:
+            print("Error: --sample-rate must be between 0 and 1", file=sys.stderr)
+            return 1
+        options, slots = None, OLLAMA_NUM_PARALLEL
+        try:
+            if args.profile is not None:
+                profile = read_profile(args.profile)
+                options, slots = profile_options(profile), int(profile.get("parallel", slots))
+            slots = args.slots or slots
+            scheduler = AffinityScheduler(args.upstream or [OLLAMA_HOST], slots, args.max_wait, options=options)
+        except (TuningError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        TRACER.configure(args.trace_dir, args.sample_rate, "llm-gateway")
+        server = LLMGateway(scheduler.upstreams[0], args.host, args.port, scheduler=scheduler)
+        logger.info("LLM gateway with affinity scheduling on %s:%d -> %s (%d slot(s) each)", args.host, args.port,
+                    ", ".join(scheduler.upstreams), slots)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            TRACER.flush()
+        return 0
+
+    try:
+        response = requests.get(args.url.rstrip("/") + GATEWAY_STATUS_PATH, timeout=10)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Error: cannot read the scheduler status from {args.url}: {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(response.json(), indent=2))
+    else:
+        _print_status(response.json())
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
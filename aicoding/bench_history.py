@@ -0,0 +1,947 @@
+"""
+Benchmark history store with automatic regression detection.
+
+The performance review of docs/MAINTENANCE.md is a one-off text dump: it
+cannot tell whether an image update, a model swap or a platform change
+made things slower. This module runs named benchmark suites, keeps every
+result in local files and decides statistically what changed:
+
+- suites: ``inference`` (generate latency, prefill and decode speed),
+  ``health`` (the health-check sweep of scripts/health-check-*.sh),
+  ``git`` (commit and status of a generated project), ``workspace`` (file
+  writes, scans and reads) and ``tests`` (pytest suite runtime)
+- every run records its samples together with an environment fingerprint:
+  CPU, memory, kernel, platform commit, the image of each running platform
+  container and the digest of each Ollama model
+- ``compare`` tests two runs metric by metric with the Mann-Whitney U test
+  (exact for small samples), so noise is not reported as a regression;
+  changes smaller than ``min_change`` are ignored either way
+- ``changes`` looks for change points in the history of every metric
+  (binary segmentation, significance by permutation test) and reports the
+  run where each shift started with the fingerprint entries that changed
+  there - usually the culprit
+
+Results are stored as one JSON file per run (``<history>/<suite>/<run>.json``);
+nothing but the measured services is contacted.
+
+Usage:
+    python -m aicoding.bench_history run inference health git workspace
+    python -m aicoding.bench_history list --suite inference
+    python -m aicoding.bench_history compare --suite inference        # previous vs latest
+    python -m aicoding.bench_history compare 20261001-120000-git 20261019-120000-git
+    python -m aicoding.bench_history changes --check
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field, replace
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+from aicoding.metrics import PLATFORM_CONTAINERS, read_meminfo
+from aicoding.models import get_profile, normalize_model_name
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import BENCH_HISTORY_DIR, OLLAMA_HOST, OPENHANDS_URL, SECONDARY_MODEL
+from aicoding.workspace import create_file_at_path, iter_files
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_REPETITIONS = 7
+DEFAULT_ALPHA = 0.01
+# Relative change of the median below which nothing is reported
+DEFAULT_MIN_CHANGE = 0.05
+# Exact Mann-Whitney distribution up to this many rank assignments
+EXACT_LIMIT = 20000
+# Change points: permutations per test and the shortest segment of runs.
+# A shift needs about six runs on each side to reach alpha = 0.01
+PERMUTATIONS = 999
+MIN_SEGMENT = 3
+
+INFERENCE_PROMPT_TOKENS = 256
+INFERENCE_OUTPUT_TOKENS = 32
+GIT_FILES = 200
+WORKSPACE_FILES = 500
+FILE_BYTES = 2048
+REQUEST_TIMEOUT = 600.0
+
+
+class BenchmarkError(Exception):
+    """A suite could not run, or a run does not exist."""
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+@dataclass
+class Metric:
+    """Samples of one measurement of a run."""
+
+    unit: str
+    samples: List[float]
+    higher_is_better: bool = False
+
+    @property
+    def median(self) -> float:
+        return median(self.samples)
+
+
+@dataclass
+class Run:
+    """One execution of a suite."""
+
+    id: str
+    suite: str
+    started: float
+    seconds: float
+    fingerprint: Dict[str, str]
+    metrics: Dict[str, Metric]
+    parameters: Dict[str, str] = field(default_factory=dict)
+    label: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Run":
+        return cls(**dict(data, metrics={name: Metric(**metric) for name, metric in data["metrics"].items()}))
+
+
+@dataclass
+class Comparison:
+    """One metric of two runs."""
+
+    metric: str
+    unit: str
+    baseline: float
+    candidate: float
+    change: float
+    p_value: Optional[float]
+    status: str  # "regression", "improvement" or "unchanged"
+
+
+@dataclass
+class ChangePoint:
+    """A lasting shift in the history of a metric."""
+
+    suite: str
+    metric: str
+    run: str
+    previous_run: str
+    before: float
+    after: float
+    change: float
+    p_value: float
+    regression: bool
+    fingerprint_changes: Dict[str, Tuple[Optional[str], Optional[str]]]
+
+
+# ============================================================================
+# Statistics
+# ============================================================================
+
+def median(values: Sequence[float]) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def _ranks(values: Sequence[float]) -> List[float]:
+    """1-based ranks, ties sharing their average rank."""
+    order = sorted(range(len(values)), key=lambda index: values[index])
+    ranks = [0.0] * len(values)
+    start = 0
+    while start < len(order):
+        end = start
+        while end + 1 < len(order) and values[order[end + 1]] == values[order[start]]:
+            end += 1
+        for position in range(start, end + 1):
+            ranks[order[position]] = (start + end) / 2 + 1
+        start = end + 1
+    return ranks
+
+
+def mann_whitney(first: Sequence[float], second: Sequence[float]) -> float:
+    """
+    Two-sided p-value of the Mann-Whitney U test.
+
+    Exact (enumerating every assignment of the pooled ranks) when there
+    are at most ``EXACT_LIMIT`` of them, normal approximation with tie and
+    continuity correction otherwise.
+
+    Args:
+        first: Samples of one run
+        second: Samples of the other run
+
+    Returns:
+        Probability of a rank sum at least this far from its mean if both
+        come from the same distribution (1.0 without samples)
+    """
+    n1, n2 = len(first), len(second)
+    if not n1 or not n2:
+        return 1.0
+    n = n1 + n2
+    ranks = _ranks(list(first) + list(second))
+    rank_sum = sum(ranks[:n1])
+    expected = n1 * (n + 1) / 2
+    distance = abs(rank_sum - expected) - 1e-9
+    if math.comb(n, n1) <= EXACT_LIMIT:
+        assignments = itertools.combinations(ranks, n1)
+        extreme = total = 0
+        for assignment in assignments:
+            total += 1
+            if abs(sum(assignment) - expected) >= distance:
+                extreme += 1
+        return extreme / total
+    ties = sum(count ** 3 - count for count in _tie_counts(ranks))
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = max(0.0, abs(rank_sum - expected) - 0.5) / math.sqrt(variance)
+    return math.erfc(z / math.sqrt(2))
+
+
+def _tie_counts(ranks: Sequence[float]) -> List[int]:
+    counts: Dict[float, int] = {}
+    for rank in ranks:
+        counts[rank] = counts.get(rank, 0) + 1
+    return [count for count in counts.values() if count > 1]
+
+
+def _smallest_p_value(n1: int, n2: int) -> float:
+    """The most significant result the exact test can give for these sample sizes."""
+    return min(1.0, 2 / math.comb(n1 + n2, n1)) if n1 and n2 else 1.0
+
+
+def _best_split(values: Sequence[float], min_size: int) -> Tuple[int, float]:
+    """
+    Split maximising the two-sample t statistic of a mean shift.
+
+    Returns:
+        (index of the first value after the split, statistic)
+    """
+    n = len(values)
+    sums = [0.0]
+    squares = [0.0]
+    for value in values:
+        sums.append(sums[-1] + value)
+        squares.append(squares[-1] + value * value)
+    best, best_stat = 0, 0.0
+    for k in range(min_size, n - min_size + 1):
+        left_sum, right_sum = sums[k], sums[n] - sums[k]
+        left_mean, right_mean = left_sum / k, right_sum / (n - k)
+        residual = (squares[k] - left_sum * left_mean) + (squares[n] - squares[k] - right_sum * right_mean)
+        variance = max(residual, 0.0) / (n - 2)
+        difference = abs(left_mean - right_mean)
+        scale = variance * (1 / k + 1 / (n - k))
+        # Rounding noise of identical values is not a shift
+        if scale <= 1e-18 * max(1.0, left_mean * left_mean, right_mean * right_mean):
+            stat = math.inf if difference > 1e-9 * max(1.0, abs(left_mean), abs(right_mean)) else 0.0
+        else:
+            stat = difference / math.sqrt(scale)
+        if stat > best_stat:
+            best, best_stat = k, stat
+    return best, best_stat
+
+
+def change_points(values: Sequence[float], alpha: float = DEFAULT_ALPHA, min_size: int = MIN_SEGMENT,
+                  permutations: int = PERMUTATIONS, seed: int = 0) -> List[Tuple[int, float]]:
+    """
+    Change points of a series by binary segmentation.
+
+    The best split of a segment is kept when a permutation test finds its
+    statistic significant; both halves are then searched again.
+
+    Args:
+        values: Series in time order (one value per run)
+        alpha: Significance level of each split
+        min_size: Fewest values on each side of a change point
+        permutations: Shuffles per permutation test
+        seed: Seed of the shuffles (results are reproducible)
+
+    Returns:
+        (index of the first value after the change, p-value) in index order
+    """
+    rng = random.Random(seed)
+    found = []
+    segments = [(0, len(values))]
+    while segments:
+        start, end = segments.pop()
+        segment = list(values[start:end])
+        if len(segment) < 2 * min_size:
+            continue
+        split, observed = _best_split(segment, min_size)
+        if observed == 0.0:
+            continue
+        at_least = 0
+        shuffled = segment[:]
+        # Stop as soon as the split can no longer be significant
+        limit = alpha * (permutations + 1) - 1
+        for _ in range(permutations):
+            rng.shuffle(shuffled)
+            if _best_split(shuffled, min_size)[1] >= observed:
+                at_least += 1
+                if at_least > limit:
+                    break
+        p_value = (at_least + 1) / (permutations + 1)
+        if p_value <= alpha:
+            found.append((start + split, p_value))
+            segments.extend([(start, start + split), (start + split, end)])
+    return sorted(found)
+
+
+def _relative_change(before: float, after: float) -> float:
+    if before == 0:
+        return 0.0 if after == 0 else math.copysign(math.inf, after)
+    return (after - before) / abs(before)
+
+
+def compare_metric(name: str, baseline: Metric, candidate: Metric, alpha: float = DEFAULT_ALPHA,
+                   min_change: float = DEFAULT_MIN_CHANGE) -> Comparison:
+    """
+    Compare the samples of one metric in two runs.
+
+    When the sample sizes are too small for the test to ever reach
+    ``alpha`` (e.g. single runs of the ``tests`` suite), a change counts
+    only if the two sets of samples do not overlap.
+
+    Args:
+        name: Metric name
+        baseline: Metric of the older run
+        candidate: Metric of the newer run
+        alpha: Significance level
+        min_change: Smallest relative change of the median reported
+
+    Returns:
+        The comparison, with its status
+    """
+    change = _relative_change(baseline.median, candidate.median)
+    if not baseline.samples or not candidate.samples:
+        return Comparison(name, candidate.unit, baseline.median, candidate.median, change, None, "unchanged")
+    if _smallest_p_value(len(baseline.samples), len(candidate.samples)) <= alpha:
+        p_value: Optional[float] = mann_whitney(baseline.samples, candidate.samples)
+        significant = p_value <= alpha
+    else:
+        p_value = None
+        significant = (max(baseline.samples) < min(candidate.samples)
+                       or min(baseline.samples) > max(candidate.samples))
+    status = "unchanged"
+    if significant and abs(change) >= min_change:
+        worse = change < 0 if candidate.higher_is_better else change > 0
+        status = "regression" if worse else "improvement"
+    return Comparison(name, candidate.unit, baseline.median, candidate.median, change, p_value, status)
+
+
+def compare_runs(baseline: Run, candidate: Run, alpha: float = DEFAULT_ALPHA,
+                 min_change: float = DEFAULT_MIN_CHANGE) -> List[Comparison]:
+    """Every metric the two runs of one suite have in common, by name."""
+    if baseline.suite != candidate.suite:
+        raise BenchmarkError(f"cannot compare a {baseline.suite} run with a {candidate.suite} run")
+    return [compare_metric(name, baseline.metrics[name], candidate.metrics[name], alpha, min_change)
+            for name in sorted(baseline.metrics) if name in candidate.metrics]
+
+
+def fingerprint_changes(before: Dict[str, str], after: Dict[str, str]
+                        ) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """Fingerprint entries that differ: key -> (old value, new value), None when absent."""
+    return {key: (before.get(key), after.get(key)) for key in sorted(set(before) | set(after))
+            if before.get(key) != after.get(key)}
+
+
+def detect_changes(runs: Sequence[Run], alpha: float = DEFAULT_ALPHA, min_change: float = DEFAULT_MIN_CHANGE,
+                   metric: Optional[str] = None) -> List[ChangePoint]:
+    """
+    Change points in the medians of every metric of every suite.
+
+    Args:
+        runs: Runs of any suites, oldest first
+        alpha: Significance level of each change point
+        min_change: Smallest relative shift between segment medians reported
+        metric: Only this metric
+
+    Returns:
+        Change points, by suite, metric and time
+    """
+    by_suite: Dict[str, List[Run]] = {}
+    for run in runs:
+        by_suite.setdefault(run.suite, []).append(run)
+    found = []
+    for suite, suite_runs in sorted(by_suite.items()):
+        names = sorted({name for run in suite_runs for name in run.metrics})
+        for name in names:
+            if metric is not None and name != metric:
+                continue
+            series = [run for run in suite_runs if name in run.metrics and run.metrics[name].samples]
+            values = [run.metrics[name].median for run in series]
+            points = change_points(values, alpha)
+            bounds = [0] + [index for index, _ in points] + [len(values)]
+            for number, (index, p_value) in enumerate(points):
+                before = median(values[bounds[number]:index])
+                after = median(values[index:bounds[number + 2]])
+                change = _relative_change(before, after)
+                if abs(change) < min_change:
+                    continue
+                higher_is_better = series[index].metrics[name].higher_is_better
+                found.append(ChangePoint(
+                    suite=suite, metric=name, run=series[index].id, previous_run=series[index - 1].id,
+                    before=before, after=after, change=change, p_value=p_value,
+                    regression=change < 0 if higher_is_better else change > 0,
+                    fingerprint_changes=fingerprint_changes(series[index - 1].fingerprint,
+                                                            series[index].fingerprint)))
+    return found
+
+
+# ============================================================================
+# Environment Fingerprint
+# ============================================================================
+
+def _run_command(command: List[str]) -> str:
+    return subprocess.run(command, capture_output=True, text=True, check=True, timeout=30).stdout
+
+
+def cpu_model(path: str = "/proc/cpuinfo") -> str:
+    """Model name of the host CPU."""
+    try:
+        with open(path, encoding="utf-8", errors="replace") as handle:
+            for line in handle:
+                key, _, value = line.partition(":")
+                if key.strip() in ("model name", "Model", "cpu model"):
+                    return value.strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def container_images(runner: Callable[[List[str]], str] = _run_command) -> Dict[str, str]:
+    """
+    Image id of each running platform container, from ``docker inspect``.
+
+    Returns:
+        ``image:<container>`` -> image id (empty without Docker)
+    """
+    try:
+        names = runner(["docker", "ps", "-q"]).split()
+        output = runner(["docker", "inspect", "--format", "{{.Name}}|{{.Image}}"] + names) if names else ""
+    except (OSError, subprocess.SubprocessError) as exc:
+        logger.debug("No container images in the fingerprint: %s", exc)
+        return {}
+    images = {}
+    for line in output.splitlines():
+        name, _, image = line.strip().lstrip("/").partition("|")
+        if image and "runtime" not in name and any(name == p or name.startswith(f"{p}-")
+                                                   for p in PLATFORM_CONTAINERS):
+            images[f"image:{name}"] = image
+    return images
+
+
+def model_digests(ollama_url: str, timeout: float = 10.0) -> Dict[str, str]:
+    """
+    Digest of each model Ollama has, from ``/api/tags``.
+
+    Returns:
+        ``model:<name>`` -> digest (empty when Ollama does not answer)
+    """
+    try:
+        response = requests.get(f"{ollama_url.rstrip('/')}/api/tags", timeout=timeout)
+        response.raise_for_status()
+        models = response.json().get("models", [])
+    except (requests.RequestException, ValueError) as exc:
+        logger.debug("No model digests in the fingerprint: %s", exc)
+        return {}
+    return {f"model:{model['name']}": str(model.get("digest", "")) for model in models if "name" in model}
+
+
+def platform_commit(root: Path = REPO_ROOT) -> Optional[str]:
+    try:
+        return _run_command(["git", "-C", str(root), "rev-parse", "HEAD"]).strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment_fingerprint(ollama_url: str = OLLAMA_HOST,
+                            runner: Callable[[List[str]], str] = _run_command) -> Dict[str, str]:
+    """
+    What a benchmark result depends on besides the code being measured.
+
+    Args:
+        ollama_url: Ollama whose model digests are recorded
+        runner: Runs ``docker`` commands (replaceable in tests)
+
+    Returns:
+        Flat string mapping; missing sources are left out
+    """
+    fingerprint = {
+        "cpu": cpu_model(),
+        "cpus": str(os.cpu_count() or 0),
+        "memory_gb": f"{read_meminfo().get('MemTotal', 0) / 1024 ** 3:.1f}",
+        "kernel": platform.release(),
+        "python": platform.python_version(),
+    }
+    commit = platform_commit()
+    if commit:
+        fingerprint["platform_commit"] = commit
+    fingerprint.update(container_images(runner))
+    fingerprint.update(model_digests(ollama_url))
+    return fingerprint
+
+
+# ============================================================================
+# Suites
+# ============================================================================
+
+@dataclass
+class SuiteContext:
+    """What the suites measure and where they may write."""
+
+    workdir: Path
+    repetitions: int = DEFAULT_REPETITIONS
+    ollama_url: str = OLLAMA_HOST
+    openhands_url: str = OPENHANDS_URL
+    model: str = SECONDARY_MODEL
+    pytest_args: List[str] = field(default_factory=lambda: ["tests/"])
+
+
+@dataclass
+class Suite:
+    name: str
+    description: str
+    function: Callable[[SuiteContext], Dict[str, Metric]]
+    # Overrides the context's repetitions (suites that take minutes)
+    repetitions: Optional[int] = None
+
+
+def _measure(function: Callable[[int], None], repetitions: int, warmup: int = 1) -> List[float]:
+    """Seconds per call of ``function(number)`` after ``warmup`` unmeasured calls."""
+    for number in range(warmup):
+        function(-1 - number)
+    samples = []
+    for number in range(repetitions):
+        started = time.perf_counter()
+        function(number)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def _filler(bytes_count: int, number: int) -> str:
+    line = f"value_{number} = compute(value_{number - 1}, options)  # generated\n"
+    return (line * (bytes_count // len(line) + 1))[:bytes_count]
+
+
+def run_inference(context: SuiteContext) -> Dict[str, Metric]:
+    """Non-streaming generations with a fixed prompt and output length."""
+    model = normalize_model_name(context.model)
+    http = requests.Session()
+    latencies, prefill, decode = [], [], []
+    for number in range(context.repetitions + 1):
+        payload = {"model": model, "prompt": _filler(INFERENCE_PROMPT_TOKENS * 4, number), "stream": False,
+                   "options": {"num_predict": INFERENCE_OUTPUT_TOKENS, "num_ctx": get_profile(model).num_ctx,
+                               "temperature": 0, "seed": 0}}
+        started = time.perf_counter()
+        try:
+            response = http.post(f"{context.ollama_url.rstrip('/')}/api/generate", json=payload,
+                                 timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
+            result = response.json()
+        except (requests.RequestException, ValueError) as exc:
+            raise BenchmarkError(f"generate request failed: {exc}") from exc
+        elapsed = time.perf_counter() - started
+        # The first request may load the model
+        if number == 0:
+            continue
+        latencies.append(elapsed)
+        if result.get("prompt_eval_duration"):
+            prefill.append(result.get("prompt_eval_count", 0) / (result["prompt_eval_duration"] / 1e9))
+        if result.get("eval_duration"):
+            decode.append(result.get("eval_count", 0) / (result["eval_duration"] / 1e9))
+    return {"latency": Metric("seconds", latencies),
+            "prefill_rate": Metric("tokens/second", prefill, higher_is_better=True),
+            "decode_rate": Metric("tokens/second", decode, higher_is_better=True)}
+
+
+def run_health(context: SuiteContext) -> Dict[str, Metric]:
+    """The requests of scripts/health-check-ollama.sh and health-check-openhands.sh."""
+    http = requests.Session()
+    timings: Dict[str, List[float]] = {"ollama": [], "openhands": []}
+
+    def probe(name: str, url: str) -> None:
+        started = time.perf_counter()
+        try:
+            response = http.get(url, timeout=10, allow_redirects=False)
+        except requests.RequestException as exc:
+            raise BenchmarkError(f"{name} health check failed: {exc}") from exc
+        if response.status_code >= 500:
+            raise BenchmarkError(f"{name} health check failed: HTTP {response.status_code}")
+        timings[name].append(time.perf_counter() - started)
+
+    def sweep(number: int) -> None:
+        probe("ollama", f"{context.ollama_url.rstrip('/')}/api/tags")
+        probe("openhands", context.openhands_url)
+
+    sweeps = _measure(sweep, context.repetitions)
+    return {"sweep": Metric("seconds", sweeps),
+            "ollama": Metric("seconds", timings["ollama"][1:]),
+            "openhands": Metric("seconds", timings["openhands"][1:])}
+
+
+def run_git(context: SuiteContext) -> Dict[str, Metric]:
+    """Committing a generated project, then ``git status`` after editing a tenth of it."""
+    commits, statuses = [], []
+
+    def git(project: Path, *args: str) -> None:
+        try:
+            subprocess.run(["git", "-C", str(project), *args], check=True, capture_output=True, timeout=600)
+        except (OSError, subprocess.SubprocessError) as exc:
+            raise BenchmarkError(f"git {args[0]} failed: {exc}") from exc
+
+    def once(number: int) -> None:
+        project = context.workdir / f"git-{number + 1}"
+        git(project.parent, "init", "-q", project.name)
+        for index in range(GIT_FILES):
+            create_file_at_path(project / f"src/pkg{index % 10}/module_{index}.py", _filler(FILE_BYTES, index))
+        started = time.perf_counter()
+        git(project, "add", "-A")
+        git(project, "-c", "user.name=bench", "-c", "user.email=bench@localhost", "-c", "commit.gpgsign=false",
+            "commit", "-q", "-m", "benchmark")
+        commits.append(time.perf_counter() - started)
+        for index in range(0, GIT_FILES, 10):
+            create_file_at_path(project / f"src/pkg{index % 10}/module_{index}.py", _filler(FILE_BYTES, -index))
+        started = time.perf_counter()
+        git(project, "status", "--porcelain")
+        statuses.append(time.perf_counter() - started)
+        shutil.rmtree(project)
+
+    _measure(once, context.repetitions)
+    return {"commit": Metric("seconds", commits[1:]), "status": Metric("seconds", statuses[1:])}
+
+
+def run_workspace(context: SuiteContext) -> Dict[str, Metric]:
+    """Agent-style file creation, a project scan and reading every file back."""
+    writes, scans, reads = [], [], []
+
+    def once(number: int) -> None:
+        project = context.workdir / f"workspace-{number + 1}"
+        started = time.perf_counter()
+        for index in range(WORKSPACE_FILES):
+            create_file_at_path(project / f"src/pkg{index % 20}/sub{index % 3}/file_{index}.py",
+                                _filler(FILE_BYTES, index))
+        writes.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        files = [rel_path for rel_path, _ in iter_files(project)]
+        scans.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        for rel_path in files:
+            with open(project / rel_path, "rb") as handle:
+                handle.read()
+        reads.append(time.perf_counter() - started)
+        shutil.rmtree(project)
+
+    _measure(once, context.repetitions)
+    return {"write": Metric("seconds", writes[1:]), "scan": Metric("seconds", scans[1:]),
+            "read": Metric("seconds", reads[1:])}
+
+
+def run_tests(context: SuiteContext) -> Dict[str, Metric]:
+    """Wall time of the pytest suite; failing tests do not stop the measurement."""
+
+    def once(number: int) -> None:
+        result = subprocess.run([sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider",
+                                 *context.pytest_args], cwd=REPO_ROOT, capture_output=True, text=True)
+        # 0: passed, 1: some tests failed; anything else means the suite did not run
+        if result.returncode not in (0, 1):
+            raise BenchmarkError(f"pytest exited with {result.returncode}: {result.stdout[-500:]}")
+
+    return {"suite": Metric("seconds", _measure(once, context.repetitions, warmup=0))}
+
+
+SUITES: Dict[str, Suite] = {suite.name: suite for suite in (
+    Suite("inference", "Generate latency, prefill and decode speed of the Ollama model", run_inference),
+    Suite("health", "Health-check sweep of Ollama and OpenHands", run_health),
+    Suite("git", "git commit and status of a generated project", run_git),
+    Suite("workspace", "File writes, scan and reads of a generated project", run_workspace),
+    Suite("tests", "Runtime of the pytest suite", run_tests, repetitions=1),
+)}
+
+
+# ============================================================================
+# History Store
+# ============================================================================
+
+class HistoryStore:
+    """Runs as JSON files below ``root``, one directory per suite."""
+
+    def __init__(self, root: Path = BENCH_HISTORY_DIR) -> None:
+        self.root = Path(root)
+
+    def save(self, run: Run) -> Path:
+        directory = self.root / run.suite
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{run.id}.json"
+        temp = directory / f".{run.id}.json.tmp"
+        temp.write_text(json.dumps(asdict(run), indent=2), encoding="utf-8")
+        os.replace(temp, path)
+        return path
+
+    def new_id(self, suite: str, started: float) -> str:
+        base = time.strftime("%Y%m%d-%H%M%S", time.gmtime(started)) + f"-{suite}"
+        run_id, number = base, 1
+        while (self.root / suite / f"{run_id}.json").exists():
+            number += 1
+            run_id = f"{base}-{number}"
+        return run_id
+
+    def runs(self, suite: Optional[str] = None) -> List[Run]:
+        """Stored runs (of one suite), oldest first."""
+        directories = [self.root / suite] if suite else sorted(self.root.glob("*/"))
+        runs = []
+        for directory in directories:
+            for path in directory.glob("*.json"):
+                try:
+                    runs.append(Run.from_dict(json.loads(path.read_text(encoding="utf-8"))))
+                except (OSError, ValueError, TypeError, KeyError) as exc:
+                    logger.warning("Skipping unreadable run %s: %s", path, exc)
+        return sorted(runs, key=lambda run: (run.started, run.id))
+
+    def get(self, reference: str, suite: Optional[str] = None) -> Run:
+        """
+        A run by id, or ``latest`` / ``previous`` (the one before) of ``suite``.
+
+        Raises:
+            BenchmarkError: No such run
+        """
+        if reference in ("latest", "previous"):
+            if suite is None:
+                raise BenchmarkError(f"'{reference}' needs a suite")
+            runs = self.runs(suite)
+            position = -1 if reference == "latest" else -2
+            if len(runs) < -position:
+                raise BenchmarkError(f"no {reference} run of {suite}")
+            return runs[position]
+        for path in self.root.glob(f"*/{reference}.json"):
+            return Run.from_dict(json.loads(path.read_text(encoding="utf-8")))
+        raise BenchmarkError(f"no run {reference}")
+
+
+# ============================================================================
+# Runner
+# ============================================================================
+
+def run_suite(store: HistoryStore, name: str, context: SuiteContext, label: str = "",
+              fingerprint: Optional[Dict[str, str]] = None) -> Run:
+    """
+    Run one suite and store the result.
+
+    Args:
+        store: Where the run is saved
+        name: Suite name (see ``SUITES``)
+        context: Targets, repetitions and scratch directory
+        label: Free text kept with the run (e.g. "after OLLAMA_NUM_PARALLEL=2")
+        fingerprint: Environment fingerprint (default: taken now)
+
+    Returns:
+        The stored run
+
+    Raises:
+        BenchmarkError: Unknown suite, or the suite failed
+    """
+    suite = SUITES.get(name)
+    if suite is None:
+        raise BenchmarkError(f"unknown suite {name} (known: {', '.join(SUITES)})")
+    if fingerprint is None:
+        fingerprint = environment_fingerprint(context.ollama_url)
+    repetitions = suite.repetitions if suite.repetitions is not None else context.repetitions
+    started = time.time()
+    clock = time.perf_counter()
+    metrics = suite.function(replace(context, repetitions=repetitions))
+    parameters = {"repetitions": str(repetitions)}
+    if name in ("inference", "health"):
+        parameters["ollama_url"] = context.ollama_url
+    if name == "inference":
+        parameters["model"] = normalize_model_name(context.model)
+    if name == "health":
+        parameters["openhands_url"] = context.openhands_url
+    if name == "tests":
+        parameters["pytest_args"] = " ".join(context.pytest_args)
+    run = Run(id=store.new_id(name, started), suite=name, started=started,
+              seconds=time.perf_counter() - clock, fingerprint=fingerprint, metrics=metrics,
+              parameters=parameters, label=label)
+    store.save(run)
+    return run
+
+
+# ============================================================================
+# Reports
+# ============================================================================
+
+def format_comparison(baseline: Run, candidate: Run, comparisons: Sequence[Comparison]) -> str:
+    lines = [f"{baseline.id} -> {candidate.id}",
+             f"{'metric':<14} {'baseline':>12} {'candidate':>12} {'change':>8} {'p':>8}  status"]
+    for item in comparisons:
+        p_value = f"{item.p_value:.4f}" if item.p_value is not None else "-"
+        lines.append(f"{item.metric:<14} {item.baseline:>12.4g} {item.candidate:>12.4g} "
+                     f"{item.change * 100:>+7.1f}% {p_value:>8}  {item.status}  ({item.unit})")
+    for key, (old, new) in fingerprint_changes(baseline.fingerprint, candidate.fingerprint).items():
+        lines.append(f"  fingerprint {key}: {old or '-'} -> {new or '-'}")
+    return "\n".join(lines)
+
+
+def _medians(run: Run) -> str:
+    return ", ".join(f"{name}={metric.median:.4g}" for name, metric in sorted(run.metrics.items()))
+
+
+def format_change_point(point: ChangePoint) -> str:
+    kind = "REGRESSION" if point.regression else "improvement"
+    lines = [f"{kind}: {point.suite}/{point.metric} {point.before:.4g} -> {point.after:.4g} "
+             f"({point.change * 100:+.1f}%, p={point.p_value:.3f}) starting at {point.run}"]
+    for key, (old, new) in point.fingerprint_changes.items():
+        lines.append(f"  {key}: {old or '-'} -> {new or '-'}")
+    if not point.fingerprint_changes:
+        lines.append(f"  fingerprint unchanged since {point.previous_run}")
+    return "\n".join(lines)
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark history with regression detection")
+    parser.add_argument("--history-dir", type=Path, default=BENCH_HISTORY_DIR)
+    parser.add_argument("--alpha", type=float, default=DEFAULT_ALPHA, help="Significance level")
+    parser.add_argument("--min-change", type=float, default=DEFAULT_MIN_CHANGE,
+                        help="Smallest relative change reported (0.05 = 5%%)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("suites", help="List the benchmark suites")
+    run = sub.add_parser("run", help="Run suites and compare each with its previous run")
+    run.add_argument("suites", nargs="+", choices=sorted(SUITES))
+    run.add_argument("--repetitions", type=int, default=DEFAULT_REPETITIONS)
+    run.add_argument("--label", default="")
+    run.add_argument("--ollama-url", default=None, help="Default: OLLAMA_HOST, or the fake with --fake")
+    run.add_argument("--openhands-url", default=OPENHANDS_URL)
+    run.add_argument("--model", default=SECONDARY_MODEL)
+    run.add_argument("--pytest-args", default="tests/", help="Arguments of the tests suite")
+    run.add_argument("--fake", action="store_true", help="Measure an in-process fake Ollama (trying it out)")
+    run.add_argument("--check", action="store_true", help="Exit 1 if a suite regressed")
+    listing = sub.add_parser("list", help="Stored runs")
+    listing.add_argument("--suite")
+    compare = sub.add_parser("compare", help="Compare two runs")
+    compare.add_argument("baseline", nargs="?", default="previous")
+    compare.add_argument("candidate", nargs="?", default="latest")
+    compare.add_argument("--suite", help="Suite of 'previous' and 'latest'")
+    compare.add_argument("--check", action="store_true", help="Exit 1 on a regression")
+    changes = sub.add_parser("changes", help="Change points in the history")
+    changes.add_argument("--suite")
+    changes.add_argument("--metric")
+    changes.add_argument("--check", action="store_true", help="Exit 1 if the latest segment regressed")
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(args.history_dir)
+    try:
+        if args.command == "suites":
+            for suite in SUITES.values():
+                print(f"{suite.name:<10} {suite.description}")
+            return 0
+
+        if args.command == "run":
+            return _run_command_line(store, args)
+
+        if args.command == "list":
+            runs = store.runs(args.suite)
+            if args.json:
+                print(json.dumps([asdict(run) for run in runs], indent=2))
+                return 0
+            for run in runs:
+                print(f"{run.id:<36} {run.label or '-':<24} {_medians(run)}")
+            return 0
+
+        if args.command == "compare":
+            baseline = store.get(args.baseline, args.suite)
+            candidate = store.get(args.candidate, args.suite)
+            comparisons = compare_runs(baseline, candidate, args.alpha, args.min_change)
+            if args.json:
+                print(json.dumps({"baseline": baseline.id, "candidate": candidate.id,
+                                  "comparisons": [asdict(item) for item in comparisons],
+                                  "fingerprint_changes": fingerprint_changes(baseline.fingerprint,
+                                                                             candidate.fingerprint)}, indent=2))
+            else:
+                print(format_comparison(baseline, candidate, comparisons))
+            regressed = any(item.status == "regression" for item in comparisons)
+            return 1 if args.check and regressed else 0
+
+        runs = store.runs(args.suite)
+        points = detect_changes(runs, args.alpha, args.min_change, args.metric)
+        if args.json:
+            print(json.dumps([asdict(point) for point in points], indent=2))
+        else:
+            for point in points:
+                print(format_change_point(point))
+            if not points:
+                print(f"No change points in {len(runs)} runs")
+        # The last change point of a metric is the one still in effect
+        current = {(point.suite, point.metric): point for point in points}
+        return 1 if args.check and any(point.regression for point in current.values()) else 0
+    except BenchmarkError as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+
+
+def _run_command_line(store: HistoryStore, args: argparse.Namespace) -> int:
+    fake = None
+    if args.fake:
+        from aicoding.fake_ollama import FakeOllama
+        fake = FakeOllama(time_scale=0.01).start()
+    workdir = Path(tempfile.mkdtemp(prefix="bench_history_"))
+    regressed = failed = False
+    try:
+        ollama_url = args.ollama_url or (fake.url if fake else OLLAMA_HOST)
+        context = SuiteContext(workdir=workdir, repetitions=args.repetitions, ollama_url=ollama_url,
+                               openhands_url=args.openhands_url, model=args.model,
+                               pytest_args=args.pytest_args.split())
+        fingerprint = environment_fingerprint(ollama_url)
+        for name in args.suites:
+            previous = store.runs(name)
+            try:
+                run = run_suite(store, name, context, args.label, fingerprint)
+            except BenchmarkError as exc:
+                # The other suites still run
+                print(f"Error: {name}: {exc}", file=sys.stderr)
+                failed = True
+                continue
+            comparisons = compare_runs(previous[-1], run, args.alpha, args.min_change) if previous else []
+            regressed = regressed or any(item.status == "regression" for item in comparisons)
+            if args.json:
+                print(json.dumps({"run": asdict(run), "comparisons": [asdict(item) for item in comparisons]},
+                                 indent=2))
+            elif previous:
+                print(format_comparison(previous[-1], run, comparisons))
+            else:
+                print(f"{run.id}: first run of {name}: {_medians(run)}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        if fake is not None:
+            fake.stop()
+    return 1 if failed or (args.check and regressed) else 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
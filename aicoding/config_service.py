@@ -0,0 +1,816 @@
+"""
+Hot-reloadable configuration service for the platform's ``.env``.
+
+Changing the model settings (docs/MULTI_MODEL_SETUP.md) or the
+``GITHUB_TOKEN`` git on the host pushes with used to mean restarting the
+platform's processes, which drops every active session. This service watches ``.env``, validates
+each change against the rules in docs/CONFIGURATION_REFERENCE.md and
+pushes the new values to running consumers instead:
+- in-process subscribers (``ConfigService.subscribe``) get a callback with
+  the changed keys; if one of them rejects the change (raises), the
+  subscribers already updated are rolled back and the previous snapshot
+  stays current, so a change is applied everywhere or nowhere
+- other processes long-poll ``GET /watch?version=N`` on a local HTTP API
+  (``ConfigClient`` wraps this); secrets (``GITHUB_TOKEN``,
+  ``OPENHANDS_PASSWORD``, ``COOLIFY_API_TOKEN``) are never served over
+  HTTP, they are masked in listings and refused by ``/config/<key>``
+- git reads ``GITHUB_TOKEN`` through the ``credential`` command (a git
+  credential helper) straight from ``.env``, so the next push uses a new
+  token
+
+An invalid file (bad URL, malformed token, non-numeric size...) is not
+applied; the error is reported and the last good snapshot stays in force.
+Keys that a running process cannot pick up (ports, directories) are
+applied but listed as ``restart_required``.
+
+Every apply is timed: detection lag (file modification to reload),
+validation, and the time until each subscriber has the new values.
+``status`` reports the latest and recent p50/p95 latencies.
+
+Usage:
+    python -m aicoding.config_service serve --env-file /opt/ai-coding-platform/.env
+    python -m aicoding.config_service status
+    python -m aicoding.config_service check --env-file .env
+    git config --global credential.https://github.com.helper \\
+        "!python -m aicoding.config_service credential"
+"""
+
+import argparse
+import json
+import logging
+import re
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Deque, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from aicoding.loadgen import percentile
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import CONFIG_SERVICE_PORT, ENV_FILE
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+DEFAULT_POLL_INTERVAL = 0.25
+
+# Longest a /watch request is held open
+MAX_WATCH_SECONDS = 60.0
+
+# Applies kept for the latency report
+LATENCY_HISTORY = 100
+
+# Placeholders from .env.example count as unset
+_PLACEHOLDER_RE = re.compile(r"^your_[a-z0-9_]*_here$")
+
+_URL_RE = re.compile(r"^https?://[A-Za-z0-9._-]+(:\d{1,5})?(/.*)?$")
+_DOMAIN_RE = re.compile(r"^(?=.{1,253}$)([A-Za-z0-9-]{1,63}\.)+[A-Za-z]{2,63}$")
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+_TOKEN_RE = re.compile(r"^(ghp_[A-Za-z0-9]{36}|github_pat_[A-Za-z0-9_]{22,255})$")
+_MODEL_RE = re.compile(r"^[a-z0-9][a-z0-9._/-]*(:[A-Za-z0-9._-]+)?$")
+
+
+# ============================================================================
+# Validation
+# ============================================================================
+
+def _check_url(value: str) -> Optional[str]:
+    return None if _URL_RE.match(value) else "expected http://host[:port]"
+
+
+def _check_token(value: str) -> Optional[str]:
+    return None if _TOKEN_RE.match(value) else "expected ghp_ + 36 characters or github_pat_..."
+
+
+def _check_model(value: str) -> Optional[str]:
+    return None if _MODEL_RE.match(value) else "expected a model name such as qwen2.5-coder:7b"
+
+
+def _check_litellm_model(value: str) -> Optional[str]:
+    if not value.startswith("ollama/"):
+        return "expected an ollama/<model> name"
+    return _check_model(value[len("ollama/"):])
+
+
+def _check_number(minimum: float, integer: bool = False,
+                  maximum: Optional[float] = None) -> Callable[[str], Optional[str]]:
+    def check(value: str) -> Optional[str]:
+        try:
+            number = int(value) if integer else float(value)
+        except ValueError:
+            return f"expected {'an integer' if integer else 'a number'}"
+        if number < minimum or (maximum is not None and number > maximum):
+            return f"must be between {minimum} and {maximum}" if maximum is not None \
+                else f"must be at least {minimum}"
+        return None
+    return check
+
+
+def _check_path(value: str) -> Optional[str]:
+    return None if value.startswith("/") else "expected an absolute path"
+
+
+def _check_domain(value: str) -> Optional[str]:
+    return None if _DOMAIN_RE.match(value) else "expected a domain name"
+
+
+def _check_email(value: str) -> Optional[str]:
+    return None if _EMAIL_RE.match(value) else "expected an email address"
+
+
+@dataclass(frozen=True)
+class Setting:
+    """How one documented variable is validated and applied."""
+
+    check: Callable[[str], Optional[str]]
+    required: bool = False
+    secret: bool = False
+    # Only read when a process starts
+    restart: bool = False
+
+
+# Variables documented in docs/CONFIGURATION_REFERENCE.md; others pass through
+SETTINGS: Dict[str, Setting] = {
+    "GITHUB_TOKEN": Setting(_check_token, secret=True),
+    "LLM_MODEL": Setting(_check_litellm_model, required=True),
+    "LLM_BASE_URL": Setting(_check_url, required=True),
+    "OLLAMA_HOST": Setting(_check_url, required=True),
+    "OLLAMA_MODEL": Setting(_check_model),
+    "LLM_NUM_CTX": Setting(_check_number(512, integer=True)),
+    "TOKENIZERS_DIR": Setting(_check_path),
+    "WORKSPACE_DIR": Setting(_check_path, restart=True),
+    "OPENHANDS_WORKSPACE": Setting(_check_path, restart=True),
+    "LOG_STORE_DIR": Setting(_check_path, restart=True),
+    "METRICS_PORT": Setting(_check_number(1, integer=True, maximum=65535), restart=True),
+    "CONFIG_SERVICE_PORT": Setting(_check_number(1, integer=True, maximum=65535), restart=True),
+    "MODEL_MEMORY_RESERVE_GB": Setting(_check_number(0)),
+    "MODEL_MEMORY_BUDGET_GB": Setting(_check_number(0)),
+    "OPENHANDS_URL": Setting(_check_url),
+    "OPENHANDS_DOMAIN": Setting(_check_domain),
+    "COOLIFY_DOMAIN": Setting(_check_domain),
+    "OPENHANDS_PASSWORD": Setting(lambda value: None, secret=True),
+    "LETSENCRYPT_EMAIL": Setting(_check_email),
+    "COOLIFY_API_TOKEN": Setting(lambda value: None, secret=True),
+    "COOLIFY_API_URL": Setting(_check_url),
+}
+
+
+def parse_env(text: str) -> Dict[str, str]:
+    """
+    Parse ``.env`` content the way docker-compose does.
+
+    Supports comments, blank lines, ``export`` prefixes, single and double
+    quotes, and ``#`` comments after unquoted values.
+
+    Args:
+        text: File content
+
+    Returns:
+        Variables in file order (later assignments win)
+    """
+    values: Dict[str, str] = {}
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("export "):
+            line = line[len("export "):].lstrip()
+        key, sep, value = line.partition("=")
+        key = key.strip()
+        if not sep or not re.match(r"^[A-Za-z_][A-Za-z0-9_]*$", key):
+            raise ValueError(f"line {number}: expected KEY=value")
+        value = value.strip()
+        if value[:1] in ("'", '"'):
+            quote = value[0]
+            end = value.find(quote, 1)
+            if end < 0:
+                raise ValueError(f"line {number}: unterminated quote")
+            value = value[1:end]
+            if quote == '"':
+                value = value.replace("\\n", "\n").replace('\\"', '"')
+        else:
+            value = re.split(r"\s+#", value, maxsplit=1)[0].strip()
+        values[key] = value
+    return values
+
+
+def validate(values: Mapping[str, str]) -> List[str]:
+    """
+    Check variables against the documented formats.
+
+    Placeholders from .env.example (``your_..._here``) and empty values
+    count as unset.
+
+    Args:
+        values: Parsed variables
+
+    Returns:
+        One message per problem (empty when valid)
+    """
+    errors = []
+    for key, setting in SETTINGS.items():
+        value = values.get(key, "")
+        if not value or _PLACEHOLDER_RE.match(value):
+            if setting.required:
+                errors.append(f"{key}: required")
+            continue
+        problem = setting.check(value)
+        if problem:
+            shown = "***" if setting.secret else repr(value)
+            errors.append(f"{key}={shown}: {problem}")
+    return errors
+
+
+def masked(values: Mapping[str, str]) -> Dict[str, str]:
+    """Values with secrets replaced by ``***``."""
+    return {key: "***" if key in SETTINGS and SETTINGS[key].secret and value else value
+            for key, value in values.items()}
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+@dataclass(frozen=True)
+class Snapshot:
+    """An applied configuration; replaced as a whole, never modified."""
+
+    version: int
+    values: Mapping[str, str]
+    applied_at: float
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        return self.values.get(key, default)
+
+
+@dataclass(frozen=True)
+class ConfigChange:
+    """What a subscriber is asked to apply."""
+
+    version: int
+    values: Mapping[str, str]
+    # key -> (old value, new value); None for added or removed keys
+    changed: Mapping[str, Tuple[Optional[str], Optional[str]]]
+
+
+@dataclass
+class ApplyReport:
+    """Outcome and timing of one reload."""
+
+    version: int
+    applied: bool
+    changed: List[str] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    restart_required: List[str] = field(default_factory=list)
+    # File modification to reload start (polling lag)
+    detect_seconds: float = 0.0
+    validate_seconds: float = 0.0
+    # Reload start until every subscriber has the new values
+    apply_seconds: float = 0.0
+    subscriber_seconds: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class Subscription:
+    """A consumer of configuration changes."""
+
+    name: str
+    callback: Callable[[ConfigChange], None]
+    keys: Optional[frozenset] = None
+
+    def wants(self, changed: Iterable[str]) -> bool:
+        return self.keys is None or bool(self.keys.intersection(changed))
+
+
+def diff(old: Mapping[str, str], new: Mapping[str, str]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """Changed keys with their old and new values."""
+    return {key: (old.get(key), new.get(key)) for key in sorted(set(old) | set(new))
+            if old.get(key) != new.get(key)}
+
+
+# ============================================================================
+# Config Service
+# ============================================================================
+
+class ConfigService:
+    """Watches an env file and applies valid changes to its subscribers atomically."""
+
+    def __init__(self, env_file: Path = ENV_FILE, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 clock: Callable[[], float] = time.time) -> None:
+        self.env_file = Path(env_file)
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.snapshot = Snapshot(0, MappingProxyType({}), 0.0)
+        self.reports: Deque[ApplyReport] = deque(maxlen=LATENCY_HISTORY)
+        self.last_error: List[str] = []
+        self._subscriptions: List[Subscription] = []
+        # Serialises reloads; subscribers are called with it held
+        self._apply_lock = threading.Lock()
+        self._changed = threading.Condition()
+        self._file_state: Optional[Tuple[int, int, int]] = None
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._server: Optional[_ConfigHTTPServer] = None
+
+    # -- subscriptions -------------------------------------------------
+
+    def subscribe(self, callback: Callable[[ConfigChange], None], keys: Optional[Iterable[str]] = None,
+                  name: Optional[str] = None) -> Subscription:
+        """
+        Call ``callback`` with every applied change touching ``keys``.
+
+        The callback is called once right away with the current values, and
+        must raise to reject a change it cannot apply.
+
+        Args:
+            callback: Receives a ConfigChange
+            keys: Keys of interest (None for all)
+            name: Name used in reports
+        """
+        subscription = Subscription(name or getattr(callback, "__name__", "subscriber"), callback,
+                                    frozenset(keys) if keys is not None else None)
+        with self._apply_lock:
+            current = self.snapshot
+            if current.version:
+                callback(ConfigChange(current.version, current.values,
+                                      MappingProxyType({key: (None, value) for key, value in current.values.items()
+                                                        if subscription.wants([key])})))
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._apply_lock:
+            self._subscriptions.remove(subscription)
+
+    # -- reloading -----------------------------------------------------
+
+    def _read_state(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = self.env_file.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def poll(self) -> Optional[ApplyReport]:
+        """Reload if the file changed since the last check."""
+        state = self._read_state()
+        if state == self._file_state:
+            return None
+        return self.reload()
+
+    def reload(self) -> ApplyReport:
+        """Read, validate and apply the env file now."""
+        with self._apply_lock:
+            started = time.perf_counter()
+            state = self._read_state()
+            self._file_state = state
+            detect = max(0.0, self.clock() - state[0] / 1e9) if state else 0.0
+            current = self.snapshot
+            report = ApplyReport(current.version, applied=False, detect_seconds=detect)
+            try:
+                values = parse_env(self.env_file.read_text(encoding="utf-8"))
+                report.errors = validate(values)
+            except (OSError, UnicodeDecodeError, ValueError) as e:
+                values, report.errors = {}, [f"{self.env_file}: {e}"]
+            report.validate_seconds = time.perf_counter() - started
+
+            changes = diff(current.values, values)
+            report.changed = list(changes)
+            if report.errors or not changes:
+                self._finish(report, started)
+                return report
+
+            change = ConfigChange(current.version + 1, MappingProxyType(dict(values)), MappingProxyType(changes))
+            done: List[Subscription] = []
+            for subscription in self._subscriptions:
+                if not subscription.wants(changes):
+                    continue
+                try:
+                    subscription.callback(change)
+                except Exception as e:  # noqa: BLE001 - a consumer's veto, reported below
+                    report.errors = [f"{subscription.name} rejected the change: {e}"]
+                    self._rollback(done, current, change)
+                    self._finish(report, started)
+                    return report
+                done.append(subscription)
+                report.subscriber_seconds[subscription.name] = time.perf_counter() - started
+
+            self.snapshot = Snapshot(change.version, change.values, self.clock())
+            report.version = change.version
+            report.applied = True
+            report.restart_required = [key for key in changes if key in SETTINGS and SETTINGS[key].restart]
+            self._finish(report, started)
+        with self._changed:
+            self._changed.notify_all()
+        return report
+
+    def _rollback(self, done: List[Subscription], previous: Snapshot, change: ConfigChange) -> None:
+        reverse = ConfigChange(previous.version, previous.values,
+                               MappingProxyType({key: (new, old) for key, (old, new) in change.changed.items()}))
+        for subscription in reversed(done):
+            try:
+                subscription.callback(reverse)
+            except Exception:  # noqa: BLE001 - keep restoring the others
+                logger.exception("Rolling back %s failed", subscription.name)
+
+    def _finish(self, report: ApplyReport, started: float) -> None:
+        report.apply_seconds = time.perf_counter() - started
+        if report.errors:
+            self.last_error = report.errors
+            logger.warning("Configuration not applied: %s", "; ".join(report.errors))
+        elif report.applied:
+            self.last_error = []
+            logger.info("Applied configuration v%d (%s) in %.1f ms", report.version,
+                        ", ".join(report.changed), report.apply_seconds * 1000)
+        if report.errors or report.applied:
+            self.reports.append(report)
+
+    # -- watching ------------------------------------------------------
+
+    def wait_for_version(self, version: int, timeout: float) -> Snapshot:
+        """Block until a snapshot newer than ``version`` is applied or ``timeout`` passes."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while self.snapshot.version <= version:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    break
+                self._changed.wait(remaining)
+            return self.snapshot
+
+    def status(self) -> Dict[str, Any]:
+        applied = [report for report in self.reports if report.applied]
+        latencies = [report.apply_seconds for report in applied]
+        return {
+            "env_file": str(self.env_file),
+            "version": self.snapshot.version,
+            "applied_at": self.snapshot.applied_at,
+            "errors": self.last_error,
+            "subscribers": [subscription.name for subscription in self._subscriptions],
+            "last_apply": asdict(self.reports[-1]) if self.reports else None,
+            "apply_seconds_p50": percentile(latencies, 0.5),
+            "apply_seconds_p95": percentile(latencies, 0.95),
+            "detect_seconds_p95": percentile([report.detect_seconds for report in applied], 0.95),
+        }
+
+    def _watch_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception:  # noqa: BLE001 - keep watching
+                logger.exception("Reloading %s failed", self.env_file)
+
+    def start(self, host: str = "127.0.0.1", port: Optional[int] = CONFIG_SERVICE_PORT) -> "ConfigService":
+        """Load the file, then watch it and (unless ``port`` is None) serve the local API."""
+        self._stop.clear()
+        self.reload()
+        watcher = threading.Thread(target=self._watch_loop, name="config-watch", daemon=True)
+        watcher.start()
+        self._threads.append(watcher)
+        if port is not None:
+            self._server = _ConfigHTTPServer((host, port), _ConfigHandler)
+            self._server.service = self
+            thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05},
+                                      name="config-http", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("Config service is not serving")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._changed:
+            self._changed.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads.clear()
+
+    def __enter__(self) -> "ConfigService":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+# ============================================================================
+# Local HTTP API
+# ============================================================================
+
+class _ConfigHandler(BaseHTTPRequestHandler):
+    server: "_ConfigHTTPServer"
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, payload: Any, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:  # noqa: N802
+        service = self.server.service
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/config":
+            snapshot = service.snapshot
+            self._send_json({"version": snapshot.version, "values": masked(snapshot.values)})
+        elif url.path.startswith("/config/"):
+            key = url.path[len("/config/"):]
+            value = service.snapshot.get(key)
+            if key in SETTINGS and SETTINGS[key].secret:
+                self._send_json({"error": f"{key} is a secret and is not served over HTTP"}, 403)
+            elif value is None:
+                self._send_json({"error": f"{key} is not set"}, 404)
+            else:
+                self._send_json({"version": service.snapshot.version, "key": key, "value": value})
+        elif url.path == "/watch":
+            try:
+                since = int(query.get("version", ["0"])[0])
+                timeout = min(float(query.get("timeout", ["30"])[0]), MAX_WATCH_SECONDS)
+            except ValueError:
+                self._send_json({"error": "version must be an integer and timeout a number"}, 400)
+                return
+            snapshot = service.wait_for_version(since, timeout)
+            self._send_json({"version": snapshot.version, "values": masked(snapshot.values)})
+        elif url.path == "/status":
+            self._send_json(service.status())
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:  # noqa: N802
+        if urlparse(self.path).path != "/reload":
+            self._send_json({"error": "not found"}, 404)
+            return
+        report = self.server.service.reload()
+        self._send_json(asdict(report), 200 if not report.errors else 422)
+
+
+class _ConfigHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    service: ConfigService
+
+
+class ConfigClient:
+    """Subscribes another process to a running config service."""
+
+    def __init__(self, url: str = f"http://127.0.0.1:{CONFIG_SERVICE_PORT}", timeout: float = 5.0) -> None:
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def get(self, key: str) -> Optional[str]:
+        """Current value of ``key`` (None when unset); secrets are refused (HTTP 403)."""
+        response = self.session.get(f"{self.url}/config/{key}", timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()["value"]
+
+    def reload(self) -> Dict[str, Any]:
+        response = self.session.post(f"{self.url}/reload", timeout=self.timeout)
+        return response.json()
+
+    def status(self) -> Dict[str, Any]:
+        response = self.session.get(f"{self.url}/status", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def watch(self, callback: Callable[[ConfigChange], None], keys: Optional[Iterable[str]] = None,
+              poll_seconds: float = 30.0) -> "ConfigClient":
+        """
+        Call ``callback`` from a background thread for every change touching ``keys``.
+
+        Secrets arrive masked, so a change of only a secret is not seen.
+        """
+        wanted = frozenset(keys) if keys is not None else None
+
+        def loop() -> None:
+            version, values = 0, {}
+            while not self._stop.is_set():
+                try:
+                    response = self.session.get(f"{self.url}/watch",
+                                                params={"version": version, "timeout": poll_seconds},
+                                                timeout=poll_seconds + self.timeout)
+                    payload = response.json()
+                except (requests.RequestException, ValueError) as e:
+                    logger.warning("Config service unavailable: %s", e)
+                    self._stop.wait(1.0)
+                    continue
+                if payload["version"] <= version:
+                    continue
+                changes = diff(values, payload["values"])
+                version, values = payload["version"], payload["values"]
+                if wanted is None or wanted.intersection(changes):
+                    try:
+                        callback(ConfigChange(version, MappingProxyType(values), MappingProxyType(changes)))
+                    except Exception:  # noqa: BLE001 - keep watching
+                        logger.exception("Applying configuration v%d failed", version)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name="config-client", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.session.close()
+
+
+# ============================================================================
+# Consumers
+# ============================================================================
+
+def probe_consumer(probes: Sequence[Any]) -> Callable[[ConfigChange], None]:
+    """
+    Point the metrics exporter's health probes at changed addresses.
+
+    Args:
+        probes: Probes from aicoding.metrics.default_probes
+    """
+    from aicoding.metrics import HttpProbe, OllamaProbe
+
+    def apply(change: ConfigChange) -> None:
+        ollama_url = change.values.get("OLLAMA_HOST")
+        openhands_url = change.values.get("OPENHANDS_URL")
+        for probe in probes:
+            if isinstance(probe, OllamaProbe) and ollama_url and "OLLAMA_HOST" in change.changed:
+                probe.base_url = ollama_url.rstrip("/")
+            elif isinstance(probe, HttpProbe) and probe.name == "openhands_ui" and openhands_url \
+                    and "OPENHANDS_URL" in change.changed:
+                probe.url = openhands_url
+    return apply
+
+
+PROBE_KEYS = ("OLLAMA_HOST", "OPENHANDS_URL")
+
+
+def residency_consumer(manager: Any) -> Callable[[ConfigChange], None]:
+    """
+    Apply memory reserve and budget changes to a model residency manager.
+
+    Args:
+        manager: An aicoding.residency.ResidencyManager
+    """
+    from aicoding.residency import GIB
+
+    def apply(change: ConfigChange) -> None:
+        reserve = float(change.values.get("MODEL_MEMORY_RESERVE_GB") or 0)
+        budget = float(change.values.get("MODEL_MEMORY_BUDGET_GB") or 0)
+        manager.set_limits(int(reserve * GIB), int(budget * GIB) if budget else None)
+    return apply
+
+
+RESIDENCY_KEYS = ("MODEL_MEMORY_RESERVE_GB", "MODEL_MEMORY_BUDGET_GB")
+
+
+def credential_response(request: Mapping[str, str], token: Optional[str]) -> Dict[str, str]:
+    """
+    Answer a git credential helper ``get`` request with the GitHub token.
+
+    Args:
+        request: Attributes git sent (protocol, host, ...)
+        token: Current GITHUB_TOKEN
+
+    Returns:
+        Attributes to print (empty when git should ask elsewhere)
+    """
+    if not token or _PLACEHOLDER_RE.match(token) or request.get("host") != "github.com":
+        return {}
+    return {"username": "x-access-token", "password": token}
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def _read_credential_request(stream) -> Dict[str, str]:
+    attributes = {}
+    for line in stream:
+        line = line.strip()
+        if not line:
+            break
+        key, _, value = line.partition("=")
+        attributes[key] = value
+    return attributes
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Hot-reloadable configuration service")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{CONFIG_SERVICE_PORT}",
+                        help="Running service (status, get, reload)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="Watch the env file and serve the local API")
+    serve.add_argument("--env-file", type=Path, default=ENV_FILE)
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=CONFIG_SERVICE_PORT)
+    serve.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL)
+
+    check = sub.add_parser("check", help="Validate an env file")
+    check.add_argument("--env-file", type=Path, default=ENV_FILE)
+
+    sub.add_parser("status", help="Version, errors and apply latencies")
+    sub.add_parser("reload", help="Reload now instead of waiting for the watcher")
+    get = sub.add_parser("get", help="Print one value")
+    get.add_argument("key")
+    credential = sub.add_parser("credential", help="git credential helper (reads GITHUB_TOKEN from the env file)")
+    credential.add_argument("operation", nargs="?", default="get")
+    credential.add_argument("--env-file", type=Path, default=ENV_FILE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.command == "serve":
+        service = ConfigService(args.env_file, args.poll_interval).start(args.host, args.port)
+        print(f"Watching {args.env_file} (v{service.snapshot.version}); API on {service.url}")
+        for error in service.last_error:
+            print(f"  invalid: {error}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            service.stop()
+        return 0
+
+    if args.command == "check":
+        try:
+            errors = validate(parse_env(args.env_file.read_text(encoding="utf-8")))
+        except (OSError, ValueError) as e:
+            errors = [str(e)]
+        for error in errors:
+            print(error)
+        if not errors:
+            print(f"{args.env_file}: valid")
+        return 1 if errors else 0
+
+    if args.command == "credential":
+        if args.operation != "get":
+            return 0
+        request = _read_credential_request(sys.stdin)
+        # Read from the (mode 600) file itself: the HTTP API never serves secrets
+        try:
+            token = parse_env(args.env_file.read_text(encoding="utf-8")).get("GITHUB_TOKEN")
+        except (OSError, ValueError):
+            token = None
+        for key, value in credential_response(request, token).items():
+            print(f"{key}={value}")
+        return 0
+
+    if args.command == "get" and args.key in SETTINGS and SETTINGS[args.key].secret:
+        print(f"{args.key} is a secret and is not served over HTTP; read it from {ENV_FILE}", file=sys.stderr)
+        return 1
+    client = ConfigClient(args.url)
+    try:
+        if args.command == "status":
+            status = client.status()
+            print(json.dumps(status, indent=2))
+            return 1 if status["errors"] else 0
+        if args.command == "reload":
+            report = client.reload()
+            print(json.dumps(report, indent=2))
+            return 1 if report["errors"] else 0
+        value = client.get(args.key)
+    except requests.RequestException as e:
+        print(f"Config service not reachable at {args.url}: {e}", file=sys.stderr)
+        return 2
+    if value is None:
+        return 1
+    print(value)
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
@@ -0,0 +1,744 @@
+"""
+Incremental code-context retrieval index for workspace projects.
+
+Instead of stuffing whole files from /opt/workspace/projects into prompts,
+the agent can ask this index for the few symbol-level snippets that matter
+for a request. Prompt-processing (prefill) time on CPU grows with context
+length, so sending only relevant snippets directly cuts latency and tokens
+per request.
+
+The index:
+- chunks files at symbol boundaries (Python via ``ast``, other languages via
+  definition-line heuristics, Markdown via headings)
+- ranks chunks with BM25 over identifier sub-tokens, with a character
+  trigram index used to expand misspelled or partial query terms
+- updates incrementally: ``refresh()`` only re-reads files whose size or
+  mtime changed, and only re-indexes them when their content hash changed
+
+Usage:
+    python -m aicoding.context_index query /opt/workspace/projects/app "parse config" -k 5
+"""
+
+import argparse
+import ast
+import hashlib
+import json
+import math
+import os
+import re
+import stat
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import PROJECTS_DIR
+from aicoding.workspace import DEFAULT_IGNORED_DIRS, iter_files
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+# Files larger than this are almost always generated or data files
+MAX_FILE_BYTES = 512 * 1024
+
+# Symbol chunks longer than this are split into line windows
+MAX_CHUNK_LINES = 80
+WINDOW_LINES = 60
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Query terms missing from the vocabulary are expanded to vocabulary terms
+# whose trigram Jaccard similarity is at least this value
+TRIGRAM_MIN_SIMILARITY = 0.45
+TRIGRAM_MAX_EXPANSIONS = 5
+
+# Score multiplier when a query term matches the chunk's symbol name
+SYMBOL_NAME_BOOST = 1.5
+
+INDEX_FORMAT_VERSION = 1
+
+_IDENTIFIER_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+_STOP_WORDS = frozenset({
+    "the", "and", "for", "with", "this", "that", "from", "import", "return",
+    "self", "def", "class", "function", "const", "let", "var", "if", "else",
+    "in", "is", "of", "to", "a", "an", "or", "not", "none", "true", "false",
+    "null", "new", "as", "be", "it", "on", "at", "by",
+})
+
+# Top-level definition lines for non-Python sources
+_DEFINITION_RE = re.compile(
+    r"^(?:export\s+)?(?:default\s+)?(?:pub(?:\(crate\))?\s+)?(?:async\s+)?"
+    r"(?:function\*?|class|interface|type|enum|def|fn|func|struct|impl|trait|module|object)\s+"
+    r"([A-Za-z_$][\w$]*)"
+    r"|^(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?(?:\(|function)"
+)
+_MARKDOWN_HEADING_RE = re.compile(r"^#{1,6}\s+(.+)$")
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+@dataclass
+class Chunk:
+    """A contiguous, symbol-aligned region of a workspace file."""
+
+    path: str
+    symbol: str
+    start_line: int
+    end_line: int
+    text: str
+
+
+@dataclass
+class Snippet:
+    """A ranked chunk returned by a query."""
+
+    path: str
+    symbol: str
+    start_line: int
+    end_line: int
+    text: str
+    score: float
+    tokens: int
+
+
+@dataclass
+class RefreshStats:
+    """Outcome of an incremental refresh."""
+
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class _FileState:
+    mtime_ns: int
+    size: int
+    digest: str
+    chunk_ids: List[int] = field(default_factory=list)
+
+
+# ============================================================================
+# Tokenization
+# ============================================================================
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate used when no model tokenizer is supplied.
+
+    Code averages roughly four characters per token for the coder models.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Estimated token count
+    """
+    return (len(text) + 3) // 4
+
+
+@lru_cache(maxsize=65536)
+def _identifier_terms(identifier: str) -> Tuple[str, ...]:
+    whole = identifier.lower().strip("_")
+    parts = [p.lower() for piece in identifier.split("_") for p in _CAMEL_RE.findall(piece)]
+    terms = [whole] if len(whole) > 1 and whole not in _STOP_WORDS else []
+    if len(parts) > 1:
+        terms.extend(p for p in parts if len(p) > 1 and p not in _STOP_WORDS and p != whole)
+    return tuple(terms)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase search terms.
+
+    Identifiers are kept whole and additionally split into their
+    snake_case / camelCase parts, so ``parseConfigFile`` matches queries for
+    "parse", "config" and "parseconfigfile".
+
+    Args:
+        text: Source text or query
+
+    Returns:
+        List of terms (with repetition)
+    """
+    terms: List[str] = []
+    for identifier in _IDENTIFIER_RE.findall(text):
+        terms.extend(_identifier_terms(identifier))
+    return terms
+
+
+def trigrams(term: str) -> Set[str]:
+    """
+    Character trigrams of a term, padded so short terms still produce some.
+
+    Args:
+        term: Lowercase search term
+
+    Returns:
+        Set of trigrams
+    """
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# ============================================================================
+# Chunking
+# ============================================================================
+
+def _split_long(path: str, symbol: str, lines: List[str], start: int, end: int) -> List[Chunk]:
+    """Split an oversized [start, end] (1-based, inclusive) region into windows."""
+    if end - start + 1 <= MAX_CHUNK_LINES:
+        return [Chunk(path, symbol, start, end, "".join(lines[start - 1:end]))]
+    chunks = []
+    for window_start in range(start, end + 1, WINDOW_LINES):
+        window_end = min(end, window_start + WINDOW_LINES - 1)
+        chunks.append(Chunk(path, symbol, window_start, window_end,
+                            "".join(lines[window_start - 1:window_end])))
+    return chunks
+
+
+def _regions_to_chunks(path: str, lines: List[str],
+                       regions: List[Tuple[int, int, str]]) -> List[Chunk]:
+    """
+    Turn sorted symbol regions into chunks, filling gaps with module chunks.
+
+    Args:
+        path: Relative file path
+        lines: File lines (with line endings)
+        regions: (start_line, end_line, symbol) tuples, 1-based inclusive
+
+    Returns:
+        Chunks covering every non-blank line of the file exactly once
+    """
+    chunks: List[Chunk] = []
+    cursor = 1
+    total = len(lines)
+    for start, end, symbol in sorted(regions):
+        if start < cursor:
+            continue
+        if start > cursor and "".join(lines[cursor - 1:start - 1]).strip():
+            chunks.extend(_split_long(path, "", lines, cursor, start - 1))
+        chunks.extend(_split_long(path, symbol, lines, start, min(end, total)))
+        cursor = min(end, total) + 1
+    if cursor <= total and "".join(lines[cursor - 1:]).strip():
+        chunks.extend(_split_long(path, "", lines, cursor, total))
+    return chunks
+
+
+def _python_regions(source: str) -> Optional[List[Tuple[int, int, str]]]:
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+    regions = []
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        end = node.end_lineno or node.lineno
+        kind = "class" if isinstance(node, ast.ClassDef) else "def"
+        if isinstance(node, ast.ClassDef) and end - start + 1 > MAX_CHUNK_LINES:
+            # Large classes are chunked per method so each method ranks alone
+            methods = [n for n in node.body
+                       if isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            header_end = (min([methods[0].lineno] + [d.lineno for d in methods[0].decorator_list]) - 1
+                          if methods else end)
+            regions.append((start, max(start, header_end), f"class {node.name}"))
+            for method in methods:
+                m_start = min([method.lineno] + [d.lineno for d in method.decorator_list])
+                regions.append((m_start, method.end_lineno or method.lineno,
+                                f"def {node.name}.{method.name}"))
+            continue
+        regions.append((start, end, f"{kind} {node.name}"))
+    return regions
+
+
+def _heading_or_definition_regions(lines: List[str], markdown: bool) -> List[Tuple[int, int, str]]:
+    starts: List[Tuple[int, str]] = []
+    for number, line in enumerate(lines, start=1):
+        if markdown:
+            match = _MARKDOWN_HEADING_RE.match(line)
+            if match:
+                starts.append((number, match.group(1).strip()))
+            continue
+        match = _DEFINITION_RE.match(line)
+        if match:
+            starts.append((number, match.group(1) or match.group(2)))
+    regions = []
+    for i, (start, symbol) in enumerate(starts):
+        end = starts[i + 1][0] - 1 if i + 1 < len(starts) else len(lines)
+        regions.append((start, end, symbol))
+    return regions
+
+
+def chunk_file(path: str, source: str) -> List[Chunk]:
+    """
+    Split a source file into symbol-level chunks.
+
+    Args:
+        path: Path of the file relative to the indexed root (used for display)
+        source: Decoded file contents
+
+    Returns:
+        List of chunks in file order
+    """
+    lines = source.splitlines(keepends=True)
+    if not lines:
+        return []
+    regions: Optional[List[Tuple[int, int, str]]] = None
+    if path.endswith(".py"):
+        regions = _python_regions(source)
+    if regions is None:
+        regions = _heading_or_definition_regions(lines, markdown=path.endswith((".md", ".rst")))
+    return _regions_to_chunks(path, lines, regions)
+
+
+# ============================================================================
+# Index
+# ============================================================================
+
+class ContextIndex:
+    """
+    BM25 + trigram index over the files below a workspace root.
+
+    Chunk ids are stable for the lifetime of a chunk; re-indexing a file
+    retires its old ids and allocates new ones, so postings never need to be
+    rewritten for unrelated files.
+    """
+
+    def __init__(self, root: Path,
+                 ignored_dirs: Iterable[str] = DEFAULT_IGNORED_DIRS,
+                 max_file_bytes: int = MAX_FILE_BYTES) -> None:
+        """
+        Args:
+            root: Directory to index (a project or the whole projects dir)
+            ignored_dirs: Directory names skipped during scans
+            max_file_bytes: Files larger than this are not indexed
+        """
+        self.root = Path(root)
+        self.ignored_dirs = frozenset(ignored_dirs)
+        self.max_file_bytes = max_file_bytes
+
+        self._files: Dict[str, _FileState] = {}
+        # Binary files seen, by (mtime_ns, size): not indexed, and not read again until they change
+        self._binary: Dict[str, Tuple[int, int]] = {}
+        self._chunks: Dict[int, Chunk] = {}
+        self._chunk_terms: Dict[int, Counter] = {}
+        self._chunk_symbol_terms: Dict[int, Set[str]] = {}
+        self._chunk_lengths: Dict[int, int] = {}
+        self._total_length = 0
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._trigram_terms: Dict[str, Set[str]] = defaultdict(set)
+        self._next_chunk_id = 0
+
+    # ------------------------------------------------------------------
+    # Introspection
+    # ------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._chunks)
+
+    @property
+    def file_count(self) -> int:
+        return len(self._files)
+
+    def files(self) -> List[str]:
+        """Relative paths of all indexed files."""
+        return sorted(self._files)
+
+    # ------------------------------------------------------------------
+    # Incremental maintenance
+    # ------------------------------------------------------------------
+
+    def refresh(self) -> RefreshStats:
+        """
+        Bring the index up to date with the files on disk.
+
+        Files are only read when their size or mtime changed, and only
+        re-chunked when their content hash changed.
+
+        Returns:
+            Counts of added/updated/removed/unchanged files
+        """
+        started = time.perf_counter()
+        stats = RefreshStats()
+        seen: Set[str] = set()
+        for rel_path, st in iter_files(self.root, self.ignored_dirs, self.max_file_bytes):
+            seen.add(rel_path)
+            state = self._files.get(rel_path)
+            if state and state.mtime_ns == st.st_mtime_ns and state.size == st.st_size:
+                stats.unchanged += 1
+                continue
+            if self._binary.get(rel_path) == (st.st_mtime_ns, st.st_size):
+                stats.unchanged += 1
+                continue
+            outcome = self._index_file(rel_path, st)
+            if outcome == "added":
+                stats.added += 1
+            elif outcome == "updated":
+                stats.updated += 1
+            elif outcome == "removed":
+                stats.removed += 1
+            else:
+                stats.unchanged += 1
+        for rel_path in [p for p in self._files if p not in seen]:
+            self._remove_file(rel_path)
+            stats.removed += 1
+        for rel_path in [p for p in self._binary if p not in seen]:
+            del self._binary[rel_path]
+        stats.chunks = len(self._chunks)
+        stats.seconds = time.perf_counter() - started
+        return stats
+
+    def update_paths(self, paths: Iterable[Path]) -> RefreshStats:
+        """
+        Re-index specific files, e.g. from a file-change notification.
+
+        The same files as in a full scan are indexed: paths outside the root
+        or below an ignored directory are skipped, and a file that is no
+        longer indexable (deleted, binary, empty or too large) is dropped.
+
+        Args:
+            paths: Absolute or root-relative paths that changed or were deleted
+
+        Returns:
+            Refresh statistics for just these paths
+        """
+        started = time.perf_counter()
+        stats = RefreshStats()
+        for path in paths:
+            path = Path(path)
+            absolute = path if path.is_absolute() else self.root / path
+            rel_path = os.path.relpath(absolute, self.root)
+            parts = Path(rel_path).parts
+            if rel_path == os.curdir or parts[0] == os.pardir or any(
+                    part in self.ignored_dirs for part in parts[:-1]):
+                continue
+            try:
+                st = absolute.lstat()
+            except OSError:
+                st = None
+            if st is None or not stat.S_ISREG(st.st_mode) or not 0 < st.st_size <= self.max_file_bytes:
+                self._binary.pop(rel_path, None)
+                if rel_path in self._files:
+                    self._remove_file(rel_path)
+                    stats.removed += 1
+                continue
+            outcome = self._index_file(rel_path, st)
+            setattr(stats, outcome, getattr(stats, outcome) + 1)
+        stats.chunks = len(self._chunks)
+        stats.seconds = time.perf_counter() - started
+        return stats
+
+    def _index_file(self, rel_path: str, st: os.stat_result) -> str:
+        try:
+            raw = (self.root / rel_path).read_bytes()
+        except OSError:
+            return "unchanged"
+        digest = hashlib.sha1(raw).hexdigest()
+        state = self._files.get(rel_path)
+        if state and state.digest == digest:
+            state.mtime_ns, state.size = st.st_mtime_ns, st.st_size
+            return "unchanged"
+        if b"\0" in raw[:8192]:
+            self._binary[rel_path] = (st.st_mtime_ns, st.st_size)
+            # Binary now: its old chunks must not be served any more
+            if state:
+                self._remove_file(rel_path)
+                return "removed"
+            return "unchanged"
+        self._binary.pop(rel_path, None)
+        source = raw.decode("utf-8", errors="replace")
+        outcome = "updated" if state else "added"
+        if state:
+            self._remove_file(rel_path)
+        chunk_ids = [self._add_chunk(chunk) for chunk in chunk_file(rel_path, source)]
+        self._files[rel_path] = _FileState(st.st_mtime_ns, st.st_size, digest, chunk_ids)
+        return outcome
+
+    def _add_chunk(self, chunk: Chunk) -> int:
+        chunk_id = self._next_chunk_id
+        self._next_chunk_id += 1
+        terms = Counter(tokenize(chunk.text))
+        self._chunks[chunk_id] = chunk
+        self._chunk_terms[chunk_id] = terms
+        self._chunk_symbol_terms[chunk_id] = set(tokenize(chunk.symbol))
+        length = sum(terms.values())
+        self._chunk_lengths[chunk_id] = length
+        self._total_length += length
+        for term, tf in terms.items():
+            postings = self._postings[term]
+            if not postings:
+                for gram in trigrams(term):
+                    self._trigram_terms[gram].add(term)
+            postings[chunk_id] = tf
+        return chunk_id
+
+    def _remove_file(self, rel_path: str) -> None:
+        state = self._files.pop(rel_path, None)
+        if state is None:
+            return
+        for chunk_id in state.chunk_ids:
+            for term in self._chunk_terms.pop(chunk_id, ()):
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                postings.pop(chunk_id, None)
+                if not postings:
+                    del self._postings[term]
+                    for gram in trigrams(term):
+                        grams = self._trigram_terms.get(gram)
+                        if grams is not None:
+                            grams.discard(term)
+                            if not grams:
+                                del self._trigram_terms[gram]
+            self._total_length -= self._chunk_lengths.pop(chunk_id, 0)
+            self._chunk_symbol_terms.pop(chunk_id, None)
+            self._chunks.pop(chunk_id, None)
+
+    # ------------------------------------------------------------------
+    # Querying
+    # ------------------------------------------------------------------
+
+    def _expand_term(self, term: str) -> List[Tuple[str, float]]:
+        """Map a query term to (vocabulary term, weight) pairs."""
+        if term in self._postings:
+            return [(term, 1.0)]
+        query_grams = trigrams(term)
+        overlap: Counter = Counter()
+        for gram in query_grams:
+            for candidate in self._trigram_terms.get(gram, ()):
+                overlap[candidate] += 1
+        scored = []
+        for candidate, shared in overlap.items():
+            similarity = shared / (len(query_grams) + len(trigrams(candidate)) - shared)
+            if similarity >= TRIGRAM_MIN_SIMILARITY:
+                scored.append((candidate, similarity))
+        scored.sort(key=lambda item: -item[1])
+        return scored[:TRIGRAM_MAX_EXPANSIONS]
+
+    def search(self, text: str, limit: int = 20) -> List[Tuple[int, float]]:
+        """
+        Rank chunks for a free-text query.
+
+        Args:
+            text: Query (natural language or code)
+            limit: Maximum number of results
+
+        Returns:
+            (chunk_id, score) pairs, best first
+        """
+        if not self._chunks:
+            return []
+        total_chunks = len(self._chunks)
+        avg_length = self._total_length / total_chunks or 1.0
+        scores: Dict[int, float] = defaultdict(float)
+        query_terms = Counter(tokenize(text))
+        for query_term, query_tf in query_terms.items():
+            for term, weight in self._expand_term(query_term):
+                postings = self._postings[term]
+                df = len(postings)
+                idf = math.log(1.0 + (total_chunks - df + 0.5) / (df + 0.5))
+                for chunk_id, tf in postings.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._chunk_lengths[chunk_id] / avg_length)
+                    score = idf * tf * (BM25_K1 + 1) / (tf + norm) * weight * query_tf
+                    if term in self._chunk_symbol_terms[chunk_id]:
+                        score *= SYMBOL_NAME_BOOST
+                    scores[chunk_id] += score
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+    def query(self, text: str, k: int = 8, token_budget: Optional[int] = None,
+              count_tokens: Callable[[str], int] = estimate_tokens) -> List[Snippet]:
+        """
+        Return the top-k relevant snippets that fit within a token budget.
+
+        Snippets are taken greedily in rank order; a snippet that does not fit
+        the remaining budget is skipped so smaller relevant ones can still be
+        included.
+
+        Args:
+            text: Query text (usually the user's request)
+            k: Maximum number of snippets
+            token_budget: Maximum total tokens of the snippet texts
+            count_tokens: Token counter for the target model
+
+        Returns:
+            Snippets in rank order
+        """
+        snippets: List[Snippet] = []
+        remaining = token_budget
+        for chunk_id, score in self.search(text, limit=max(k * 4, 20)):
+            chunk = self._chunks[chunk_id]
+            tokens = count_tokens(chunk.text)
+            if remaining is not None and tokens > remaining:
+                continue
+            snippets.append(Snippet(chunk.path, chunk.symbol, chunk.start_line,
+                                    chunk.end_line, chunk.text, score, tokens))
+            if remaining is not None:
+                remaining -= tokens
+            if len(snippets) >= k:
+                break
+        return snippets
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, index_path: Path) -> None:
+        """
+        Persist the index so a restarted agent only re-reads changed files.
+
+        Args:
+            index_path: JSON file to write
+        """
+        payload = {
+            "version": INDEX_FORMAT_VERSION,
+            "root": str(self.root),
+            "files": {
+                rel_path: {
+                    "mtime_ns": state.mtime_ns,
+                    "size": state.size,
+                    "digest": state.digest,
+                    "chunks": [asdict(self._chunks[cid]) for cid in state.chunk_ids],
+                }
+                for rel_path, state in self._files.items()
+            },
+            "binary": {rel_path: list(key) for rel_path, key in self._binary.items()},
+        }
+        index_path = Path(index_path)
+        tmp_path = index_path.with_suffix(index_path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(payload), encoding="utf-8")
+        os.replace(tmp_path, index_path)
+
+    @classmethod
+    def load(cls, index_path: Path, root: Optional[Path] = None) -> "ContextIndex":
+        """
+        Load an index written by ``save``. Call ``refresh()`` afterwards.
+
+        Args:
+            index_path: JSON file written by ``save``
+            root: Override the indexed root directory
+
+        Returns:
+            Restored index
+        """
+        payload = json.loads(Path(index_path).read_text(encoding="utf-8"))
+        if payload.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported index format: {payload.get('version')}")
+        index = cls(Path(root or payload["root"]))
+        for rel_path, entry in payload["files"].items():
+            chunk_ids = [index._add_chunk(Chunk(**chunk)) for chunk in entry["chunks"]]
+            index._files[rel_path] = _FileState(entry["mtime_ns"], entry["size"],
+                                                entry["digest"], chunk_ids)
+        index._binary = {rel_path: tuple(key) for rel_path, key in payload.get("binary", {}).items()}
+        return index
+
+
+# ============================================================================
+# Prompt Rendering
+# ============================================================================
+
+def render_context(snippets: List[Snippet]) -> str:
+    """
+    Render snippets as a prompt section with file/line headers.
+
+    Args:
+        snippets: Snippets returned by ``ContextIndex.query``
+
+    Returns:
+        Markdown text ready to embed into a prompt
+    """
+    parts = []
+    for snippet in snippets:
+        label = f" ({snippet.symbol})" if snippet.symbol else ""
+        parts.append(f"### {snippet.path}:{snippet.start_line}-{snippet.end_line}{label}\n"
+                     f"```\n{snippet.text.rstrip()}\n```")
+    return "\n\n".join(parts)
+
+
+def whole_file_tokens(index: ContextIndex, snippets: List[Snippet],
+                      count_tokens: Callable[[str], int] = estimate_tokens) -> int:
+    """
+    Tokens the prompt would carry if the snippets' files were sent whole.
+
+    Used to report the prompt-size reduction achieved by retrieval.
+
+    Args:
+        index: Index the snippets came from
+        snippets: Retrieved snippets
+        count_tokens: Token counter for the target model
+
+    Returns:
+        Total tokens of the distinct source files
+    """
+    total = 0
+    for rel_path in {snippet.path for snippet in snippets}:
+        try:
+            total += count_tokens((index.root / rel_path).read_text(encoding="utf-8", errors="replace"))
+        except OSError:
+            continue
+    return total
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Workspace code-context retrieval index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build or refresh a persisted index")
+    build_parser.add_argument("root", nargs="?", default=str(PROJECTS_DIR))
+    build_parser.add_argument("--index", required=True, help="Index file to create/update")
+
+    query_parser = subparsers.add_parser("query", help="Query a project for relevant snippets")
+    query_parser.add_argument("root", nargs="?", default=str(PROJECTS_DIR))
+    query_parser.add_argument("text")
+    query_parser.add_argument("-k", type=int, default=8)
+    query_parser.add_argument("--budget", type=int, default=2000, help="Token budget")
+    query_parser.add_argument("--index", help="Persisted index to load and refresh")
+
+    args = parser.parse_args(argv)
+    index_path = Path(args.index) if args.index else None
+    if index_path and index_path.exists():
+        index = ContextIndex.load(index_path, root=Path(args.root))
+    else:
+        index = ContextIndex(Path(args.root))
+    stats = index.refresh()
+    if index_path:
+        index.save(index_path)
+
+    if args.command == "build":
+        print(f"Indexed {index.file_count} files / {stats.chunks} chunks in {stats.seconds:.3f}s "
+              f"(+{stats.added} ~{stats.updated} -{stats.removed})")
+        return 0
+
+    snippets = index.query(args.text, k=args.k, token_budget=args.budget)
+    print(render_context(snippets))
+    sent = sum(snippet.tokens for snippet in snippets)
+    whole = whole_file_tokens(index, snippets)
+    print(f"\n# {len(snippets)} snippets, ~{sent} tokens (whole files: ~{whole} tokens)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
@@ -0,0 +1,555 @@
+"""
+Embedding cache and on-disk vector index for workspace files.
+
+Embeddings come from the local Ollama (``POST /api/embed``) and are cached
+by content hash, so a file is only embedded again when its bytes change -
+on CPU, embedding is far more expensive than hashing.
+
+On-disk layout of a store directory:
+- ``meta.json``: dimension, dtype, model and the committed row count
+- ``vectors.bin``: row-major, L2-normalised vectors (float16 by default),
+  read through ``numpy.memmap`` so searches never load the whole file
+- ``keys.json``: content hash per row and the path -> hash mapping
+- ``ivf.npz``: optional inverted-file (IVF) coarse quantiser
+
+Search is exact (blocked matrix-vector product over the memmap) or
+approximate (probe the ``n_probe`` nearest IVF lists only).
+
+Usage:
+    python -m aicoding.embedding_store --store ~/.cache/app-vectors sync /opt/workspace/projects/app
+    python -m aicoding.embedding_store --store ~/.cache/app-vectors search "http retry logic"
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import requests
+
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import EMBEDDING_MODEL, OLLAMA_HOST, PROJECTS_DIR
+from aicoding.workspace import DEFAULT_IGNORED_DIRS, iter_files
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+STORE_FORMAT_VERSION = 1
+
+# Inputs per /api/embed request
+DEFAULT_BATCH_SIZE = 32
+
+# Rows scored per block during exact search (bounds temporary memory)
+SEARCH_BLOCK_ROWS = 65536
+
+# Only the head of large files is embedded; the embedding models truncate anyway
+MAX_EMBED_CHARS = 8000
+MAX_FILE_BYTES = 512 * 1024
+
+
+# ============================================================================
+# Ollama Embedding Client
+# ============================================================================
+
+class OllamaEmbedder:
+    """Batching client for Ollama's ``/api/embed`` endpoint."""
+
+    def __init__(self, base_url: str = OLLAMA_HOST, model: str = EMBEDDING_MODEL,
+                 batch_size: int = DEFAULT_BATCH_SIZE, timeout: float = 120.0) -> None:
+        """
+        Args:
+            base_url: Ollama base URL (e.g. http://ollama:11434)
+            model: Embedding model name
+            batch_size: Maximum inputs per request
+            timeout: Per-request timeout in seconds
+        """
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.requests_sent = 0
+        self._session = requests.Session()
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed texts in batches.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            float32 array of shape (len(texts), dim)
+
+        Raises:
+            requests.HTTPError: If Ollama rejects a request
+        """
+        rows: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = list(texts[start:start + self.batch_size])
+            response = self._session.post(
+                f"{self.base_url}/api/embed",
+                json={"model": self.model, "input": batch},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            self.requests_sent += 1
+            embeddings = response.json()["embeddings"]
+            if len(embeddings) != len(batch):
+                raise ValueError(f"Expected {len(batch)} embeddings, got {len(embeddings)}")
+            rows.extend(embeddings)
+        return np.asarray(rows, dtype=np.float32)
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+@dataclass
+class SyncStats:
+    """Outcome of synchronising texts or files into the store."""
+
+    embedded: int = 0
+    reused: int = 0
+    removed: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class SearchResult:
+    """A path whose content is close to the query."""
+
+    path: str
+    score: float
+
+
+def content_hash(data: bytes) -> str:
+    """Content key for the embedding cache."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _normalise(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first."""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+# ============================================================================
+# Embedding Store
+# ============================================================================
+
+class EmbeddingStore:
+    """
+    Content-hash keyed embedding cache with exact and IVF search.
+
+    Vectors are append-only; rows whose hash is no longer referenced by any
+    path are skipped by searches and dropped by ``compact()``.
+    """
+
+    def __init__(self, directory: Path, dim: Optional[int] = None,
+                 dtype: str = "float16", model: str = EMBEDDING_MODEL) -> None:
+        """
+        Args:
+            directory: Store directory (created if missing)
+            dim: Vector dimension; inferred from the first batch if omitted
+            dtype: On-disk element type, "float16" or "float32"
+            model: Embedding model the vectors belong to
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.model = model
+        self.count = 0
+        self._hashes: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._paths: Dict[str, Dict[str, object]] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[np.ndarray] = None
+        self._lists: Optional[List[np.ndarray]] = None
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.directory / "vectors.bin"
+
+    def _load(self) -> None:
+        meta_path = self.directory / "meta.json"
+        if not meta_path.exists():
+            return
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get("version") != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported store format: {meta.get('version')}")
+        if meta["model"] != self.model:
+            raise ValueError(f"Store holds {meta['model']} vectors, not {self.model}")
+        self.dim = meta["dim"]
+        self.dtype = np.dtype(meta["dtype"])
+        self.count = meta["count"]
+        keys = json.loads((self.directory / "keys.json").read_text(encoding="utf-8"))
+        self._hashes = keys["hashes"][:self.count]
+        self._rows = {digest: row for row, digest in enumerate(self._hashes)}
+        self._paths = keys["paths"]
+        ivf_path = self.directory / "ivf.npz"
+        if ivf_path.exists():
+            with np.load(ivf_path) as ivf:
+                # A quantiser from an interrupted run is stale; search falls back to exact
+                if len(ivf["assignments"]) == self.count:
+                    self._set_ivf(ivf["centroids"], ivf["assignments"])
+
+    def _write_json(self, name: str, payload: Dict[str, object]) -> None:
+        target = self.directory / name
+        tmp = target.with_suffix(".tmp")
+        tmp.write_text(json.dumps(payload), encoding="utf-8")
+        os.replace(tmp, target)
+
+    def _commit(self) -> None:
+        """Publish appended rows; meta.json is written last so its count is authoritative."""
+        self._write_json("keys.json", {"hashes": self._hashes, "paths": self._paths})
+        self._write_json("meta.json", {
+            "version": STORE_FORMAT_VERSION, "dim": self.dim, "dtype": self.dtype.name,
+            "model": self.model, "count": self.count,
+        })
+        if self._centroids is not None:
+            self._save_ivf()
+        self._matrix = None
+
+    def matrix(self) -> np.ndarray:
+        """Memory-mapped (count, dim) view of the stored vectors."""
+        if self.count == 0 or self.dim is None:
+            return np.zeros((0, self.dim or 0), dtype=self.dtype)
+        if self._matrix is None or self._matrix.shape[0] != self.count:
+            self._matrix = np.memmap(self._vectors_path, dtype=self.dtype, mode="r",
+                                     shape=(self.count, self.dim))
+        return self._matrix
+
+    # ------------------------------------------------------------------
+    # Cache maintenance
+    # ------------------------------------------------------------------
+
+    def __contains__(self, digest: str) -> bool:
+        return digest in self._rows
+
+    def vector(self, digest: str) -> np.ndarray:
+        """Stored (normalised) vector for a content hash."""
+        return np.asarray(self.matrix()[self._rows[digest]], dtype=np.float32)
+
+    def _append(self, digests: List[str], vectors: np.ndarray) -> None:
+        if vectors.ndim != 2 or len(vectors) != len(digests):
+            raise ValueError("Embedding batch shape does not match inputs")
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected dimension {self.dim}, got {vectors.shape[1]}")
+        rows = _normalise(vectors.astype(np.float32)).astype(self.dtype)
+        with open(self._vectors_path, "r+b" if self._vectors_path.exists() else "wb") as handle:
+            # Drop any uncommitted tail left by an interrupted run
+            handle.truncate(self.count * self.dim * self.dtype.itemsize)
+            handle.seek(0, os.SEEK_END)
+            handle.write(rows.tobytes())
+        first_row = self.count
+        for offset, digest in enumerate(digests):
+            self._rows[digest] = first_row + offset
+            self._hashes.append(digest)
+        self.count += len(digests)
+        if self._centroids is not None:
+            new_assignments = np.argmax(rows.astype(np.float32) @ self._centroids.T, axis=1)
+            self._set_ivf(self._centroids,
+                          np.concatenate([self._assignments, new_assignments.astype(np.int32)]))
+
+    def sync_texts(self, items: Mapping[str, str], embedder: OllamaEmbedder,
+                   prune: bool = True) -> SyncStats:
+        """
+        Make ``items`` (key -> text) searchable, embedding only unseen content.
+
+        Args:
+            items: Mapping of path (or any key) to text
+            embedder: Client used for texts whose hash is not cached
+            prune: Forget keys that are not in ``items``
+
+        Returns:
+            Counts of embedded and reused texts
+        """
+        started = time.perf_counter()
+        stats = SyncStats()
+        pending: Dict[str, str] = {}
+        for key, text in items.items():
+            digest = content_hash(text.encode("utf-8"))
+            self._paths[key] = {"hash": digest}
+            if digest in self._rows or digest in pending:
+                stats.reused += 1
+            else:
+                pending[digest] = text
+        if pending:
+            digests = list(pending)
+            self._append(digests, embedder.embed([pending[d] for d in digests]))
+            stats.embedded = len(digests)
+        if prune:
+            for key in [k for k in self._paths if k not in items]:
+                del self._paths[key]
+                stats.removed += 1
+        self._commit()
+        stats.seconds = time.perf_counter() - started
+        return stats
+
+    def sync_directory(self, root: Path, embedder: OllamaEmbedder,
+                       max_chars: int = MAX_EMBED_CHARS) -> SyncStats:
+        """
+        Embed the text files below ``root``, skipping unchanged files.
+
+        Files whose size and mtime match the last sync are not even read.
+
+        Args:
+            root: Project directory
+            embedder: Client used for new content
+            max_chars: Only the first ``max_chars`` characters are embedded
+
+        Returns:
+            Counts of embedded, reused and removed files
+        """
+        started = time.perf_counter()
+        stats = SyncStats()
+        pending: Dict[str, str] = {}
+        pending_paths: Dict[str, Tuple[str, os.stat_result]] = {}
+        seen = set()
+        for rel_path, st in iter_files(Path(root), DEFAULT_IGNORED_DIRS, MAX_FILE_BYTES):
+            seen.add(rel_path)
+            entry = self._paths.get(rel_path)
+            if entry and entry.get("mtime_ns") == st.st_mtime_ns and entry.get("size") == st.st_size:
+                stats.reused += 1
+                continue
+            try:
+                raw = (Path(root) / rel_path).read_bytes()
+            except OSError:
+                continue
+            if b"\0" in raw[:8192]:
+                # Not text (any more): its entry is dropped below
+                seen.discard(rel_path)
+                continue
+            digest = content_hash(raw)
+            pending_paths[rel_path] = (digest, st)
+            if digest in self._rows or digest in pending:
+                stats.reused += 1
+            else:
+                pending[digest] = raw.decode("utf-8", errors="replace")[:max_chars]
+        if pending:
+            digests = list(pending)
+            self._append(digests, embedder.embed([pending[d] for d in digests]))
+            stats.embedded = len(digests)
+        for rel_path, (digest, st) in pending_paths.items():
+            self._paths[rel_path] = {"hash": digest, "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+        for rel_path in [p for p in self._paths if p not in seen]:
+            del self._paths[rel_path]
+            stats.removed += 1
+        self._commit()
+        stats.seconds = time.perf_counter() - started
+        return stats
+
+    def compact(self) -> int:
+        """
+        Rewrite the vector file without rows no path references.
+
+        Returns:
+            Number of rows dropped
+        """
+        live = sorted({entry["hash"] for entry in self._paths.values()} & set(self._rows))
+        dropped = self.count - len(live)
+        if dropped == 0:
+            return 0
+        keep_rows = np.array([self._rows[d] for d in live], dtype=np.int64)
+        kept = np.array(self.matrix()[keep_rows]) if len(keep_rows) else np.zeros((0, self.dim), self.dtype)
+        old_assignments = self._assignments
+        self._matrix = None
+        tmp = self._vectors_path.with_suffix(".tmp")
+        tmp.write_bytes(kept.tobytes())
+        os.replace(tmp, self._vectors_path)
+        self._hashes = live
+        self._rows = {digest: row for row, digest in enumerate(live)}
+        self.count = len(live)
+        if self._centroids is not None and old_assignments is not None:
+            self._set_ivf(self._centroids, old_assignments[keep_rows])
+        self._commit()
+        return dropped
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def _live_rows_to_paths(self) -> Dict[int, List[str]]:
+        mapping: Dict[int, List[str]] = {}
+        for path, entry in self._paths.items():
+            row = self._rows.get(entry["hash"])
+            if row is not None:
+                mapping.setdefault(row, []).append(path)
+        return mapping
+
+    def _query_vector(self, query: np.ndarray) -> np.ndarray:
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        if query.shape[0] != self.dim:
+            raise ValueError(f"Query dimension {query.shape[0]} does not match store dimension {self.dim}")
+        return _normalise(query)
+
+    def _results(self, rows: np.ndarray, scores: np.ndarray, k: int) -> List[SearchResult]:
+        live = self._live_rows_to_paths()
+        mask = np.fromiter((row in live for row in rows), dtype=bool, count=len(rows))
+        rows, scores = rows[mask], scores[mask]
+        results: List[SearchResult] = []
+        for position in _top_k(scores, k):
+            for path in sorted(live[int(rows[position])]):
+                results.append(SearchResult(path, float(scores[position])))
+        return results[:k]
+
+    def search_exact(self, query: np.ndarray, k: int = 10) -> List[SearchResult]:
+        """
+        Brute-force cosine search over every stored vector.
+
+        Args:
+            query: Query embedding
+            k: Number of results
+
+        Returns:
+            Best-matching paths, highest similarity first
+        """
+        if self.count == 0:
+            return []
+        q = self._query_vector(query)
+        matrix = self.matrix()
+        scores = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, SEARCH_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+            scores[start:start + len(block)] = block @ q
+        return self._results(np.arange(self.count), scores, k)
+
+    def build_ivf(self, n_lists: Optional[int] = None, iterations: int = 10, seed: int = 0) -> int:
+        """
+        Train an IVF coarse quantiser with spherical k-means.
+
+        Args:
+            n_lists: Number of inverted lists (default: sqrt(count))
+            iterations: k-means iterations
+            seed: Random seed for centroid initialisation
+
+        Returns:
+            Number of lists built
+        """
+        if self.count == 0:
+            return 0
+        data = np.asarray(self.matrix(), dtype=np.float32)
+        n_lists = max(1, min(n_lists or int(np.sqrt(self.count)), self.count))
+        rng = np.random.default_rng(seed)
+        centroids = data[rng.choice(self.count, n_lists, replace=False)].copy()
+        assignments = np.zeros(self.count, dtype=np.int32)
+        for _ in range(iterations):
+            assignments = np.argmax(data @ centroids.T, axis=1).astype(np.int32)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, data)
+            counts = np.bincount(assignments, minlength=n_lists)
+            non_empty = counts > 0
+            centroids[non_empty] = _normalise(sums[non_empty])
+        self._set_ivf(centroids, np.argmax(data @ centroids.T, axis=1).astype(np.int32))
+        self._save_ivf()
+        return n_lists
+
+    def _set_ivf(self, centroids: np.ndarray, assignments: np.ndarray) -> None:
+        self._centroids = centroids.astype(np.float32)
+        self._assignments = assignments.astype(np.int32)
+        order = np.argsort(self._assignments, kind="stable")
+        boundaries = np.searchsorted(self._assignments[order], np.arange(len(centroids) + 1))
+        self._lists = [order[boundaries[i]:boundaries[i + 1]] for i in range(len(centroids))]
+
+    def _save_ivf(self) -> None:
+        tmp = self.directory / "ivf.tmp.npz"
+        np.savez(tmp, centroids=self._centroids, assignments=self._assignments)
+        os.replace(tmp, self.directory / "ivf.npz")
+
+    def search_approx(self, query: np.ndarray, k: int = 10, n_probe: int = 4) -> List[SearchResult]:
+        """
+        IVF search: score only rows in the ``n_probe`` nearest lists.
+
+        Falls back to exact search when no quantiser has been built.
+
+        Args:
+            query: Query embedding
+            k: Number of results
+            n_probe: Number of inverted lists to scan
+
+        Returns:
+            Best-matching paths, highest similarity first
+        """
+        if self._centroids is None or self._lists is None:
+            return self.search_exact(query, k)
+        if self.count == 0:
+            return []
+        q = self._query_vector(query)
+        probes = _top_k(self._centroids @ q, min(n_probe, len(self._centroids)))
+        rows = np.sort(np.concatenate([self._lists[int(p)] for p in probes]))
+        if len(rows) == 0:
+            return []
+        scores = np.asarray(self.matrix()[rows], dtype=np.float32) @ q
+        return self._results(rows, scores, k)
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Workspace embedding cache and vector search")
+    parser.add_argument("--store", required=True, help="Store directory")
+    parser.add_argument("--base-url", default=OLLAMA_HOST)
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    sync_parser = subparsers.add_parser("sync", help="Embed new or changed files")
+    sync_parser.add_argument("root", nargs="?", default=str(PROJECTS_DIR))
+    sync_parser.add_argument("--ivf-lists", type=int, default=0,
+                             help="Rebuild the IVF index with this many lists after syncing")
+
+    search_parser = subparsers.add_parser("search", help="Find files similar to a query")
+    search_parser.add_argument("text")
+    search_parser.add_argument("-k", type=int, default=10)
+    search_parser.add_argument("--exact", action="store_true")
+    search_parser.add_argument("--n-probe", type=int, default=4)
+
+    args = parser.parse_args(argv)
+    store = EmbeddingStore(Path(args.store), model=args.model)
+    embedder = OllamaEmbedder(args.base_url, args.model)
+
+    if args.command == "sync":
+        stats = store.sync_directory(Path(args.root), embedder)
+        if args.ivf_lists:
+            store.build_ivf(args.ivf_lists)
+        print(f"Embedded {stats.embedded}, reused {stats.reused}, removed {stats.removed} "
+              f"in {stats.seconds:.2f}s ({store.count} vectors)")
+        return 0
+
+    query = embedder.embed([args.text])[0]
+    results = store.search_exact(query, args.k) if args.exact else \
+        store.search_approx(query, args.k, args.n_probe)
+    for result in results:
+        print(f"{result.score:.4f}  {result.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+In-process fake Docker Engine API for offline tests of the runtime pool.
+
+Serves the subset of the Docker Engine API used by ``aicoding.runtime_pool``
+on a unix socket (like ``/var/run/docker.sock``) or a loopback TCP port.
+No containers are run; their state is simulated:
+- ``POST /containers/create`` takes ``create_seconds``; ``start`` marks the
+  container running, and a container with a ``Healthcheck`` reports
+  ``healthy`` ``boot_seconds`` later (the OpenHands runtime's boot).
+  Like the real daemon, ``start`` fails while another running container
+  publishes one of the same host ports
+- ``GET /containers/{id}/stats?stream=false`` reports ``memory_bytes`` and
+  a CPU counter that only advances for containers in ``FakeDocker.busy``
+- ``POST /containers/{id}/rename``, ``stop``, ``DELETE /containers/{id}``
+  and ``GET /containers/json?all=1`` behave like the real API
+- ``FakeDocker.exit(name)`` makes a container exit, as a crashed or
+  abandoned runtime would
+
+Usage:
+    with FakeDocker(socket_path="/tmp/docker.sock") as docker:
+        api = DockerAPI(docker.url)
+"""
+
+import json
+import os
+import re
+import socketserver
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+DEFAULT_CREATE_SECONDS = 0.05
+DEFAULT_BOOT_SECONDS = 0.5
+DEFAULT_MEMORY_BYTES = 512 * 1024 * 1024
+
+
+class _FakeDockerHandler(BaseHTTPRequestHandler):
+    server: Any
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def address_string(self) -> str:
+        return "fake-docker"
+
+    def _send_json(self, payload: Any, status: int = 200) -> None:
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        if body:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self, method: str) -> None:
+        docker: FakeDocker = self.server.docker
+        url = urlparse(self.path)
+        path = re.sub(r"^/v[0-9.]+", "", url.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        docker.requests.append((method, path))
+        status, payload = docker.handle(method, path, query, body)
+        self._send_json(payload, status)
+
+    def do_GET(self) -> None:  # noqa: N802
+        self._route("GET")
+
+    def do_POST(self) -> None:  # noqa: N802
+        self._route("POST")
+
+    def do_DELETE(self) -> None:  # noqa: N802
+        self._route("DELETE")
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class FakeDocker:
+    """Simulated Docker daemon."""
+
+    def __init__(self, socket_path: Optional[str] = None, create_seconds: float = DEFAULT_CREATE_SECONDS,
+                 boot_seconds: float = DEFAULT_BOOT_SECONDS, memory_bytes: int = DEFAULT_MEMORY_BYTES) -> None:
+        """
+        Args:
+            socket_path: Unix socket to serve on (None: a loopback TCP port)
+            create_seconds: Latency of ``POST /containers/create``
+            boot_seconds: Time from start until a container with a healthcheck is healthy
+            memory_bytes: Memory reported for every running container
+        """
+        self.socket_path = socket_path
+        self.create_seconds = create_seconds
+        self.boot_seconds = boot_seconds
+        self.memory_bytes = memory_bytes
+        self.containers: Dict[str, Dict[str, Any]] = {}
+        self.busy: Set[str] = set()
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    # -- simulated daemon ----------------------------------------------
+
+    def _find(self, ref: str) -> Optional[Dict[str, Any]]:
+        for container in self.containers.values():
+            if container["Id"] == ref or container["Id"].startswith(ref) or container["Name"] == "/" + ref:
+                return container
+        return None
+
+    def _state(self, container: Dict[str, Any]) -> Dict[str, Any]:
+        state = {"Status": container["Status"], "Running": container["Status"] == "running"}
+        if container["Config"].get("Healthcheck") and state["Running"]:
+            booted = time.monotonic() - container["StartedAt"] >= self.boot_seconds
+            state["Health"] = {"Status": "healthy" if booted else "starting"}
+        return state
+
+    @staticmethod
+    def _host_ports(container: Dict[str, Any]) -> Set[str]:
+        bindings = (container["Config"].get("HostConfig") or {}).get("PortBindings") or {}
+        return {binding["HostPort"] for port_bindings in bindings.values() for binding in port_bindings or []
+                if binding.get("HostPort")}
+
+    def exit(self, name: str) -> None:
+        """Make a container exit on its own."""
+        self._find(name)["Status"] = "exited"
+
+    def handle(self, method: str, path: str, query: Dict[str, str],
+               body: Optional[Dict[str, Any]]) -> Tuple[int, Any]:
+        if method == "POST" and path == "/containers/create":
+            time.sleep(self.create_seconds)
+        with self._lock:
+            if method == "POST" and path == "/containers/create":
+                name = query.get("name") or uuid.uuid4().hex[:12]
+                if self._find(name):
+                    return 409, {"message": f'Conflict. The container name "/{name}" is already in use'}
+                container_id = uuid.uuid4().hex + uuid.uuid4().hex
+                self.containers[container_id] = {
+                    "Id": container_id, "Name": "/" + name, "Config": body or {}, "Status": "created",
+                    "Created": time.time(), "StartedAt": 0.0, "Cpu": 0}
+                return 201, {"Id": container_id, "Warnings": []}
+            if method == "GET" and path == "/containers/json":
+                filters = json.loads(query.get("filters", "{}"))
+                result = []
+                for container in self.containers.values():
+                    if container["Status"] != "running" and query.get("all") not in ("1", "true"):
+                        continue
+                    labels = container["Config"].get("Labels") or {}
+                    wanted = filters.get("label", [])
+                    if not all(label in labels if "=" not in label
+                               else labels.get(label.split("=", 1)[0]) == label.split("=", 1)[1]
+                               for label in wanted):
+                        continue
+                    if not all(name in container["Name"] for name in filters.get("name", [])):
+                        continue
+                    result.append({"Id": container["Id"], "Names": [container["Name"]], "Labels": labels,
+                                   "State": container["Status"], "Created": int(container["Created"])})
+                return 200, result
+            match = re.match(r"^/containers/([^/]+)(?:/(\w+))?$", path)
+            container = self._find(match.group(1)) if match else None
+            if container is None:
+                return 404, {"message": "No such container"}
+            action = match.group(2)
+            if method == "GET" and action == "json":
+                return 200, {"Id": container["Id"], "Name": container["Name"], "Config": container["Config"],
+                             "Created": container["Created"], "State": self._state(container)}
+            if method == "POST" and action == "start":
+                if container["Status"] == "running":
+                    return 304, None
+                taken = set().union(*(self._host_ports(other) for other in self.containers.values()
+                                      if other["Status"] == "running"))
+                clash = sorted(self._host_ports(container) & taken)
+                if clash:
+                    return 500, {"message": f"driver failed programming external connectivity: "
+                                            f"Bind for 0.0.0.0:{clash[0]} failed: port is already allocated"}
+                container["Status"], container["StartedAt"] = "running", time.monotonic()
+                return 204, None
+            if method == "POST" and action == "stop":
+                container["Status"] = "exited"
+                return 204, None
+            if method == "POST" and action == "rename":
+                if self._find(query["name"]):
+                    return 409, {"message": "name in use"}
+                container["Name"] = "/" + query["name"]
+                return 204, None
+            if method == "GET" and action == "stats":
+                running = container["Status"] == "running"
+                if container["Name"].lstrip("/") in self.busy:
+                    container["Cpu"] += 1_000_000
+                return 200, {"memory_stats": {"usage": self.memory_bytes if running else 0},
+                             "cpu_stats": {"cpu_usage": {"total_usage": container["Cpu"]}}}
+            if method == "DELETE" and action is None:
+                if container["Status"] == "running" and query.get("force") not in ("1", "true"):
+                    return 409, {"message": "container is running"}
+                del self.containers[container["Id"]]
+                return 204, None
+            return 404, {"message": "unsupported"}
+
+    def names(self) -> Dict[str, str]:
+        """Container name -> status."""
+        with self._lock:
+            return {c["Name"].lstrip("/"): c["Status"] for c in self.containers.values()}
+
+    # -- serving -------------------------------------------------------
+
+    @property
+    def url(self) -> str:
+        if self.socket_path:
+            return f"unix://{self.socket_path}"
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "FakeDocker":
+        if self.socket_path:
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self._server = _UnixServer(self.socket_path, _FakeDockerHandler)
+        else:
+            self._server = _TCPServer(("127.0.0.1", 0), _FakeDockerHandler)
+        self._server.docker = self
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05},
+                         daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeDocker":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
@@ -0,0 +1,92 @@
+"""
+Tiny stdio MCP server for offline tests of the MCP supervisor.
+
+Speaks newline-delimited JSON-RPC 2.0 on stdin/stdout like the Node.js MCP
+servers, with three tools:
+- ``echo``: returns its ``text`` argument
+- ``sleep``: answers after ``seconds`` (the server's "actual work")
+- ``crash``: exits the process without answering
+
+``--startup-seconds`` delays the first read to stand in for Node.js
+startup and ``npx`` package resolution. Requests are answered on their own
+threads, so a slow call does not hold up the others (as with the async
+Node.js servers).
+
+Usage:
+    python -m aicoding.fake_mcp --startup-seconds 0.3
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+PROTOCOL_VERSION = "2024-11-05"
+
+TOOLS = [
+    {"name": "echo", "description": "Return the text argument",
+     "inputSchema": {"type": "object", "properties": {"text": {"type": "string"}}}},
+    {"name": "sleep", "description": "Wait for the given number of seconds",
+     "inputSchema": {"type": "object", "properties": {"seconds": {"type": "number"}}}},
+    {"name": "crash", "description": "Exit the server", "inputSchema": {"type": "object"}},
+]
+
+_write_lock = threading.Lock()
+
+
+def _send(message: Dict[str, Any]) -> None:
+    with _write_lock:
+        sys.stdout.write(json.dumps(message) + "\n")
+        sys.stdout.flush()
+
+
+def _result(request_id: Any, result: Dict[str, Any]) -> None:
+    _send({"jsonrpc": "2.0", "id": request_id, "result": result})
+
+
+def _handle(message: Dict[str, Any]) -> None:
+    method, request_id = message.get("method"), message.get("id")
+    params = message.get("params") or {}
+    if request_id is None:
+        return
+    if method == "initialize":
+        _result(request_id, {"protocolVersion": PROTOCOL_VERSION, "capabilities": {"tools": {}},
+                             "serverInfo": {"name": "fake-mcp", "version": str(os.getpid())}})
+    elif method == "ping":
+        _result(request_id, {})
+    elif method == "tools/list":
+        _result(request_id, {"tools": TOOLS})
+    elif method == "tools/call":
+        name, arguments = params.get("name"), params.get("arguments") or {}
+        if name == "crash":
+            os._exit(3)
+        if name == "sleep":
+            time.sleep(float(arguments.get("seconds", 0)))
+            text = "slept"
+        elif name == "echo":
+            text = str(arguments.get("text", ""))
+        else:
+            _send({"jsonrpc": "2.0", "id": request_id, "error": {"code": -32602, "message": f"unknown tool {name}"}})
+            return
+        _result(request_id, {"content": [{"type": "text", "text": text}]})
+    else:
+        _send({"jsonrpc": "2.0", "id": request_id, "error": {"code": -32601, "message": f"unknown method {method}"}})
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Tiny stdio MCP server")
+    parser.add_argument("--startup-seconds", type=float, default=0.0)
+    args = parser.parse_args(argv)
+    time.sleep(args.startup_seconds)
+    for line in sys.stdin:
+        if line.strip():
+            threading.Thread(target=_handle, args=(json.loads(line),), daemon=True).start()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
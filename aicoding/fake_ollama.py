@@ -0,0 +1,488 @@
+"""
+In-process fake Ollama server for offline tests and benchmarks.
+
+Serves a subset of the Ollama HTTP API on a loopback port so tooling that
+talks to ``OLLAMA_HOST`` / ``LLM_BASE_URL`` can be exercised without the
+real containers or models.
+
+Supported endpoints:
+- ``POST /api/embed``: deterministic embeddings; texts sharing words get
+  similar vectors, so nearest-neighbour results are meaningful in tests
+- ``GET /api/tags``: lists the configured model names with their digests
+  (``FakeOllama.digests``, derived from the name unless set)
+- ``GET /api/ps``: lists the models marked as loaded (``FakeOllama.loaded``)
+- ``POST /api/chat`` and ``POST /api/generate``: non-streaming (or
+  single-chunk streaming) replies whose latency follows a simple CPU
+  inference model - prompt tokens at ``prefill_tokens_per_second``, output
+  tokens at ``decode_tokens_per_second``, at most ``parallel`` requests at
+  once (like ``OLLAMA_NUM_PARALLEL``), all scaled by ``time_scale``
+
+With ``memory_bytes`` set, model residency is simulated as well: a request
+for a model that is not loaded first loads it (``model_sizes`` bytes at
+``load_bytes_per_second``), evicting the least recently used models when
+memory runs out; an empty prompt only loads the model and
+``keep_alive: 0`` unloads it, as with the real server.
+
+With ``prefix_cache`` set, each model gets ``parallel`` slots that keep the
+KV cache of their last conversation, as Ollama's runner does: a request
+takes the free slot sharing the longest prefix with its prompt (else the
+least recently used one) and only the tokens after that prefix are
+evaluated (``prompt_eval_count``). A request whose load options
+(``num_ctx`` and the others in aicoding.models.LOAD_OPTIONS) differ from the
+loaded instance's reloads the model and empties its slots.
+
+With ``cpu_cores`` set, the runtime options act on speed like on a CPU host:
+``num_thread`` beyond the cores oversubscribes them, prefill grows with
+``num_batch`` and shrinks with ``num_ctx``, concurrent requests share the
+cores for prefill and are batched for decoding. With ``memory_bytes`` as
+well, a request whose model, KV cache (``num_ctx`` per parallel slot) and
+batch buffers do not fit is answered 500 like Ollama's out-of-memory error.
+
+Usage:
+    with FakeOllama() as server:
+        embedder = OllamaEmbedder(server.url)
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from aicoding.models import LOAD_OPTIONS, get_profile
+from aicoding.settings import PRIMARY_MODEL, SECONDARY_MODEL
+
+
+DEFAULT_EMBEDDING_DIM = 64
+
+# Rough CPU figures for a 7B-16B coder model on the Oracle instance
+DEFAULT_PREFILL_TOKENS_PER_SECOND = 60.0
+DEFAULT_DECODE_TOKENS_PER_SECOND = 8.0
+DEFAULT_NUM_PREDICT = 128
+# Reading GGUF weights from local disk into RAM
+DEFAULT_LOAD_BYTES_PER_SECOND = 1.5 * 1024 ** 3
+
+# Host CPU simulation: Ollama's option defaults, and the memory a context
+# token (KV cache) and a batch token (compute buffer) take
+DEFAULT_NUM_CTX = 2048
+DEFAULT_NUM_BATCH = 512
+KV_BYTES_PER_TOKEN = 128 * 1024
+BATCH_BYTES_PER_TOKEN = 512 * 1024
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def deterministic_embedding(text: str, dim: int = DEFAULT_EMBEDDING_DIM) -> List[float]:
+    """
+    Hashed bag-of-words embedding: identical texts give identical vectors and
+    texts that share words point in similar directions.
+
+    Args:
+        text: Text to embed
+        dim: Vector dimension
+
+    Returns:
+        Unit-length vector as a list of floats
+    """
+    vector = [0.0] * dim
+    words = _WORD_RE.findall(text.lower()) or [text]
+    for word in words:
+        digest = hashlib.sha256(word.encode("utf-8")).digest()
+        for i in range(dim):
+            byte = digest[i % len(digest)] ^ (i * 31 & 0xFF)
+            vector[i] += (byte / 127.5) - 1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_FakeOllamaHTTPServer"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        # Keep test output clean
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self) -> None:  # noqa: N802
+        fake = self.server.fake
+        if self.path == "/api/tags":
+            # Approximate on-disk size: weights without the KV cache
+            self._send_json(200, {"models": [{"name": name, "size": int(fake.model_size(name) * 0.8),
+                                              "digest": fake.model_digest(name)} for name in fake.models]})
+        elif self.path == "/api/ps":
+            with fake.lock:
+                loaded = [dict(entry) for entry in fake.loaded]
+            self._send_json(200, {"models": loaded})
+        else:
+            self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+
+    def do_POST(self) -> None:  # noqa: N802
+        fake = self.server.fake
+        payload = self._read_json()
+        if self.path == "/api/embed":
+            inputs = payload.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            with fake.lock:
+                fake.embed_requests += 1
+                fake.embedded_inputs += len(inputs)
+            self._send_json(200, {
+                "model": payload.get("model", ""),
+                "embeddings": [deterministic_embedding(text, fake.embedding_dim) for text in inputs],
+            })
+        elif self.path in ("/api/chat", "/api/generate"):
+            self._generate(fake, payload, chat=self.path == "/api/chat")
+        else:
+            self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+
+    def _generate(self, fake: "FakeOllama", payload: Dict[str, Any], chat: bool) -> None:
+        if chat:
+            prompt = "\n".join(str(m.get("content", "")) for m in payload.get("messages", []))
+        else:
+            prompt = str(payload.get("system", "")) + str(payload.get("prompt", ""))
+        options = payload.get("options") or {}
+        model = str(payload.get("model", ""))
+
+        load_seconds = 0.0
+        if fake.memory_bytes is not None:
+            if payload.get("keep_alive") in (0, "0", "0s", "0m"):
+                fake.unload(model)
+                self._send_json(200, self._empty_reply(model, chat, "unload"))
+                return
+            load_seconds = fake.ensure_loaded(model)
+            if not prompt:
+                reply = self._empty_reply(model, chat, "load")
+                reply["load_duration"] = int(load_seconds * 1e9)
+                self._send_json(200, reply)
+                return
+        prompt_tokens = max(1, len(prompt) // 4)
+        output_tokens = int(options.get("num_predict", DEFAULT_NUM_PREDICT))
+        if output_tokens < 0:
+            output_tokens = DEFAULT_NUM_PREDICT
+
+        text = " ".join(["token"] * output_tokens)
+        if fake.cpu_cores and fake.memory_bytes is not None:
+            required = fake.required_bytes(model, options)
+            if required > fake.memory_bytes:
+                self._send_json(500, {"error": f"model requires more system memory ({required / 1024 ** 3:.1f} GiB) "
+                                               f"than is available ({fake.memory_bytes / 1024 ** 3:.1f} GiB)"})
+                return
+
+        queued = time.perf_counter()
+        slot, cached_tokens = None, 0
+        if fake.prefix_cache:
+            load_seconds += fake.apply_load_options(model, options)
+            slot, cached_tokens = fake.acquire_slot(model, prompt)
+        else:
+            fake.slots.acquire()
+        with fake.lock:
+            fake.active += 1
+            active = fake.active
+        try:
+            prompt_tokens = max(1, prompt_tokens - cached_tokens)
+            prefill_rate, decode_rate = fake.rates(options, active)
+            prefill = prompt_tokens / prefill_rate
+            decode = output_tokens / decode_rate
+            time.sleep((prefill + decode) * fake.time_scale)
+            finished = time.perf_counter()
+        finally:
+            with fake.lock:
+                fake.active -= 1
+            if slot is None:
+                fake.slots.release()
+            else:
+                # The conversation continues with the reply
+                fake.release_slot(model, slot, prompt + "\n" + text)
+        with fake.lock:
+            fake.generate_requests += 1
+            fake.prompt_tokens += prompt_tokens
+            fake.output_tokens += output_tokens
+            if cached_tokens:
+                fake.prefix_hits += 1
+                fake.cached_tokens += cached_tokens
+        result: Dict[str, Any] = {
+            "model": payload.get("model", ""),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "done": True,
+            "done_reason": "length" if "num_predict" in options else "stop",
+            "total_duration": int((finished - queued + load_seconds) * 1e9),
+            "load_duration": int(load_seconds * 1e9),
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(prefill * fake.time_scale * 1e9),
+            "eval_count": output_tokens,
+            "eval_duration": int(decode * fake.time_scale * 1e9),
+        }
+        if chat:
+            result["message"] = {"role": "assistant", "content": text}
+        else:
+            result["response"] = text
+        if payload.get("stream", True) is False:
+            self._send_json(200, result)
+            return
+        # Streaming: one content chunk, then the final stats object
+        chunk = dict(result, done=False)
+        for key in ("done_reason", "total_duration", "load_duration", "prompt_eval_count",
+                    "prompt_eval_duration", "eval_count", "eval_duration"):
+            chunk.pop(key)
+        final = dict(result, message={"role": "assistant", "content": ""}) if chat else dict(result, response="")
+        body = (json.dumps(chunk) + "\n" + json.dumps(final) + "\n").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def _empty_reply(model: str, chat: bool, reason: str) -> Dict[str, Any]:
+        reply: Dict[str, Any] = {"model": model, "done": True, "done_reason": reason,
+                                 "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+        if chat:
+            reply["message"] = {"role": "assistant", "content": ""}
+        else:
+            reply["response"] = ""
+        return reply
+
+
+class _FakeOllamaHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    fake: "FakeOllama"
+
+
+class FakeOllama:
+    """
+    Loopback HTTP server speaking a subset of the Ollama API.
+
+    Request counters are exposed so tests can assert how much work reached
+    the "model".
+    """
+
+    def __init__(self, embedding_dim: int = DEFAULT_EMBEDDING_DIM,
+                 models: Optional[List[str]] = None, parallel: int = 1,
+                 prefill_tokens_per_second: float = DEFAULT_PREFILL_TOKENS_PER_SECOND,
+                 decode_tokens_per_second: float = DEFAULT_DECODE_TOKENS_PER_SECOND,
+                 time_scale: float = 1.0, memory_bytes: Optional[int] = None,
+                 model_sizes: Optional[Dict[str, int]] = None,
+                 load_bytes_per_second: float = DEFAULT_LOAD_BYTES_PER_SECOND,
+                 prefix_cache: bool = False, cpu_cores: Optional[int] = None) -> None:
+        """
+        Args:
+            embedding_dim: Dimension of vectors returned by /api/embed
+            models: Model names reported by /api/tags
+            parallel: Generation requests served at once; the rest queue
+            prefill_tokens_per_second: Simulated prompt processing speed
+            decode_tokens_per_second: Simulated output speed
+            time_scale: Multiplier on simulated latency (0.01 = 100x faster)
+            memory_bytes: Memory available to models; enables residency simulation
+            model_sizes: Resident size per model (default: catalog RAM figures)
+            load_bytes_per_second: Simulated model load speed
+            prefix_cache: Simulate per-slot prompt caches and reloads on changed load options
+            cpu_cores: Simulate a CPU host with this many cores (options affect speed)
+        """
+        self.embedding_dim = embedding_dim
+        self.models = list(models or [PRIMARY_MODEL, SECONDARY_MODEL])
+        # /api/tags digests by model name; set one to simulate a re-pulled model
+        self.digests: Dict[str, str] = {}
+        # /api/ps entries, e.g. {"name": ..., "size": ..., "size_vram": 0, "expires_at": ...}
+        self.loaded: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+        self.embed_requests = 0
+        self.embedded_inputs = 0
+        self.parallel = parallel
+        self.slots = threading.Semaphore(parallel)
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        self.decode_tokens_per_second = decode_tokens_per_second
+        self.time_scale = time_scale
+        self.cpu_cores = cpu_cores
+        # Generation requests running right now
+        self.active = 0
+        self.generate_requests = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.memory_bytes = memory_bytes
+        self.model_sizes = dict(model_sizes or {})
+        self.load_bytes_per_second = load_bytes_per_second
+        # Residency simulation: loads are serialized like in the real server
+        self.load_lock = threading.Lock()
+        self.loads = 0
+        self.unloads = 0
+        self.evictions = 0
+        self._last_used: Dict[str, float] = {}
+        # Prefix cache simulation: per model, the slots' cached text and state
+        self.prefix_cache = prefix_cache
+        self.prefix_hits = 0
+        self.cached_tokens = 0
+        self.option_reloads = 0
+        self._slots: Dict[str, List[Dict[str, Any]]] = {}
+        self._load_options: Dict[str, Tuple[Any, ...]] = {}
+        self._slot_condition = threading.Condition()
+        self._server: Optional[_FakeOllamaHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def model_size(self, model: str) -> int:
+        size = self.model_sizes.get(model)
+        if size is None:
+            size = int((get_profile(model).ram_gb or 1.0) * 1024 ** 3)
+        return size
+
+    def model_digest(self, model: str) -> str:
+        return self.digests.get(model) or hashlib.sha256(model.encode("utf-8")).hexdigest()
+
+    def resident_bytes(self) -> int:
+        """Total size of the loaded models."""
+        with self.lock:
+            return sum(int(entry.get("size", 0)) for entry in self.loaded)
+
+    def ensure_loaded(self, model: str) -> float:
+        """
+        Load a model unless resident, evicting least recently used models.
+
+        Returns:
+            Simulated load time in seconds (0.0 when already resident)
+        """
+        with self.load_lock:
+            with self.lock:
+                self._last_used[model] = time.monotonic()
+                if any(entry["name"] == model for entry in self.loaded):
+                    return 0.0
+            size = self.model_size(model)
+            while self.loaded and self.resident_bytes() + size > (self.memory_bytes or 0):
+                with self.lock:
+                    victim = min(self.loaded, key=lambda e: self._last_used.get(e["name"], 0.0))["name"]
+                    self.evictions += 1
+                self.unload(victim)
+            seconds = size / self.load_bytes_per_second
+            time.sleep(seconds * self.time_scale)
+            with self.lock:
+                self.loaded.append({"name": model, "model": model, "size": size, "size_vram": 0,
+                                    "expires_at": "2318-09-20T00:00:00Z"})
+                self.loads += 1
+            return seconds * self.time_scale
+
+    def unload(self, model: str) -> bool:
+        """Drop a model from memory; returns whether it was loaded."""
+        with self.lock:
+            before = len(self.loaded)
+            self.loaded[:] = [entry for entry in self.loaded if entry["name"] != model]
+            if len(self.loaded) == before:
+                return False
+            self.unloads += 1
+            return True
+
+    def rates(self, options: Dict[str, Any], active: int = 1) -> Tuple[float, float]:
+        """
+        Prefill and decode speed of one request (tokens per second).
+
+        Without ``cpu_cores`` these are the configured rates; with it they
+        follow the host model described in the module docstring.
+
+        Args:
+            options: Request options
+            active: Requests generating at once, this one included
+        """
+        if not self.cpu_cores:
+            return self.prefill_tokens_per_second, self.decode_tokens_per_second
+        threads = int(options.get("num_thread") or self.cpu_cores)
+        # Threads beyond the cores only add context switches
+        share = min(threads, self.cpu_cores) * min(1.0, self.cpu_cores / threads) / self.cpu_cores
+        batch = int(options.get("num_batch") or DEFAULT_NUM_BATCH)
+        context = 1.0 / (1.0 + int(options.get("num_ctx") or DEFAULT_NUM_CTX) / 32768)
+        prefill = (self.prefill_tokens_per_second * share ** 0.9 * context
+                   * (batch / (batch + 128)) / (DEFAULT_NUM_BATCH / (DEFAULT_NUM_BATCH + 128)))
+        # Decoding is memory bound, and batched across the running requests
+        decode = self.decode_tokens_per_second * share ** 0.4 * context * active ** 0.7
+        return prefill / active, decode / active
+
+    def required_bytes(self, model: str, options: Dict[str, Any]) -> int:
+        """Memory a model needs with these options: weights, KV cache of every slot, batch buffers."""
+        num_ctx = int(options.get("num_ctx") or DEFAULT_NUM_CTX)
+        num_batch = int(options.get("num_batch") or DEFAULT_NUM_BATCH)
+        return self.model_size(model) + num_ctx * self.parallel * KV_BYTES_PER_TOKEN + num_batch * BATCH_BYTES_PER_TOKEN
+
+    def apply_load_options(self, model: str, options: Dict[str, Any]) -> float:
+        """
+        Reload a model whose load options changed, emptying its slots.
+
+        Returns:
+            Simulated reload time in seconds (0.0 when the options match)
+        """
+        wanted = tuple(options.get(name) for name in LOAD_OPTIONS)
+        with self._slot_condition:
+            previous = self._load_options.setdefault(model, wanted)
+            if previous == wanted:
+                return 0.0
+            self._load_options[model] = wanted
+            for slot in self._slots.get(model, []):
+                slot["text"] = ""
+        with self.lock:
+            self.option_reloads += 1
+        seconds = self.model_size(model) / self.load_bytes_per_second * self.time_scale
+        time.sleep(seconds)
+        return seconds
+
+    def acquire_slot(self, model: str, prompt: str) -> Tuple[int, int]:
+        """
+        Wait for a free slot of a model and take the best one for ``prompt``.
+
+        Returns:
+            Slot index and the number of prompt tokens found in its cache
+        """
+        with self._slot_condition:
+            slots = self._slots.setdefault(
+                model, [{"text": "", "busy": False, "used": 0.0} for _ in range(self.parallel)])
+            while all(slot["busy"] for slot in slots):
+                self._slot_condition.wait()
+            free = [index for index, slot in enumerate(slots) if not slot["busy"]]
+            shared = {index: len(os.path.commonprefix([slots[index]["text"], prompt])) for index in free}
+            best = max(free, key=lambda index: shared[index])
+            if not shared[best]:
+                best = min(free, key=lambda index: slots[index]["used"])
+            slots[best]["busy"] = True
+            return best, shared[best] // 4
+
+    def release_slot(self, model: str, index: int, text: str) -> None:
+        """Free a slot, keeping the cache of ``text``."""
+        with self._slot_condition:
+            slot = self._slots[model][index]
+            slot.update(text=text, busy=False, used=time.monotonic())
+            self._slot_condition.notify_all()
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("FakeOllama is not running")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllama":
+        self._server = _FakeOllamaHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.fake = self
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05},
+                                        name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeOllama":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
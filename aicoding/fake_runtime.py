@@ -0,0 +1,192 @@
+"""
+In-process fake container runtime for offline tests of the update orchestrator.
+
+Implements ``aicoding.updater.ContainerRuntime`` without Docker: images are
+registered from docker-archive tarballs (or directly with ``add_image``)
+and every running container is a loopback HTTP server on its published
+host port. How a container behaves comes from labels in its image config:
+- ``fake.version``: returned in response bodies, so tests can tell which
+  container answered
+- ``fake.startup_seconds``: ``GET /`` returns 503 until this has passed
+- ``fake.healthy``: "false" makes ``GET /`` always return 503
+- ``fake.healthy_for``: ``GET /`` fails after this many successful answers
+
+``GET /slow?seconds=N`` answers after N seconds, to keep a connection open
+while the orchestrator drains.
+
+Usage:
+    runtime = FakeRuntime()
+    runtime.add_image("openhands:latest", {"fake.version": "1"})
+    runtime.run(ContainerSpec("openhands", "openhands:latest", ports={3000: ("127.0.0.1", 3001)}))
+"""
+
+import hashlib
+import json
+import tarfile
+import threading
+import time
+from dataclasses import dataclass, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from aicoding.updater import ContainerInfo, ContainerRuntime, ContainerSpec, UpdateError
+
+
+@dataclass
+class FakeImage:
+    image_id: str
+    labels: Dict[str, str]
+
+
+class _ContainerHandler(BaseHTTPRequestHandler):
+    server: "_ContainerServer"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        pass
+
+    def _send(self, status: int, text: str) -> None:
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:  # noqa: N802
+        container = self.server.container
+        url = urlparse(self.path)
+        if url.path == "/slow":
+            time.sleep(float(parse_qs(url.query).get("seconds", ["1"])[0]))
+            self._send(200, f"version={container.version}")
+            return
+        if container.healthy():
+            self._send(200, f"version={container.version}")
+        else:
+            self._send(503, "starting")
+
+
+class _ContainerServer(ThreadingHTTPServer):
+    daemon_threads = True
+    container: "FakeContainer"
+
+
+class FakeContainer:
+    """A running fake container: an HTTP server shaped by its image labels."""
+
+    def __init__(self, spec: ContainerSpec, image: FakeImage) -> None:
+        self.spec = spec
+        self.image = image
+        self.version = image.labels.get("fake.version", "")
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server: Optional[_ContainerServer] = None
+        self._started = 0.0
+
+    def healthy(self) -> bool:
+        labels = self.image.labels
+        if labels.get("fake.healthy") == "false":
+            return False
+        if time.monotonic() - self._started < float(labels.get("fake.startup_seconds", "0")):
+            return False
+        with self._lock:
+            self.requests += 1
+            return self.requests <= int(labels.get("fake.healthy_for", "1000000000"))
+
+    @property
+    def running(self) -> bool:
+        return self._server is not None
+
+    def start(self) -> None:
+        _, port = next(iter(self.spec.ports.values()))
+        self._server = _ContainerServer(("127.0.0.1", port), _ContainerHandler)
+        self._server.container = self
+        self._started = time.monotonic()
+        self.requests = 0
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05},
+                         daemon=True).start()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class FakeRuntime(ContainerRuntime):
+    """``ContainerRuntime`` whose containers are loopback HTTP servers."""
+
+    def __init__(self) -> None:
+        self.images: Dict[str, FakeImage] = {}
+        self.tags: Dict[str, str] = {}
+        self.containers: Dict[str, FakeContainer] = {}
+        self.loaded: List[str] = []
+        self._lock = threading.Lock()
+
+    def _register(self, ref: str, config: bytes) -> str:
+        image_id = f"sha256:{hashlib.sha256(config).hexdigest()}"
+        labels = json.loads(config).get("config", {}).get("Labels") or {}
+        with self._lock:
+            self.images[image_id] = FakeImage(image_id, dict(labels))
+            self.tags[ref] = image_id
+        return image_id
+
+    def add_image(self, ref: str, labels: Dict[str, str]) -> str:
+        """Register ``ref`` as an image with ``labels``; returns its id."""
+        return self._register(ref, json.dumps({"config": {"Labels": labels}}, sort_keys=True).encode())
+
+    def image_id(self, ref: str) -> Optional[str]:
+        return self.tags.get(ref)
+
+    def load(self, archive: Path) -> None:
+        with tarfile.open(archive) as tar:
+            members = set(tar.getnames())
+            for entry in json.load(tar.extractfile("manifest.json")):
+                missing = [name for name in entry["Layers"] if name not in members]
+                if missing:
+                    raise UpdateError(f"archive lacks layers {missing}")
+                config = tar.extractfile(entry["Config"]).read()
+                for ref in entry["RepoTags"]:
+                    self.loaded.append(self._register(ref, config))
+
+    def find(self, service: str) -> Optional[str]:
+        for name in self.containers:
+            if name == service or name.startswith(f"{service}-"):
+                return name
+        return None
+
+    def inspect(self, name: str) -> Optional[ContainerInfo]:
+        container = self.containers.get(name)
+        if container is None:
+            return None
+        return ContainerInfo(replace(container.spec), container.image.image_id, container.running)
+
+    def run(self, spec: ContainerSpec) -> None:
+        image_id = self.tags.get(spec.image, spec.image)
+        if image_id not in self.images:
+            raise UpdateError(f"no such image: {spec.image}")
+        if spec.name in self.containers:
+            raise UpdateError(f"container {spec.name} already exists")
+        container = FakeContainer(spec, self.images[image_id])
+        container.start()
+        self.containers[spec.name] = container
+
+    def start(self, name: str) -> None:
+        if not self.containers[name].running:
+            self.containers[name].start()
+
+    def stop(self, name: str, timeout: int = 0) -> None:
+        self.containers[name].stop()
+
+    def remove(self, name: str) -> None:
+        self.containers.pop(name).stop()
+
+    def rename(self, name: str, new_name: str) -> None:
+        container = self.containers.pop(name)
+        container.spec = replace(container.spec, name=new_name)
+        self.containers[new_name] = container
+
+    def close(self) -> None:
+        for container in self.containers.values():
+            container.stop()
@@ -0,0 +1,1096 @@
+"""
+Workspace file service for the agent's file operations.
+
+Replaces the Node.js ``@modelcontextprotocol/server-filesystem`` (one JSON
+round trip per file) with batched operations over a workspace root:
+- ``list``: ``os.scandir`` walk with an explicit stack, skipping
+  ``DEFAULT_IGNORED_DIRS`` and the patterns of the root ``.gitignore``
+- ``read_many``: many files per call, read in parallel threads
+- ``read_lines``: a line range of a large file through ``mmap``, skipping
+  to the start line by counting newlines chunk-wise in C; chunk
+  checkpoints are cached per file, so paging through a log or a generated
+  file does not rescan it
+- ``search``: regex search across the tree in a process pool, one result
+  per matching line (``re.MULTILINE``, so ``^``/``$`` anchor to lines);
+  small trees are searched in-process to skip the pool round trip
+- ``create``/``write``: same invariants as tests/test_file_operations.py
+  (parent directories created, mode bits of modified files preserved),
+  written atomically through a temporary file
+- ``apply_patch``/``replace_lines``: edits as unified diffs or line-range
+  replacements; the lines an edit expects are compared at their position
+  only, unchanged byte ranges of large files are copied in the kernel
+  (``copy_file_range``), and a stale edit fails with an ``EditConflict``
+  naming the first differing line of each hunk, leaving every file as it was
+- ``before_write`` (``--snapshots``): snapshot the project before the first
+  write of each batch of agent actions (see aicoding.snapshots)
+
+Paths are relative to the root; anything resolving outside it (``..``,
+symlinks) is rejected. ``mcp`` serves the operations as tools of a stdio
+MCP server, so it can be run by the MCP supervisor in place of the Node.js
+server.
+
+Usage:
+    python -m aicoding.file_service list src --max-depth 2
+    python -m aicoding.file_service search "def \\w+_handler" --glob "*.py"
+    python -m aicoding.file_service read-lines logs/build.log 120000 120200
+    git diff | python -m aicoding.file_service patch
+    python -m aicoding.file_service --root /opt/workspace --snapshots mcp
+"""
+
+import argparse
+import bisect
+import fnmatch
+import functools
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from aicoding.profiling import setup_from_environment, timed
+from aicoding.settings import WORKSPACE_DIR
+from aicoding.snapshots import SnapshotStore
+from aicoding.tracing import extract, span
+from aicoding.workspace import DEFAULT_IGNORED_DIRS
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+DEFAULT_MAX_READ_BYTES = 1024 * 1024
+READ_BATCH_FILES = 16
+# Files at least this large are read through mmap
+MMAP_THRESHOLD_BYTES = 1024 * 1024
+# Newlines are counted per chunk; chunk boundaries are the cached checkpoints
+LINE_CHUNK_BYTES = 64 * 1024
+CHECKPOINT_CACHE_FILES = 64
+
+DEFAULT_MAX_RESULTS = 1000
+# Trees smaller than this are searched in-process
+SEARCH_INLINE_BYTES = 4 * 1024 * 1024
+SEARCH_BATCH_BYTES = 4 * 1024 * 1024
+SEARCH_BATCH_FILES = 256
+# Files whose first bytes contain NUL are treated as binary and not searched
+BINARY_SNIFF_BYTES = 8192
+MAX_LINE_CHARS = 500
+
+PROTOCOL_VERSION = "2024-11-05"
+
+
+class FileServiceError(Exception):
+    """Invalid request: a path outside the root, a bad range, a bad pattern."""
+
+
+class EditConflict(FileServiceError):
+    """Edits whose expected lines are not what the files contain."""
+
+    def __init__(self, conflicts: List["Conflict"]) -> None:
+        self.conflicts = conflicts
+        super().__init__("; ".join(str(conflict) for conflict in conflicts))
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+@dataclass
+class FileInfo:
+    path: str
+    size: int
+    mtime: float
+    is_dir: bool
+
+
+@dataclass
+class ReadResult:
+    path: str
+    content: Optional[str] = None
+    error: Optional[str] = None
+    truncated: bool = False
+
+
+@dataclass
+class LineRange:
+    """Lines ``start`` to ``start + count - 1`` (1-based) of a file."""
+
+    path: str
+    start: int
+    count: int
+    text: str
+    eof: bool
+
+
+@dataclass
+class SearchMatch:
+    path: str
+    line: int
+    text: str
+
+
+@dataclass
+class Hunk:
+    """
+    Replace ``old_count`` lines from line ``start`` (1-based) with ``new``.
+
+    ``old`` is the text those lines must have; None applies the hunk
+    without checking. With ``old_count`` 0, ``new`` is inserted before
+    line ``start``.
+    """
+
+    start: int
+    old_count: int
+    new: bytes
+    old: Optional[bytes] = None
+
+
+@dataclass
+class Conflict:
+    """The first line where a hunk's expected text differs from the file."""
+
+    path: str
+    hunk: int
+    line: int
+    # None: any line (no text given) / the end of the file
+    expected: Optional[str]
+    actual: Optional[str]
+
+    def __str__(self) -> str:
+        expected = "a line" if self.expected is None else repr(self.expected)
+        actual = "end of file" if self.actual is None else repr(self.actual)
+        return f"{self.path}:{self.line}: hunk {self.hunk} expected {expected}, found {actual}"
+
+
+@dataclass
+class EditResult:
+    """An applied edit; ``copied`` bytes stayed in the kernel, ``written`` went through Python."""
+
+    path: str
+    hunks: int
+    added: int
+    removed: int
+    copied: int = 0
+    written: int = 0
+
+
+# ============================================================================
+# Ignore Rules
+# ============================================================================
+
+class IgnoreRules:
+    """
+    Directory names plus ``.gitignore`` glob patterns.
+
+    Patterns without a slash match names at any depth, patterns with one
+    match the path from the root, a trailing slash matches directories
+    only. Negations (``!pattern``) are not supported and are skipped.
+    """
+
+    def __init__(self, names: Iterable[str] = DEFAULT_IGNORED_DIRS, patterns: Iterable[str] = ()) -> None:
+        self.names = frozenset(names)
+        groups: Dict[Tuple[bool, bool], List[str]] = {}
+        for raw in patterns:
+            pattern = raw.strip()
+            if not pattern or pattern.startswith(("#", "!")):
+                continue
+            dir_only = pattern.endswith("/")
+            pattern = pattern.rstrip("/")
+            anchored = "/" in pattern
+            groups.setdefault((dir_only, anchored), []).append(fnmatch.translate(pattern.lstrip("/")))
+        self._regexes = {key: re.compile("|".join(parts)) for key, parts in groups.items()}
+
+    @classmethod
+    def for_root(cls, root: Path, names: Iterable[str] = DEFAULT_IGNORED_DIRS) -> "IgnoreRules":
+        try:
+            patterns = (root / ".gitignore").read_text(encoding="utf-8", errors="replace").splitlines()
+        except OSError:
+            patterns = []
+        return cls(names, patterns)
+
+    def ignored(self, rel_path: str, name: str, is_dir: bool) -> bool:
+        if is_dir and name in self.names:
+            return True
+        for (dir_only, anchored), regex in self._regexes.items():
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel_path if anchored else name):
+                return True
+        return False
+
+
+def _glob_matches(glob: Optional[str], rel_path: str) -> bool:
+    if not glob:
+        return True
+    if "/" in glob:
+        return fnmatch.fnmatchcase(rel_path, glob)
+    return fnmatch.fnmatchcase(rel_path.rsplit("/", 1)[-1], glob)
+
+
+# ============================================================================
+# Line Ranges
+# ============================================================================
+
+def _advance(buffer: Any, size: int, offset: int, line: int, target: int,
+             checkpoints: Optional[List[Tuple[int, int]]] = None) -> int:
+    """
+    Byte offset where line ``target`` starts, scanning from ``offset`` (in
+    line ``line``); ``size`` when the file has fewer lines. Chunk boundaries
+    passed on the way are added to ``checkpoints``.
+    """
+    while line < target:
+        chunk = buffer[offset:offset + LINE_CHUNK_BYTES]
+        if not chunk:
+            return size
+        newlines = chunk.count(b"\n")
+        if line + newlines < target:
+            offset += len(chunk)
+            line += newlines
+            if checkpoints is not None and len(chunk) == LINE_CHUNK_BYTES \
+                    and (not checkpoints or checkpoints[-1][0] < offset):
+                checkpoints.append((offset, line))
+            continue
+        position = 0
+        for _ in range(target - line):
+            position = chunk.find(b"\n", position) + 1
+        return offset + position
+    return offset
+
+
+def _seek_line(buffer: Any, size: int, target: int, checkpoints: Optional[List[Tuple[int, int]]] = None,
+               offset: int = 0, line: int = 1) -> int:
+    """Byte offset where line ``target`` starts, from the closest known position before it."""
+    if checkpoints:
+        # A checkpoint may fall inside its line, so only earlier lines qualify
+        index = bisect.bisect_left(checkpoints, target, key=lambda checkpoint: checkpoint[1]) - 1
+        if index >= 0 and checkpoints[index][1] > line:
+            offset, line = checkpoints[index]
+    return _advance(buffer, size, offset, line, target, checkpoints)
+
+
+def _split_lines(data: bytes) -> List[bytes]:
+    return re.findall(rb"[^\n]*\n|[^\n]+$", data)
+
+
+def _count_lines(data: bytes) -> int:
+    return data.count(b"\n") + (1 if data and not data.endswith(b"\n") else 0)
+
+
+def slice_lines(buffer: Any, size: int, start: int, end: Optional[int],
+                checkpoints: Optional[List[Tuple[int, int]]] = None) -> Tuple[bytes, bool]:
+    """
+    Bytes of lines ``start``..``end`` (1-based, inclusive; ``end`` None for
+    the rest) of ``buffer`` (bytes or mmap), and whether they reach the end.
+
+    Lines end with ``\\n``. ``checkpoints`` are (offset, line) pairs at chunk
+    boundaries from earlier calls on the same content; new ones are added.
+    """
+    begin = _seek_line(buffer, size, start, checkpoints)
+    if end is None:
+        return buffer[begin:size], True
+    finish = _advance(buffer, size, begin, start, end + 1)
+    return buffer[begin:finish], finish >= size
+
+
+# ============================================================================
+# Unified Diffs
+# ============================================================================
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def _diff_path(header: str) -> Optional[str]:
+    name = header[4:].rstrip("\n").split("\t")[0].strip()
+    if name == "/dev/null":
+        return None
+    return name[2:] if name.startswith(("a/", "b/")) else name
+
+
+def parse_unified_diff(diff: str) -> List[Tuple[Optional[str], Optional[str], List[Hunk]]]:
+    """
+    Files of a unified diff as (old path, new path, hunks).
+
+    Paths lose git's ``a/``/``b/`` prefixes and are None for ``/dev/null``.
+    Lines outside the file headers and hunks (``diff --git``, ``index``,
+    prose) are skipped.
+
+    Raises:
+        FileServiceError: A hunk whose line counts do not match its header
+    """
+    lines = [line + "\n" for line in diff.split("\n")]
+    if diff.endswith("\n"):
+        lines.pop()
+    files: List[Tuple[Optional[str], Optional[str], List[Hunk]]] = []
+    index = 0
+    while index < len(lines):
+        header = lines[index]
+        if header.startswith("--- ") and index + 1 < len(lines) and lines[index + 1].startswith("+++ "):
+            files.append((_diff_path(header), _diff_path(lines[index + 1]), []))
+            index += 2
+            continue
+        match = _HUNK_HEADER.match(header)
+        index += 1
+        if not match:
+            continue
+        if not files:
+            raise FileServiceError(f"hunk without file header: {header.strip()}")
+        old_start = int(match.group(1))
+        old_count = int(match.group(2) or 1)
+        new_count = int(match.group(4) or 1)
+        old: List[str] = []
+        new: List[str] = []
+        last: Tuple[List[str], ...] = ()
+        while index < len(lines):
+            text = lines[index]
+            if text.startswith("\\"):
+                # "\ No newline at end of file": the line before has no newline
+                for side in last:
+                    side[-1] = side[-1][:-1]
+                index += 1
+                continue
+            if len(old) == old_count and len(new) == new_count:
+                break
+            tag, body = (" ", "\n") if text == "\n" else (text[:1], text[1:])
+            if tag == " ":
+                old.append(body)
+                new.append(body)
+                last = (old, new)
+            elif tag == "-":
+                old.append(body)
+                last = (old,)
+            elif tag == "+":
+                new.append(body)
+                last = (new,)
+            else:
+                break
+            index += 1
+        if len(old) != old_count or len(new) != new_count:
+            raise FileServiceError(f"malformed hunk {header.strip()}: "
+                                   f"{len(old)} old and {len(new)} new lines")
+        # A hunk without old lines names the line it follows
+        start = old_start if old_count else old_start + 1
+        files[-1][2].append(Hunk(start, old_count, "".join(new).encode("utf-8"), "".join(old).encode("utf-8")))
+    return files
+
+
+def _first_difference(path: str, number: int, start: int, expected: bytes, actual: bytes) -> Conflict:
+    expected_lines = _split_lines(expected)
+    actual_lines = _split_lines(actual)
+    index = 0
+    while index < len(expected_lines) and index < len(actual_lines) \
+            and expected_lines[index] == actual_lines[index]:
+        index += 1
+
+    def text(lines: List[bytes]) -> Optional[str]:
+        return lines[index].decode("utf-8", "replace") if index < len(lines) else None
+
+    return Conflict(path, number, start + index, text(expected_lines), text(actual_lines))
+
+
+def _changed_lines(hunk: Hunk) -> Tuple[int, int]:
+    """(added, removed) lines of a hunk, not counting its unchanged context."""
+    new = _split_lines(hunk.new)
+    if hunk.old is None:
+        return len(new), hunk.old_count
+    old = _split_lines(hunk.old)
+    same = 0
+    while same < min(len(old), len(new)) and old[same] == new[same]:
+        same += 1
+    trailing = 0
+    while trailing < min(len(old), len(new)) - same and old[-1 - trailing] == new[-1 - trailing]:
+        trailing += 1
+    return len(new) - same - trailing, len(old) - same - trailing
+
+
+def _write_all(descriptor: int, data: Any) -> int:
+    view = memoryview(data)
+    while view:
+        view = view[os.write(descriptor, view):]
+    return len(data)
+
+
+def _copy_range(source: int, buffer: Any, destination: int, offset: int, length: int) -> int:
+    """Append ``length`` bytes at ``offset`` of ``source``; returns the bytes copied in the kernel."""
+    end = offset + length
+    while offset < end:
+        try:
+            copied = os.copy_file_range(source, destination, end - offset, offset)
+        except (AttributeError, OSError):
+            # Not available here (other platforms, filesystems or kernels)
+            break
+        if not copied:
+            break
+        offset += copied
+    kernel = length - (end - offset)
+    if offset < end:
+        _write_all(destination, buffer[offset:end])
+    return kernel
+
+
+def _keep_metadata(descriptor: int, like: os.stat_result) -> None:
+    """Give a replacement file the mode and (when allowed) the owner of the one it replaces."""
+    os.fchmod(descriptor, like.st_mode & 0o7777)
+    current = os.fstat(descriptor)
+    if (current.st_uid, current.st_gid) != (like.st_uid, like.st_gid):
+        try:
+            os.fchown(descriptor, like.st_uid, like.st_gid)
+        except PermissionError:
+            logger.debug("Cannot keep owner %s:%s", like.st_uid, like.st_gid)
+
+
+# ============================================================================
+# Search Workers
+# ============================================================================
+
+@functools.lru_cache(maxsize=32)
+def _compile(pattern: str, ignore_case: bool) -> "re.Pattern[bytes]":
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    return re.compile(pattern.encode("utf-8"), flags)
+
+
+def search_files(root: str, paths: List[str], pattern: str, ignore_case: bool = False,
+                 max_results: int = DEFAULT_MAX_RESULTS) -> List[Tuple[str, int, str]]:
+    """
+    Matching lines of ``paths`` (relative to ``root``), one per line.
+
+    Runs in the search pool's worker processes; also called in-process for
+    small trees.
+
+    Returns:
+        (path, 1-based line number, line text) tuples
+    """
+    regex = _compile(pattern, ignore_case)
+    results: List[Tuple[str, int, str]] = []
+    for rel_path in paths:
+        try:
+            with open(os.path.join(root, rel_path), "rb") as handle:
+                data = handle.read()
+        except OSError:
+            continue
+        if b"\0" in data[:BINARY_SNIFF_BYTES]:
+            continue
+        match = regex.search(data)
+        line, counted = 1, 0
+        while match is not None:
+            line += data.count(b"\n", counted, match.start())
+            line_start = data.rfind(b"\n", 0, match.start()) + 1
+            line_end = data.find(b"\n", match.start())
+            if line_end < 0:
+                line_end = len(data)
+            text = data[line_start:line_end].decode("utf-8", "replace").rstrip("\r")
+            results.append((rel_path, line, text[:MAX_LINE_CHARS]))
+            if len(results) >= max_results or line_end >= len(data):
+                return results
+            counted = line_end
+            match = regex.search(data, line_end + 1)
+    return results
+
+
+# ============================================================================
+# File Service
+# ============================================================================
+
+class FileService:
+    """File operations confined to one workspace root."""
+
+    def __init__(self, root: Path = WORKSPACE_DIR, ignored_dirs: Iterable[str] = DEFAULT_IGNORED_DIRS,
+                 io_workers: int = 16, search_workers: Optional[int] = None,
+                 mmap_threshold: int = MMAP_THRESHOLD_BYTES, search_inline_bytes: int = SEARCH_INLINE_BYTES,
+                 before_write: Optional[Callable[[Path], Any]] = None) -> None:
+        """
+        Args:
+            root: Workspace root; every path is relative to it
+            ignored_dirs: Directory names never listed or searched
+            io_workers: Threads used by ``read_many``
+            search_workers: Processes used by ``search`` (default: CPU count)
+            mmap_threshold: Files at least this large are read through mmap
+            search_inline_bytes: Trees smaller than this are searched in-process
+            before_write: Called with each file's path right before it is
+                replaced or created (e.g. ``SnapshotStore.before_write``)
+        """
+        self.root = Path(root).resolve()
+        self._root_prefix = os.path.join(str(self.root), "")
+        self.io_workers = io_workers
+        self.rules = IgnoreRules.for_root(self.root, ignored_dirs)
+        self.mmap_threshold = mmap_threshold
+        self.search_inline_bytes = search_inline_bytes
+        self.before_write = before_write
+        self.search_workers = search_workers or os.cpu_count() or 1
+        self._io = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="file-read")
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        self._checkpoints: "OrderedDict[Tuple[str, int, int], List[Tuple[int, int]]]" = OrderedDict()
+        self._checkpoint_lock = threading.Lock()
+
+    def close(self) -> None:
+        self._io.shutdown(wait=False)
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def __enter__(self) -> "FileService":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def resolve(self, path: str) -> Path:
+        """Absolute path of ``path``; raises FileServiceError outside the root."""
+        candidate = (self.root / path).resolve()
+        if candidate != self.root and self.root not in candidate.parents:
+            raise FileServiceError(f"{path}: outside the workspace")
+        return candidate
+
+    def _open_read(self, path: str):
+        """Open ``path`` for reading, checking the opened file is inside the root.
+
+        Reads check where the open descriptor points (one readlink on Linux)
+        instead of resolving every path component up front.
+        """
+        if not os.path.isdir("/proc/self/fd"):
+            return open(self.resolve(path), "rb")
+        handle = open(os.path.join(self._root_prefix, path), "rb")
+        try:
+            target = os.readlink(f"/proc/self/fd/{handle.fileno()}")
+        except OSError:
+            target = os.path.realpath(handle.name)
+        if not target.startswith(self._root_prefix):
+            handle.close()
+            raise FileServiceError(f"{path}: outside the workspace")
+        return handle
+
+    def _relative(self, path: Path) -> str:
+        return path.relative_to(self.root).as_posix() if path != self.root else ""
+
+    # -- listing -------------------------------------------------------
+
+    def walk(self, path: str = "", max_depth: Optional[int] = None) -> Iterator[FileInfo]:
+        """Files and directories below ``path`` that the ignore rules let through (unordered)."""
+        start = self.resolve(path)
+        prefix = self._relative(start)
+        stack = [(os.fspath(start), prefix + "/" if prefix else "", 1)]
+        while stack:
+            directory, rel_prefix, depth = stack.pop()
+            try:
+                with os.scandir(directory) as iterator:
+                    entries = list(iterator)
+            except OSError:
+                continue
+            for entry in entries:
+                rel_path = rel_prefix + entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if self.rules.ignored(rel_path, entry.name, is_dir):
+                        continue
+                    if is_dir:
+                        yield FileInfo(rel_path, 0, entry.stat(follow_symlinks=False).st_mtime, True)
+                        if max_depth is None or depth < max_depth:
+                            stack.append((entry.path, rel_path + "/", depth + 1))
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        yield FileInfo(rel_path, st.st_size, st.st_mtime, False)
+                except OSError:
+                    continue
+
+    def list(self, path: str = "", max_depth: Optional[int] = None, glob: Optional[str] = None) -> List[FileInfo]:
+        """Sorted ``walk``; ``glob`` filters files (directories are kept)."""
+        entries = [info for info in self.walk(path, max_depth) if info.is_dir or _glob_matches(glob, info.path)]
+        entries.sort(key=lambda info: info.path)
+        return entries
+
+    # -- reading -------------------------------------------------------
+
+    def _read(self, path: str, max_bytes: int) -> ReadResult:
+        try:
+            with self._open_read(path) as handle:
+                data = handle.read(max_bytes + 1)
+        except (OSError, FileServiceError) as e:
+            return ReadResult(path, error=str(e))
+        return ReadResult(path, data[:max_bytes].decode("utf-8", "replace"), truncated=len(data) > max_bytes)
+
+    def read_many(self, paths: List[str], max_bytes: int = DEFAULT_MAX_READ_BYTES) -> List[ReadResult]:
+        """Read ``paths`` in parallel; failures are reported per file."""
+        # Each thread reads a run of files: small cached files cost less than a task each
+        size = max(READ_BATCH_FILES, -(-len(paths) // self.io_workers))
+        batches = [paths[index:index + size] for index in range(0, len(paths), size)]
+        if len(batches) == 1:
+            return [self._read(path, max_bytes) for path in paths]
+        results = self._io.map(lambda batch: [self._read(path, max_bytes) for path in batch], batches)
+        return [result for batch in results for result in batch]
+
+    def read_lines(self, path: str, start: int = 1, end: Optional[int] = None) -> LineRange:
+        """
+        Lines ``start``..``end`` (1-based, inclusive) of a file.
+
+        Raises:
+            FileServiceError: Invalid range or path
+        """
+        if start < 1 or (end is not None and end < start):
+            raise FileServiceError(f"invalid line range {start}-{end}")
+        file_path = self.resolve(path)
+        try:
+            with open(file_path, "rb") as handle:
+                st = os.fstat(handle.fileno())
+                if st.st_size < self.mmap_threshold:
+                    data, eof = slice_lines(handle.read(), st.st_size, start, end)
+                else:
+                    key = (os.fspath(file_path), st.st_size, st.st_mtime_ns)
+                    checkpoints = self._take_checkpoints(key)
+                    with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                        data, eof = slice_lines(buffer, st.st_size, start, end, checkpoints)
+                    self._keep_checkpoints(key, checkpoints)
+        except OSError as e:
+            raise FileServiceError(f"{path}: {e}") from e
+        return LineRange(path, start, _count_lines(data), data.decode("utf-8", "replace"), eof)
+
+    def _take_checkpoints(self, key: Tuple[str, int, int]) -> List[Tuple[int, int]]:
+        with self._checkpoint_lock:
+            return self._checkpoints.pop(key, [])
+
+    def _keep_checkpoints(self, key: Tuple[str, int, int], checkpoints: List[Tuple[int, int]]) -> None:
+        with self._checkpoint_lock:
+            self._checkpoints[key] = checkpoints
+            while len(self._checkpoints) > CHECKPOINT_CACHE_FILES:
+                self._checkpoints.popitem(last=False)
+
+    # -- writing -------------------------------------------------------
+
+    @timed
+    def _write_atomic(self, target: Path, content: str, like: Optional[os.stat_result]) -> None:
+        descriptor, temp_name = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.")
+        try:
+            with os.fdopen(descriptor, "w", encoding="utf-8", newline="") as handle:
+                handle.write(content)
+                if like is not None:
+                    handle.flush()
+                    _keep_metadata(handle.fileno(), like)
+                else:
+                    os.fchmod(handle.fileno(), 0o666 & ~_UMASK)
+            if self.before_write is not None:
+                self.before_write(target)
+            os.replace(temp_name, target)
+        except BaseException:
+            os.unlink(temp_name)
+            raise
+
+    def create(self, path: str, content: str) -> None:
+        """Create (or overwrite) a file, creating its parent directories."""
+        target = self.resolve(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        self._write_atomic(target, content, None)
+
+    def write(self, path: str, content: str) -> None:
+        """Replace the content of a file, keeping its mode bits and owner; creates it if missing."""
+        target = self.resolve(path)
+        try:
+            like = target.stat()
+        except FileNotFoundError:
+            self.create(path, content)
+            return
+        self._write_atomic(target, content, like)
+
+    # -- editing -------------------------------------------------------
+
+    def _prepare_edit(self, path: str, hunks: List[Hunk]
+                      ) -> Tuple[Path, Optional[str], os.stat_result, EditResult, List[Conflict]]:
+        """
+        Check ``hunks`` against the file and, when they all apply, write
+        the edited file next to it. Returns (target, temporary file or None
+        on conflicts, stat of the file edited, result, conflicts).
+        """
+        target = self.resolve(path)
+        try:
+            handle = open(target, "rb")
+        except OSError as e:
+            raise FileServiceError(f"{path}: {e}") from e
+        with handle:
+            st = os.fstat(handle.fileno())
+            size = st.st_size
+            large = size >= self.mmap_threshold and size > 0
+            buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) if large else handle.read()
+            key = (os.fspath(target), size, st.st_mtime_ns)
+            checkpoints = self._take_checkpoints(key) if large else None
+            try:
+                spans, conflicts = [], []
+                offset, line = 0, 1
+                ordered = sorted(enumerate(hunks, 1), key=lambda item: item[1].start)
+                for number, hunk in ordered:
+                    if hunk.start < line:
+                        raise FileServiceError(f"{path}: hunk {number} overlaps the hunk before it")
+                    begin = _seek_line(buffer, size, hunk.start, checkpoints, offset, line)
+                    finish = _advance(buffer, size, begin, hunk.start, hunk.start + hunk.old_count)
+                    actual = buffer[begin:finish]
+                    if hunk.old is not None and actual != hunk.old:
+                        conflicts.append(_first_difference(path, number, hunk.start, hunk.old, actual))
+                    elif _count_lines(actual) < hunk.old_count:
+                        conflicts.append(Conflict(path, number, hunk.start + _count_lines(actual), None, None))
+                    elif begin == size and hunk.start > 1 and (
+                            _seek_line(buffer, size, hunk.start - 1, checkpoints, offset, line) == size
+                            or not buffer[size - 1:size] == b"\n"):
+                        # Inserting past the end, or gluing onto a last line without newline
+                        conflicts.append(Conflict(path, number, hunk.start, None, None))
+                    spans.append((begin, finish, hunk))
+                    offset, line = finish, hunk.start + hunk.old_count
+                changes = [_changed_lines(hunk) for hunk in hunks]
+                result = EditResult(path, len(hunks), sum(added for added, _ in changes),
+                                    sum(removed for _, removed in changes))
+                if conflicts:
+                    return target, None, st, result, conflicts
+                descriptor, temp_name = tempfile.mkstemp(dir=target.parent, prefix=f".{target.name}.")
+                try:
+                    position = 0
+                    if large:
+                        for begin, finish, hunk in spans:
+                            result.copied += _copy_range(handle.fileno(), buffer, descriptor, position,
+                                                         begin - position)
+                            _write_all(descriptor, hunk.new)
+                            position = finish
+                        result.copied += _copy_range(handle.fileno(), buffer, descriptor, position,
+                                                     size - position)
+                    else:
+                        pieces = []
+                        for begin, finish, hunk in spans:
+                            pieces.extend((buffer[position:begin], hunk.new))
+                            position = finish
+                        pieces.append(buffer[position:])
+                        _write_all(descriptor, b"".join(pieces))
+                    result.written = os.lseek(descriptor, 0, os.SEEK_CUR) - result.copied
+                    _keep_metadata(descriptor, st)
+                finally:
+                    os.close(descriptor)
+                return target, temp_name, st, result, []
+            finally:
+                if large:
+                    self._keep_checkpoints(key, checkpoints)
+                    buffer.close()
+
+    def _apply_edits(self, edits: List[Tuple[str, List[Hunk]]]) -> List[EditResult]:
+        """Apply the hunks of each file; on any conflict no file is changed."""
+        prepared = []
+        pending: List[str] = []
+        try:
+            for path, hunks in edits:
+                target, temp_name, st, result, conflicts = self._prepare_edit(path, hunks)
+                prepared.append((target, temp_name, st, result, conflicts))
+                if temp_name is not None:
+                    pending.append(temp_name)
+            conflicts = [conflict for *_, file_conflicts in prepared for conflict in file_conflicts]
+            if conflicts:
+                raise EditConflict(conflicts)
+            # Every file is checked before the first one is replaced
+            for target, temp_name, st, result, _ in prepared:
+                now = os.stat(target)
+                if (now.st_ino, now.st_size, now.st_mtime_ns) != (st.st_ino, st.st_size, st.st_mtime_ns):
+                    raise FileServiceError(f"{result.path}: changed while being edited")
+            for target, temp_name, *_ in prepared:
+                if self.before_write is not None:
+                    self.before_write(target)
+                os.replace(temp_name, target)
+                pending.remove(temp_name)
+        finally:
+            for temp_name in pending:
+                os.unlink(temp_name)
+        return [result for *_, result, _ in prepared]
+
+    def apply_patch(self, diff: str) -> List[EditResult]:
+        """
+        Apply a unified diff (``diff -u``/``git diff`` output) to the workspace.
+
+        Every hunk is checked at the line its header names; files are only
+        replaced when all hunks of all files apply. Diffs adding a file
+        (``--- /dev/null``) create it.
+
+        Raises:
+            EditConflict: Hunks whose lines differ from the files
+            FileServiceError: A malformed diff, deletions or renames
+        """
+        files = parse_unified_diff(diff)
+        if not files:
+            raise FileServiceError("no file headers in diff")
+        edits, created = [], []
+        for old_path, new_path, hunks in files:
+            if new_path is None:
+                raise FileServiceError(f"{old_path}: deleting files is not supported")
+            if old_path is None:
+                if self.resolve(new_path).exists():
+                    raise EditConflict([Conflict(new_path, 1, 1, None, "an existing file")])
+                created.append((new_path, hunks))
+            elif old_path != new_path:
+                raise FileServiceError(f"{old_path} -> {new_path}: renaming files is not supported")
+            else:
+                edits.append((new_path, hunks))
+        results = self._apply_edits(edits)
+        for path, hunks in created:
+            content = b"".join(hunk.new for hunk in hunks)
+            self.create(path, content.decode("utf-8"))
+            results.append(EditResult(path, len(hunks), _count_lines(content), 0, written=len(content)))
+        return results
+
+    def replace_lines(self, path: str, start: int, end: int, content: str,
+                      expected: Optional[str] = None) -> EditResult:
+        """
+        Replace lines ``start``..``end`` (1-based, inclusive) of a file with
+        ``content``; ``end = start - 1`` inserts before line ``start``.
+
+        ``content`` gets a final newline when it has none. With
+        ``expected``, the edit only applies when those lines are exactly
+        ``expected`` (the text read before).
+
+        Raises:
+            EditConflict: The lines are not ``expected`` or do not exist
+            FileServiceError: Invalid range or path
+        """
+        if start < 1 or end < start - 1:
+            raise FileServiceError(f"invalid line range {start}-{end}")
+        if content and not content.endswith("\n"):
+            content += "\n"
+        old = expected.encode("utf-8") if expected is not None else None
+        if old is not None and _count_lines(old) != end - start + 1:
+            raise FileServiceError(f"expected text has {_count_lines(old)} lines, the range {end - start + 1}")
+        return self._apply_edits([(path, [Hunk(start, end - start + 1, content.encode("utf-8"), old)])])[0]
+
+    # -- searching -----------------------------------------------------
+
+    def _search_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                self._pool = ProcessPoolExecutor(max_workers=self.search_workers, mp_context=context)
+            return self._pool
+
+    def search(self, pattern: str, path: str = "", glob: Optional[str] = None, ignore_case: bool = False,
+               max_results: int = DEFAULT_MAX_RESULTS) -> List[SearchMatch]:
+        """
+        Lines matching the regex ``pattern`` below ``path``, sorted by path and line.
+
+        Raises:
+            FileServiceError: Invalid pattern
+        """
+        try:
+            _compile(pattern, ignore_case)
+        except re.error as e:
+            raise FileServiceError(f"invalid pattern: {e}") from e
+        files = [info for info in self.walk(path) if not info.is_dir and _glob_matches(glob, info.path)]
+        # Batches are consecutive runs in path order, so their results concatenate sorted
+        files.sort(key=lambda info: info.path)
+        total = sum(info.size for info in files)
+        root = os.fspath(self.root)
+        if total < self.search_inline_bytes or self.search_workers == 1:
+            found = search_files(root, [info.path for info in files], pattern, ignore_case, max_results)
+        else:
+            batches, batch, batch_bytes = [], [], 0
+            for info in files:
+                batch.append(info.path)
+                batch_bytes += info.size
+                if batch_bytes >= SEARCH_BATCH_BYTES or len(batch) >= SEARCH_BATCH_FILES:
+                    batches.append(batch)
+                    batch, batch_bytes = [], 0
+            if batch:
+                batches.append(batch)
+            pool = self._search_pool()
+            futures = [pool.submit(search_files, root, batch, pattern, ignore_case, max_results)
+                       for batch in batches]
+            found = []
+            for future in futures:
+                if len(found) >= max_results:
+                    future.cancel()
+                    continue
+                found.extend(future.result())
+        return [SearchMatch(*match) for match in found[:max_results]]
+
+
+def _read_umask() -> int:
+    """The process umask; os.umask() can only read it by changing it, which races with other threads."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# Read once at import, before the service starts any thread
+_UMASK = _read_umask()
+
+
+# ============================================================================
+# MCP Tools
+# ============================================================================
+
+TOOLS = [
+    {"name": "list_directory", "description": "List files and directories below a path, skipping ignored ones",
+     "inputSchema": {"type": "object", "properties": {
+         "path": {"type": "string"}, "max_depth": {"type": "integer"}, "glob": {"type": "string"}}}},
+    {"name": "read_files", "description": "Read several files in one call",
+     "inputSchema": {"type": "object", "required": ["paths"], "properties": {
+         "paths": {"type": "array", "items": {"type": "string"}}, "max_bytes": {"type": "integer"}}}},
+    {"name": "read_lines", "description": "Read a 1-based, inclusive line range of a (large) file",
+     "inputSchema": {"type": "object", "required": ["path"], "properties": {
+         "path": {"type": "string"}, "start": {"type": "integer"}, "end": {"type": "integer"}}}},
+    {"name": "search", "description": "Regex search across the workspace, one result per matching line",
+     "inputSchema": {"type": "object", "required": ["pattern"], "properties": {
+         "pattern": {"type": "string"}, "path": {"type": "string"}, "glob": {"type": "string"},
+         "ignore_case": {"type": "boolean"}, "max_results": {"type": "integer"}}}},
+    {"name": "apply_patch", "description": "Apply a unified diff; fails without changes when a hunk is stale",
+     "inputSchema": {"type": "object", "required": ["diff"], "properties": {"diff": {"type": "string"}}}},
+    {"name": "replace_lines", "description": "Replace lines start..end (inclusive; end = start - 1 inserts), "
+                                             "optionally only if they are still the expected text",
+     "inputSchema": {"type": "object", "required": ["path", "start", "end", "content"], "properties": {
+         "path": {"type": "string"}, "start": {"type": "integer"}, "end": {"type": "integer"},
+         "content": {"type": "string"}, "expected": {"type": "string"}}}},
+    {"name": "write_file", "description": "Create or replace a file, keeping the mode bits of an existing one",
+     "inputSchema": {"type": "object", "required": ["path", "content"], "properties": {
+         "path": {"type": "string"}, "content": {"type": "string"}}}},
+]
+
+
+def call_tool(service: FileService, name: str, arguments: Dict[str, Any]) -> Any:
+    """Run one MCP tool; returns a JSON-serializable result."""
+    if name == "list_directory":
+        return [asdict(info) for info in service.list(arguments.get("path", ""), arguments.get("max_depth"),
+                                                      arguments.get("glob"))]
+    if name == "read_files":
+        return [asdict(result) for result in service.read_many(
+            arguments["paths"], arguments.get("max_bytes", DEFAULT_MAX_READ_BYTES))]
+    if name == "read_lines":
+        return asdict(service.read_lines(arguments["path"], arguments.get("start", 1), arguments.get("end")))
+    if name == "search":
+        return [asdict(match) for match in service.search(
+            arguments["pattern"], arguments.get("path", ""), arguments.get("glob"),
+            arguments.get("ignore_case", False), arguments.get("max_results", DEFAULT_MAX_RESULTS))]
+    if name == "apply_patch":
+        return [asdict(result) for result in service.apply_patch(arguments["diff"])]
+    if name == "replace_lines":
+        return asdict(service.replace_lines(arguments["path"], arguments["start"], arguments["end"],
+                                            arguments["content"], arguments.get("expected")))
+    if name == "write_file":
+        service.write(arguments["path"], arguments["content"])
+        return {"path": arguments["path"], "written": len(arguments["content"])}
+    raise FileServiceError(f"unknown tool {name}")
+
+
+def handle_message(service: FileService, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Answer one JSON-RPC message of the MCP protocol (None for notifications)."""
+    request_id, method = message.get("id"), message.get("method")
+    if request_id is None:
+        return None
+    if method == "initialize":
+        result: Dict[str, Any] = {"protocolVersion": PROTOCOL_VERSION, "capabilities": {"tools": {}},
+                                  "serverInfo": {"name": "aicoding-file-service", "version": "1.0"}}
+    elif method == "ping":
+        result = {}
+    elif method == "tools/list":
+        result = {"tools": TOOLS}
+    elif method == "tools/call":
+        params = message.get("params") or {}
+        name = params.get("name", "")
+        # Callers pass their trace context in params._meta (traceparent, baggage)
+        with span(f"workspace.{name}", kind="workspace", parent=extract(params.get("_meta") or {})) as current:
+            try:
+                payload = call_tool(service, name, params.get("arguments") or {})
+                result = {"content": [{"type": "text", "text": json.dumps(payload)}]}
+            except EditConflict as e:
+                report = json.dumps({"conflicts": [asdict(conflict) for conflict in e.conflicts]})
+                result = {"content": [{"type": "text", "text": report}], "isError": True}
+                current.fail("edit conflict")
+            except (FileServiceError, KeyError, TypeError, ValueError) as e:
+                result = {"content": [{"type": "text", "text": str(e)}], "isError": True}
+                current.fail(str(e))
+    else:
+        return {"jsonrpc": "2.0", "id": request_id, "error": {"code": -32601, "message": f"unknown method {method}"}}
+    return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+
+def serve_mcp(service: FileService, stdin: Any = None, stdout: Any = None, workers: int = 8) -> None:
+    """Serve the tools as a stdio MCP server until stdin closes."""
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    write_lock = threading.Lock()
+
+    def answer(message: Dict[str, Any]) -> None:
+        response = handle_message(service, message)
+        if response is not None:
+            with write_lock:
+                stdout.write(json.dumps(response) + "\n")
+                stdout.flush()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="file-mcp") as executor:
+        for line in stdin:
+            if line.strip():
+                executor.submit(answer, json.loads(line))
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Workspace file service")
+    parser.add_argument("--root", type=Path, default=WORKSPACE_DIR)
+    parser.add_argument("--snapshots", action="store_true",
+                        help="Snapshot a project before the first write of each batch (aicoding.snapshots)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    list_parser = sub.add_parser("list", help="List files below a path")
+    list_parser.add_argument("path", nargs="?", default="")
+    list_parser.add_argument("--max-depth", type=int)
+    list_parser.add_argument("--glob")
+    search = sub.add_parser("search", help="Regex search across the workspace")
+    search.add_argument("pattern")
+    search.add_argument("path", nargs="?", default="")
+    search.add_argument("--glob")
+    search.add_argument("-i", "--ignore-case", action="store_true")
+    search.add_argument("--max-results", type=int, default=DEFAULT_MAX_RESULTS)
+    lines = sub.add_parser("read-lines", help="Print a line range of a file")
+    lines.add_argument("path")
+    lines.add_argument("start", type=int)
+    lines.add_argument("end", type=int, nargs="?")
+    patch = sub.add_parser("patch", help="Apply a unified diff (from a file or stdin)")
+    patch.add_argument("diff", nargs="?", type=argparse.FileType("r"), default=sys.stdin)
+    sub.add_parser("mcp", help="Serve the operations as a stdio MCP server")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    if not args.root.is_dir():
+        print(f"Workspace {args.root} does not exist", file=sys.stderr)
+        return 1
+    before_write = SnapshotStore().before_write if args.snapshots else None
+    with FileService(args.root, before_write=before_write) as service:
+        try:
+            if args.command == "list":
+                for info in service.list(args.path, args.max_depth, args.glob):
+                    print(f"{info.path}/" if info.is_dir else f"{info.path}\t{info.size}")
+            elif args.command == "search":
+                for match in service.search(args.pattern, args.path, args.glob, args.ignore_case,
+                                            args.max_results):
+                    print(f"{match.path}:{match.line}:{match.text}")
+            elif args.command == "read-lines":
+                sys.stdout.write(service.read_lines(args.path, args.start, args.end).text)
+            elif args.command == "patch":
+                for result in service.apply_patch(args.diff.read()):
+                    print(f"{result.path}: {result.hunks} hunks, +{result.added} -{result.removed}")
+            else:
+                serve_mcp(service)
+        except FileServiceError as e:
+            print(str(e), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
@@ -0,0 +1,446 @@
+"""
+Concurrent coding-session load generator for capacity planning.
+
+Simulates N OpenHands-style agent sessions at once. Each session runs turns
+of:
+1. an LLM call (``POST /api/chat``) whose prompt grows with the conversation
+   and whose reply length is fixed with ``num_predict``
+2. file writes with ``create_file_at_path`` semantics into its own project
+3. a ``git add`` + ``git commit`` every few turns
+
+Concurrency is ramped (1, 2, 4, ...) and each stage reports throughput,
+latency percentiles per operation and errors. The saturation knee is the
+stage with the best throughput-to-latency ratio (Kleinrock's "power"):
+beyond it, extra sessions mostly add queueing delay.
+
+Runs fully offline by default (in-process fake Ollama with a CPU latency
+model, temporary workspace); point ``--ollama-url`` and ``--workspace`` at
+real services to measure the instance itself.
+
+Usage:
+    python -m aicoding.loadgen --levels 1,2,4,8 --stage-seconds 20
+    python -m aicoding.loadgen --ollama-url http://localhost:11434 \\
+        --model qwen2.5-coder:7b --workspace /opt/workspace/temp/loadtest
+"""
+
+import argparse
+import json
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import requests
+
+from aicoding.models import get_profile, normalize_model_name
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import SECONDARY_MODEL
+from aicoding.tracing import inject, span
+from aicoding.workspace import create_file_at_path
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+DEFAULT_LEVELS = (1, 2, 4, 8)
+
+# Operations timed per turn
+OPERATIONS = ("llm", "write", "commit", "turn")
+
+_CODE_WORDS = [
+    "def", "return", "self", "config", "request", "response", "import", "class",
+    "value", "items", "for", "in", "if", "else", "path", "json", "data", "user",
+]
+
+
+@dataclass
+class SessionProfile:
+    """Shape of one simulated coding session."""
+
+    turns: int = 6
+    system_prompt_tokens: int = 800
+    # New user/context tokens per turn, drawn from [min, max]
+    turn_prompt_tokens: tuple = (300, 1200)
+    response_tokens: int = 256
+    files_per_turn: int = 2
+    file_bytes: int = 2048
+    commit_every: int = 2
+    think_seconds: float = 0.0
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+@dataclass
+class OperationStats:
+    """Latency summary of one operation in one stage."""
+
+    count: int = 0
+    errors: int = 0
+    mean: float = 0.0
+    p50: float = 0.0
+    p95: float = 0.0
+    p99: float = 0.0
+    max: float = 0.0
+
+
+@dataclass
+class StageResult:
+    """Outcome of running the load at one concurrency level."""
+
+    concurrency: int
+    seconds: float
+    turns: int
+    errors: int
+    turns_per_second: float
+    llm_tokens_per_second: float
+    operations: Dict[str, OperationStats] = field(default_factory=dict)
+
+    @property
+    def power(self) -> float:
+        """Throughput divided by mean turn latency; peaks at the knee."""
+        turn = self.operations.get("turn")
+        return self.turns_per_second / turn.mean if turn and turn.mean > 0 else 0.0
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile.
+
+    Args:
+        values: Samples (any order)
+        fraction: 0.0-1.0
+
+    Returns:
+        The sample at that rank (0.0 for no samples)
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), int(-(-fraction * len(ordered) // 1))))
+    return ordered[rank - 1]
+
+
+def summarize(latencies: Sequence[float], errors: int = 0) -> OperationStats:
+    if not latencies:
+        return OperationStats(errors=errors)
+    return OperationStats(
+        count=len(latencies), errors=errors, mean=sum(latencies) / len(latencies),
+        p50=percentile(latencies, 0.50), p95=percentile(latencies, 0.95),
+        p99=percentile(latencies, 0.99), max=max(latencies),
+    )
+
+
+def find_knee(stages: Sequence[StageResult]) -> Optional[StageResult]:
+    """
+    Saturation knee: the stage with the highest power (throughput / latency).
+
+    Args:
+        stages: Results in increasing concurrency
+
+    Returns:
+        The knee stage, or None without results
+    """
+    candidates = [stage for stage in stages if stage.turns > 0]
+    return max(candidates, key=lambda stage: stage.power) if candidates else None
+
+
+# ============================================================================
+# Session Simulation
+# ============================================================================
+
+class _Recorder:
+    """Thread-safe latency collection for one stage."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {op: [] for op in OPERATIONS}
+        self.errors: Dict[str, int] = {op: 0 for op in OPERATIONS}
+        self.output_tokens = 0
+
+    def record(self, operation: str, seconds: float, ok: bool = True) -> None:
+        with self.lock:
+            if ok:
+                self.latencies[operation].append(seconds)
+            else:
+                self.errors[operation] += 1
+
+
+def _filler(tokens: int, rng: random.Random) -> str:
+    # ~4 characters per token, like the budgeter's estimate
+    words = []
+    length = 0
+    while length < tokens * 4:
+        word = rng.choice(_CODE_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+class CodingSession:
+    """One simulated agent session working in its own project directory."""
+
+    def __init__(self, session_id: str, project: Path, ollama_url: str, model: str,
+                 profile: SessionProfile, recorder: _Recorder, seed: int = 0,
+                 timeout: float = 600.0) -> None:
+        self.session_id = session_id
+        self.project = project
+        self.ollama_url = ollama_url.rstrip("/")
+        self.model = normalize_model_name(model)
+        self.profile = profile
+        self.recorder = recorder
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        self.http = requests.Session()
+        self.messages: List[Dict[str, str]] = [
+            {"role": "system", "content": _filler(profile.system_prompt_tokens, self.rng)}
+        ]
+        self.turns_done = 0
+
+    def _git(self, *args: str) -> None:
+        with span(f"git.{args[0]}", kind="git"):
+            subprocess.run(["git", "-C", str(self.project), *args], check=True,
+                           capture_output=True, timeout=120)
+
+    def setup(self) -> None:
+        self.project.mkdir(parents=True, exist_ok=True)
+        if not (self.project / ".git").exists():
+            self._git("init", "-q")
+            self._git("config", "user.email", "loadgen@localhost")
+            self._git("config", "user.name", "loadgen")
+            self._git("config", "commit.gpgsign", "false")
+
+    def _llm_call(self) -> str:
+        low, high = self.profile.turn_prompt_tokens
+        self.messages.append({"role": "user", "content": _filler(self.rng.randint(low, high), self.rng)})
+        payload = {
+            "model": self.model,
+            "messages": self.messages,
+            "stream": False,
+            "options": {"num_predict": self.profile.response_tokens,
+                        "num_ctx": get_profile(self.model).num_ctx},
+        }
+        with span("llm.call", kind="llm", model=self.model):
+            response = self.http.post(f"{self.ollama_url}/api/chat", json=payload, headers=inject(),
+                                      timeout=self.timeout)
+            response.raise_for_status()
+            result = response.json()
+        reply = result.get("message", {}).get("content", "")
+        self.messages.append({"role": "assistant", "content": reply})
+        with self.recorder.lock:
+            self.recorder.output_tokens += int(result.get("eval_count", 0))
+        # Keep the conversation inside the context window, as the agent would
+        budget_chars = get_profile(self.model).num_ctx * 3
+        while len(self.messages) > 3 and sum(len(m["content"]) for m in self.messages) > budget_chars:
+            del self.messages[1:3]
+        return reply
+
+    def _timed(self, operation: str, func, *args) -> bool:
+        started = time.perf_counter()
+        try:
+            func(*args)
+        except (requests.RequestException, subprocess.SubprocessError, OSError, ValueError):
+            self.recorder.record(operation, time.perf_counter() - started, ok=False)
+            return False
+        self.recorder.record(operation, time.perf_counter() - started)
+        return True
+
+    def _write_files(self) -> None:
+        for i in range(self.profile.files_per_turn):
+            module = self.rng.randint(0, 9)
+            path = self.project / "src" / f"pkg{module % 3}" / f"module_{module}.py"
+            content = f"# turn {self.turns_done} file {i}\n" + _filler(self.profile.file_bytes // 4, self.rng)
+            create_file_at_path(path, content + "\n")
+
+    def _commit(self) -> None:
+        self._git("add", "-A")
+        self._git("commit", "-q", "--allow-empty", "-m", f"Session {self.session_id} turn {self.turns_done}")
+
+    def run_turn(self) -> bool:
+        started = time.perf_counter()
+        with span("session.turn", kind="session", session=self.session_id, turn=self.turns_done) as current:
+            ok = self._timed("llm", self._llm_call)
+            ok = self._timed("write", self._write_files) and ok
+            self.turns_done += 1
+            if self.turns_done % self.profile.commit_every == 0:
+                ok = self._timed("commit", self._commit) and ok
+            if not ok:
+                current.fail("operation failed")
+        self.recorder.record("turn", time.perf_counter() - started, ok=ok)
+        return ok
+
+
+# ============================================================================
+# Load Generator
+# ============================================================================
+
+class LoadGenerator:
+    """Runs stages of concurrent sessions and reports capacity."""
+
+    def __init__(self, ollama_url: str, workspace: Path, model: str = SECONDARY_MODEL,
+                 profile: Optional[SessionProfile] = None, seed: int = 0) -> None:
+        """
+        Args:
+            ollama_url: Ollama (or fake) base URL
+            workspace: Directory for the sessions' projects (created if missing)
+            model: Model used for the chat calls
+            profile: Session shape
+            seed: Seed for prompt sizes and file contents
+        """
+        self.ollama_url = ollama_url
+        self.workspace = Path(workspace)
+        self.model = model
+        self.profile = profile or SessionProfile()
+        self.seed = seed
+
+    def run_stage(self, concurrency: int, seconds: float) -> StageResult:
+        """
+        Keep ``concurrency`` sessions busy for ``seconds``.
+
+        Each worker runs sessions back to back (a new session after
+        ``profile.turns`` turns); turns in flight when time is up finish.
+
+        Args:
+            concurrency: Simultaneous sessions
+            seconds: Stage duration
+
+        Returns:
+            Stage throughput and latency summary
+        """
+        recorder = _Recorder()
+        deadline = time.perf_counter() + seconds
+        stage_dir = self.workspace / f"stage-{concurrency}"
+
+        def worker(index: int) -> None:
+            number = 0
+            while time.perf_counter() < deadline:
+                session = CodingSession(
+                    f"c{concurrency}-w{index}-s{number}", stage_dir / f"w{index}-s{number}",
+                    self.ollama_url, self.model, self.profile, recorder,
+                    seed=self.seed * 100003 + concurrency * 1009 + index * 101 + number)
+                try:
+                    session.setup()
+                except (subprocess.SubprocessError, OSError):
+                    recorder.record("turn", 0.0, ok=False)
+                    return
+                for _ in range(self.profile.turns):
+                    if time.perf_counter() >= deadline:
+                        break
+                    session.run_turn()
+                    if self.profile.think_seconds:
+                        time.sleep(self.profile.think_seconds)
+                number += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        operations = {op: summarize(recorder.latencies[op], recorder.errors[op]) for op in OPERATIONS}
+        turns = operations["turn"].count
+        return StageResult(
+            concurrency=concurrency, seconds=elapsed, turns=turns,
+            errors=sum(recorder.errors.values()),
+            turns_per_second=turns / elapsed if elapsed else 0.0,
+            llm_tokens_per_second=recorder.output_tokens / elapsed if elapsed else 0.0,
+            operations=operations,
+        )
+
+    def ramp(self, levels: Sequence[int] = DEFAULT_LEVELS, stage_seconds: float = 20.0,
+             on_stage=None) -> List[StageResult]:
+        """
+        Run one stage per concurrency level, lowest first.
+
+        Args:
+            levels: Concurrency levels
+            stage_seconds: Duration of each stage
+            on_stage: Called with each StageResult as it completes
+
+        Returns:
+            Stage results in order
+        """
+        results = []
+        for level in levels:
+            result = self.run_stage(level, stage_seconds)
+            results.append(result)
+            if on_stage is not None:
+                on_stage(result)
+        return results
+
+
+def format_stage(stage: StageResult) -> str:
+    llm, turn = stage.operations["llm"], stage.operations["turn"]
+    commit = stage.operations["commit"]
+    return (f"{stage.concurrency:>5} {stage.turns:>6} {stage.turns_per_second:>8.2f} "
+            f"{stage.llm_tokens_per_second:>8.1f} {llm.p50 * 1000:>8.0f} {llm.p95 * 1000:>8.0f} "
+            f"{turn.p50 * 1000:>8.0f} {turn.p99 * 1000:>8.0f} {commit.p95 * 1000:>8.1f} {stage.errors:>5}")
+
+
+STAGE_HEADER = (f"{'conc':>5} {'turns':>6} {'turns/s':>8} {'tok/s':>8} {'llm p50':>8} {'llm p95':>8} "
+                f"{'turn p50':>8} {'turn p99':>8} {'git p95':>8} {'err':>5}   (latencies in ms)")
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Concurrent coding-session load generator")
+    parser.add_argument("--levels", default=",".join(map(str, DEFAULT_LEVELS)),
+                        help="Comma-separated concurrency levels")
+    parser.add_argument("--stage-seconds", type=float, default=20.0)
+    parser.add_argument("--ollama-url", default=None,
+                        help="Real Ollama URL (default: in-process fake Ollama)")
+    parser.add_argument("--model", default=SECONDARY_MODEL)
+    parser.add_argument("--workspace", default=None, help="Project directory (default: temporary)")
+    parser.add_argument("--turns", type=int, default=SessionProfile.turns)
+    parser.add_argument("--response-tokens", type=int, default=SessionProfile.response_tokens)
+    parser.add_argument("--fake-parallel", type=int, default=1,
+                        help="Fake Ollama: requests served at once (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--fake-time-scale", type=float, default=0.01,
+                        help="Fake Ollama: latency multiplier (1.0 = simulated CPU speed)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+    profile = SessionProfile(turns=args.turns, response_tokens=args.response_tokens)
+    workspace = Path(args.workspace) if args.workspace else Path(tempfile.mkdtemp(prefix="loadgen_"))
+    fake = None
+    if args.ollama_url is None:
+        from aicoding.fake_ollama import FakeOllama
+        fake = FakeOllama(parallel=args.fake_parallel, time_scale=args.fake_time_scale).start()
+    try:
+        generator = LoadGenerator(args.ollama_url or fake.url, workspace, args.model, profile)
+        if not args.json:
+            print(f"Target: {args.ollama_url or 'fake Ollama'} model={args.model}, workspace={workspace}")
+            print(STAGE_HEADER)
+        results = generator.ramp(levels, args.stage_seconds,
+                                 on_stage=None if args.json else lambda r: print(format_stage(r), flush=True))
+        knee = find_knee(results)
+        if args.json:
+            print(json.dumps({"stages": [asdict(r) for r in results],
+                              "knee": knee.concurrency if knee else None}, indent=2))
+        elif knee is not None:
+            print(f"\nSaturation knee: {knee.concurrency} concurrent sessions "
+                  f"({knee.turns_per_second:.2f} turns/s, turn p50 "
+                  f"{knee.operations['turn'].p50 * 1000:.0f} ms)")
+    finally:
+        if fake is not None:
+            fake.stop()
+        if args.workspace is None:
+            shutil.rmtree(workspace, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
@@ -0,0 +1,688 @@
+"""
+Indexed, compressed store for the ollama and openhands container logs.
+
+Replaces ``docker logs --tail 100 | grep`` (docs/MAINTENANCE.md, "Review
+Logs") with a store that keeps weeks of logs and answers time-range plus
+keyword queries by reading only the blocks that can match.
+
+On-disk layout, one directory per source (container):
+- ``<source>/<partition>.seg``: zlib-compressed blocks of log lines for one
+  time partition (one day by default), appended in arrival order
+- ``<source>/<partition>.idx``: JSON index with one entry per block
+  (offset, length, first/last timestamp, line count) - a sparse timestamp
+  index - and a token index mapping each word to the blocks containing it
+
+Each stored line is ``<epoch seconds>\\t<message>``. Retention drops whole
+partitions, oldest first, by age and total size.
+
+Usage:
+    # Follow both containers (run as a systemd service or in tmux)
+    python -m aicoding.log_store ingest
+    # Errors from ollama in the last 6 hours
+    python -m aicoding.log_store query --source ollama --since 6h error
+    # Keep 14 days and at most 2 GB
+    python -m aicoding.log_store retention --max-days 14 --max-gb 2
+"""
+
+import argparse
+import calendar
+import heapq
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import LOG_STORE_DIR
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+INDEX_FORMAT_VERSION = 1
+
+# Uncompressed bytes per block; smaller blocks mean finer skipping, larger
+# blocks compress better
+DEFAULT_BLOCK_BYTES = 128 * 1024
+DEFAULT_PARTITION_SECONDS = 24 * 3600
+COMPRESSION_LEVEL = 6
+
+# Containers tailed by ``ingest`` (matched by name prefix, see resolve_container)
+DEFAULT_SOURCES = ("ollama", "openhands")
+
+# Words are indexed lowercased; numbers and long ids are not worth indexing
+_TOKEN_RE = re.compile(r"[a-z0-9_]+")
+_MIN_TOKEN_LEN = 2
+_MAX_TOKEN_LEN = 32
+_HEXISH_RE = re.compile(r"^[0-9a-f]{8,}$")
+
+_PARTITION_FORMAT = "%Y%m%dT%H%M%S"
+_SOURCE_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+
+def index_tokens(text: str) -> Set[str]:
+    """
+    Tokens of a log line that go into the token index.
+
+    Args:
+        text: Log message
+
+    Returns:
+        Lowercased word tokens, excluding pure numbers and hex ids
+    """
+    return {
+        token for token in _TOKEN_RE.findall(text.lower())
+        if _MIN_TOKEN_LEN <= len(token) <= _MAX_TOKEN_LEN
+        and not token.isdigit() and not _HEXISH_RE.match(token)
+    }
+
+
+def _keyword_pattern(keyword: str) -> "re.Pattern[str]":
+    """Whole-word, case-insensitive match (``grep -iw``), consistent with the token index."""
+    return re.compile(rf"(?<![a-z0-9_]){re.escape(keyword.lower())}(?![a-z0-9_])", re.IGNORECASE)
+
+
+def parse_docker_line(line: str) -> Tuple[Optional[float], str]:
+    """
+    Split a ``docker logs --timestamps`` line into (epoch seconds, message).
+
+    Args:
+        line: e.g. "2025-11-20T10:00:00.123456789Z level=INFO msg=..."
+
+    Returns:
+        (timestamp or None when the line has no timestamp, message)
+    """
+    line = line.rstrip("\r\n")
+    stamp, _, message = line.partition(" ")
+    if len(stamp) < 20 or stamp[4] != "-" or stamp[10] != "T":
+        return None, line
+    try:
+        base, _, fraction = stamp.rstrip("Z").partition(".")
+        seconds = calendar.timegm(time.strptime(base[:19], "%Y-%m-%dT%H:%M:%S"))
+    except ValueError:
+        return None, line
+    return round(seconds + float(f"0.{fraction[:6] or 0}"), 6), message
+
+
+def parse_time(value: str, now: Optional[float] = None) -> float:
+    """
+    Parse a CLI time: epoch seconds, ISO-8601, or a relative age like "6h".
+
+    Args:
+        value: "1700000000", "2025-11-20T10:00:00", "30m", "6h", "7d"
+        now: Reference time for relative values
+
+    Returns:
+        Epoch seconds
+    """
+    now = time.time() if now is None else now
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhdw])", value.strip())
+    if match:
+        unit = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}[match.group(2)]
+        return now - float(match.group(1)) * unit
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+@dataclass
+class LogRecord:
+    """One stored log line."""
+
+    source: str
+    timestamp: float
+    message: str
+
+    def format(self) -> str:
+        stamp = datetime.fromtimestamp(self.timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        return f"{stamp} [{self.source}] {self.message}"
+
+
+@dataclass
+class QueryStats:
+    """Work done by a query - the point of the index is to keep it small."""
+
+    partitions: int = 0
+    blocks_total: int = 0
+    blocks_read: int = 0
+    bytes_read: int = 0
+    lines_scanned: int = 0
+    lines_matched: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class RetentionStats:
+    """Result of a retention pass."""
+
+    removed: List[str] = field(default_factory=list)
+    bytes_freed: int = 0
+    bytes_kept: int = 0
+
+
+class _Segment:
+    """Append-side state of one partition of one source."""
+
+    def __init__(self, directory: Path, name: str, start: float, partition_seconds: int) -> None:
+        self.data_path = directory / f"{name}.seg"
+        self.index_path = directory / f"{name}.idx"
+        self.start = start
+        self.end = start + partition_seconds
+        self.blocks: List[List[float]] = []
+        self.tokens: Dict[str, List[int]] = {}
+        if self.index_path.exists():
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            self.blocks, self.tokens = index["blocks"], index["tokens"]
+        # Drop bytes written after the last indexed block (crash mid-flush)
+        committed = int(self.blocks[-1][0] + self.blocks[-1][1]) if self.blocks else 0
+        directory.mkdir(parents=True, exist_ok=True)
+        self.handle = open(self.data_path, "ab")
+        if self.handle.tell() != committed:
+            self.handle.truncate(committed)
+            self.handle.seek(committed)
+        self.pending: List[str] = []
+        self.pending_tokens: Set[str] = set()
+        self.pending_bytes = 0
+        self.pending_min = float("inf")
+        self.pending_max = float("-inf")
+
+    def add(self, timestamp: float, message: str) -> None:
+        line = f"{timestamp:.6f}\t{message}"
+        self.pending.append(line)
+        self.pending_tokens |= index_tokens(message)
+        self.pending_bytes += len(line) + 1
+        self.pending_min = min(self.pending_min, timestamp)
+        self.pending_max = max(self.pending_max, timestamp)
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        payload = zlib.compress("\n".join(self.pending).encode("utf-8"), COMPRESSION_LEVEL)
+        offset = self.handle.tell()
+        self.handle.write(payload)
+        self.handle.flush()
+        block_id = len(self.blocks)
+        self.blocks.append([offset, len(payload), self.pending_min, self.pending_max, len(self.pending)])
+        for token in self.pending_tokens:
+            self.tokens.setdefault(token, []).append(block_id)
+        index = {"version": INDEX_FORMAT_VERSION, "start": self.start, "end": self.end,
+                 "blocks": self.blocks, "tokens": self.tokens}
+        tmp = self.index_path.with_suffix(".idx.tmp")
+        tmp.write_text(json.dumps(index, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, self.index_path)
+        self.pending, self.pending_tokens, self.pending_bytes = [], set(), 0
+        self.pending_min, self.pending_max = float("inf"), float("-inf")
+
+    def close(self) -> None:
+        self.flush()
+        self.handle.close()
+
+
+def _scan_block(text: str, keywords: Sequence[str], needles: Sequence["re.Pattern[str]"],
+                start: float, end: float, contained: bool,
+                stats: QueryStats) -> Iterator[Tuple[float, str]]:
+    """
+    Matching lines of one decompressed block.
+
+    With keywords, the longest one is located with ``str.find`` over the
+    lowercased block and only the lines it hits are cut out; timestamps are
+    only compared when the block straddles the query range.
+    """
+    if keywords:
+        word = max(keywords, key=len)
+        lowered = text.lower()
+        position = lowered.find(word)
+        if position < 0:
+            return
+        lines = []
+        if len(lowered) == len(text):
+            # Offsets line up: cut the hit lines straight out of the block
+            while position >= 0:
+                line_start = text.rfind("\n", 0, position) + 1
+                line_end = text.find("\n", position)
+                line_end = len(text) if line_end < 0 else line_end
+                lines.append(text[line_start:line_end])
+                position = lowered.find(word, line_end)
+        else:
+            all_lines = text.split("\n")
+            line_number, counted_to, hits = 0, 0, []
+            while position >= 0:
+                line_number += lowered.count("\n", counted_to, position)
+                counted_to = position
+                if not hits or hits[-1] != line_number:
+                    hits.append(line_number)
+                position = lowered.find(word, position + len(word))
+            lines = [all_lines[i] for i in hits]
+    else:
+        lines = text.split("\n")
+    stats.lines_scanned += len(lines)
+    for line in lines:
+        stamp, _, message = line.partition("\t")
+        timestamp = float(stamp)
+        if not contained and not start <= timestamp <= end:
+            continue
+        if all(needle.search(message) for needle in needles):
+            yield timestamp, message
+
+
+# ============================================================================
+# Log Store
+# ============================================================================
+
+class LogStore:
+    """Append log lines per source and query them by time range and keyword."""
+
+    def __init__(self, root: Path = LOG_STORE_DIR, block_bytes: int = DEFAULT_BLOCK_BYTES,
+                 partition_seconds: int = DEFAULT_PARTITION_SECONDS) -> None:
+        """
+        Args:
+            root: Store directory
+            block_bytes: Uncompressed bytes buffered before a block is written
+            partition_seconds: Time span of one segment file
+        """
+        self.root = Path(root)
+        self.block_bytes = block_bytes
+        self.partition_seconds = partition_seconds
+        self._open: Dict[str, _Segment] = {}
+        self._last: Dict[str, float] = {}
+        self._index_cache: Dict[Path, Tuple[Tuple[int, int], dict]] = {}
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------------
+
+    def _source_dir(self, source: str) -> Path:
+        if not _SOURCE_RE.match(source):
+            raise ValueError(f"Invalid log source name: {source!r}")
+        return self.root / source
+
+    def append(self, source: str, timestamp: float, message: str) -> None:
+        """
+        Buffer one line; a block is written once ``block_bytes`` accumulate.
+
+        Args:
+            source: Source name, e.g. "ollama"
+            timestamp: Epoch seconds
+            message: Log message (newlines are escaped)
+        """
+        message = message.replace("\n", "\\n")
+        # Stored with microsecond precision; round now so reads match writes
+        timestamp = round(timestamp, 6)
+        with self._lock:
+            segment = self._open.get(source)
+            if segment is None or not segment.start <= timestamp < segment.end:
+                if segment is not None:
+                    segment.close()
+                start = timestamp // self.partition_seconds * self.partition_seconds
+                name = time.strftime(_PARTITION_FORMAT, time.gmtime(start))
+                segment = _Segment(self._source_dir(source), name, start, self.partition_seconds)
+                self._open[source] = segment
+            segment.add(timestamp, message)
+            self._last[source] = max(self._last.get(source, timestamp), timestamp)
+            if segment.pending_bytes >= self.block_bytes:
+                segment.flush()
+
+    def ingest(self, source: str, lines: Iterable[str], skip_until: Optional[float] = None) -> int:
+        """
+        Append ``docker logs --timestamps`` output.
+
+        Lines without a timestamp take the previous line's timestamp (or the
+        current time).
+
+        Args:
+            source: Source name
+            lines: Raw log lines
+            skip_until: Ignore lines at or before this time (resume after restart)
+
+        Returns:
+            Number of lines stored
+        """
+        stored = 0
+        last = None
+        for line in lines:
+            timestamp, message = parse_docker_line(line)
+            timestamp = timestamp if timestamp is not None else (last or time.time())
+            last = timestamp
+            if skip_until is not None and timestamp <= skip_until:
+                continue
+            self.append(source, timestamp, message)
+            stored += 1
+        return stored
+
+    def flush(self) -> None:
+        """Write buffered lines of every source so queries can see them."""
+        with self._lock:
+            for segment in self._open.values():
+                segment.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            for segment in self._open.values():
+                segment.close()
+            self._open.clear()
+
+    def __enter__(self) -> "LogStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def last_timestamp(self, source: str) -> Optional[float]:
+        """Latest stored timestamp of ``source``, used to resume tailing."""
+        with self._lock:
+            if source in self._last:
+                return self._last[source]
+        partitions = self._partitions(source)
+        for _, index_path in reversed(partitions):
+            blocks = self._load_index(index_path)["blocks"]
+            if blocks:
+                return max(block[3] for block in blocks)
+        return None
+
+    # ------------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------------
+
+    def sources(self) -> List[str]:
+        if not self.root.is_dir():
+            return []
+        return sorted(entry.name for entry in os.scandir(self.root)
+                      if entry.is_dir() and _SOURCE_RE.match(entry.name))
+
+    def _partitions(self, source: str) -> List[Tuple[float, Path]]:
+        directory = self._source_dir(source)
+        if not directory.is_dir():
+            return []
+        found = []
+        for entry in os.scandir(directory):
+            if entry.name.endswith(".idx"):
+                start = calendar.timegm(time.strptime(entry.name[:-4], _PARTITION_FORMAT))
+                found.append((float(start), Path(entry.path)))
+        return sorted(found)
+
+    def _load_index(self, path: Path) -> dict:
+        stat = path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self._index_cache.get(path)
+        if cached is None or cached[0] != version:
+            index = json.loads(path.read_text(encoding="utf-8"))
+            index["tokens"] = {token: set(blocks) for token, blocks in index["tokens"].items()}
+            self._index_cache[path] = cached = (version, index)
+        return cached[1]
+
+    def _query_source(self, source: str, start: float, end: float, keywords: Sequence[str],
+                      stats: QueryStats) -> Iterator[LogRecord]:
+        words = [keyword.lower() for keyword in keywords]
+        needles = [_keyword_pattern(keyword) for keyword in keywords]
+        required = set().union(*(index_tokens(keyword) for keyword in keywords)) if keywords else set()
+        for partition_start, index_path in self._partitions(source):
+            index = self._load_index(index_path)
+            if index["end"] <= start or partition_start > end:
+                continue
+            stats.partitions += 1
+            stats.blocks_total += len(index["blocks"])
+            # Sparse timestamp index first, then intersect token postings
+            candidates = {i for i, block in enumerate(index["blocks"])
+                          if block[3] >= start and block[2] <= end}
+            for token in sorted(required, key=lambda t: len(index["tokens"].get(t, ()))):
+                if not candidates:
+                    break
+                candidates &= index["tokens"].get(token, set())
+            if not candidates:
+                continue
+            with open(index_path.with_suffix(".seg"), "rb") as handle:
+                for block_id in sorted(candidates):
+                    offset, length = int(index["blocks"][block_id][0]), int(index["blocks"][block_id][1])
+                    handle.seek(offset)
+                    payload = handle.read(length)
+                    stats.blocks_read += 1
+                    stats.bytes_read += length
+                    block = index["blocks"][block_id]
+                    contained = start <= block[2] and block[3] <= end
+                    text = zlib.decompress(payload).decode("utf-8")
+                    for timestamp, message in _scan_block(text, words, needles, start, end,
+                                                          contained, stats):
+                        stats.lines_matched += 1
+                        yield LogRecord(source, timestamp, message)
+
+    def query(self, start: float = 0.0, end: float = float("inf"), keywords: Sequence[str] = (),
+              sources: Optional[Sequence[str]] = None, limit: Optional[int] = None,
+              stats: Optional[QueryStats] = None) -> List[LogRecord]:
+        """
+        Lines in ``[start, end]`` containing every keyword as whole words
+        (case-insensitive, like ``grep -iw``).
+
+        Only blocks whose time span overlaps the range and whose token
+        postings contain every word of the keywords are decompressed.
+
+        Args:
+            start: Range start, epoch seconds
+            end: Range end, epoch seconds
+            keywords: Words or phrases that must all appear in the line
+            sources: Sources to search (default: all)
+            limit: Return at most this many lines (the most recent ones)
+            stats: Filled in with the work done
+
+        Returns:
+            Matching records in timestamp order
+        """
+        stats = stats if stats is not None else QueryStats()
+        started = time.perf_counter()
+        self.flush()
+        streams = [self._query_source(source, start, end, keywords, stats)
+                   for source in (sources or self.sources())]
+        records = list(heapq.merge(*streams, key=lambda record: record.timestamp))
+        if limit is not None:
+            records = records[-limit:] if limit > 0 else []
+        stats.seconds = time.perf_counter() - started
+        return records
+
+    # ------------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------------
+
+    def apply_retention(self, max_bytes: Optional[int] = None, max_age_seconds: Optional[float] = None,
+                        now: Optional[float] = None) -> RetentionStats:
+        """
+        Delete whole partitions that are too old, then the oldest ones until
+        the store fits ``max_bytes``. Partitions being written are kept.
+
+        Args:
+            max_bytes: Size limit for the whole store
+            max_age_seconds: Drop partitions that ended longer ago than this
+            now: Reference time (default: current time)
+
+        Returns:
+            What was removed and what remains
+        """
+        now = time.time() if now is None else now
+        result = RetentionStats()
+        with self._lock:
+            active = {segment.index_path for segment in self._open.values()}
+            partitions = []
+            for source in self.sources():
+                for _, index_path in self._partitions(source):
+                    size = sum(p.stat().st_size for p in (index_path, index_path.with_suffix(".seg"))
+                               if p.exists())
+                    partitions.append((self._load_index(index_path)["end"], index_path, size))
+            partitions.sort(key=lambda item: item[0])
+            total = sum(size for _, _, size in partitions)
+            for end, index_path, size in partitions:
+                too_old = max_age_seconds is not None and end < now - max_age_seconds
+                too_big = max_bytes is not None and total > max_bytes
+                if index_path in active or not (too_old or too_big):
+                    continue
+                index_path.with_suffix(".seg").unlink(missing_ok=True)
+                index_path.unlink(missing_ok=True)
+                self._index_cache.pop(index_path, None)
+                result.removed.append(f"{index_path.parent.name}/{index_path.stem}")
+                result.bytes_freed += size
+                total -= size
+            result.bytes_kept = total
+        return result
+
+
+# ============================================================================
+# Docker Log Tailing
+# ============================================================================
+
+def resolve_container(source: str) -> str:
+    """
+    Find the running container for a source.
+
+    Coolify names containers ``<service>-<uuid>``; OpenHands sandbox
+    containers (``openhands-runtime-*``) are skipped.
+
+    Args:
+        source: Service name, e.g. "ollama"
+
+    Returns:
+        Container name (``source`` itself when nothing matches)
+    """
+    result = subprocess.run(["docker", "ps", "--format", "{{.Names}}"],
+                            capture_output=True, text=True, check=False)
+    for name in result.stdout.split():
+        if (name == source or name.startswith(f"{source}-")) and "runtime" not in name:
+            return name
+    return source
+
+
+def follow_container(store: LogStore, source: str, container: str,
+                     stop: Optional[threading.Event] = None) -> int:
+    """
+    Stream ``docker logs --follow`` of a container into the store.
+
+    Resumes after the last stored timestamp, so restarts neither lose nor
+    duplicate lines.
+
+    Args:
+        store: Destination store
+        source: Source name in the store
+        container: Docker container name or id
+        stop: Set to end following after the next line
+
+    Returns:
+        Number of lines stored
+    """
+    command = ["docker", "logs", "--timestamps", "--follow"]
+    last = store.last_timestamp(source)
+    if last is not None:
+        command += ["--since", f"{last:.6f}"]
+    process = subprocess.Popen(command + [container], stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True, errors="replace")
+    stored = 0
+    try:
+        assert process.stdout is not None
+        for line in process.stdout:
+            stored += store.ingest(source, [line], skip_until=last)
+            if stop is not None and stop.is_set():
+                break
+    finally:
+        process.terminate()
+        process.wait()
+    return stored
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Indexed, compressed container log store")
+    parser.add_argument("--store", default=str(LOG_STORE_DIR), help="Store directory")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest", help="Follow container logs into the store")
+    ingest_parser.add_argument("--source", action="append", dest="sources",
+                               help="Source to follow (repeatable, default: ollama and openhands)")
+    ingest_parser.add_argument("--file", help="Import a saved log file (or - for stdin) instead")
+    ingest_parser.add_argument("--flush-seconds", type=float, default=5.0)
+    ingest_parser.add_argument("--max-days", type=float, default=None)
+    ingest_parser.add_argument("--max-gb", type=float, default=None)
+
+    query_parser = subparsers.add_parser("query", help="Search by time range and keyword")
+    query_parser.add_argument("keywords", nargs="*")
+    query_parser.add_argument("--source", action="append", dest="sources")
+    query_parser.add_argument("--since", default="1d", help="Start: 6h, 7d, ISO time or epoch")
+    query_parser.add_argument("--until", default=None)
+    query_parser.add_argument("--limit", type=int, default=None)
+    query_parser.add_argument("--stats", action="store_true", help="Print blocks read and timing")
+
+    retention_parser = subparsers.add_parser("retention", help="Drop old partitions")
+    retention_parser.add_argument("--max-days", type=float, default=None)
+    retention_parser.add_argument("--max-gb", type=float, default=None)
+
+    args = parser.parse_args(argv)
+    store = LogStore(Path(args.store))
+    max_bytes = int(args.max_gb * 1024 ** 3) if getattr(args, "max_gb", None) else None
+    max_age = args.max_days * 86400 if getattr(args, "max_days", None) else None
+
+    if args.command == "query":
+        stats = QueryStats()
+        end = parse_time(args.until) if args.until else float("inf")
+        for record in store.query(parse_time(args.since), end, args.keywords, args.sources,
+                                  args.limit, stats):
+            print(record.format())
+        if args.stats:
+            print(f"# {stats.lines_matched} lines, {stats.blocks_read}/{stats.blocks_total} blocks "
+                  f"({stats.bytes_read / 1024:.0f} KiB) from {stats.partitions} partitions "
+                  f"in {stats.seconds * 1000:.1f} ms", file=sys.stderr)
+        return 0
+
+    if args.command == "retention":
+        result = store.apply_retention(max_bytes, max_age)
+        print(f"Removed {len(result.removed)} partitions ({result.bytes_freed / 1024 ** 2:.1f} MB), "
+              f"{result.bytes_kept / 1024 ** 2:.1f} MB kept")
+        return 0
+
+    if args.file:
+        with (sys.stdin if args.file == "-" else open(args.file, encoding="utf-8", errors="replace")) as handle:
+            count = store.ingest((args.sources or ["imported"])[0], handle)
+        store.close()
+        print(f"Stored {count} lines")
+        return 0
+
+    stop = threading.Event()
+    threads = []
+    for source in args.sources or DEFAULT_SOURCES:
+        container = resolve_container(source)
+        print(f"Following {container} as '{source}'")
+        thread = threading.Thread(target=follow_container, args=(store, source, container, stop),
+                                  daemon=True)
+        thread.start()
+        threads.append(thread)
+    try:
+        last_retention = 0.0
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(args.flush_seconds)
+            store.flush()
+            if (max_bytes or max_age) and time.time() - last_retention > 3600:
+                store.apply_retention(max_bytes, max_age)
+                last_retention = time.time()
+    except KeyboardInterrupt:
+        stop.set()
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
@@ -0,0 +1,967 @@
+"""
+Supervisor that keeps MCP servers warm.
+
+Every agent that attaches an MCP server from ``mcp.json`` starts it with
+``npx -y <package>``: Node.js startup plus package resolution before the
+first tool call, for every session. The supervisor starts each configured
+server once (stdio servers as child processes, SSE servers as one
+long-lived connection), performs the MCP ``initialize`` handshake once and
+multiplexes any number of client sessions over it:
+- request ids are rewritten per server connection, so sessions can reuse
+  ids freely and each response reaches the session that asked; server
+  notifications go to every session
+- ``initialize`` and ``ping`` from clients are answered from the cached
+  handshake, so attaching a session costs no server round trip
+- ``npx -y <package>`` is resolved to the globally installed package
+  (scripts/setup-mcp-servers.sh) and run with ``node`` directly
+- a server that exits is restarted with exponential backoff; its in-flight
+  requests fail with an error and later requests wait for the restart
+- ``instances`` > 1 runs several copies of a server and sends each request
+  to the copy with the fewest requests in flight
+
+Clients attach over the SSE transport (``GET /<server>/sse``, then
+``POST /<server>/messages?session=...``), with a single JSON-RPC message
+per ``POST /<server>/mcp``, or through ``connect``, a stdio bridge that
+replaces the ``npx`` command in ``mcp.json``. ``GET /status`` reports each
+server's startup time, restarts and request latency (p50/p95).
+
+Usage:
+    python -m aicoding.mcp_supervisor serve --config ~/.openhands/mcp.json
+    python -m aicoding.mcp_supervisor status
+    # In mcp.json: "command": "python", "args": ["-m", "aicoding.mcp_supervisor", "connect", "filesystem"]
+    python -m aicoding.mcp_supervisor connect filesystem
+    python -m aicoding.mcp_supervisor measure filesystem --calls 20
+"""
+
+import argparse
+import functools
+import http.client
+import itertools
+import json
+import logging
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urljoin, urlparse
+
+import requests
+
+from aicoding.loadgen import percentile
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import MCP_CONFIG, MCP_SUPERVISOR_PORT
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+PROTOCOL_VERSION = "2024-11-05"
+CLIENT_INFO = {"name": "aicoding-mcp-supervisor", "version": "1.0"}
+
+# First start may include an npx download
+DEFAULT_START_TIMEOUT = 60.0
+DEFAULT_REQUEST_TIMEOUT = 300.0
+
+# Restart backoff: doubles per crash, reset once a server stays up
+BACKOFF_INITIAL_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+STABLE_SECONDS = 30.0
+
+SSE_KEEPALIVE_SECONDS = 15.0
+LATENCY_HISTORY = 500
+
+# JSON-RPC error codes used by the supervisor
+SERVER_UNAVAILABLE = -32000
+REQUEST_TIMED_OUT = -32001
+METHOD_NOT_FOUND = -32601
+
+
+@dataclass
+class ServerConfig:
+    """One entry of ``mcpServers`` in mcp.json."""
+
+    name: str
+    command: Optional[str] = None
+    args: List[str] = field(default_factory=list)
+    env: Dict[str, str] = field(default_factory=dict)
+    url: Optional[str] = None
+    instances: int = 1
+
+
+def load_config(path: Path) -> Dict[str, ServerConfig]:
+    """
+    Read MCP servers from an mcp.json file.
+
+    Accepts ``{"mcpServers": {name: {...}}}`` (as in docs/OPENHANDS_CONFIG.md)
+    and a list of entries with a ``name``.
+
+    Raises:
+        ValueError: An entry has neither ``command`` nor ``url``
+    """
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    entries = data.get("mcpServers", data) if isinstance(data, dict) else data
+    if isinstance(entries, list):
+        entries = {entry["name"]: entry for entry in entries}
+    servers = {}
+    for name, entry in entries.items():
+        if not entry.get("command") and not entry.get("url"):
+            raise ValueError(f"MCP server {name!r} needs a command or a url")
+        servers[name] = ServerConfig(name, entry.get("command"), list(entry.get("args") or []),
+                                     dict(entry.get("env") or {}), entry.get("url"),
+                                     int(entry.get("instances", 1)))
+    return servers
+
+
+@functools.lru_cache(maxsize=1)
+def npm_global_root() -> Optional[Path]:
+    """Directory of globally installed npm packages (None without npm)."""
+    try:
+        output = subprocess.run(["npm", "root", "-g"], capture_output=True, text=True, timeout=30, check=True)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return Path(output.stdout.strip())
+
+
+def resolve_command(config: ServerConfig, npm_root: Optional[Path] = None) -> List[str]:
+    """
+    Command line for a stdio server, skipping npx for installed packages.
+
+    ``npx -y @scope/server-x arg`` becomes ``node <global>/@scope/server-x/<bin> arg``
+    when the package is installed globally; anything else is run as given.
+    """
+    argv = [config.command] + config.args
+    if os.path.basename(config.command) != "npx":
+        return argv
+    rest = [arg for arg in config.args if arg not in ("-y", "--yes")]
+    if not rest or rest[0].startswith("-"):
+        return argv
+    package, package_args = rest[0], rest[1:]
+    root = npm_root or npm_global_root()
+    manifest = root / package / "package.json" if root else None
+    if manifest is None or not manifest.exists():
+        return argv
+    bin_entry = json.loads(manifest.read_text(encoding="utf-8")).get("bin")
+    if isinstance(bin_entry, dict):
+        bin_entry = bin_entry.get(package.split("/")[-1]) or next(iter(bin_entry.values()), None)
+    if not bin_entry:
+        return argv
+    return ["node", str(root / package / bin_entry)] + package_args
+
+
+# ============================================================================
+# Server Connections
+# ============================================================================
+
+MessageHandler = Callable[[Dict[str, Any]], None]
+
+
+class StdioConnection:
+    """A server run as a child process speaking JSON-RPC on stdin/stdout."""
+
+    def __init__(self, name: str, argv: List[str], env: Dict[str, str], on_message: MessageHandler,
+                 on_close: Callable[[], None]) -> None:
+        self.name = name
+        self.argv = argv
+        self.env = env
+        self.on_message = on_message
+        self.on_close = on_close
+        self.process: Optional[subprocess.Popen] = None
+        self._write_lock = threading.Lock()
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    def start(self) -> None:
+        self.process = subprocess.Popen(self.argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, env=dict(os.environ, **self.env))
+        threading.Thread(target=self._read, name=f"mcp-{self.name}-out", daemon=True).start()
+        threading.Thread(target=self._log_stderr, name=f"mcp-{self.name}-err", daemon=True).start()
+
+    def _read(self) -> None:
+        for line in self.process.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                logger.debug("[%s] ignoring non-JSON output: %r", self.name, line[:200])
+                continue
+            self.on_message(message)
+        self.process.wait()
+        self.on_close()
+
+    def _log_stderr(self) -> None:
+        for line in self.process.stderr:
+            logger.info("[%s] %s", self.name, line.decode("utf-8", "replace").rstrip())
+
+    def send(self, message: Dict[str, Any]) -> None:
+        data = json.dumps(message).encode("utf-8") + b"\n"
+        with self._write_lock:
+            self.process.stdin.write(data)
+            self.process.stdin.flush()
+
+    def close(self) -> None:
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def read_events(response: http.client.HTTPResponse) -> Iterator[Tuple[str, str]]:
+    """(event, data) pairs of a text/event-stream response until it ends."""
+    event, data = "message", []
+    while True:
+        line = response.readline()
+        if not line:
+            return
+        line = line.decode("utf-8").rstrip("\r\n")
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+
+
+class SseConnection:
+    """A server (or another supervisor) reached over the MCP SSE transport."""
+
+    def __init__(self, name: str, url: str, on_message: MessageHandler, on_close: Callable[[], None],
+                 timeout: float = DEFAULT_START_TIMEOUT) -> None:
+        self.name = name
+        self.url = url
+        self.on_message = on_message
+        self.on_close = on_close
+        self.timeout = timeout
+        self.endpoint = ""
+        self.pid = None
+        self.session = requests.Session()
+        self._connection: Optional[http.client.HTTPConnection] = None
+        self._sock: Optional[socket.socket] = None
+
+    def start(self) -> None:
+        parsed = urlparse(self.url)
+        self._connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=self.timeout)
+        self._connection.request("GET", parsed.path + (f"?{parsed.query}" if parsed.query else ""),
+                                 headers={"Accept": "text/event-stream"})
+        # The response takes the socket over when the stream is close-delimited
+        self._sock = self._connection.sock
+        response = self._connection.getresponse()
+        if response.status != 200:
+            raise ConnectionError(f"{self.url}: HTTP {response.status}")
+        events = read_events(response)
+        for event, data in events:
+            if event == "endpoint":
+                self.endpoint = urljoin(self.url, data)
+                break
+        if not self.endpoint:
+            raise ConnectionError(f"{self.url}: no endpoint event")
+        # Idle streams are kept alive by the server; no read timeout from here on
+        self._sock.settimeout(None)
+        threading.Thread(target=self._read, args=(events,), name=f"mcp-{self.name}-sse", daemon=True).start()
+
+    def _read(self, events: Iterator[Tuple[str, str]]) -> None:
+        try:
+            for event, data in events:
+                if event == "message":
+                    self.on_message(json.loads(data))
+        except (OSError, ValueError, http.client.HTTPException) as e:
+            logger.debug("[%s] SSE stream ended: %s", self.name, e)
+        self.on_close()
+
+    def send(self, message: Dict[str, Any]) -> None:
+        try:
+            response = self.session.post(self.endpoint, json=message, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise OSError(str(e)) from e
+        if response.status_code >= 400:
+            raise OSError(f"{self.endpoint}: HTTP {response.status_code}")
+
+    def close(self) -> None:
+        if self._connection is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._connection.close()
+        self.session.close()
+
+
+# ============================================================================
+# Multiplexing
+# ============================================================================
+
+def _error(request_id: Any, code: int, message: str) -> Dict[str, Any]:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+class Session:
+    """One client attached to a server; messages for it are queued."""
+
+    def __init__(self) -> None:
+        self.id = uuid.uuid4().hex
+        self.messages: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self.closed = False
+
+    def deliver(self, message: Optional[Dict[str, Any]]) -> None:
+        if not self.closed:
+            self.messages.put(message)
+
+
+@dataclass
+class _Instance:
+    slot: int
+    connection: Any = None
+    ready: bool = False
+    closing: bool = False
+    started: float = 0.0
+    in_flight: int = 0
+    handshake: Optional[Dict[str, Any]] = None
+    handshake_done: threading.Event = field(default_factory=threading.Event)
+
+
+@dataclass
+class _Pending:
+    session: Session
+    client_id: Any
+    instance: _Instance
+    sent: float
+
+
+@dataclass
+class ServerStats:
+    starts: int = 0
+    restarts: int = 0
+    requests: int = 0
+    errors: int = 0
+    startup_seconds: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_HISTORY))
+    latency_seconds: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_HISTORY))
+
+
+class McpServer:
+    """A supervised MCP server shared by many client sessions."""
+
+    def __init__(self, config: ServerConfig, start_timeout: float = DEFAULT_START_TIMEOUT,
+                 request_timeout: float = DEFAULT_REQUEST_TIMEOUT, npm_root: Optional[Path] = None) -> None:
+        """
+        Args:
+            config: Server entry from mcp.json
+            start_timeout: Longest wait for a server's ``initialize`` answer
+            request_timeout: Requests without an answer by then fail
+            npm_root: Global npm package directory (default: ``npm root -g``)
+        """
+        self.config = config
+        self.name = config.name
+        self.start_timeout = start_timeout
+        self.request_timeout = request_timeout
+        self.npm_root = npm_root
+        self.stats = ServerStats()
+        self.sessions: Dict[str, Session] = {}
+        self.initialize_result: Optional[Dict[str, Any]] = None
+        self._instances = [_Instance(slot) for slot in range(max(1, config.instances))]
+        self._failures = [0] * len(self._instances)
+        self._pending: Dict[int, _Pending] = {}
+        self._server_requests: Dict[str, Tuple[_Instance, Any]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._stopped = False
+
+    # -- lifecycle -----------------------------------------------------
+
+    def start(self, wait: bool = True) -> "McpServer":
+        """Launch every instance; with ``wait``, return once one is ready."""
+        self._stopped = False
+        for instance in self._instances:
+            threading.Thread(target=self._launch, args=(instance.slot,), daemon=True).start()
+        if wait:
+            self.wait_ready(self.start_timeout)
+        return self
+
+    def _connect(self, instance: _Instance) -> Any:
+        on_message = functools.partial(self._on_message, instance)
+        on_close = functools.partial(self._on_close, instance)
+        if self.config.url:
+            return SseConnection(self.name, self.config.url, on_message, on_close, self.start_timeout)
+        return StdioConnection(self.name, resolve_command(self.config, self.npm_root), self.config.env,
+                               on_message, on_close)
+
+    def _launch(self, slot: int) -> None:
+        if self._stopped:
+            return
+        instance = _Instance(slot, started=time.monotonic())
+        with self._lock:
+            self._instances[slot] = instance
+        try:
+            instance.connection = self._connect(instance)
+            instance.connection.start()
+            instance.connection.send({"jsonrpc": "2.0", "id": "supervisor-init", "method": "initialize",
+                                      "params": {"protocolVersion": PROTOCOL_VERSION, "capabilities": {},
+                                                 "clientInfo": CLIENT_INFO}})
+            if not instance.handshake_done.wait(self.start_timeout) or "result" not in (instance.handshake or {}):
+                raise ConnectionError(f"no initialize answer: {instance.handshake}")
+            instance.connection.send({"jsonrpc": "2.0", "method": "notifications/initialized"})
+        except (OSError, ConnectionError, http.client.HTTPException) as e:
+            logger.warning("[%s] start failed: %s", self.name, e)
+            # An exit during the handshake has already scheduled the restart
+            exited, instance.closing = instance.closing, True
+            if instance.connection is not None:
+                instance.connection.close()
+            if not exited:
+                self._schedule_restart(instance)
+            return
+        startup = time.monotonic() - instance.started
+        with self._lock:
+            self.initialize_result = instance.handshake["result"]
+            instance.ready = True
+            self.stats.starts += 1
+            self.stats.startup_seconds.append(startup)
+            self._ready.notify_all()
+        logger.info("[%s] ready in %.0f ms (pid %s)", self.name, startup * 1000, instance.connection.pid)
+
+    def _schedule_restart(self, instance: _Instance) -> None:
+        if self._stopped:
+            return
+        slot = instance.slot
+        if time.monotonic() - instance.started >= STABLE_SECONDS:
+            self._failures[slot] = 0
+        delay = min(BACKOFF_MAX_SECONDS, BACKOFF_INITIAL_SECONDS * 2 ** self._failures[slot])
+        self._failures[slot] += 1
+        logger.warning("[%s] restarting in %.1f s", self.name, delay)
+        timer = threading.Timer(delay, self._launch, args=(slot,))
+        timer.daemon = True
+        timer.start()
+
+    def _on_close(self, instance: _Instance) -> None:
+        if instance.closing:
+            return
+        instance.closing = True
+        with self._lock:
+            instance.ready = False
+            failed = [(upstream_id, pending) for upstream_id, pending in self._pending.items()
+                      if pending.instance is instance]
+            for upstream_id, _ in failed:
+                del self._pending[upstream_id]
+            self.stats.restarts += 1
+            self.stats.errors += len(failed)
+        instance.handshake_done.set()
+        logger.warning("[%s] exited with %d request(s) in flight", self.name, len(failed))
+        for _, pending in failed:
+            pending.session.deliver(_error(pending.client_id, SERVER_UNAVAILABLE,
+                                           f"MCP server {self.name} exited; it is being restarted"))
+        self._schedule_restart(instance)
+
+    def stop(self) -> None:
+        self._stopped = True
+        with self._lock:
+            instances = list(self._instances)
+            sessions = list(self.sessions.values())
+        for instance in instances:
+            instance.closing = True
+            if instance.connection is not None:
+                instance.connection.close()
+        for session in sessions:
+            session.deliver(None)
+
+    def wait_ready(self, timeout: float) -> bool:
+        with self._ready:
+            return self._ready.wait_for(lambda: any(i.ready for i in self._instances) or self._stopped, timeout) \
+                and not self._stopped
+
+    # -- sessions ------------------------------------------------------
+
+    def open_session(self) -> Session:
+        session = Session()
+        with self._lock:
+            self.sessions[session.id] = session
+        return session
+
+    def close_session(self, session: Session) -> None:
+        """Detach a client; its unanswered requests are cancelled on the server."""
+        session.closed = True
+        with self._lock:
+            self.sessions.pop(session.id, None)
+            abandoned = [(upstream_id, pending) for upstream_id, pending in self._pending.items()
+                         if pending.session is session]
+            for upstream_id, pending in abandoned:
+                del self._pending[upstream_id]
+                pending.instance.in_flight -= 1
+        for upstream_id, pending in abandoned:
+            self._send(pending.instance, {"jsonrpc": "2.0", "method": "notifications/cancelled",
+                                          "params": {"requestId": upstream_id, "reason": "client detached"}})
+
+    def _send(self, instance: _Instance, message: Dict[str, Any]) -> bool:
+        try:
+            instance.connection.send(message)
+            return True
+        except OSError as e:
+            logger.warning("[%s] send failed: %s", self.name, e)
+            return False
+
+    def submit(self, session: Session, message: Dict[str, Any]) -> None:
+        """Handle one JSON-RPC message from a client session."""
+        method = message.get("method")
+        if method is None:
+            # The client answering a request the server sent
+            with self._lock:
+                target = self._server_requests.pop(str(message.get("id")), None)
+            if target is not None:
+                self._send(target[0], dict(message, id=target[1]))
+            return
+        if "id" not in message:
+            self._notify(session, message)
+            return
+        client_id = message["id"]
+        if method in ("initialize", "ping"):
+            if method == "initialize" and not self.wait_ready(self.start_timeout):
+                session.deliver(_error(client_id, SERVER_UNAVAILABLE, f"MCP server {self.name} is not running"))
+                return
+            session.deliver({"jsonrpc": "2.0", "id": client_id,
+                             "result": self.initialize_result if method == "initialize" else {}})
+            return
+        with self._ready:
+            self._ready.wait_for(lambda: any(i.ready for i in self._instances) or self._stopped,
+                                 self.start_timeout)
+            ready = [instance for instance in self._instances if instance.ready]
+            if not ready:
+                session.deliver(_error(client_id, SERVER_UNAVAILABLE, f"MCP server {self.name} is not running"))
+                return
+            instance = min(ready, key=lambda i: i.in_flight)
+            upstream_id = next(self._ids)
+            self._pending[upstream_id] = _Pending(session, client_id, instance, time.perf_counter())
+            instance.in_flight += 1
+            self.stats.requests += 1
+        if not self._send(instance, dict(message, id=upstream_id)):
+            with self._lock:
+                dropped = self._pending.pop(upstream_id, None)
+            if dropped is not None:
+                session.deliver(_error(client_id, SERVER_UNAVAILABLE, f"MCP server {self.name} is not reachable"))
+
+    def _notify(self, session: Session, message: Dict[str, Any]) -> None:
+        method = message["method"]
+        if method == "notifications/initialized":
+            return
+        with self._lock:
+            instances = [instance for instance in self._instances if instance.ready]
+            if method == "notifications/cancelled":
+                request_id = (message.get("params") or {}).get("requestId")
+                for upstream_id, pending in self._pending.items():
+                    if pending.session is session and pending.client_id == request_id:
+                        message = dict(message, params=dict(message["params"], requestId=upstream_id))
+                        instances = [pending.instance]
+                        break
+                else:
+                    return
+        for instance in instances:
+            self._send(instance, message)
+
+    def call(self, method: str, params: Optional[Dict[str, Any]] = None,
+             timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Send one request on a short-lived session and return the response message."""
+        session = self.open_session()
+        try:
+            self.submit(session, {"jsonrpc": "2.0", "id": 1, "method": method, "params": params or {}})
+            deadline = time.monotonic() + (timeout or self.request_timeout)
+            while True:
+                message = session.messages.get(timeout=max(0.0, deadline - time.monotonic()))
+                if message is None:
+                    return _error(1, SERVER_UNAVAILABLE, "supervisor stopped")
+                if message.get("id") == 1 and "method" not in message:
+                    return message
+        except queue.Empty:
+            return _error(1, REQUEST_TIMED_OUT, f"no answer from {self.name}")
+        finally:
+            self.close_session(session)
+
+    # -- server messages -----------------------------------------------
+
+    def _on_message(self, instance: _Instance, message: Dict[str, Any]) -> None:
+        if not instance.ready and message.get("id") == "supervisor-init":
+            instance.handshake = message
+            instance.handshake_done.set()
+            return
+        if "method" not in message:
+            with self._lock:
+                pending = self._pending.pop(message.get("id"), None)
+                if pending is None:
+                    return
+                instance.in_flight -= 1
+                self.stats.latency_seconds.append(time.perf_counter() - pending.sent)
+                if "error" in message:
+                    self.stats.errors += 1
+            pending.session.deliver(dict(message, id=pending.client_id))
+            return
+        with self._lock:
+            sessions = list(self.sessions.values())
+            if "id" in message:
+                # Server-to-client request (sampling, roots): ask the session with the latest request
+                asking = [p.session for p in self._pending.values() if p.instance is instance]
+                target = asking[-1] if asking else (sessions[-1] if sessions else None)
+                client_id = f"{self.name}-{next(self._ids)}"
+                if target is not None:
+                    self._server_requests[client_id] = (instance, message["id"])
+        if "id" not in message:
+            for session in sessions:
+                session.deliver(message)
+        elif target is None:
+            self._send(instance, _error(message["id"], METHOD_NOT_FOUND, "no client session attached"))
+        else:
+            target.deliver(dict(message, id=client_id))
+
+    def expire(self) -> None:
+        """Fail requests that have waited longer than ``request_timeout``."""
+        now = time.perf_counter()
+        with self._lock:
+            expired = [(upstream_id, pending) for upstream_id, pending in self._pending.items()
+                       if now - pending.sent > self.request_timeout]
+            for upstream_id, pending in expired:
+                del self._pending[upstream_id]
+                pending.instance.in_flight -= 1
+                self.stats.errors += 1
+        for _, pending in expired:
+            pending.session.deliver(_error(pending.client_id, REQUEST_TIMED_OUT,
+                                           f"no answer from {self.name} in {self.request_timeout:.0f} s"))
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            instances = list(self._instances)
+            stats = self.stats
+            return {
+                "transport": "sse" if self.config.url else "stdio",
+                "ready": sum(instance.ready for instance in instances),
+                "instances": len(instances),
+                "pids": [instance.connection.pid for instance in instances
+                         if instance.ready and instance.connection is not None],
+                "sessions": len(self.sessions),
+                "starts": stats.starts, "restarts": stats.restarts,
+                "requests": stats.requests, "errors": stats.errors,
+                "startup_ms": stats.startup_seconds[-1] * 1000 if stats.startup_seconds else None,
+                "latency_ms": {"p50": percentile(stats.latency_seconds, 0.5) * 1000,
+                               "p95": percentile(stats.latency_seconds, 0.95) * 1000},
+            }
+
+
+# ============================================================================
+# HTTP Transport
+# ============================================================================
+
+class _SupervisorHandler(BaseHTTPRequestHandler):
+    server: "_SupervisorHTTPServer"
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, payload: Any, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self.send_response(status)
+        if body:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self) -> Tuple[Optional[McpServer], str, Dict[str, str]]:
+        url = urlparse(self.path)
+        name, _, endpoint = url.path.strip("/").partition("/")
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        return self.server.supervisor.servers.get(name), endpoint, query
+
+    def _read_json(self) -> Optional[Dict[str, Any]]:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return None
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path == "/status":
+            self._send_json(self.server.supervisor.status())
+            return
+        server, endpoint, _ = self._route()
+        if server is None or endpoint != "sse":
+            self._send_json({"error": "not found"}, 404)
+            return
+        session = server.open_session()
+        self.close_connection = True
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.write(f"event: endpoint\ndata: /{server.name}/messages?session={session.id}\n\n".encode())
+            self.wfile.flush()
+            while True:
+                try:
+                    message = session.messages.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                if message is None:
+                    return
+                self.wfile.write(f"event: message\ndata: {json.dumps(message)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            server.close_session(session)
+
+    def do_POST(self) -> None:  # noqa: N802
+        server, endpoint, query = self._route()
+        message = self._read_json()
+        if server is None or endpoint not in ("messages", "mcp"):
+            self._send_json({"error": "not found"}, 404)
+            return
+        if not isinstance(message, dict):
+            self._send_json(_error(None, -32700, "parse error"), 400)
+            return
+        if endpoint == "messages":
+            session = server.sessions.get(query.get("session", ""))
+            if session is None:
+                self._send_json({"error": "unknown session"}, 404)
+                return
+            server.submit(session, message)
+            self._send_json(None, 202)
+            return
+        if "id" not in message or "method" not in message:
+            self._send_json(None, 202)
+            return
+        response = server.call(message["method"], message.get("params"))
+        self._send_json(dict(response, id=message["id"]))
+
+
+class _SupervisorHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    supervisor: "McpSupervisor"
+
+
+class McpSupervisor:
+    """All servers from mcp.json behind one local HTTP endpoint."""
+
+    def __init__(self, configs: Dict[str, ServerConfig], start_timeout: float = DEFAULT_START_TIMEOUT,
+                 request_timeout: float = DEFAULT_REQUEST_TIMEOUT, npm_root: Optional[Path] = None) -> None:
+        self.servers = {name: McpServer(config, start_timeout, request_timeout, npm_root)
+                        for name, config in configs.items()}
+        self._http: Optional[_SupervisorHTTPServer] = None
+        self._stop = threading.Event()
+
+    @property
+    def url(self) -> str:
+        host, port = self._http.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _expire_loop(self) -> None:
+        while not self._stop.wait(1.0):
+            for server in self.servers.values():
+                server.expire()
+
+    def start(self, host: str = "127.0.0.1", port: int = 0, wait: bool = True) -> "McpSupervisor":
+        """Launch the servers (concurrently) and serve the HTTP transport."""
+        for server in self.servers.values():
+            server.start(wait=False)
+        if wait:
+            for server in self.servers.values():
+                if not server.wait_ready(server.start_timeout):
+                    logger.warning("[%s] not ready after %.0f s", server.name, server.start_timeout)
+        self._stop.clear()
+        self._http = _SupervisorHTTPServer((host, port), _SupervisorHandler)
+        self._http.supervisor = self
+        threading.Thread(target=self._http.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        threading.Thread(target=self._expire_loop, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        for server in self.servers.values():
+            server.stop()
+        if self._http is not None:
+            self._http.shutdown()
+            self._http.server_close()
+            self._http = None
+
+    def status(self) -> Dict[str, Any]:
+        return {name: server.status() for name, server in self.servers.items()}
+
+    def __enter__(self) -> "McpSupervisor":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+# ============================================================================
+# Stdio Bridge and Measurement
+# ============================================================================
+
+def bridge(url: str, stdin: Any = None, stdout: Any = None) -> int:
+    """
+    Relay an MCP client on stdio to a supervised server's SSE endpoint.
+
+    Args:
+        url: ``http://127.0.0.1:<port>/<server>/sse``
+        stdin: Client messages, one JSON per line (default: sys.stdin)
+        stdout: Where server messages are written (default: sys.stdout)
+    """
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    closed = threading.Event()
+    answered = threading.Condition()
+    unanswered = set()
+
+    def write(message: Dict[str, Any]) -> None:
+        with answered:
+            stdout.write(json.dumps(message) + "\n")
+            stdout.flush()
+            if "method" not in message:
+                unanswered.discard(json.dumps(message.get("id")))
+                answered.notify_all()
+
+    connection = SseConnection("bridge", url, write, closed.set)
+    connection.start()
+    try:
+        for line in stdin:
+            if closed.is_set():
+                return 1
+            if not line.strip():
+                continue
+            message = json.loads(line)
+            if "method" in message and "id" in message:
+                with answered:
+                    unanswered.add(json.dumps(message["id"]))
+            connection.send(message)
+        # Input ended (e.g. a piped request): deliver the outstanding answers first
+        with answered:
+            answered.wait_for(lambda: not unanswered or closed.is_set(), DEFAULT_REQUEST_TIMEOUT)
+    finally:
+        connection.close()
+    return 0
+
+
+def measure(config: ServerConfig, calls: int = 10, method: str = "tools/list",
+            params: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+    """
+    Latency of ``calls`` requests with a fresh server per call (the npx way)
+    and through one supervised server.
+
+    Returns:
+        p50/p95 milliseconds for both, and the supervised server's startup time
+    """
+    cold = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        server = McpServer(config).start()
+        try:
+            server.call(method, params)
+        finally:
+            server.stop()
+        cold.append(time.perf_counter() - started)
+    server = McpServer(config).start()
+    warm = []
+    try:
+        for _ in range(calls):
+            started = time.perf_counter()
+            server.call(method, params)
+            warm.append(time.perf_counter() - started)
+        startup = server.stats.startup_seconds[0] if server.stats.startup_seconds else 0.0
+    finally:
+        server.stop()
+    return {"cold_p50_ms": percentile(cold, 0.5) * 1000, "cold_p95_ms": percentile(cold, 0.95) * 1000,
+            "warm_p50_ms": percentile(warm, 0.5) * 1000, "warm_p95_ms": percentile(warm, 0.95) * 1000,
+            "startup_ms": startup * 1000}
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Keep MCP servers warm and share them between sessions")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{MCP_SUPERVISOR_PORT}",
+                        help="Running supervisor (status, connect)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Start the configured servers and serve them")
+    serve.add_argument("--config", type=Path, default=MCP_CONFIG)
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=MCP_SUPERVISOR_PORT)
+    sub.add_parser("status", help="Startup time, restarts and latency per server")
+    connect = sub.add_parser("connect", help="stdio bridge to a supervised server (for mcp.json)")
+    connect.add_argument("server")
+    measure_parser = sub.add_parser("measure", help="Compare per-call server starts with a warm server")
+    measure_parser.add_argument("server")
+    measure_parser.add_argument("--config", type=Path, default=MCP_CONFIG)
+    measure_parser.add_argument("--calls", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    # stdout carries the protocol when bridging
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+
+    if args.command == "status":
+        try:
+            print(json.dumps(requests.get(f"{args.url}/status", timeout=5).json(), indent=2))
+        except requests.RequestException as e:
+            print(f"MCP supervisor not reachable at {args.url}: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    if args.command == "connect":
+        try:
+            return bridge(f"{args.url}/{args.server}/sse")
+        except (OSError, ConnectionError, http.client.HTTPException) as e:
+            print(f"MCP supervisor not reachable at {args.url}: {e}", file=sys.stderr)
+            return 1
+
+    try:
+        configs = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read {args.config}: {e}", file=sys.stderr)
+        return 1
+
+    if args.command == "measure":
+        if args.server not in configs:
+            print(f"No MCP server named {args.server} in {args.config}", file=sys.stderr)
+            return 1
+        result = measure(configs[args.server], args.calls)
+        print(f"Server startup: {result['startup_ms']:.0f} ms")
+        print(f"Fresh server per call: p50 {result['cold_p50_ms']:.0f} ms, p95 {result['cold_p95_ms']:.0f} ms")
+        print(f"Supervised server:     p50 {result['warm_p50_ms']:.1f} ms, p95 {result['warm_p95_ms']:.1f} ms")
+        return 0
+
+    supervisor = McpSupervisor(configs).start(args.host, args.port)
+    for name, status in supervisor.status().items():
+        print(f"  {name}: {status['ready']}/{status['instances']} ready, "
+              f"{supervisor.url}/{name}/sse")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
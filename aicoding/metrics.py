@@ -0,0 +1,785 @@
+"""
+OpenMetrics exporter for the AI Coding Platform.
+
+One lightweight process serves ``/metrics`` for Prometheus (or any
+OpenMetrics scraper) and replaces the hand-made performance report in
+docs/MAINTENANCE.md. Covered:
+- Ollama: reachability, installed models, model residency from
+  ``/api/ps`` (loaded, size, VRAM, time until unload), API probe latency and
+  request latency histograms parsed from Ollama's ``[GIN]`` access log
+  lines in the log store (aicoding.log_store)
+- OpenHands: UI reachability and response time
+- Containers: restart counts and running state from ``docker inspect``
+- Host: memory, swap, load and disk usage
+- Workspace: file-scan and ``git status`` timings per project
+
+Every probe runs in its own background thread on its own interval and
+writes into the registry; a scrape only renders the registry (cached until
+a value changes), so it never waits for a slow check. Probe health is
+exported as ``aicoding_probe_*`` series.
+
+Usage:
+    python -m aicoding.metrics --port 9105
+    curl -s localhost:9105/metrics
+"""
+
+import argparse
+import logging
+import math
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import requests
+
+from aicoding.profiling import setup_from_environment, timer
+from aicoding.settings import (
+    LOG_STORE_DIR,
+    METRICS_PORT,
+    OLLAMA_HOST,
+    OPENHANDS_URL,
+    PROJECTS_DIR,
+    WORKSPACE_DIR,
+)
+from aicoding.tracing import span
+from aicoding.workspace import iter_files
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# Seconds; wide enough for CPU inference (model loads take tens of seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0, 60.0, 120.0, 300.0)
+OPERATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Probe intervals in seconds
+FAST_INTERVAL = 15.0
+SLOW_INTERVAL = 300.0
+
+PLATFORM_CONTAINERS = ("ollama", "openhands")
+
+_NAME_RE = re.compile(r"^[a-zA-Z_:][a-zA-Z0-9_:]*$")
+
+
+# ============================================================================
+# Metric Registry
+# ============================================================================
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "unknown"
+
+    def __init__(self, registry: "Registry", name: str, documentation: str,
+                 labelnames: Sequence[str] = (), unit: str = "") -> None:
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Invalid metric name: {name!r}")
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.unit = unit
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        lines = [f"# TYPE {self.name} {self.kind}"]
+        if self.unit:
+            lines.append(f"# UNIT {self.name} {self.unit}")
+        lines.append(f"# HELP {self.name} {_escape(self.documentation)}")
+        return lines
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic counter, exposed as ``<name>_total``."""
+
+    kind = "counter"
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._registry.lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+            self._registry.version += 1
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._registry.lock:
+            self._values[key] = float(value)
+            self._registry.version += 1
+
+    def replace(self, series: Iterable[Tuple[Dict[str, str], float]]) -> None:
+        """
+        Swap in a complete set of series atomically.
+
+        Series missing from ``series`` disappear, e.g. a model that was
+        unloaded, instead of reporting a stale value forever.
+        """
+        values = {self._key(labels): float(value) for labels, value in series}
+        with self._registry.lock:
+            self._values = values
+            self._registry.version += 1
+
+    def value(self, **labels: str) -> Optional[float]:
+        return self._values.get(self._key(labels))
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed distribution with ``_bucket``, ``_count`` and ``_sum``."""
+
+    kind = "histogram"
+
+    def __init__(self, *args: Any, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(float(b) for b in buckets if b != math.inf)) + (math.inf,)
+        # Per series: [per-bucket counts..., sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._registry.lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 1)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-1] += value
+            self._registry.version += 1
+
+    def count(self, **labels: str) -> int:
+        state = self._values.get(self._key(labels))
+        return int(sum(state[:-1])) if state else 0
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for key, state in sorted(self._values.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"' if bound != math.inf else 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} "
+                             f"{_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+        return lines
+
+
+class Registry:
+    """Holds metrics and renders them in OpenMetrics text format."""
+
+    def __init__(self) -> None:
+        self.lock = threading.RLock()
+        self.version = 0
+        self._metrics: Dict[str, _Metric] = {}
+        self._rendered: Tuple[int, bytes] = (-1, b"")
+
+    def _register(self, metric: _Metric) -> Any:
+        with self.lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            self.version += 1
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              unit: str = "") -> Gauge:
+        return self._register(Gauge(self, name, documentation, labelnames, unit))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS, unit: str = "") -> Histogram:
+        return self._register(Histogram(self, name, documentation, labelnames, unit=unit, buckets=buckets))
+
+    def render(self) -> bytes:
+        """Exposition text; re-rendered only when a value changed since the last scrape."""
+        with self.lock:
+            if self._rendered[0] == self.version:
+                return self._rendered[1]
+            lines: List[str] = []
+            for name in sorted(self._metrics):
+                lines.extend(self._metrics[name].render())
+            lines.append("# EOF")
+            body = ("\n".join(lines) + "\n").encode("utf-8")
+            self._rendered = (self.version, body)
+            return body
+
+
+# ============================================================================
+# Probes
+# ============================================================================
+
+class Probe:
+    """A periodic check that writes its results into the registry."""
+
+    name = "probe"
+
+    def __init__(self, registry: Registry, interval: float = FAST_INTERVAL) -> None:
+        self.registry = registry
+        self.interval = interval
+
+    def collect(self) -> None:
+        raise NotImplementedError
+
+
+class OllamaProbe(Probe):
+    """Reachability, installed models and model residency from the Ollama API."""
+
+    name = "ollama"
+
+    def __init__(self, registry: Registry, base_url: str = OLLAMA_HOST,
+                 interval: float = FAST_INTERVAL, timeout: float = 5.0) -> None:
+        super().__init__(registry, interval)
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.up = registry.gauge("aicoding_ollama_up", "Whether the Ollama API answered the last probe")
+        self.installed = registry.gauge("aicoding_ollama_installed_models", "Models returned by /api/tags")
+        self.latency = registry.histogram("aicoding_ollama_api_latency_seconds",
+                                          "Latency of Ollama API probes", ["endpoint"], unit="seconds")
+        self.loaded = registry.gauge("aicoding_ollama_model_loaded",
+                                     "1 for each model resident in memory (/api/ps)", ["model"])
+        self.size = registry.gauge("aicoding_ollama_model_size_bytes",
+                                   "Memory used by a resident model", ["model"], unit="bytes")
+        self.vram = registry.gauge("aicoding_ollama_model_vram_bytes",
+                                   "VRAM used by a resident model", ["model"], unit="bytes")
+        self.expires = registry.gauge("aicoding_ollama_model_expires_in_seconds",
+                                      "Seconds until a resident model is unloaded", ["model"], unit="seconds")
+
+    def _get(self, endpoint: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        response = self.session.get(f"{self.base_url}{endpoint}", timeout=self.timeout)
+        self.latency.observe(time.perf_counter() - started, endpoint=endpoint)
+        response.raise_for_status()
+        return response.json()
+
+    def collect(self) -> None:
+        try:
+            tags = self._get("/api/tags")
+            running = self._get("/api/ps")
+        except (requests.RequestException, ValueError):
+            self.up.set(0)
+            raise
+        self.up.set(1)
+        self.installed.set(len(tags.get("models", [])))
+        now = time.time()
+        models = running.get("models", [])
+        self.loaded.replace(({"model": m["name"]}, 1) for m in models)
+        self.size.replace(({"model": m["name"]}, m.get("size", 0)) for m in models)
+        self.vram.replace(({"model": m["name"]}, m.get("size_vram", 0)) for m in models)
+        self.expires.replace(({"model": m["name"]}, max(0.0, _parse_rfc3339(m["expires_at"]) - now))
+                             for m in models if m.get("expires_at"))
+
+
+def _parse_rfc3339(value: str) -> float:
+    """Epoch seconds of an RFC 3339 time such as Ollama's ``expires_at``."""
+    # Go prints up to nanoseconds; fromisoformat takes at most microseconds
+    value = re.sub(r"(\.\d{6})\d+", r"\1", value.replace("Z", "+00:00"))
+    return datetime.fromisoformat(value).timestamp()
+
+
+# Ollama access log: [GIN] 2025/11/20 - 10:00:00 | 200 |  1.234567s | 172.18.0.5 | POST "/api/chat"
+_GIN_RE = re.compile(r'\[GIN\][^|]*\|\s*(\d{3})\s*\|\s*([0-9.hmsµun]+)\s*\|[^|]*\|\s*[A-Z]+\s+"([^"?]+)')
+_DURATION_RE = re.compile(r"([0-9.]+)(ns|us|µs|ms|h|m|s)")
+_DURATION_UNITS = {"ns": 1e-9, "us": 1e-6, "µs": 1e-6, "ms": 1e-3, "s": 1.0, "m": 60.0, "h": 3600.0}
+_KNOWN_ENDPOINTS = {"/api/chat", "/api/generate", "/api/embed", "/api/embeddings", "/api/tags",
+                    "/api/ps", "/api/show", "/api/pull", "/api/version", "/v1/chat/completions",
+                    "/v1/completions", "/v1/embeddings", "/v1/models"}
+
+
+def parse_go_duration(value: str) -> float:
+    """
+    Seconds in a Go ``time.Duration`` string as printed by gin.
+
+    Args:
+        value: e.g. "1.234567s", "12.5ms", "345µs", "1m2.5s"
+
+    Returns:
+        Seconds
+
+    Raises:
+        ValueError: If nothing could be parsed
+    """
+    parts = _DURATION_RE.findall(value)
+    if not parts or "".join(a + b for a, b in parts) != value:
+        raise ValueError(f"Invalid duration: {value!r}")
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def parse_gin_line(message: str) -> Optional[Tuple[str, str, float]]:
+    """
+    Extract (endpoint, status, seconds) from an Ollama ``[GIN]`` log line.
+
+    Unknown paths are reported as "other" to bound label cardinality.
+    """
+    match = _GIN_RE.search(message)
+    if not match:
+        return None
+    status, duration, path = match.groups()
+    try:
+        seconds = parse_go_duration(duration)
+    except ValueError:
+        return None
+    return (path if path in _KNOWN_ENDPOINTS else "other"), status, seconds
+
+
+class OllamaRequestLogProbe(Probe):
+    """Latency histograms of real Ollama requests, from the log store."""
+
+    name = "ollama_requests"
+
+    def __init__(self, registry: Registry, store: Any, source: str = "ollama",
+                 interval: float = FAST_INTERVAL, since: Optional[float] = None) -> None:
+        """
+        Args:
+            registry: Metric registry
+            store: aicoding.log_store.LogStore being fed by ``log_store ingest``
+            source: Log source name of the Ollama container
+            interval: Seconds between reads
+            since: Only count lines after this time (default: now)
+        """
+        super().__init__(registry, interval)
+        self.store = store
+        self.source = source
+        self.cursor = time.time() if since is None else since
+        self.duration = registry.histogram(
+            "aicoding_ollama_request_duration_seconds",
+            "Ollama request latency from its access log", ["endpoint", "status"], unit="seconds")
+        self.requests = registry.counter("aicoding_ollama_requests", "Ollama requests seen in its access log",
+                                         ["endpoint", "status"])
+
+    def collect(self) -> None:
+        records = self.store.query(start=self.cursor, keywords=["GIN"], sources=[self.source])
+        for record in records:
+            if record.timestamp <= self.cursor:
+                continue
+            parsed = parse_gin_line(record.message)
+            if parsed is not None:
+                endpoint, status, seconds = parsed
+                self.duration.observe(seconds, endpoint=endpoint, status=status)
+                self.requests.inc(endpoint=endpoint, status=status)
+        if records:
+            self.cursor = max(self.cursor, records[-1].timestamp)
+
+
+class HttpProbe(Probe):
+    """Reachability and response time of an HTTP endpoint (the OpenHands UI)."""
+
+    def __init__(self, registry: Registry, name: str, url: str, interval: float = FAST_INTERVAL,
+                 timeout: float = 5.0, healthy_statuses: Sequence[int] = (200, 302)) -> None:
+        super().__init__(registry, interval)
+        self.name = name
+        self.url = url
+        self.timeout = timeout
+        self.healthy_statuses = set(healthy_statuses)
+        self.session = requests.Session()
+        self.up = registry.gauge(f"aicoding_{name}_up", f"Whether {url} answered with a healthy status")
+        self.response = registry.gauge(f"aicoding_{name}_response_seconds",
+                                       f"Response time of the last request to {url}", unit="seconds")
+        self.latency = registry.histogram(f"aicoding_{name}_response_latency_seconds",
+                                          f"Response times of {url}", unit="seconds")
+
+    def collect(self) -> None:
+        started = time.perf_counter()
+        try:
+            response = self.session.get(self.url, timeout=self.timeout, allow_redirects=False)
+        except requests.RequestException:
+            self.up.set(0)
+            raise
+        elapsed = time.perf_counter() - started
+        self.response.set(elapsed)
+        self.latency.observe(elapsed)
+        self.up.set(1 if response.status_code in self.healthy_statuses else 0)
+
+
+def parse_docker_inspect(output: str, prefixes: Sequence[str] = PLATFORM_CONTAINERS
+                         ) -> List[Tuple[str, int, bool]]:
+    """
+    Parse ``docker inspect --format '{{.Name}}|{{.RestartCount}}|{{.State.Running}}'``.
+
+    Only platform containers are kept (OpenHands sandboxes come and go).
+
+    Returns:
+        (container name, restart count, running) tuples
+    """
+    containers = []
+    for line in output.splitlines():
+        parts = line.strip().split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[0].lstrip("/")
+        service = next((p for p in prefixes if name == p or name.startswith(f"{p}-")), None)
+        if service is None or "runtime" in name:
+            continue
+        containers.append((name, int(parts[1]), parts[2] == "true"))
+    return containers
+
+
+class DockerProbe(Probe):
+    """Restart counts and running state of the platform containers."""
+
+    name = "docker"
+
+    def __init__(self, registry: Registry, interval: float = FAST_INTERVAL,
+                 runner: Callable[[List[str]], str] = None) -> None:
+        super().__init__(registry, interval)
+        self.runner = runner or _run_command
+        self.restarts = registry.gauge("aicoding_container_restarts",
+                                       "Automatic restarts reported by Docker", ["container"])
+        self.running = registry.gauge("aicoding_container_running", "1 if the container is running",
+                                      ["container"])
+
+    def collect(self) -> None:
+        names = self.runner(["docker", "ps", "-aq"]).split()
+        output = self.runner(["docker", "inspect", "--format",
+                              "{{.Name}}|{{.RestartCount}}|{{.State.Running}}"] + names) if names else ""
+        containers = parse_docker_inspect(output)
+        self.restarts.replace(({"container": name}, restarts) for name, restarts, _ in containers)
+        self.running.replace(({"container": name}, 1 if running else 0) for name, _, running in containers)
+
+
+def _run_command(command: List[str]) -> str:
+    return subprocess.run(command, capture_output=True, text=True, check=True, timeout=30).stdout
+
+
+def read_meminfo(path: str = "/proc/meminfo") -> Dict[str, int]:
+    """Bytes per field of /proc/meminfo (empty when unavailable)."""
+    values = {}
+    try:
+        with open(path, encoding="ascii") as handle:
+            for line in handle:
+                key, _, rest = line.partition(":")
+                fields = rest.split()
+                if fields:
+                    values[key] = int(fields[0]) * (1024 if fields[1:] == ["kB"] else 1)
+    except OSError:
+        pass
+    return values
+
+
+class HostProbe(Probe):
+    """Memory, swap, load average and disk usage."""
+
+    name = "host"
+
+    def __init__(self, registry: Registry, paths: Sequence[Path] = (Path("/"), WORKSPACE_DIR),
+                 interval: float = FAST_INTERVAL, meminfo_path: str = "/proc/meminfo") -> None:
+        super().__init__(registry, interval)
+        self.paths = list(paths)
+        self.meminfo_path = meminfo_path
+        self.memory = registry.gauge("aicoding_memory_bytes", "Host memory from /proc/meminfo",
+                                     ["kind"], unit="bytes")
+        self.load = registry.gauge("aicoding_load_average", "Load average", ["window"])
+        self.disk = registry.gauge("aicoding_filesystem_bytes", "Filesystem capacity and free space",
+                                   ["path", "kind"], unit="bytes")
+
+    def collect(self) -> None:
+        info = read_meminfo(self.meminfo_path)
+        series = []
+        for kind, key in (("total", "MemTotal"), ("available", "MemAvailable"),
+                          ("swap_total", "SwapTotal"), ("swap_free", "SwapFree")):
+            if key in info:
+                series.append(({"kind": kind}, info[key]))
+        self.memory.replace(series)
+        try:
+            load = os.getloadavg()
+            self.load.replace(({"window": w}, v) for w, v in zip(("1m", "5m", "15m"), load))
+        except OSError:
+            pass
+        disks = []
+        for path in self.paths:
+            try:
+                usage = shutil.disk_usage(path)
+            except OSError:
+                continue
+            disks.append(({"path": str(path), "kind": "size"}, usage.total))
+            disks.append(({"path": str(path), "kind": "free"}, usage.free))
+        self.disk.replace(disks)
+
+
+class WorkspaceProbe(Probe):
+    """Times a file scan and ``git status`` in each workspace project."""
+
+    name = "workspace"
+
+    def __init__(self, registry: Registry, projects_dir: Path = PROJECTS_DIR,
+                 interval: float = SLOW_INTERVAL, max_projects: int = 50) -> None:
+        super().__init__(registry, interval)
+        self.projects_dir = Path(projects_dir)
+        self.max_projects = max_projects
+        self.operation = registry.histogram("aicoding_workspace_operation_seconds",
+                                            "Duration of workspace operations", ["operation"],
+                                            buckets=OPERATION_BUCKETS, unit="seconds")
+        self.totals = registry.gauge("aicoding_workspace", "Workspace size", ["kind"])
+
+    def collect(self) -> None:
+        if not self.projects_dir.is_dir():
+            self.totals.replace([])
+            return
+        projects = sorted(p for p in self.projects_dir.iterdir() if p.is_dir())[:self.max_projects]
+        files = size = 0
+        for project in projects:
+            started = time.perf_counter()
+            for _, stat in iter_files(project):
+                files += 1
+                size += stat.st_size
+            self.operation.observe(time.perf_counter() - started, operation="scan")
+            if (project / ".git").exists():
+                started = time.perf_counter()
+                subprocess.run(["git", "-C", str(project), "status", "--porcelain"],
+                               capture_output=True, timeout=60, check=False)
+                self.operation.observe(time.perf_counter() - started, operation="git_status")
+        self.totals.replace([({"kind": "projects"}, len(projects)), ({"kind": "files"}, files),
+                             ({"kind": "bytes"}, size)])
+
+
+# ============================================================================
+# Exporter
+# ============================================================================
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    server: "_MetricsHTTPServer"
+    # Keep-alive: Prometheus reuses its connection between scrapes
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        super().setup()
+        # Headers and body are separate writes; avoid the Nagle/delayed-ACK stall
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def do_GET(self) -> None:  # noqa: N802
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body, content_type = self.server.exporter.registry.render(), CONTENT_TYPE
+        elif path == "/healthz":
+            body, content_type = b"ok\n", "text/plain"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _MetricsHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    exporter: "Exporter"
+
+
+class Exporter:
+    """Runs probes in the background and serves the registry over HTTP."""
+
+    def __init__(self, registry: Registry, probes: Sequence[Probe], host: str = "0.0.0.0",
+                 port: int = METRICS_PORT) -> None:
+        self.registry = registry
+        self.probes = list(probes)
+        self.host = host
+        self.port = port
+        self.probe_duration = registry.gauge("aicoding_probe_duration_seconds",
+                                             "Duration of the last probe run", ["probe"], unit="seconds")
+        self.probe_success = registry.gauge("aicoding_probe_success",
+                                            "1 if the last probe run succeeded", ["probe"])
+        self.probe_last_success = registry.gauge("aicoding_probe_last_success_timestamp_seconds",
+                                                 "When the probe last succeeded", ["probe"], unit="seconds")
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._server: Optional[_MetricsHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("Exporter is not running")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def run_probe(self, probe: Probe) -> bool:
+        """Run one probe now and record its health."""
+        started = time.perf_counter()
+        try:
+            with timer(f"probe:{probe.name}"), span(f"probe.{probe.name}", kind="probe"):
+                probe.collect()
+            success = True
+        except Exception as e:  # noqa: BLE001 - a failing probe must not kill the exporter
+            logger.warning("Probe %s failed: %s", probe.name, e)
+            success = False
+        self.probe_duration.set(time.perf_counter() - started, probe=probe.name)
+        self.probe_success.set(1 if success else 0, probe=probe.name)
+        if success:
+            self.probe_last_success.set(time.time(), probe=probe.name)
+        return success
+
+    def _probe_loop(self, probe: Probe) -> None:
+        while not self._stop.is_set():
+            self.run_probe(probe)
+            self._stop.wait(probe.interval)
+
+    def start(self) -> "Exporter":
+        self._stop.clear()
+        for probe in self.probes:
+            thread = threading.Thread(target=self._probe_loop, args=(probe,),
+                                      name=f"probe-{probe.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._server = _MetricsHTTPServer((self.host, self.port), _MetricsHandler)
+        self._server.exporter = self
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.1},
+                         name="metrics-http", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self._threads.clear()
+
+    def __enter__(self) -> "Exporter":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+def default_probes(registry: Registry, ollama_url: str = OLLAMA_HOST, openhands_url: str = OPENHANDS_URL,
+                   log_store_dir: Optional[Path] = LOG_STORE_DIR, docker: bool = True,
+                   workspace: bool = True) -> List[Probe]:
+    """The platform's standard probe set."""
+    probes: List[Probe] = [
+        OllamaProbe(registry, ollama_url),
+        HttpProbe(registry, "openhands_ui", openhands_url),
+        HostProbe(registry),
+    ]
+    if log_store_dir is not None and Path(log_store_dir).is_dir():
+        from aicoding.log_store import LogStore
+        probes.append(OllamaRequestLogProbe(registry, LogStore(Path(log_store_dir))))
+    if docker and shutil.which("docker"):
+        probes.append(DockerProbe(registry))
+    if workspace:
+        probes.append(WorkspaceProbe(registry))
+    return probes
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="OpenMetrics exporter for the AI Coding Platform")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=METRICS_PORT)
+    parser.add_argument("--ollama-url", default=OLLAMA_HOST)
+    parser.add_argument("--openhands-url", default=OPENHANDS_URL)
+    parser.add_argument("--log-store", default=str(LOG_STORE_DIR),
+                        help="Log store fed by 'aicoding.log_store ingest' (for request latencies)")
+    parser.add_argument("--no-docker", action="store_true")
+    parser.add_argument("--no-workspace", action="store_true")
+    parser.add_argument("--config-url", help="Follow OLLAMA_HOST/OPENHANDS_URL changes from "
+                                             "a running aicoding.config_service")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    registry = Registry()
+    probes = default_probes(registry, args.ollama_url, args.openhands_url, Path(args.log_store),
+                            docker=not args.no_docker, workspace=not args.no_workspace)
+    exporter = Exporter(registry, probes, args.host, args.port).start()
+    if args.config_url:
+        from aicoding.config_service import PROBE_KEYS, ConfigClient, probe_consumer
+        ConfigClient(args.config_url).watch(probe_consumer(probes), PROBE_KEYS)
+    print(f"Serving /metrics on {args.host}:{args.port} with probes: "
+          f"{', '.join(p.name for p in probes)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        exporter.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
@@ -0,0 +1,682 @@
+"""
+Local registry mirror for Ollama models across the fleet.
+
+One node that already has the models serves its manifests and blobs; other
+nodes pull from it over the private network instead of re-downloading
+~13.6 GB (deepseek-coder-v2:16b + qwen2.5-coder:7b) from the internet.
+
+The server speaks the same ``/v2/<namespace>/<model>/manifests|blobs`` paths
+as registry.ollama.ai and serves blobs with HTTP Range support using
+``socket.sendfile`` (zero-copy ``sendfile(2)`` on Linux).
+
+The client:
+- fetches the manifest and transfers only blobs missing locally
+- splits each blob into ranged chunks downloaded in parallel into a
+  preallocated ``-partial`` file; finished chunks are recorded so an
+  interrupted pull resumes where it stopped
+- verifies the sha256 digest, computed in chunk order while the data
+  streams in, before renaming the finished file into place, and writes the
+  manifest (as received) last so Ollama only sees complete models
+- reports its blob inventory to the mirror, which tracks what every node has
+
+Usage:
+    # On the node that has the models
+    python -m aicoding.model_mirror serve --port 11500
+    # On a new node (or after wiping the ollama-data volume)
+    python -m aicoding.model_mirror pull deepseek-coder-v2:16b --mirror http://10.0.0.5:11500
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import PRIMARY_MODEL, SECONDARY_MODEL
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+DEFAULT_MODELS_DIR = Path(os.environ.get("OLLAMA_MODELS", Path.home() / ".ollama" / "models"))
+DEFAULT_REGISTRY = "registry.ollama.ai"
+DEFAULT_PORT = 11500
+
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+DEFAULT_WORKERS = 4
+STREAM_BLOCK_BYTES = 1024 * 1024
+
+MANIFEST_MEDIA_TYPE = "application/vnd.docker.distribution.manifest.v2+json"
+
+_DIGEST_RE = re.compile(r"^sha256:[0-9a-f]{64}$")
+_NAME_RE = re.compile(r"^[a-z0-9][a-z0-9._-]*$")
+
+
+class MirrorError(Exception):
+    """Raised when a model cannot be transferred from the mirror."""
+
+
+class DigestMismatchError(MirrorError):
+    """Raised when a downloaded blob does not match its manifest digest."""
+
+
+# ============================================================================
+# Ollama Model Store Layout
+# ============================================================================
+
+def parse_model_ref(model: str) -> Tuple[str, str, str]:
+    """
+    Split an Ollama model reference into (namespace, name, tag).
+
+    Args:
+        model: e.g. "qwen2.5-coder:7b" or "myteam/coder:latest"
+
+    Returns:
+        (namespace, name, tag), with namespace "library" and tag "latest"
+        when omitted
+
+    Raises:
+        ValueError: If a component contains unsafe characters
+    """
+    name, _, tag = model.partition(":")
+    namespace, _, repo = name.rpartition("/")
+    namespace, tag = namespace or "library", tag or "latest"
+    for part in (namespace, repo, tag):
+        if not _NAME_RE.match(part):
+            raise ValueError(f"Invalid model reference: {model!r}")
+    return namespace, repo, tag
+
+
+class ModelStore:
+    """Read/write access to an Ollama ``models`` directory."""
+
+    def __init__(self, root: Path = DEFAULT_MODELS_DIR, registry: str = DEFAULT_REGISTRY) -> None:
+        self.root = Path(root)
+        self.registry = registry
+
+    def manifest_path(self, namespace: str, name: str, tag: str) -> Path:
+        return self.root / "manifests" / self.registry / namespace / name / tag
+
+    def blob_path(self, digest: str) -> Path:
+        if not _DIGEST_RE.match(digest):
+            raise ValueError(f"Invalid digest: {digest!r}")
+        return self.root / "blobs" / digest.replace(":", "-")
+
+    def read_manifest(self, model: str) -> Dict[str, Any]:
+        path = self.manifest_path(*parse_model_ref(model))
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def write_manifest(self, model: str, manifest: Union[Dict[str, Any], bytes]) -> None:
+        """Install a manifest; raw bytes are written as received so its digest is kept."""
+        path = self.manifest_path(*parse_model_ref(model))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(manifest if isinstance(manifest, bytes) else json.dumps(manifest).encode("utf-8"))
+        os.replace(tmp, path)
+
+    def has_blob(self, digest: str, size: int) -> bool:
+        try:
+            return self.blob_path(digest).stat().st_size == size
+        except (OSError, ValueError):
+            return False
+
+    def models(self) -> List[str]:
+        """Model references ("name:tag", or "ns/name:tag" outside library)."""
+        base = self.root / "manifests" / self.registry
+        found = []
+        if not base.is_dir():
+            return found
+        for tag_path in sorted(base.glob("*/*/*")):
+            if tag_path.is_file() and not tag_path.name.endswith(".tmp"):
+                namespace, name, tag = tag_path.relative_to(base).parts
+                prefix = "" if namespace == "library" else f"{namespace}/"
+                found.append(f"{prefix}{name}:{tag}")
+        return found
+
+    def blobs(self) -> Set[str]:
+        """Digests of complete blobs on disk."""
+        directory = self.root / "blobs"
+        if not directory.is_dir():
+            return set()
+        return {entry.name.replace("-", ":", 1) for entry in os.scandir(directory)
+                if entry.name.startswith("sha256-") and _DIGEST_RE.match(entry.name.replace("-", ":", 1))}
+
+
+def manifest_layers(manifest: Dict[str, Any]) -> List[Tuple[str, int]]:
+    """(digest, size) of every blob a manifest references, config included."""
+    entries = list(manifest.get("layers", []))
+    if manifest.get("config"):
+        entries.append(manifest["config"])
+    return [(entry["digest"], int(entry["size"])) for entry in entries]
+
+
+# ============================================================================
+# Mirror Server
+# ============================================================================
+
+_V2_RE = re.compile(r"^/v2/(?P<namespace>[^/]+)/(?P<name>[^/]+)/(?P<kind>manifests|blobs)/(?P<ref>[^/]+)$")
+_RANGE_RE = re.compile(r"^bytes=(\d+)-(\d*)$")
+
+
+class _MirrorHandler(BaseHTTPRequestHandler):
+    server: "_MirrorHTTPServer"
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        super().setup()
+        # Headers and the sendfile body go out as separate writes; without
+        # this, Nagle + delayed ACK stalls every ranged response by ~40 ms
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        if self.server.mirror.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self) -> None:  # noqa: N802
+        self._dispatch(head=True)
+
+    def do_GET(self) -> None:  # noqa: N802
+        self._dispatch(head=False)
+
+    def do_POST(self) -> None:  # noqa: N802
+        parsed = urlparse(self.path)
+        match = re.match(r"^/api/mirror/nodes/([A-Za-z0-9._-]+)$", parsed.path)
+        if not match:
+            self._send_json(404, {"error": "not found"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.server.mirror.record_node(match.group(1), payload.get("blobs", []))
+        self._send_json(200, {"ok": True})
+
+    def _dispatch(self, head: bool) -> None:
+        mirror = self.server.mirror
+        parsed = urlparse(self.path)
+        if parsed.path == "/api/mirror/inventory":
+            self._send_json(200, mirror.inventory())
+            return
+        if parsed.path == "/api/mirror/nodes":
+            self._send_json(200, mirror.nodes())
+            return
+        if parsed.path == "/api/mirror/plan":
+            query = parse_qs(parsed.query)
+            try:
+                plan = mirror.plan(query["node"][0], query["model"][0])
+            except (KeyError, FileNotFoundError, ValueError) as e:
+                self._send_json(404, {"error": str(e)})
+                return
+            self._send_json(200, plan)
+            return
+        match = _V2_RE.match(parsed.path)
+        if not match:
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            if match["kind"] == "manifests":
+                self._serve_manifest(match["namespace"], match["name"], match["ref"], head)
+            else:
+                self._serve_blob(match["ref"], head)
+        except (FileNotFoundError, ValueError) as e:
+            self._send_json(404, {"error": str(e)})
+
+    def _serve_manifest(self, namespace: str, name: str, tag: str, head: bool) -> None:
+        for part in (namespace, name, tag):
+            if not _NAME_RE.match(part):
+                raise ValueError("invalid name")
+        body = self.server.mirror.store.manifest_path(namespace, name, tag).read_bytes()
+        self.send_response(200)
+        self.send_header("Content-Type", MANIFEST_MEDIA_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Docker-Content-Digest", "sha256:" + hashlib.sha256(body).hexdigest())
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _serve_blob(self, digest: str, head: bool) -> None:
+        path = self.server.mirror.store.blob_path(digest)
+        with open(path, "rb") as blob:
+            size = os.fstat(blob.fileno()).st_size
+            start, end = 0, size - 1
+            status = 200
+            range_header = self.headers.get("Range")
+            if range_header:
+                match = _RANGE_RE.match(range_header.strip())
+                if (not match or int(match.group(1)) >= size
+                        or (match.group(2) and int(match.group(2)) < int(match.group(1)))):
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{size}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+                status = 206
+            length = end - start + 1
+            self.send_response(status)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Docker-Content-Digest", digest)
+            if status == 206:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.end_headers()
+            if head or length == 0:
+                return
+            self.wfile.flush()
+            # Zero-copy: the kernel moves file pages straight to the socket
+            self.connection.sendfile(blob, offset=start, count=length)
+            self.server.mirror.bytes_served += length
+
+
+class _MirrorHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    mirror: "MirrorServer"
+
+
+class MirrorServer:
+    """Serves a node's Ollama models to the rest of the fleet."""
+
+    def __init__(self, store: ModelStore, host: str = "0.0.0.0", port: int = DEFAULT_PORT,
+                 state_file: Optional[Path] = None, verbose: bool = False) -> None:
+        """
+        Args:
+            store: Model store to serve from
+            host: Bind address
+            port: Bind port (0 picks a free port)
+            state_file: JSON file persisting the per-node blob inventory
+            verbose: Log every request
+        """
+        self.store = store
+        self.host = host
+        self.port = port
+        self.state_file = state_file
+        self.verbose = verbose
+        self.bytes_served = 0
+        self._lock = threading.Lock()
+        self._nodes: Dict[str, Dict[str, Any]] = {}
+        if state_file and Path(state_file).exists():
+            self._nodes = json.loads(Path(state_file).read_text(encoding="utf-8"))
+        self._server: Optional[_MirrorHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("Mirror server is not running")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def inventory(self) -> Dict[str, Any]:
+        models = {}
+        for model in self.store.models():
+            models[model] = [digest for digest, _ in manifest_layers(self.store.read_manifest(model))]
+        return {"models": models, "blobs": sorted(self.store.blobs())}
+
+    def record_node(self, node: str, blobs: List[str]) -> None:
+        with self._lock:
+            self._nodes[node] = {"blobs": sorted(set(blobs)), "updated": time.time()}
+            if self.state_file:
+                tmp = Path(self.state_file).with_suffix(".tmp")
+                tmp.write_text(json.dumps(self._nodes), encoding="utf-8")
+                os.replace(tmp, self.state_file)
+
+    def nodes(self) -> Dict[str, Any]:
+        with self._lock:
+            return json.loads(json.dumps(self._nodes))
+
+    def plan(self, node: str, model: str) -> Dict[str, Any]:
+        """Blobs of ``model`` the node is not known to have."""
+        layers = manifest_layers(self.store.read_manifest(model))
+        with self._lock:
+            have = set(self._nodes.get(node, {}).get("blobs", []))
+        missing = [(digest, size) for digest, size in layers if digest not in have]
+        return {"model": model, "missing": [d for d, _ in missing],
+                "missing_bytes": sum(s for _, s in missing),
+                "total_bytes": sum(s for _, s in layers)}
+
+    def start(self) -> "MirrorServer":
+        self._server = _MirrorHTTPServer((self.host, self.port), _MirrorHandler)
+        self._server.mirror = self
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05},
+                         name="model-mirror", daemon=True).start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server = _MirrorHTTPServer((self.host, self.port), _MirrorHandler)
+        self._server.mirror = self
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "MirrorServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+# ============================================================================
+# Mirror Client
+# ============================================================================
+
+@dataclass
+class PullStats:
+    """Outcome of pulling one model from the mirror."""
+
+    model: str
+    blobs_total: int = 0
+    blobs_present: int = 0
+    blobs_fetched: int = 0
+    bytes_fetched: int = 0
+    bytes_resumed: int = 0
+    seconds: float = 0.0
+    fetched: List[str] = field(default_factory=list)
+
+
+class _PartialBlob:
+    """A blob being downloaded in chunks, with resumable progress."""
+
+    def __init__(self, store: ModelStore, digest: str, size: int, chunk_bytes: int) -> None:
+        self.digest = digest
+        self.size = size
+        self.final_path = store.blob_path(digest)
+        self.path = self.final_path.with_name(self.final_path.name + "-partial")
+        self.state_path = self.path.with_name(self.path.name + ".json")
+        self.chunk_bytes = chunk_bytes
+        self.chunks = [(start, min(size, start + chunk_bytes) - 1)
+                       for start in range(0, size, chunk_bytes)] or [(0, -1)]
+        self._lock = threading.Lock()
+        self.done: Set[int] = set()
+        # The digest covers the chunks in order: chunk ``_hashed`` up to ``_hashed_offset``
+        self._digest = hashlib.sha256()
+        self._hashed = 0
+        self._hashed_offset = 0
+        self._hash_lock = threading.Lock()
+        self.final_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists() and self.state_path.exists():
+            state = json.loads(self.state_path.read_text(encoding="utf-8"))
+            if state.get("size") == size and state.get("chunk_bytes") == chunk_bytes:
+                self.done = set(state.get("done", []))
+        if not self.done:
+            with open(self.path, "wb") as handle:
+                handle.truncate(size)
+        self.fd = os.open(self.path, os.O_RDWR)
+        # Chunks finished by an earlier run are hashed from the file once
+        self._advance()
+
+    def pending(self) -> List[int]:
+        return [i for i in range(len(self.chunks)) if i not in self.done]
+
+    def resumed_bytes(self) -> int:
+        return sum(self.chunks[i][1] - self.chunks[i][0] + 1 for i in self.done)
+
+    def mark_done(self, index: int) -> None:
+        with self._lock:
+            self.done.add(index)
+            tmp = self.state_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"size": self.size, "chunk_bytes": self.chunk_bytes,
+                                       "done": sorted(self.done)}), encoding="utf-8")
+            os.replace(tmp, self.state_path)
+        self._advance()
+
+    def feed(self, index: int, offset: int, block: bytes) -> None:
+        """
+        Hash a block just written at ``offset`` of chunk ``index``.
+
+        Blocks of the chunk next in line are hashed from memory as they
+        stream in; the rest is hashed in order once the chunks before it are
+        done, from the page cache.
+        """
+        with self._hash_lock:
+            if index != self._hashed:
+                return
+            self._hash_file(self._hashed_offset, offset)
+            self._digest.update(block)
+            self._hashed_offset = offset + len(block)
+
+    def _advance(self) -> None:
+        with self._hash_lock:
+            while self._hashed in self.done:
+                self._hash_file(max(self._hashed_offset, self.chunks[self._hashed][0]),
+                                self.chunks[self._hashed][1] + 1)
+                self._hashed += 1
+                if self._hashed < len(self.chunks):
+                    self._hashed_offset = self.chunks[self._hashed][0]
+
+    def _hash_file(self, start: int, end: int) -> None:
+        while start < end:
+            block = os.pread(self.fd, min(STREAM_BLOCK_BYTES, end - start), start)
+            if not block:
+                break
+            self._digest.update(block)
+            start += len(block)
+
+    def finish(self) -> None:
+        """Check the digest computed while downloading, then move the file into place."""
+        self._advance()
+        os.fsync(self.fd)
+        os.close(self.fd)
+        actual = "sha256:" + self._digest.hexdigest()
+        if actual != self.digest:
+            self.discard()
+            raise DigestMismatchError(f"Blob {self.digest} failed verification (got {actual})")
+        os.replace(self.path, self.final_path)
+        self.state_path.unlink(missing_ok=True)
+
+    def discard(self) -> None:
+        for path in (self.path, self.state_path):
+            path.unlink(missing_ok=True)
+
+    def close(self) -> None:
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+
+
+class MirrorClient:
+    """Pulls models from a mirror into the local Ollama model store."""
+
+    def __init__(self, mirror_url: str, store: ModelStore, node_id: Optional[str] = None,
+                 workers: int = DEFAULT_WORKERS, chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+                 timeout: float = 60.0) -> None:
+        """
+        Args:
+            mirror_url: Base URL of a MirrorServer
+            store: Local model store to fill
+            node_id: Name reported to the mirror (defaults to the hostname)
+            workers: Parallel chunk downloads
+            chunk_bytes: Bytes per ranged request
+            timeout: Per-request connect/read timeout in seconds
+        """
+        self.mirror_url = mirror_url.rstrip("/")
+        self.store = store
+        self.node_id = node_id or socket.gethostname()
+        self.workers = workers
+        self.chunk_bytes = chunk_bytes
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def fetch_manifest(self, model: str) -> Tuple[Dict[str, Any], bytes]:
+        namespace, name, tag = parse_model_ref(model)
+        response = self._session().get(
+            f"{self.mirror_url}/v2/{namespace}/{name}/manifests/{tag}",
+            headers={"Accept": MANIFEST_MEDIA_TYPE}, timeout=self.timeout)
+        if response.status_code == 404:
+            raise MirrorError(f"Mirror does not have {model}")
+        response.raise_for_status()
+        return response.json(), response.content
+
+    def _fetch_chunk(self, namespace: str, name: str, blob: _PartialBlob, index: int) -> int:
+        start, end = blob.chunks[index]
+        if end < start:
+            blob.mark_done(index)
+            return 0
+        response = self._session().get(
+            f"{self.mirror_url}/v2/{namespace}/{name}/blobs/{blob.digest}",
+            headers={"Range": f"bytes={start}-{end}"}, stream=True, timeout=self.timeout)
+        try:
+            if response.status_code != 206:
+                raise MirrorError(f"Expected 206 for {blob.digest} range {start}-{end}, "
+                                  f"got {response.status_code}")
+            offset = start
+            for block in response.iter_content(STREAM_BLOCK_BYTES):
+                if offset + len(block) > end + 1:
+                    raise MirrorError(f"Mirror sent too many bytes for {blob.digest}")
+                os.pwrite(blob.fd, block, offset)
+                blob.feed(index, offset, block)
+                offset += len(block)
+            if offset != end + 1:
+                raise MirrorError(f"Short read for {blob.digest} range {start}-{end}")
+        finally:
+            response.close()
+        blob.mark_done(index)
+        return end - start + 1
+
+    def pull(self, model: str) -> PullStats:
+        """
+        Transfer every missing blob of ``model``, then install its manifest.
+
+        Args:
+            model: Model reference, e.g. "deepseek-coder-v2:16b"
+
+        Returns:
+            Transfer statistics
+
+        Raises:
+            MirrorError: If the mirror lacks the model or a transfer fails
+            DigestMismatchError: If a blob fails verification (partial data is discarded)
+        """
+        started = time.perf_counter()
+        stats = PullStats(model)
+        namespace, name, _ = parse_model_ref(model)
+        manifest, raw_manifest = self.fetch_manifest(model)
+        layers = manifest_layers(manifest)
+        stats.blobs_total = len(layers)
+
+        partials: List[_PartialBlob] = []
+        for digest, size in layers:
+            if self.store.has_blob(digest, size):
+                stats.blobs_present += 1
+            elif digest not in {p.digest for p in partials}:
+                partials.append(_PartialBlob(self.store, digest, size, self.chunk_bytes))
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = []
+                for blob in partials:
+                    stats.bytes_resumed += blob.resumed_bytes()
+                    futures.extend(pool.submit(self._fetch_chunk, namespace, name, blob, index)
+                                   for index in blob.pending())
+                for future in futures:
+                    stats.bytes_fetched += future.result()
+            for blob in partials:
+                blob.finish()
+                stats.blobs_fetched += 1
+                stats.fetched.append(blob.digest)
+        except requests.RequestException as e:
+            raise MirrorError(f"Transfer of {model} failed: {e}") from e
+        finally:
+            for blob in partials:
+                blob.close()
+
+        self.store.write_manifest(model, raw_manifest)
+        self.report_inventory()
+        stats.seconds = time.perf_counter() - started
+        return stats
+
+    def report_inventory(self) -> None:
+        """Tell the mirror which blobs this node has (best effort)."""
+        try:
+            self._session().post(f"{self.mirror_url}/api/mirror/nodes/{self.node_id}",
+                                 json={"blobs": sorted(self.store.blobs())}, timeout=self.timeout)
+        except requests.RequestException:
+            pass
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fleet-local mirror for Ollama models")
+    parser.add_argument("--models-dir", default=str(DEFAULT_MODELS_DIR))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Serve local models to other nodes")
+    serve_parser.add_argument("--host", default="0.0.0.0")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--state-file", default=None)
+    serve_parser.add_argument("--verbose", action="store_true")
+
+    pull_parser = subparsers.add_parser("pull", help="Pull models from a mirror")
+    pull_parser.add_argument("models", nargs="*", default=[PRIMARY_MODEL, SECONDARY_MODEL])
+    pull_parser.add_argument("--mirror", required=True)
+    pull_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    pull_parser.add_argument("--chunk-mb", type=int, default=DEFAULT_CHUNK_BYTES // (1024 * 1024))
+    pull_parser.add_argument("--node-id", default=None)
+
+    args = parser.parse_args(argv)
+    store = ModelStore(Path(args.models_dir))
+
+    if args.command == "serve":
+        server = MirrorServer(store, args.host, args.port,
+                              Path(args.state_file) if args.state_file else None, args.verbose)
+        print(f"Serving {len(store.models())} models from {store.root} on {args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    client = MirrorClient(args.mirror, store, args.node_id, args.workers,
+                          args.chunk_mb * 1024 * 1024)
+    status = 0
+    for model in args.models:
+        try:
+            stats = client.pull(model)
+        except MirrorError as e:
+            print(f"❌ {model}: {e}", file=sys.stderr)
+            status = 1
+            continue
+        rate = stats.bytes_fetched / stats.seconds / 1e6 if stats.seconds else 0.0
+        print(f"✅ {model}: fetched {stats.blobs_fetched} blobs ({stats.bytes_fetched / 1e9:.2f} GB, "
+              f"{rate:.0f} MB/s), {stats.blobs_present} already present, "
+              f"{stats.bytes_resumed / 1e9:.2f} GB resumed")
+    return status
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""
+Catalog of the coder models served by Ollama on the platform.
+
+Figures come from docs/MULTI_MODEL_SETUP.md. The context window is pinned
+per model (``num_ctx``) so every request sends identical options: Ollama
+reallocates the KV cache - and reloads the model - whenever ``num_ctx``
+changes between requests.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Dict
+
+from aicoding.settings import PRIMARY_MODEL, SECONDARY_MODEL
+
+
+# Request options Ollama applies when loading a model; a request whose
+# values differ from the loaded instance's reloads it (and drops its KV
+# caches). Sampling options such as temperature can change per request.
+LOAD_OPTIONS = ("num_ctx", "num_batch", "num_gpu", "main_gpu", "num_thread", "use_mmap", "use_mlock",
+                "low_vram", "numa")
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    """Static facts about a served model."""
+
+    name: str
+    disk_gb: float
+    ram_gb: float
+    num_ctx: int
+    # Reserved for the model's reply when budgeting prompts
+    reserve_output_tokens: int
+    # Average characters per token for source code with this tokenizer
+    chars_per_token: float
+
+
+# Context size can be overridden for all models, e.g. LLM_NUM_CTX=16384
+_NUM_CTX_OVERRIDE = int(os.environ.get("LLM_NUM_CTX", "0") or 0)
+
+MODEL_PROFILES: Dict[str, ModelProfile] = {
+    PRIMARY_MODEL: ModelProfile(
+        name=PRIMARY_MODEL, disk_gb=8.9, ram_gb=16.0,
+        num_ctx=_NUM_CTX_OVERRIDE or 8192, reserve_output_tokens=1024,
+        chars_per_token=3.6,
+    ),
+    SECONDARY_MODEL: ModelProfile(
+        name=SECONDARY_MODEL, disk_gb=4.7, ram_gb=8.0,
+        num_ctx=_NUM_CTX_OVERRIDE or 8192, reserve_output_tokens=1024,
+        chars_per_token=3.3,
+    ),
+}
+
+
+def normalize_model_name(model: str) -> str:
+    """
+    Strip the LiteLLM provider prefix used by OpenHands.
+
+    Args:
+        model: e.g. "ollama/deepseek-coder-v2:16b" or "deepseek-coder-v2:16b"
+
+    Returns:
+        Ollama model name
+    """
+    return model.split("/", 1)[1] if model.startswith("ollama/") else model
+
+
+def get_profile(model: str) -> ModelProfile:
+    """
+    Look up a model profile, falling back to conservative defaults.
+
+    Args:
+        model: Ollama or LiteLLM-style model name
+
+    Returns:
+        Profile for the model
+    """
+    name = normalize_model_name(model)
+    profile = MODEL_PROFILES.get(name)
+    if profile is None:
+        profile = ModelProfile(name=name, disk_gb=0.0, ram_gb=0.0,
+                               num_ctx=_NUM_CTX_OVERRIDE or 4096,
+                               reserve_output_tokens=512, chars_per_token=3.5)
+    return profile
@@ -0,0 +1,547 @@
+"""
+Opt-in profiling for the platform tools.
+
+Nothing is measured unless profiling is switched on, either for the whole
+run with the ``PROFILING`` environment variable or, in a running process,
+with ``PROFILING_SIGNAL`` (``SIGUSR2``; the first signal starts profiling,
+the next one stops it and writes the results). Three kinds:
+
+- ``sample``: a sampling profiler - a background thread records the stack
+  of every other thread each ``PROFILING_INTERVAL_MS``, written as
+  collapsed stacks (``<dir>/<program>-<pid>-<time>.collapsed``) for
+  flamegraph.pl, speedscope or ``python -m aicoding.profiling top``; wall
+  clock, so threads waiting on HTTP or subprocesses show up too
+- ``timers``: wall and CPU time per call of the hot paths, written to
+  ``.timers.json``. Functions decorated with ``timed`` (file writes,
+  ...), blocks in ``timer`` (probes of the metrics exporter), every
+  ``subprocess.run`` (``subprocess:git status``, ``subprocess:ssh``, ...)
+  and every ``requests`` call (``http:GET ollama:11434``)
+- ``alloc``: ``tracemalloc`` snapshots; the top allocation sites and the
+  growth since the previous dump go to ``.alloc.txt``, the raw snapshot to
+  ``.tracemalloc`` (``tracemalloc.Snapshot.load``)
+
+Disabled, a ``timed`` function costs one extra call and a global flag test
+(benchmarks/bench_profiling.py measures it); ``subprocess.run`` and
+``requests`` are only wrapped while timers are on. Results are also
+written at exit when profiling is still on.
+
+Usage:
+    PROFILING=all python -m aicoding.metrics              # written at exit
+    PROFILING=sample,timers PROFILING_DIR=/tmp/profiles python -m aicoding.loadgen
+    kill -USR2 <pid>                                       # start; again to stop and write
+    python -m aicoding.profiling run --kinds timers -- -m aicoding.loadgen --levels 1,2
+    python -m aicoding.profiling top /var/lib/ai-coding-platform/profiles/loadgen-1234-20261019-120000.collapsed
+
+The tools apply ``PROFILING`` and ``PROFILING_SIGNAL`` through
+``setup_from_environment()`` when run as a program; importing this module
+(or any tool as a library) changes nothing in the process.
+
+(A package, so that ``python -m aicoding.profiling`` runs ``__main__.py``
+instead of a second copy of the module the tools import.)
+"""
+
+import atexit
+import functools
+import json
+import logging
+import os
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+from urllib.parse import urlsplit
+
+from aicoding.settings import PROFILING, PROFILING_DIR, PROFILING_INTERVAL_MS, PROFILING_SIGNAL
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+KINDS = ("sample", "timers", "alloc")
+
+MAX_STACK_DEPTH = 128
+# Frames kept per allocation traceback and allocation sites reported
+ALLOC_FRAMES = 25
+ALLOC_TOP = 50
+
+# git options that take a value before the subcommand
+_GIT_VALUE_OPTIONS = {"-C", "-c", "--git-dir", "--work-tree", "--namespace", "--exec-path"}
+
+
+# ============================================================================
+# Timers
+# ============================================================================
+
+# Read by every timed() wrapper and timer block: all they cost when disabled
+_timing = False
+_timer_lock = threading.Lock()
+
+
+@dataclass
+class TimerStats:
+    """Calls of one timed function or block."""
+
+    calls: int = 0
+    errors: int = 0
+    wall: float = 0.0
+    cpu: float = 0.0
+    max_wall: float = 0.0
+
+
+_timer_stats: Dict[str, TimerStats] = {}
+
+
+def _record(name: str, wall: float, cpu: float, failed: bool) -> None:
+    with _timer_lock:
+        stats = _timer_stats.get(name)
+        if stats is None:
+            stats = _timer_stats[name] = TimerStats()
+        stats.calls += 1
+        stats.errors += failed
+        stats.wall += wall
+        stats.cpu += cpu
+        stats.max_wall = max(stats.max_wall, wall)
+
+
+def timer_stats() -> Dict[str, TimerStats]:
+    """Copy of the statistics collected since timers were switched on."""
+    with _timer_lock:
+        return {name: TimerStats(**asdict(stats)) for name, stats in _timer_stats.items()}
+
+
+def timed(name: Any = None) -> Any:
+    """
+    Decorator timing every call while timers are on.
+
+    Usable bare (``@timed``, named after the function's module and qualified
+    name) or with a name (``@timed("git index")``). CPU time is the calling
+    thread's (``time.thread_time``), so work done by child processes or
+    servers shows as wall time only.
+    """
+
+    def decorate(function: Callable) -> Callable:
+        label = name if isinstance(name, str) else f"{function.__module__}.{function.__qualname__}"
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _timing:
+                return function(*args, **kwargs)
+            wall, cpu = time.perf_counter(), time.thread_time()
+            failed = True
+            try:
+                result = function(*args, **kwargs)
+                failed = False
+                return result
+            finally:
+                _record(label, time.perf_counter() - wall, time.thread_time() - cpu, failed)
+
+        return wrapper
+
+    return decorate(name) if callable(name) else decorate
+
+
+class timer:  # noqa: N801 - used like a function: ``with timer("probe:ollama"):``
+    """Context manager timing a block while timers are on."""
+
+    __slots__ = ("name", "wall", "cpu")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.wall = None
+
+    def __enter__(self) -> "timer":
+        if _timing:
+            self.wall, self.cpu = time.perf_counter(), time.thread_time()
+        return self
+
+    def __exit__(self, exc_type: Any, *exc_info: Any) -> None:
+        if self.wall is not None:
+            _record(self.name, time.perf_counter() - self.wall, time.thread_time() - self.cpu,
+                    exc_type is not None)
+
+
+def command_label(command: Any) -> str:
+    """
+    Timer name of a subprocess: the program, plus the subcommand for git.
+
+    >>> command_label(["git", "-C", "/repo", "status", "--porcelain"])
+    'subprocess:git status'
+    """
+    if isinstance(command, (str, bytes, os.PathLike)):
+        try:
+            argv = shlex.split(os.fsdecode(command))
+        except ValueError:
+            argv = os.fsdecode(command).split()
+    else:
+        argv = [os.fsdecode(arg) if isinstance(arg, (bytes, os.PathLike)) else str(arg) for arg in command]
+    if not argv:
+        return "subprocess:?"
+    program = os.path.basename(str(argv[0]))
+    if program == "git":
+        arguments = iter(argv[1:])
+        for argument in arguments:
+            if argument in _GIT_VALUE_OPTIONS:
+                next(arguments, None)
+            elif not argument.startswith("-"):
+                return f"subprocess:git {argument}"
+    return f"subprocess:{program}"
+
+
+class _Patches:
+    """``subprocess.run`` and ``requests`` wrapped while timers are on."""
+
+    def __init__(self) -> None:
+        self.originals: Dict[str, Callable] = {}
+
+    def install(self) -> None:
+        if self.originals:
+            return
+        original_run = subprocess.run
+
+        def run(*args: Any, **kwargs: Any) -> Any:
+            command = args[0] if args else kwargs.get("args", ())
+            with timer(command_label(command)):
+                return original_run(*args, **kwargs)
+
+        self.originals["run"] = original_run
+        subprocess.run = run
+        try:
+            from requests.adapters import HTTPAdapter
+        except ImportError:
+            return
+        original_send = HTTPAdapter.send
+
+        def send(adapter: Any, request: Any, **kwargs: Any) -> Any:
+            with timer(f"http:{request.method} {urlsplit(request.url).netloc}"):
+                return original_send(adapter, request, **kwargs)
+
+        self.originals["send"] = original_send
+        HTTPAdapter.send = send
+
+    def remove(self) -> None:
+        if "run" in self.originals:
+            subprocess.run = self.originals.pop("run")
+        if "send" in self.originals:
+            from requests.adapters import HTTPAdapter
+            HTTPAdapter.send = self.originals.pop("send")
+
+
+# ============================================================================
+# Sampling Profiler
+# ============================================================================
+
+def _frame_label(frame: Any) -> str:
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}:{getattr(code, 'co_qualname', code.co_name)}".replace(" ", "_")
+
+
+class SamplingProfiler:
+    """Background thread counting the stacks of the other threads."""
+
+    def __init__(self, interval: float = PROFILING_INTERVAL_MS / 1000) -> None:
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self, skip: Optional[int] = None) -> None:
+        """Record the current stack of every thread but ``skip``."""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            thread_name = str(names.get(ident, ident)).replace(" ", "_").replace(";", "_")
+            stack.append(f"thread:{thread_name}")
+            key = ";".join(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(skip=own)
+
+    def start(self) -> "SamplingProfiler":
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def collapsed(self) -> str:
+        """``frame;frame;frame count`` lines, root first."""
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.counts.items()))
+
+
+def top_frames(collapsed: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Frames of collapsed stacks by samples, inclusive of callees.
+
+    Returns:
+        ``{"frame", "total", "self"}`` dicts, most samples first
+    """
+    totals: Dict[str, int] = {}
+    own: Dict[str, int] = {}
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if not stack:
+            continue
+        frames = stack.split(";")
+        for frame in set(frames):
+            totals[frame] = totals.get(frame, 0) + int(count)
+        own[frames[-1]] = own.get(frames[-1], 0) + int(count)
+    ordered = sorted(totals, key=lambda frame: (-totals[frame], frame))
+    return [{"frame": frame, "total": totals[frame], "self": own.get(frame, 0)} for frame in ordered[:limit]]
+
+
+# ============================================================================
+# Profiling Session
+# ============================================================================
+
+def parse_kinds(value: str) -> List[str]:
+    """``PROFILING`` value to kinds: empty/0 none, 1/all every kind, else a comma list."""
+    value = value.strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return []
+    if value in ("1", "true", "yes", "on", "all"):
+        return list(KINDS)
+    kinds = [kind.strip() for kind in value.split(",") if kind.strip()]
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        raise ValueError(f"unknown profiling kinds {sorted(unknown)} (known: {', '.join(KINDS)})")
+    return kinds
+
+
+def program_name() -> str:
+    """Name of the running tool: the ``-m`` module's last part or the script's stem."""
+    main_module = sys.modules.get("__main__")
+    spec = getattr(main_module, "__spec__", None)
+    if spec is not None and spec.name:
+        parts = [part for part in spec.name.split(".") if part != "__main__"]
+        if parts:
+            return parts[-1]
+    stem = Path(sys.argv[0]).stem if sys.argv else ""
+    return stem if stem and not stem.startswith("-") else "python"
+
+
+class Profiler:
+    """The profiling session of this process (``PROFILER``)."""
+
+    def __init__(self) -> None:
+        self.kinds: List[str] = []
+        self.directory = PROFILING_DIR
+        # Names the result files (default: the running module or script)
+        self.program: Optional[str] = None
+        self._sampler: Optional[SamplingProfiler] = None
+        self._patches = _Patches()
+        self._started_tracemalloc = False
+        self._previous_alloc: Optional[tracemalloc.Snapshot] = None
+        self._lock = threading.RLock()
+        self._exit_hook = False
+
+    @property
+    def active(self) -> bool:
+        return bool(self.kinds)
+
+    def start(self, kinds: Sequence[str] = KINDS, directory: Optional[Path] = None,
+              interval: float = PROFILING_INTERVAL_MS / 1000) -> None:
+        """
+        Switch profiling on (no-op when it already is).
+
+        Args:
+            kinds: Any of ``KINDS``
+            directory: Where results are written (default: ``PROFILING_DIR``)
+            interval: Seconds between stack samples
+        """
+        global _timing
+        unknown = set(kinds) - set(KINDS)
+        if unknown:
+            raise ValueError(f"unknown profiling kinds {sorted(unknown)}")
+        with self._lock:
+            if self.active:
+                return
+            self.kinds = [kind for kind in KINDS if kind in kinds]
+            self.directory = Path(directory) if directory is not None else PROFILING_DIR
+            if "sample" in self.kinds:
+                self._sampler = SamplingProfiler(interval).start()
+            if "timers" in self.kinds:
+                with _timer_lock:
+                    _timer_stats.clear()
+                self._patches.install()
+                _timing = True
+            if "alloc" in self.kinds and not tracemalloc.is_tracing():
+                tracemalloc.start(ALLOC_FRAMES)
+                self._started_tracemalloc = True
+            self._previous_alloc = None
+            if not self._exit_hook:
+                atexit.register(self._stop_at_exit)
+                self._exit_hook = True
+            logger.info("Profiling on: %s", ", ".join(self.kinds))
+
+    def dump(self) -> List[Path]:
+        """
+        Write the results so far without stopping.
+
+        Returns:
+            Files written
+
+        Raises:
+            OSError: The directory is not writable
+        """
+        with self._lock:
+            if not self.active:
+                return []
+            self.directory.mkdir(parents=True, exist_ok=True)
+            prefix = self.directory / (f"{self.program or program_name()}-{os.getpid()}-"
+                                       + time.strftime("%Y%m%d-%H%M%S", time.localtime()))
+            written = []
+            if self._sampler is not None:
+                path = prefix.with_name(prefix.name + ".collapsed")
+                path.write_text(self._sampler.collapsed(), encoding="utf-8")
+                written.append(path)
+            if "timers" in self.kinds:
+                stats = sorted(timer_stats().items(), key=lambda item: -item[1].wall)
+                path = prefix.with_name(prefix.name + ".timers.json")
+                path.write_text(json.dumps({name: asdict(value) for name, value in stats}, indent=2),
+                                encoding="utf-8")
+                written.append(path)
+            if "alloc" in self.kinds and tracemalloc.is_tracing():
+                written.extend(self._dump_alloc(prefix))
+            return written
+
+    def _dump_alloc(self, prefix: Path) -> List[Path]:
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        ))
+        raw = prefix.with_name(prefix.name + ".tracemalloc")
+        snapshot.dump(str(raw))
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Traced memory: {current / 1e6:.1f} MB (peak {peak / 1e6:.1f} MB)", "",
+                 f"Top {ALLOC_TOP} allocation sites:"]
+        lines += [str(statistic) for statistic in snapshot.statistics("lineno")[:ALLOC_TOP]]
+        if self._previous_alloc is not None:
+            lines += ["", "Growth since the previous dump:"]
+            lines += [str(difference) for difference in snapshot.compare_to(self._previous_alloc, "lineno")
+                      [:ALLOC_TOP] if difference.size_diff]
+        self._previous_alloc = snapshot
+        report = prefix.with_name(prefix.name + ".alloc.txt")
+        report.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        return [report, raw]
+
+    def stop(self, write: bool = True) -> List[Path]:
+        """
+        Write the results and switch profiling off.
+
+        Args:
+            write: Write the results (False: discard them)
+
+        Returns:
+            Files written (none when the directory is not writable; logged)
+        """
+        global _timing
+        with self._lock:
+            if not self.active:
+                return []
+            if self._sampler is not None:
+                self._sampler.stop()
+            try:
+                written = self.dump() if write else []
+            except OSError as exc:
+                logger.warning("Could not write profiling results to %s: %s", self.directory, exc)
+                written = []
+            _timing = False
+            self._patches.remove()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+                self._started_tracemalloc = False
+            self._sampler = None
+            self._previous_alloc = None
+            self.kinds = []
+            for path in written:
+                logger.info("Profiling results: %s", path)
+            return written
+
+    def toggle(self, kinds: Sequence[str] = KINDS) -> List[Path]:
+        """Start when off; stop (and write) when on."""
+        with self._lock:
+            if self.active:
+                return self.stop()
+            self.start(kinds, self.directory)
+            return []
+
+    def _stop_at_exit(self) -> None:
+        written = self.stop()
+        if written:
+            print(f"Profiling results: {', '.join(map(str, written))}", file=sys.stderr)
+
+
+PROFILER = Profiler()
+
+
+def install_signal_handler(signal_name: str = PROFILING_SIGNAL, kinds: Sequence[str] = KINDS) -> bool:
+    """
+    Toggle profiling on ``signal_name``.
+
+    Only installed from the main thread and when the program has no
+    handler of its own for that signal.
+
+    Returns:
+        Whether the handler was installed
+    """
+    signum = getattr(signal, signal_name, None) if signal_name else None
+    if signum is None:
+        return False
+    try:
+        if signal.getsignal(signum) not in (signal.SIG_DFL, None):
+            return False
+
+        def handler(received: int, frame: Any) -> None:
+            PROFILER.toggle(kinds)
+
+        signal.signal(signum, handler)
+    except ValueError:  # not the main thread
+        return False
+    return True
+
+
+def setup_from_environment(environ: Mapping[str, str] = os.environ) -> None:
+    """
+    Apply ``PROFILING`` (start now) and ``PROFILING_SIGNAL`` (toggle later).
+
+    Called by each tool right before its ``main()`` when run as a program.
+    A session already started (``python -m aicoding.profiling run``) keeps
+    its own kinds and directory.
+    """
+    try:
+        kinds = parse_kinds(environ.get("PROFILING", PROFILING))
+    except ValueError as exc:
+        logger.warning("Ignoring PROFILING: %s", exc)
+        kinds = []
+    directory = Path(environ["PROFILING_DIR"]) if environ.get("PROFILING_DIR") else PROFILING_DIR
+    if kinds and not PROFILER.active:
+        PROFILER.start(kinds, directory)
+    elif not PROFILER.active:
+        PROFILER.directory = directory
+    install_signal_handler(environ.get("PROFILING_SIGNAL", PROFILING_SIGNAL), kinds or KINDS)
@@ -0,0 +1,94 @@
+"""
+Command line of the opt-in profiler (``python -m aicoding.profiling``).
+
+Runs a script or module with profiling on, and reads the results it writes.
+
+Usage:
+    python -m aicoding.profiling run --kinds timers -- -m aicoding.loadgen --levels 1,2
+    python -m aicoding.profiling top /var/lib/ai-coding-platform/profiles/metrics-1234-20261019-120000.collapsed
+    python -m aicoding.profiling timers /var/lib/ai-coding-platform/profiles/metrics-1234-20261019-120000.timers.json
+"""
+
+import argparse
+import functools
+import json
+import runpy
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from aicoding.profiling import PROFILER, PROFILING_DIR, PROFILING_INTERVAL_MS, parse_kinds, top_frames
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def _run_target(target: List[str]) -> int:
+    if not target:
+        raise SystemExit("nothing to run: give a script or -m module after --")
+    if target[0] == "-m":
+        if len(target) < 2:
+            raise SystemExit("-m needs a module")
+        sys.argv = target[1:]
+        PROFILER.program = target[1].rpartition(".")[2]
+        runner = functools.partial(runpy.run_module, target[1], run_name="__main__", alter_sys=True)
+    else:
+        sys.argv = target
+        PROFILER.program = Path(target[0]).stem
+        runner = functools.partial(runpy.run_path, target[0], run_name="__main__")
+    try:
+        runner()
+    except SystemExit as exc:
+        return exc.code if isinstance(exc.code, int) else (0 if exc.code is None else 1)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Opt-in profiling for the platform tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Run a script or module with profiling on")
+    run.add_argument("--kinds", default="all", help="Comma-separated: sample, timers, alloc (default: all)")
+    run.add_argument("--dir", type=Path, default=PROFILING_DIR)
+    run.add_argument("--interval-ms", type=float, default=PROFILING_INTERVAL_MS)
+    run.add_argument("target", nargs=argparse.REMAINDER, help="-- script.py args | -- -m module args")
+    top = sub.add_parser("top", help="Frames of a .collapsed file with the most samples")
+    top.add_argument("file", type=Path)
+    top.add_argument("--limit", type=int, default=20)
+    timers = sub.add_parser("timers", help="Print a .timers.json file")
+    timers.add_argument("file", type=Path)
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "run":
+            target = args.target[1:] if args.target[:1] == ["--"] else args.target
+            PROFILER.start(parse_kinds(args.kinds), args.dir, args.interval_ms / 1000)
+            try:
+                return _run_target(target)
+            finally:
+                for path in PROFILER.stop():
+                    print(f"Profiling results: {path}", file=sys.stderr)
+
+        if args.command == "top":
+            collapsed = args.file.read_text(encoding="utf-8")
+            samples = sum(int(line.rpartition(" ")[2]) for line in collapsed.splitlines() if line.strip())
+            print(f"{samples} samples")
+            print(f"{'total':>7} {'self':>7}  frame")
+            for row in top_frames(collapsed, args.limit):
+                print(f"{row['total'] / max(samples, 1):>6.1%} {row['self'] / max(samples, 1):>6.1%}  {row['frame']}")
+            return 0
+
+        stats = json.loads(args.file.read_text(encoding="utf-8"))
+        print(f"{'calls':>8} {'errors':>6} {'wall s':>10} {'cpu s':>10} {'mean ms':>9} {'max ms':>9}  name")
+        for name, value in stats.items():
+            mean = value["wall"] / value["calls"] * 1000 if value["calls"] else 0.0
+            print(f"{value['calls']:>8} {value['errors']:>6} {value['wall']:>10.3f} {value['cpu']:>10.3f} "
+                  f"{mean:>9.2f} {value['max_wall'] * 1000:>9.2f}  {name}")
+        return 0
+    except (OSError, ValueError) as exc:
+        print(f"Error: {exc}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
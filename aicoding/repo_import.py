@@ -0,0 +1,410 @@
+"""
+Partial, shallow and sparse import of GitHub repositories into the workspace.
+
+A full ``git clone`` of a large monorepo downloads every blob of every
+revision before the agent can start. An import instead:
+- keeps one blobless (``--filter=blob:none``), optionally shallow, bare
+  clone per upstream in a local object cache shared by every project that
+  imports the same repository; later imports only fetch new commits and trees
+- creates the project as a repository that borrows the cache's objects
+  (``objects/info/alternates``) with the upstream as ``origin`` and as
+  promisor remote, so the agent can commit, fetch and push as usual
+- fetches into the cache, in one request, only the blobs of the paths the
+  task needs, then checks them out with cone-mode sparse checkout
+- hydrates the remaining blobs of the imported commit into the cache in
+  the background, in batches, so widening the sparse checkout later (or
+  the next project) does not wait for the network
+
+Anything still missing is fetched lazily from the upstream by git itself.
+Cache repositories have ``gc.auto`` disabled and keep a ref per imported
+project (``refs/imports/<project>``), so the objects projects borrow are
+never pruned. With ``GITHUB_TOKEN`` set, https://github.com URLs are
+fetched with it, passed through the environment rather than the command
+line or any config file.
+
+Works against any git URL, including local bare repositories over
+``file://`` (what the tests use).
+
+Usage:
+    python -m aicoding.repo_import import https://github.com/org/monorepo \\
+        --name monorepo --depth 1 --sparse services/api --sparse libs/common
+    python -m aicoding.repo_import hydrate https://github.com/org/monorepo
+    python -m aicoding.repo_import status
+"""
+
+import argparse
+import base64
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Set
+
+from aicoding.profiling import command_label, setup_from_environment
+from aicoding.settings import GITHUB_TOKEN, PROJECTS_DIR, REPO_CACHE_DIR
+from aicoding.tracing import span, traced
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+# Blob ids fetched per request while hydrating in the background
+HYDRATE_BATCH_BLOBS = 2000
+GIT_TIMEOUT = 3600
+# Fetches of blob ids: no ref negotiation, no tags, nothing else
+BLOB_FETCH_ARGS = ["-c", "fetch.negotiationAlgorithm=noop", "fetch", "origin", "--no-tags",
+                   "--no-write-fetch-head", "--recurse-submodules=no", "--filter=blob:none", "--stdin"]
+
+
+class RepoImportError(Exception):
+    """A git command failed, or the import target is invalid."""
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+@dataclass
+class ImportResult:
+    project: str
+    path: str
+    url: str
+    branch: str
+    commit: str
+    depth: Optional[int]
+    sparse: List[str]
+    cache: str
+    blobs_fetched: int
+    seconds: float
+    hydrating: Optional[int] = None
+
+
+@dataclass
+class CacheStatus:
+    url: str
+    path: str
+    shallow: bool
+    bytes: int
+    missing_blobs: Optional[int] = None
+    imports: List[str] = field(default_factory=list)
+
+
+# ============================================================================
+# Git Helpers
+# ============================================================================
+
+def _auth_env(url: str, token: str) -> Dict[str, str]:
+    """Environment adding the token as an HTTP header for github.com (never written to disk)."""
+    if not token or not url.startswith("https://github.com/"):
+        return {}
+    credentials = base64.b64encode(f"x-access-token:{token}".encode()).decode()
+    return {"GIT_CONFIG_COUNT": "1", "GIT_CONFIG_KEY_0": "http.https://github.com/.extraheader",
+            "GIT_CONFIG_VALUE_0": f"Authorization: Basic {credentials}"}
+
+
+def git(args: Sequence[str], cwd: Optional[Path] = None, env: Optional[Dict[str, str]] = None,
+        stdin: Optional[str] = None) -> str:
+    """Run git; returns stdout, raises RepoImportError with stderr on failure."""
+    full_env = {**os.environ, "GIT_TERMINAL_PROMPT": "0", **(env or {})}
+    subcommand = command_label(["git", *args]).partition(" ")[2]
+    with span(f"git.{subcommand}" if subcommand else "git", kind="git") as current:
+        try:
+            result = subprocess.run(["git", *args], cwd=cwd, env=full_env, input=stdin, capture_output=True,
+                                    text=True, timeout=GIT_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise RepoImportError(f"git {' '.join(args[:2])}: {e}") from e
+        if result.returncode != 0:
+            current.fail(result.stderr.strip()[-200:])
+            raise RepoImportError(f"git {' '.join(args[:2])} failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+def _cache_name(url: str) -> str:
+    stem = re.sub(r"[^A-Za-z0-9._-]+", "-", url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git"))
+    return f"{stem or 'repo'}-{hashlib.sha256(url.encode()).hexdigest()[:12]}.git"
+
+
+def _directory_bytes(path: Path) -> int:
+    total = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(directory, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+# ============================================================================
+# Object Cache
+# ============================================================================
+
+class RepoCache:
+    """Blobless bare clones of upstream repositories, one per URL."""
+
+    def __init__(self, root: Path = REPO_CACHE_DIR, token: str = GITHUB_TOKEN) -> None:
+        self.root = Path(root)
+        self.token = token
+
+    def path_for(self, url: str) -> Path:
+        return self.root / _cache_name(url)
+
+    @contextmanager
+    def locked(self, url: str) -> Iterator[Path]:
+        """Serialize clones and fetches of one cache repository across processes."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(url)
+        with open(path.with_suffix(".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield path
+
+    def _git(self, url: str, args: Sequence[str], cwd: Optional[Path] = None, stdin: Optional[str] = None) -> str:
+        return git(args, cwd, _auth_env(url, self.token), stdin)
+
+    def update(self, url: str, depth: Optional[int] = None) -> Path:
+        """
+        Clone ``url`` into the cache, or fetch what is new.
+
+        Args:
+            url: Upstream repository
+            depth: Commits of history to fetch (None: all); a full cache
+                stays full, a shallow one is deepened or unshallowed
+        """
+        with self.locked(url) as path:
+            depth_args = [f"--depth={depth}"] if depth else []
+            if not (path / "HEAD").exists():
+                temp = path.with_suffix(".partial")
+                shutil.rmtree(temp, ignore_errors=True)
+                self._git(url, ["clone", "--bare", "--filter=blob:none", *depth_args, url, str(temp)])
+                git(["config", "gc.auto", "0"], temp)
+                git(["config", "remote.origin.fetch", "+refs/heads/*:refs/heads/*"], temp)
+                os.rename(temp, path)
+                logger.info("Cached %s in %s", url, path)
+            else:
+                if (path / "shallow").exists():
+                    depth_args = depth_args or ["--unshallow"]
+                else:
+                    depth_args = []
+                self._git(url, ["fetch", "--prune", "--filter=blob:none", *depth_args, "origin"], path)
+            return path
+
+    def missing_blobs(self, path: Path, commit: str, paths: Optional[Sequence[str]] = None) -> List[str]:
+        """
+        Blob ids of ``commit`` not yet in the cache: all of them, or those a
+        cone-mode sparse checkout of ``paths`` needs (everything below the
+        paths and the files directly in their parent directories).
+        """
+        missing = {line[1:] for line in git(["rev-list", "--objects", "--no-walk", "--missing=print", commit],
+                                            path).splitlines() if line.startswith("?")}
+        if paths is None:
+            return sorted(missing)
+        parents = {str(Path(*Path(sparse_path).parts[:depth])) + "/"
+                   for sparse_path in paths for depth in range(1, len(Path(sparse_path).parts))}
+        listings = [git(["ls-tree", "-r", "-z", commit, "--", *paths], path),
+                    git(["ls-tree", "-z", commit, "--", *sorted(parents)], path) if parents else "",
+                    git(["ls-tree", "-z", commit], path)]
+        wanted: Set[str] = set()
+        for record in "\0".join(listings).split("\0"):
+            if record:
+                _, kind, oid = record.split("\t", 1)[0].split(" ")
+                if kind == "blob":
+                    wanted.add(oid)
+        return sorted(missing & wanted)
+
+    def fetch_blobs(self, url: str, oids: Sequence[str]) -> int:
+        """Fetch blobs into the cache in one request; returns how many were requested."""
+        if not oids:
+            return 0
+        self._git(url, BLOB_FETCH_ARGS, self.path_for(url), stdin="\n".join(oids) + "\n")
+        return len(oids)
+
+    def hydrate(self, url: str, commit: str = "HEAD", batch_blobs: int = HYDRATE_BATCH_BLOBS) -> int:
+        """Fetch every missing blob of ``commit`` in batches; returns the number fetched."""
+        path = self.path_for(url)
+        missing = self.missing_blobs(path, commit)
+        started = time.monotonic()
+        for index in range(0, len(missing), batch_blobs):
+            self.fetch_blobs(url, missing[index:index + batch_blobs])
+            logger.info("Hydrated %d/%d blobs of %s", min(index + batch_blobs, len(missing)), len(missing), url)
+        if missing:
+            logger.info("Hydrated %s at %s in %.1f s", url, commit[:12], time.monotonic() - started)
+        return len(missing)
+
+    def start_hydration(self, url: str, commit: str) -> subprocess.Popen:
+        """Hydrate in a detached process that outlives this one."""
+        log_file = open(self.path_for(url).with_suffix(".hydrate.log"), "a")
+        with log_file:
+            return subprocess.Popen(
+                [sys.executable, "-m", "aicoding.repo_import", "--cache-dir", str(self.root), "hydrate", url,
+                 "--commit", commit],
+                stdout=log_file, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, start_new_session=True,
+                env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [
+                    str(Path(__file__).resolve().parent.parent), os.environ.get("PYTHONPATH")]))})
+
+    def status(self, url: Optional[str] = None, count_missing: bool = False) -> List[CacheStatus]:
+        paths = [self.path_for(url)] if url else sorted(self.root.glob("*.git"))
+        statuses = []
+        for path in paths:
+            if not (path / "HEAD").exists():
+                continue
+            cache_url = git(["config", "remote.origin.url"], path).strip()
+            imports = [ref.rsplit("/", 1)[-1] for ref in
+                       git(["for-each-ref", "--format=%(refname)", "refs/imports/"], path).split()]
+            missing = len(self.missing_blobs(path, "HEAD")) if count_missing else None
+            statuses.append(CacheStatus(cache_url, str(path), (path / "shallow").exists(),
+                                        _directory_bytes(path), missing, imports))
+        return statuses
+
+
+# ============================================================================
+# Importer
+# ============================================================================
+
+class RepoImporter:
+    """Creates workspace projects from upstream repositories through the cache."""
+
+    def __init__(self, projects_dir: Path = PROJECTS_DIR, cache: Optional[RepoCache] = None) -> None:
+        self.projects_dir = Path(projects_dir)
+        self.cache = cache or RepoCache()
+        # Background hydrations started by this importer, by project
+        self.hydrations: Dict[str, subprocess.Popen] = {}
+
+    @traced("repo.import", kind="git")
+    def import_repo(self, url: str, name: Optional[str] = None, branch: Optional[str] = None,
+                    depth: Optional[int] = None, sparse: Sequence[str] = (),
+                    hydrate: bool = True) -> ImportResult:
+        """
+        Import ``url`` as project ``name``.
+
+        Args:
+            url: Upstream repository (https://, ssh or file://)
+            name: Project directory name (default: the repository name)
+            branch: Branch to check out (default: the upstream's default)
+            depth: Commits of history (None: all)
+            sparse: Directories to check out (cone mode); empty checks out everything
+            hydrate: Start fetching the remaining blobs in the background
+
+        Raises:
+            RepoImportError: The project exists, or git failed
+        """
+        started = time.monotonic()
+        name = name or _cache_name(url).rsplit("-", 1)[0]
+        project = self.projects_dir / name
+        if project.exists():
+            raise RepoImportError(f"project {name} already exists in {self.projects_dir}")
+        cache_path = self.cache.update(url, depth)
+        branch = branch or git(["symbolic-ref", "--short", "HEAD"], cache_path).strip()
+        try:
+            commit = git(["rev-parse", "--verify", f"refs/heads/{branch}^{{commit}}"], cache_path).strip()
+        except RepoImportError:
+            raise RepoImportError(f"{url} has no branch {branch}") from None
+
+        # Blobs the checkout needs, into the shared cache in one request
+        with self.cache.locked(url):
+            needed = self.cache.missing_blobs(cache_path, commit, list(sparse) or None)
+            self.cache.fetch_blobs(url, needed)
+            git(["update-ref", f"refs/imports/{name}", commit], cache_path)
+
+        temp = self.projects_dir / f".{name}.importing"
+        shutil.rmtree(temp, ignore_errors=True)
+        try:
+            self._create_project(temp, url, cache_path, branch, commit, sparse)
+            os.rename(temp, project)
+        except BaseException:
+            shutil.rmtree(temp, ignore_errors=True)
+            with self.cache.locked(url):
+                git(["update-ref", "-d", f"refs/imports/{name}"], cache_path)
+            raise
+        hydrating = None
+        if hydrate and sparse:
+            self.hydrations[name] = self.cache.start_hydration(url, commit)
+            hydrating = self.hydrations[name].pid
+        result = ImportResult(name, str(project), url, branch, commit, depth, list(sparse), str(cache_path),
+                              len(needed), time.monotonic() - started, hydrating)
+        logger.info("Imported %s as %s (%s, %d blobs fetched) in %.1f s", url, name, commit[:12], len(needed),
+                    result.seconds)
+        return result
+
+    def _create_project(self, path: Path, url: str, cache_path: Path, branch: str, commit: str,
+                        sparse: Sequence[str]) -> None:
+        git(["init", "-q", f"--initial-branch={branch}", str(path)])
+        git_dir = path / ".git"
+        (git_dir / "objects" / "info" / "alternates").write_text(f"{cache_path.resolve() / 'objects'}\n")
+        if (cache_path / "shallow").exists():
+            shutil.copyfile(cache_path / "shallow", git_dir / "shallow")
+        for key, value in (("core.repositoryformatversion", "1"),
+                           ("remote.origin.url", url),
+                           ("remote.origin.fetch", "+refs/heads/*:refs/remotes/origin/*"),
+                           ("remote.origin.promisor", "true"),
+                           ("remote.origin.partialclonefilter", "blob:none"),
+                           ("branch." + branch + ".remote", "origin"),
+                           ("branch." + branch + ".merge", f"refs/heads/{branch}")):
+            git(["config", key, value], path)
+        git(["update-ref", f"refs/remotes/origin/{branch}", commit], path)
+        git(["symbolic-ref", "refs/remotes/origin/HEAD", f"refs/remotes/origin/{branch}"], path)
+        if sparse:
+            git(["sparse-checkout", "set", "--cone", *sparse], path)
+        git(["update-ref", f"refs/heads/{branch}", commit], path)
+        git(["reset", "-q", "--hard", commit], path)
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Partial, shallow and sparse repository import")
+    parser.add_argument("--cache-dir", type=Path, default=REPO_CACHE_DIR)
+    parser.add_argument("--projects-dir", type=Path, default=PROJECTS_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    imports = sub.add_parser("import", help="Import a repository as a workspace project")
+    imports.add_argument("url")
+    imports.add_argument("--name")
+    imports.add_argument("--branch")
+    imports.add_argument("--depth", type=int, help="Commits of history (default: all)")
+    imports.add_argument("--sparse", action="append", default=[], metavar="PATH",
+                         help="Directory to check out (repeatable; default: everything)")
+    imports.add_argument("--no-hydrate", action="store_true", help="Do not fetch the other blobs in the background")
+    hydrate = sub.add_parser("hydrate", help="Fetch every blob of a commit into the cache")
+    hydrate.add_argument("url")
+    hydrate.add_argument("--commit", default="HEAD")
+    hydrate.add_argument("--batch", type=int, default=HYDRATE_BATCH_BLOBS)
+    status = sub.add_parser("status", help="Cached repositories")
+    status.add_argument("--missing", action="store_true", help="Count blobs not hydrated yet")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    cache = RepoCache(args.cache_dir)
+    try:
+        if args.command == "import":
+            result = RepoImporter(args.projects_dir, cache).import_repo(
+                args.url, args.name, args.branch, args.depth, args.sparse, hydrate=not args.no_hydrate)
+            print(json.dumps(asdict(result), indent=2))
+        elif args.command == "hydrate":
+            print(f"{cache.hydrate(args.url, args.commit, args.batch)} blobs fetched")
+        else:
+            for entry in cache.status(count_missing=args.missing):
+                missing = "" if entry.missing_blobs is None else f", {entry.missing_blobs} blobs missing"
+                print(f"{entry.url}\n  {entry.path}: {entry.bytes / 1e6:.1f} MB"
+                      f"{', shallow' if entry.shallow else ''}{missing}; imported by {', '.join(entry.imports) or '-'}")
+    except RepoImportError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
@@ -0,0 +1,537 @@
+"""
+Memory-budgeted model residency manager for Ollama.
+
+Ollama evicts and reloads models on its own whenever a request needs
+memory, so traffic alternating between deepseek-coder-v2:16b and
+qwen2.5-coder:7b on a 16-24 GB host thrashes with multi-second reloads.
+This manager takes those decisions instead:
+- the memory budget comes from live telemetry: ``MemAvailable`` plus what
+  the resident models already use, minus a reserve kept for OpenHands and
+  its sandboxes (optionally capped by a fixed budget)
+- each model's footprint is learned from ``/api/ps`` once it has been
+  loaded, falling back to the catalog figure in aicoding.models
+- a request for a resident model is served as is; a model that fits is
+  loaded; otherwise idle models are unloaded, least recently used first
+- a request is rejected (``ResidencyRejected``, with a retry hint) rather
+  than started when it would evict a model that is serving requests, is
+  pinned, was loaded less than ``min_residency_seconds`` ago, or when the
+  swap rate limit is used up - the signs of a swap storm
+- every load and unload is logged with its latency cost, and optionally
+  appended as JSON lines to an event log
+
+Models are loaded with ``keep_alive: -1`` so Ollama never unloads them on
+its own timer; ``unload_idle`` releases memory that is no longer used.
+
+Usage:
+    python -m aicoding.residency status
+    python -m aicoding.residency plan deepseek-coder-v2:16b
+    python -m aicoding.residency load qwen2.5-coder:7b --event-log /var/log/residency.jsonl
+    python -m aicoding.residency unload-idle --idle-seconds 900
+"""
+
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+
+import requests
+
+from aicoding.metrics import read_meminfo
+from aicoding.models import get_profile, normalize_model_name
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import MODEL_MEMORY_BUDGET_GB, MODEL_MEMORY_RESERVE_GB, OLLAMA_HOST
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+GIB = 1024 ** 3
+
+# A model is not evicted for another one within this many seconds of loading
+DEFAULT_MIN_RESIDENCY_SECONDS = 120.0
+
+# At most this many evicting loads per window
+DEFAULT_MAX_SWAPS = 4
+DEFAULT_SWAP_WINDOW_SECONDS = 600.0
+
+# Resident size of an uncatalogued model relative to its size on disk
+# (weights plus KV cache and runtime buffers)
+DISK_TO_RESIDENT_FACTOR = 1.25
+
+# How long to wait for Ollama to drop an unloaded model from /api/ps
+UNLOAD_SETTLE_SECONDS = 30.0
+
+READY, LOAD, REJECT = "ready", "load", "reject"
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+class ResidencyRejected(Exception):
+    """Serving the request now would force a swap the policy does not allow."""
+
+    def __init__(self, model: str, reason: str, retry_after: float = 0.0) -> None:
+        super().__init__(f"{model}: {reason}")
+        self.model = model
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class ResidentModel:
+    """Manager-side state of a loaded model."""
+
+    name: str
+    size: int
+    loaded_at: float
+    last_used: float
+    in_flight: int = 0
+
+
+@dataclass
+class Decision:
+    """What serving a request for ``model`` requires."""
+
+    model: str
+    action: str
+    evict: List[str] = field(default_factory=list)
+    reason: str = ""
+    retry_after: float = 0.0
+    need_bytes: int = 0
+    free_bytes: int = 0
+    budget_bytes: int = 0
+
+
+@dataclass
+class ResidencyEvent:
+    """One load, unload or rejection with its cost."""
+
+    time: float
+    action: str
+    model: str
+    seconds: float = 0.0
+    size: int = 0
+    reason: str = ""
+
+
+# ============================================================================
+# Residency Manager
+# ============================================================================
+
+class ResidencyManager:
+    """Decides which models stay loaded in one Ollama instance."""
+
+    def __init__(self, ollama_url: str = OLLAMA_HOST,
+                 budget_bytes: Optional[int] = None,
+                 reserve_bytes: int = int(MODEL_MEMORY_RESERVE_GB * GIB),
+                 meminfo_reader: Callable[[], Dict[str, int]] = read_meminfo,
+                 min_residency_seconds: float = DEFAULT_MIN_RESIDENCY_SECONDS,
+                 max_swaps: int = DEFAULT_MAX_SWAPS,
+                 swap_window_seconds: float = DEFAULT_SWAP_WINDOW_SECONDS,
+                 pinned: Optional[List[str]] = None,
+                 event_log: Optional[Path] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 timeout: float = 600.0) -> None:
+        """
+        Args:
+            ollama_url: Ollama base URL
+            budget_bytes: Upper limit for model memory (None = telemetry only)
+            reserve_bytes: Memory kept free for everything besides the models
+            meminfo_reader: Returns /proc/meminfo fields in bytes
+            min_residency_seconds: Minimum time a model stays before being evicted
+            max_swaps: Evicting loads allowed per ``swap_window_seconds``
+            swap_window_seconds: Window of the swap rate limit
+            pinned: Models that are never evicted
+            event_log: Optional JSON lines file for load/unload/reject events
+            clock: Monotonic time source
+            timeout: HTTP timeout for loads (large models load slowly on CPU)
+        """
+        self.ollama_url = ollama_url.rstrip("/")
+        self.budget_bytes = budget_bytes
+        self.reserve_bytes = reserve_bytes
+        self.meminfo_reader = meminfo_reader
+        self.min_residency_seconds = min_residency_seconds
+        self.max_swaps = max_swaps
+        self.swap_window_seconds = swap_window_seconds
+        self.pinned = {normalize_model_name(model) for model in pinned or []}
+        self.event_log = Path(event_log) if event_log else None
+        self.clock = clock
+        self.timeout = timeout
+        self.http = requests.Session()
+
+        self.resident: Dict[str, ResidentModel] = {}
+        # Sizes observed in /api/ps beat the catalog figures
+        self.footprints: Dict[str, int] = {}
+        self.disk_sizes: Dict[str, int] = {}
+        self.load_seconds: Dict[str, float] = {}
+        self.events: Deque[ResidencyEvent] = deque(maxlen=1000)
+        self._swaps: Deque[float] = deque()
+        self._available = 0
+        self._have_meminfo = False
+        self._lock = threading.Lock()
+        # Loads and unloads happen one at a time
+        self._transition = threading.Lock()
+
+    def set_limits(self, reserve_bytes: int, budget_bytes: Optional[int]) -> None:
+        """Change the reserve and budget of a running manager (aicoding.config_service)."""
+        with self._lock:
+            self.reserve_bytes = reserve_bytes
+            self.budget_bytes = budget_bytes
+
+    # ------------------------------------------------------------------
+    # Telemetry
+    # ------------------------------------------------------------------
+
+    def refresh(self) -> None:
+        """Sync resident models from /api/ps and host memory from meminfo."""
+        response = self.http.get(f"{self.ollama_url}/api/ps", timeout=10)
+        response.raise_for_status()
+        entries = response.json().get("models") or []
+        meminfo = self.meminfo_reader()
+        now = self.clock()
+        with self._lock:
+            seen = set()
+            for entry in entries:
+                name = normalize_model_name(entry.get("name") or entry.get("model", ""))
+                size = int(entry.get("size", 0))
+                seen.add(name)
+                if size:
+                    self.footprints[name] = size
+                state = self.resident.get(name)
+                if state is None:
+                    # Loaded outside the manager: treat as old and idle
+                    self.resident[name] = ResidentModel(name, size, loaded_at=now - self.min_residency_seconds,
+                                                        last_used=now - self.min_residency_seconds)
+                else:
+                    state.size = size or state.size
+            for name in list(self.resident):
+                if name not in seen and self.resident[name].in_flight == 0:
+                    del self.resident[name]
+            self._available = meminfo.get("MemAvailable", 0)
+            self._have_meminfo = "MemAvailable" in meminfo
+
+    def _learn_disk_size(self, name: str) -> None:
+        if name in self.footprints or name in self.disk_sizes or get_profile(name).ram_gb:
+            return
+        response = self.http.get(f"{self.ollama_url}/api/tags", timeout=10)
+        response.raise_for_status()
+        for entry in response.json().get("models") or []:
+            self.disk_sizes[normalize_model_name(entry.get("name", ""))] = int(entry.get("size", 0))
+
+    def footprint(self, model: str) -> int:
+        """Resident size of a model in bytes: observed, else catalog, else from disk size."""
+        name = normalize_model_name(model)
+        size = self.footprints.get(name)
+        if size is None:
+            size = int(get_profile(name).ram_gb * GIB)
+        if not size:
+            size = int(self.disk_sizes.get(name, 0) * DISK_TO_RESIDENT_FACTOR)
+        return size
+
+    def budget(self) -> int:
+        """Memory the models may use, in bytes."""
+        with self._lock:
+            return self._budget_locked()
+
+    def _budget_locked(self) -> int:
+        limits = []
+        if self._have_meminfo:
+            resident = sum(state.size for state in self.resident.values())
+            limits.append(self._available + resident - self.reserve_bytes)
+        if self.budget_bytes is not None:
+            limits.append(self.budget_bytes)
+        return max(0, min(limits)) if limits else sys.maxsize
+
+    # ------------------------------------------------------------------
+    # Decisions
+    # ------------------------------------------------------------------
+
+    def plan(self, model: str) -> Decision:
+        """
+        Decide how a request for ``model`` would be served, without acting.
+
+        Args:
+            model: Ollama or LiteLLM-style model name
+
+        Returns:
+            The decision (ready, load with evictions, or reject)
+        """
+        name = normalize_model_name(model)
+        self._learn_disk_size(name)
+        self.refresh()
+        with self._lock:
+            return self._plan_locked(name)
+
+    def _plan_locked(self, name: str) -> Decision:
+        now = self.clock()
+        budget = self._budget_locked()
+        used = sum(state.size for state in self.resident.values())
+        need = self.footprint(name)
+        decision = Decision(name, READY, need_bytes=need, free_bytes=budget - used, budget_bytes=budget)
+        if name in self.resident:
+            return decision
+        if need > budget:
+            decision.action, decision.reason = REJECT, (
+                f"needs {need / GIB:.1f} GiB, budget is {budget / GIB:.1f} GiB")
+            return decision
+
+        decision.action = LOAD
+        free = budget - used
+        if need <= free:
+            return decision
+
+        # Evict idle models, least recently used first
+        blocked_until = None
+        busy = []
+        for state in sorted(self.resident.values(), key=lambda s: s.last_used):
+            if free >= need:
+                break
+            if state.in_flight or state.name in self.pinned:
+                busy.append(state.name)
+                continue
+            settles = state.loaded_at + self.min_residency_seconds
+            if settles > now:
+                blocked_until = min(blocked_until or settles, settles)
+                continue
+            decision.evict.append(state.name)
+            free += state.size
+        if free < need:
+            decision.evict = []
+            decision.action = REJECT
+            if blocked_until is not None:
+                decision.retry_after = blocked_until - now
+                decision.reason = "would evict a model loaded less than " \
+                                  f"{self.min_residency_seconds:.0f} s ago"
+            else:
+                decision.reason = f"would evict busy or pinned models: {', '.join(busy)}"
+            return decision
+
+        while self._swaps and self._swaps[0] <= now - self.swap_window_seconds:
+            self._swaps.popleft()
+        if len(self._swaps) >= self.max_swaps:
+            decision.evict = []
+            decision.action = REJECT
+            decision.retry_after = self._swaps[0] + self.swap_window_seconds - now
+            decision.reason = f"swap limit reached ({self.max_swaps} per {self.swap_window_seconds:.0f} s)"
+        return decision
+
+    # ------------------------------------------------------------------
+    # Actions
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def acquire(self, model: str) -> Iterator[Decision]:
+        """
+        Make ``model`` resident for the duration of a request.
+
+        The model cannot be evicted while the block runs.
+
+        Args:
+            model: Ollama or LiteLLM-style model name
+
+        Yields:
+            The decision that was carried out
+
+        Raises:
+            ResidencyRejected: The request would cause a disallowed swap
+        """
+        name = normalize_model_name(model)
+        decision = self._fast_path(name)
+        if decision is None:
+            decision = self._admit(name)
+        try:
+            yield decision
+        finally:
+            with self._lock:
+                state = self.resident.get(name)
+                if state is not None:
+                    state.in_flight -= 1
+                    state.last_used = self.clock()
+
+    def _fast_path(self, name: str) -> Optional[Decision]:
+        with self._lock:
+            state = self.resident.get(name)
+            if state is None:
+                return None
+            state.in_flight += 1
+            state.last_used = self.clock()
+            return Decision(name, READY, need_bytes=state.size)
+
+    def _admit(self, name: str) -> Decision:
+        with self._transition:
+            self._learn_disk_size(name)
+            self.refresh()
+            with self._lock:
+                decision = self._plan_locked(name)
+                if decision.action == READY:
+                    state = self.resident[name]
+                    state.in_flight += 1
+                    state.last_used = self.clock()
+                    return decision
+                if decision.action == REJECT:
+                    self._record(ResidencyEvent(time.time(), REJECT, name, reason=decision.reason))
+                    raise ResidencyRejected(name, decision.reason, decision.retry_after)
+                if decision.evict:
+                    self._swaps.append(self.clock())
+                victims = [self.resident.pop(victim) for victim in decision.evict]
+            for victim in victims:
+                self._unload(victim.name, victim.size, f"make room for {name}")
+            self._load(name, decision)
+            return decision
+
+    def _load(self, name: str, decision: Decision) -> None:
+        started = time.perf_counter()
+        response = self.http.post(f"{self.ollama_url}/api/generate",
+                                  json={"model": name, "keep_alive": -1}, timeout=self.timeout)
+        response.raise_for_status()
+        seconds = time.perf_counter() - started
+        self.refresh()
+        now = self.clock()
+        with self._lock:
+            state = self.resident.get(name)
+            if state is None:
+                state = self.resident[name] = ResidentModel(name, decision.need_bytes, now, now)
+            state.loaded_at = state.last_used = now
+            state.in_flight += 1
+            self.load_seconds[name] = seconds
+            size = state.size
+        reason = f"evicted {', '.join(decision.evict)}" if decision.evict else "fits in budget"
+        self._record(ResidencyEvent(time.time(), "load", name, seconds, size, reason))
+
+    def _unload(self, name: str, size: int, reason: str) -> None:
+        started = time.perf_counter()
+        response = self.http.post(f"{self.ollama_url}/api/generate",
+                                  json={"model": name, "keep_alive": 0}, timeout=self.timeout)
+        response.raise_for_status()
+        # The server frees memory asynchronously; wait until /api/ps agrees
+        deadline = time.monotonic() + UNLOAD_SETTLE_SECONDS
+        while time.monotonic() < deadline:
+            ps = self.http.get(f"{self.ollama_url}/api/ps", timeout=10).json().get("models") or []
+            if all(normalize_model_name(entry.get("name", "")) != name for entry in ps):
+                break
+            time.sleep(0.1)
+        self._record(ResidencyEvent(time.time(), "unload", name, time.perf_counter() - started, size, reason))
+
+    def unload(self, model: str, reason: str = "requested") -> bool:
+        """
+        Unload a model unless it is serving requests.
+
+        Returns:
+            Whether the model was unloaded
+        """
+        name = normalize_model_name(model)
+        with self._transition:
+            self.refresh()
+            with self._lock:
+                state = self.resident.get(name)
+                if state is None or state.in_flight:
+                    return False
+                del self.resident[name]
+            self._unload(name, state.size, reason)
+            return True
+
+    def unload_idle(self, idle_seconds: float) -> List[str]:
+        """
+        Unload unpinned models that have not been used for ``idle_seconds``.
+
+        Returns:
+            Names of the unloaded models
+        """
+        self.refresh()
+        now = self.clock()
+        with self._lock:
+            idle = [state.name for state in self.resident.values()
+                    if not state.in_flight and state.name not in self.pinned
+                    and now - state.last_used >= idle_seconds]
+        return [name for name in idle if self.unload(name, f"idle for {idle_seconds:.0f} s")]
+
+    def status(self) -> Dict[str, object]:
+        """Budget, usage and resident models as a JSON-friendly dict."""
+        self.refresh()
+        now = self.clock()
+        with self._lock:
+            return {
+                "budget_bytes": self._budget_locked(),
+                "used_bytes": sum(state.size for state in self.resident.values()),
+                "resident": [
+                    {"model": state.name, "size": state.size, "in_flight": state.in_flight,
+                     "idle_seconds": round(now - state.last_used, 1),
+                     "last_load_seconds": self.load_seconds.get(state.name)}
+                    for state in sorted(self.resident.values(), key=lambda s: s.name)
+                ],
+            }
+
+    def _record(self, event: ResidencyEvent) -> None:
+        self.events.append(event)
+        if event.action == REJECT:
+            logger.warning("rejected %s: %s", event.model, event.reason)
+        else:
+            logger.info("%s %s in %.2f s (%.1f GiB, %s)", event.action + "ed", event.model,
+                        event.seconds, event.size / GIB, event.reason)
+        if self.event_log is not None:
+            self.event_log.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.event_log, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps(asdict(event)) + "\n")
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Memory-budgeted Ollama model residency manager")
+    parser.add_argument("--ollama-url", default=OLLAMA_HOST)
+    parser.add_argument("--budget-gb", type=float, default=MODEL_MEMORY_BUDGET_GB,
+                        help="Cap on model memory (0 = from host telemetry only)")
+    parser.add_argument("--reserve-gb", type=float, default=MODEL_MEMORY_RESERVE_GB,
+                        help="Memory kept free for OpenHands and the sandboxes")
+    parser.add_argument("--pin", action="append", default=[], help="Model that is never evicted")
+    parser.add_argument("--event-log", default=None, help="Append events as JSON lines here")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Show budget and resident models")
+    for command in ("plan", "load", "unload"):
+        sub.add_parser(command).add_argument("model")
+    idle = sub.add_parser("unload-idle", help="Unload models unused for a while")
+    idle.add_argument("--idle-seconds", type=float, default=900.0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    manager = ResidencyManager(args.ollama_url,
+                               budget_bytes=int(args.budget_gb * GIB) if args.budget_gb else None,
+                               reserve_bytes=int(args.reserve_gb * GIB), pinned=args.pin,
+                               event_log=Path(args.event_log) if args.event_log else None)
+    if args.command == "status":
+        print(json.dumps(manager.status(), indent=2))
+    elif args.command == "plan":
+        print(json.dumps(asdict(manager.plan(args.model)), indent=2))
+    elif args.command == "load":
+        try:
+            with manager.acquire(args.model) as decision:
+                print(f"{decision.model}: {decision.action}"
+                      + (f" (evicted {', '.join(decision.evict)})" if decision.evict else ""))
+        except ResidencyRejected as exc:
+            print(f"Rejected: {exc} (retry after {exc.retry_after:.0f} s)", file=sys.stderr)
+            return 1
+    elif args.command == "unload":
+        if not manager.unload(args.model):
+            print(f"{args.model} is not loaded or is busy", file=sys.stderr)
+            return 1
+    elif args.command == "unload-idle":
+        print("\n".join(manager.unload_idle(args.idle_seconds)) or "Nothing to unload")
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
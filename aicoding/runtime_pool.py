@@ -0,0 +1,918 @@
+"""
+Warm pool of OpenHands runtime sandbox containers.
+
+OpenHands starts one runtime container (``openhands-runtime-<session>``)
+per conversation through the mounted Docker socket, so every new chat waits
+for container creation and the runtime's boot. The pool keeps ``size``
+runtimes created, started and healthy ahead of time and hands one off when
+a session starts:
+- hand-off: the pool serves a Docker API socket in front of the real one
+  (mount it into OpenHands instead of ``/var/run/docker.sock``). A
+  ``POST /containers/create`` for a runtime whose configuration matches
+  the warm template is answered with a warm container, renamed to the
+  requested name, and the following ``start`` returns at once; anything
+  else is passed through unchanged. The template is learned from the
+  runtime create requests OpenHands sends. Docker cannot change the
+  environment or ports of an existing container, so a warm runtime only
+  stands in for a request with exactly its session API key and ports.
+  When sessions ask for different ones, or the template publishes fixed
+  host ports (every copy would collide), the pool stops warming runtimes
+  and passes creates through until the configuration changes otherwise
+  (new runtime image, new settings)
+- replenishing happens in the background right after each hand-off, with
+  at most ``parallel`` runtimes booting at once
+- reaping: only runtimes the pool created (warm or handed off) are
+  touched. Those whose CPU time has not moved for ``idle_timeout`` are
+  stopped and removed to free their memory, exited or never-started ones
+  are removed, and warm runtimes older than ``max_warm_age`` are
+  replaced. Runtimes OpenHands created itself are left alone: it stops
+  the runtimes of closed conversations and resumes them later
+
+Session start latency is measured both ways: the hand-off time (with the
+pool) and each warm runtime's create-to-healthy time (what a session waits
+for without it).
+
+Usage:
+    # Mount /var/run/aicoding-docker.sock as /var/run/docker.sock in OpenHands
+    python -m aicoding.runtime_pool serve --size 2
+    python -m aicoding.runtime_pool status
+    python -m aicoding.runtime_pool measure --template runtime.json --sessions 5
+"""
+
+import argparse
+import hashlib
+import http.client
+import json
+import logging
+import os
+import re
+import selectors
+import socket
+import socketserver
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from aicoding.loadgen import percentile
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import DOCKER_HOST, RUNTIME_POOL_IDLE_MINUTES, RUNTIME_POOL_SIZE, RUNTIME_POOL_SOCKET
+from aicoding.tracing import NOOP_SPAN, span
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+API_VERSION = "v1.41"
+
+RUNTIME_PREFIX = "openhands-runtime-"
+WARM_PREFIX = RUNTIME_PREFIX + "warm-"
+POOL_LABEL = "aicoding.runtime-pool"
+TEMPLATE_LABEL = POOL_LABEL + ".template"
+
+# Create-request fields that differ per container without changing the runtime
+PER_CONTAINER_FIELDS = ("Hostname",)
+# Create-request fields OpenHands sets per session: a runtime is created with them
+SESSION_FIELDS = ("ExposedPorts",)
+SESSION_HOST_FIELDS = ("PortBindings",)
+# Per-session environment: the session API key and the ports the runtime listens on
+SESSION_ENV_RE = re.compile(r"^(?:SESSION_API_KEY|[A-Z_]*PORTS?)=", re.IGNORECASE)
+
+DEFAULT_PARALLEL = 2
+DEFAULT_BOOT_TIMEOUT = 180.0
+DEFAULT_MAX_WARM_AGE = 6 * 3600.0
+# Exited or never-started runtimes of the pool are removed after this long
+DEFAULT_LEAK_GRACE = 120.0
+DEFAULT_INTERVAL = 5.0
+BOOT_POLL_INTERVAL = 0.1
+LATENCY_HISTORY = 200
+
+DEFAULT_STATE_FILE = Path("/var/lib/ai-coding-platform/runtime-pool.json")
+
+PROXY_BUFFER_BYTES = 64 * 1024
+
+
+class DockerError(Exception):
+    """The Docker API answered with an error."""
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+# ============================================================================
+# Docker Engine API Client
+# ============================================================================
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+class DockerAPI:
+    """The few Docker Engine API calls the pool needs, over a unix socket or TCP."""
+
+    def __init__(self, url: str = DOCKER_HOST, timeout: float = 60.0) -> None:
+        """
+        Args:
+            url: ``unix:///path/to/docker.sock`` or ``http://host:port``
+            timeout: Per-request timeout in seconds
+        """
+        self.url = url
+        self.timeout = timeout
+
+    def _connection(self) -> http.client.HTTPConnection:
+        parsed = urlparse(self.url)
+        if parsed.scheme == "unix":
+            return _UnixConnection(parsed.path, self.timeout)
+        return http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=self.timeout)
+
+    def request(self, method: str, path: str, query: Optional[Dict[str, Any]] = None,
+                body: Optional[Any] = None) -> Any:
+        """Send one request; returns the decoded JSON body (None when empty)."""
+        target = f"/{API_VERSION}{path}" + (f"?{urlencode(query)}" if query else "")
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        headers = {"Content-Type": "application/json"} if data is not None else {}
+        connection = self._connection()
+        try:
+            connection.request(method, target, body=data, headers=headers)
+            response = connection.getresponse()
+            payload = response.read()
+        finally:
+            connection.close()
+        if response.status >= 400:
+            try:
+                message = json.loads(payload).get("message", "")
+            except ValueError:
+                message = payload.decode("utf-8", "replace")
+            raise DockerError(response.status, message)
+        return json.loads(payload) if payload else None
+
+    def create(self, config: Dict[str, Any], name: str) -> str:
+        return self.request("POST", "/containers/create", {"name": name}, config)["Id"]
+
+    def start(self, container: str) -> None:
+        self.request("POST", f"/containers/{container}/start")
+
+    def inspect(self, container: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self.request("GET", f"/containers/{container}/json")
+        except DockerError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def list(self, name: str) -> List[Dict[str, Any]]:
+        """All containers (running or not) whose name contains ``name``."""
+        return self.request("GET", "/containers/json", {"all": 1, "filters": json.dumps({"name": [name]})})
+
+    def stats(self, container: str) -> Dict[str, Any]:
+        return self.request("GET", f"/containers/{container}/stats", {"stream": 0})
+
+    def stop(self, container: str, timeout: int = 10) -> None:
+        self.request("POST", f"/containers/{container}/stop", {"t": timeout})
+
+    def remove(self, container: str) -> None:
+        self.request("DELETE", f"/containers/{container}", {"force": 1})
+
+    def rename(self, container: str, name: str) -> None:
+        self.request("POST", f"/containers/{container}/rename", {"name": name})
+
+
+def is_ready(container: Dict[str, Any]) -> bool:
+    """Running, and healthy when the image or template defines a healthcheck."""
+    state = container.get("State") or {}
+    if not state.get("Running"):
+        return False
+    health = state.get("Health")
+    return health is None or health.get("Status") == "healthy"
+
+
+def fingerprint(config: Dict[str, Any], per_session: bool = True) -> str:
+    """
+    Identity of a runtime configuration, ignoring the host name and pool labels.
+
+    Args:
+        config: Container create request
+        per_session: Include the session API key and ports. Docker cannot
+            change them on an existing container, so a warm runtime only
+            stands in for a request with exactly its values; without them
+            the identity tells whether two requests differ in anything else
+    """
+    normalized = {key: value for key, value in config.items() if key not in PER_CONTAINER_FIELDS}
+    if not per_session:
+        for key in SESSION_FIELDS:
+            normalized.pop(key, None)
+        if "Env" in config:
+            normalized["Env"] = sorted(entry for entry in config["Env"] or [] if not SESSION_ENV_RE.match(entry))
+        if isinstance(config.get("Cmd"), list):
+            # The action server takes its port as a bare argument
+            normalized["Cmd"] = ["<port>" if str(arg).isdigit() else arg for arg in config["Cmd"]]
+        if isinstance(config.get("HostConfig"), dict):
+            normalized["HostConfig"] = {key: value for key, value in config["HostConfig"].items()
+                                        if key not in SESSION_HOST_FIELDS}
+    labels = {key: value for key, value in (config.get("Labels") or {}).items()
+              if not key.startswith(POOL_LABEL)}
+    normalized["Labels"] = labels
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def fixed_host_ports(config: Dict[str, Any]) -> List[str]:
+    """Host ports ``config`` publishes on, leaving out those Docker picks at start."""
+    bindings = (config.get("HostConfig") or {}).get("PortBindings") or {}
+    return sorted({binding["HostPort"] for port_bindings in bindings.values() for binding in port_bindings or []
+                   if binding.get("HostPort")})
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+@dataclass
+class WarmRuntime:
+    """A pre-started runtime waiting for a session."""
+
+    id: str
+    name: str
+    template: str
+    created: float
+    ready: bool = False
+
+
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    booted: int = 0
+    failed_boots: int = 0
+    recycled: int = 0
+    reaped_idle: int = 0
+    reaped_leaked: int = 0
+    freed_bytes: int = 0
+    # Hand-off time (with the pool) and create-to-healthy time (without it)
+    warm_seconds: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_HISTORY))
+    cold_seconds: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_HISTORY))
+
+
+# ============================================================================
+# Pool
+# ============================================================================
+
+class RuntimePool:
+    """Keeps pre-started runtimes ready and reaps idle or leaked ones."""
+
+    def __init__(self, api: DockerAPI, template: Optional[Dict[str, Any]] = None, size: int = RUNTIME_POOL_SIZE,
+                 parallel: int = DEFAULT_PARALLEL, boot_timeout: float = DEFAULT_BOOT_TIMEOUT,
+                 idle_timeout: float = RUNTIME_POOL_IDLE_MINUTES * 60, max_warm_age: float = DEFAULT_MAX_WARM_AGE,
+                 leak_grace: float = DEFAULT_LEAK_GRACE, interval: float = DEFAULT_INTERVAL,
+                 state_file: Optional[Path] = None, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        Args:
+            api: Docker API of the host
+            template: Create config of a runtime (None: learned from the first request)
+            size: Runtimes kept warm
+            parallel: Most runtimes booting at once
+            boot_timeout: A runtime not healthy by then is discarded
+            idle_timeout: Handed-off runtimes without CPU activity this long are removed (0 = never)
+            max_warm_age: Warm runtimes are replaced after this long
+            leak_grace: Exited or never-started runtimes of the pool are removed after this long
+            interval: Seconds between reaping passes
+            state_file: Where the learned template is kept across restarts
+            clock: Monotonic time source for idle and age tracking
+        """
+        self.api = api
+        self.size = size
+        self.boot_timeout = boot_timeout
+        self.idle_timeout = idle_timeout
+        self.max_warm_age = max_warm_age
+        self.leak_grace = leak_grace
+        self.interval = interval
+        self.state_file = state_file
+        self.clock = clock
+        self.stats = PoolStats()
+        self.template: Optional[Dict[str, Any]] = None
+        self.template_id = ""
+        self.template_base = ""
+        # Why runtimes of the template cannot be warmed ahead ("" while they can)
+        self.disabled = ""
+        self.warm: List[WarmRuntime] = []
+        # Warm-prefixed names this pool is booting, holding or handing off
+        self._owned: Set[str] = set()
+        self._activity: Dict[str, Tuple[int, float]] = {}
+        self._stopped_since: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=parallel, thread_name_prefix="runtime-boot")
+        self._thread: Optional[threading.Thread] = None
+        if template is None and state_file is not None and state_file.exists():
+            template = json.loads(state_file.read_text(encoding="utf-8"))
+        if template is not None:
+            self.set_template(template)
+
+    # -- template ------------------------------------------------------
+
+    def set_template(self, config: Dict[str, Any]) -> bool:
+        """Warm runtimes from ``config`` from now on; returns True if it changed."""
+        template_id = fingerprint(config)
+        with self._lock:
+            if template_id == self.template_id:
+                return False
+            self.template, self.template_id = dict(config), template_id
+            self.template_base = fingerprint(config, per_session=False)
+            ports = fixed_host_ports(config)
+            # A copy would collide with the session it came from and with the other copies
+            self.disabled = f"the runtime publishes fixed host ports {', '.join(ports)}" if ports else ""
+            stale, self.warm = [w for w in self.warm if w.template != template_id], \
+                [w for w in self.warm if w.template == template_id]
+        logger.info("Runtime template %s (image %s)", template_id, config.get("Image"))
+        if self.disabled:
+            logger.warning("Not warming runtimes: %s", self.disabled)
+        if self.state_file is not None:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            self.state_file.write_text(json.dumps(config, indent=2), encoding="utf-8")
+        for runtime in stale:
+            self._discard(runtime)
+            self.stats.recycled += 1
+        self._wake.set()
+        return True
+
+    def matches(self, config: Dict[str, Any]) -> bool:
+        return bool(self.template_id) and fingerprint(config) == self.template_id
+
+    def same_runtime(self, config: Dict[str, Any]) -> bool:
+        """True if ``config`` differs from the template at most in per-session values."""
+        return bool(self.template_base) and fingerprint(config, per_session=False) == self.template_base
+
+    def disable(self, reason: str) -> None:
+        """Stop warming runtimes of the current template and discard the warm ones."""
+        with self._lock:
+            if self.disabled:
+                return
+            self.disabled, stale, self.warm = reason, self.warm, []
+        logger.warning("Not warming runtimes: %s", reason)
+        for runtime in stale:
+            self._discard(runtime)
+            self.stats.recycled += 1
+
+    # -- hand-off ------------------------------------------------------
+
+    def claim(self, name: str) -> Optional[str]:
+        """
+        Hand a ready runtime over as ``name``.
+
+        Returns:
+            The container id, or None when no runtime is ready (the caller
+            creates one as usual)
+        """
+        started = time.perf_counter()
+        while True:
+            with self._lock:
+                ready = [runtime for runtime in self.warm if runtime.ready]
+                runtime = min(ready, key=lambda r: r.created) if ready else None
+                if runtime is not None:
+                    self.warm.remove(runtime)
+            self._wake.set()
+            if runtime is None:
+                self.stats.misses += 1
+                return None
+            try:
+                # A warm runtime may have crashed since it booted
+                container = self.api.inspect(runtime.id)
+                if container is not None and is_ready(container):
+                    self.api.rename(runtime.id, name)
+                    break
+                logger.warning("Warm runtime %s is no longer ready", runtime.name)
+            except DockerError as e:
+                logger.warning("Handing off %s failed: %s", runtime.name, e)
+            self._discard(runtime)
+        self._owned.discard(runtime.name)
+        self.stats.hits += 1
+        self.stats.warm_seconds.append(time.perf_counter() - started)
+        logger.info("Handed %s to %s", runtime.name, name)
+        return runtime.id
+
+    # -- replenishing --------------------------------------------------
+
+    def _boot(self, runtime: WarmRuntime, config: Dict[str, Any]) -> None:
+        started = time.perf_counter()
+        try:
+            runtime.id = self.api.create(config, runtime.name)
+            self.api.start(runtime.id)
+            deadline = time.monotonic() + self.boot_timeout
+            # Stops early when the runtime was recycled by a template change
+            while not self._stop.is_set() and time.monotonic() < deadline and runtime in self.warm:
+                container = self.api.inspect(runtime.id)
+                if container is None:
+                    break
+                if is_ready(container):
+                    with self._lock:
+                        runtime.ready = runtime in self.warm
+                    if not runtime.ready:
+                        break
+                    self.stats.booted += 1
+                    self.stats.cold_seconds.append(time.perf_counter() - started)
+                    return
+                time.sleep(BOOT_POLL_INTERVAL)
+        except DockerError as e:
+            logger.warning("Booting %s failed: %s", runtime.name, e)
+        with self._lock:
+            pooled = runtime in self.warm
+            if pooled:
+                self.warm.remove(runtime)
+        if pooled and not self._stop.is_set():
+            self.stats.failed_boots += 1
+        self._discard(runtime)
+        self._owned.discard(runtime.name)
+
+    def fill(self) -> int:
+        """Start booting runtimes until ``size`` are ready or booting; returns how many were started."""
+        with self._lock:
+            if self.template is None or self.disabled or self._stop.is_set():
+                return 0
+            missing = self.size - len(self.warm)
+            config = dict(self.template)
+            config["Labels"] = dict(config.get("Labels") or {}, **{POOL_LABEL: "warm",
+                                                                    TEMPLATE_LABEL: self.template_id})
+            new = [WarmRuntime("", WARM_PREFIX + uuid.uuid4().hex[:12], self.template_id, self.clock())
+                   for _ in range(missing)]
+            self.warm.extend(new)
+            self._owned.update(runtime.name for runtime in new)
+        for runtime in new:
+            self._executor.submit(self._boot, runtime, config)
+        return len(new)
+
+    def _discard(self, runtime: WarmRuntime) -> None:
+        if not runtime.id:
+            # Still being created: _boot removes it once it notices
+            return
+        self._owned.discard(runtime.name)
+        try:
+            self.api.remove(runtime.id)
+        except DockerError as e:
+            if e.status != 404:
+                logger.warning("Removing %s failed: %s", runtime.name, e)
+
+    def adopt(self) -> None:
+        """Take over warm runtimes left by a previous pool process."""
+        for container in self.api.list(WARM_PREFIX):
+            name = container["Names"][0].lstrip("/")
+            if not name.startswith(WARM_PREFIX):
+                continue
+            runtime = WarmRuntime(container["Id"], name, container["Labels"].get(TEMPLATE_LABEL, ""), self.clock())
+            details = self.api.inspect(container["Id"])
+            if runtime.template == self.template_id and not self.disabled and details is not None and is_ready(details):
+                runtime.ready = True
+                with self._lock:
+                    self.warm.append(runtime)
+                    self._owned.add(name)
+            else:
+                self._discard(runtime)
+
+    # -- reaping -------------------------------------------------------
+
+    def reap(self) -> None:
+        """Remove idle and leaked runtimes of the pool and over-age warm ones."""
+        now = self.clock()
+        with self._lock:
+            owned = set(self._owned)
+            ready = {runtime.name: runtime for runtime in self.warm if runtime.ready}
+            expired = [r for r in ready.values() if now - r.created > self.max_warm_age]
+            for runtime in expired:
+                self.warm.remove(runtime)
+        for runtime in expired:
+            self._discard(runtime)
+            self.stats.recycled += 1
+        seen = set()
+        for container in self.api.list(RUNTIME_PREFIX):
+            container_id = container["Id"]
+            name = container["Names"][0].lstrip("/")
+            if name in ready and container["State"] != "running":
+                # A warm runtime that crashed
+                with self._lock:
+                    if ready[name] in self.warm:
+                        self.warm.remove(ready[name])
+                self._discard(ready[name])
+                self.stats.reaped_leaked += 1
+                continue
+            if not name.startswith(RUNTIME_PREFIX) or name in owned:
+                continue
+            if POOL_LABEL not in (container.get("Labels") or {}):
+                # Created by OpenHands itself, which may resume it later
+                continue
+            seen.add(container_id)
+            if name.startswith(WARM_PREFIX):
+                # Not ours (left by a failed boot or an earlier pool)
+                self._remove(container_id, name, "leaked")
+                continue
+            if container["State"] != "running":
+                since = self._stopped_since.setdefault(container_id, now)
+                if now - since >= self.leak_grace:
+                    self._remove(container_id, name, "leaked")
+                continue
+            if not self.idle_timeout:
+                continue
+            stats = self.api.stats(container_id)
+            cpu = stats["cpu_stats"]["cpu_usage"]["total_usage"]
+            previous, last_active = self._activity.get(container_id, (None, now))
+            if cpu != previous:
+                last_active = now
+            self._activity[container_id] = (cpu, last_active)
+            if now - last_active >= self.idle_timeout:
+                self.stats.freed_bytes += stats["memory_stats"].get("usage", 0)
+                try:
+                    self.api.stop(container_id)
+                except DockerError:
+                    pass
+                self._remove(container_id, name, "idle")
+        for tracked in (self._activity, self._stopped_since):
+            for container_id in [key for key in tracked if key not in seen]:
+                del tracked[container_id]
+
+    def _remove(self, container_id: str, name: str, reason: str) -> None:
+        try:
+            self.api.remove(container_id)
+        except DockerError as e:
+            if e.status != 404:
+                logger.warning("Removing %s failed: %s", name, e)
+                return
+        if reason == "idle":
+            self.stats.reaped_idle += 1
+        else:
+            self.stats.reaped_leaked += 1
+        logger.info("Removed %s runtime %s", reason, name)
+
+    # -- lifecycle -----------------------------------------------------
+
+    def _loop(self) -> None:
+        next_reap = 0.0
+        while not self._stop.is_set():
+            try:
+                self.fill()
+                if time.monotonic() >= next_reap:
+                    self.reap()
+                    next_reap = time.monotonic() + self.interval
+            except (DockerError, OSError) as e:
+                logger.warning("Runtime pool pass failed: %s", e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self) -> "RuntimePool":
+        if self.template is not None:
+            self.adopt()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="runtime-pool", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, drain: bool = True) -> None:
+        """Stop replenishing; with ``drain`` the warm runtimes are removed."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._executor.shutdown(wait=True)
+        if drain:
+            with self._lock:
+                warm, self.warm = self.warm, []
+            for runtime in warm:
+                self._discard(runtime)
+
+    def wait_warm(self, count: Optional[int] = None, timeout: float = DEFAULT_BOOT_TIMEOUT) -> bool:
+        """Block until ``count`` (default ``size``) runtimes are ready."""
+        count = self.size if count is None else count
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                if sum(runtime.ready for runtime in self.warm) >= count:
+                    return True
+            time.sleep(0.02)
+        return False
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            ready = sum(runtime.ready for runtime in self.warm)
+            booting = len(self.warm) - ready
+        stats = self.stats
+        return {
+            "template": self.template_id, "image": (self.template or {}).get("Image"),
+            "disabled": self.disabled, "size": self.size, "ready": ready, "booting": booting,
+            "hits": stats.hits, "misses": stats.misses, "booted": stats.booted,
+            "failed_boots": stats.failed_boots, "recycled": stats.recycled,
+            "reaped_idle": stats.reaped_idle, "reaped_leaked": stats.reaped_leaked,
+            "freed_bytes": stats.freed_bytes,
+            "session_start_ms": {
+                "with_pool_p50": percentile(stats.warm_seconds, 0.5) * 1000,
+                "with_pool_p95": percentile(stats.warm_seconds, 0.95) * 1000,
+                "without_pool_p50": percentile(stats.cold_seconds, 0.5) * 1000,
+                "without_pool_p95": percentile(stats.cold_seconds, 0.95) * 1000,
+            },
+        }
+
+
+# ============================================================================
+# Docker Socket Proxy
+# ============================================================================
+
+_CREATE_RE = re.compile(r"^(?:/v[0-9.]+)?/containers/create$")
+_START_RE = re.compile(r"^(?:/v[0-9.]+)?/containers/([^/]+)/start$")
+_HIJACK_RE = re.compile(r"/(attach|exec/[^/]+/start)$")
+
+
+def _runtime_session(method: str, url: Any) -> Optional[str]:
+    """OpenHands session of a runtime create request (``openhands-runtime-<session>``)."""
+    if method != "POST" or not _CREATE_RE.match(url.path):
+        return None
+    name = parse_qs(url.query).get("name", [""])[0]
+    if not name.startswith(RUNTIME_PREFIX) or name.startswith(WARM_PREFIX):
+        return None
+    return name[len(RUNTIME_PREFIX):]
+
+
+def _relay(client: socket.socket, upstream: socket.socket, both_ways: bool) -> bool:
+    """
+    Copy upstream to client until upstream closes (and client to upstream
+    when ``both_ways``). Returns False when the client went away.
+    """
+    with selectors.DefaultSelector() as selector:
+        selector.register(upstream, selectors.EVENT_READ)
+        selector.register(client, selectors.EVENT_READ)
+        while True:
+            for key, _ in selector.select():
+                source = key.fileobj
+                try:
+                    data = source.recv(PROXY_BUFFER_BYTES)
+                except OSError:
+                    data = b""
+                if source is upstream:
+                    if not data:
+                        return True
+                    client.sendall(data)
+                elif not data:
+                    return False
+                elif both_ways:
+                    upstream.sendall(data)
+
+
+class _ProxyHandler(socketserver.StreamRequestHandler):
+    server: "_ProxyServer"
+
+    def _respond(self, status: int, reason: str, payload: Any = None) -> None:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        head = f"HTTP/1.1 {status} {reason}\r\nContent-Length: {len(body)}\r\n"
+        if body:
+            head += "Content-Type: application/json\r\n"
+        self.wfile.write(head.encode("latin-1") + b"\r\n" + body)
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        proxy = self.server.proxy
+        while True:
+            request_line = self.rfile.readline(65537)
+            if not request_line.strip():
+                return
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            headers = []
+            while True:
+                line = self.rfile.readline(65537)
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                headers.append(line.decode("latin-1").rstrip("\r\n"))
+            lowered = {line.split(":", 1)[0].strip().lower(): line.split(":", 1)[1].strip()
+                       for line in headers if ":" in line}
+            body = self.rfile.read(int(lowered.get("content-length", "0") or 0))
+            url = urlparse(target)
+            session = _runtime_session(method, url)
+            with span("runtime.create", kind="runtime", session=session) if session else NOOP_SPAN as current:
+                handled = proxy.intercept(self, method, url, body)
+                current.set(warm=handled)
+                if not handled and not self._forward(method, target, headers, lowered, body, url):
+                    return
+
+    def _forward(self, method: str, target: str, headers: List[str], lowered: Dict[str, str],
+                 body: bytes, url: Any) -> bool:
+        upstream = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        upstream.connect(self.server.proxy.upstream)
+        try:
+            hijack = "upgrade" in lowered or bool(_HIJACK_RE.search(url.path))
+            chunked = "chunked" in lowered.get("transfer-encoding", "")
+            kept = [line for line in headers if not line.lower().startswith("connection:")]
+            if not hijack:
+                kept.append("Connection: close")
+            head = f"{method} {target} HTTP/1.1\r\n" + "".join(f"{line}\r\n" for line in kept) + "\r\n"
+            upstream.sendall(head.encode("latin-1") + body)
+            if hijack or chunked:
+                # Streams in both directions until either side closes
+                _relay(self.connection, upstream, both_ways=True)
+                return False
+            return _relay(self.connection, upstream, both_ways=False)
+        finally:
+            upstream.close()
+
+
+class _ProxyServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    proxy: "DockerProxy"
+
+
+class DockerProxy:
+    """Docker API socket handing warm runtimes to matching create requests."""
+
+    def __init__(self, pool: RuntimePool, path: str = RUNTIME_POOL_SOCKET, upstream: str = DOCKER_HOST) -> None:
+        self.pool = pool
+        self.path = path
+        self.upstream = urlparse(upstream).path if upstream.startswith("unix://") else upstream
+        self.handed_off: Set[str] = set()
+        self._server: Optional[_ProxyServer] = None
+
+    def intercept(self, handler: _ProxyHandler, method: str, url: Any, body: bytes) -> bool:
+        """Answer the request from the pool; False to pass it through."""
+        if method == "GET" and url.path.endswith("/_pool/status"):
+            handler._respond(200, "OK", self.pool.status())
+            return True
+        match = _START_RE.match(url.path)
+        if method == "POST" and match and match.group(1) in self.handed_off:
+            self.handed_off.discard(match.group(1))
+            handler._respond(204, "No Content")
+            return True
+        session = _runtime_session(method, url)
+        if session is None:
+            return False
+        name = RUNTIME_PREFIX + session
+        try:
+            config = json.loads(body)
+        except ValueError:
+            return False
+        if not self.pool.matches(config):
+            self.pool.stats.misses += 1
+            if self.pool.same_runtime(config):
+                # Docker cannot change a warm runtime's key or ports, and the next session has others again
+                self.pool.disable("runtime creates differ per session (session API key or ports)")
+            else:
+                # Runtimes look like this now: warm those instead
+                self.pool.set_template(config)
+            return False
+        container_id = self.pool.claim(name)
+        if container_id is None:
+            return False
+        self.handed_off.update({container_id, name})
+        handler._respond(201, "Created", {"Id": container_id, "Warnings": []})
+        return True
+
+    def start(self) -> "DockerProxy":
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = _ProxyServer(self.path, _ProxyHandler)
+        self._server.proxy = self
+        os.chmod(self.path, 0o660)
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05},
+                         name="docker-proxy", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def __enter__(self) -> "DockerProxy":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+# ============================================================================
+# Latency Measurement
+# ============================================================================
+
+def measure(api: DockerAPI, template: Dict[str, Any], sessions: int = 5,
+            boot_timeout: float = DEFAULT_BOOT_TIMEOUT) -> Dict[str, float]:
+    """
+    Session start latency without and with the pool.
+
+    Without: ``sessions`` runtimes are created, started and waited for one
+    after another. With: a pool of ``sessions`` is warmed, then each session
+    claims one. All containers are removed afterwards.
+
+    Returns:
+        p50/p95 milliseconds for both
+    """
+    cold = []
+    for index in range(sessions):
+        started = time.perf_counter()
+        container_id = api.create(template, f"{RUNTIME_PREFIX}measure-cold-{index}")
+        try:
+            api.start(container_id)
+            deadline = time.monotonic() + boot_timeout
+            while time.monotonic() < deadline and not is_ready(api.inspect(container_id) or {}):
+                time.sleep(BOOT_POLL_INTERVAL)
+            cold.append(time.perf_counter() - started)
+        finally:
+            api.remove(container_id)
+    pool = RuntimePool(api, template, size=sessions, parallel=sessions, boot_timeout=boot_timeout,
+                       idle_timeout=0).start()
+    warm = []
+    try:
+        pool.wait_warm(timeout=boot_timeout)
+        for index in range(sessions):
+            started = time.perf_counter()
+            container_id = pool.claim(f"{RUNTIME_PREFIX}measure-warm-{index}")
+            if container_id is not None:
+                warm.append(time.perf_counter() - started)
+                api.remove(container_id)
+    finally:
+        pool.stop()
+    return {
+        "without_pool_p50_ms": percentile(cold, 0.5) * 1000,
+        "without_pool_p95_ms": percentile(cold, 0.95) * 1000,
+        "with_pool_p50_ms": percentile(warm, 0.5) * 1000,
+        "with_pool_p95_ms": percentile(warm, 0.95) * 1000,
+        "hits": len(warm),
+    }
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Warm pool of OpenHands runtime containers")
+    parser.add_argument("--docker", default=DOCKER_HOST, help="Docker API of the host")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Keep runtimes warm and serve the hand-off socket")
+    serve.add_argument("--socket", default=RUNTIME_POOL_SOCKET)
+    serve.add_argument("--size", type=int, default=RUNTIME_POOL_SIZE)
+    serve.add_argument("--idle-minutes", type=float, default=RUNTIME_POOL_IDLE_MINUTES,
+                       help="Remove session runtimes idle this long (0 = never)")
+    serve.add_argument("--template", type=Path, help="Runtime create config (default: learned)")
+    serve.add_argument("--state-file", type=Path, default=DEFAULT_STATE_FILE)
+    status = sub.add_parser("status", help="Pool state and session start latency")
+    status.add_argument("--socket", default=RUNTIME_POOL_SOCKET)
+    measure_parser = sub.add_parser("measure", help="Compare session start with and without the pool")
+    measure_parser.add_argument("--template", type=Path, required=True)
+    measure_parser.add_argument("--sessions", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.command == "status":
+        try:
+            print(json.dumps(DockerAPI(f"unix://{args.socket}", timeout=5).request("GET", "/_pool/status"),
+                             indent=2))
+        except OSError as e:
+            print(f"Runtime pool not reachable at {args.socket}: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    api = DockerAPI(args.docker)
+    if args.command == "measure":
+        template = json.loads(args.template.read_text(encoding="utf-8"))
+        ports = fixed_host_ports(template)
+        if ports:
+            print(f"Error: the template publishes fixed host ports ({', '.join(ports)}); "
+                  f"leave HostPort empty so Docker picks them", file=sys.stderr)
+            return 1
+        result = measure(api, template, args.sessions)
+        print(f"Session start without pool: p50 {result['without_pool_p50_ms']:.0f} ms, "
+              f"p95 {result['without_pool_p95_ms']:.0f} ms")
+        print(f"Session start with pool:    p50 {result['with_pool_p50_ms']:.0f} ms, "
+              f"p95 {result['with_pool_p95_ms']:.0f} ms ({result['hits']}/{args.sessions} warm)")
+        return 0
+
+    template = json.loads(args.template.read_text(encoding="utf-8")) if args.template else None
+    pool = RuntimePool(api, template, size=args.size, idle_timeout=args.idle_minutes * 60,
+                       state_file=args.state_file).start()
+    proxy = DockerProxy(pool, args.socket, args.docker).start()
+    print(f"Runtime pool of {args.size} serving {args.socket} (upstream {args.docker})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        proxy.stop()
+        pool.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
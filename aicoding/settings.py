@@ -0,0 +1,130 @@
+"""
+Shared platform settings for the AI Coding Platform tooling.
+
+Values mirror the defaults documented in docs/CONFIGURATION_REFERENCE.md and
+.env.example, and can be overridden through the same environment variables
+the containers use.
+"""
+
+import os
+from pathlib import Path
+
+
+# ============================================================================
+# Workspace Layout (see scripts/setup-workspace.sh)
+# ============================================================================
+
+WORKSPACE_DIR = Path(os.environ.get("WORKSPACE_DIR", "/opt/workspace"))
+PROJECTS_DIR = WORKSPACE_DIR / "projects"
+TEMP_DIR = WORKSPACE_DIR / "temp"
+ARCHIVE_DIR = WORKSPACE_DIR / "archive"
+
+
+# ============================================================================
+# Ollama / LLM Configuration
+# ============================================================================
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://ollama:11434")
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", OLLAMA_HOST)
+LLM_MODEL = os.environ.get("LLM_MODEL", "ollama/deepseek-coder-v2:16b")
+
+# Models installed on the server (docs/MULTI_MODEL_SETUP.md)
+PRIMARY_MODEL = "deepseek-coder-v2:16b"
+SECONDARY_MODEL = "qwen2.5-coder:7b"
+
+# Model residency manager (aicoding.residency): memory kept free for
+# OpenHands and the sandboxes, and an optional cap on model memory (0 = none)
+MODEL_MEMORY_RESERVE_GB = float(os.environ.get("MODEL_MEMORY_RESERVE_GB", "2"))
+MODEL_MEMORY_BUDGET_GB = float(os.environ.get("MODEL_MEMORY_BUDGET_GB", "0"))
+
+# Embedding model used for semantic lookup over workspace files
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "nomic-embed-text")
+
+
+# ============================================================================
+# OpenHands
+# ============================================================================
+
+# Same default as scripts/health-check-openhands.sh
+OPENHANDS_URL = os.environ.get("OPENHANDS_URL", "http://localhost:3000")
+
+
+# ============================================================================
+# Operations
+# ============================================================================
+
+# Indexed container log store (aicoding.log_store)
+LOG_STORE_DIR = Path(os.environ.get("LOG_STORE_DIR", "/var/lib/ai-coding-platform/logs"))
+
+# OpenMetrics exporter (aicoding.metrics)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9105"))
+
+# Hot-reloadable configuration service (aicoding.config_service)
+ENV_FILE = Path(os.environ.get("ENV_FILE", ".env"))
+CONFIG_SERVICE_PORT = int(os.environ.get("CONFIG_SERVICE_PORT", "9106"))
+
+# Workspace garbage collector (aicoding.workspace_gc): temp quota, idle time
+# before a project is archived (0 = never) and the IO budget in MB/s
+WORKSPACE_GC_TEMP_QUOTA_GB = float(os.environ.get("WORKSPACE_GC_TEMP_QUOTA_GB", "10"))
+WORKSPACE_GC_PROJECT_IDLE_DAYS = float(os.environ.get("WORKSPACE_GC_PROJECT_IDLE_DAYS", "30"))
+WORKSPACE_GC_IO_MBPS = float(os.environ.get("WORKSPACE_GC_IO_MBPS", "20"))
+
+# Update orchestrator (aicoding.updater): image cache and state, control API
+# port and the bandwidth used to prefetch images in MB/s
+UPDATER_DIR = Path(os.environ.get("UPDATER_DIR", "/var/lib/ai-coding-platform/updater"))
+UPDATER_PORT = int(os.environ.get("UPDATER_PORT", "9107"))
+UPDATE_PULL_MBPS = float(os.environ.get("UPDATE_PULL_MBPS", "20"))
+
+# Runtime warm pool (aicoding.runtime_pool): Docker API of the host, warm
+# runtimes kept, idle minutes before a session runtime is removed (0 = never)
+# and the Docker socket the pool serves to OpenHands
+DOCKER_HOST = os.environ.get("DOCKER_HOST", "unix:///var/run/docker.sock")
+RUNTIME_POOL_SIZE = int(os.environ.get("RUNTIME_POOL_SIZE", "2"))
+RUNTIME_POOL_IDLE_MINUTES = float(os.environ.get("RUNTIME_POOL_IDLE_MINUTES", "60"))
+RUNTIME_POOL_SOCKET = os.environ.get("RUNTIME_POOL_SOCKET", "/var/run/aicoding-docker.sock")
+
+# MCP supervisor (aicoding.mcp_supervisor): server definitions (mcp.json)
+# and the local port its SSE endpoints are served on
+MCP_CONFIG = Path(os.environ.get("MCP_CONFIG", str(Path.home() / ".openhands" / "mcp.json")))
+MCP_SUPERVISOR_PORT = int(os.environ.get("MCP_SUPERVISOR_PORT", "9108"))
+
+# Project snapshots (aicoding.snapshots): where they are kept (same
+# filesystem as the projects), snapshots kept per project and the seconds
+# after a snapshot during which writes count as the same batch of actions
+SNAPSHOTS_DIR = Path(os.environ.get("SNAPSHOTS_DIR", str(WORKSPACE_DIR / "snapshots")))
+SNAPSHOT_RETENTION = int(os.environ.get("SNAPSHOT_RETENTION", "20"))
+SNAPSHOT_BATCH_SECONDS = float(os.environ.get("SNAPSHOT_BATCH_SECONDS", "60"))
+
+# Repository import (aicoding.repo_import): shared blobless object cache of
+# upstream repositories and the token used for https://github.com URLs
+REPO_CACHE_DIR = Path(os.environ.get("REPO_CACHE_DIR", str(WORKSPACE_DIR / "cache" / "git")))
+GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN", "")
+
+# Benchmark history (aicoding.bench_history): one JSON file per suite run
+BENCH_HISTORY_DIR = Path(os.environ.get("BENCH_HISTORY_DIR", "/var/lib/ai-coding-platform/benchmarks"))
+
+# Opt-in profiling (aicoding.profiling): kinds switched on at start
+# ("sample,timers,alloc", "all" or empty), where results are written, the
+# stack sampling interval and the signal that toggles profiling
+PROFILING = os.environ.get("PROFILING", "")
+PROFILING_DIR = Path(os.environ.get("PROFILING_DIR", "/var/lib/ai-coding-platform/profiles"))
+PROFILING_INTERVAL_MS = float(os.environ.get("PROFILING_INTERVAL_MS", "10"))
+PROFILING_SIGNAL = os.environ.get("PROFILING_SIGNAL", "SIGUSR2")
+
+# End-to-end tracing (aicoding.tracing): where spans are written, the share
+# of sessions traced (0 = off) and the port of the tracing LLM gateway
+TRACING_DIR = Path(os.environ.get("TRACING_DIR", "/var/lib/ai-coding-platform/traces"))
+TRACING_SAMPLE_RATE = float(os.environ.get("TRACING_SAMPLE_RATE", "0"))
+LLM_GATEWAY_PORT = int(os.environ.get("LLM_GATEWAY_PORT", "11435"))
+
+# Conversation-affinity scheduling (aicoding.affinity): requests each Ollama
+# node serves at once (keep equal to its OLLAMA_NUM_PARALLEL), the seconds a
+# queued request may be passed over for sessions with a warm cache, and the
+# longest a slot is kept for a session's next turn
+OLLAMA_NUM_PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", "1"))
+AFFINITY_MAX_WAIT_SECONDS = float(os.environ.get("AFFINITY_MAX_WAIT_SECONDS", "30"))
+AFFINITY_MAX_HOLD_SECONDS = float(os.environ.get("AFFINITY_MAX_HOLD_SECONDS", "10"))
+
+# Runtime parameter tuning (aicoding.tuner): cached sweep trials and the
+# profile (and env file) written from their Pareto-optimal settings
+TUNING_DIR = Path(os.environ.get("TUNING_DIR", "/var/lib/ai-coding-platform/tuning"))
@@ -0,0 +1,542 @@
+"""
+Copy-on-write snapshots of workspace projects for rolling back agent actions.
+
+Recovering from an agent run that went wrong used to mean git history (if
+the agent committed) or the tarball backups of docs/MAINTENANCE.md. A
+snapshot is a tree under ``snapshots/<project>/<id>/tree`` whose files share
+their data with the project instead of copying it:
+- reflinks (``FICLONE``) on filesystems that support them (btrfs, XFS with
+  reflink, bcachefs): independent files sharing extents until one is written
+- hardlinks elsewhere (ext4): the snapshot and the project share the inode;
+  writes through the file service replace files (temporary file and
+  rename), so the snapshot keeps the old inode - copy on modify. Programs
+  that rewrite a file in place change the snapshot too; ``verify`` reports
+  such files and ``restore`` refuses to use them
+- plain copies when neither works (another filesystem)
+
+Taking a snapshot costs one clone or link per file and no data IO. Restore
+compares the project with the snapshot manifest (size, mtime and mode, the
+rsync quick check) and only replaces, creates or deletes what differs, so
+its IO is proportional to the changed files; the project's state before
+the restore is itself snapshotted first. Dependency and build caches
+(``node_modules``, ``.venv``, ``dist``, ...) are neither snapshotted nor
+touched by a restore; VCS metadata (``.git``) is.
+
+Each project keeps a retention ring of the newest ``retention`` snapshots.
+``before_write`` is the hook for the agent's write path: it takes a
+snapshot when a write starts a new batch of actions (no snapshot of that
+project within ``batch_seconds``).
+
+Usage:
+    python -m aicoding.snapshots take my-app --label "before refactor"
+    python -m aicoding.snapshots list my-app
+    python -m aicoding.snapshots diff my-app 000012
+    python -m aicoding.snapshots restore my-app 000012
+    python -m aicoding.snapshots verify my-app
+"""
+
+import argparse
+import errno
+import fcntl
+import json
+import logging
+import os
+import shutil
+import stat
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import PROJECTS_DIR, SNAPSHOT_BATCH_SECONDS, SNAPSHOT_RETENTION, SNAPSHOTS_DIR
+from aicoding.workspace import DEFAULT_IGNORED_DIRS
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+# ioctl sharing the extents of one file with another (linux/fs.h)
+FICLONE = 0x40049409
+MODES = ("reflink", "hardlink", "copy")
+
+# Regenerated by package managers and builds; version control is kept
+DEFAULT_EXCLUDED_DIRS = DEFAULT_IGNORED_DIRS - {".git", ".hg", ".svn"}
+
+MANIFEST_NAME = "manifest.json"
+TREE_DIR_NAME = "tree"
+LOCK_NAME = ".lock"
+
+# Errors meaning "this way of sharing data is not available here"
+_UNSUPPORTED = {errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.ENOSYS,
+                errno.EPERM, errno.EMLINK}
+
+
+class SnapshotError(Exception):
+    """A missing project or snapshot, or a snapshot that cannot be restored."""
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+@dataclass
+class Snapshot:
+    id: str
+    project: str
+    created: float
+    label: str
+    mode: str
+    files: int
+    bytes: int
+    seconds: float = 0.0
+
+
+@dataclass
+class Manifest:
+    """What a snapshot holds: files as [size, mtime_ns, mode], symlinks, directories."""
+
+    snapshot: Snapshot
+    files: Dict[str, List[int]] = field(default_factory=dict)
+    symlinks: Dict[str, str] = field(default_factory=dict)
+    dirs: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class Changes:
+    """How a project differs from a snapshot (paths relative to the project)."""
+
+    changed: List[str] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    extra: List[str] = field(default_factory=list)
+    unchanged: int = 0
+
+
+@dataclass
+class RestoreReport:
+    snapshot: str
+    backup: Optional[str]
+    restored: List[str]
+    removed: List[str]
+    unchanged: int
+    seconds: float
+
+
+# ============================================================================
+# Tree Operations
+# ============================================================================
+
+def _scan(root: Path, excluded: frozenset) -> Iterator[Tuple[str, os.DirEntry]]:
+    """(relative path, entry) for everything below ``root``, parents before children."""
+    prefix_len = len(os.fspath(root).rstrip(os.sep)) + 1
+    stack = [os.fspath(root)]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as iterator:
+            entries = sorted(iterator, key=lambda entry: entry.name)
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name in excluded:
+                    continue
+                stack.append(entry.path)
+            yield entry.path[prefix_len:], entry
+
+
+def _reflink(source: str, target: str, st: os.stat_result) -> None:
+    with open(source, "rb") as source_file:
+        descriptor = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_EXCL, stat.S_IMODE(st.st_mode))
+        try:
+            fcntl.ioctl(descriptor, FICLONE, source_file.fileno())
+        except OSError:
+            os.close(descriptor)
+            os.unlink(target)
+            raise
+        os.close(descriptor)
+    shutil.copystat(source, target, follow_symlinks=False)
+
+
+def clone_file(source: str, target: str, st: os.stat_result, mode: str) -> str:
+    """
+    Create ``target`` with the content of ``source``, sharing its data if
+    possible; returns the mode that worked (falling back along ``MODES``).
+    """
+    for candidate in MODES[MODES.index(mode):]:
+        try:
+            if candidate == "reflink":
+                _reflink(source, target, st)
+            elif candidate == "hardlink":
+                os.link(source, target, follow_symlinks=False)
+            else:
+                shutil.copy2(source, target, follow_symlinks=False)
+            return candidate
+        except OSError as e:
+            if candidate == "copy" or e.errno not in _UNSUPPORTED:
+                raise
+            logger.debug("%s not available for %s: %s", candidate, target, e)
+    return "copy"
+
+
+def _replace_with(source: str, target: str, st: os.stat_result, mode: str) -> str:
+    """Clone ``source`` next to ``target`` and rename it over ``target``."""
+    try:
+        if os.path.samestat(os.lstat(target), st):
+            # Already the snapshot's inode (hardlinks): rename would do nothing
+            return "hardlink"
+    except FileNotFoundError:
+        pass
+    temp = f"{target}.snapshot-{os.getpid()}-{threading.get_ident()}"
+    used = clone_file(source, temp, st, mode)
+    try:
+        os.replace(temp, target)
+    except OSError:
+        os.unlink(temp)
+        raise
+    return used
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.unlink(path)
+
+
+# ============================================================================
+# Snapshot Store
+# ============================================================================
+
+class SnapshotStore:
+    """Snapshots of the projects below ``projects_dir``, kept in ``root``."""
+
+    def __init__(self, root: Path = SNAPSHOTS_DIR, projects_dir: Path = PROJECTS_DIR,
+                 retention: int = SNAPSHOT_RETENTION, mode: str = "reflink",
+                 excluded_dirs: frozenset = DEFAULT_EXCLUDED_DIRS,
+                 batch_seconds: float = SNAPSHOT_BATCH_SECONDS) -> None:
+        """
+        Args:
+            root: Directory holding the snapshots; must be on the same
+                filesystem as the projects for reflinks and hardlinks
+            projects_dir: Directory of the projects
+            retention: Snapshots kept per project (oldest removed first)
+            mode: Preferred way to share data: reflink, hardlink or copy
+            excluded_dirs: Directory names neither snapshotted nor restored
+            batch_seconds: Writes within this long of a snapshot belong to its batch
+        """
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        self.root = Path(root)
+        self.projects_dir = Path(projects_dir)
+        self.retention = max(1, retention)
+        self.mode = mode
+        self.excluded_dirs = frozenset(excluded_dirs)
+        self.batch_seconds = batch_seconds
+        self._last_taken: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def project_dir(self, project: str) -> Path:
+        path = self.projects_dir / project
+        if not project or "/" in project or project.startswith(".") or not path.is_dir():
+            raise SnapshotError(f"no project {project!r} in {self.projects_dir}")
+        return path
+
+    @contextmanager
+    def _locked(self, project: str) -> Iterator[Path]:
+        """Serialize snapshot operations on a project (threads and processes)."""
+        directory = self.root / project
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(directory / LOCK_NAME, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield directory
+
+    def list(self, project: str) -> List[Snapshot]:
+        """Snapshots of ``project``, oldest first."""
+        directory = self.root / project
+        if not directory.is_dir():
+            return []
+        snapshots = []
+        for entry in sorted(directory.iterdir()):
+            manifest = entry / MANIFEST_NAME
+            if not entry.name.startswith(".") and manifest.is_file():
+                snapshots.append(Snapshot(**json.loads(manifest.read_text())["snapshot"]))
+        return snapshots
+
+    def manifest(self, project: str, snapshot_id: str) -> Manifest:
+        path = self.root / project / snapshot_id / MANIFEST_NAME
+        try:
+            data = json.loads(path.read_text())
+        except FileNotFoundError:
+            raise SnapshotError(f"no snapshot {snapshot_id} of {project}") from None
+        return Manifest(Snapshot(**data["snapshot"]), data["files"], data["symlinks"], data["dirs"])
+
+    # -- taking --------------------------------------------------------
+
+    def take(self, project: str, label: str = "") -> Snapshot:
+        """Snapshot ``project`` now and trim its retention ring."""
+        source = self.project_dir(project)
+        with self._locked(project) as directory:
+            return self._take(project, source, directory, label)
+
+    def _take(self, project: str, source: Path, directory: Path, label: str, trim: bool = True) -> Snapshot:
+        started = time.monotonic()
+        existing = self.list(project)
+        snapshot_id = f"{int(existing[-1].id) + 1 if existing else 1:06d}"
+        staging = directory / f".{snapshot_id}.partial"
+        if staging.exists():
+            shutil.rmtree(staging)
+        tree = staging / TREE_DIR_NAME
+        tree.mkdir(parents=True)
+        manifest = Manifest(Snapshot(snapshot_id, project, time.time(), label, self.mode, 0, 0))
+        mode = self.mode
+        try:
+            for rel_path, entry in _scan(source, self.excluded_dirs):
+                target = os.path.join(tree, rel_path)
+                st = entry.stat(follow_symlinks=False)
+                if entry.is_dir(follow_symlinks=False):
+                    os.mkdir(target)
+                    manifest.dirs[rel_path] = stat.S_IMODE(st.st_mode)
+                elif entry.is_symlink():
+                    link = os.readlink(entry.path)
+                    os.symlink(link, target)
+                    manifest.symlinks[rel_path] = link
+                elif entry.is_file(follow_symlinks=False):
+                    # The first file shows what the filesystem supports
+                    mode = clone_file(entry.path, target, st, mode)
+                    manifest.files[rel_path] = [st.st_size, st.st_mtime_ns, stat.S_IMODE(st.st_mode)]
+                    manifest.snapshot.bytes += st.st_size
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        snapshot = manifest.snapshot
+        snapshot.mode, snapshot.files = mode, len(manifest.files)
+        snapshot.seconds = time.monotonic() - started
+        (staging / MANIFEST_NAME).write_text(json.dumps(asdict(manifest)))
+        os.rename(staging, directory / snapshot_id)
+        self._last_taken[project] = time.monotonic()
+        if trim:
+            self._trim(project, directory)
+        logger.info("Snapshot %s of %s: %d files, %.1f MB, %s, %.0f ms", snapshot_id, project, snapshot.files,
+                    snapshot.bytes / 1e6, mode, snapshot.seconds * 1000)
+        return snapshot
+
+    def _trim(self, project: str, directory: Path) -> None:
+        for old in self.list(project)[:-self.retention]:
+            shutil.rmtree(directory / old.id, ignore_errors=True)
+
+    def before_write(self, path: Path) -> Optional[Snapshot]:
+        """
+        Hook for the agent's write path: snapshot the project containing
+        ``path`` unless it was snapshotted within ``batch_seconds``.
+        """
+        try:
+            relative = Path(path).resolve().relative_to(self.projects_dir.resolve())
+        except ValueError:
+            return None
+        if len(relative.parts) < 2:
+            return None
+        project = relative.parts[0]
+        last = self._last_taken.get(project)
+        if last is not None and time.monotonic() - last < self.batch_seconds:
+            return None
+        return self.take(project, label=f"before writing {relative.relative_to(project)}")
+
+    # -- comparing and restoring ------------------------------------------
+
+    def _compare(self, source: Path, manifest: Manifest) -> Tuple[Changes, Dict[str, os.DirEntry]]:
+        changes = Changes()
+        current = dict(_scan(source, self.excluded_dirs))
+        for rel_path, (size, mtime_ns, mode) in manifest.files.items():
+            entry = current.get(rel_path)
+            if entry is None:
+                changes.missing.append(rel_path)
+                continue
+            st = entry.stat(follow_symlinks=False)
+            if entry.is_file(follow_symlinks=False) and \
+                    (st.st_size, st.st_mtime_ns, stat.S_IMODE(st.st_mode)) == (size, mtime_ns, mode):
+                changes.unchanged += 1
+            else:
+                changes.changed.append(rel_path)
+        for rel_path, link in manifest.symlinks.items():
+            entry = current.get(rel_path)
+            if entry is None:
+                changes.missing.append(rel_path)
+            elif not entry.is_symlink() or os.readlink(entry.path) != link:
+                changes.changed.append(rel_path)
+        for rel_path in manifest.dirs:
+            entry = current.get(rel_path)
+            if entry is None:
+                changes.missing.append(rel_path)
+            elif not entry.is_dir(follow_symlinks=False):
+                changes.changed.append(rel_path)
+        known = manifest.files.keys() | manifest.symlinks.keys() | manifest.dirs.keys()
+        changes.extra = [rel_path for rel_path in current if rel_path not in known]
+        return changes, current
+
+    def diff(self, project: str, snapshot_id: str) -> Changes:
+        """How ``project`` changed since the snapshot."""
+        return self._compare(self.project_dir(project), self.manifest(project, snapshot_id))[0]
+
+    def verify(self, project: str, snapshot_id: Optional[str] = None) -> Dict[str, List[str]]:
+        """
+        Files of the snapshots (all, or one) that no longer hold the content
+        they were taken with - hardlinked files rewritten in place.
+        """
+        ids = [snapshot_id] if snapshot_id else [snapshot.id for snapshot in self.list(project)]
+        damaged = {}
+        for current_id in ids:
+            manifest = self.manifest(project, current_id)
+            damaged[current_id] = self._damaged(project, manifest, manifest.files)
+        return damaged
+
+    def _damaged(self, project: str, manifest: Manifest, paths: List[str]) -> List[str]:
+        tree = self.root / project / manifest.snapshot.id / TREE_DIR_NAME
+        damaged = []
+        for rel_path in paths:
+            size, mtime_ns, _ = manifest.files[rel_path]
+            try:
+                st = os.lstat(tree / rel_path)
+            except FileNotFoundError:
+                damaged.append(rel_path)
+                continue
+            if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                damaged.append(rel_path)
+        return damaged
+
+    def restore(self, project: str, snapshot_id: str, backup: bool = True) -> RestoreReport:
+        """
+        Bring ``project`` back to the snapshot, touching only what differs.
+
+        Args:
+            project: Project name
+            snapshot_id: Snapshot to restore
+            backup: Snapshot the current state first (so the restore can be undone)
+
+        Raises:
+            SnapshotError: Unknown snapshot, or files it needs were damaged
+        """
+        source = self.project_dir(project)
+        started = time.monotonic()
+        with self._locked(project) as directory:
+            manifest = self.manifest(project, snapshot_id)
+            changes, current = self._compare(source, manifest)
+            needed = [path for path in changes.changed + changes.missing if path in manifest.files]
+            damaged = self._damaged(project, manifest, needed)
+            if damaged:
+                raise SnapshotError(f"snapshot {snapshot_id} of {project} lost the content of "
+                                    f"{', '.join(damaged[:10])}")
+            backup_id = None
+            if backup and (changes.changed or changes.missing or changes.extra):
+                # Trimmed once the restore is done: the ring may be about to drop the snapshot being restored
+                backup_id = self._take(project, source, directory, f"before restoring {snapshot_id}",
+                                       trim=False).id
+            tree = directory / snapshot_id / TREE_DIR_NAME
+            removed = []
+            # Deepest first, so directories are empty when their turn comes
+            for rel_path in sorted(changes.extra, key=lambda path: path.count(os.sep), reverse=True):
+                if not os.path.lexists(source / rel_path):
+                    continue
+                _remove(os.path.join(source, rel_path))
+                removed.append(rel_path)
+            restored = []
+            for rel_path in sorted(changes.changed + changes.missing, key=lambda path: path.count(os.sep)):
+                target = os.path.join(source, rel_path)
+                entry = current.get(rel_path)
+                if rel_path in manifest.dirs:
+                    if entry is not None:
+                        _remove(target)
+                    os.mkdir(target, manifest.dirs[rel_path])
+                elif rel_path in manifest.symlinks:
+                    if entry is not None:
+                        _remove(target)
+                    os.symlink(manifest.symlinks[rel_path], target)
+                else:
+                    if entry is not None and entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(target)
+                    snapshot_file = os.path.join(tree, rel_path)
+                    _replace_with(snapshot_file, target, os.lstat(snapshot_file), manifest.snapshot.mode)
+                    # A chmod of a hardlinked file changed the snapshot's inode too
+                    mode = manifest.files[rel_path][2]
+                    if stat.S_IMODE(os.lstat(target).st_mode) != mode:
+                        os.chmod(target, mode)
+                restored.append(rel_path)
+            self._trim(project, directory)
+            report = RestoreReport(snapshot_id, backup_id, restored, removed, changes.unchanged,
+                                   time.monotonic() - started)
+        logger.info("Restored %s to snapshot %s: %d restored, %d removed, %d unchanged", project,
+                    snapshot_id, len(restored), len(removed), changes.unchanged)
+        return report
+
+    def delete(self, project: str, snapshot_id: str) -> None:
+        with self._locked(project) as directory:
+            if not (directory / snapshot_id / MANIFEST_NAME).is_file():
+                raise SnapshotError(f"no snapshot {snapshot_id} of {project}")
+            shutil.rmtree(directory / snapshot_id)
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Copy-on-write snapshots of workspace projects")
+    parser.add_argument("--snapshots-dir", type=Path, default=SNAPSHOTS_DIR)
+    parser.add_argument("--projects-dir", type=Path, default=PROJECTS_DIR)
+    parser.add_argument("--retention", type=int, default=SNAPSHOT_RETENTION)
+    parser.add_argument("--mode", choices=MODES, default="reflink", help="Preferred way to share file data")
+    sub = parser.add_subparsers(dest="command", required=True)
+    take = sub.add_parser("take", help="Snapshot a project")
+    take.add_argument("project")
+    take.add_argument("--label", default="")
+    listing = sub.add_parser("list", help="Snapshots of a project, oldest first")
+    listing.add_argument("project")
+    diff = sub.add_parser("diff", help="What changed since a snapshot")
+    diff.add_argument("project")
+    diff.add_argument("snapshot")
+    restore = sub.add_parser("restore", help="Bring a project back to a snapshot")
+    restore.add_argument("project")
+    restore.add_argument("snapshot")
+    restore.add_argument("--no-backup", action="store_true", help="Do not snapshot the current state first")
+    verify = sub.add_parser("verify", help="Report snapshot files rewritten in place")
+    verify.add_argument("project")
+    verify.add_argument("snapshot", nargs="?")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    store = SnapshotStore(args.snapshots_dir, args.projects_dir, args.retention, args.mode)
+    try:
+        if args.command == "take":
+            snapshot = store.take(args.project, args.label)
+            print(f"{snapshot.id}: {snapshot.files} files, {snapshot.bytes / 1e6:.1f} MB, "
+                  f"{snapshot.mode}, {snapshot.seconds * 1000:.0f} ms")
+        elif args.command == "list":
+            for snapshot in store.list(args.project):
+                created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(snapshot.created))
+                print(f"{snapshot.id}  {created}  {snapshot.files:>7} files  {snapshot.mode:<8}  {snapshot.label}")
+        elif args.command == "diff":
+            changes = store.diff(args.project, args.snapshot)
+            for prefix, paths in (("M", changes.changed), ("D", changes.missing), ("A", changes.extra)):
+                for path in paths:
+                    print(f"{prefix} {path}")
+            print(f"{changes.unchanged} unchanged", file=sys.stderr)
+        elif args.command == "restore":
+            report = store.restore(args.project, args.snapshot, backup=not args.no_backup)
+            print(json.dumps(asdict(report), indent=2))
+        else:
+            damaged = store.verify(args.project, args.snapshot)
+            for snapshot_id, paths in damaged.items():
+                print(f"{snapshot_id}: {'ok' if not paths else ', '.join(paths)}")
+            return 1 if any(damaged.values()) else 0
+    except SnapshotError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
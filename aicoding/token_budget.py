@@ -0,0 +1,436 @@
+"""
+Tokenizer-aware prompt budgeting for the coder models.
+
+Neither the OpenHands environment nor the Ollama defaults bound the size of
+a prompt: overlong prompts are silently truncated by Ollama, and varying
+``num_ctx`` between requests forces a KV-cache reallocation (a model
+reload). The budgeter fits conversation history and file context into a
+fixed per-model budget before the request is sent, so prefill cost stays
+predictable and ``num_ctx`` never changes.
+
+Token counts are cached by content hash: the same file snippets and old
+conversation turns are counted on every turn of a session, so after the
+first turn nearly every count is a cache hit.
+"""
+
+import hashlib
+import logging
+import os
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from aicoding.context_index import tokenize
+from aicoding.models import ModelProfile, get_profile, normalize_model_name
+
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+# Directory holding <model>/tokenizer.json files for exact counting
+TOKENIZERS_DIR = Path(os.environ.get("TOKENIZERS_DIR", "/opt/tokenizers"))
+
+# Per-message framing overhead of the chat templates (role markers etc.)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+DEFAULT_CACHE_ENTRIES = 16384
+
+TRUNCATION_MARKER = "\n...[truncated]...\n"
+
+# BPE-style pre-tokenisation: words, digit groups, single symbols, whitespace runs
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|\s+|[^\sA-Za-z\d]")
+
+
+# ============================================================================
+# Tokenizers
+# ============================================================================
+
+class HeuristicTokenizer:
+    """
+    Approximate BPE token counts without the model's vocabulary.
+
+    Text is pre-tokenised the way byte-level BPE tokenizers split it and each
+    piece is charged according to the model's characters-per-token ratio.
+    """
+
+    def __init__(self, profile: ModelProfile) -> None:
+        self.name = f"heuristic:{profile.name}"
+        self.chars_per_token = profile.chars_per_token
+
+    def count(self, text: str) -> int:
+        tokens = 0
+        for piece in _PIECE_RE.findall(text):
+            first = piece[0]
+            if first.isalpha():
+                tokens += max(1, round(len(piece) / self.chars_per_token))
+            elif first.isdigit():
+                tokens += (len(piece) + 2) // 3
+            elif first.isspace():
+                tokens += piece.count("\n") + (len(piece.replace("\n", "")) + 3) // 4
+            else:
+                tokens += 1
+        return tokens
+
+
+class HuggingFaceTokenizer:
+    """Exact counts from a model's ``tokenizer.json`` (optional dependency)."""
+
+    def __init__(self, model: str, path: Path) -> None:
+        from tokenizers import Tokenizer  # optional dependency
+
+        self.name = f"hf:{model}"
+        self._tokenizer = Tokenizer.from_file(str(path))
+
+    def count(self, text: str) -> int:
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+def load_tokenizer(model: str):
+    """
+    Best available tokenizer for a model.
+
+    Uses ``$TOKENIZERS_DIR/<model>/tokenizer.json`` when the ``tokenizers``
+    package is installed, otherwise the calibrated heuristic.
+
+    Args:
+        model: Ollama or LiteLLM-style model name
+
+    Returns:
+        Object with ``name`` and ``count(text) -> int``
+    """
+    name = normalize_model_name(model)
+    path = TOKENIZERS_DIR / name.replace(":", "_").replace("/", "_") / "tokenizer.json"
+    if path.exists():
+        try:
+            return HuggingFaceTokenizer(name, path)
+        except ImportError:
+            logger.info("tokenizers package not installed; using heuristic counts for %s", name)
+    return HeuristicTokenizer(get_profile(name))
+
+
+# ============================================================================
+# Cached Token Counter
+# ============================================================================
+
+class TokenCounter:
+    """Token counter with an LRU cache keyed by content hash."""
+
+    def __init__(self, model: str, tokenizer=None,
+                 max_entries: int = DEFAULT_CACHE_ENTRIES) -> None:
+        """
+        Args:
+            model: Model whose tokenizer is used
+            tokenizer: Override the tokenizer (anything with ``count``)
+            max_entries: Cache capacity
+        """
+        self.model = normalize_model_name(model)
+        self.tokenizer = tokenizer or load_tokenizer(self.model)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[bytes, int]" = OrderedDict()
+
+    def count(self, text: str) -> int:
+        """
+        Count tokens in ``text``.
+
+        Only a 16-byte digest is kept per entry, so caching large file
+        contents costs no more memory than caching short messages.
+        """
+        key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached
+        self.misses += 1
+        value = self.tokenizer.count(text)
+        self._cache[key] = value
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return value
+
+    def __call__(self, text: str) -> int:
+        return self.count(text)
+
+
+_COUNTERS: Dict[str, TokenCounter] = {}
+
+
+def get_counter(model: str) -> TokenCounter:
+    """Process-wide shared counter (and cache) for a model."""
+    name = normalize_model_name(model)
+    if name not in _COUNTERS:
+        _COUNTERS[name] = TokenCounter(name)
+    return _COUNTERS[name]
+
+
+def truncate_to_tokens(text: str, max_tokens: int, count: Callable[[str], int]) -> str:
+    """
+    Shorten text to at most ``max_tokens``, keeping its head and tail.
+
+    Args:
+        text: Text to shorten
+        max_tokens: Token limit
+        count: Token counter
+
+    Returns:
+        Text that fits the limit (possibly empty)
+    """
+    if count(text) <= max_tokens:
+        return text
+    if max_tokens <= count(TRUNCATION_MARKER):
+        return ""
+    low, high = 0, len(text)
+    # Binary search the number of characters to keep, split 2:1 head/tail
+    while low < high:
+        keep = (low + high + 1) // 2
+        head = keep * 2 // 3
+        candidate = text[:head] + TRUNCATION_MARKER + text[len(text) - (keep - head):]
+        if count(candidate) <= max_tokens:
+            low = keep
+        else:
+            high = keep - 1
+    head = low * 2 // 3
+    return text[:head] + TRUNCATION_MARKER + text[len(text) - (low - head):] if low else ""
+
+
+# ============================================================================
+# Prompt Budgeter
+# ============================================================================
+
+@dataclass
+class ContextItem:
+    """A piece of file context offered to the prompt (e.g. a retrieved snippet)."""
+
+    label: str
+    text: str
+    score: float = 0.0
+
+
+@dataclass
+class BudgetResult:
+    """A prompt fitted to the model budget."""
+
+    messages: List[Dict[str, str]]
+    context: List[ContextItem]
+    budget: int
+    num_ctx: int
+    tokens_before: int
+    tokens_after: int
+    dropped_messages: int = 0
+    summarized: bool = False
+    truncated_items: int = 0
+    dropped_items: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    @property
+    def options(self) -> Dict[str, int]:
+        """Ollama request options; a constant ``num_ctx`` avoids KV-cache reallocation."""
+        return {"num_ctx": self.num_ctx}
+
+
+@dataclass
+class BudgetTotals:
+    """Running totals across requests."""
+
+    requests: int = 0
+    trimmed_requests: int = 0
+    tokens_before: int = 0
+    tokens_saved: int = 0
+
+
+class PromptBudgeter:
+    """
+    Fit chat history and file context into a model's prompt budget.
+
+    System messages and the latest message are always kept. File context is
+    taken by relevance score; history is taken by a blend of recency and
+    relevance to the latest message, and whatever is dropped is replaced by
+    a short extractive summary.
+    """
+
+    def __init__(self, model: str, counter: Optional[TokenCounter] = None,
+                 file_share: float = 0.5, summary_tokens: int = 200,
+                 keep_recent: int = 2, recency_weight: float = 0.6,
+                 min_truncated_tokens: int = 64) -> None:
+        """
+        Args:
+            model: Target model
+            counter: Token counter (defaults to the shared one for the model)
+            file_share: Fraction of the free budget file context may claim
+                when history also needs room
+            summary_tokens: Budget for the summary of dropped messages
+            keep_recent: Number of most recent history messages preferred
+                regardless of relevance
+            recency_weight: Weight of recency versus query relevance (0..1)
+            min_truncated_tokens: Don't keep truncated items shorter than this
+        """
+        self.profile = get_profile(model)
+        self.counter = counter or get_counter(model)
+        self.file_share = file_share
+        self.summary_tokens = summary_tokens
+        self.keep_recent = keep_recent
+        self.recency_weight = recency_weight
+        self.min_truncated_tokens = min_truncated_tokens
+        self.totals = BudgetTotals()
+
+    @property
+    def budget(self) -> int:
+        return self.profile.num_ctx - self.profile.reserve_output_tokens
+
+    def message_tokens(self, message: Dict[str, str]) -> int:
+        return self.counter.count(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+
+    def _summarize(self, dropped: List[Dict[str, str]]) -> Dict[str, str]:
+        lines = [f"Summary of {len(dropped)} earlier messages:"]
+        for message in dropped:
+            first_line = message.get("content", "").strip().splitlines()[0:1]
+            text = first_line[0][:120] if first_line else ""
+            lines.append(f"- {message.get('role', 'user')}: {text}")
+        content = truncate_to_tokens("\n".join(lines), self.summary_tokens - MESSAGE_OVERHEAD_TOKENS,
+                                     self.counter.tokenizer.count)
+        return {"role": "system", "content": content}
+
+    def _fit_context(self, context: Sequence[ContextItem],
+                     budget: int) -> Tuple[List[ContextItem], int, int, int]:
+        kept: List[ContextItem] = []
+        used = truncated = dropped = 0
+        for item in sorted(context, key=lambda i: -i.score):
+            tokens = self.counter.count(item.text)
+            if used + tokens <= budget:
+                kept.append(item)
+                used += tokens
+                continue
+            room = budget - used
+            if room >= self.min_truncated_tokens:
+                text = truncate_to_tokens(item.text, room, self.counter.tokenizer.count)
+                kept.append(ContextItem(item.label, text, item.score))
+                used += self.counter.count(text)
+                truncated += 1
+            else:
+                dropped += 1
+        return kept, used, truncated, dropped
+
+    def _select_history(self, history: List[Dict[str, str]], query: str,
+                        budget: int) -> Tuple[List[int], int]:
+        query_terms = set(tokenize(query))
+        n = len(history)
+        scored = []
+        for i, message in enumerate(history):
+            recency = (i + 1) / n
+            terms = set(tokenize(message.get("content", "")))
+            relevance = len(query_terms & terms) / len(query_terms) if query_terms else 0.0
+            score = self.recency_weight * recency + (1 - self.recency_weight) * relevance
+            if i >= n - self.keep_recent:
+                score += 1.0
+            scored.append((score, i))
+        selected: List[int] = []
+        used = 0
+        for _, i in sorted(scored, reverse=True):
+            tokens = self.message_tokens(history[i])
+            if used + tokens <= budget:
+                selected.append(i)
+                used += tokens
+        return sorted(selected), used
+
+    def fit(self, messages: Sequence[Dict[str, str]],
+            context: Sequence[ContextItem] = (),
+            query: Optional[str] = None) -> BudgetResult:
+        """
+        Fit a request into the model budget.
+
+        Args:
+            messages: Chat messages ({"role", "content"}), oldest first
+            context: File context items with relevance scores
+            query: Text used to judge relevance (defaults to the last message)
+
+        Returns:
+            Fitted messages and context plus token accounting
+        """
+        messages = list(messages)
+        budget = self.budget
+        message_costs = [self.message_tokens(m) for m in messages]
+        context_costs = [self.counter.count(item.text) for item in context]
+        tokens_before = sum(message_costs) + sum(context_costs)
+
+        if tokens_before <= budget:
+            result = BudgetResult(messages, list(context), budget, self.profile.num_ctx,
+                                  tokens_before, tokens_before)
+            self._record(result)
+            return result
+
+        system_idx = [i for i, m in enumerate(messages) if m.get("role") == "system"]
+        last_idx = len(messages) - 1 if messages else None
+        pinned = set(system_idx) | ({last_idx} if last_idx is not None else set())
+        history_idx = [i for i in range(len(messages)) if i not in pinned]
+        if query is None:
+            query = messages[last_idx].get("content", "") if last_idx is not None else ""
+
+        pinned_tokens = sum(message_costs[i] for i in pinned)
+        if last_idx is not None and pinned_tokens > budget:
+            # Even the pinned messages overflow: shorten the latest message
+            others = pinned_tokens - message_costs[last_idx]
+            room = max(0, budget - others - MESSAGE_OVERHEAD_TOKENS)
+            last = dict(messages[last_idx])
+            last["content"] = truncate_to_tokens(last.get("content", ""), room,
+                                                 self.counter.tokenizer.count)
+            messages[last_idx] = last
+            message_costs[last_idx] = self.message_tokens(last)
+            pinned_tokens = sum(message_costs[i] for i in pinned)
+
+        free = max(0, budget - pinned_tokens)
+        history_need = sum(message_costs[i] for i in history_idx)
+        context_budget = max(int(free * self.file_share), free - history_need)
+        kept_context, context_used, truncated, dropped_items = self._fit_context(context, context_budget)
+
+        history_budget = free - context_used
+        history = [messages[i] for i in history_idx]
+        summarized = False
+        use_summary = False
+        if history_need > history_budget and history:
+            # Only summarise when the summary leaves room for real messages too
+            use_summary = history_budget >= 2 * self.summary_tokens
+            selection_budget = history_budget - (self.summary_tokens if use_summary else 0)
+            selected, _ = self._select_history(history, query, selection_budget)
+        else:
+            selected = list(range(len(history)))
+        kept_history = set(selected)
+        dropped = [history[i] for i in range(len(history)) if i not in kept_history]
+
+        fitted: List[Dict[str, str]] = [messages[i] for i in system_idx]
+        if dropped and use_summary:
+            fitted.append(self._summarize(dropped))
+            summarized = True
+        fitted.extend(history[i] for i in selected)
+        if last_idx is not None and last_idx not in system_idx:
+            fitted.append(messages[last_idx])
+
+        tokens_after = sum(self.message_tokens(m) for m in fitted) + \
+            sum(self.counter.count(item.text) for item in kept_context)
+        result = BudgetResult(fitted, kept_context, budget, self.profile.num_ctx,
+                              tokens_before, tokens_after, dropped_messages=len(dropped),
+                              summarized=summarized, truncated_items=truncated,
+                              dropped_items=dropped_items)
+        self._record(result)
+        return result
+
+    def _record(self, result: BudgetResult) -> None:
+        self.totals.requests += 1
+        self.totals.tokens_before += result.tokens_before
+        self.totals.tokens_saved += result.tokens_saved
+        if result.tokens_saved:
+            self.totals.trimmed_requests += 1
+            logger.info("Fitted %s prompt: %d -> %d tokens (saved %d, dropped %d messages, "
+                        "%d context items)", self.profile.name, result.tokens_before,
+                        result.tokens_after, result.tokens_saved, result.dropped_messages,
+                        result.dropped_items)
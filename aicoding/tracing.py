@@ -0,0 +1,940 @@
+"""
+End-to-end request tracing from the agent session to Ollama and git.
+
+When a user reports that the AI "was slow", the time may have gone to
+model loading, prompt processing (prefill), generation, the runtime
+container start, workspace IO or git. Every hop records spans of one trace:
+- the LLM gateway (``python -m aicoding.tracing gateway``) is served at
+  ``LLM_BASE_URL`` in front of Ollama; each call becomes an ``llm.request``
+  span with ``llm.wait``, ``llm.load``, ``llm.prefill`` and ``llm.generate``
+  children laid out from Ollama's own timings
+- file service tools and ``create_file_at_path``, git commands of the
+  tooling, runtime hand-offs of the warm pool (aicoding.runtime_pool),
+  load generator sessions and the metrics probes record spans where they run
+- context crosses HTTP hops in the W3C ``traceparent`` and ``baggage``
+  headers (MCP calls: in ``params._meta``), with the session id as baggage
+  ``session.id``. Requests without one (OpenHands sends none) are grouped by
+  conversation: a key derived from the system prompt and the first user
+  message, which every turn of a chat resends unchanged
+
+Spans are appended as JSON lines to ``TRACING_DIR/spans-<day>.jsonl``, one
+``O_APPEND`` write per batch, so processes share the files. Sampling is
+decided per session (a hash of the session id, or of the trace id without
+one) at ``TRACING_SAMPLE_RATE``: every hop reaches the same decision without
+coordination, a sampled session is traced completely, and a parent's
+decision always wins. At rate 0 (the default) ``span`` returns a shared
+no-op object.
+
+Usage:
+    python -m aicoding.tracing gateway --upstream http://ollama:11434 --sample-rate 0.2
+    python -m aicoding.tracing sessions --since 24
+    python -m aicoding.tracing waterfall conv-3f9a0c1d2b4e5f60
+"""
+
+import argparse
+import atexit
+import contextvars
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+from urllib.parse import quote, unquote
+
+import requests
+
+from aicoding.profiling import program_name, setup_from_environment
+from aicoding.settings import LLM_GATEWAY_PORT, OLLAMA_HOST, TRACING_DIR, TRACING_SAMPLE_RATE
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+# Spans buffered before a write; a finished local root span writes at once
+BATCH_SPANS = 64
+
+SESSION_BAGGAGE = "session.id"
+
+# Characters of the first user message (or generate prompt) keying a conversation
+CONVERSATION_KEY_CHARS = 2000
+
+GATEWAY_TIMEOUT = 600.0
+
+# Answered by the gateway itself: the scheduler's state (aicoding.affinity)
+GATEWAY_STATUS_PATH = "/_gateway/status"
+
+# Requests a gateway scheduler queues and routes
+SCHEDULED_PATHS = ("/api/chat", "/api/generate")
+
+# Shorter Ollama phases are not recorded as spans
+MIN_PHASE_SECONDS = 0.001
+
+# Headers that belong to one connection and are not forwarded
+HOP_HEADERS = frozenset({"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te",
+                         "trailers", "transfer-encoding", "upgrade", "host", "content-length",
+                         "accept-encoding"})
+
+_TRACEPARENT_RE = re.compile(r"^([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+@dataclass(frozen=True)
+class SpanContext:
+    """What a span passes on to its children, in process or in headers."""
+
+    trace_id: str
+    span_id: str
+    sampled: bool
+    session: Optional[str] = None
+    # Received from another process (its spans are written there)
+    remote: bool = False
+
+
+@dataclass
+class Span:
+    """One timed operation; ``start`` is epoch seconds."""
+
+    name: str
+    kind: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    duration: float = 0.0
+    session: Optional[str] = None
+    service: str = ""
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def end(self) -> float:
+        return self.start + self.duration
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def fail(self, message: str) -> None:
+        self.status = "error"
+        self.attributes["error"] = message
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Span":
+        return cls(**{key: value for key, value in data.items() if key in cls.__dataclass_fields__})
+
+
+class _NoopSpan:
+    """Stands in for a span that is not recorded."""
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def fail(self, message: str) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current: contextvars.ContextVar[Optional[SpanContext]] = contextvars.ContextVar("aicoding_span", default=None)
+
+
+def _new_id(size: int) -> str:
+    # os.urandom rather than random: forked workers and seeded tests must not repeat ids
+    return os.urandom(size).hex()
+
+
+# ============================================================================
+# Export
+# ============================================================================
+
+class JsonlExporter:
+    """Appends spans to ``<directory>/spans-<UTC day>.jsonl``."""
+
+    def __init__(self, directory: Path = TRACING_DIR) -> None:
+        self.directory = Path(directory)
+        self._pending: List[Span] = []
+        self._lock = threading.Lock()
+        self._warned = False
+
+    def export(self, span: Span, flush: bool = False) -> None:
+        with self._lock:
+            self._pending.append(span)
+            flush = flush or len(self._pending) >= BATCH_SPANS
+        if flush:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            spans, self._pending = self._pending, []
+        by_day: Dict[str, List[str]] = {}
+        for span in spans:
+            day = datetime.fromtimestamp(span.start, timezone.utc).strftime("%Y%m%d")
+            by_day.setdefault(day, []).append(json.dumps(asdict(span), separators=(",", ":")) + "\n")
+        for day, lines in by_day.items():
+            data = "".join(lines).encode("utf-8")
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                descriptor = os.open(self.directory / f"spans-{day}.jsonl", os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                                     0o644)
+                try:
+                    # One write per batch keeps lines of concurrent writers whole
+                    written = 0
+                    while written < len(data):
+                        written += os.write(descriptor, data[written:])
+                finally:
+                    os.close(descriptor)
+            except OSError as e:
+                # Tracing must never break the tool it observes
+                if not self._warned:
+                    logger.warning("Dropping spans: cannot write to %s: %s", self.directory, e)
+                    self._warned = True
+
+
+def load_spans(directory: Path = TRACING_DIR, since: Optional[float] = None) -> List[Span]:
+    """
+    Spans stored in ``directory``, oldest first.
+
+    Args:
+        directory: Trace directory
+        since: Skip spans that started before this epoch time
+    """
+    spans = []
+    for path in sorted(Path(directory).glob("spans-*.jsonl")):
+        if since is not None:
+            try:
+                day_end = datetime.strptime(path.stem[len("spans-"):], "%Y%m%d").replace(
+                    tzinfo=timezone.utc).timestamp() + 86400
+            except ValueError:
+                continue
+            if day_end < since:
+                continue
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    span = Span.from_dict(json.loads(line))
+                except (ValueError, TypeError):
+                    # A line cut short by a crash
+                    continue
+                if since is None or span.start >= since:
+                    spans.append(span)
+    spans.sort(key=lambda span: span.start)
+    return spans
+
+
+# ============================================================================
+# Tracer
+# ============================================================================
+
+class _Scope:
+    """Context manager of a span: activates its context and records it on exit."""
+
+    __slots__ = ("tracer", "span", "context", "token", "started", "local_root")
+
+    def __init__(self, tracer: "Tracer", span: Optional[Span], context: SpanContext, local_root: bool) -> None:
+        self.tracer = tracer
+        self.span = span
+        self.context = context
+        self.local_root = local_root
+
+    def __enter__(self) -> Any:
+        self.token = _current.set(self.context)
+        self.started = time.perf_counter()
+        return self.span if self.span is not None else NOOP_SPAN
+
+    def __exit__(self, exc_type: Any, exc: Any, traceback: Any) -> bool:
+        _current.reset(self.token)
+        if self.span is not None:
+            self.span.duration = time.perf_counter() - self.started
+            if exc_type is not None:
+                self.span.fail(f"{exc_type.__name__}: {exc}")
+            self.tracer.exporter.export(self.span, flush=self.local_root)
+        return False
+
+
+class Tracer:
+    """Creates spans, decides sampling and hands finished spans to the exporter."""
+
+    def __init__(self, directory: Path = TRACING_DIR, sample_rate: float = TRACING_SAMPLE_RATE,
+                 service: Optional[str] = None) -> None:
+        """
+        Args:
+            directory: Where spans are written
+            sample_rate: Share of sessions (traces without one) recorded, 0-1
+            service: Name recorded with each span (default: the running tool)
+        """
+        self.exporter = JsonlExporter(directory)
+        self.sample_rate = sample_rate
+        self.service = service
+
+    def configure(self, directory: Optional[Path] = None, sample_rate: Optional[float] = None,
+                  service: Optional[str] = None) -> None:
+        self.exporter.flush()
+        if directory is not None:
+            self.exporter = JsonlExporter(directory)
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if service is not None:
+            self.service = service
+
+    def sampled(self, trace_id: str, session: Optional[str] = None) -> bool:
+        """Head sampling decision for a trace without a parent (same in every process)."""
+        if self.sample_rate >= 1.0:
+            return True
+        if self.sample_rate <= 0.0:
+            return False
+        if session:
+            value = int.from_bytes(hashlib.blake2b(session.encode("utf-8"), digest_size=8).digest(), "big")
+        else:
+            value = int(trace_id[16:], 16)
+        return value < self.sample_rate * 2 ** 64
+
+    def span(self, name: str, kind: str = "internal", session: Optional[str] = None,
+             parent: Optional[SpanContext] = None, **attributes: Any) -> Any:
+        """
+        Context manager timing a block as a span; yields the ``Span`` (or
+        ``NOOP_SPAN`` when not sampled) for ``set`` and ``fail``.
+
+        Args:
+            name: Span name, dotted by hop (``llm.request``, ``git.fetch``)
+            kind: Category: session, llm, workspace, git, runtime, probe, ...
+            session: Session the work belongs to (default: the parent's)
+            parent: Parent context (default: the active span)
+            **attributes: Recorded with the span
+        """
+        if parent is None:
+            parent = _current.get()
+            if parent is None and self.sample_rate <= 0.0:
+                return NOOP_SPAN
+        if parent is not None and not parent.sampled and not parent.remote:
+            # Already decided in this process; the context is active
+            return NOOP_SPAN
+        trace_id = parent.trace_id if parent is not None else _new_id(16)
+        session = session or (parent.session if parent is not None else None)
+        span_id = _new_id(8)
+        sampled = parent.sampled if parent is not None else self.sampled(trace_id, session)
+        context = SpanContext(trace_id, span_id, sampled, session)
+        local_root = parent is None or parent.remote
+        if not sampled:
+            return _Scope(self, None, context, local_root)
+        span = Span(name, kind, trace_id, span_id, parent.span_id if parent is not None else None, time.time(),
+                    session=session, service=self._service(), attributes=attributes)
+        return _Scope(self, span, context, local_root)
+
+    def record(self, parent: Span, name: str, kind: str, start: float, duration: float, **attributes: Any) -> Span:
+        """Record a child span whose times were measured elsewhere (e.g. by Ollama)."""
+        span = Span(name, kind, parent.trace_id, _new_id(8), parent.span_id, start, duration,
+                    session=parent.session, service=parent.service, attributes=attributes)
+        self.exporter.export(span)
+        return span
+
+    def _service(self) -> str:
+        if self.service is None:
+            self.service = program_name()
+        return self.service
+
+    def flush(self) -> None:
+        self.exporter.flush()
+
+
+TRACER = Tracer()
+atexit.register(TRACER.flush)
+
+
+def span(name: str, kind: str = "internal", session: Optional[str] = None,
+         parent: Optional[SpanContext] = None, **attributes: Any) -> Any:
+    """``TRACER.span``: ``with span("git.fetch", kind="git") as current: ...``."""
+    return TRACER.span(name, kind, session, parent, **attributes)
+
+
+def traced(name: Any = None, kind: str = "internal") -> Any:
+    """
+    Decorator recording every call as a span.
+
+    Usable bare (``@traced``, named ``<module>.<qualified name>`` with the
+    module's last part) or with arguments (``@traced(kind="workspace")``).
+    Costs one context lookup per call while tracing is off.
+    """
+
+    def decorate(function: Callable) -> Callable:
+        label = name if isinstance(name, str) else \
+            f"{function.__module__.rpartition('.')[2]}.{function.__qualname__}"
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if TRACER.sample_rate <= 0.0 and _current.get() is None:
+                return function(*args, **kwargs)
+            with TRACER.span(label, kind):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate(name) if callable(name) else decorate
+
+
+# ============================================================================
+# Propagation
+# ============================================================================
+
+def inject(headers: Optional[Dict[str, str]] = None,
+           context: Optional[SpanContext] = None) -> Dict[str, str]:
+    """
+    Add ``traceparent`` (and ``baggage`` with the session) for the active span.
+
+    Returns:
+        ``headers`` (a new dict when None), unchanged without an active span
+    """
+    headers = {} if headers is None else headers
+    context = context or _current.get()
+    if context is None:
+        return headers
+    headers["traceparent"] = f"00-{context.trace_id}-{context.span_id}-{'01' if context.sampled else '00'}"
+    if context.session:
+        headers["baggage"] = f"{SESSION_BAGGAGE}={quote(context.session, safe='')}"
+    return headers
+
+
+def session_from_headers(headers: Mapping[str, str]) -> Optional[str]:
+    """The ``session.id`` baggage entry of request headers (or MCP ``_meta``)."""
+    baggage = next((value for key, value in headers.items() if key.lower() == "baggage"), None)
+    if not baggage:
+        return None
+    for member in str(baggage).split(","):
+        key, _, value = member.split(";", 1)[0].partition("=")
+        if key.strip() == SESSION_BAGGAGE and value.strip():
+            return unquote(value.strip())
+    return None
+
+
+def extract(headers: Mapping[str, str]) -> Optional[SpanContext]:
+    """
+    Remote parent context from ``traceparent`` (and ``baggage``).
+
+    Returns:
+        The context, or None when the header is missing or malformed
+    """
+    value = next((value for key, value in headers.items() if key.lower() == "traceparent"), None)
+    match = _TRACEPARENT_RE.match(str(value).strip().lower()) if value else None
+    if match is None:
+        return None
+    version, trace_id, span_id, flags = match.groups()
+    if version == "ff" or trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return SpanContext(trace_id, span_id, bool(int(flags, 16) & 1), session_from_headers(headers), remote=True)
+
+
+def message_text(content: Any) -> str:
+    """Text of a message's content: a string, or OpenAI-style content parts."""
+    if isinstance(content, list):
+        return "".join(str(part.get("text", "")) for part in content if isinstance(part, dict))
+    return str(content or "")
+
+
+def conversation_key(payload: Mapping[str, Any]) -> Optional[str]:
+    """
+    Stable id of the conversation a chat or generate request belongs to.
+
+    Agents resend the whole conversation on every turn, so its system prompt
+    and first user message identify it across calls.
+
+    >>> first = {"messages": [{"role": "system", "content": "s"}, {"role": "user", "content": "fix it"}]}
+    >>> later = {"messages": first["messages"] + [{"role": "assistant", "content": "ok"}]}
+    >>> conversation_key(first) == conversation_key(later)
+    True
+    """
+    messages = payload.get("messages")
+    if isinstance(messages, list):
+        roles = {"system": "", "user": ""}
+        for message in messages:
+            role = message.get("role") if isinstance(message, dict) else None
+            if role in roles and not roles[role]:
+                roles[role] = message_text(message.get("content"))
+        if not roles["user"]:
+            return None
+        basis = roles["system"] + "\0" + roles["user"][:CONVERSATION_KEY_CHARS]
+    else:
+        prompt = message_text(payload.get("prompt"))
+        if not prompt:
+            return None
+        basis = message_text(payload.get("system")) + "\0" + prompt[:CONVERSATION_KEY_CHARS]
+    return "conv-" + hashlib.sha256(basis.encode("utf-8")).hexdigest()[:16]
+
+
+# ============================================================================
+# LLM Gateway
+# ============================================================================
+
+def record_llm_phases(request_span: Any, stats: Mapping[str, Any], finished: float,
+                      tracer: Optional[Tracer] = None) -> None:
+    """
+    Children of an ``llm.request`` span from Ollama's timings.
+
+    Ollama reports nanosecond durations of the whole request, the model
+    load, prompt evaluation and generation; they are laid out backwards from
+    ``finished`` (epoch seconds, when the last byte arrived). What
+    ``total_duration`` does not explain by the three phases becomes
+    ``llm.wait`` (waiting for a parallel slot, templating).
+    """
+    if not isinstance(request_span, Span) or "eval_duration" not in stats:
+        return
+    tracer = tracer or TRACER
+
+    def seconds(key: str) -> float:
+        return max(0.0, float(stats.get(key) or 0) / 1e9)
+
+    generate, prefill, load = seconds("eval_duration"), seconds("prompt_eval_duration"), seconds("load_duration")
+    wait = max(0.0, seconds("total_duration") - generate - prefill - load)
+    prompt_tokens, output_tokens = int(stats.get("prompt_eval_count") or 0), int(stats.get("eval_count") or 0)
+    request_span.set(prompt_tokens=prompt_tokens, output_tokens=output_tokens)
+    end = finished
+    for name, duration, attributes in (
+            ("llm.generate", generate, {"tokens": output_tokens,
+                                        "tokens_per_second": round(output_tokens / generate, 2) if generate else 0}),
+            ("llm.prefill", prefill, {"tokens": prompt_tokens,
+                                      "tokens_per_second": round(prompt_tokens / prefill, 2) if prefill else 0}),
+            ("llm.load", load, {}),
+            ("llm.wait", wait, {})):
+        if duration >= MIN_PHASE_SECONDS:
+            tracer.record(request_span, name, "llm", end - duration, duration, **attributes)
+            end -= duration
+
+
+def _json_object(data: bytes) -> Dict[str, Any]:
+    try:
+        value = json.loads(data)
+    except (ValueError, UnicodeDecodeError):
+        return {}
+    return value if isinstance(value, dict) else {}
+
+
+class _GatewayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_GatewayServer"
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        logger.debug("%s " + format, self.address_string(), *args)
+
+    def do_GET(self) -> None:  # noqa: N802
+        self._proxy("GET")
+
+    def do_HEAD(self) -> None:  # noqa: N802
+        self._proxy("HEAD")
+
+    def do_POST(self) -> None:  # noqa: N802
+        self._proxy("POST")
+
+    def do_DELETE(self) -> None:  # noqa: N802
+        self._proxy("DELETE")
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        message = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(message)))
+        self.end_headers()
+        self.wfile.write(message)
+
+    def _proxy(self, method: str) -> None:
+        gateway = self.server.gateway
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if self.path == GATEWAY_STATUS_PATH:
+            if gateway.scheduler is None:
+                self._send_json(404, {"error": "no scheduler on this gateway"})
+            else:
+                self._send_json(200, gateway.scheduler.status())
+            return
+        payload = _json_object(body) if body else {}
+        parent = extract(self.headers)
+        session = session_from_headers(self.headers) or conversation_key(payload)
+        with gateway.tracer.span("llm.request", kind="llm", session=session, parent=parent,
+                                 method=method, path=self.path) as current:
+            if payload.get("model"):
+                current.set(model=payload["model"])
+            target, ticket = gateway.upstream, None
+            if gateway.scheduler is not None and method == "POST" and self.path in SCHEDULED_PATHS \
+                    and payload.get("model"):
+                with gateway.tracer.span("llm.queue", kind="llm") as queued:
+                    ticket = gateway.scheduler.admit(session, payload)
+                    queued.set(upstream=ticket.upstream, hit=ticket.hit)
+                target = ticket.upstream
+                if ticket.normalized:
+                    body = json.dumps(payload).encode("utf-8")
+            headers = {key: value for key, value in self.headers.items()
+                       if key.lower() not in HOP_HEADERS and key.lower() not in ("traceparent", "baggage")}
+            headers["Accept-Encoding"] = "identity"
+            inject(headers)
+            stats: Dict[str, Any] = {}
+            # Whether the upstream failed (rather than the client)
+            failed = True
+            started = time.perf_counter()
+            try:
+                try:
+                    upstream = gateway.session().request(method, target + self.path, data=body, headers=headers,
+                                                         stream=True, timeout=gateway.timeout)
+                except requests.RequestException as e:
+                    current.fail(str(e))
+                    self._send_json(502, {"error": f"upstream {target} unreachable: {e}"})
+                    return
+                current.set(status_code=upstream.status_code)
+                failed = upstream.status_code >= 500
+                if failed:
+                    current.fail(f"upstream answered {upstream.status_code}")
+                try:
+                    with upstream:
+                        last_line, first_byte = self._relay(method, upstream)
+                except requests.RequestException as e:
+                    current.fail(f"upstream stream broken: {e}")
+                    failed = True
+                    self.close_connection = True
+                    return
+                except OSError as e:
+                    # The client went away; the upstream request is dropped with it
+                    current.fail(f"client disconnected: {e}")
+                    self.close_connection = True
+                    return
+                if first_byte is not None:
+                    current.set(time_to_first_byte=round(first_byte - started, 6))
+                stats = _json_object(last_line)
+                record_llm_phases(current, stats, time.time(), gateway.tracer)
+            finally:
+                if ticket is not None:
+                    gateway.scheduler.release(ticket, stats, failed=failed)
+
+    def _relay(self, method: str, upstream: requests.Response) -> Tuple[bytes, Optional[float]]:
+        """Stream the upstream response to the client; returns its last line and first-byte time."""
+        self.send_response(upstream.status_code)
+        for name, value in upstream.headers.items():
+            if name.lower() not in HOP_HEADERS and name.lower() not in ("date", "server"):
+                self.send_header(name, value)
+        length = upstream.headers.get("Content-Length")
+        chunked = length is None and method != "HEAD"
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        elif length is not None:
+            self.send_header("Content-Length", length)
+        self.end_headers()
+        if method == "HEAD":
+            return b"", None
+        first_byte = None
+        last_line, partial = b"", b""
+        for chunk in upstream.iter_content(chunk_size=None):
+            if not chunk:
+                continue
+            if first_byte is None:
+                first_byte = time.perf_counter()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk) if chunked else chunk)
+            # Only the final line of a stream (or the whole JSON reply) carries the timings
+            lines = (partial + chunk).split(b"\n")
+            partial = lines.pop()
+            last_line = next((line for line in reversed(lines) if line.strip()), last_line)
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+        return (partial if partial.strip() else last_line), first_byte
+
+
+class _GatewayServer(ThreadingHTTPServer):
+    daemon_threads = True
+    gateway: "LLMGateway"
+
+
+class LLMGateway:
+    """
+    Tracing HTTP proxy in front of Ollama.
+
+    Point ``LLM_BASE_URL`` at it; every request is forwarded unchanged
+    (streaming replies chunk by chunk) and recorded as a span.
+
+    With a ``scheduler`` (aicoding.affinity.AffinityScheduler), chat and
+    generate requests are admitted by it first - it may rewrite their
+    options and picks the upstream - and released with Ollama's final stats.
+    """
+
+    def __init__(self, upstream: str = OLLAMA_HOST, host: str = "127.0.0.1", port: int = 0,
+                 tracer: Optional[Tracer] = None, timeout: float = GATEWAY_TIMEOUT, scheduler: Any = None) -> None:
+        """
+        Args:
+            upstream: Ollama base URL
+            host: Listen address
+            port: Listen port (0: any free port)
+            tracer: Tracer recording the spans (default: ``TRACER``)
+            timeout: Seconds to wait for upstream data
+            scheduler: Queues and routes chat and generate requests (``admit``, ``release``, ``status``)
+        """
+        self.upstream = upstream.rstrip("/")
+        self.host = host
+        self.port = port
+        self.tracer = tracer or TRACER
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self._local = threading.local()
+        self._server: Optional[_GatewayServer] = None
+
+    def session(self) -> requests.Session:
+        """Upstream connection pool of the calling handler thread."""
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = self._local.http = requests.Session()
+        return http
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("LLMGateway is not running")
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "LLMGateway":
+        self._server = _GatewayServer((self.host, self.port), _GatewayHandler)
+        self._server.gateway = self
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05},
+                         name="llm-gateway", daemon=True).start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server = _GatewayServer((self.host, self.port), _GatewayHandler)
+        self._server.gateway = self
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self.tracer.flush()
+
+    def __enter__(self) -> "LLMGateway":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+# ============================================================================
+# Analysis
+# ============================================================================
+
+@dataclass
+class SessionSummary:
+    """Traces of one session, as listed by ``sessions``."""
+
+    session: str
+    traces: int
+    spans: int
+    start: float
+    wall: float
+    llm_seconds: float
+    errors: int
+
+
+def _union_length(intervals: Iterable[Tuple[float, float]]) -> float:
+    total, reach = 0.0, None
+    for start, end in sorted(intervals):
+        if reach is None or start > reach:
+            total += end - start
+            reach = end
+        elif end > reach:
+            total += end - reach
+            reach = end
+    return total
+
+
+def _children(spans: List[Span]) -> Dict[Optional[str], List[Span]]:
+    ids = {span.span_id for span in spans}
+    children: Dict[Optional[str], List[Span]] = {}
+    for span in spans:
+        # Spans whose parent was not recorded (or is elsewhere) are roots
+        children.setdefault(span.parent_id if span.parent_id in ids else None, []).append(span)
+    for siblings in children.values():
+        siblings.sort(key=lambda span: span.start)
+    return children
+
+
+def category(span: Span) -> str:
+    """What a span's exclusive time is charged to: the LLM phase, or the span's kind."""
+    return span.name if span.kind == "llm" else span.kind
+
+
+def exclusive_times(spans: List[Span]) -> Dict[str, float]:
+    """
+    Seconds per category spent in spans but not in their children.
+
+    Children are clipped to their parent; with children running one after
+    another, the totals add up to the wall time covered by the root spans.
+    """
+    children = _children(spans)
+    totals: Dict[str, float] = {}
+    for span in spans:
+        covered = _union_length((max(child.start, span.start), min(child.end, span.end))
+                                for child in children.get(span.span_id, []) if child.end > span.start
+                                and child.start < span.end)
+        totals[category(span)] = totals.get(category(span), 0.0) + max(0.0, span.duration - covered)
+    return totals
+
+
+def wall_time(spans: List[Span]) -> float:
+    """Seconds covered by the root spans."""
+    return _union_length((span.start, span.end) for span in _children(spans).get(None, []))
+
+
+def summarize_sessions(spans: List[Span]) -> List[SessionSummary]:
+    """One summary per session id, most recent first."""
+    sessions: Dict[str, List[Span]] = {}
+    for span in spans:
+        if span.session:
+            sessions.setdefault(span.session, []).append(span)
+    summaries = []
+    for session, members in sessions.items():
+        times = exclusive_times(members)
+        summaries.append(SessionSummary(
+            session, len({span.trace_id for span in members}), len(members), min(span.start for span in members),
+            wall_time(members), sum(seconds for name, seconds in times.items() if name.startswith("llm.")),
+            sum(span.status == "error" for span in members)))
+    summaries.sort(key=lambda summary: summary.start, reverse=True)
+    return summaries
+
+
+def select(spans: List[Span], identifier: str) -> List[Span]:
+    """Spans of a session, or of the trace(s) whose id starts with ``identifier``."""
+    chosen = [span for span in spans if span.session == identifier]
+    return chosen or [span for span in spans if span.trace_id.startswith(identifier.lower())]
+
+
+def _label(span: Span) -> str:
+    details = [str(span.attributes[key]) for key in ("turn", "model", "path") if key in span.attributes]
+    if "tokens" in span.attributes:
+        details.append(f"{span.attributes['tokens']} tok @ {span.attributes.get('tokens_per_second', 0)}/s")
+    if span.status != "ok":
+        details.append(f"ERROR {span.attributes.get('error', '')}".strip())
+    suffix = f" ({', '.join(details)})" if details else ""
+    return f"{span.name}{suffix} [{span.service}]" if span.service else f"{span.name}{suffix}"
+
+
+def render_waterfall(spans: List[Span], width: int = 40) -> List[str]:
+    """
+    Text waterfall of spans: one line per span, children below their
+    parent, with a bar placing it on the session's timeline, followed by the
+    exclusive time per category.
+    """
+    if not spans:
+        return []
+    origin = min(span.start for span in spans)
+    scale = max(max(span.end for span in spans) - origin, 1e-9)
+    children = _children(spans)
+    lines = [f"{'start':>9} {'duration':>9}  {'timeline':<{width + 2}}  span"]
+
+    def render(span: Span, depth: int) -> None:
+        first = min(width - 1, int((span.start - origin) / scale * width))
+        last = max(first + 1, min(width, round((span.end - origin) / scale * width)))
+        bar = " " * first + "=" * (last - first) + " " * (width - last)
+        lines.append(f"{span.start - origin:>8.3f}s {span.duration:>8.3f}s  [{bar}]  {'  ' * depth}{_label(span)}")
+        for child in children.get(span.span_id, []):
+            render(child, depth + 1)
+
+    for root in children.get(None, []):
+        render(root, 0)
+    times = exclusive_times(spans)
+    wall = wall_time(spans)
+    lines += ["", "Time by category (exclusive):"]
+    for name, seconds in sorted(times.items(), key=lambda item: item[1], reverse=True):
+        share = seconds / wall * 100 if wall else 0.0
+        lines.append(f"  {name:<16} {seconds:>9.3f}s {share:>6.1f}%")
+    return lines
+
+
+def _format_time(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end request tracing")
+    parser.add_argument("--dir", type=Path, default=TRACING_DIR, help="Trace directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gateway = sub.add_parser("gateway", help="Serve the tracing LLM gateway in front of Ollama")
+    gateway.add_argument("--host", default="0.0.0.0")
+    gateway.add_argument("--port", type=int, default=LLM_GATEWAY_PORT)
+    gateway.add_argument("--upstream", default=OLLAMA_HOST)
+    gateway.add_argument("--sample-rate", type=float, default=None,
+                         help=f"Share of sessions traced (default: TRACING_SAMPLE_RATE, {TRACING_SAMPLE_RATE})")
+    sessions = sub.add_parser("sessions", help="Traced sessions, most recent first")
+    sessions.add_argument("--since", type=float, default=24.0, help="Hours to look back")
+    sessions.add_argument("--limit", type=int, default=20)
+    waterfall = sub.add_parser("waterfall", help="Latency waterfall of a session or trace")
+    waterfall.add_argument("id", help="Session id, or a trace id (prefix)")
+    waterfall.add_argument("--since", type=float, default=24.0 * 7, help="Hours to look back")
+    waterfall.add_argument("--width", type=int, default=40)
+    waterfall.add_argument("--json", action="store_true", help="Print the spans as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    if args.command == "gateway":
+        if args.sample_rate is not None and not 0.0 <= args.sample_rate <= 1.0:
+            print("Error: --sample-rate must be between 0 and 1", file=sys.stderr)
+            return 1
+        TRACER.configure(args.dir, args.sample_rate, "llm-gateway")
+        server = LLMGateway(args.upstream, args.host, args.port)
+        logger.info("Tracing LLM gateway on %s:%d -> %s (sample rate %s, spans in %s)", args.host, args.port,
+                    args.upstream, TRACER.sample_rate, args.dir)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            TRACER.flush()
+        return 0
+
+    since = time.time() - args.since * 3600
+    spans = load_spans(args.dir, since)
+    if args.command == "sessions":
+        summaries = summarize_sessions(spans)[:args.limit]
+        if not summaries:
+            print(f"No traced sessions in {args.dir}")
+            return 0
+        print(f"{'session':<28} {'started (UTC)':<19} {'traces':>6} {'spans':>6} {'wall s':>8} {'llm s':>8} "
+              f"{'errors':>6}")
+        for summary in summaries:
+            print(f"{summary.session:<28} {_format_time(summary.start):<19} {summary.traces:>6} "
+                  f"{summary.spans:>6} {summary.wall:>8.3f} {summary.llm_seconds:>8.3f} {summary.errors:>6}")
+        return 0
+
+    chosen = select(spans, args.id)
+    if not chosen:
+        print(f"Error: no spans of session or trace {args.id} in {args.dir}", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps([asdict(span) for span in chosen], indent=2))
+        return 0
+    traces = len({span.trace_id for span in chosen})
+    print(f"{args.id}: {traces} trace(s), {len(chosen)} spans, {wall_time(chosen):.3f} s wall, "
+          f"started {_format_time(chosen[0].start)} UTC")
+    print()
+    print("\n".join(render_waterfall(chosen, args.width)))
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
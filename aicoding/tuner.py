@@ -0,0 +1,723 @@
+"""
+Ollama runtime parameter tuner for the host CPU.
+
+Both coder models run CPU-only, where ``num_thread``, ``num_batch``,
+``num_ctx`` and ``OLLAMA_NUM_PARALLEL`` decide how fast a reply comes back
+and how many sessions the instance serves - and the best values depend on
+the cores, memory bandwidth and model. The tuner measures them on the host:
+- every combination of the swept values is a trial: a warm-up request
+  loads the model with the trial's options, then a representative prompt
+  mix (a question, a file edit and a long-context request of synthetic
+  code, ``repetitions`` times) is sent by ``parallel`` concurrent clients
+- a trial records the output tokens per second of all clients together
+  (throughput), the p50/p95 request latency and the prefill speed from
+  Ollama's stats; a request Ollama rejects (out of memory) makes the trial
+  infeasible
+- ``OLLAMA_NUM_PARALLEL`` is a server setting: trials are grouped by it,
+  and a real server is restarted with ``--restart-command`` before each
+  group (the first one too, whatever the server ran) and restarted with
+  ``--restore-parallel`` when the sweep ends. Without a restart command
+  only the value the server runs with is swept, stated with ``--parallel``
+- trials are appended to ``TUNING_DIR/trials.jsonl`` as they finish, keyed
+  by the host, Ollama version, model digest, prompt mix and settings: an
+  interrupted sweep (or one cut short with ``--max-trials``) resumes where
+  it stopped, and nothing is measured twice
+- per model, the Pareto-optimal trials (no other trial has both higher
+  throughput and lower p95 latency) form the front; the recommended
+  setting is the front's point closest to the best of both, or the fastest
+  or lowest-latency one (``--objective``)
+
+The profile (``TUNING_DIR/profile.json``) holds each model's options, the
+server-wide parallelism (from the first model's recommendation; the other
+models are recommended at that value) and the fronts. The LLM gateway
+applies it (``python -m aicoding.affinity serve --profile ...``) and the
+env file next to it sets ``OLLAMA_NUM_PARALLEL`` and ``LLM_NUM_CTX`` for
+docker compose. ``--mock`` sweeps an in-process fake Ollama simulating a CPU
+host instead, offline, for CI.
+
+Usage:
+    python -m aicoding.tuner sweep --model qwen2.5-coder:7b --parallel 1 \\
+        --restart-command "OLLAMA_NUM_PARALLEL={parallel} docker compose up -d ollama"
+    python -m aicoding.tuner sweep --parallel 2          # the running server's OLLAMA_NUM_PARALLEL
+    python -m aicoding.tuner sweep --mock --max-trials 10
+    python -m aicoding.tuner show
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import requests
+
+from aicoding.bench_history import cpu_model, model_digests
+from aicoding.loadgen import percentile
+from aicoding.metrics import read_meminfo
+from aicoding.models import get_profile, normalize_model_name
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import OLLAMA_HOST, OLLAMA_NUM_PARALLEL, PRIMARY_MODEL, SECONDARY_MODEL, TUNING_DIR
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+GIB = 1024 ** 3
+
+DEFAULT_NUM_BATCH = (256, 512, 1024)
+DEFAULT_PARALLEL = (1, 2, 4)
+DEFAULT_REPETITIONS = 2
+
+OBJECTIVES = ("balanced", "throughput", "latency")
+
+# Bump when the prompt mix changes: cached trials of another mix are not reused
+MIX_VERSION = 1
+
+REQUEST_TIMEOUT = 900.0
+
+# How long a restarted Ollama may take to answer again
+READY_TIMEOUT = 180.0
+
+# Fake host of --mock: an Oracle A1 instance with 4 OCPUs and 24 GB
+MOCK_CORES = 4
+MOCK_MEMORY_GB = 24.0
+MOCK_TIME_SCALE = 0.002
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+class TuningError(Exception):
+    """A sweep cannot run as asked."""
+
+
+@dataclass(frozen=True)
+class PromptShape:
+    """One kind of request of the prompt mix."""
+
+    name: str
+    # Code sent along with the instruction
+    context_tokens: int
+    output_tokens: int
+
+
+# What an agent session sends: questions, edits of one file, and calls
+# carrying several files
+DEFAULT_MIX = (
+    PromptShape("question", 300, 128),
+    PromptShape("edit", 1500, 256),
+    PromptShape("long-context", 4000, 64),
+)
+
+SYSTEM_PROMPT = ("You are a coding agent working in a Python repository. Answer with the changed code only, "
+                 "keep the existing style and do not explain.")
+
+
+@dataclass
+class Grid:
+    """Values swept; ``num_ctx`` defaults per model to its catalog value and twice that."""
+
+    num_thread: Sequence[int]
+    num_batch: Sequence[int] = DEFAULT_NUM_BATCH
+    parallel: Sequence[int] = DEFAULT_PARALLEL
+    num_ctx: Optional[Sequence[int]] = None
+
+    def options(self, model: str) -> List[Dict[str, int]]:
+        num_ctx = self.num_ctx or (get_profile(model).num_ctx, 2 * get_profile(model).num_ctx)
+        return [{"num_ctx": context, "num_batch": batch, "num_thread": threads}
+                for context, batch, threads in itertools.product(sorted(set(num_ctx)), sorted(set(self.num_batch)),
+                                                                 sorted(set(self.num_thread)))]
+
+
+@dataclass
+class Trial:
+    """Measurements of one setting of one model."""
+
+    key: str
+    model: str
+    parallel: int
+    options: Dict[str, int]
+    backend: str
+    started: float = field(default_factory=time.time)
+    seconds: float = 0.0
+    requests: int = 0
+    errors: int = 0
+    output_tokens: int = 0
+    # Output tokens per second of all clients together
+    throughput: float = 0.0
+    # Prompt tokens per second, from Ollama's prompt_eval_duration
+    prefill_rate: float = 0.0
+    latency_p50: float = 0.0
+    latency_p95: float = 0.0
+    error: str = ""
+
+    @property
+    def feasible(self) -> bool:
+        return not self.error and not self.errors and self.requests > 0
+
+    def setting(self) -> Dict[str, int]:
+        return dict(self.options, parallel=self.parallel)
+
+    def summary(self) -> Dict[str, Any]:
+        return dict(self.setting(), throughput=round(self.throughput, 3), latency_p50=round(self.latency_p50, 3),
+                    latency_p95=round(self.latency_p95, 3), prefill_rate=round(self.prefill_rate, 2))
+
+
+def default_threads(cpus: Optional[int] = None) -> List[int]:
+    """
+    ``num_thread`` values worth trying: all cores, one spare, and half.
+
+    >>> default_threads(4)
+    [2, 3, 4]
+    """
+    cpus = cpus or os.cpu_count() or 1
+    return sorted({max(1, cpus // 2), max(1, cpus - 1), cpus})
+
+
+# ============================================================================
+# Prompt Mix
+# ============================================================================
+
+def _code(tokens: int, rng: random.Random, chars_per_token: float) -> str:
+    """Synthetic Python of about ``tokens`` tokens."""
+    names = ["config", "request", "items", "path", "user", "value", "result", "session", "payload", "index"]
+    lines: List[str] = []
+    length = 0
+    while length < tokens * chars_per_token:
+        name, other = rng.sample(names, 2)
+        number = rng.randint(0, 999)
+        lines += [f"def {name}_{number}({name}, {other}=None):",
+                  f"    if {other} is None:",
+                  f"        {other} = load_{name}({number})",
+                  f"    return [{name}.get(key, {other}) for key in {name} if key != '{other}']",
+                  ""]
+        length = sum(len(line) + 1 for line in lines)
+    return "\n".join(lines)
+
+
+def build_mix(model: str, shapes: Sequence[PromptShape] = DEFAULT_MIX) -> List[Dict[str, Any]]:
+    """
+    Chat requests of the prompt mix for a model (without ``options``).
+
+    The code is generated from a fixed seed, so every run sends the same mix.
+    """
+    rng = random.Random(MIX_VERSION)
+    chars_per_token = get_profile(model).chars_per_token
+    mix = []
+    for shape in shapes:
+        content = (f"Task ({shape.name}): rename the helper functions below and add type hints.\n\n"
+                   + _code(shape.context_tokens, rng, chars_per_token))
+        mix.append({"messages": [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": content}],
+                    "num_predict": shape.output_tokens})
+    return mix
+
+
+def mix_tokens(shapes: Sequence[PromptShape] = DEFAULT_MIX) -> int:
+    """Context a request of the mix needs at most: prompt, system prompt and reply."""
+    return max(shape.context_tokens + shape.output_tokens for shape in shapes) + 128
+
+
+def mix_id(shapes: Sequence[PromptShape] = DEFAULT_MIX) -> str:
+    return hashlib.sha256(json.dumps([MIX_VERSION, [asdict(shape) for shape in shapes]]).encode()).hexdigest()[:16]
+
+
+# ============================================================================
+# Targets
+# ============================================================================
+
+class OllamaTarget:
+    """
+    The host's Ollama.
+
+    ``OLLAMA_NUM_PARALLEL`` can only change with a restart: ``restart_command``
+    is a shell command with ``{parallel}`` in it, run before the trials of
+    each value and by ``restore()``; without one only the server's current
+    value, which the caller states, is swept.
+    """
+
+    backend = "ollama"
+
+    def __init__(self, url: str = OLLAMA_HOST, restart_command: Optional[str] = None,
+                 parallel: Optional[int] = None, restore_parallel: int = OLLAMA_NUM_PARALLEL,
+                 ready_timeout: float = READY_TIMEOUT) -> None:
+        """
+        Args:
+            url: Ollama base URL
+            restart_command: Restarts Ollama with ``OLLAMA_NUM_PARALLEL={parallel}``
+            parallel: The server's current ``OLLAMA_NUM_PARALLEL``, needed
+                without ``restart_command`` (with one, the server is
+                restarted for the first value whatever it runs)
+            restore_parallel: Value the server is restarted with when the sweep ends
+            ready_timeout: Seconds to wait for a restarted server
+        """
+        self.url = url.rstrip("/")
+        self.restart_command = restart_command
+        self.parallel = None if restart_command else parallel
+        self.restore_parallel = restore_parallel
+        self.ready_timeout = ready_timeout
+
+    def check(self, parallel: Sequence[int]) -> None:
+        if self.restart_command:
+            return
+        if self.parallel is None:
+            raise TuningError("state the OLLAMA_NUM_PARALLEL Ollama runs with (--parallel), "
+                              "or give --restart-command to sweep it")
+        if set(parallel) != {self.parallel}:
+            raise TuningError(f"Ollama runs with OLLAMA_NUM_PARALLEL={self.parallel}; "
+                              f"sweeping other values needs --restart-command")
+
+    def fingerprint(self, model: str) -> Dict[str, str]:
+        """What the trials of a model depend on besides their settings."""
+        fingerprint = {"backend": self.backend, "cpu": cpu_model(), "cpus": str(os.cpu_count() or 0),
+                       "memory_gb": f"{read_meminfo().get('MemTotal', 0) / GIB:.1f}",
+                       "digest": model_digests(self.url).get(f"model:{normalize_model_name(model)}", "")}
+        try:
+            fingerprint["ollama"] = str(requests.get(f"{self.url}/api/version", timeout=10).json().get("version", ""))
+        except (requests.RequestException, ValueError):
+            pass
+        return fingerprint
+
+    @contextmanager
+    def serve(self, parallel: int) -> Iterator[str]:
+        if parallel != self.parallel:
+            self.check([parallel])
+            self._restart(parallel)
+        yield self.url
+
+    def restore(self) -> None:
+        """Restart the server with ``restore_parallel`` if the sweep changed it."""
+        if self.restart_command and self.parallel != self.restore_parallel:
+            self._restart(self.restore_parallel)
+
+    def _restart(self, parallel: int) -> None:
+        logger.info("Restarting Ollama with OLLAMA_NUM_PARALLEL=%d", parallel)
+        # Unknown until the restart succeeded: a failed one is retried by the next group
+        self.parallel = None
+        try:
+            subprocess.run(self.restart_command.format(parallel=parallel), shell=True, check=True,
+                           timeout=self.ready_timeout)
+        except (OSError, subprocess.SubprocessError) as e:
+            raise TuningError(f"restart command failed: {e}") from e
+        self._wait_ready()
+        self.parallel = parallel
+
+    def _wait_ready(self) -> None:
+        deadline = time.monotonic() + self.ready_timeout
+        while True:
+            try:
+                requests.get(f"{self.url}/api/tags", timeout=5).raise_for_status()
+                return
+            except requests.RequestException as e:
+                if time.monotonic() > deadline:
+                    raise TuningError(f"Ollama at {self.url} did not come back: {e}") from e
+                time.sleep(1.0)
+
+
+class MockTarget:
+    """In-process fake Ollama simulating a CPU host (aicoding.fake_ollama), for offline runs and CI."""
+
+    backend = "mock"
+
+    def __init__(self, cores: int = MOCK_CORES, memory_gb: float = MOCK_MEMORY_GB,
+                 time_scale: float = MOCK_TIME_SCALE) -> None:
+        self.cores = cores
+        self.memory_gb = memory_gb
+        self.time_scale = time_scale
+
+    def check(self, parallel: Sequence[int]) -> None:
+        pass
+
+    def restore(self) -> None:
+        pass
+
+    def fingerprint(self, model: str) -> Dict[str, str]:
+        return {"backend": self.backend, "cores": str(self.cores), "memory_gb": str(self.memory_gb),
+                "time_scale": str(self.time_scale)}
+
+    @contextmanager
+    def serve(self, parallel: int) -> Iterator[str]:
+        from aicoding.fake_ollama import FakeOllama
+        with FakeOllama(parallel=parallel, cpu_cores=self.cores, memory_bytes=int(self.memory_gb * GIB),
+                        time_scale=self.time_scale) as fake:
+            yield fake.url
+
+
+# ============================================================================
+# Trials
+# ============================================================================
+
+class TrialCache:
+    """Finished trials, one JSON line each, read back to resume a sweep."""
+
+    def __init__(self, directory: Path = TUNING_DIR) -> None:
+        self.path = Path(directory) / "trials.jsonl"
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Trial]:
+        trials: Dict[str, Trial] = {}
+        try:
+            with open(self.path, encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        data = json.loads(line)
+                        trials[data["key"]] = Trial(**data)
+                    except (ValueError, KeyError, TypeError):
+                        # A line cut short by an interrupted run
+                        continue
+        except FileNotFoundError:
+            pass
+        return trials
+
+    def append(self, trial: Trial) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps(asdict(trial)) + "\n")
+
+
+def trial_key(fingerprint: Dict[str, str], model: str, parallel: int, options: Dict[str, int],
+              repetitions: int, mix: str) -> str:
+    basis = {"fingerprint": fingerprint, "model": normalize_model_name(model), "parallel": parallel,
+             "options": options, "repetitions": repetitions, "mix": mix}
+    return hashlib.sha256(json.dumps(basis, sort_keys=True).encode("utf-8")).hexdigest()[:24]
+
+
+def _chat(http: requests.Session, url: str, payload: Dict[str, Any]) -> Tuple[float, Dict[str, Any], str]:
+    started = time.perf_counter()
+    try:
+        response = http.post(f"{url}/api/chat", json=payload, timeout=REQUEST_TIMEOUT)
+        data = response.json() if response.content else {}
+        if response.status_code != 200:
+            return time.perf_counter() - started, {}, str(data.get("error") or f"HTTP {response.status_code}")
+    except (requests.RequestException, ValueError) as e:
+        return time.perf_counter() - started, {}, str(e)
+    return time.perf_counter() - started, data, ""
+
+
+def run_trial(url: str, trial: Trial, mix: Sequence[Dict[str, Any]], repetitions: int) -> Trial:
+    """
+    Measure one setting: a warm-up, then the mix ``repetitions`` times from ``parallel`` clients.
+
+    Args:
+        url: Ollama (or fake) base URL
+        trial: Trial to fill in (model, parallel, options)
+        mix: Requests from ``build_mix``
+        repetitions: Times the mix is sent
+
+    Returns:
+        The trial with its measurements (``error`` set when the warm-up failed)
+    """
+    def payload(request: Dict[str, Any], num_predict: int) -> Dict[str, Any]:
+        return {"model": trial.model, "messages": request["messages"], "stream": False,
+                "options": dict(trial.options, num_predict=num_predict)}
+
+    local = threading.local()
+
+    def call(request: Dict[str, Any]) -> Tuple[float, Dict[str, Any], str]:
+        http = getattr(local, "http", None)
+        if http is None:
+            http = local.http = requests.Session()
+        return _chat(http, url, payload(request, request["num_predict"]))
+
+    # Loads (or reloads) the model with the trial's options
+    _, _, error = _chat(requests.Session(), url, payload(mix[0], 1))
+    if error:
+        trial.error = error
+        return trial
+    requests_ = [request for _ in range(repetitions) for request in mix]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=trial.parallel) as executor:
+        results = list(executor.map(call, requests_))
+    trial.seconds = time.perf_counter() - started
+    latencies = [latency for latency, _, error in results if not error]
+    replies = [data for _, data, error in results if not error]
+    trial.requests = len(results)
+    trial.errors = len(results) - len(replies)
+    trial.error = next((error for _, _, error in results if error), "")
+    trial.output_tokens = sum(int(data.get("eval_count") or 0) for data in replies)
+    trial.throughput = trial.output_tokens / trial.seconds if trial.seconds else 0.0
+    prefill_seconds = sum(float(data.get("prompt_eval_duration") or 0) for data in replies) / 1e9
+    prompt_tokens = sum(int(data.get("prompt_eval_count") or 0) for data in replies)
+    trial.prefill_rate = prompt_tokens / prefill_seconds if prefill_seconds else 0.0
+    trial.latency_p50 = percentile(latencies, 0.50)
+    trial.latency_p95 = percentile(latencies, 0.95)
+    return trial
+
+
+def sweep(target: Any, models: Sequence[str], grid: Grid, cache: TrialCache,
+          repetitions: int = DEFAULT_REPETITIONS, max_trials: Optional[int] = None,
+          shapes: Sequence[PromptShape] = DEFAULT_MIX) -> Tuple[List[Trial], int]:
+    """
+    Run the trials of the grid that are not cached yet.
+
+    Trials are grouped by ``parallel`` (one server restart each), then by
+    model and ``num_ctx`` (one model reload each). The target's server
+    setting is restored when the sweep ends.
+
+    Args:
+        target: ``OllamaTarget`` or ``MockTarget``
+        models: Models to tune
+        grid: Values to sweep
+        cache: Where finished trials are kept
+        repetitions: Times the prompt mix is sent per trial
+        max_trials: Stop after this many new trials (resume later)
+        shapes: Prompt mix
+
+    Returns:
+        Trials of the grid measured so far (cached and new), and the number still missing
+    """
+    target.check(grid.parallel)
+    needed = mix_tokens(shapes)
+    for model in models:
+        too_small = [options["num_ctx"] for options in grid.options(model) if options["num_ctx"] < needed]
+        if too_small:
+            raise TuningError(f"num_ctx {min(too_small)} cannot hold the prompt mix ({needed} tokens)")
+    done = cache.load()
+    mix = mix_id(shapes)
+    fingerprints = {model: target.fingerprint(model) for model in models}
+    trials, missing, new = [], 0, 0
+    try:
+        for parallel in sorted(set(grid.parallel)):
+            pending = []
+            for model in models:
+                for options in grid.options(model):
+                    key = trial_key(fingerprints[model], model, parallel, options, repetitions, mix)
+                    if key in done:
+                        trials.append(done[key])
+                    else:
+                        pending.append(Trial(key, normalize_model_name(model), parallel, options, target.backend))
+            if not pending:
+                continue
+            if max_trials is not None and new >= max_trials:
+                missing += len(pending)
+                continue
+            with target.serve(parallel) as url:
+                for number, trial in enumerate(pending):
+                    if max_trials is not None and new >= max_trials:
+                        missing += len(pending) - number
+                        break
+                    run_trial(url, trial, build_mix(trial.model, shapes), repetitions)
+                    cache.append(trial)
+                    trials.append(trial)
+                    new += 1
+                    logger.info("%s %s: %.2f tokens/s, p95 %.2f s%s", trial.model,
+                                _format_setting(trial.setting()), trial.throughput, trial.latency_p95,
+                                f" ({trial.error})" if trial.error else "")
+    finally:
+        target.restore()
+    return trials, missing
+
+
+# ============================================================================
+# Pareto Front and Profile
+# ============================================================================
+
+def dominates(first: Trial, second: Trial) -> bool:
+    """Whether ``first`` is at least as good in both objectives and better in one."""
+    return (first.throughput >= second.throughput and first.latency_p95 <= second.latency_p95
+            and (first.throughput > second.throughput or first.latency_p95 < second.latency_p95))
+
+
+def pareto_front(trials: Sequence[Trial]) -> List[Trial]:
+    """Feasible trials no other feasible trial dominates, lowest latency first."""
+    feasible = [trial for trial in trials if trial.feasible]
+    front = [trial for trial in feasible if not any(dominates(other, trial) for other in feasible)]
+    return sorted(front, key=lambda trial: (trial.latency_p95, -trial.throughput))
+
+
+def recommend(front: Sequence[Trial], objective: str = "balanced") -> Optional[Trial]:
+    """
+    Pick one trial of a front.
+
+    ``balanced`` takes the one closest to the (unreachable) point with the
+    front's best throughput and its best latency, both relative to the best.
+    """
+    if not front:
+        return None
+    if objective == "throughput":
+        return max(front, key=lambda trial: (trial.throughput, -trial.latency_p95))
+    if objective == "latency":
+        return min(front, key=lambda trial: (trial.latency_p95, -trial.throughput))
+    best_throughput = max(trial.throughput for trial in front) or 1.0
+    best_latency = min(trial.latency_p95 for trial in front)
+    return min(front, key=lambda trial: math.hypot(1 - trial.throughput / best_throughput,
+                                                   1 - best_latency / trial.latency_p95 if trial.latency_p95 else 0))
+
+
+def build_profile(trials: Sequence[Trial], models: Sequence[str], objective: str = "balanced",
+                  complete: bool = True) -> Dict[str, Any]:
+    """
+    Settings to run with, from the trials of a sweep.
+
+    ``OLLAMA_NUM_PARALLEL`` applies to the whole server: it is taken from
+    the first model's recommendation, and the other models get their best
+    setting at that value.
+    """
+    names = [normalize_model_name(model) for model in models]
+    by_model = {name: [trial for trial in trials if trial.model == name] for name in names}
+    first = recommend(pareto_front(by_model[names[0]]), objective) if names else None
+    if first is None:
+        raise TuningError("no feasible trial to build a profile from")
+    profile: Dict[str, Any] = {
+        "created": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "backend": first.backend,
+        "objective": objective,
+        "complete": complete,
+        "parallel": first.parallel,
+        "models": {},
+    }
+    for name in names:
+        chosen = recommend(pareto_front([trial for trial in by_model[name] if trial.parallel == first.parallel]),
+                           objective)
+        if chosen is None:
+            continue
+        profile["models"][name] = {"options": dict(chosen.options), **chosen.summary(),
+                                   "pareto": [trial.summary() for trial in pareto_front(by_model[name])]}
+    profile["env"] = {"OLLAMA_NUM_PARALLEL": str(first.parallel), "LLM_NUM_CTX": str(first.options["num_ctx"])}
+    return profile
+
+
+def write_profile(profile: Dict[str, Any], directory: Path = TUNING_DIR) -> Tuple[Path, Path]:
+    """
+    Write ``profile.json`` and ``ollama.env`` (for docker compose) into ``directory``.
+
+    Returns:
+        Paths of the profile and of the env file
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path, env = directory / "profile.json", directory / "ollama.env"
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(profile, indent=2) + "\n", encoding="utf-8")
+    temporary.replace(path)
+    env.write_text(f"# Written by python -m aicoding.tuner on {profile['created']}\n"
+                   + "".join(f"{name}={value}\n" for name, value in profile["env"].items()), encoding="utf-8")
+    return path, env
+
+
+def read_profile(path: Path) -> Dict[str, Any]:
+    """Load a profile written by ``write_profile``; raises TuningError when unreadable."""
+    try:
+        profile = json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        raise TuningError(f"cannot read tuning profile {path}: {e}") from e
+    if not isinstance(profile, dict) or not isinstance(profile.get("models"), dict):
+        raise TuningError(f"{path} is not a tuning profile")
+    return profile
+
+
+def profile_options(profile: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Load options per model, as the gateway's scheduler pins them."""
+    return {model: dict(entry.get("options", {})) for model, entry in profile["models"].items()}
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def _format_setting(setting: Dict[str, int]) -> str:
+    return " ".join(f"{name}={setting[name]}" for name in ("parallel", "num_thread", "num_batch", "num_ctx"))
+
+
+def _print_profile(profile: Dict[str, Any]) -> None:
+    state = "" if profile.get("complete", True) else " (sweep incomplete)"
+    print(f"Profile of {profile['created']} ({profile['backend']}, {profile['objective']}){state}: "
+          f"OLLAMA_NUM_PARALLEL={profile['parallel']}")
+    for model, entry in profile["models"].items():
+        print()
+        print(f"{model}: " + ", ".join(f"{name}={value}" for name, value in entry["options"].items()))
+        print(f"  {'parallel':>8} {'num_thread':>10} {'num_batch':>9} {'num_ctx':>7} {'tokens/s':>9} "
+              f"{'p50 s':>8} {'p95 s':>8}")
+        for point in entry["pareto"]:
+            chosen = "*" if point["parallel"] == profile["parallel"] and all(
+                point[name] == value for name, value in entry["options"].items()) else " "
+            print(f"{chosen} {point['parallel']:>8} {point['num_thread']:>10} {point['num_batch']:>9} "
+                  f"{point['num_ctx']:>7} {point['throughput']:>9.2f} {point['latency_p50']:>8.2f} "
+                  f"{point['latency_p95']:>8.2f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Ollama runtime parameter tuner")
+    parser.add_argument("--dir", type=Path, default=TUNING_DIR, help="Trial cache and profile directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("sweep", help="Measure the settings not cached yet and write the profile")
+    run.add_argument("--model", action="append", help="Model to tune (repeat; default: both catalog models)")
+    run.add_argument("--num-thread", type=int, nargs="+", default=None, help="Default: half, all but one, all cores")
+    run.add_argument("--num-batch", type=int, nargs="+", default=list(DEFAULT_NUM_BATCH))
+    run.add_argument("--num-ctx", type=int, nargs="+", default=None, help="Default: catalog value and twice that")
+    run.add_argument("--parallel", type=int, nargs="+", default=None,
+                     help=f"OLLAMA_NUM_PARALLEL values (default: {' '.join(map(str, DEFAULT_PARALLEL))} with "
+                          f"--restart-command or --mock; without, required: the value Ollama runs with)")
+    run.add_argument("--repetitions", type=int, default=DEFAULT_REPETITIONS)
+    run.add_argument("--objective", choices=OBJECTIVES, default="balanced")
+    run.add_argument("--max-trials", type=int, default=None, help="Stop after this many new trials")
+    run.add_argument("--ollama-url", default=OLLAMA_HOST)
+    run.add_argument("--restart-command", default=None,
+                     help="Shell command restarting Ollama with OLLAMA_NUM_PARALLEL={parallel}")
+    run.add_argument("--restore-parallel", type=int, default=OLLAMA_NUM_PARALLEL,
+                     help="OLLAMA_NUM_PARALLEL Ollama is restarted with after the sweep (--restart-command)")
+    run.add_argument("--mock", action="store_true", help="Sweep a fake Ollama simulating a CPU host (CI)")
+    run.add_argument("--mock-cores", type=int, default=MOCK_CORES)
+    run.add_argument("--mock-memory-gb", type=float, default=MOCK_MEMORY_GB)
+    run.add_argument("--time-scale", type=float, default=MOCK_TIME_SCALE, help="Fake latency multiplier")
+    sub.add_parser("show", help="Print the profile and Pareto fronts")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    if args.command == "show":
+        try:
+            _print_profile(read_profile(args.dir / "profile.json"))
+        except TuningError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        return 0
+
+    if args.mock:
+        target: Any = MockTarget(args.mock_cores, args.mock_memory_gb, args.time_scale)
+        threads = args.num_thread or default_threads(args.mock_cores)
+    else:
+        # Without a restart command, the one value swept is the one the server runs with
+        target = OllamaTarget(args.ollama_url, args.restart_command, args.parallel[0] if args.parallel else None,
+                              args.restore_parallel)
+        threads = args.num_thread or default_threads()
+    parallel = args.parallel or (list(DEFAULT_PARALLEL) if args.mock or args.restart_command else [])
+    if min(threads + args.num_batch + parallel + (args.num_ctx or [1])) < 1 or args.repetitions < 1:
+        print("Error: swept values and --repetitions must be positive", file=sys.stderr)
+        return 1
+    models = args.model or [PRIMARY_MODEL, SECONDARY_MODEL]
+    grid = Grid(num_thread=threads, num_batch=args.num_batch, parallel=parallel, num_ctx=args.num_ctx)
+    try:
+        trials, missing = sweep(target, models, grid, TrialCache(args.dir), args.repetitions, args.max_trials)
+        profile = build_profile(trials, models, args.objective, complete=not missing)
+    except TuningError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    path, env = write_profile(profile, args.dir)
+    _print_profile(profile)
+    print()
+    if missing:
+        print(f"{missing} trial(s) left; run the same command again to resume.")
+    print(f"Profile written to {path}; compose settings to {env}")
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
@@ -0,0 +1,1001 @@
+"""
+Update orchestrator: background image prefetch and blue-green swaps.
+
+The monthly "Update Docker Images" procedure (docs/MAINTENANCE.md) pulls
+``ollama/ollama:latest`` and ``ghcr.io/all-hands-ai/openhands:latest`` and
+then restarts, so users are offline for the whole pull and the cold start.
+The orchestrator takes both out of the outage:
+- prefetch: image manifests and layers are fetched from the registry in the
+  background under a bandwidth limit, into a digest-addressed cache
+  (interrupted downloads resume, unchanged layers are never fetched again)
+  and handed to Docker with ``docker load``; an image whose digest matches
+  the running one is not downloaded at all
+- blue-green (OpenHands): a traffic switch - a small TCP proxy owning the
+  public port - forwards to the active container on a loopback slot port.
+  The new container starts on the other slot next to the old one; only
+  once its readiness probe passes several times in a row does the switch
+  send new connections to it. The new container is verified through the
+  switch, then the old one is drained (open connections finish) and
+  removed. A failed readiness probe or verification switches back and
+  removes the new container: rollback is automatic
+- recreate (Ollama): two Ollama containers would hold the models twice, so
+  the container is recreated with the prefetched image - the outage is the
+  cold start only - and the previous container is restored if the new one
+  does not become ready
+
+Container operations go through ``ContainerRuntime``: ``DockerRuntime``
+drives the docker CLI, ``aicoding.fake_runtime.FakeRuntime`` runs
+containers as local HTTP servers for tests.
+
+Usage:
+    # Owns port 3000; OpenHands publishes 127.0.0.1:3001 (see docs/MAINTENANCE.md)
+    python -m aicoding.updater serve
+    python -m aicoding.updater prefetch
+    python -m aicoding.updater update openhands
+    python -m aicoding.updater status
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import logging
+import os
+import platform
+import re
+import selectors
+import socket
+import socketserver
+import subprocess
+import sys
+import tarfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass, field, replace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import UPDATE_PULL_MBPS, UPDATER_DIR, UPDATER_PORT
+from aicoding.workspace_gc import MIB, IOBudget
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+MANIFEST_TYPES = [
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+    "application/vnd.oci.image.manifest.v1+json",
+    "application/vnd.docker.distribution.manifest.v2+json",
+]
+INDEX_TYPES = MANIFEST_TYPES[:2]
+
+DOCKER_HUB = "registry-1.docker.io"
+DOWNLOAD_BLOCK_BYTES = 256 * 1024
+
+# Readiness: consecutive successful probes before traffic is switched
+READY_SUCCESSES = 3
+DEFAULT_PROBE_INTERVAL = 0.5
+DEFAULT_READY_TIMEOUT = 300.0
+# Probes through the switch after swapping, before the old side is drained
+DEFAULT_VERIFY_PROBES = 5
+DEFAULT_DRAIN_TIMEOUT = 60.0
+DEFAULT_STOP_TIMEOUT = 30
+DEFAULT_PREFETCH_INTERVAL = 6 * 3600.0
+
+CONNECT_TIMEOUT = 5.0
+PROXY_BUFFER_BYTES = 64 * 1024
+
+STATE_FILE_NAME = "state.json"
+
+
+@dataclass(frozen=True)
+class Service:
+    """How one platform service is updated."""
+
+    name: str
+    image: str
+    container_port: int
+    health_path: str
+    strategy: str  # "blue-green" or "recreate"
+    # Loopback ports of the two blue-green slots
+    slots: Tuple[int, int] = (0, 0)
+
+
+SERVICES = {
+    "openhands": Service("openhands", "ghcr.io/all-hands-ai/openhands:latest", 3000, "/",
+                         "blue-green", (3001, 3002)),
+    "ollama": Service("ollama", "ollama/ollama:latest", 11434, "/api/version", "recreate"),
+}
+
+
+class UpdateError(Exception):
+    """An image could not be fetched or a container operation failed."""
+
+
+# ============================================================================
+# Container Runtime
+# ============================================================================
+
+@dataclass
+class ContainerSpec:
+    """What is needed to create a container again."""
+
+    name: str
+    image: str
+    # container port -> (host IP, "" for all interfaces; host port)
+    ports: Dict[int, Tuple[str, int]] = field(default_factory=dict)
+    env: List[str] = field(default_factory=list)
+    volumes: List[str] = field(default_factory=list)
+    # network -> aliases
+    networks: Dict[str, List[str]] = field(default_factory=dict)
+    labels: Dict[str, str] = field(default_factory=dict)
+    restart: str = "unless-stopped"
+
+
+@dataclass
+class ContainerInfo:
+    spec: ContainerSpec
+    image_id: str
+    running: bool
+
+
+class ContainerRuntime(ABC):
+    """Container operations used by the orchestrator."""
+
+    @abstractmethod
+    def image_id(self, ref: str) -> Optional[str]:
+        """Local image id (config digest) of ``ref``, None when not present."""
+
+    @abstractmethod
+    def load(self, archive: Path) -> None:
+        """Import a docker-archive tarball."""
+
+    @abstractmethod
+    def find(self, service: str) -> Optional[str]:
+        """Name of the container running ``service`` (Coolify adds suffixes)."""
+
+    @abstractmethod
+    def inspect(self, name: str) -> Optional[ContainerInfo]:
+        """What is needed to create ``name`` again, None when it does not exist."""
+
+    @abstractmethod
+    def run(self, spec: ContainerSpec) -> None:
+        """Create and start a container."""
+
+    @abstractmethod
+    def start(self, name: str) -> None:
+        """Start a stopped container."""
+
+    @abstractmethod
+    def stop(self, name: str, timeout: int = DEFAULT_STOP_TIMEOUT) -> None:
+        """Stop a container, killing it after ``timeout`` seconds."""
+
+    @abstractmethod
+    def remove(self, name: str) -> None:
+        """Remove a container, running or not."""
+
+    @abstractmethod
+    def rename(self, name: str, new_name: str) -> None:
+        """Rename a container."""
+
+
+def _run_docker(command: List[str]) -> subprocess.CompletedProcess:
+    return subprocess.run(command, capture_output=True, text=True, check=False, timeout=600)
+
+
+class DockerRuntime(ContainerRuntime):
+    """``ContainerRuntime`` on the docker CLI."""
+
+    def __init__(self, runner: Callable[[List[str]], subprocess.CompletedProcess] = _run_docker) -> None:
+        self.runner = runner
+
+    def _docker(self, *args: str) -> str:
+        result = self.runner(["docker", *args])
+        if result.returncode != 0:
+            raise UpdateError(f"docker {args[0]} failed: {result.stderr.strip()}")
+        return result.stdout
+
+    def image_id(self, ref: str) -> Optional[str]:
+        result = self.runner(["docker", "image", "inspect", "--format", "{{.Id}}", ref])
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    def load(self, archive: Path) -> None:
+        self._docker("load", "--input", str(archive))
+
+    def find(self, service: str) -> Optional[str]:
+        names = self._docker("ps", "-a", "--format", "{{.Names}}").split()
+        for name in names:
+            if (name == service or name.startswith(f"{service}-")) and "runtime" not in name:
+                return name
+        return None
+
+    def inspect(self, name: str) -> Optional[ContainerInfo]:
+        result = self.runner(["docker", "inspect", "--type", "container", name])
+        if result.returncode != 0:
+            return None
+        container = json.loads(result.stdout)[0]
+        config, host = container["Config"], container["HostConfig"]
+        # Variables baked into the image must come from the new image
+        image_env = set()
+        image = self.runner(["docker", "image", "inspect", "--format", "{{json .Config.Env}}",
+                             container["Image"]])
+        if image.returncode == 0:
+            image_env = set(json.loads(image.stdout) or [])
+        ports = {}
+        for port, bindings in (host.get("PortBindings") or {}).items():
+            if bindings:
+                ports[int(port.split("/")[0])] = (bindings[0].get("HostIp") or "", int(bindings[0]["HostPort"]))
+        volumes = []
+        for mount in container.get("Mounts") or []:
+            source = mount["Name"] if mount["Type"] == "volume" else mount["Source"]
+            volumes.append(f"{source}:{mount['Destination']}" + ("" if mount.get("RW", True) else ":ro"))
+        networks = {network: [alias for alias in settings.get("Aliases") or []
+                              if not container["Id"].startswith(alias)]
+                    for network, settings in (container["NetworkSettings"].get("Networks") or {}).items()}
+        spec = ContainerSpec(
+            name=container["Name"].lstrip("/"), image=config["Image"], ports=ports,
+            env=[entry for entry in config.get("Env") or [] if entry not in image_env],
+            volumes=volumes, networks=networks, labels=dict(config.get("Labels") or {}),
+            restart=(host.get("RestartPolicy") or {}).get("Name") or "no")
+        return ContainerInfo(spec, container["Image"], container["State"]["Running"])
+
+    def run(self, spec: ContainerSpec) -> None:
+        command = ["run", "--detach", "--name", spec.name, "--restart", spec.restart]
+        for container_port, (host_ip, host_port) in spec.ports.items():
+            command += ["--publish", f"{host_ip}:{host_port}:{container_port}" if host_ip
+                        else f"{host_port}:{container_port}"]
+        for entry in spec.env:
+            command += ["--env", entry]
+        for volume in spec.volumes:
+            command += ["--volume", volume]
+        for key, value in spec.labels.items():
+            command += ["--label", f"{key}={value}"]
+        networks = list(spec.networks.items())
+        if networks:
+            command += ["--network", networks[0][0]]
+            command += [arg for alias in networks[0][1] for arg in ("--network-alias", alias)]
+        self._docker(*command, spec.image)
+        for network, aliases in networks[1:]:
+            self._docker("network", "connect", *[arg for alias in aliases for arg in ("--alias", alias)],
+                         network, spec.name)
+
+    def start(self, name: str) -> None:
+        self._docker("start", name)
+
+    def stop(self, name: str, timeout: int = DEFAULT_STOP_TIMEOUT) -> None:
+        self._docker("stop", "--time", str(timeout), name)
+
+    def remove(self, name: str) -> None:
+        self._docker("rm", "--force", name)
+
+    def rename(self, name: str, new_name: str) -> None:
+        self._docker("rename", name, new_name)
+
+
+# ============================================================================
+# Image Prefetch
+# ============================================================================
+
+def parse_image_ref(ref: str) -> Tuple[str, str, str]:
+    """
+    Split an image reference into (registry, repository, tag or digest).
+
+    Examples:
+        "ollama/ollama:latest" -> ("registry-1.docker.io", "ollama/ollama", "latest")
+        "ghcr.io/all-hands-ai/openhands:0.9" -> ("ghcr.io", "all-hands-ai/openhands", "0.9")
+    """
+    name, tag = ref, "latest"
+    if "@" in name:
+        name, tag = name.split("@", 1)
+    elif ":" in name.rsplit("/", 1)[-1]:
+        name, tag = name.rsplit(":", 1)
+    first, _, rest = name.partition("/")
+    if rest and ("." in first or ":" in first or first == "localhost"):
+        return first, rest, tag
+    return DOCKER_HUB, name if "/" in name else f"library/{name}", tag
+
+
+def _host_platform() -> str:
+    machine = platform.machine().lower()
+    return {"x86_64": "amd64", "aarch64": "arm64"}.get(machine, machine)
+
+
+@dataclass
+class PrefetchResult:
+    ref: str
+    image_id: str
+    # False when the local image already had this digest
+    loaded: bool = False
+    bytes_downloaded: int = 0
+    bytes_cached: int = 0
+    seconds: float = 0.0
+
+
+class ImagePrefetcher:
+    """Fetches images from their registry under a bandwidth limit."""
+
+    def __init__(self, runtime: ContainerRuntime, cache_dir: Path = UPDATER_DIR / "cache",
+                 bytes_per_second: float = UPDATE_PULL_MBPS * MIB, arch: Optional[str] = None,
+                 session: Optional[requests.Session] = None, budget: Optional[IOBudget] = None) -> None:
+        """
+        Args:
+            runtime: Where fetched images are loaded
+            cache_dir: Digest-addressed blob cache
+            bytes_per_second: Download bandwidth limit
+            arch: Platform to pick from multi-arch images (default: this host)
+            session: HTTP session (tests)
+            budget: Token bucket used for the limit (default built from ``bytes_per_second``)
+        """
+        self.runtime = runtime
+        self.cache_dir = Path(cache_dir)
+        self.budget = budget or IOBudget(bytes_per_second, ops_per_second=0)
+        self.arch = arch or _host_platform()
+        self.session = session or requests.Session()
+        self._tokens: Dict[str, str] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.results: Dict[str, PrefetchResult] = {}
+
+    # -- registry protocol ---------------------------------------------
+
+    def _base(self, registry: str) -> str:
+        host = registry.split(":")[0]
+        scheme = "http" if host in ("localhost", "127.0.0.1") else "https"
+        return f"{scheme}://{registry}/v2"
+
+    def _get(self, registry: str, repository: str, path: str, **kwargs: Any) -> requests.Response:
+        url = f"{self._base(registry)}/{repository}/{path}"
+        headers = kwargs.pop("headers", {})
+        for _ in range(2):
+            token = self._tokens.get(repository)
+            if token:
+                headers["Authorization"] = f"Bearer {token}"
+            response = self.session.get(url, headers=headers, timeout=60, **kwargs)
+            if response.status_code != 401 or not self._authenticate(repository, response):
+                break
+        if response.status_code >= 400:
+            raise UpdateError(f"GET {url}: HTTP {response.status_code}")
+        return response
+
+    def _authenticate(self, repository: str, response: requests.Response) -> bool:
+        """Fetch an anonymous pull token from the realm in WWW-Authenticate."""
+        challenge = response.headers.get("WWW-Authenticate", "")
+        if not challenge.lower().startswith("bearer ") or repository in self._tokens:
+            return False
+        params = dict(re.findall(r'(\w+)="([^"]*)"', challenge))
+        realm = params.pop("realm", None)
+        if not realm:
+            return False
+        params.setdefault("scope", f"repository:{repository}:pull")
+        token = self.session.get(realm, params=params, timeout=30).json()
+        self._tokens[repository] = token.get("token") or token.get("access_token", "")
+        return True
+
+    def resolve(self, ref: str) -> Dict[str, Any]:
+        """The platform manifest of ``ref`` (multi-arch indexes are resolved)."""
+        registry, repository, tag = parse_image_ref(ref)
+        response = self._get(registry, repository, f"manifests/{tag}",
+                             headers={"Accept": ", ".join(MANIFEST_TYPES)})
+        manifest = response.json()
+        media_type = manifest.get("mediaType") or response.headers.get("Content-Type", "")
+        if media_type in INDEX_TYPES or "manifests" in manifest:
+            candidates = [entry for entry in manifest["manifests"]
+                          if entry.get("platform", {}).get("os") == "linux"
+                          and entry.get("platform", {}).get("architecture") == self.arch]
+            if not candidates:
+                raise UpdateError(f"{ref} has no linux/{self.arch} image")
+            response = self._get(registry, repository, f"manifests/{candidates[0]['digest']}",
+                                 headers={"Accept": ", ".join(MANIFEST_TYPES[2:])})
+            manifest = response.json()
+        return manifest
+
+    def remote_id(self, ref: str) -> str:
+        """Image id the registry currently has for ``ref``."""
+        return self.resolve(ref)["config"]["digest"]
+
+    def _blob_path(self, digest: str) -> Path:
+        algorithm, _, hexdigest = digest.partition(":")
+        return self.cache_dir / "blobs" / algorithm / hexdigest
+
+    def _fetch_blob(self, ref: str, digest: str, size: int, result: PrefetchResult) -> Path:
+        path = self._blob_path(digest)
+        if path.exists():
+            result.bytes_cached += size
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(path.name + ".partial")
+        hasher = hashlib.sha256()
+        offset = partial.stat().st_size if partial.exists() else 0
+        if offset:
+            with open(partial, "rb") as handle:
+                for block in iter(lambda: handle.read(DOWNLOAD_BLOCK_BYTES), b""):
+                    hasher.update(block)
+            result.bytes_cached += offset
+        registry, repository, _ = parse_image_ref(ref)
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        response = self._get(registry, repository, f"blobs/{digest}", headers=headers, stream=True)
+        if offset and response.status_code != 206:
+            # No range support: start over
+            hasher, offset = hashlib.sha256(), 0
+        with response, open(partial, "ab" if offset else "wb") as handle:
+            for block in response.iter_content(DOWNLOAD_BLOCK_BYTES):
+                if self._stop.is_set():
+                    raise UpdateError("prefetch stopped")
+                self.budget.take(nbytes=len(block))
+                handle.write(block)
+                hasher.update(block)
+                result.bytes_downloaded += len(block)
+        if f"sha256:{hasher.hexdigest()}" != digest:
+            partial.unlink()
+            raise UpdateError(f"{ref}: blob {digest[:19]} failed verification")
+        os.replace(partial, path)
+        return path
+
+    def ensure(self, ref: str) -> PrefetchResult:
+        """
+        Make the registry's current ``ref`` available locally.
+
+        Nothing is downloaded when the local image already has the remote
+        digest; otherwise missing layers are fetched (resuming partial
+        downloads) and the image is loaded.
+        """
+        started = time.perf_counter()
+        manifest = self.resolve(ref)
+        image_id = manifest["config"]["digest"]
+        result = PrefetchResult(ref, image_id)
+        if self.runtime.image_id(ref) != image_id:
+            blobs = [manifest["config"]] + manifest["layers"]
+            paths = [self._fetch_blob(ref, blob["digest"], blob.get("size", 0), result) for blob in blobs]
+            archive = self.cache_dir / f"load-{image_id.split(':')[1][:12]}.tar"
+            with tarfile.open(archive, "w") as tar:
+                names = [f"blobs/sha256/{path.name}" for path in paths]
+                for path, name in zip(paths, names):
+                    tar.add(path, arcname=name)
+                document = json.dumps([{"Config": names[0], "RepoTags": [ref], "Layers": names[1:]}]).encode()
+                info = tarfile.TarInfo("manifest.json")
+                info.size = len(document)
+                tar.addfile(info, io.BytesIO(document))
+            try:
+                self.runtime.load(archive)
+            finally:
+                archive.unlink()
+            result.loaded = True
+            logger.info("Prefetched %s (%s): %d bytes downloaded, %d cached", ref, image_id[:19],
+                        result.bytes_downloaded, result.bytes_cached)
+        self._remember(ref, [blob["digest"] for blob in [manifest["config"]] + manifest["layers"]])
+        result.seconds = time.perf_counter() - started
+        self.results[ref] = result
+        return result
+
+    def _remember(self, ref: str, digests: List[str]) -> None:
+        """Keep only the blobs of the latest manifest of every image."""
+        index_path = self.cache_dir / "images.json"
+        try:
+            index = json.loads(index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            index = {}
+        index[ref] = digests
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        index_path.write_text(json.dumps(index, indent=2), encoding="utf-8")
+        keep = {self._blob_path(digest).name for digests in index.values() for digest in digests}
+        for path in (self.cache_dir / "blobs" / "sha256").glob("*"):
+            if path.name not in keep and not path.name.endswith(".partial"):
+                path.unlink()
+
+    # -- background ----------------------------------------------------
+
+    def start(self, refs: List[str], interval: float = DEFAULT_PREFETCH_INTERVAL) -> "ImagePrefetcher":
+        """Check ``refs`` every ``interval`` seconds and fetch new versions."""
+
+        def loop() -> None:
+            while not self._stop.is_set():
+                for ref in refs:
+                    try:
+                        self.ensure(ref)
+                    except (UpdateError, requests.RequestException) as e:
+                        logger.warning("Prefetching %s failed: %s", ref, e)
+                self._stop.wait(interval)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name="image-prefetch", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+# ============================================================================
+# Traffic Switch
+# ============================================================================
+
+def _pump(client: socket.socket, upstream: socket.socket) -> None:
+    """Copy both directions until both sides have closed."""
+    peers = {client: upstream, upstream: client}
+    with selectors.DefaultSelector() as selector:
+        for sock in peers:
+            selector.register(sock, selectors.EVENT_READ)
+        open_sides = 2
+        while open_sides:
+            for key, _ in selector.select():
+                source = key.fileobj
+                try:
+                    data = source.recv(PROXY_BUFFER_BYTES)
+                except OSError:
+                    data = b""
+                if data:
+                    try:
+                        peers[source].sendall(data)
+                    except OSError:
+                        return
+                    continue
+                selector.unregister(source)
+                open_sides -= 1
+                try:
+                    peers[source].shutdown(socket.SHUT_WR)
+                except OSError:
+                    pass
+
+
+class _SwitchHandler(socketserver.BaseRequestHandler):
+    server: "_SwitchServer"
+
+    def setup(self) -> None:
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self) -> None:
+        switch = self.server.switch
+        backend = switch.backend
+        try:
+            upstream = socket.create_connection(backend, timeout=CONNECT_TIMEOUT)
+        except OSError as e:
+            logger.warning("Backend %s:%d unreachable: %s", *backend, e)
+            return
+        upstream.settimeout(None)
+        upstream.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        switch._track(backend, 1)
+        try:
+            _pump(self.request, upstream)
+        finally:
+            upstream.close()
+            switch._track(backend, -1)
+
+
+class _SwitchServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    switch: "TrafficSwitch"
+
+
+class TrafficSwitch:
+    """
+    TCP proxy on the public port forwarding to the active container.
+
+    ``switch`` takes effect for the next connection; connections already
+    open stay with the backend they were made to until they close, which is
+    what draining waits for.
+    """
+
+    def __init__(self, backend: Tuple[str, int], host: str = "0.0.0.0", port: int = 3000) -> None:
+        self.backend = backend
+        self.host = host
+        self.port = port
+        self._connections: Dict[Tuple[str, int], int] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[_SwitchServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _track(self, backend: Tuple[str, int], delta: int) -> None:
+        with self._lock:
+            self._connections[backend] = self._connections.get(backend, 0) + delta
+
+    def connections(self, backend: Tuple[str, int]) -> int:
+        with self._lock:
+            return self._connections.get(backend, 0)
+
+    def switch(self, backend: Tuple[str, int]) -> None:
+        logger.info("Switching traffic from %s:%d to %s:%d", *self.backend, *backend)
+        self.backend = backend
+
+    def start(self) -> "TrafficSwitch":
+        self._server = _SwitchServer((self.host, self.port), _SwitchHandler)
+        self._server.switch = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05},
+                                        name="traffic-switch", daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def url(self) -> str:
+        host = "127.0.0.1" if self.host in ("0.0.0.0", "") else self.host
+        return f"http://{host}:{self.port}"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "TrafficSwitch":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+
+# ============================================================================
+# Orchestrator
+# ============================================================================
+
+@dataclass
+class UpdateReport:
+    """Outcome and timings of one update."""
+
+    service: str
+    status: str = "failed"  # updated, up-to-date, rolled-back, failed
+    reason: str = ""
+    old_image: str = ""
+    new_image: str = ""
+    container: str = ""
+    bytes_downloaded: int = 0
+    prefetch_seconds: float = 0.0
+    ready_seconds: float = 0.0
+    drain_seconds: float = 0.0
+    # Time during which the service did not accept requests
+    downtime_seconds: float = 0.0
+    seconds: float = 0.0
+
+
+def wait_ready(url: str, timeout: float, interval: float = DEFAULT_PROBE_INTERVAL,
+               successes: int = READY_SUCCESSES, session: Optional[requests.Session] = None) -> bool:
+    """True once ``url`` answered below 500 ``successes`` times in a row within ``timeout``."""
+    session = session or requests.Session()
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while time.monotonic() < deadline:
+        try:
+            ok = session.get(url, timeout=5.0, headers={"Connection": "close"}).status_code < 500
+        except requests.RequestException:
+            ok = False
+        streak = streak + 1 if ok else 0
+        if streak >= successes:
+            return True
+        time.sleep(interval)
+    return False
+
+
+class Updater:
+    """Updates services one at a time with prefetched images."""
+
+    def __init__(self, runtime: ContainerRuntime, services: Optional[Dict[str, Service]] = None,
+                 prefetcher: Optional[ImagePrefetcher] = None, switches: Optional[Dict[str, TrafficSwitch]] = None,
+                 state_file: Optional[Path] = UPDATER_DIR / STATE_FILE_NAME,
+                 ready_timeout: float = DEFAULT_READY_TIMEOUT, probe_interval: float = DEFAULT_PROBE_INTERVAL,
+                 verify_probes: int = DEFAULT_VERIFY_PROBES, drain_timeout: float = DEFAULT_DRAIN_TIMEOUT,
+                 stop_timeout: int = DEFAULT_STOP_TIMEOUT) -> None:
+        """
+        Args:
+            runtime: Container runtime
+            services: Services by name (default ``SERVICES``)
+            prefetcher: Fetches images before an update (None: images must be local)
+            switches: Traffic switch of each blue-green service
+            state_file: Where the active container of each service is recorded (None: not kept)
+            ready_timeout: Longest wait for a new container to become ready
+            probe_interval: Seconds between readiness probes
+            verify_probes: Successful probes through the switch before the old side is drained
+            drain_timeout: Longest wait for connections to the old container to close
+            stop_timeout: Grace period when stopping the old container
+        """
+        self.runtime = runtime
+        self.services = services or SERVICES
+        self.prefetcher = prefetcher
+        self.switches = switches or {}
+        self.state_file = state_file
+        self.ready_timeout = ready_timeout
+        self.probe_interval = probe_interval
+        self.verify_probes = verify_probes
+        self.drain_timeout = drain_timeout
+        self.stop_timeout = stop_timeout
+        self.active: Dict[str, str] = self._load_state()
+        self.reports: List[UpdateReport] = []
+        self._lock = threading.Lock()
+
+    def _load_state(self) -> Dict[str, str]:
+        if self.state_file is None:
+            return {}
+        try:
+            return json.loads(self.state_file.read_text(encoding="utf-8"))["active"]
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def _save_state(self) -> None:
+        if self.state_file is None:
+            return
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"active": self.active}, indent=2), encoding="utf-8")
+        os.replace(tmp, self.state_file)
+
+    def container(self, service: str) -> Optional[ContainerInfo]:
+        """The container currently serving ``service``."""
+        name = self.active.get(service)
+        info = self.runtime.inspect(name) if name else None
+        if info is None:
+            name = self.runtime.find(service)
+            info = self.runtime.inspect(name) if name else None
+        return info
+
+    def _probe(self, port: int, service: Service, timeout: float) -> bool:
+        return wait_ready(f"http://127.0.0.1:{port}{service.health_path}", timeout, self.probe_interval)
+
+    def update(self, name: str, force: bool = False) -> UpdateReport:
+        """Bring ``name`` to the registry's current image; never leaves it without a ready container."""
+        service = self.services[name]
+        report = UpdateReport(name)
+        started = time.perf_counter()
+        with self._lock:
+            try:
+                self._update(service, report, force)
+            except (UpdateError, requests.RequestException) as e:
+                report.status, report.reason = "failed", str(e)
+                logger.error("Updating %s failed: %s", name, e)
+        report.seconds = time.perf_counter() - started
+        self.reports.append(report)
+        return report
+
+    def _update(self, service: Service, report: UpdateReport, force: bool) -> None:
+        current = self.container(service.name)
+        if current is None:
+            raise UpdateError(f"no {service.name} container found")
+        report.old_image = current.image_id
+        report.container = current.spec.name
+        if self.prefetcher is not None:
+            prefetched = self.prefetcher.ensure(service.image)
+            report.bytes_downloaded = prefetched.bytes_downloaded
+            report.prefetch_seconds = prefetched.seconds
+        report.new_image = self.runtime.image_id(service.image) or ""
+        if not report.new_image:
+            raise UpdateError(f"{service.image} is not available locally")
+        if report.new_image == current.image_id and not force:
+            report.status = "up-to-date"
+            return
+        if service.strategy == "blue-green":
+            self._blue_green(service, current, report)
+        else:
+            self._recreate(service, current, report)
+
+    def _blue_green(self, service: Service, current: ContainerInfo, report: UpdateReport) -> None:
+        switch = self.switches.get(service.name)
+        if switch is None:
+            raise UpdateError(f"{service.name} has no traffic switch")
+        old_backend = switch.backend
+        slot = 1 if old_backend[1] == service.slots[0] else 0
+        port = service.slots[slot]
+        new_name = f"{service.name}-{'blue' if slot == 0 else 'green'}"
+        if new_name == current.spec.name:
+            raise UpdateError(f"{new_name} is both active and the update target")
+        if self.runtime.inspect(new_name) is not None:
+            self.runtime.remove(new_name)
+
+        launched = time.perf_counter()
+        try:
+            self.runtime.run(replace(current.spec, name=new_name, image=service.image,
+                                     ports={service.container_port: ("127.0.0.1", port)}))
+        except Exception:  # noqa: BLE001 - remove the half-created container, then report the failure
+            if self.runtime.inspect(new_name) is not None:
+                self.runtime.remove(new_name)
+            raise
+        if not self._probe(port, service, self.ready_timeout):
+            self.runtime.remove(new_name)
+            report.status, report.reason = "rolled-back", "new container did not become ready"
+            return
+        report.ready_seconds = time.perf_counter() - launched
+
+        switch.switch(("127.0.0.1", port))
+        if not wait_ready(switch.url + service.health_path, self.probe_interval * (self.verify_probes + 4),
+                          self.probe_interval, self.verify_probes):
+            switch.switch(old_backend)
+            self.runtime.remove(new_name)
+            report.status, report.reason = "rolled-back", "verification through the switch failed"
+            return
+        self.active[service.name] = new_name
+        self._save_state()
+        report.container = new_name
+
+        drain_started = time.perf_counter()
+        deadline = time.monotonic() + self.drain_timeout
+        while switch.connections(old_backend) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        report.drain_seconds = time.perf_counter() - drain_started
+        self.runtime.stop(current.spec.name, self.stop_timeout)
+        self.runtime.remove(current.spec.name)
+        report.status = "updated"
+        logger.info("Updated %s to %s (ready in %.1f s, drained in %.1f s)", service.name,
+                    report.new_image[:19], report.ready_seconds, report.drain_seconds)
+
+    def _recreate(self, service: Service, current: ContainerInfo, report: UpdateReport) -> None:
+        name = current.spec.name
+        port = current.spec.ports.get(service.container_port, ("", service.container_port))[1]
+        backup = f"{name}-previous"
+        if self.runtime.inspect(backup) is not None:
+            self.runtime.remove(backup)
+
+        down = time.perf_counter()
+        self.runtime.stop(name, self.stop_timeout)
+        self.runtime.rename(name, backup)
+        try:
+            self.runtime.run(replace(current.spec, image=service.image))
+        except Exception:  # noqa: BLE001 - put the old container back, then report the failure
+            self._restore_backup(name, backup, port, service)
+            report.downtime_seconds = time.perf_counter() - down
+            raise
+        ready = self._probe(port, service, self.ready_timeout)
+        if not ready:
+            self._restore_backup(name, backup, port, service)
+            report.status, report.reason = "rolled-back", "new container did not become ready"
+        else:
+            report.ready_seconds = time.perf_counter() - down
+            self.runtime.remove(backup)
+            report.status = "updated"
+        report.downtime_seconds = time.perf_counter() - down
+
+    def _restore_backup(self, name: str, backup: str, port: int, service: Service) -> None:
+        """Replace a (possibly half-created) new container with the renamed old one."""
+        if self.runtime.inspect(name) is not None:
+            self.runtime.remove(name)
+        self.runtime.rename(backup, name)
+        self.runtime.start(name)
+        self._probe(port, service, self.ready_timeout)
+
+    def status(self) -> Dict[str, Any]:
+        services = {}
+        for name, service in self.services.items():
+            info = self.container(name)
+            local = self.runtime.image_id(service.image)
+            services[name] = {
+                "container": info.spec.name if info else None,
+                "running": bool(info and info.running),
+                "image": info.image_id if info else None,
+                "update_available": bool(info and local and local != info.image_id),
+                "backend": list(self.switches[name].backend) if name in self.switches else None,
+            }
+        return {"services": services, "reports": [asdict(report) for report in self.reports[-10:]]}
+
+
+# ============================================================================
+# Control API
+# ============================================================================
+
+class _ControlHandler(BaseHTTPRequestHandler):
+    server: "_ControlServer"
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, payload: Any, status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:  # noqa: N802
+        if urlparse(self.path).path == "/status":
+            self._send_json(self.server.updater.status())
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self) -> None:  # noqa: N802
+        path = urlparse(self.path).path
+        name = path[len("/update/"):]
+        if not path.startswith("/update/") or name not in self.server.updater.services:
+            self._send_json({"error": "not found"}, 404)
+            return
+        report = self.server.updater.update(name, force="force=1" in self.path)
+        self._send_json(asdict(report), 500 if report.status == "failed" else 200)
+
+
+class _ControlServer(ThreadingHTTPServer):
+    daemon_threads = True
+    updater: Updater
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"{report['service']}: {report['status']}" + (f" ({report['reason']})" if report["reason"] else ""))
+    if report["status"] in ("updated", "rolled-back"):
+        print(f"  image {report['old_image'][:19]} -> {report['new_image'][:19]}, "
+              f"{report['bytes_downloaded'] / MIB:.0f} MiB downloaded")
+        print(f"  ready after {report['ready_seconds']:.1f} s, drained in {report['drain_seconds']:.1f} s, "
+              f"downtime {report['downtime_seconds']:.1f} s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Prefetch images and update services without downtime")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{UPDATER_PORT}", help="Control API of 'serve'")
+    parser.add_argument("--pull-mbps", type=float, default=UPDATE_PULL_MBPS, help="Download limit in MB/s")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="Run the traffic switch, control API and background prefetch")
+    serve.add_argument("--listen", default="0.0.0.0:3000", help="Public address of OpenHands")
+    serve.add_argument("--prefetch-hours", type=float, default=DEFAULT_PREFETCH_INTERVAL / 3600,
+                       help="0 disables background prefetch")
+    prefetch = sub.add_parser("prefetch", help="Fetch new images now")
+    prefetch.add_argument("services", nargs="*", default=list(SERVICES))
+    update = sub.add_parser("update", help="Update a service through the running orchestrator")
+    update.add_argument("service", choices=list(SERVICES))
+    update.add_argument("--force", action="store_true", help="Recreate even if the image is unchanged")
+    sub.add_parser("status")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.command == "update":
+        response = requests.post(f"{args.url}/update/{args.service}" + ("?force=1" if args.force else ""),
+                                 timeout=DEFAULT_READY_TIMEOUT + DEFAULT_DRAIN_TIMEOUT + 3600)
+        _print_report(response.json())
+        return 0 if response.json()["status"] in ("updated", "up-to-date") else 1
+    if args.command == "status":
+        print(json.dumps(requests.get(f"{args.url}/status", timeout=10).json(), indent=2))
+        return 0
+
+    runtime = DockerRuntime()
+    prefetcher = ImagePrefetcher(runtime, bytes_per_second=args.pull_mbps * MIB)
+    if args.command == "prefetch":
+        for name in args.services:
+            result = prefetcher.ensure(SERVICES[name].image)
+            state = "fetched" if result.loaded else "already current"
+            print(f"{name}: {state} ({result.image_id[:19]}, {result.bytes_downloaded / MIB:.0f} MiB "
+                  f"downloaded, {result.bytes_cached / MIB:.0f} MiB cached, {result.seconds:.0f} s)")
+        return 0
+
+    host, _, port = args.listen.rpartition(":")
+    updater = Updater(runtime, prefetcher=prefetcher)
+    openhands = SERVICES["openhands"]
+    current = updater.container("openhands")
+    backend_port = current.spec.ports.get(openhands.container_port, ("", None))[1] if current else None
+    if backend_port not in openhands.slots:
+        print(f"OpenHands must publish 127.0.0.1:{openhands.slots[0]} (see docs/MAINTENANCE.md)",
+              file=sys.stderr)
+        return 1
+    switch = TrafficSwitch(("127.0.0.1", backend_port), host, int(port)).start()
+    updater.switches["openhands"] = switch
+    control = _ControlServer(("127.0.0.1", UPDATER_PORT), _ControlHandler)
+    control.updater = updater
+    if args.prefetch_hours:
+        prefetcher.start([service.image for service in SERVICES.values()], args.prefetch_hours * 3600)
+    print(f"Traffic switch on {args.listen} -> 127.0.0.1:{backend_port}, control API on {args.url}")
+    try:
+        control.serve_forever(poll_interval=0.05)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        prefetcher.stop()
+        switch.stop()
+        control.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
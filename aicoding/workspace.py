@@ -0,0 +1,81 @@
+"""
+Workspace traversal helpers shared by the platform tooling.
+
+All scans use ``os.scandir`` with an explicit stack (no recursion, no
+``Path.rglob``) and reuse the ``DirEntry`` stat results, so walking a large
+project costs one ``getdents`` per directory plus one ``stat`` per file.
+"""
+
+import os
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
+from aicoding.profiling import timed
+from aicoding.tracing import traced
+
+
+# Directories that never contain useful content for the agent
+DEFAULT_IGNORED_DIRS = frozenset({
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv",
+    ".mypy_cache", ".pytest_cache", ".ruff_cache", ".tox", ".nox", ".next",
+    "dist", "build", ".idea", ".vscode",
+})
+
+
+def iter_files(root: Path,
+               ignored_dirs: Iterable[str] = DEFAULT_IGNORED_DIRS,
+               max_file_bytes: Optional[int] = None) -> Iterator[Tuple[str, os.stat_result]]:
+    """
+    Yield regular files below ``root`` with their stat results.
+
+    Symlinks are not followed and unreadable directories are skipped.
+
+    Args:
+        root: Directory to scan
+        ignored_dirs: Directory names that are not descended into
+        max_file_bytes: Skip empty files and files larger than this
+
+    Yields:
+        (path relative to root, stat result) tuples
+    """
+    ignored = frozenset(ignored_dirs)
+    root_str = os.fspath(root)
+    prefix_len = len(root_str.rstrip(os.sep)) + 1
+    stack = [root_str]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                entries = list(iterator)
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in ignored:
+                        stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    if max_file_bytes is not None and not 0 < st.st_size <= max_file_bytes:
+                        continue
+                    yield entry.path[prefix_len:], st
+            except OSError:
+                continue
+
+
+@traced(kind="workspace")
+@timed
+def create_file_at_path(file_path: Path, content: str) -> None:
+    """
+    Create a file at the specified path with given content.
+    Creates parent directories if they don't exist.
+
+    Same semantics as the agent's file-creation tool (see
+    tests/test_file_operations.py).
+
+    Args:
+        file_path: Path where file should be created
+        content: Content to write to the file
+    """
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_text(content, encoding="utf-8")
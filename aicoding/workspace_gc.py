@@ -0,0 +1,571 @@
+"""
+Bounded-size garbage collector for the OpenHands workspace.
+
+scripts/setup-workspace.sh creates ``/opt/workspace/temp`` but nothing
+cleans it, and the health check only warns once the disk is 80% full. This
+collector runs in the background and keeps the workspace within bounds:
+- an incremental index of size and last access per directory: each pass
+  stats the known directories and lists only those whose mtime changed
+  (new or removed entries); file sizes in unchanged directories are
+  refreshed round-robin, a few directories per pass - never a full ``du``
+- temp data (each entry directly under ``temp/``) is evicted least recently
+  used first when temp exceeds its quota or free disk space drops below the
+  low watermark; entries used within ``min_idle_seconds`` are never touched
+- projects idle for ``project_idle_days`` are archived to
+  ``archive/<name>.tar.gz`` and removed (``restore`` brings them back)
+- all IO (stats, unlinks, archive bytes) draws from a token-bucket IO
+  budget, so reclamation is spread out instead of causing latency spikes;
+  below the critical watermark the budget is lifted (and the idle
+  protection shortened) so the disk does not fill up mid-session
+
+Evicted entries are first renamed into ``temp/.gc-trash`` (atomic, so no
+session ever sees a half-deleted directory) and then deleted file by file
+under the budget.
+
+Usage:
+    python -m aicoding.workspace_gc status
+    python -m aicoding.workspace_gc run --once
+    python -m aicoding.workspace_gc run --temp-quota-gb 10 --io-mbps 20
+    python -m aicoding.workspace_gc restore my-app
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tarfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from aicoding.profiling import setup_from_environment
+from aicoding.settings import (
+    ARCHIVE_DIR,
+    PROJECTS_DIR,
+    TEMP_DIR,
+    WORKSPACE_DIR,
+    WORKSPACE_GC_IO_MBPS,
+    WORKSPACE_GC_PROJECT_IDLE_DAYS,
+    WORKSPACE_GC_TEMP_QUOTA_GB,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+GIB = 1024 ** 3
+MIB = 1024 ** 2
+
+STATE_FORMAT_VERSION = 1
+STATE_FILE_NAME = ".workspace-gc.json"
+TRASH_DIR_NAME = ".gc-trash"
+
+# Free-space watermarks as fractions of the filesystem
+LOW_WATERMARK = 0.15      # start reclaiming below this
+TARGET_WATERMARK = 0.20   # reclaim until this much is free
+CRITICAL_WATERMARK = 0.05  # lift the IO budget below this
+
+DEFAULT_MIN_IDLE_SECONDS = 600.0
+# Below the critical watermark, anything idle this long may go
+EMERGENCY_MIN_IDLE_SECONDS = 60.0
+# Directories whose file sizes are re-read per pass even if unchanged
+DEFAULT_REFRESH_DIRS = 64
+# Metadata operations (stat, unlink, listdir) per second
+DEFAULT_IO_OPS = 2000.0
+DEFAULT_INTERVAL = 30.0
+
+# Token bucket burst: at most this many seconds of budget at once
+BURST_SECONDS = 0.25
+
+
+# ============================================================================
+# IO Budget
+# ============================================================================
+
+class IOBudget:
+    """Token buckets for bytes and metadata operations."""
+
+    def __init__(self, bytes_per_second: float, ops_per_second: float = DEFAULT_IO_OPS,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep) -> None:
+        self.bytes_per_second = bytes_per_second
+        self.ops_per_second = ops_per_second
+        self.clock = clock
+        self.sleep = sleep
+        self.unlimited = False
+        self.slept = 0.0
+        self._tokens = {"bytes": 0.0, "ops": 0.0}
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        elapsed = now - self._updated
+        self._updated = now
+        for kind, rate in (("bytes", self.bytes_per_second), ("ops", self.ops_per_second)):
+            self._tokens[kind] = min(rate * BURST_SECONDS, self._tokens[kind] + elapsed * rate)
+
+    def take(self, ops: int = 0, nbytes: int = 0) -> None:
+        """Wait until ``ops`` operations and ``nbytes`` bytes fit in the budget."""
+        if self.unlimited:
+            return
+        self._refill()
+        self._tokens["ops"] -= ops
+        self._tokens["bytes"] -= nbytes
+        deficit = max(-self._tokens["ops"] / self.ops_per_second if self.ops_per_second else 0.0,
+                      -self._tokens["bytes"] / self.bytes_per_second if self.bytes_per_second else 0.0)
+        if deficit > 0:
+            # Short, frequent waits: the work is spread out, never bunched up
+            self.sleep(deficit)
+            self.slept += deficit
+            self._refill()
+
+
+# ============================================================================
+# Incremental Index
+# ============================================================================
+
+@dataclass
+class DirStats:
+    """Direct contents of one directory (files only, not subdirectories)."""
+
+    mtime_ns: int
+    bytes: int
+    files: int
+    last_access: float
+    subdirs: List[str] = field(default_factory=list)
+
+
+class WorkspaceIndex:
+    """Size and last access per directory, kept current with cheap passes."""
+
+    def __init__(self, roots: List[Path], budget: IOBudget) -> None:
+        self.roots = [Path(root) for root in roots]
+        self.budget = budget
+        self.dirs: Dict[str, DirStats] = {}
+        self.listed = 0
+        self.stats = 0
+        self._refresh_cursor = 0
+
+    def _list(self, path: str, st: os.stat_result) -> DirStats:
+        total = files = 0
+        # Not the directory's atime: listing it (this scan included) updates that
+        last_access = st.st_mtime
+        subdirs = []
+        try:
+            with os.scandir(path) as iterator:
+                entries = list(iterator)
+        except OSError:
+            entries = []
+        self.listed += 1
+        self.budget.take(ops=1 + len(entries))
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                entry_st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            self.stats += 1
+            total += entry_st.st_size if not entry.is_symlink() else 0
+            files += 1
+            last_access = max(last_access, entry_st.st_atime, entry_st.st_mtime)
+        return DirStats(st.st_mtime_ns, total, files, last_access, subdirs)
+
+    def scan(self, refresh_dirs: int = DEFAULT_REFRESH_DIRS) -> None:
+        """
+        Bring the index up to date.
+
+        Every known directory is stat'ed; only directories that are new or
+        whose mtime changed are listed again. ``refresh_dirs`` unchanged
+        directories, taken round-robin, are re-listed to pick up files that
+        grew in place.
+        """
+        seen = set()
+        stack = [str(root) for root in self.roots]
+        known = sorted(self.dirs)
+        refresh = set()
+        if known and refresh_dirs:
+            start = self._refresh_cursor % len(known)
+            refresh = set((known[start:] + known[:start])[:refresh_dirs])
+            self._refresh_cursor = start + refresh_dirs
+        while stack:
+            path = stack.pop()
+            if path in seen:
+                continue
+            try:
+                st = os.stat(path, follow_symlinks=False)
+            except OSError:
+                continue
+            self.stats += 1
+            self.budget.take(ops=1)
+            seen.add(path)
+            cached = self.dirs.get(path)
+            if cached is None or cached.mtime_ns != st.st_mtime_ns or path in refresh:
+                cached = self.dirs[path] = self._list(path, st)
+            stack.extend(cached.subdirs)
+        for path in [path for path in self.dirs if path not in seen]:
+            del self.dirs[path]
+
+    def usage(self, top: Path) -> Tuple[int, int, float]:
+        """(bytes, files, last access) of the subtree at ``top``."""
+        prefix = str(top)
+        total = files = 0
+        last_access = 0.0
+        for path, stats in self.dirs.items():
+            if path == prefix or path.startswith(prefix + os.sep):
+                total += stats.bytes
+                files += stats.files
+                last_access = max(last_access, stats.last_access)
+        return total, files, last_access
+
+    def forget(self, top: Path) -> None:
+        prefix = str(top)
+        for path in [p for p in self.dirs if p == prefix or p.startswith(prefix + os.sep)]:
+            del self.dirs[path]
+
+    def save(self, path: Path) -> None:
+        document = {"version": STATE_FORMAT_VERSION, "dirs": {p: asdict(s) for p, s in self.dirs.items()}}
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(document), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def load(self, path: Path) -> None:
+        try:
+            document = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if document.get("version") == STATE_FORMAT_VERSION:
+            self.dirs = {p: DirStats(**s) for p, s in document["dirs"].items()}
+
+
+# ============================================================================
+# Data Structures
+# ============================================================================
+
+@dataclass
+class Entry:
+    """A unit of eviction: one item under temp/ or one project."""
+
+    path: Path
+    bytes: int
+    files: int
+    last_access: float
+
+
+@dataclass
+class GCReport:
+    """What one collection pass found and did."""
+
+    temp_bytes: int = 0
+    projects_bytes: int = 0
+    free_fraction: float = 1.0
+    evicted: List[str] = field(default_factory=list)
+    evicted_bytes: int = 0
+    archived: List[str] = field(default_factory=list)
+    archived_bytes: int = 0
+    # Over quota, but every remaining entry is in use
+    blocked: bool = False
+    emergency: bool = False
+    throttled_seconds: float = 0.0
+    seconds: float = 0.0
+
+
+# ============================================================================
+# Garbage Collector
+# ============================================================================
+
+def _disk_free_fraction(path: Path) -> float:
+    usage = shutil.disk_usage(path)
+    return usage.free / usage.total if usage.total else 1.0
+
+
+class WorkspaceGC:
+    """Keeps temp within its quota and archives idle projects."""
+
+    def __init__(self, workspace: Path = WORKSPACE_DIR, temp_dir: Optional[Path] = None,
+                 projects_dir: Optional[Path] = None, archive_dir: Optional[Path] = None,
+                 temp_quota_bytes: int = int(WORKSPACE_GC_TEMP_QUOTA_GB * GIB),
+                 project_idle_seconds: float = WORKSPACE_GC_PROJECT_IDLE_DAYS * 86400,
+                 min_idle_seconds: float = DEFAULT_MIN_IDLE_SECONDS,
+                 budget: Optional[IOBudget] = None,
+                 free_fraction: Callable[[Path], float] = _disk_free_fraction,
+                 clock: Callable[[], float] = time.time) -> None:
+        """
+        Args:
+            workspace: Workspace root (state file lives here)
+            temp_dir: Temp directory (default ``<workspace>/temp``)
+            projects_dir: Projects directory (default ``<workspace>/projects``)
+            archive_dir: Where idle projects are archived (default ``<workspace>/archive``)
+            temp_quota_bytes: Size temp is kept under
+            project_idle_seconds: Idle time before a project is archived (0 = never)
+            min_idle_seconds: Entries used more recently are never evicted
+            budget: IO budget (default: ``WORKSPACE_GC_IO_MBPS``)
+            free_fraction: Returns the free fraction of the filesystem at a path
+            clock: Wall-clock time source (compared with file times)
+        """
+        self.workspace = Path(workspace)
+        self.temp_dir = Path(temp_dir) if temp_dir else self.workspace / TEMP_DIR.name
+        self.projects_dir = Path(projects_dir) if projects_dir else self.workspace / PROJECTS_DIR.name
+        self.archive_dir = Path(archive_dir) if archive_dir else self.workspace / ARCHIVE_DIR.name
+        self.trash_dir = self.temp_dir / TRASH_DIR_NAME
+        self.temp_quota_bytes = temp_quota_bytes
+        self.project_idle_seconds = project_idle_seconds
+        self.min_idle_seconds = min_idle_seconds
+        self.budget = budget or IOBudget(WORKSPACE_GC_IO_MBPS * MIB)
+        self.free_fraction = free_fraction
+        self.clock = clock
+        self.state_file = self.workspace / STATE_FILE_NAME
+        self.index = WorkspaceIndex([self.temp_dir, self.projects_dir], self.budget)
+        self.index.load(self.state_file)
+
+    # -- inventory -----------------------------------------------------
+
+    def _entries(self, directory: Path) -> List[Entry]:
+        entries = []
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            return entries
+        for name in names:
+            path = directory / name
+            if path == self.trash_dir:
+                continue
+            if path.is_dir() and not path.is_symlink():
+                size, files, last_access = self.index.usage(path)
+            else:
+                try:
+                    st = path.lstat()
+                except OSError:
+                    continue
+                size, files, last_access = st.st_size, 1, max(st.st_atime, st.st_mtime)
+            entries.append(Entry(path, size, files, last_access))
+        return entries
+
+    def temp_entries(self) -> List[Entry]:
+        """Items directly under temp/, least recently used first."""
+        return sorted(self._entries(self.temp_dir), key=lambda entry: entry.last_access)
+
+    def projects(self) -> List[Entry]:
+        return sorted((entry for entry in self._entries(self.projects_dir) if entry.path.is_dir()),
+                      key=lambda entry: entry.last_access)
+
+    # -- reclaiming ----------------------------------------------------
+
+    def _delete_tree(self, root: Path) -> None:
+        """Delete bottom-up, one budgeted unlink at a time."""
+        if not root.is_dir() or root.is_symlink():
+            self.budget.take(ops=1)
+            root.unlink(missing_ok=True)
+            return
+        for directory, subdirs, files in os.walk(root, topdown=False):
+            for name in files + [d for d in subdirs if os.path.islink(os.path.join(directory, d))]:
+                self.budget.take(ops=1)
+                try:
+                    os.unlink(os.path.join(directory, name))
+                except FileNotFoundError:
+                    pass
+            self.budget.take(ops=1)
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+    def empty_trash(self) -> None:
+        if not self.trash_dir.exists():
+            return
+        for name in sorted(os.listdir(self.trash_dir)):
+            self._delete_tree(self.trash_dir / name)
+
+    def evict(self, entry: Entry) -> None:
+        """Move an entry out of sight atomically, then delete it under the budget."""
+        self.trash_dir.mkdir(parents=True, exist_ok=True)
+        target = self.trash_dir / f"{entry.path.name}.{time.time_ns()}"
+        os.rename(entry.path, target)
+        self.index.forget(entry.path)
+        self._delete_tree(target)
+
+    def archive(self, project: Entry) -> Path:
+        """Write ``<archive>/<name>.tar.gz`` under the byte budget, then remove the project."""
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        archive = self.archive_dir / f"{project.path.name}.tar.gz"
+        tmp = archive.with_name(archive.name + ".tmp")
+        with tarfile.open(tmp, "w:gz", compresslevel=6) as tar:
+            for directory, subdirs, files in os.walk(project.path):
+                subdirs.sort()
+                for name in sorted(files) + [d for d in subdirs if os.path.islink(os.path.join(directory, d))]:
+                    path = os.path.join(directory, name)
+                    info = tar.gettarinfo(path, arcname=os.path.relpath(path, project.path.parent))
+                    self.budget.take(ops=1, nbytes=info.size)
+                    if info.isreg():
+                        with open(path, "rb") as handle:
+                            tar.addfile(info, handle)
+                    else:
+                        tar.addfile(info)
+                if not files and not subdirs:
+                    tar.add(directory, arcname=os.path.relpath(directory, project.path.parent),
+                            recursive=False)
+        os.replace(tmp, archive)
+        self.evict(project)
+        return archive
+
+    def restore(self, name: str) -> Path:
+        """Extract an archived project back into projects/."""
+        archive = self.archive_dir / f"{name}.tar.gz"
+        target = self.projects_dir / name
+        if target.exists():
+            raise FileExistsError(f"{target} already exists")
+        with tarfile.open(archive, "r:gz") as tar:
+            tar.extractall(self.projects_dir, filter="data")
+        archive.unlink()
+        return target
+
+    # -- policy --------------------------------------------------------
+
+    def collect(self) -> GCReport:
+        """One pass: update the index, then evict and archive as needed."""
+        started = time.perf_counter()
+        slept_before = self.budget.slept
+        report = GCReport()
+        free = self.free_fraction(self.workspace)
+        report.emergency = free < CRITICAL_WATERMARK
+        self.budget.unlimited = report.emergency
+        try:
+            self.empty_trash()
+            self.index.scan()
+            now = self.clock()
+            temp = self.temp_entries()
+            report.temp_bytes = sum(entry.bytes for entry in temp)
+
+            # Temp: LRU eviction down to the quota and the target watermark
+            excess = max(0, report.temp_bytes - self.temp_quota_bytes)
+            low_disk = free < LOW_WATERMARK
+            min_idle = self.min_idle_seconds
+            if report.emergency:
+                min_idle = min(min_idle, EMERGENCY_MIN_IDLE_SECONDS)
+            for entry in temp:
+                if excess <= 0 and not low_disk:
+                    break
+                if now - entry.last_access < min_idle:
+                    report.blocked = True
+                    break
+                self.evict(entry)
+                report.evicted.append(entry.path.name)
+                report.evicted_bytes += entry.bytes
+                excess -= entry.bytes
+                if low_disk:
+                    free = self.free_fraction(self.workspace)
+                    low_disk = free < TARGET_WATERMARK
+            report.temp_bytes -= report.evicted_bytes
+
+            # Projects: archive those idle for long enough
+            projects = self.projects()
+            report.projects_bytes = sum(entry.bytes for entry in projects)
+            if self.project_idle_seconds:
+                for project in projects:
+                    if now - project.last_access < self.project_idle_seconds:
+                        break
+                    archive = self.archive(project)
+                    report.archived.append(project.path.name)
+                    report.archived_bytes += project.bytes
+                    logger.info("Archived idle project %s to %s", project.path.name, archive)
+                report.projects_bytes -= report.archived_bytes
+        finally:
+            self.budget.unlimited = False
+        self.index.save(self.state_file)
+        report.free_fraction = self.free_fraction(self.workspace)
+        report.throttled_seconds = self.budget.slept - slept_before
+        report.seconds = time.perf_counter() - started
+        if report.evicted or report.archived:
+            logger.info("Reclaimed %d temp entries (%d bytes), archived %d projects",
+                        len(report.evicted), report.evicted_bytes, len(report.archived))
+        return report
+
+    def run(self, interval: float = DEFAULT_INTERVAL, stop: Optional[Callable[[], bool]] = None) -> None:
+        """Collect every ``interval`` seconds (sooner when the disk runs low)."""
+        while not (stop and stop()):
+            report = self.collect()
+            low = report.free_fraction < LOW_WATERMARK
+            time.sleep(min(interval, 5.0) if low else interval)
+
+
+# ============================================================================
+# Command Line Interface
+# ============================================================================
+
+def _format_bytes(value: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(value) < 1024 or unit == "GB":
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return str(value)
+
+
+def _entries_table(entries: List[Entry], now: float) -> Iterator[str]:
+    for entry in entries:
+        idle_hours = (now - entry.last_access) / 3600
+        yield f"  {entry.path.name:<40} {_format_bytes(entry.bytes):>10} {entry.files:>8} {idle_hours:>9.1f}h"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bounded-size garbage collector for the workspace")
+    parser.add_argument("--workspace", type=Path, default=WORKSPACE_DIR)
+    parser.add_argument("--temp-quota-gb", type=float, default=WORKSPACE_GC_TEMP_QUOTA_GB)
+    parser.add_argument("--project-idle-days", type=float, default=WORKSPACE_GC_PROJECT_IDLE_DAYS,
+                        help="0 disables archiving")
+    parser.add_argument("--min-idle-minutes", type=float, default=DEFAULT_MIN_IDLE_SECONDS / 60)
+    parser.add_argument("--io-mbps", type=float, default=WORKSPACE_GC_IO_MBPS)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Sizes and idle times from the index")
+    run = sub.add_parser("run", help="Collect in a loop (or once)")
+    run.add_argument("--once", action="store_true")
+    run.add_argument("--interval", type=float, default=DEFAULT_INTERVAL)
+    restore = sub.add_parser("restore", help="Bring an archived project back")
+    restore.add_argument("name")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not args.workspace.is_dir():
+        print(f"Workspace {args.workspace} does not exist (see scripts/setup-workspace.sh)", file=sys.stderr)
+        return 1
+    gc = WorkspaceGC(args.workspace, temp_quota_bytes=int(args.temp_quota_gb * GIB),
+                     project_idle_seconds=args.project_idle_days * 86400,
+                     min_idle_seconds=args.min_idle_minutes * 60,
+                     budget=IOBudget(args.io_mbps * MIB))
+
+    if args.command == "restore":
+        print(f"Restored {gc.restore(args.name)}")
+        return 0
+    if args.command == "status":
+        gc.index.scan()
+        gc.index.save(gc.state_file)
+        now = time.time()
+        for title, entries in (("temp", gc.temp_entries()), ("projects", gc.projects())):
+            total = sum(entry.bytes for entry in entries)
+            print(f"{title}: {_format_bytes(total)} in {len(entries)} entries "
+                  f"(least recently used first)")
+            print(f"  {'name':<40} {'size':>10} {'files':>8} {'idle':>10}")
+            for line in _entries_table(entries, now):
+                print(line)
+        print(f"free: {gc.free_fraction(gc.workspace):.1%}, temp quota {_format_bytes(gc.temp_quota_bytes)}")
+        return 0
+    if args.once:
+        report = gc.collect()
+        print(json.dumps(asdict(report), indent=2))
+        return 0
+    try:
+        gc.run(args.interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    setup_from_environment()
+    sys.exit(main())
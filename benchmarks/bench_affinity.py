@@ -0,0 +1,88 @@
+"""
+Benchmark for conversation-affinity scheduling.
+
+Runs concurrent multi-turn agent sessions (half of them asking for another
+``num_ctx``) through the LLM gateway in front of the fake Ollama with its
+prefix cache simulation, once forwarded as is and once with the affinity
+scheduler, and reports:
+- prompt tokens Ollama evaluated, and those its slot caches spared
+- model reloads caused by changed load options
+- wall time of the whole run (simulated inference time, scaled)
+- for the scheduler: cache hits and the saved tokens it measured
+
+Usage:
+    python benchmarks/bench_affinity.py [--sessions 2 6] [--slots 2] [--turns 6] [--time-scale 0.01]
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aicoding.affinity import AffinityScheduler  # noqa: E402
+from aicoding.fake_ollama import FakeOllama  # noqa: E402
+from aicoding.tracing import LLMGateway, Tracer  # noqa: E402
+
+MODEL = "qwen2.5-coder:7b"
+
+
+def conversation(url: str, number: int, turns: int) -> None:
+    rng = random.Random(number)
+    messages = [{"role": "system", "content": f"system {number} " + "rules " * 300},
+                {"role": "user", "content": f"task {number} " + "code " * 200}]
+    for turn in range(turns):
+        reply = requests.post(f"{url}/api/chat", timeout=600, json={
+            "model": MODEL, "messages": messages, "stream": False,
+            "options": {"num_predict": 32, "num_ctx": 4096 if number % 2 else 8192}}).json()
+        messages += [reply["message"], {"role": "user", "content": f"output {turn} " + "line " * rng.randint(50, 300)}]
+        # Tool execution between turns
+        time.sleep(rng.uniform(0.005, 0.03))
+
+
+def run(sessions: int, slots: int, turns: int, time_scale: float, affinity: bool) -> dict:
+    with FakeOllama(prefix_cache=True, parallel=slots, time_scale=time_scale) as fake:
+        scheduler = AffinityScheduler([fake.url], slots=slots) if affinity else None
+        with LLMGateway(fake.url, tracer=Tracer(sample_rate=0.0), scheduler=scheduler) as gateway:
+            threads = [threading.Thread(target=conversation, args=(gateway.url, number, turns))
+                       for number in range(sessions)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            seconds = time.perf_counter() - started
+        result = {"evaluated": fake.prompt_tokens, "cached": fake.cached_tokens, "reloads": fake.option_reloads,
+                  "seconds": seconds, "hits": "", "measured": ""}
+        if scheduler is not None:
+            totals = scheduler.status()["totals"]
+            result.update(hits=f"{totals['hits']}/{totals['requests']}", measured=totals["saved_tokens"])
+        return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[2, 6])
+    parser.add_argument("--slots", type=int, default=2)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--time-scale", type=float, default=0.01)
+    args = parser.parse_args()
+
+    print(f"{'sessions':>8} {'gateway':<9} {'evaluated':>10} {'cached':>8} {'reloads':>7} {'wall s':>7} "
+          f"{'hits':>7} {'measured':>8}")
+    for sessions in args.sessions:
+        for affinity in (False, True):
+            result = run(sessions, args.slots, args.turns, args.time_scale, affinity)
+            print(f"{sessions:>8} {'affinity' if affinity else 'plain':<9} {result['evaluated']:>10} "
+                  f"{result['cached']:>8} {result['reloads']:>7} {result['seconds']:>7.2f} {result['hits']:>7} "
+                  f"{result['measured']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
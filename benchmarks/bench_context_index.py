@@ -0,0 +1,106 @@
+"""
+Benchmark for the workspace code-context retrieval index.
+
+Generates a synthetic multi-file project and reports:
+- full index build time and incremental refresh time
+- query latency (mean / p95)
+- prompt-size reduction versus sending the matching files whole
+
+Usage:
+    python benchmarks/bench_context_index.py [--files 500] [--functions 40]
+"""
+
+import argparse
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aicoding.context_index import ContextIndex, whole_file_tokens  # noqa: E402
+
+
+WORDS = [
+    "user", "config", "parse", "render", "template", "cache", "token", "session",
+    "request", "response", "router", "handler", "model", "queue", "commit", "push",
+    "workspace", "project", "file", "path", "index", "query", "score", "budget",
+]
+
+
+def generate_project(root: Path, files: int, functions: int, seed: int = 7) -> None:
+    """Write a synthetic Python project with ``files`` modules."""
+    rng = random.Random(seed)
+    for file_number in range(files):
+        package = root / f"pkg{file_number % 20}"
+        package.mkdir(parents=True, exist_ok=True)
+        body = ['"""Synthetic module."""\n', "import os\n"]
+        for function_number in range(functions):
+            name = "_".join(rng.sample(WORDS, 3)) + f"_{file_number}_{function_number}"
+            statements = "\n".join(
+                f"    value = value + len('{rng.choice(WORDS)}')" for _ in range(rng.randint(3, 12))
+            )
+            body.append(f"\n\ndef {name}(value):\n{statements}\n    return value\n")
+        (package / f"module_{file_number}.py").write_text("".join(body))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--functions", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--budget", type=int, default=2000)
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="bench_context_index_"))
+    try:
+        generate_project(root, args.files, args.functions)
+
+        index = ContextIndex(root)
+        started = time.perf_counter()
+        stats = index.refresh()
+        build_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index.refresh()
+        noop_refresh_seconds = time.perf_counter() - started
+
+        changed = sorted(root.glob("pkg0/*.py"))[:5]
+        for path in changed:
+            path.write_text(path.read_text() + "\n\ndef freshly_added_handler(value):\n    return value\n")
+        started = time.perf_counter()
+        index.update_paths(changed)
+        update_seconds = time.perf_counter() - started
+
+        rng = random.Random(11)
+        latencies = []
+        sent_tokens = 0
+        whole_tokens = 0
+        for _ in range(args.queries):
+            query = " ".join(rng.sample(WORDS, 3))
+            started = time.perf_counter()
+            snippets = index.query(query, k=8, token_budget=args.budget)
+            latencies.append(time.perf_counter() - started)
+            sent_tokens += sum(snippet.tokens for snippet in snippets)
+            whole_tokens += whole_file_tokens(index, snippets)
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"Files indexed:           {index.file_count} ({stats.chunks} chunks)")
+        print(f"Full build:              {build_seconds * 1000:.1f} ms")
+        print(f"No-op refresh:           {noop_refresh_seconds * 1000:.1f} ms")
+        print(f"Update {len(changed)} files:          {update_seconds * 1000:.1f} ms")
+        print(f"Query latency mean/p95:  {statistics.mean(latencies) * 1000:.2f} / {p95 * 1000:.2f} ms")
+        print(f"Prompt tokens per query: {sent_tokens / args.queries:.0f} "
+              f"(whole files: {whole_tokens / args.queries:.0f}, "
+              f"reduction {100 * (1 - sent_tokens / max(whole_tokens, 1)):.1f}%)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""
+Benchmark for the workspace file service.
+
+Generates a synthetic repository (50k files by default, plus an ignored
+node_modules tree and one large log file) and compares each operation with
+the straightforward approach:
+- listing: ``Path.rglob`` with ignore filtering vs the ``os.scandir`` walk
+- reading 200 files: one at a time vs ``read_many``
+- a line range near the end of the log: ``readlines`` vs mmap (first and
+  repeated read, the latter using cached checkpoints)
+- regex search: single-process ``re`` over every file vs the process pool
+- changing one line of the log: read, edit and rewrite the whole file vs
+  ``replace_lines`` (unchanged bytes copied in the kernel)
+
+Usage:
+    python benchmarks/bench_file_service.py [--files 50000] [--log-mb 200]
+"""
+
+import argparse
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aicoding.file_service import FileService  # noqa: E402
+from aicoding.workspace import DEFAULT_IGNORED_DIRS  # noqa: E402
+
+
+WORDS = ["user", "config", "parse", "render", "cache", "token", "session", "request",
+         "handler", "model", "queue", "commit", "workspace", "project", "index", "query"]
+
+
+def generate_repository(root: Path, files: int, log_mb: int, seed: int = 5) -> None:
+    """Write ``files`` source files in nested packages, a node_modules tree and a large log."""
+    rng = random.Random(seed)
+    for number in range(files):
+        directory = root / f"src/pkg{number % 50}/sub{number % 500 // 50}"
+        directory.mkdir(parents=True, exist_ok=True)
+        body = [f"def {rng.choice(WORDS)}_{rng.choice(WORDS)}_{number}(value):\n"
+                f"    return value + len('{rng.choice(WORDS)}')\n\n" for _ in range(rng.randint(5, 25))]
+        if number % 997 == 0:
+            body.append("# TODO(perf): remove the quadratic merge\n")
+        (directory / f"module_{number}.py").write_text("".join(body))
+    for number in range(files // 10):
+        directory = root / f"node_modules/lib{number % 100}"
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / f"index_{number}.js").write_text("// TODO(perf): vendored\n")
+    line = "2025-01-01T00:00:00 INFO request handled in 12 ms by worker 3\n"
+    with open(root / "build.log", "w") as handle:
+        chunk = line * 10000
+        for _ in range(max(1, log_mb * 1024 * 1024 // len(chunk))):
+            handle.write(chunk)
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=50000)
+    parser.add_argument("--log-mb", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=200)
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="bench_file_service_"))
+    try:
+        print(f"Generating {args.files} files and a {args.log_mb} MB log...")
+        generate_repository(root, args.files, args.log_mb)
+        service = FileService(root)
+        pattern = r"TODO\(perf\)"
+
+        def naive_list():
+            return [path for path in root.rglob("*")
+                    if not DEFAULT_IGNORED_DIRS.intersection(path.relative_to(root).parts)]
+
+        naive_entries, naive_list_seconds = timed(naive_list)
+        entries, list_seconds = timed(service.list)
+
+        sources = [info.path for info in entries if info.path.endswith(".py")]
+        sample = random.Random(3).sample(sources, min(args.reads, len(sources)))
+        _, naive_read_seconds = timed(lambda: [(root / path).read_text() for path in sample])
+        _, read_seconds = timed(lambda: service.read_many(sample))
+
+        with open(root / "build.log", "rb") as handle:
+            total_lines = sum(chunk.count(b"\n") for chunk in iter(lambda: handle.read(1 << 20), b""))
+        start = total_lines - 1000
+
+        def naive_lines():
+            with open(root / "build.log") as handle:
+                return "".join(handle.readlines()[start - 1:start + 99])
+
+        expected, naive_lines_seconds = timed(naive_lines)
+        first, first_lines_seconds = timed(lambda: service.read_lines("build.log", start, start + 99))
+        _, repeat_lines_seconds = timed(lambda: service.read_lines("build.log", start + 200, start + 299))
+        assert first.text == expected
+
+        def naive_search():
+            regex = re.compile(pattern)
+            found = []
+            for path in naive_entries:
+                if path.is_file() and path.suffix == ".py":
+                    for number, line in enumerate(path.read_text(errors="replace").splitlines(), 1):
+                        if regex.search(line):
+                            found.append((str(path.relative_to(root)), number))
+            return found
+
+        naive_matches, naive_search_seconds = timed(naive_search)
+        service.search("warm up the pool", glob="*.py")
+        matches, search_seconds = timed(lambda: service.search(pattern, glob="*.py"))
+        assert len(matches) == len(naive_matches)
+
+        log = root / "build.log"
+
+        def naive_edit():
+            lines = log.read_text().splitlines(keepends=True)
+            lines[start - 1] = "edited by rewrite\n"
+            log.write_text("".join(lines))
+
+        _, naive_edit_seconds = timed(naive_edit)
+        edit, edit_seconds = timed(lambda: service.replace_lines("build.log", start + 1, start + 1, "edited in place",
+                                                                 expected=expected.splitlines(True)[1]))
+        service.close()
+
+        print(f"Files listed:            {sum(not info.is_dir for info in entries)} "
+              f"({os.cpu_count()} CPUs for search)")
+        print(f"List tree:               rglob {naive_list_seconds * 1000:8.1f} ms   "
+              f"scandir {list_seconds * 1000:8.1f} ms")
+        print(f"Read {len(sample)} files:          sequential {naive_read_seconds * 1000:5.1f} ms   "
+              f"read_many {read_seconds * 1000:6.1f} ms")
+        print(f"100 lines at {start}:   readlines {naive_lines_seconds * 1000:6.1f} ms   "
+              f"mmap {first_lines_seconds * 1000:6.1f} ms (repeat {repeat_lines_seconds * 1000:.1f} ms)")
+        print(f"Regex search ({len(matches)} hits):  single process {naive_search_seconds * 1000:8.1f} ms   "
+              f"pool {search_seconds * 1000:8.1f} ms")
+        print(f"Edit 1 line of the log:  rewrite {naive_edit_seconds * 1000:7.1f} ms   "
+              f"replace_lines {edit_seconds * 1000:6.1f} ms "
+              f"({edit.written} bytes written, {edit.copied / 1e6:.0f} MB copied in the kernel)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
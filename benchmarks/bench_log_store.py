@@ -0,0 +1,118 @@
+"""
+Benchmark for the indexed container log store.
+
+Ingests a synthetic week of ollama/openhands logs and reports:
+- ingest throughput and compression ratio
+- query latency for a rare keyword, a common keyword and a one-hour window
+- the same rare-keyword search done as decompress-everything-and-grep
+
+Usage:
+    python benchmarks/bench_log_store.py [--lines-per-hour 3000] [--days 7]
+"""
+
+import argparse
+import gzip
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aicoding.log_store import LogStore, QueryStats  # noqa: E402
+
+
+START = 1763596800.0  # 2025-11-20T00:00:00Z
+
+OLLAMA_LINES = [
+    "[GIN] | 200 | {ms}ms | 172.18.0.5 | POST \"/api/chat\"",
+    "level=INFO source=server.go msg=\"llama runner started\" duration={ms}ms",
+    "level=INFO source=sched.go msg=\"loaded model\" model=deepseek-coder-v2:16b",
+    "level=WARN source=memory.go msg=\"gpu VRAM usage didn't recover within timeout\"",
+]
+OPENHANDS_LINES = [
+    "INFO:     172.18.0.1:{ms} - \"GET /api/conversations HTTP/1.1\" 200 OK",
+    "12:00:00 - openhands:INFO: agent_controller.py:{ms} - Setting agent state to running",
+    "12:00:00 - openhands:INFO: runtime.py:{ms} - Container started: openhands-runtime-{ms}",
+]
+RARE = "level=ERROR source=server.go msg=\"out of memory\" model=deepseek-coder-v2:16b"
+
+
+def generate(days: int, per_hour: int, seed: int = 3):
+    rng = random.Random(seed)
+    step = 3600.0 / per_hour
+    for i in range(days * 24 * per_hour):
+        timestamp = START + i * step
+        if rng.random() < 0.0005:
+            yield "ollama", timestamp, RARE
+        elif i % 2:
+            yield "ollama", timestamp, rng.choice(OLLAMA_LINES).format(ms=rng.randint(1, 9999))
+        else:
+            yield "openhands", timestamp, rng.choice(OPENHANDS_LINES).format(ms=rng.randint(1, 9999))
+
+
+def timed_query(store: LogStore, repeats: int = 5, **kwargs):
+    best, stats = float("inf"), QueryStats()
+    for _ in range(repeats):
+        stats = QueryStats()
+        started = time.perf_counter()
+        store.query(stats=stats, **kwargs)
+        best = min(best, time.perf_counter() - started)
+    return best, stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--lines-per-hour", type=int, default=3000)
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="bench_log_store_"))
+    try:
+        raw_bytes = 0
+        lines = 0
+        plain = gzip.open(root / "plain.log.gz", "wt")
+        started = time.perf_counter()
+        with LogStore(root / "store") as store:
+            for source, timestamp, message in generate(args.days, args.lines_per_hour):
+                store.append(source, timestamp, message)
+                plain.write(f"{timestamp:.6f} {source} {message}\n")
+                raw_bytes += len(message) + 20
+                lines += 1
+        ingest_seconds = time.perf_counter() - started
+        plain.close()
+        stored_bytes = sum(p.stat().st_size for p in (root / "store").rglob("*") if p.is_file())
+
+        store = LogStore(root / "store")
+        cold_seconds, _ = timed_query(store, repeats=1, keywords=["out of memory"])
+        rare_seconds, rare = timed_query(store, keywords=["out of memory"])
+        common_seconds, common = timed_query(store, keywords=["loaded model"], sources=["ollama"],
+                                             start=START + 86400, end=START + 2 * 86400)
+        hour_start = START + 3 * 86400 + 12 * 3600
+        hour_seconds, hour = timed_query(store, start=hour_start, end=hour_start + 3600)
+
+        started = time.perf_counter()
+        with gzip.open(root / "plain.log.gz", "rt") as handle:
+            grep_hits = sum(1 for line in handle if "out of memory" in line)
+        grep_seconds = time.perf_counter() - started
+
+        print(f"Lines ingested:          {lines} over {args.days} days "
+              f"({lines / ingest_seconds:.0f} lines/s)")
+        print(f"Stored size:             {stored_bytes / 1024 ** 2:.1f} MB "
+              f"(raw {raw_bytes / 1024 ** 2:.1f} MB, ratio {raw_bytes / stored_bytes:.1f}x)")
+        print(f"Rare keyword, all time:  {rare_seconds * 1000:.2f} ms (cold {cold_seconds * 1000:.1f} ms), "
+              f"{rare.lines_matched} hits, {rare.blocks_read}/{rare.blocks_total} blocks")
+        print(f"Common keyword, 1 day:   {common_seconds * 1000:.2f} ms, "
+              f"{common.lines_matched} hits, {common.blocks_read}/{common.blocks_total} blocks")
+        print(f"One-hour window:         {hour_seconds * 1000:.2f} ms, "
+              f"{hour.lines_matched} lines, {hour.blocks_read}/{hour.blocks_total} blocks")
+        print(f"zcat | grep baseline:    {grep_seconds * 1000:.1f} ms, {grep_hits} hits")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
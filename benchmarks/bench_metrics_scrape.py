@@ -0,0 +1,145 @@
+"""
+Benchmark for /metrics scrape latency of the OpenMetrics exporter.
+
+Runs the exporter against a fake Ollama, a synthetic workspace and a probe
+that takes seconds to finish, then reports:
+- scrape latency (p50 / p99 / max) over HTTP while probes are running
+- render time with an unchanged registry (cached) and after every change
+- how long the same checks take when run inline, as a scrape-time exporter would
+
+Usage:
+    python benchmarks/bench_metrics_scrape.py [--scrapes 2000] [--slow-probe-seconds 2]
+"""
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aicoding.fake_ollama import FakeOllama  # noqa: E402
+from aicoding.metrics import (  # noqa: E402
+    Exporter,
+    HostProbe,
+    OllamaProbe,
+    Probe,
+    Registry,
+    WorkspaceProbe,
+)
+
+
+class SlowProbe(Probe):
+    """Stands in for a check that hangs, e.g. an overloaded OpenHands UI."""
+
+    name = "slow_check"
+
+    def __init__(self, registry: Registry, seconds: float) -> None:
+        super().__init__(registry, interval=0.0)
+        self.seconds = seconds
+        self.gauge = registry.gauge("bench_slow_check_runs", "Completed slow checks")
+        self.runs = 0
+
+    def collect(self) -> None:
+        time.sleep(self.seconds)
+        self.runs += 1
+        self.gauge.set(self.runs)
+
+
+class BusyHistogramProbe(Probe):
+    """Keeps changing values so scrapes also exercise re-rendering."""
+
+    name = "busy"
+
+    def __init__(self, registry: Registry) -> None:
+        super().__init__(registry, interval=0.01)
+        self.histogram = registry.histogram("bench_request_duration_seconds", "Synthetic latencies",
+                                            ["endpoint", "status"])
+        self.tick = 0
+
+    def collect(self) -> None:
+        self.tick += 1
+        for endpoint in ("/api/chat", "/api/generate", "/api/embed", "/api/tags"):
+            self.histogram.observe((self.tick % 97) / 10.0, endpoint=endpoint, status="200")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scrapes", type=int, default=2000)
+    parser.add_argument("--slow-probe-seconds", type=float, default=2.0)
+    parser.add_argument("--projects", type=int, default=20)
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="bench_metrics_"))
+    try:
+        for number in range(args.projects):
+            project = root / f"project{number}"
+            for sub in range(10):
+                (project / f"pkg{sub}").mkdir(parents=True)
+                for file_number in range(20):
+                    (project / f"pkg{sub}" / f"m{file_number}.py").write_text("x = 1\n")
+
+        with FakeOllama() as fake:
+            fake.loaded.append({"name": "deepseek-coder-v2:16b", "size": 10_000_000_000,
+                                "size_vram": 0, "expires_at": "2099-01-01T00:00:00Z"})
+            registry = Registry()
+            probes = [
+                OllamaProbe(registry, fake.url, interval=0.5),
+                HostProbe(registry, paths=[Path("/"), root], interval=0.5),
+                WorkspaceProbe(registry, root, interval=1.0),
+                SlowProbe(registry, args.slow_probe_seconds),
+                BusyHistogramProbe(registry),
+            ]
+
+            inline_started = time.perf_counter()
+            for probe in probes[:3]:
+                probe.collect()
+            inline_seconds = time.perf_counter() - inline_started + args.slow_probe_seconds
+
+            with Exporter(registry, probes, host="127.0.0.1", port=0) as exporter:
+                session = requests.Session()
+                url = f"{exporter.url}/metrics"
+                session.get(url)
+                latencies = []
+                body_bytes = 0
+                for _ in range(args.scrapes):
+                    started = time.perf_counter()
+                    response = session.get(url)
+                    latencies.append(time.perf_counter() - started)
+                    body_bytes = len(response.content)
+                body_lines = response.content.count(b"\n")
+
+                render_changed = []
+                for _ in range(200):
+                    probes[4].collect()
+                    started = time.perf_counter()
+                    registry.render()
+                    render_changed.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                for _ in range(1000):
+                    registry.render()
+                render_cached = (time.perf_counter() - started) / 1000
+
+        print(f"Scrapes:                 {args.scrapes} ({body_bytes} bytes, {body_lines} lines)")
+        print(f"Scrape latency p50/p99:  {percentile(latencies, 0.5) * 1000:.2f} / "
+              f"{percentile(latencies, 0.99) * 1000:.2f} ms (max {max(latencies) * 1000:.2f} ms)")
+        print(f"Render, unchanged:       {render_cached * 1e6:.1f} us")
+        print(f"Render, after a change:  {percentile(render_changed, 0.5) * 1000:.3f} ms")
+        print(f"Probes run inline:       {inline_seconds * 1000:.0f} ms per scrape "
+              f"(slow check {args.slow_probe_seconds:.1f} s)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
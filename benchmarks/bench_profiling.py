@@ -0,0 +1,105 @@
+"""
+Benchmark for the overhead of the profiling hooks.
+
+Measures, with profiling off and with each kind on:
+- a trivial function, undecorated vs ``@timed`` (ns per call)
+- ``create_file_at_path`` (a ``@timed`` hot path) writing small files
+- ``git --version`` through ``subprocess.run`` (wrapped while timers are on)
+
+Each figure is the best of ``--rounds`` rounds, so scheduling noise does
+not count as overhead.
+
+Usage:
+    python benchmarks/bench_profiling.py [--calls 1000000] [--files 2000] [--commands 100] [--rounds 5]
+"""
+
+import argparse
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aicoding.profiling import PROFILER, timed  # noqa: E402
+from aicoding.workspace import create_file_at_path  # noqa: E402
+
+
+def plain(value):
+    return value
+
+
+decorated = timed(plain)
+
+
+def best_of(rounds: int, function) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--commands", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    workspace = Path(tempfile.mkdtemp(prefix="bench_profiling_"))
+    calls = range(args.calls)
+
+    def call_plain():
+        for number in calls:
+            plain(number)
+
+    def call_decorated():
+        for number in calls:
+            decorated(number)
+
+    def write_files():
+        project = workspace / "project"
+        for number in range(args.files):
+            create_file_at_path(project / f"pkg{number % 10}" / f"file_{number}.py", "x = 1\n")
+        shutil.rmtree(project)
+
+    def write_files_unwrapped():
+        project = workspace / "project"
+        for number in range(args.files):
+            create_file_at_path.__wrapped__(project / f"pkg{number % 10}" / f"file_{number}.py", "x = 1\n")
+        shutil.rmtree(project)
+
+    def run_commands():
+        for _ in range(args.commands):
+            subprocess.run(["git", "--version"], capture_output=True, check=True)
+
+    try:
+        baseline = {"call": best_of(args.rounds, call_plain), "write": best_of(args.rounds, write_files_unwrapped),
+                    "command": best_of(args.rounds, run_commands)}
+        print(f"{'profiling':<14} {'call ns':>9} {'overhead':>9} {'write ms':>9} {'overhead':>9} "
+              f"{'git ms':>9} {'overhead':>9}")
+        print(f"{'(undecorated)':<14} {baseline['call'] / args.calls * 1e9:>9.1f} {'':>9} "
+              f"{baseline['write'] * 1000:>9.1f} {'':>9} {baseline['command'] * 1000:>9.1f}")
+        for kinds in ([], ["timers"], ["sample"], ["alloc"]):
+            if kinds:
+                PROFILER.start(kinds, workspace / "profiles")
+            call = best_of(args.rounds, call_decorated)
+            write = best_of(args.rounds, write_files)
+            command = best_of(args.rounds, run_commands)
+            PROFILER.stop(write=False)
+            print(f"{','.join(kinds) or 'off':<14} {call / args.calls * 1e9:>9.1f} "
+                  f"{(call - baseline['call']) / args.calls * 1e9:>+8.1f}n "
+                  f"{write * 1000:>9.1f} {(write / baseline['write'] - 1) * 100:>+8.1f}% "
+                  f"{command * 1000:>9.1f} {(command / baseline['command'] - 1) * 100:>+8.1f}%")
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Benchmark for partial, shallow and sparse repository import.
+
+Generates an upstream monorepo (40 directories of 50 files over 20 commits
+by default), serves it over ``file://`` with partial clone enabled and
+compares:
+- ``git clone`` of everything vs importing one directory with depth 1, in
+  time until the project is usable and in disk space used
+- a second import of another directory of the same upstream, which reuses
+  the cached commits and trees and only fetches that directory's blobs
+
+Usage:
+    python benchmarks/bench_repo_import.py [--directories 40] [--files 50] [--commits 20] [--file-kb 16]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aicoding.repo_import import RepoCache, RepoImporter, _directory_bytes, git  # noqa: E402
+
+
+def generate_upstream(root: Path, directories: int, files: int, commits: int, file_kb: int) -> str:
+    """A bare repository where every commit rewrites a tenth of the files; returns its file:// URL."""
+    source = root / "source"
+    git(["init", "-q", "--initial-branch=main", str(source)])
+    for number in range(commits):
+        for directory in range(directories):
+            for file_number in range(files):
+                if number == 0 or (file_number + number) % 10 == 0:
+                    path = source / f"services/svc{directory}/file_{file_number}.txt"
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_bytes(os.urandom(file_kb * 512).hex().encode())
+        git(["add", "-A"], source)
+        git(["-c", "user.name=b", "-c", "user.email=b@b", "commit", "-q", "-m", f"commit {number}"], source)
+    bare = root / "upstream.git"
+    git(["clone", "-q", "--bare", str(source), str(bare)])
+    git(["config", "uploadpack.allowFilter", "true"], bare)
+    shutil.rmtree(source)
+    return f"file://{bare}"
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--directories", type=int, default=40)
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--commits", type=int, default=20)
+    parser.add_argument("--file-kb", type=int, default=16)
+    args = parser.parse_args()
+
+    workspace = Path(tempfile.mkdtemp(prefix="bench_repo_import_"))
+    try:
+        print(f"Generating {args.directories} x {args.files} files over {args.commits} commits...")
+        url = generate_upstream(workspace, args.directories, args.files, args.commits, args.file_kb)
+
+        clone = workspace / "clone"
+        _, clone_seconds = timed(lambda: git(["clone", "-q", "--no-local", url, str(clone)]))
+        clone_bytes = _directory_bytes(clone)
+
+        importer = RepoImporter(workspace / "projects", RepoCache(workspace / "cache"))
+        first, first_seconds = timed(lambda: importer.import_repo(url, "first", depth=1,
+                                                                  sparse=["services/svc0"], hydrate=False))
+        first_bytes = _directory_bytes(workspace / "cache") + _directory_bytes(Path(first.path))
+        second, second_seconds = timed(lambda: importer.import_repo(url, "second", depth=1,
+                                                                    sparse=["services/svc1"], hydrate=False))
+        second_bytes = _directory_bytes(Path(second.path))
+
+        print(f"Full clone:               {clone_seconds * 1000:8.1f} ms  {clone_bytes / 1e6:8.1f} MB")
+        print(f"Sparse shallow import:    {first_seconds * 1000:8.1f} ms  {first_bytes / 1e6:8.1f} MB "
+              f"(cache + project, {first.blobs_fetched} blobs fetched)")
+        print(f"Second import, same repo: {second_seconds * 1000:8.1f} ms  {second_bytes / 1e6:8.1f} MB "
+              f"(project only, {second.blobs_fetched} blobs fetched)")
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Benchmark of the shared Hypothesis strategies against the filtered ones.
+
+Compares tests/strategies.py with the strategies previously defined in
+tests/test_file_operations.py and tests/test_git_properties.py (copied
+below), for relative paths, project names and commit messages:
+- examples per second reaching the test body
+- filter ratio: predicate calls that rejected a draw
+- test cases Hypothesis gave up on because a filter could not be satisfied,
+  and test cases that overran its size limit (the engine produces some of
+  these on its own, e.g. for lists of text), as shares of the requested
+  examples
+- whether Hypothesis' health checks pass
+- share of examples hitting the edge cases (deep paths, names without ASCII
+  letters, maximum-length names and messages)
+
+The shared strategies are also measured with the edge cases switched off,
+since deep and maximum-length examples are slower to build.
+
+Usage:
+    python benchmarks/bench_strategies.py [--examples 1000] [--repeat 3]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from hypothesis import HealthCheck, given, settings, strategies as st
+from hypothesis.errors import FailedHealthCheck
+from hypothesis.internal.observability import with_observability_callback
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "tests"))
+
+import strategies as strategies_module  # noqa: E402
+from strategies import NAME_MAX, commit_messages, project_names, relative_paths  # noqa: E402
+
+
+# ============================================================================
+# Previous Strategies (filtering)
+# ============================================================================
+
+class CountingPredicate:
+    """Wraps a filter predicate and counts rejections."""
+
+    def __init__(self, predicate) -> None:
+        self.predicate = predicate
+        self.calls = 0
+        self.rejected = 0
+
+    def __call__(self, value) -> bool:
+        self.calls += 1
+        accepted = self.predicate(value)
+        self.rejected += not accepted
+        return accepted
+
+
+def legacy_strategies():
+    component_filter = CountingPredicate(
+        lambda x: x and not x.startswith('.') and not x.endswith('.') and x not in ['.', '..']
+        and '/' not in x and '\\' not in x)
+    safe_path_component = st.text(
+        alphabet=st.characters(whitelist_categories=("Lu", "Ll", "Nd"), whitelist_characters="-_."),
+        min_size=1, max_size=30,
+    ).filter(component_filter)
+
+    @st.composite
+    def valid_relative_paths(draw):
+        depth = draw(st.integers(min_value=1, max_value=3))
+        components = [draw(safe_path_component) for _ in range(depth)]
+        filename = components[-1]
+        if '.' not in filename:
+            extension = draw(st.sampled_from(['txt', 'py', 'js', 'md', 'json']))
+            components[-1] = f"{filename}.{extension}"
+        return Path(*components)
+
+    project_filter = CountingPredicate(
+        lambda x: x and not x.startswith(("-", "_")) and not x.endswith(("-", "_")))
+    valid_project_names = st.text(
+        alphabet=st.characters(whitelist_categories=("Lu", "Ll", "Nd"), whitelist_characters="-_"),
+        min_size=1, max_size=50,
+    ).filter(project_filter)
+
+    word_filter = CountingPredicate(lambda x: len(x.strip()) > 0)
+    word_strategy = st.text(
+        alphabet=st.characters(whitelist_categories=("Lu", "Ll", "Nd")), min_size=1, max_size=20,
+    ).filter(word_filter)
+    valid_commit_messages = st.lists(word_strategy, min_size=2, max_size=10).map(" ".join)
+
+    return {
+        "relative paths": (valid_relative_paths(), [component_filter]),
+        "project names": (valid_project_names, [project_filter]),
+        "commit messages": (valid_commit_messages, [word_filter]),
+    }
+
+
+def shared_strategies():
+    return {
+        "relative paths": (relative_paths(), []),
+        "project names": (project_names(), []),
+        "commit messages": (commit_messages(), []),
+    }
+
+
+# ============================================================================
+# Measurement
+# ============================================================================
+
+def _no_ascii_alnum(text: str) -> bool:
+    return not any(char.isascii() and char.isalnum() for char in text)
+
+
+def is_edge_case(value) -> bool:
+    """Deep path, maximum-length name or message, or a name without ASCII letters."""
+    if isinstance(value, Path):
+        names = list(value.parts[:-1]) + [value.stem]
+        return (len(value.parts) > 3 or any(len(p.encode("utf-8")) >= NAME_MAX - 8 for p in value.parts)
+                or all(map(_no_ascii_alnum, names)))
+    text = str(value)
+    return len(text) >= 50 or len(text.split()) >= 10 or _no_ascii_alnum(text)
+
+
+def measure(strategy, predicates, examples: int) -> dict:
+    """Examples per second, filter ratio and edge-case share of one run."""
+    values = []
+
+    @settings(max_examples=examples, database=None, deadline=None,
+              suppress_health_check=list(HealthCheck))
+    @given(value=strategy)
+    def consume(value):
+        values.append(value)
+
+    for predicate in predicates:
+        predicate.calls = predicate.rejected = 0
+    started = time.perf_counter()
+    consume()
+    elapsed = time.perf_counter() - started
+    calls = sum(p.calls for p in predicates)
+    return {
+        "per_second": len(values) / elapsed,
+        "filter_ratio": sum(p.rejected for p in predicates) / calls if calls else 0.0,
+        "edge_share": sum(map(is_edge_case, values)) / max(1, len(values)),
+    }
+
+
+def health(strategy, examples: int) -> tuple:
+    """Filtered-out and overrun test cases, and whether the health checks pass."""
+    observations = []
+
+    @settings(max_examples=examples, database=None, deadline=None)
+    @given(value=strategy)
+    def consume(value):
+        pass
+
+    healthy = True
+    with with_observability_callback(observations.append):
+        try:
+            consume()
+        except FailedHealthCheck:
+            healthy = False
+    reasons = [obs.status_reason for obs in observations if getattr(obs, "status", None) == "gave_up"]
+    filtered = sum("satisfy" in reason for reason in reasons)
+    return filtered, len(reasons) - filtered, healthy
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--examples", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    default_edge_percent = strategies_module.EDGE_CASE_PERCENT
+
+    # Warm up Hypothesis' Unicode tables so the first run is not penalised
+    for strategies in (legacy_strategies(), shared_strategies()):
+        for strategy, predicates in strategies.values():
+            measure(strategy, predicates, 50)
+
+    print(f"{'strategy':<18}{'version':<20}{'examples/s':>11}{'filtered':>10}"
+          f"{'gave up':>9}{'overrun':>9}{'edge cases':>12}  health check")
+    for name in ("relative paths", "project names", "commit messages"):
+        for label, edge_percent, factory in (("filtered", None, legacy_strategies),
+                                             ("shared", default_edge_percent, shared_strategies),
+                                             ("shared, no edges", 0, shared_strategies)):
+            if edge_percent is not None:
+                strategies_module.EDGE_CASE_PERCENT = edge_percent
+            strategy, predicates = factory()[name]
+            runs = [measure(strategy, predicates, args.examples) for _ in range(args.repeat)]
+            gave_up, overrun, healthy = health(strategy, args.examples)
+            best = max(runs, key=lambda run: run["per_second"])
+            print(f"{name:<18}{label:<20}{best['per_second']:>11.0f}"
+                  f"{sum(r['filter_ratio'] for r in runs) / len(runs):>10.1%}"
+                  f"{gave_up / args.examples:>9.1%}{overrun / args.examples:>9.1%}"
+                  f"{sum(r['edge_share'] for r in runs) / len(runs):>12.1%}"
+                  f"  {'pass' if healthy else 'FAIL'}")
+        strategies_module.EDGE_CASE_PERCENT = default_edge_percent
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -109,7 +109,21 @@ fi
 echo "✅ Docker is running"
 echo ""
 
-# Check if containers are running
+# With the configuration service (aicoding.config_service) running, let it
+# validate .env first so a rejected file never reaches the containers
+CONFIG_SERVICE_URL="${CONFIG_SERVICE_URL:-http://127.0.0.1:${CONFIG_SERVICE_PORT:-9106}}"
+if curl -sf -o /dev/null "$CONFIG_SERVICE_URL/status"; then
+    echo "🔄 Reloading .env in the configuration service at $CONFIG_SERVICE_URL..."
+    if ! curl -sf -X POST "$CONFIG_SERVICE_URL/reload" > /dev/null; then
+        echo "❌ .env was rejected by the configuration service:"
+        curl -s "$CONFIG_SERVICE_URL/status" | grep -o '"errors": *\[[^]]*\]'
+        exit 1
+    fi
+    echo "✅ .env validated and reloaded"
+    echo ""
+fi
+
+# The OpenHands container reads GITHUB_TOKEN when it starts
 if docker ps | grep -q "openhands"; then
     echo "🔄 OpenHands container is running"
     echo "   Restarting to apply GitHub token..."
@@ -0,0 +1,5 @@
+"""Shared pytest configuration for the AI Coding Platform tests."""
+
+# Test impact analysis: `pytest --impact` (see impact.py)
+# Record/replay of live-server tests: `pytest --cassettes=record|replay` (see replay.py)
+pytest_plugins = ["impact", "replay"]
@@ -0,0 +1,473 @@
+"""
+Test impact analysis for the pytest suite.
+
+With ``--impact`` every test records what it depends on, and later runs
+only select the tests whose dependencies changed:
+- files it opened and directories it listed while running, inside the
+  repository (seen through Python audit hooks, so ``open('.env.example')``
+  in a test is enough)
+- the repository modules its test module imports, followed transitively
+- the source of its own test function, of the rest of its test module and
+  of every repository fixture it uses
+- the Git index and HEAD, when it runs ``git`` inside the repository
+
+A test is also selected when it is new, failed last time, or talked to
+something outside the process (a non-loopback socket, or a command other
+than ``git`` run in the repository, e.g. ``docker``). A full run is forced
+when the last one is older than ``impact_full_run_hours`` (ini option,
+default 24) or with ``--impact-full``. The map lives in the pytest cache
+(``.pytest_cache``).
+
+Usage:
+    pytest --impact              # only tests affected by changes since the last run
+    pytest --impact --impact-full
+    pytest --cache-clear --impact
+"""
+
+import ast
+import hashlib
+import inspect
+import ipaddress
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import pytest
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+CACHE_KEY = "aicoding/impact"
+MAP_VERSION = 1
+
+DEFAULT_FULL_RUN_HOURS = 24.0
+
+# Never dependencies: caches and state that change on every run
+EXCLUDED_PARTS = frozenset({".git", ".hypothesis", ".pytest_cache", "__pycache__",
+                            ".mypy_cache", ".ruff_cache", ".tox", ".nox", ".venv", "venv"})
+
+MISSING = "missing"
+
+# Dependency key prefixes
+FILE, DIRECTORY, FIXTURE = "file:", "dir:", "fixture:"
+TEST_SOURCE, MODULE_SOURCE, GIT_STATE = "test", "module", "git"
+
+
+# ============================================================================
+# Selection
+# ============================================================================
+
+def changed_dependencies(recorded: Dict[str, str], current: Callable[[str], str]) -> List[str]:
+    """
+    Dependencies whose fingerprint differs from the recorded one.
+
+    Args:
+        recorded: Dependency key -> fingerprint at the last run
+        current: Returns the fingerprint of a key now
+
+    Returns:
+        Changed keys, in recorded order
+    """
+    return [key for key, value in recorded.items() if current(key) != value]
+
+
+def selection_reason(entry: Optional[dict], current: Callable[[str], str]) -> Optional[str]:
+    """
+    Why a test has to run, or None when nothing it depends on changed.
+
+    Args:
+        entry: The test's map entry from the last run (None if never recorded)
+        current: Returns the fingerprint of a dependency key now
+    """
+    if entry is None:
+        return "new"
+    if entry.get("outcome") == "failed":
+        return "failed last run"
+    if entry.get("volatile"):
+        return "uses external services"
+    changed = changed_dependencies(entry["deps"], current)
+    return f"changed: {', '.join(changed[:3])}" if changed else None
+
+
+def _sha1(data: bytes) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+class Fingerprints:
+    """Current fingerprints of files, directories and Git state (memoised)."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._memo: Dict[str, str] = {}
+
+    def __call__(self, key: str) -> str:
+        value = self._memo.get(key)
+        if value is None:
+            value = self._memo[key] = self._compute(key)
+        return value
+
+    def _compute(self, key: str) -> str:
+        if key.startswith(FILE):
+            try:
+                return _sha1((self.root / key[len(FILE):]).read_bytes())
+            except OSError:
+                return MISSING
+        if key.startswith(DIRECTORY):
+            try:
+                names = sorted(name for name in os.listdir(self.root / key[len(DIRECTORY):])
+                               if name not in EXCLUDED_PARTS)
+            except OSError:
+                return MISSING
+            return _sha1("\n".join(names).encode("utf-8"))
+        if key == GIT_STATE:
+            # Tracked content and HEAD; untracked files do not count
+            result = subprocess.run(["git", "-C", str(self.root), "ls-files", "-s"],
+                                    capture_output=True)
+            head = subprocess.run(["git", "-C", str(self.root), "rev-parse", "HEAD"],
+                                  capture_output=True)
+            return _sha1(result.stdout + head.stdout)
+        # Source fingerprints are only known for collected tests
+        return MISSING
+
+
+# ============================================================================
+# Static Dependencies
+# ============================================================================
+
+class SourceIndex:
+    """Per-module source fingerprints and repository imports."""
+
+    def __init__(self, root: Path, search_paths: Iterable[Path]) -> None:
+        self.root = root
+        self.search_paths = [Path(p) for p in search_paths]
+        self._modules: Dict[Path, dict] = {}
+        self._imports: Dict[Path, Set[Path]] = {}
+
+    def module(self, path: Path) -> dict:
+        """Fingerprints of the top-level definitions and of everything else."""
+        info = self._modules.get(path)
+        if info is not None:
+            return info
+        source = path.read_text(encoding="utf-8")
+        lines = source.splitlines(keepends=True)
+        tree = ast.parse(source)
+        definitions: Dict[str, str] = {}
+        skipped = set()
+        for node in tree.body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                segment = "".join(lines[start - 1:node.end_lineno])
+                definitions[node.name] = _sha1(segment.encode("utf-8"))
+                if node.name.startswith(("test", "Test")):
+                    skipped.update(range(start - 1, node.end_lineno))
+        context = "".join(line for number, line in enumerate(lines) if number not in skipped)
+        info = self._modules[path] = {"definitions": definitions, "context": _sha1(context.encode("utf-8"))}
+        return info
+
+    def _resolve(self, name: str, base: Path) -> List[Path]:
+        parts = name.split(".")
+        found = []
+        for directory in [base] + self.search_paths:
+            candidate = directory.joinpath(*parts)
+            for path in (candidate.with_suffix(".py"), candidate / "__init__.py"):
+                if path.is_file() and self._inside(path):
+                    found.append(path)
+                    # Parent packages run their __init__ too
+                    for depth in range(1, len(parts)):
+                        init = directory.joinpath(*parts[:depth], "__init__.py")
+                        if init.is_file():
+                            found.append(init)
+                    return found
+        return found
+
+    def _inside(self, path: Path) -> bool:
+        try:
+            path.resolve().relative_to(self.root)
+        except ValueError:
+            return False
+        return not EXCLUDED_PARTS.intersection(path.parts)
+
+    def imports(self, path: Path) -> Set[Path]:
+        """Repository modules imported by ``path``, transitively."""
+        done = self._imports.get(path)
+        if done is not None:
+            return done
+        result: Set[Path] = set()
+        self._imports[path] = result  # cycles
+        try:
+            tree = ast.parse(path.read_text(encoding="utf-8"))
+        except (OSError, SyntaxError, UnicodeDecodeError):
+            return result
+        for node in ast.walk(tree):
+            names = []
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module] + [f"{node.module}.{alias.name}" for alias in node.names]
+            for name in names:
+                for module in self._resolve(name, path.parent):
+                    if module not in result and module != path:
+                        result.add(module)
+                        result.update(self.imports(module))
+        return result
+
+
+# ============================================================================
+# Runtime Recording
+# ============================================================================
+
+_LOOPBACK_NAMES = {"localhost", "localhost.localdomain", ""}
+
+
+class Recorder:
+    """What one test touched while it ran."""
+
+    def __init__(self, root: Path) -> None:
+        self.root = str(root)
+        self.files: Set[str] = set()
+        self.directories: Set[str] = set()
+        self.git = False
+        self.volatile = False
+
+    def _relative(self, path) -> Optional[str]:
+        if isinstance(path, int):
+            return None
+        absolute = os.path.abspath(os.fsdecode(path))
+        if absolute != self.root and not absolute.startswith(self.root + os.sep):
+            return None
+        relative = os.path.relpath(absolute, self.root)
+        parts = relative.split(os.sep)
+        if EXCLUDED_PARTS.intersection(parts) or relative.endswith(".pyc"):
+            return None
+        return relative.replace(os.sep, "/")
+
+    def opened(self, path) -> None:
+        relative = self._relative(path)
+        if relative is not None and not os.path.isdir(os.path.join(self.root, relative)):
+            self.files.add(relative)
+
+    def listed(self, path) -> None:
+        relative = self._relative("." if path is None else path)
+        if relative is not None:
+            self.directories.add(relative)
+
+    def spawned(self, executable, args, cwd) -> None:
+        argv = [os.fsdecode(a) for a in (args if isinstance(args, (list, tuple)) else [args or executable])]
+        if self._relative(cwd or os.getcwd()) is None:
+            return
+        # Commands aimed at paths outside the repository do not read it
+        if any(os.path.isabs(arg) and self._relative(arg) is None for arg in argv[1:]):
+            return
+        if os.path.basename(argv[0]) == "git":
+            self.git = True
+        else:
+            self.volatile = True
+
+    def connected(self, address) -> None:
+        if not isinstance(address, tuple):
+            # Unix sockets, e.g. the Docker daemon
+            self.volatile = True
+            return
+        host = str(address[0])
+        try:
+            if ipaddress.ip_address(host).is_loopback:
+                return
+        except ValueError:
+            if host in _LOOPBACK_NAMES:
+                return
+        self.volatile = True
+
+
+_active: Optional[Recorder] = None
+_hook_installed = False
+
+
+def _audit(event: str, args: tuple) -> None:
+    recorder = _active
+    if recorder is None:
+        return
+    try:
+        if event == "open":
+            recorder.opened(args[0])
+        elif event in ("os.listdir", "os.scandir"):
+            recorder.listed(args[0])
+        elif event == "subprocess.Popen":
+            recorder.spawned(args[0], args[1], args[2])
+        elif event == "socket.connect":
+            recorder.connected(args[1])
+    except Exception:  # noqa: BLE001 - an audit hook must never break the test
+        pass
+
+
+def _install_audit_hook() -> None:
+    # Audit hooks cannot be removed; one hook serves every session in the process
+    global _hook_installed
+    if not _hook_installed:
+        sys.addaudithook(_audit)
+        _hook_installed = True
+
+
+# ============================================================================
+# Plugin
+# ============================================================================
+
+class ImpactPlugin:
+    """Selects affected tests and records dependencies of the tests that ran."""
+
+    def __init__(self, config: pytest.Config) -> None:
+        self.config = config
+        self.root = (config.rootpath / config.getini("impact_root")).resolve()
+        self.fingerprints = Fingerprints(self.root)
+        self.sources = SourceIndex(self.root, [config.rootpath, self.root])
+        hours = config.getini("impact_full_run_hours")
+        self.full_run_seconds = float(hours) * 3600 if hours not in (None, "") else DEFAULT_FULL_RUN_HOURS * 3600
+        stored = config.cache.get(CACHE_KEY, None)
+        self.map = stored if isinstance(stored, dict) and stored.get("version") == MAP_VERSION else None
+        self.static: Dict[str, Dict[str, str]] = {}
+        self.recorded: Dict[str, Recorder] = {}
+        self.outcomes: Dict[str, str] = {}
+        self.full_run_reason: Optional[str] = None
+        self.selected = 0
+        self.total = 0
+        _install_audit_hook()
+
+    # -- collection ----------------------------------------------------
+
+    def _static_deps(self, item: pytest.Item) -> Dict[str, str]:
+        deps: Dict[str, str] = {}
+        path = Path(str(item.path)).resolve()
+        if path.suffix != ".py":
+            return deps
+        module = self.sources.module(path)
+        name = item.cls.__name__ if getattr(item, "cls", None) else getattr(item, "originalname", item.name)
+        deps[TEST_SOURCE] = module["definitions"].get(name, MISSING)
+        deps[MODULE_SOURCE] = module["context"]
+        for imported in sorted(self.sources.imports(path)):
+            key = FILE + imported.relative_to(self.root).as_posix()
+            deps[key] = self.fingerprints(key)
+        fixture_info = getattr(item, "_fixtureinfo", None)
+        for fixture_name in getattr(item, "fixturenames", []):
+            definitions = fixture_info.name2fixturedefs.get(fixture_name) if fixture_info else None
+            if not definitions:
+                continue
+            func = definitions[-1].func
+            try:
+                source_file = Path(inspect.getsourcefile(func)).resolve()
+                relative = source_file.relative_to(self.root)
+                source = inspect.getsource(func)
+            except (TypeError, OSError, ValueError):
+                continue
+            deps[f"{FIXTURE}{fixture_name}@{relative.as_posix()}"] = _sha1(source.encode("utf-8"))
+        return deps
+
+    @pytest.hookimpl(trylast=True)
+    def pytest_collection_modifyitems(self, session: pytest.Session, config: pytest.Config,
+                                      items: List[pytest.Item]) -> None:
+        self.total = len(items)
+        for item in items:
+            self.static[item.nodeid] = self._static_deps(item)
+
+        if config.getoption("impact_full"):
+            self.full_run_reason = "--impact-full"
+        elif self.map is None:
+            self.full_run_reason = "no dependency map yet"
+        elif time.time() - self.map.get("last_full_run", 0) > self.full_run_seconds:
+            self.full_run_reason = "scheduled full run"
+        if self.full_run_reason:
+            self.selected = len(items)
+            return
+
+        entries = self.map["tests"]
+        selected, deselected = [], []
+        for item in items:
+            static = self.static[item.nodeid]
+
+            def current(key, static=static):
+                return static[key] if key in static else self.fingerprints(key)
+
+            entry = entries.get(item.nodeid)
+            reason = selection_reason(entry, current)
+            if reason is None and entry is not None and set(static) - set(entry["deps"]):
+                reason = "new dependencies"
+            (selected if reason else deselected).append(item)
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+            items[:] = selected
+        self.selected = len(selected)
+
+    # -- running -------------------------------------------------------
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_protocol(self, item: pytest.Item, nextitem: Optional[pytest.Item]):
+        global _active
+        recorder = Recorder(self.root)
+        # Restore rather than clear: pytester may run a session inside a test
+        outer, _active = _active, recorder
+        try:
+            yield
+        finally:
+            _active = outer
+        self.recorded[item.nodeid] = recorder
+
+    def pytest_runtest_logreport(self, report: pytest.TestReport) -> None:
+        if report.failed:
+            self.outcomes[report.nodeid] = "failed"
+        elif report.nodeid not in self.outcomes or report.when == "call":
+            self.outcomes.setdefault(report.nodeid, "passed")
+
+    # -- saving --------------------------------------------------------
+
+    def pytest_sessionfinish(self, session: pytest.Session, exitstatus: int) -> None:
+        tests = dict(self.map["tests"]) if self.map else {}
+        for nodeid, recorder in self.recorded.items():
+            deps = dict(self.static.get(nodeid, {}))
+            for relative in sorted(recorder.files):
+                deps[FILE + relative] = self.fingerprints(FILE + relative)
+            for relative in sorted(recorder.directories):
+                deps[DIRECTORY + relative] = self.fingerprints(DIRECTORY + relative)
+            if recorder.git:
+                deps[GIT_STATE] = self.fingerprints(GIT_STATE)
+            tests[nodeid] = {"deps": deps, "volatile": recorder.volatile,
+                             "outcome": self.outcomes.get(nodeid, "failed")}
+        last_full_run = self.map.get("last_full_run", 0) if self.map else 0
+        if self.full_run_reason and exitstatus != pytest.ExitCode.INTERRUPTED:
+            last_full_run = time.time()
+        self.config.cache.set(CACHE_KEY, {"version": MAP_VERSION, "last_full_run": last_full_run,
+                                          "tests": tests})
+        # Nothing affected is a successful run, not "no tests collected"
+        if exitstatus == pytest.ExitCode.NO_TESTS_COLLECTED and self.total and not self.selected:
+            session.exitstatus = pytest.ExitCode.OK
+
+    def pytest_terminal_summary(self, terminalreporter) -> None:
+        if self.full_run_reason:
+            terminalreporter.write_line(f"impact: full run ({self.full_run_reason}), "
+                                        f"dependencies recorded for {len(self.recorded)} tests")
+        else:
+            terminalreporter.write_line(f"impact: ran {self.selected} of {self.total} tests "
+                                        f"affected by changes")
+
+
+# ============================================================================
+# Hooks
+# ============================================================================
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("impact", "test impact analysis")
+    group.addoption("--impact", action="store_true", dest="impact",
+                    help="Only run tests whose recorded dependencies changed")
+    group.addoption("--impact-full", action="store_true", dest="impact_full",
+                    help="With --impact: run everything and re-record dependencies")
+    parser.addini("impact_root", "Directory whose files count as dependencies (relative to rootdir)",
+                  default=".")
+    parser.addini("impact_full_run_hours", "Force a full --impact run when the last one is older",
+                  default=str(DEFAULT_FULL_RUN_HOURS))
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    if config.getoption("impact") and getattr(config, "cache", None) is not None:
+        config.pluginmanager.register(ImpactPlugin(config), "impact-plugin")
@@ -0,0 +1,446 @@
+"""
+Record/replay cassettes for tests that talk to the live server.
+
+Tests marked ``@pytest.mark.cassette`` (test_https_properties.py and
+test_service_restart.py, via ``pytestmark``) have their ``requests`` calls
+and their ``subprocess.run`` calls of selected programs (``ssh`` by
+default) recorded into ``tests/cassettes/<test module>.json.gz`` and
+answered from there on later runs, without network access.
+
+Interception points:
+- HTTP: ``requests.adapters.HTTPAdapter.send``, so every redirect hop is
+  one interaction and ``Response.history``/``Response.url`` come out as
+  they did live
+- commands: ``subprocess.run`` for the programs named in the marker
+  (``@pytest.mark.cassette(commands=["ssh"])``); other commands run normally
+
+A cassette is one gzip-compressed JSON document: per test, a map from
+request key (``GET <url>``, or the shell-quoted command line) to the
+responses seen, in order (a key answered differently over time, such as a
+service polled until it restarts, replays the same sequence). Bodies and
+command output are stored once per content hash.
+
+Modes (``--cassettes``):
+- ``auto`` (default): replay where a cassette exists, otherwise run live
+- ``replay``: never touch the network; an unrecorded request fails the test
+- ``record``: run live and rewrite the cassettes, reporting drift against
+  the previous recording (status, redirect target, HSTS and content type,
+  exit code and output of commands); ``--cassette-drift-fail`` fails the
+  run when anything drifted
+- ``live``: ignore cassettes
+
+Network failures while recording are not stored: the test's previous
+recording is kept, and the test skips as it does offline.
+
+Usage:
+    pytest tests/test_https_properties.py tests/test_service_restart.py --cassettes=record
+    pytest tests/ --cassettes=replay
+"""
+
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import shlex
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+# ============================================================================
+# Configuration
+# ============================================================================
+
+CASSETTE_FORMAT_VERSION = 1
+
+MODES = ("auto", "replay", "record", "live")
+DEFAULT_COMMANDS = ("ssh",)
+
+# Not stored: change on every request and never asserted on
+VOLATILE_HEADERS = frozenset({"date", "age", "expires", "set-cookie", "etag", "last-modified",
+                              "x-request-id", "cf-ray", "report-to", "nel", "server-timing"})
+
+# Compared when re-recording
+DRIFT_HEADERS = ("location", "strict-transport-security", "content-type")
+
+# Exit codes meaning the command never reached the server
+UNREACHABLE_EXIT_CODES = {"ssh": 255}
+
+
+class CassetteMiss(AssertionError):
+    """A request with no recorded interaction in replay mode."""
+
+
+# ============================================================================
+# Cassettes
+# ============================================================================
+
+def http_key(request: requests.PreparedRequest) -> str:
+    """Request key of an HTTP request: method, URL and a hash of the body."""
+    key = f"{request.method} {request.url}"
+    body = request.body
+    if body:
+        data = body.encode("utf-8") if isinstance(body, str) else bytes(body)
+        key += f" #{hashlib.sha1(data).hexdigest()[:12]}"
+    return key
+
+
+def command_key(argv: Sequence, stdin: Optional[object] = None) -> str:
+    """Request key of a command: the shell-quoted command line and a hash of its input."""
+    key = shlex.join(os.fsdecode(arg) for arg in argv)
+    if stdin:
+        data = stdin.encode("utf-8") if isinstance(stdin, str) else bytes(stdin)
+        key += f" <#{hashlib.sha1(data).hexdigest()[:12]}"
+    return key
+
+
+def _encode(data: bytes) -> str:
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        return "b64:" + base64.b64encode(data).decode("ascii")
+    return "txt:" + text
+
+
+def _decode(value: str) -> bytes:
+    kind, _, payload = value.partition(":")
+    return base64.b64decode(payload) if kind == "b64" else payload.encode("utf-8")
+
+
+@dataclass
+class Cassette:
+    """Recorded interactions of one test module."""
+
+    path: Path
+    tests: Dict[str, Dict[str, List[dict]]] = field(default_factory=dict)
+    bodies: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, path: Path) -> "Cassette":
+        """Read a cassette; a missing file gives an empty one."""
+        try:
+            raw = path.read_bytes()
+        except FileNotFoundError:
+            return cls(path)
+        document = json.loads(gzip.decompress(raw))
+        if document.get("version") != CASSETTE_FORMAT_VERSION:
+            raise ValueError(f"{path}: unsupported cassette version {document.get('version')}")
+        return cls(path, document["tests"], document["bodies"])
+
+    def save(self) -> None:
+        """Write the cassette, dropping bodies no interaction refers to."""
+        used = {response[name] for interactions in self.tests.values()
+                for responses in interactions.values() for response in responses
+                for name in ("body", "stdout", "stderr") if name in response}
+        document = {"version": CASSETTE_FORMAT_VERSION, "tests": self.tests,
+                    "bodies": {digest: self.bodies[digest] for digest in sorted(used)}}
+        data = json.dumps(document, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        # mtime=0 keeps the file identical when nothing changed
+        tmp.write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+        os.replace(tmp, self.path)
+
+    def store_body(self, data: bytes) -> str:
+        digest = hashlib.sha1(data).hexdigest()
+        self.bodies.setdefault(digest, _encode(data))
+        return digest
+
+    def body(self, digest: str) -> bytes:
+        return _decode(self.bodies[digest])
+
+
+# ============================================================================
+# Recording and Replay
+# ============================================================================
+
+def describe_drift(key: str, old: dict, new: dict) -> List[str]:
+    """
+    Differences between two recordings of the same request that matter to the tests.
+
+    Args:
+        key: Request key
+        old: Previously recorded response
+        new: Newly recorded response
+
+    Returns:
+        One line per difference
+    """
+    changes = []
+    fields = [("status", "status")] if "status" in old or "status" in new else [
+        ("returncode", "exit code"), ("stdout", "output")]
+    for name, label in fields:
+        if old.get(name) != new.get(name):
+            if name == "stdout":
+                changes.append(f"{key}: {label} changed")
+            else:
+                changes.append(f"{key}: {label} {old.get(name)} -> {new.get(name)}")
+    old_headers = {k.lower(): v for k, v in old.get("headers", {}).items()}
+    new_headers = {k.lower(): v for k, v in new.get("headers", {}).items()}
+    for header in DRIFT_HEADERS:
+        if old_headers.get(header) != new_headers.get(header):
+            changes.append(f"{key}: {header} {old_headers.get(header)!r} -> {new_headers.get(header)!r}")
+    return changes
+
+
+class Session:
+    """Interactions of one test: replays or records them."""
+
+    def __init__(self, cassette: Cassette, test: str, mode: str, commands: Sequence[str]) -> None:
+        self.cassette = cassette
+        self.test = test
+        self.mode = mode
+        self.commands = set(commands)
+        self.recorded: Dict[str, List[dict]] = {}
+        self.positions: Dict[str, int] = {}
+        self.unreachable = False
+        self.replayed = 0
+
+    # -- lookup --------------------------------------------------------
+
+    def _next(self, key: str) -> dict:
+        responses = self.cassette.tests.get(self.test, {}).get(key)
+        if not responses:
+            raise CassetteMiss(f"no recorded interaction for {key!r} in {self.cassette.path.name} "
+                               f"({self.test}); re-record with --cassettes=record")
+        position = self.positions.get(key, 0)
+        self.positions[key] = position + 1
+        self.replayed += 1
+        # Past the end the last response repeats (e.g. a service that stays up)
+        return responses[min(position, len(responses) - 1)]
+
+    def _append(self, key: str, response: dict) -> None:
+        responses = self.recorded.setdefault(key, [])
+        if not responses or responses[-1] != response:
+            responses.append(response)
+
+    # -- HTTP ----------------------------------------------------------
+
+    def send(self, adapter: HTTPAdapter, original, request: requests.PreparedRequest, **kwargs):
+        key = http_key(request)
+        if self.mode == "replay":
+            return self._response(adapter, request, self._next(key))
+        try:
+            response = original(adapter, request, **kwargs)
+        except requests.exceptions.ConnectionError:
+            self.unreachable = True
+            raise
+        body = response.content
+        self._append(key, {
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {name: value for name, value in response.headers.items()
+                        if name.lower() not in VOLATILE_HEADERS},
+            "body": self.cassette.store_body(body),
+        })
+        return response
+
+    def _response(self, adapter: HTTPAdapter, request: requests.PreparedRequest,
+                  recorded: dict) -> requests.Response:
+        response = requests.Response()
+        response.status_code = recorded["status"]
+        response.reason = recorded["reason"]
+        response.headers = CaseInsensitiveDict(recorded["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        body = self.cassette.body(recorded["body"])
+        response.raw = io.BytesIO(body)
+        response._content = body
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = adapter
+        return response
+
+    # -- commands ------------------------------------------------------
+
+    def intercepts(self, args) -> bool:
+        argv = [args] if isinstance(args, (str, bytes)) else list(args)
+        return bool(argv) and os.path.basename(os.fsdecode(argv[0])) in self.commands
+
+    def run(self, original, args, *popenargs, **kwargs) -> subprocess.CompletedProcess:
+        argv = [args] if isinstance(args, (str, bytes)) else list(args)
+        key = command_key(argv, kwargs.get("input"))
+        text = bool(kwargs.get("text") or kwargs.get("universal_newlines")
+                    or kwargs.get("encoding") or kwargs.get("errors"))
+        if self.mode == "replay":
+            recorded = self._next(key)
+            stdout, stderr = (self.cassette.body(recorded[name]) for name in ("stdout", "stderr"))
+            if text:
+                encoding = kwargs.get("encoding") or "utf-8"
+                stdout, stderr = stdout.decode(encoding), stderr.decode(encoding)
+            capture = kwargs.get("capture_output") or kwargs.get("stdout") == subprocess.PIPE
+            result = subprocess.CompletedProcess(args, recorded["returncode"],
+                                                 stdout if capture else None,
+                                                 stderr if capture else None)
+        else:
+            # check is applied below, after the result has been recorded
+            result = original(args, *popenargs, **dict(kwargs, check=False))
+            program = os.path.basename(os.fsdecode(argv[0]))
+            if result.returncode == UNREACHABLE_EXIT_CODES.get(program):
+                self.unreachable = True
+            else:
+                self._append(key, {
+                    "returncode": result.returncode,
+                    "stdout": self.cassette.store_body(_bytes(result.stdout)),
+                    "stderr": self.cassette.store_body(_bytes(result.stderr)),
+                })
+        if kwargs.get("check") and result.returncode:
+            raise subprocess.CalledProcessError(result.returncode, args, result.stdout, result.stderr)
+        return result
+
+    # -- drift ---------------------------------------------------------
+
+    def commit(self) -> Tuple[List[str], bool]:
+        """
+        Store this test's recording in the cassette.
+
+        Returns:
+            Drift lines against the previous recording, and whether the
+            recording was stored (not when the server was unreachable)
+        """
+        if self.unreachable:
+            return [], False
+        previous = self.cassette.tests.get(self.test, {})
+        drift = []
+        for key, responses in self.recorded.items():
+            old = previous.get(key)
+            if old:
+                for old_response, new_response in zip(old, responses):
+                    drift.extend(describe_drift(key, old_response, new_response))
+                if len(old) != len(responses):
+                    drift.append(f"{key}: {len(old)} -> {len(responses)} distinct responses")
+        for key in previous:
+            if key not in self.recorded:
+                drift.append(f"{key}: no longer requested")
+        self.cassette.tests[self.test] = self.recorded
+        return drift, True
+
+
+def _bytes(output) -> bytes:
+    if output is None:
+        return b""
+    return output.encode("utf-8") if isinstance(output, str) else output
+
+
+# ============================================================================
+# Plugin
+# ============================================================================
+
+class CassettePlugin:
+    """Installs the interceptors around tests marked ``cassette``."""
+
+    def __init__(self, config: pytest.Config) -> None:
+        self.mode = config.getoption("cassettes")
+        self.drift_fails = config.getoption("cassette_drift_fail")
+        self.directory = config.rootpath / config.getini("cassette_dir")
+        self.cassettes: Dict[Path, Tuple[bytes, Cassette]] = {}
+        self.dirty: Dict[Path, Cassette] = {}
+        self.drift: List[str] = []
+        self.kept: List[str] = []
+        self.recorded = 0
+        self.replayed = 0
+
+    def cassette_path(self, item: pytest.Item) -> Path:
+        return self.directory / f"{Path(str(item.path)).stem}.json.gz"
+
+    def _cassette(self, path: Path) -> Cassette:
+        if path in self.dirty:
+            return self.dirty[path]
+        # Read on every test, so changes on disk (and test impact analysis) see it
+        try:
+            raw = path.read_bytes()
+        except FileNotFoundError:
+            raw = b""
+        cached = self.cassettes.get(path)
+        if cached is None or cached[0] != raw:
+            cached = self.cassettes[path] = (raw, Cassette.load(path))
+        return cached[1]
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_runtest_call(self, item: pytest.Item):
+        marker = item.get_closest_marker("cassette")
+        if marker is None or self.mode == "live":
+            yield
+            return
+        path = self.cassette_path(item)
+        if self.mode == "auto" and not path.exists():
+            yield
+            return
+        cassette = self._cassette(path)
+        mode = "record" if self.mode == "record" else "replay"
+        session = Session(cassette, item.nodeid.split("::", 1)[1], mode,
+                          marker.kwargs.get("commands", DEFAULT_COMMANDS))
+        original_send, original_run = HTTPAdapter.send, subprocess.run
+
+        def send(adapter, request, **kwargs):
+            return session.send(adapter, original_send, request, **kwargs)
+
+        def run(args, *popenargs, **kwargs):
+            if not session.intercepts(args):
+                return original_run(args, *popenargs, **kwargs)
+            return session.run(original_run, args, *popenargs, **kwargs)
+
+        HTTPAdapter.send, subprocess.run = send, run
+        try:
+            yield
+        finally:
+            HTTPAdapter.send, subprocess.run = original_send, original_run
+        self.replayed += session.replayed
+        if mode == "record":
+            drift, stored = session.commit()
+            if stored:
+                self.recorded += sum(map(len, session.recorded.values()))
+                self.drift.extend(drift)
+                self.dirty[path] = cassette
+            else:
+                self.kept.append(item.nodeid)
+
+    def pytest_sessionfinish(self, session: pytest.Session, exitstatus: int) -> None:
+        for cassette in self.dirty.values():
+            cassette.save()
+        if self.drift and self.drift_fails and exitstatus == pytest.ExitCode.OK:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+    def pytest_terminal_summary(self, terminalreporter) -> None:
+        if self.mode == "record":
+            terminalreporter.write_line(f"cassettes: recorded {self.recorded} interactions "
+                                        f"into {len(self.dirty)} cassettes")
+            for nodeid in self.kept:
+                terminalreporter.write_line(f"cassettes: kept previous recording of {nodeid} "
+                                            f"(server unreachable)")
+            if self.drift:
+                terminalreporter.section("cassette drift")
+                for line in self.drift:
+                    terminalreporter.write_line(line)
+        elif self.replayed:
+            terminalreporter.write_line(f"cassettes: replayed {self.replayed} interactions")
+
+
+# ============================================================================
+# Hooks
+# ============================================================================
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("cassettes", "record/replay of live-server interactions")
+    group.addoption("--cassettes", choices=MODES, default="auto",
+                    help="auto: replay recorded tests, run the rest live (default); "
+                         "replay: never use the network; record: re-record; live: ignore cassettes")
+    group.addoption("--cassette-drift-fail", action="store_true", dest="cassette_drift_fail",
+                    help="With --cassettes=record: fail when responses differ from the recording")
+    parser.addini("cassette_dir", "Directory of the cassettes (relative to rootdir)",
+                  default="cassettes")
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    config.addinivalue_line("markers", "cassette(commands=['ssh']): record and replay HTTP "
+                                       "requests and the named commands")
+    config.pluginmanager.register(CassettePlugin(config), "cassette-plugin")
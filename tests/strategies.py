@@ -0,0 +1,227 @@
+"""
+Shared Hypothesis strategies for workspace paths, project names and commit
+messages.
+
+Every strategy constructs valid values directly instead of generating text
+and discarding what does not fit with ``.filter()``: a name is one text
+draw whose leading and trailing separators are replaced by letters, file
+extensions are part of the construction and lengths are counted in UTF-8
+bytes. No example is rejected, so the whole
+example budget reaches the test and the ``filter_too_much`` health check
+cannot trigger. Alphabets are plain ``characters()`` strategies, which
+Hypothesis draws as a single string choice rather than character by
+character.
+
+About one example in ten is steered towards each edge case that the
+filtered strategies rarely produce:
+- deep nesting (up to ``DEEP_MAX_DEPTH`` directories)
+- names made only of non-ASCII letters and digits (plus separators)
+- names of the maximum length (``NAME_MAX`` bytes for path components)
+
+The edge-case switch shrinks towards the ordinary case, so failures still
+minimise to simple examples.
+
+Usage:
+    from strategies import commit_messages, project_names, relative_paths
+
+    @given(relative_path=relative_paths(), project_name=project_names())
+    def test_something(relative_path, project_name): ...
+
+Throughput and filter ratios against the previous strategies:
+    python benchmarks/bench_strategies.py
+"""
+
+from pathlib import Path
+from typing import Sequence
+
+from hypothesis import strategies as st
+
+
+# ============================================================================
+# Limits
+# ============================================================================
+
+# Longest file or directory name on Linux filesystems, in bytes
+NAME_MAX = 255
+
+# Keep generated paths well below PATH_MAX (4096) including the temp workspace
+MAX_PATH_BYTES = 3072
+
+DEFAULT_MAX_DEPTH = 3
+DEEP_MAX_DEPTH = 16
+
+COMPONENT_MAX_CHARS = 30
+PROJECT_NAME_MAX_CHARS = 50
+WORD_MAX_CHARS = 20
+
+EXTENSIONS = ("txt", "py", "js", "md", "json")
+
+# Percentage of examples steered to each edge case
+EDGE_CASE_PERCENT = 10
+
+# Example shapes, picked once per generated value
+ORDINARY, UNICODE, MAX_LENGTH, DEEP = "ordinary", "unicode", "max_length", "deep"
+
+
+# ============================================================================
+# Alphabets
+# ============================================================================
+
+_ALNUM = ("Lu", "Ll", "Nd")
+PATH_SEPARATORS = "-_."
+PROJECT_SEPARATORS = "-_"
+
+
+def _alphabet(separators: str = "", unicode_only: bool = False) -> st.SearchStrategy:
+    return st.characters(whitelist_categories=_ALNUM, whitelist_characters=separators,
+                         min_codepoint=0x80 if unicode_only else None)
+
+
+ALPHABETS = {
+    (separators, unicode_only): _alphabet(separators, unicode_only)
+    for separators in ("", PATH_SEPARATORS, PROJECT_SEPARATORS)
+    for unicode_only in (False, True)
+}
+ASCII_ALNUM = st.characters(whitelist_categories=_ALNUM, max_codepoint=0x7F)
+
+# Letters that stand in for a separator at either end of a name
+_END_REPLACEMENTS = {
+    False: {"-": "a", "_": "b", ".": "c"},
+    True: {"-": "\u00e9", "_": "\u00df", ".": "\u00f8"},
+}
+
+
+def _shape(draw, *edge_cases: str) -> str:
+    """Pick the ordinary shape or one of ``edge_cases``, each EDGE_CASE_PERCENT of the time."""
+    if not EDGE_CASE_PERCENT:
+        return ORDINARY
+    # High values select the edge cases, so shrinking returns to the ordinary shape
+    roll = draw(st.integers(min_value=0, max_value=99))
+    index = (99 - roll) // EDGE_CASE_PERCENT
+    return edge_cases[index] if index < len(edge_cases) else ORDINARY
+
+
+def _truncate_bytes(text: str, max_bytes: int) -> str:
+    encoded = text.encode("utf-8")
+    if len(encoded) <= max_bytes:
+        return text
+    return encoded[:max_bytes].decode("utf-8", errors="ignore")
+
+
+# ============================================================================
+# Names
+# ============================================================================
+
+def _fix_ends(name: str, unicode_only: bool) -> str:
+    replacements = _END_REPLACEMENTS[unicode_only]
+    if name[0] in replacements:
+        name = replacements[name[0]] + name[1:]
+    if name[-1] in replacements:
+        name = name[:-1] + replacements[name[-1]]
+    return name
+
+
+def _name(draw, shape: str, separators: str, max_chars: int, max_bytes: int) -> str:
+    """Alphanumeric first and last character, separators only inside."""
+    unicode_only = shape == UNICODE
+    if shape == MAX_LENGTH:
+        # Fill up with ASCII so the byte limit is met exactly
+        name = draw(st.text(alphabet=ALPHABETS[(separators, False)], min_size=1, max_size=max_bytes))
+        name = _truncate_bytes(name, max_bytes - 1) or "a"
+        padding = max_bytes - len(name.encode("utf-8"))
+        name += draw(st.text(alphabet=ASCII_ALNUM, min_size=padding, max_size=padding))
+        return _fix_ends(name, False)
+    name = draw(st.text(alphabet=ALPHABETS[(separators, unicode_only)], min_size=1, max_size=max_chars))
+    # Non-ASCII replacement letters are two bytes, one more than a separator
+    return _fix_ends(_truncate_bytes(name, max_bytes - 2 * unicode_only) or "a", unicode_only)
+
+
+def _component(draw, shape: str, max_bytes: int) -> str:
+    return _name(draw, shape, PATH_SEPARATORS, COMPONENT_MAX_CHARS, max_bytes)
+
+
+@st.composite
+def path_components(draw, max_bytes: int = NAME_MAX) -> str:
+    """
+    A file or directory name: letters, digits and ``-_.``, never starting or
+    ending with a dot (so never ``.`` or ``..``).
+
+    Args:
+        max_bytes: Byte limit, met exactly by the maximum-length edge case
+    """
+    return _component(draw, _shape(draw, UNICODE, MAX_LENGTH), max_bytes)
+
+
+def _file_name(draw, shape: str, extensions: Sequence[str], max_bytes: int) -> str:
+    extension = draw(st.sampled_from(extensions))
+    return f"{_component(draw, shape, max_bytes - len(extension) - 1)}.{extension}"
+
+
+@st.composite
+def file_names(draw, extensions: Sequence[str] = EXTENSIONS, max_bytes: int = NAME_MAX) -> str:
+    """
+    A file name with one of ``extensions``.
+
+    Args:
+        extensions: Extensions without the dot
+        max_bytes: Byte limit for the whole name
+    """
+    return _file_name(draw, _shape(draw, UNICODE, MAX_LENGTH), list(extensions), max_bytes)
+
+
+@st.composite
+def relative_paths(draw, min_depth: int = 1, max_depth: int = DEFAULT_MAX_DEPTH,
+                   extensions: Sequence[str] = EXTENSIONS) -> Path:
+    """
+    A relative file path inside a workspace: directories plus a file name.
+
+    Args:
+        min_depth: Fewest path components (including the file name)
+        max_depth: Most components in ordinary examples; the deep-nesting
+            edge case goes up to ``DEEP_MAX_DEPTH``
+        extensions: Extensions for the file name
+    """
+    shape = _shape(draw, UNICODE, MAX_LENGTH, DEEP)
+    deepest = max(max_depth, DEEP_MAX_DEPTH) if shape == DEEP else max_depth
+    depth = draw(st.integers(min_value=min_depth, max_value=deepest))
+    max_bytes = min(NAME_MAX, MAX_PATH_BYTES // depth - 1)
+    directories = [_component(draw, shape, max_bytes) for _ in range(depth - 1)]
+    return Path(*directories, _file_name(draw, shape, list(extensions), max_bytes))
+
+
+@st.composite
+def project_names(draw, max_chars: int = PROJECT_NAME_MAX_CHARS) -> str:
+    """
+    A project directory name: letters, digits, ``-`` and ``_``, starting and
+    ending with a letter or digit.
+
+    Args:
+        max_chars: Longest name in characters, produced by the edge case
+    """
+    shape = _shape(draw, UNICODE, MAX_LENGTH)
+    if shape == MAX_LENGTH:
+        name = draw(st.text(alphabet=ALPHABETS[(PROJECT_SEPARATORS, False)],
+                            min_size=max_chars, max_size=max_chars))
+        return _fix_ends(name, False)
+    return _name(draw, shape, PROJECT_SEPARATORS, max_chars, NAME_MAX)
+
+
+# ============================================================================
+# Commit Messages
+# ============================================================================
+
+@st.composite
+def commit_messages(draw, min_words: int = 2, max_words: int = 10) -> str:
+    """
+    A single-line commit message of letter-and-digit words.
+
+    The long-message edge case always uses ``max_words`` words.
+
+    Args:
+        min_words: Fewest words
+        max_words: Most words
+    """
+    shape = _shape(draw, UNICODE, MAX_LENGTH)
+    word = st.text(alphabet=ALPHABETS[("", shape == UNICODE)], min_size=1, max_size=WORD_MAX_CHARS)
+    fewest = max_words if shape == MAX_LENGTH else min_words
+    return " ".join(draw(st.lists(word, min_size=fewest, max_size=max_words)))
@@ -0,0 +1,235 @@
+"""
+Tests for conversation-affinity scheduling.
+
+These tests run multi-turn conversations through the LLM gateway in front
+of the in-process fake Ollama with its prefix cache simulation on, and
+verify that the scheduler normalizes options, pins sessions to nodes, gives
+slots to sessions whose cache is warm, and reports the prefill tokens saved
+close to what the fake actually skipped.
+"""
+
+import copy
+import random
+import threading
+import time
+
+import pytest
+import requests
+from hypothesis import given, settings, strategies as st
+
+from aicoding.affinity import AffinityScheduler, main
+from aicoding.fake_ollama import FakeOllama
+from aicoding.models import LOAD_OPTIONS, get_profile
+from aicoding.tracing import LLMGateway, Tracer
+
+MODEL = "qwen2.5-coder:7b"
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+def conversation(url: str, number: int, turns: int, num_ctx: int) -> None:
+    """An agent session: the whole conversation is resent every turn."""
+    rng = random.Random(number)
+    messages = [{"role": "system", "content": f"system {number} " + "rules " * 300},
+                {"role": "user", "content": f"task {number} " + "code " * 200}]
+    for turn in range(turns):
+        reply = requests.post(f"{url}/api/chat", timeout=60, json={
+            "model": MODEL, "messages": messages, "stream": False,
+            "options": {"num_predict": 8, "num_ctx": num_ctx, "temperature": 0.2}}).json()
+        messages += [reply["message"], {"role": "user", "content": f"output {turn} " + "line " * rng.randint(50, 150)}]
+        time.sleep(rng.uniform(0, 0.02))
+
+
+def run_sessions(url: str, sessions: int, turns: int = 5) -> None:
+    threads = [threading.Thread(target=conversation, args=(url, number, turns, 4096 if number % 2 else 8192))
+               for number in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def admit_later(scheduler: AffinityScheduler, session: str, order: list) -> threading.Thread:
+    """Admit a request in a thread, recording its ticket once it may run."""
+    def admit() -> None:
+        order.append(scheduler.admit(session, {"model": MODEL, "prompt": session}))
+
+    queued = sum(len(node.waiting) for node in scheduler.nodes)
+    thread = threading.Thread(target=admit)
+    thread.start()
+    while sum(len(node.waiting) for node in scheduler.nodes) == queued:
+        time.sleep(0.001)
+    return thread
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_fake_ollama_simulates_prefix_caches() -> None:
+    first = [{"role": "system", "content": "rules " * 200}, {"role": "user", "content": "fix " * 100}]
+    with FakeOllama(prefix_cache=True, time_scale=0.001) as fake:
+        def chat(messages: list, **options) -> dict:
+            return requests.post(f"{fake.url}/api/chat", timeout=30, json={
+                "model": MODEL, "messages": messages, "stream": False,
+                "options": dict(options, num_predict=4)}).json()
+
+        full = chat(first)["prompt_eval_count"]
+        reply = chat(first + [{"role": "assistant", "content": "token token token token"},
+                              {"role": "user", "content": "next"}])
+        # Only the reply and the new message are evaluated
+        assert reply["prompt_eval_count"] < 5 and fake.prefix_hits == 1
+        # Another conversation takes the only slot over
+        chat([{"role": "user", "content": "other " * 100}])
+        assert chat(first)["prompt_eval_count"] == full
+        # Changed load options reload the model and empty the slots
+        assert chat(first, temperature=0.9)["prompt_eval_count"] < 5 and fake.option_reloads == 0
+        assert chat(first, num_ctx=4096)["prompt_eval_count"] == full and fake.option_reloads == 1
+        assert fake.cached_tokens > 2 * full
+
+
+def test_scheduling_saves_measured_prefill(capsys) -> None:
+    tracer = Tracer(sample_rate=0.0)
+    with FakeOllama(prefix_cache=True, parallel=2, time_scale=0.01) as fake:
+        with LLMGateway(fake.url, tracer=tracer) as gateway:
+            run_sessions(gateway.url, 6)
+            assert requests.get(f"{gateway.url}/_gateway/status", timeout=10).status_code == 404
+        baseline, reloads = fake.prompt_tokens, fake.option_reloads
+    assert reloads > 0
+
+    with FakeOllama(prefix_cache=True, parallel=2, time_scale=0.01) as fake:
+        scheduler = AffinityScheduler([fake.url], slots=2)
+        with LLMGateway(fake.url, tracer=tracer, scheduler=scheduler) as gateway:
+            run_sessions(gateway.url, 6)
+            assert main(["status", "--url", gateway.url]) == 0
+        totals = scheduler.status()["totals"]
+        assert fake.option_reloads == 0 and totals["normalized"] == 15
+        assert fake.prompt_tokens < 0.6 * baseline
+        # What the scheduler reports is what the fake skipped
+        assert totals["evaluated_tokens"] == fake.prompt_tokens
+        assert totals["saved_tokens"] == pytest.approx(fake.cached_tokens, rel=0.1)
+        assert totals["hits"] > 10
+    assert "saved by the cache" in capsys.readouterr().out
+    assert scheduler.status()["options"] == {MODEL: {"num_ctx": get_profile(MODEL).num_ctx}}
+    assert main(["status", "--url", "http://127.0.0.1:9"]) == 1
+
+
+def test_queue_prefers_cached_sessions_within_max_wait() -> None:
+    scheduler = AffinityScheduler(["http://node"], slots=1, max_hold=0)
+    running = scheduler.admit("a", {"model": MODEL, "prompt": "a"})
+    order: list = []
+    b, a = admit_later(scheduler, "b", order), admit_later(scheduler, "a", order)
+    scheduler.release(running, {"prompt_eval_count": 10})
+    a.join()
+    # Session a's cache is warm: it goes before b, which came first
+    assert [ticket.session for ticket in order] == ["a"] and order[0].hit
+    scheduler.release(order[0], {"prompt_eval_count": 1})
+    b.join()
+    assert not order[1].hit
+    scheduler.release(order[1], {"prompt_eval_count": 10})
+
+    # Past max_wait the oldest request goes first
+    scheduler.max_wait = 0.0
+    running = scheduler.admit("a", {"model": MODEL, "prompt": "a"})
+    order.clear()
+    b, a = admit_later(scheduler, "b", order), admit_later(scheduler, "a", order)
+    scheduler.release(running, {"prompt_eval_count": 10})
+    b.join()
+    assert [ticket.session for ticket in order] == ["b"]
+    scheduler.release(order[0], {"prompt_eval_count": 10})
+    a.join()
+    scheduler.release(order[1], {"prompt_eval_count": 10})
+    stats = scheduler.session_stats("a")
+    assert stats.requests == 4 and stats.hits == 1 and stats.saved_tokens == 9
+
+
+def test_slots_are_held_for_sessions_that_return_soon() -> None:
+    scheduler = AffinityScheduler(["http://node"], slots=1, max_hold=0.5)
+    stats = {"prompt_eval_count": 600, "prompt_eval_duration": int(10e9), "eval_count": 10}
+    for _ in range(2):
+        # The second turn measures how soon a returns
+        scheduler.release(scheduler.admit("a", {"model": MODEL, "prompt": "a"}), stats)
+        time.sleep(0.05)
+    # a's cache spares 10 s of prefill and it returns within 0.05 s: its slot waits for it
+    assert scheduler.status()["nodes"][0]["reserved"] == 1
+    order: list = []
+    b = admit_later(scheduler, "b", order)
+    time.sleep(0.02)
+    assert not order
+    ticket = scheduler.admit("a", {"model": MODEL, "prompt": "a"})
+    assert ticket.hit
+    scheduler.release(ticket, {"prompt_eval_count": 1, "eval_count": 10})
+    # ...but not past max_hold
+    b.join(timeout=5)
+    assert order[0].session == "b" and order[0].waited < 1.0
+    scheduler.release(order[0], stats)
+
+
+def test_sessions_are_pinned_to_nodes() -> None:
+    scheduler = AffinityScheduler(["http://one", "http://two/"], slots=1)
+    nodes = {}
+    for _ in range(3):
+        for session in ("s1", "s2", "s3", "s4"):
+            ticket = scheduler.admit(session, {"model": MODEL, "prompt": session})
+            assert nodes.setdefault(session, ticket.upstream) == ticket.upstream
+            scheduler.release(ticket, {"prompt_eval_count": 1})
+    assert sorted(nodes.values()) == ["http://one", "http://one", "http://two", "http://two"]
+    # A failed node gives its session up
+    ticket = scheduler.admit("s1", {"model": MODEL, "prompt": "s1"})
+    scheduler.release(ticket, {}, failed=True)
+    assert sorted(node["sessions"] for node in scheduler.status()["nodes"]) == [1, 2]
+    with pytest.raises(ValueError):
+        AffinityScheduler([])
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+option_values = st.fixed_dictionaries({}, optional={
+    "num_ctx": st.sampled_from([2048, 4096, 8192, 32768]), "num_batch": st.sampled_from([256, 512]),
+    "num_thread": st.integers(min_value=1, max_value=8), "use_mmap": st.booleans(),
+    "temperature": st.floats(min_value=0, max_value=2), "num_predict": st.integers(min_value=1, max_value=512)})
+
+
+# Feature: self-hosted-ai-coding-platform, Property 30: Normalized Requests Share Load Options
+@settings(max_examples=100, deadline=None)
+@given(requests_=st.lists(st.tuples(st.sampled_from([MODEL, "deepseek-coder-v2:16b", "ollama/llama3:8b"]),
+                                    st.one_of(st.none(), option_values)), max_size=20))
+def test_normalized_requests_share_load_options(requests_) -> None:
+    """
+    Property 30: Normalized Requests Share Load Options
+
+    For any sequence of requests with any mix of options, every load option
+    a normalized request carries should have one value per model - the
+    catalog's for ``num_ctx`` - so no request makes Ollama reload the model,
+    while sampling options pass through unchanged.
+
+    Validates: Requirements 2.4, 3.4
+
+    Args:
+        requests_: (model, options) of each request
+    """
+    scheduler = AffinityScheduler(["http://node"])
+    values: dict = {}
+    for model, options in requests_:
+        payload = {"model": model, "prompt": "p"}
+        if options is not None:
+            payload["options"] = copy.deepcopy(options)
+        changed = scheduler.normalize(payload)
+        normalized = payload.get("options", {})
+        assert changed == (normalized != (options or {}))
+        # Property: one value per load option and model, num_ctx from the catalog
+        assert normalized["num_ctx"] == get_profile(model).num_ctx
+        for name in LOAD_OPTIONS:
+            if name in normalized:
+                assert values.setdefault((model, name), normalized[name]) == normalized[name]
+        for name, value in (options or {}).items():
+            if name not in LOAD_OPTIONS:
+                assert normalized[name] == value
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,200 @@
+"""
+Tests for the benchmark history store and regression detection.
+
+These tests run the suites against the in-process fake Ollama, store runs in
+a temporary history directory and verify the statistics on synthetic runs:
+noise is not reported, real shifts are, and change points point at the
+run (and fingerprint entry) where the shift started.
+"""
+
+import json
+import random
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from aicoding.bench_history import (
+    MIN_SEGMENT, BenchmarkError, HistoryStore, Metric, Run, SuiteContext, compare_metric, compare_runs,
+    container_images, detect_changes, environment_fingerprint, main, mann_whitney, run_suite,
+)
+from aicoding.fake_ollama import FakeOllama
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = Path(tempfile.mkdtemp())
+    yield temp_dir
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def noisy(level: float, count: int, rng: random.Random, noise: float = 0.02) -> list:
+    return [level * (1 + rng.uniform(-noise, noise)) for _ in range(count)]
+
+
+def synthetic_run(number: int, latency: list, fingerprint: dict, rate: list = None) -> Run:
+    metrics = {"latency": Metric("seconds", latency)}
+    if rate is not None:
+        metrics["decode_rate"] = Metric("tokens/second", rate, higher_is_better=True)
+    return Run(id=f"run-{number:03d}", suite="inference", started=1_700_000_000 + number * 3600, seconds=1.0,
+               fingerprint=dict(fingerprint), metrics=metrics)
+
+
+def fake_docker(command: list) -> str:
+    if command[:2] == ["docker", "ps"]:
+        return "abc\ndef\nfed\n"
+    return "/ollama|sha256:1111\n/openhands-app|sha256:2222\n/openhands-runtime-xyz|sha256:3333\n"
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_mann_whitney_exact_and_approximate() -> None:
+    # Completely separated samples: 2 of the C(6, 3) = 20 rank assignments are as extreme
+    assert mann_whitney([1, 2, 3], [4, 5, 6]) == pytest.approx(0.1)
+    assert mann_whitney([1, 2, 3], [1, 2, 3]) == pytest.approx(1.0)
+    assert mann_whitney([5, 5, 5], [5, 5, 5]) == pytest.approx(1.0)
+    # Large samples use the normal approximation
+    rng = random.Random(1)
+    same = mann_whitney(noisy(1.0, 40, rng), noisy(1.0, 40, rng))
+    shifted = mann_whitney(noisy(1.0, 40, rng), noisy(1.1, 40, rng))
+    assert same > 0.01 and shifted < 1e-6
+
+
+def test_compare_reports_only_significant_changes() -> None:
+    rng = random.Random(2)
+    base = Metric("seconds", noisy(1.0, 7, rng))
+    assert compare_metric("latency", base, Metric("seconds", noisy(1.0, 7, rng))).status == "unchanged"
+    slower = compare_metric("latency", base, Metric("seconds", noisy(1.3, 7, rng)))
+    assert slower.status == "regression" and slower.change == pytest.approx(0.3, abs=0.05)
+    assert slower.p_value < 0.01
+    faster_decode = compare_metric("decode_rate", Metric("tokens/second", noisy(8.0, 7, rng), True),
+                                   Metric("tokens/second", noisy(10.0, 7, rng), True))
+    assert faster_decode.status == "improvement"
+    # Significant but below min_change
+    tiny = compare_metric("latency", Metric("seconds", [1.0] * 7), Metric("seconds", [1.02] * 7))
+    assert tiny.p_value < 0.01 and tiny.status == "unchanged"
+    # Single samples cannot be tested: only non-overlapping changes count
+    single = compare_metric("suite", Metric("seconds", [100.0]), Metric("seconds", [130.0]))
+    assert single.p_value is None and single.status == "regression"
+
+    fingerprint = {"cpu": "test"}
+    run_a = synthetic_run(1, noisy(1.0, 7, rng), fingerprint)
+    other_suite = Run(**dict(vars(synthetic_run(2, [1.0], fingerprint)), suite="git"))
+    with pytest.raises(BenchmarkError):
+        compare_runs(run_a, other_suite)
+
+
+def test_change_points_point_at_the_culprit(temp_workspace) -> None:
+    rng = random.Random(3)
+    store = HistoryStore(temp_workspace / "history")
+    fingerprint = {"cpu": "test", "model:qwen2.5-coder:7b": "aaa"}
+    for number in range(20):
+        if number == 12:
+            # A re-pulled model makes generation slower
+            fingerprint["model:qwen2.5-coder:7b"] = "bbb"
+        level = 1.0 if number < 12 else 1.4
+        store.save(synthetic_run(number, noisy(level, 7, rng), fingerprint, noisy(8.0, 7, rng)))
+    runs = store.runs("inference")
+    assert [run.id for run in runs] == [f"run-{number:03d}" for number in range(20)]
+
+    [point] = detect_changes(runs)
+    assert point.metric == "latency" and point.run == "run-012" and point.previous_run == "run-011"
+    assert point.regression and point.change == pytest.approx(0.4, abs=0.05)
+    assert point.fingerprint_changes == {"model:qwen2.5-coder:7b": ("aaa", "bbb")}
+
+    history = ["--history-dir", str(temp_workspace / "history")]
+    assert main(history + ["changes", "--check"]) == 1
+    assert main(history + ["changes", "--metric", "decode_rate", "--check"]) == 0
+    assert main(history + ["compare", "--suite", "inference", "--check"]) == 0
+    assert main(history + ["compare", "run-011", "run-012", "--check"]) == 1
+    assert main(history + ["compare", "run-011", "missing"]) == 1
+
+
+def test_suites_record_runs_with_fingerprints(temp_workspace, capsys) -> None:
+    store = HistoryStore(temp_workspace / "history")
+    (temp_workspace / "test_tiny.py").write_text("def test_ok():\n    assert True\n")
+    with FakeOllama(models=["qwen2.5-coder:7b"], time_scale=0.001) as fake:
+        context = SuiteContext(workdir=temp_workspace / "work", repetitions=3, ollama_url=fake.url,
+                               openhands_url=f"{fake.url}/api/ps",
+                               pytest_args=[str(temp_workspace / "test_tiny.py")])
+        (temp_workspace / "work").mkdir()
+        fingerprint = environment_fingerprint(fake.url, runner=fake_docker)
+        assert fingerprint["image:ollama"] == "sha256:1111" and fingerprint["image:openhands-app"] == "sha256:2222"
+        assert "image:openhands-runtime-xyz" not in fingerprint
+        assert fingerprint["model:qwen2.5-coder:7b"] == fake.model_digest("qwen2.5-coder:7b")
+
+        runs = {name: run_suite(store, name, context, label="baseline", fingerprint=fingerprint)
+                for name in ("inference", "health", "git", "workspace", "tests")}
+        fake.digests["qwen2.5-coder:7b"] = "re-pulled"
+        again = run_suite(store, "inference", context, fingerprint=environment_fingerprint(fake.url, fake_docker))
+
+    assert sorted(runs["inference"].metrics) == ["decode_rate", "latency", "prefill_rate"]
+    assert len(runs["inference"].metrics["latency"].samples) == 3
+    assert sorted(runs["health"].metrics) == ["ollama", "openhands", "sweep"]
+    assert sorted(runs["git"].metrics) == ["commit", "status"]
+    assert sorted(runs["workspace"].metrics) == ["read", "scan", "write"]
+    # The tests suite runs once per run, whatever the repetitions
+    assert len(runs["tests"].metrics["suite"].samples) == 1
+    assert all(sample > 0 for run in runs.values() for metric in run.metrics.values() for sample in metric.samples)
+    assert list((temp_workspace / "work").iterdir()) == []
+
+    stored = json.loads((temp_workspace / "history" / "inference" / f"{again.id}.json").read_text())
+    assert stored["fingerprint"]["model:qwen2.5-coder:7b"] == "re-pulled"
+    assert store.get("previous", "inference").id == runs["inference"].id
+    assert store.get(again.id).metrics["latency"].samples == again.metrics["latency"].samples
+
+    assert main(["--history-dir", str(temp_workspace / "history"), "compare", "--suite", "inference"]) == 0
+    assert "model:qwen2.5-coder:7b" in capsys.readouterr().out
+    with pytest.raises(BenchmarkError):
+        run_suite(store, "missing", context, fingerprint={})
+    assert container_images(lambda command: (_ for _ in ()).throw(OSError("no docker"))) == {}
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 27: Change Points Mark Level Shifts
+@settings(max_examples=100, deadline=None)
+@given(level=st.floats(min_value=0.001, max_value=1000.0),
+       shift=st.one_of(st.floats(min_value=-0.6, max_value=-0.2), st.floats(min_value=0.2, max_value=2.0)),
+       before=st.integers(min_value=MIN_SEGMENT + 3, max_value=15),
+       after=st.integers(min_value=MIN_SEGMENT + 3, max_value=15),
+       seed=st.integers(min_value=0, max_value=2 ** 16))
+def test_change_points_mark_level_shifts(level, shift, before, after, seed) -> None:
+    """
+    Property 27: Change Points Mark Level Shifts
+
+    For any history of runs with at most 2% noise whose level shifts by at
+    least 20% once, change-point detection should report exactly one change,
+    at the first run of the new level, as a regression when latency grew and
+    an improvement when it fell.
+
+    Validates: Requirements 8.1, 8.3
+
+    Args:
+        level: Latency before the shift
+        shift: Relative change of the latency
+        before: Runs before the shift
+        after: Runs after the shift
+        seed: Seed of the noise
+    """
+    rng = random.Random(seed)
+    runs = [synthetic_run(number, noisy(level if number < before else level * (1 + shift), 5, rng), {})
+            for number in range(before + after)]
+    points = detect_changes(runs)
+    # Property: one change point, where the shift happened, in the right direction
+    assert [(point.run, point.regression) for point in points] == [(f"run-{before:03d}", shift > 0)]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
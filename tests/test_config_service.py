@@ -0,0 +1,278 @@
+"""
+Tests for the hot-reloadable configuration service.
+
+These tests verify .env parsing and validation, atomic application to
+subscribers (with rollback when a consumer rejects a change), the local
+watch API and the git credential helper.
+"""
+
+import io
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from aicoding.config_service import (
+    PROBE_KEYS,
+    ConfigClient,
+    ConfigService,
+    credential_response,
+    main,
+    parse_env,
+    probe_consumer,
+    residency_consumer,
+    validate,
+)
+from aicoding.metrics import HttpProbe, OllamaProbe, Registry
+from aicoding.residency import GIB, ResidencyManager
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield Path(temp_dir)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+TOKEN_A = "ghp_" + "a" * 36
+TOKEN_B = "ghp_" + "b" * 36
+
+BASE = {
+    "GITHUB_TOKEN": TOKEN_A,
+    "LLM_MODEL": "ollama/deepseek-coder-v2:16b",
+    "LLM_BASE_URL": "http://ollama:11434",
+    "OLLAMA_HOST": "http://ollama:11434",
+}
+
+
+def write_env(path: Path, values: dict) -> None:
+    path.write_text("".join(f"{key}={value}\n" for key, value in values.items()))
+
+
+class Recorder:
+    """Subscriber remembering what it was given."""
+
+    def __init__(self, fail_on=None) -> None:
+        self.values = {}
+        self.calls = 0
+        self.fail_on = fail_on
+        self.event = threading.Event()
+
+    def __call__(self, change) -> None:
+        if self.fail_on and self.fail_on in change.changed and change.changed[self.fail_on][1]:
+            raise ValueError("cannot apply")
+        self.calls += 1
+        self.values = dict(change.values)
+        self.event.set()
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_parse_env_handles_compose_syntax() -> None:
+    """Comments, quotes, export prefixes and inline comments are parsed like docker-compose."""
+    text = ('# comment\n\nexport A=1\nB="two words"\nC=\'x # y\'\nD=plain # note\nE=\nA=3\n')
+    assert parse_env(text) == {"A": "3", "B": "two words", "C": "x # y", "D": "plain", "E": ""}
+    with pytest.raises(ValueError, match="line 1"):
+        parse_env("not a variable\n")
+
+
+def test_validation_follows_configuration_reference() -> None:
+    """The template validates; malformed documented values are reported."""
+    example = Path(__file__).resolve().parent.parent / ".env.example"
+    assert validate(parse_env(example.read_text())) == []
+
+    errors = validate(dict(BASE, GITHUB_TOKEN="ghp_short", LLM_MODEL="deepseek",
+                           OLLAMA_HOST="ollama:11434", LLM_NUM_CTX="lots", METRICS_PORT="70000"))
+    assert [error.split(":")[0].split("=")[0] for error in errors] == [
+        "GITHUB_TOKEN", "LLM_MODEL", "OLLAMA_HOST", "LLM_NUM_CTX", "METRICS_PORT"]
+    # Secrets are never echoed
+    assert "ghp_short" not in " ".join(errors)
+    assert validate({"GITHUB_TOKEN": TOKEN_A}) == [
+        "LLM_MODEL: required", "LLM_BASE_URL: required", "OLLAMA_HOST: required"]
+
+
+def test_changes_are_pushed_without_restart(temp_workspace) -> None:
+    """Editing the file reaches subscribers of the changed keys, with latencies reported."""
+    env = temp_workspace / ".env"
+    write_env(env, BASE)
+    with ConfigService(env, poll_interval=0.02).start(port=None) as service:
+        everything, token_only, ports = Recorder(), Recorder(), Recorder()
+        service.subscribe(everything, name="all")
+        service.subscribe(token_only, keys=["GITHUB_TOKEN"], name="git")
+        service.subscribe(ports, keys=["METRICS_PORT"], name="metrics")
+        assert everything.values["GITHUB_TOKEN"] == TOKEN_A
+        everything.event.clear()
+        token_only.event.clear()
+
+        write_env(env, dict(BASE, GITHUB_TOKEN=TOKEN_B, METRICS_PORT="9200"))
+        assert token_only.event.wait(5)
+        assert token_only.values["GITHUB_TOKEN"] == TOKEN_B
+        assert service.snapshot.version == 2
+        assert ports.values["METRICS_PORT"] == "9200"
+
+        report = service.reports[-1]
+        assert report.applied and report.changed == ["GITHUB_TOKEN", "METRICS_PORT"]
+        assert report.restart_required == ["METRICS_PORT"]
+        assert set(report.subscriber_seconds) == {"all", "git", "metrics"}
+        assert 0 < report.apply_seconds < 1
+        status = service.status()
+        assert status["version"] == 2 and status["apply_seconds_p95"] > 0
+
+
+def test_invalid_and_rejected_changes_are_not_applied(temp_workspace) -> None:
+    """A bad file or a consumer's veto leaves every subscriber on the previous values."""
+    env = temp_workspace / ".env"
+    write_env(env, BASE)
+    service = ConfigService(env)
+    service.reload()
+    first, vetoing, last = Recorder(), Recorder(fail_on="OLLAMA_MODEL"), Recorder()
+    for name, recorder in (("first", first), ("vetoing", vetoing), ("last", last)):
+        service.subscribe(recorder, name=name)
+
+    write_env(env, dict(BASE, OLLAMA_HOST="not a url"))
+    report = service.reload()
+    assert not report.applied and "OLLAMA_HOST" in report.errors[0]
+    assert service.snapshot.version == 1 and service.status()["errors"] == report.errors
+
+    write_env(env, dict(BASE, OLLAMA_MODEL="qwen2.5-coder:7b"))
+    report = service.reload()
+    assert report.errors == ["vetoing rejected the change: cannot apply"]
+    # first was updated, then rolled back; last never saw it
+    assert first.calls == 3 and "OLLAMA_MODEL" not in first.values
+    assert last.calls == 1
+    assert service.snapshot.get("OLLAMA_MODEL") is None
+
+    write_env(env, dict(BASE, GITHUB_TOKEN=TOKEN_B))
+    assert service.reload().applied
+    assert first.values == last.values == dict(service.snapshot.values)
+
+
+def test_other_processes_watch_over_http(temp_workspace) -> None:
+    """ConfigClient receives changes by long polling; secrets are never served."""
+    env = temp_workspace / ".env"
+    write_env(env, BASE)
+    with ConfigService(env, poll_interval=0.02).start(port=0) as service:
+        client = ConfigClient(service.url)
+        seen = Recorder()
+        client.watch(seen, keys=["OLLAMA_HOST"], poll_seconds=2)
+        assert seen.event.wait(5)
+        seen.event.clear()
+        write_env(env, dict(BASE, GITHUB_TOKEN=TOKEN_B, OLLAMA_HOST="http://10.0.0.5:11434"))
+        assert seen.event.wait(5)
+        assert seen.values["OLLAMA_HOST"] == "http://10.0.0.5:11434"
+        assert seen.values["GITHUB_TOKEN"] == "***"
+        assert client.get("OLLAMA_HOST") == "http://10.0.0.5:11434"
+        assert client.get("MISSING") is None
+        assert client.session.get(f"{service.url}/config/GITHUB_TOKEN").status_code == 403
+        listing = client.session.get(f"{service.url}/config").json()
+        assert listing["values"]["GITHUB_TOKEN"] == "***"
+        assert TOKEN_B not in client.session.get(f"{service.url}/watch", params={"timeout": 0}).text
+        assert client.session.get(f"{service.url}/watch", params={"version": "abc"}).status_code == 400
+        assert main(["--url", service.url, "get", "GITHUB_TOKEN"]) == 1
+        client.stop()
+
+
+def test_consumers_apply_to_probes_and_residency(temp_workspace) -> None:
+    """Health probes follow new addresses; the residency manager takes new limits."""
+    env = temp_workspace / ".env"
+    write_env(env, BASE)
+    service = ConfigService(env)
+    service.reload()
+    registry = Registry()
+    probes = [OllamaProbe(registry, "http://ollama:11434"),
+              HttpProbe(registry, "openhands_ui", "http://localhost:3000")]
+    manager = ResidencyManager("http://ollama:11434", meminfo_reader=dict)
+    service.subscribe(probe_consumer(probes), PROBE_KEYS, name="probes")
+    service.subscribe(residency_consumer(manager), name="residency")
+
+    write_env(env, dict(BASE, OLLAMA_HOST="http://10.0.0.5:11434/", OPENHANDS_URL="http://openhands:3000",
+                        MODEL_MEMORY_RESERVE_GB="4", MODEL_MEMORY_BUDGET_GB="12.5"))
+    assert service.reload().applied
+    assert probes[0].base_url == "http://10.0.0.5:11434"
+    assert probes[1].url == "http://openhands:3000"
+    assert manager.reserve_bytes == 4 * GIB and manager.budget_bytes == int(12.5 * GIB)
+
+
+def test_git_credential_helper(temp_workspace, monkeypatch, capsys) -> None:
+    """git gets the current token for github.com, read from the env file."""
+    assert credential_response({"host": "github.com"}, TOKEN_A) == {
+        "username": "x-access-token", "password": TOKEN_A}
+    assert credential_response({"host": "gitlab.com"}, TOKEN_A) == {}
+    assert credential_response({"host": "github.com"}, "your_github_personal_access_token_here") == {}
+
+    env = temp_workspace / ".env"
+    write_env(env, BASE)
+    monkeypatch.setattr("sys.stdin", io.StringIO("protocol=https\nhost=github.com\n\n"))
+    assert main(["credential", "get", "--env-file", str(env)]) == 0
+    assert capsys.readouterr().out == f"username=x-access-token\npassword={TOKEN_A}\n"
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+env_versions = st.lists(st.fixed_dictionaries({
+    "GITHUB_TOKEN": st.sampled_from([TOKEN_A, TOKEN_B, "ghp_bad"]),
+    "OLLAMA_HOST": st.sampled_from(["http://ollama:11434", "http://10.0.0.5:11434", "ollama"]),
+    "LLM_NUM_CTX": st.sampled_from(["4096", "8192", "-1"]),
+}), min_size=1, max_size=8)
+
+
+# Feature: self-hosted-ai-coding-platform, Property 18: Configuration Changes Apply Atomically
+@settings(max_examples=100, deadline=None)
+@given(versions=env_versions, veto_context=st.booleans())
+def test_configuration_changes_apply_atomically(versions, veto_context) -> None:
+    """
+    Property 18: Configuration Changes Apply Atomically
+
+    For any sequence of edits to .env, the applied snapshot should always be
+    the last edit that was valid and accepted by every consumer, and every
+    consumer should hold exactly the values of that snapshot.
+
+    Validates: Requirements 2.3, 8.3
+
+    Args:
+        versions: Successive file contents (some invalid)
+        veto_context: Whether one consumer refuses context size changes
+    """
+    temp_dir = Path(tempfile.mkdtemp())
+    try:
+        env = temp_dir / ".env"
+        write_env(env, BASE)
+        service = ConfigService(env)
+        service.reload()
+        consumers = [Recorder(), Recorder(fail_on="LLM_NUM_CTX" if veto_context else None), Recorder()]
+        for index, consumer in enumerate(consumers):
+            service.subscribe(consumer, name=f"consumer-{index}")
+
+        expected = dict(BASE)
+        for version in versions:
+            values = dict(BASE, **version)
+            write_env(env, values)
+            report = service.reload()
+            valid = not validate(values)
+            vetoed = veto_context and values.get("LLM_NUM_CTX") != expected.get("LLM_NUM_CTX")
+            # Property: only valid, accepted edits become current
+            assert report.applied == (valid and not vetoed and values != expected)
+            if valid and not vetoed:
+                expected = values
+            assert dict(service.snapshot.values) == expected
+            # Property: every consumer holds the current snapshot
+            for consumer in consumers:
+                assert consumer.values == expected
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
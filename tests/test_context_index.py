@@ -0,0 +1,314 @@
+"""
+Tests for the workspace code-context retrieval index.
+
+These tests verify that symbol-level chunking, incremental refresh and
+budgeted queries behave correctly on synthetic workspace projects.
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Generator
+from unittest import mock
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from aicoding.context_index import (
+    ContextIndex,
+    chunk_file,
+    estimate_tokens,
+    render_context,
+    tokenize,
+    whole_file_tokens,
+)
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace() -> Generator[Path, None, None]:
+    """Create a temporary workspace directory for testing."""
+    workspace = Path(tempfile.mkdtemp(prefix="test_workspace_"))
+    try:
+        yield workspace
+    finally:
+        # Cleanup
+        if workspace.exists():
+            shutil.rmtree(workspace, ignore_errors=True)
+
+
+PYTHON_MODULE = '''"""Configuration helpers."""
+
+import json
+
+
+def parse_config(path):
+    """Parse a JSON configuration file."""
+    with open(path) as handle:
+        return json.load(handle)
+
+
+class HttpClient:
+    def send_request(self, url):
+        return url
+
+
+def unrelated_math(a, b):
+    return a * b + 42
+'''
+
+JS_MODULE = '''import fs from "fs";
+
+export function renderTemplate(name) {
+  return fs.readFileSync(name, "utf-8");
+}
+
+export const fetchUsers = async () => {
+  return [];
+};
+'''
+
+
+def write_project(workspace: Path) -> Path:
+    """Create a small multi-language project inside the workspace."""
+    project = workspace / "demo-app"
+    (project / "src").mkdir(parents=True)
+    (project / "node_modules" / "lib").mkdir(parents=True)
+    (project / "src" / "config.py").write_text(PYTHON_MODULE)
+    (project / "src" / "templates.js").write_text(JS_MODULE)
+    (project / "README.md").write_text("# Demo\n\nIntro.\n\n## Setup\n\nRun the server.\n")
+    (project / "node_modules" / "lib" / "index.js").write_text("function parseConfig() {}\n")
+    return project
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_tokenize_splits_identifiers() -> None:
+    """Identifiers are indexed whole and by their snake/camel parts."""
+    terms = tokenize("parseConfigFile load_user_data")
+    assert "parseconfigfile" in terms
+    assert {"parse", "config", "file"} <= set(terms)
+    assert {"load", "user", "data"} <= set(terms)
+
+
+def test_python_chunks_follow_symbols() -> None:
+    """Python files are chunked at top-level definitions."""
+    chunks = chunk_file("config.py", PYTHON_MODULE)
+    symbols = [chunk.symbol for chunk in chunks]
+    assert "def parse_config" in symbols
+    assert "class HttpClient" in symbols
+    assert "def unrelated_math" in symbols
+    parse = next(c for c in chunks if c.symbol == "def parse_config")
+    assert parse.text.startswith("def parse_config")
+    assert "json.load" in parse.text
+
+
+def test_non_python_chunks_follow_definitions() -> None:
+    """JavaScript definitions and Markdown headings start new chunks."""
+    js_symbols = [c.symbol for c in chunk_file("templates.js", JS_MODULE)]
+    assert "renderTemplate" in js_symbols
+    assert "fetchUsers" in js_symbols
+    md_symbols = [c.symbol for c in chunk_file("README.md", "# Demo\n\ntext\n\n## Setup\n\nmore\n")]
+    assert md_symbols == ["Demo", "Setup"]
+
+
+def test_query_ranks_relevant_symbol_first(temp_workspace: Path) -> None:
+    """The chunk defining the queried symbol ranks first; ignored dirs are skipped."""
+    project = write_project(temp_workspace)
+    index = ContextIndex(project)
+    stats = index.refresh()
+
+    assert stats.added == 3
+    assert all("node_modules" not in path for path in index.files())
+
+    snippets = index.query("where do we parse the config file?", k=3)
+    assert snippets[0].symbol == "def parse_config"
+    assert snippets[0].path == os.path.join("src", "config.py")
+
+
+def test_query_expands_misspelled_terms(temp_workspace: Path) -> None:
+    """Terms missing from the vocabulary are matched through trigrams."""
+    project = write_project(temp_workspace)
+    index = ContextIndex(project)
+    index.refresh()
+
+    snippets = index.query("renderTemplte", k=1)
+    assert snippets and snippets[0].symbol == "renderTemplate"
+
+
+def test_refresh_is_incremental(temp_workspace: Path) -> None:
+    """Only changed files are re-indexed; deletions drop their chunks."""
+    project = write_project(temp_workspace)
+    index = ContextIndex(project)
+    index.refresh()
+
+    stats = index.refresh()
+    assert (stats.added, stats.updated, stats.removed) == (0, 0, 0)
+    assert stats.unchanged == 3
+
+    config = project / "src" / "config.py"
+    config.write_text(PYTHON_MODULE + "\n\ndef load_secrets():\n    return {}\n")
+    os.utime(config, ns=(1, 1))
+    (project / "src" / "templates.js").unlink()
+    stats = index.refresh()
+    assert (stats.added, stats.updated, stats.removed) == (0, 1, 1)
+    assert index.query("load_secrets", k=1)[0].symbol == "def load_secrets"
+    assert os.path.join("src", "templates.js") not in index.files()
+    assert all(s.path != os.path.join("src", "templates.js") for s in index.query("renderTemplate"))
+
+
+def test_update_paths_handles_changes_and_deletions(temp_workspace: Path) -> None:
+    """File-change notifications update only the named paths."""
+    project = write_project(temp_workspace)
+    index = ContextIndex(project)
+    index.refresh()
+
+    new_file = project / "src" / "auth.py"
+    new_file.write_text("def verify_token(token):\n    return token.startswith('ghp_')\n")
+    stats = index.update_paths([new_file, project / "README.md"])
+    assert stats.added == 1
+    assert stats.unchanged == 1
+
+    (project / "README.md").unlink()
+    stats = index.update_paths([Path("README.md")])
+    assert stats.removed == 1
+    assert "README.md" not in index.files()
+
+
+def test_update_paths_applies_scan_filters(temp_workspace: Path) -> None:
+    """Notifications index the same files as a scan, and drop files that turn binary."""
+    project = write_project(temp_workspace)
+    outside = temp_workspace / "outside.py"
+    outside.write_text("def leaked_secret():\n    pass\n")
+    index = ContextIndex(project)
+    index.refresh()
+
+    stats = index.update_paths([project / "node_modules" / "lib" / "index.js", outside, Path("../outside.py")])
+    assert (stats.added, stats.updated, stats.removed, stats.unchanged) == (0, 0, 0, 0)
+    assert not index.query("leaked_secret")
+    assert not any(path.startswith("node_modules") for path in index.files())
+
+    config = project / "src" / "config.py"
+    config.write_bytes(b"\x00\x01binary")
+    assert index.update_paths([config]).removed == 1
+    assert os.path.join("src", "config.py") not in index.files()
+    templates = project / "src" / "templates.js"
+    templates.write_bytes(b"\x00\x02binary")
+    assert index.refresh().removed == 1
+    assert not index.query("renderTemplate")
+
+
+def test_refresh_does_not_reread_unchanged_binary_files(temp_workspace: Path) -> None:
+    """Binary files are read again only when their size or mtime changed, also after a reload."""
+    project = write_project(temp_workspace)
+    logo = project / "logo.png"
+    logo.write_bytes(b"\x89PNG\x00" * 100)
+    index = ContextIndex(project)
+    assert index.refresh().added == 3
+
+    read_bytes = Path.read_bytes
+    with mock.patch.object(Path, "read_bytes", autospec=True, side_effect=read_bytes) as reads:
+        assert index.refresh().unchanged == 4
+        index.save(temp_workspace / "index.json")
+        assert ContextIndex.load(temp_workspace / "index.json").refresh().unchanged == 4
+        assert reads.call_count == 0
+
+        logo.write_bytes(b"\x89PNG\x00" * 200)
+        index.refresh()
+        assert [call.args[0].name for call in reads.call_args_list] == ["logo.png"]
+    assert "logo.png" not in index.files()
+
+
+def test_save_and_load_round_trip(temp_workspace: Path) -> None:
+    """A persisted index restores its chunks and skips unchanged files."""
+    project = write_project(temp_workspace)
+    index = ContextIndex(project)
+    index.refresh()
+    index_path = temp_workspace / "index.json"
+    index.save(index_path)
+
+    restored = ContextIndex.load(index_path)
+    assert len(restored) == len(index)
+    stats = restored.refresh()
+    assert (stats.added, stats.updated, stats.removed) == (0, 0, 0)
+    assert restored.query("parse config", k=1)[0].symbol == "def parse_config"
+
+
+def test_retrieval_reduces_prompt_size(temp_workspace: Path) -> None:
+    """Retrieved context is smaller than sending the matching files whole."""
+    project = write_project(temp_workspace)
+    index = ContextIndex(project)
+    index.refresh()
+
+    snippets = index.query("parse config", k=1)
+    rendered = render_context(snippets)
+    assert "src/config.py" in rendered.replace(os.sep, "/")
+    assert sum(s.tokens for s in snippets) < whole_file_tokens(index, snippets)
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+identifier_words = st.text(alphabet="abcdefghijklmnopqrstuvwxyz", min_size=3, max_size=10)
+
+
+# Feature: self-hosted-ai-coding-platform, Property 7: Context Retrieval Respects Token Budget
+@settings(max_examples=100, deadline=None)
+@given(
+    names=st.lists(identifier_words, min_size=1, max_size=15, unique=True),
+    query=st.lists(identifier_words, min_size=1, max_size=4).map(" ".join),
+    budget=st.integers(min_value=0, max_value=400),
+    k=st.integers(min_value=1, max_value=10),
+)
+def test_query_respects_token_budget(names, query, budget, k) -> None:
+    """
+    Property 7: Context Retrieval Respects Token Budget
+
+    For any indexed project and any query, the snippets returned by the index
+    should never exceed k results or the requested token budget, and every
+    snippet should be an exact excerpt of an indexed file.
+
+    Validates: Requirements 3.4
+
+    Args:
+        names: Function names to generate in the project
+        query: Free-text query
+        budget: Token budget for the returned snippets
+        k: Maximum number of snippets
+    """
+    temp_workspace = Path(tempfile.mkdtemp(prefix="test_workspace_"))
+
+    try:
+        source = "\n\n".join(
+            f"def {name}(value):\n    return value + {i}  # {' '.join(names[:i])}\n"
+            for i, name in enumerate(names)
+        )
+        (temp_workspace / "module.py").write_text(source)
+
+        index = ContextIndex(temp_workspace)
+        index.refresh()
+        snippets = index.query(query, k=k, token_budget=budget)
+
+        # Property: result count and budget are respected
+        assert len(snippets) <= k
+        assert sum(estimate_tokens(s.text) for s in snippets) <= budget
+
+        # Property: snippets are exact excerpts of the indexed file
+        for snippet in snippets:
+            assert snippet.text in source
+
+    finally:
+        # Cleanup
+        if temp_workspace.exists():
+            shutil.rmtree(temp_workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
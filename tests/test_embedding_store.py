@@ -0,0 +1,234 @@
+"""
+Tests for the workspace embedding cache and vector index.
+
+All embeddings come from the in-process FakeOllama server, which returns
+deterministic vectors, so these tests run fully offline.
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Generator
+
+import numpy as np
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from aicoding.embedding_store import EmbeddingStore, OllamaEmbedder, main
+from aicoding.fake_ollama import FakeOllama, deterministic_embedding
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace() -> Generator[Path, None, None]:
+    """Create a temporary workspace directory for testing."""
+    workspace = Path(tempfile.mkdtemp(prefix="test_workspace_"))
+    try:
+        yield workspace
+    finally:
+        # Cleanup
+        if workspace.exists():
+            shutil.rmtree(workspace, ignore_errors=True)
+
+
+@pytest.fixture(scope="module")
+def fake_ollama() -> Generator[FakeOllama, None, None]:
+    """Run a fake Ollama embedding server for the whole module."""
+    with FakeOllama(embedding_dim=32) as server:
+        yield server
+
+
+def write_files(project: Path) -> None:
+    """Create a small project with distinct topics per file."""
+    (project / "src").mkdir(parents=True, exist_ok=True)
+    (project / "src" / "http.py").write_text("http request retry backoff timeout session")
+    (project / "src" / "db.py").write_text("database query transaction commit rollback")
+    (project / "src" / "ui.js").write_text("render button click component layout")
+    (project / "copy_of_db.py").write_text("database query transaction commit rollback")
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_embedder_batches_requests(fake_ollama: FakeOllama) -> None:
+    """Embeddings are requested in batches from /api/embed."""
+    embedder = OllamaEmbedder(fake_ollama.url, batch_size=2)
+    vectors = embedder.embed(["a", "b", "c"])
+    assert vectors.shape == (3, 32)
+    assert embedder.requests_sent == 2
+    np.testing.assert_allclose(vectors[0], deterministic_embedding("a", 32), rtol=1e-6)
+
+
+def test_unchanged_files_are_never_reembedded(temp_workspace: Path, fake_ollama: FakeOllama) -> None:
+    """Only new content hashes reach the embedding server."""
+    project = temp_workspace / "project"
+    write_files(project)
+    store = EmbeddingStore(temp_workspace / "store")
+    embedder = OllamaEmbedder(fake_ollama.url)
+
+    stats = store.sync_directory(project, embedder)
+    # copy_of_db.py has the same content as src/db.py
+    assert (stats.embedded, stats.reused) == (3, 1)
+
+    stats = store.sync_directory(project, embedder)
+    assert (stats.embedded, stats.reused) == (0, 4)
+
+    (project / "src" / "ui.js").write_text("render modal dialog component")
+    stats = store.sync_directory(project, embedder)
+    assert (stats.embedded, stats.reused) == (1, 3)
+
+
+def test_store_persists_across_instances(temp_workspace: Path, fake_ollama: FakeOllama) -> None:
+    """A reopened store reuses its memory-mapped vectors."""
+    project = temp_workspace / "project"
+    write_files(project)
+    embedder = OllamaEmbedder(fake_ollama.url)
+    EmbeddingStore(temp_workspace / "store").sync_directory(project, embedder)
+
+    reopened = EmbeddingStore(temp_workspace / "store")
+    assert reopened.count == 3
+    assert isinstance(reopened.matrix(), np.memmap)
+    assert reopened.sync_directory(project, embedder).embedded == 0
+
+    vectors_bytes = (temp_workspace / "store" / "vectors.bin").stat().st_size
+    assert vectors_bytes == 3 * 32 * np.dtype("float16").itemsize
+
+
+def test_exact_search_finds_matching_file(temp_workspace: Path, fake_ollama: FakeOllama) -> None:
+    """Exact search ranks the file sharing the query's words first."""
+    project = temp_workspace / "project"
+    write_files(project)
+    store = EmbeddingStore(temp_workspace / "store")
+    embedder = OllamaEmbedder(fake_ollama.url)
+    store.sync_directory(project, embedder)
+
+    results = store.search_exact(embedder.embed(["http retry timeout"])[0], k=1)
+    assert results[0].path == os.path.join("src", "http.py")
+
+    # Both paths with identical content are returned
+    results = store.search_exact(embedder.embed(["database transaction"])[0], k=2)
+    assert {r.path for r in results} == {"copy_of_db.py", os.path.join("src", "db.py")}
+
+
+def test_deleted_files_drop_out_and_compact(temp_workspace: Path, fake_ollama: FakeOllama) -> None:
+    """Removed files are no longer returned and compaction reclaims their rows."""
+    project = temp_workspace / "project"
+    write_files(project)
+    store = EmbeddingStore(temp_workspace / "store")
+    embedder = OllamaEmbedder(fake_ollama.url)
+    store.sync_directory(project, embedder)
+
+    (project / "src" / "ui.js").unlink()
+    assert store.sync_directory(project, embedder).removed == 1
+    query = embedder.embed(["render button component"])[0]
+    assert all(r.path != os.path.join("src", "ui.js") for r in store.search_exact(query, k=5))
+
+    assert store.compact() == 1
+    assert store.count == 2
+    assert EmbeddingStore(temp_workspace / "store").count == 2
+
+
+def test_files_turning_binary_drop_out(temp_workspace: Path, fake_ollama: FakeOllama, capsys) -> None:
+    """A file that is no longer text loses its entry; the documented CLI order works."""
+    project = temp_workspace / "project"
+    write_files(project)
+    store_dir = temp_workspace / "store"
+    assert main(["--store", str(store_dir), "--base-url", fake_ollama.url, "sync", str(project)]) == 0
+    assert "Embedded 3" in capsys.readouterr().out
+
+    (project / "src" / "ui.js").write_bytes(b"\x00\x01compiled")
+    store = EmbeddingStore(store_dir)
+    assert store.sync_directory(project, OllamaEmbedder(fake_ollama.url)).removed == 1
+    query = OllamaEmbedder(fake_ollama.url).embed(["render button component"])[0]
+    assert all(r.path != os.path.join("src", "ui.js") for r in store.search_exact(query, k=5))
+
+
+def test_ivf_search_matches_exact_with_full_probe(temp_workspace: Path) -> None:
+    """Probing every IVF list gives the same results as exact search."""
+    rng = np.random.default_rng(3)
+
+    class RandomEmbedder:
+        def embed(self, texts):
+            return rng.normal(size=(len(texts), 16)).astype(np.float32)
+
+    store = EmbeddingStore(temp_workspace / "store")
+    store.sync_texts({f"doc{i}": f"text {i}" for i in range(400)}, RandomEmbedder())
+    n_lists = store.build_ivf(n_lists=16)
+
+    query = rng.normal(size=16)
+    exact = store.search_exact(query, k=10)
+    approx = store.search_approx(query, k=10, n_probe=n_lists)
+    assert [r.path for r in approx] == [r.path for r in exact]
+
+    # Rows appended after training are assigned to a list and stay searchable
+    store.sync_texts({"late": "late text"}, RandomEmbedder(), prune=False)
+    late_vector = store.vector(store._paths["late"]["hash"])
+    assert store.search_approx(late_vector, k=1, n_probe=1)[0].path == "late"
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 8: Embedding Cache Never Re-Embeds Known Content
+@settings(max_examples=100, deadline=None)
+@given(
+    first=st.dictionaries(st.text("abcdef", min_size=1, max_size=6), st.text("xyz ", max_size=20),
+                          max_size=8),
+    second=st.dictionaries(st.text("abcdef", min_size=1, max_size=6), st.text("xyz ", max_size=20),
+                           max_size=8),
+)
+def test_sync_embeds_only_unseen_content(first, second) -> None:
+    """
+    Property 8: Embedding Cache Never Re-Embeds Known Content
+
+    For any two successive sets of texts, the second sync should embed
+    exactly the distinct texts that were not present in any earlier sync,
+    and every current key should map to a stored vector.
+
+    Validates: Requirements 2.3
+
+    Args:
+        first: Initial key -> text mapping
+        second: Later key -> text mapping
+    """
+    temp_workspace = Path(tempfile.mkdtemp(prefix="test_workspace_"))
+
+    class CountingEmbedder:
+        def __init__(self):
+            self.seen = []
+
+        def embed(self, texts):
+            self.seen.extend(texts)
+            return np.array([deterministic_embedding(t, 8) for t in texts], dtype=np.float32)
+
+    try:
+        store = EmbeddingStore(temp_workspace / "store")
+        embedder = CountingEmbedder()
+        store.sync_texts(first, embedder)
+        assert sorted(embedder.seen) == sorted(set(first.values()))
+
+        embedder.seen = []
+        store.sync_texts(second, embedder)
+
+        # Property: only content never seen before is embedded, once
+        assert sorted(embedder.seen) == sorted(set(second.values()) - set(first.values()))
+
+        # Property: every current key resolves to a vector
+        for key in second:
+            assert key in store._paths
+            assert store._paths[key]["hash"] in store
+
+    finally:
+        # Cleanup
+        if temp_workspace.exists():
+            shutil.rmtree(temp_workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -18,6 +18,8 @@ from typing import Generator
 import pytest
 from hypothesis import given, settings, strategies as st
 
+from strategies import relative_paths
+
 
 # ============================================================================
 # Test Fixtures and Helpers
@@ -66,38 +68,9 @@ def modify_file_content(file_path: Path, new_content: str) -> None:
 # Hypothesis Strategies
 # ============================================================================
 
-# Valid file path components (safe characters for file/directory names)
-safe_path_component = st.text(
-    alphabet=st.characters(
-        whitelist_categories=("Lu", "Ll", "Nd"),
-        whitelist_characters="-_."
-    ),
-    min_size=1,
-    max_size=30
-).filter(
-    lambda x: x and 
-    not x.startswith('.') and 
-    not x.endswith('.') and
-    x not in ['.', '..'] and
-    '/' not in x and
-    '\\' not in x
-)
-
-# Generate valid relative file paths (1-3 levels deep)
-@st.composite
-def valid_relative_paths(draw):
-    """Generate valid relative file paths for testing."""
-    depth = draw(st.integers(min_value=1, max_value=3))
-    components = [draw(safe_path_component) for _ in range(depth)]
-    
-    # Last component is the filename, ensure it has an extension
-    filename = components[-1]
-    if '.' not in filename:
-        extension = draw(st.sampled_from(['txt', 'py', 'js', 'md', 'json']))
-        filename = f"{filename}.{extension}"
-        components[-1] = filename
-    
-    return Path(*components)
+# Valid relative file paths (1-3 levels deep, occasionally deeper), built
+# without filtering - see tests/strategies.py
+valid_relative_paths = relative_paths
 
 
 # File content strategy
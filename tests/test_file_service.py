@@ -0,0 +1,348 @@
+"""
+Tests for the workspace file service.
+
+These tests verify listing with ignore rules, batched and line-range reads,
+the process-pool search against an in-process reference, the invariants of
+tests/test_file_operations.py for writes and edits, unified diff and
+line-range edits with conflict reports, and the MCP tool interface.
+"""
+
+import difflib
+import json
+import os
+import re
+import shutil
+import stat
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from aicoding import file_service
+from aicoding.file_service import EditConflict, FileService, FileServiceError, handle_message
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield Path(temp_dir)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def write_tree(root: Path, files: dict) -> None:
+    for rel_path, content in files.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content.encode() if isinstance(content, str) else content)
+
+
+def reference_lines(text: str, start: int, end) -> str:
+    """Lines as an editor counts them: each ends with a newline, the last one may not."""
+    lines = text.split("\n")
+    lines = [line + "\n" for line in lines[:-1]] + ([lines[-1]] if lines[-1] else [])
+    return "".join(lines[start - 1:end])
+
+
+def unified_diff(old: str, new: str, path: str) -> str:
+    """A git-style diff, with the markers difflib leaves out for a last line without newline."""
+    lines = difflib.unified_diff(old.splitlines(keepends=True), new.splitlines(keepends=True),
+                                 f"a/{path}", f"b/{path}")
+    return "".join(line if line.endswith("\n") else line + "\n\\ No newline at end of file\n"
+                   for line in lines)
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_list_applies_ignore_rules(temp_workspace) -> None:
+    write_tree(temp_workspace, {
+        ".gitignore": "*.log\n/generated/\ncache/\n!keep.log\n",
+        "src/app.py": "x", "src/app.log": "x", "src/cache/blob": "x",
+        "generated/out.py": "x", "lib/generated/kept.py": "x",
+        "node_modules/pkg/index.js": "x", ".git/HEAD": "x",
+    })
+    with FileService(temp_workspace) as service:
+        files = [info.path for info in service.list() if not info.is_dir]
+        assert files == [".gitignore", "lib/generated/kept.py", "src/app.py"]
+        assert [info.path for info in service.list("src", max_depth=1)] == ["src/app.py"]
+        assert [info.path for info in service.list(glob="*.py") if not info.is_dir] == \
+            ["lib/generated/kept.py", "src/app.py"]
+
+
+def test_paths_outside_the_root_are_rejected(temp_workspace) -> None:
+    (temp_workspace / "project").mkdir()
+    os.symlink("/etc", temp_workspace / "project" / "escape")
+    with FileService(temp_workspace / "project") as service:
+        for path in ("../outside.txt", "escape/passwd", "/etc/passwd"):
+            with pytest.raises(FileServiceError):
+                service.resolve(path)
+        assert service.read_many(["../x"])[0].error is not None
+
+
+def test_read_many_reports_per_file(temp_workspace) -> None:
+    write_tree(temp_workspace, {f"f{n}.txt": f"content {n}" for n in range(10)})
+    with FileService(temp_workspace) as service:
+        results = service.read_many([f"f{n}.txt" for n in range(10)] + ["missing.txt"])
+        assert [result.content for result in results[:10]] == [f"content {n}" for n in range(10)]
+        assert results[10].content is None and "missing.txt" in results[10].error
+        truncated = service.read_many(["f1.txt"], max_bytes=4)[0]
+        assert truncated.content == "cont" and truncated.truncated
+
+
+def test_read_lines_of_large_file_through_mmap(temp_workspace) -> None:
+    text = "".join(f"line {n} {'x' * (n % 50)}\n" for n in range(1, 200_001))
+    (temp_workspace / "big.log").write_text(text)
+    with FileService(temp_workspace, mmap_threshold=1024) as service:
+        for start, end in ((1, 3), (150_000, 150_010), (199_999, None), (250_000, 250_001)):
+            result = service.read_lines("big.log", start, end)
+            assert result.text == reference_lines(text, start, end)
+        assert result.count == 0 and result.eof
+        assert service.read_lines("big.log", 10, 10).text.startswith("line 10 ")
+    with pytest.raises(FileServiceError):
+        FileService(temp_workspace).read_lines("big.log", 5, 4)
+
+
+def test_create_and_write_keep_structure_and_mode(temp_workspace) -> None:
+    with FileService(temp_workspace) as service:
+        service.create("a/b/c/new.txt", "hello")
+        assert (temp_workspace / "a/b/c/new.txt").read_text() == "hello"
+        target = temp_workspace / "a/b/c/new.txt"
+        os.chmod(target, stat.S_IRUSR | stat.S_IWUSR | stat.S_IXUSR | stat.S_IRGRP)
+        before = target.stat().st_mode
+        service.write("a/b/c/new.txt", "changed")
+        assert target.read_text() == "changed"
+        assert target.stat().st_mode == before
+        assert not [name for name in os.listdir(target.parent) if name.startswith(".new.txt.")]
+
+
+def test_search_process_pool_matches_inline(temp_workspace) -> None:
+    files = {f"pkg{n % 7}/module_{n}.py": "".join(
+        f"def handler_{n}_{k}(value):\n    return value + {k}\n" for k in range(30)) for n in range(60)}
+    files["data.bin"] = b"\0def handler_binary():\n"
+    files["node_modules/x.py"] = "def handler_hidden():\n"
+    write_tree(temp_workspace, files)
+    with FileService(temp_workspace, search_workers=2, search_inline_bytes=0) as pooled, \
+            FileService(temp_workspace, search_workers=1) as inline, \
+            mock.patch.object(file_service, "SEARCH_BATCH_FILES", 8):
+        pattern = r"^def handler_\d+_(1|2)\d\("
+        pooled_matches = pooled.search(pattern, max_results=10_000)
+        assert pooled_matches == inline.search(pattern, max_results=10_000)
+        assert pooled.search(pattern, max_results=500) == pooled_matches[:500]
+        assert len(pooled_matches) == 60 * 20
+        assert pooled_matches[0].path == "pkg0/module_0.py" and pooled_matches[0].line == 21
+        assert pooled_matches[0].text == "def handler_0_10(value):"
+        assert len(pooled.search("return", glob="module_1*.py", max_results=5)) == 5
+        assert pooled.search("HANDLER_0_1\\(", ignore_case=True)[0].line == 3
+        with pytest.raises(FileServiceError):
+            pooled.search("(unclosed")
+
+
+def test_apply_patch_keeps_mode_and_creates_files(temp_workspace) -> None:
+    old = "".join(f"line {n}\n" for n in range(1, 41)) + "last"
+    new = old.replace("line 3\n", "line three\n").replace("line 30\n", "").replace("last", "last!\n")
+    write_tree(temp_workspace, {"src/app.py": old})
+    target = temp_workspace / "src/app.py"
+    os.chmod(target, 0o751)
+    diff = "diff --git a/src/app.py b/src/app.py\nindex 1..2 100644\n" + unified_diff(old, new, "src/app.py")
+    diff += "--- /dev/null\n+++ b/src/new.py\n@@ -0,0 +1,2 @@\n+import os\n+print(os.sep)\n"
+    with FileService(temp_workspace) as service:
+        results = service.apply_patch(diff)
+    assert target.read_text() == new
+    assert stat.S_IMODE(target.stat().st_mode) == 0o751
+    assert [(result.path, result.hunks, result.added, result.removed) for result in results] == \
+        [("src/app.py", 3, 2, 3), ("src/new.py", 1, 2, 0)]
+    assert (temp_workspace / "src/new.py").read_text() == "import os\nprint(os.sep)\n"
+    assert sorted(os.listdir(temp_workspace / "src")) == ["app.py", "new.py"]
+
+
+def test_stale_patch_reports_conflict_and_changes_nothing(temp_workspace) -> None:
+    write_tree(temp_workspace, {"a.txt": "one\ntwo\nthree\n", "b.txt": "alpha\nbeta\ngamma\n"})
+    diff = unified_diff("one\ntwo\nthree\n", "one\n2\nthree\n", "a.txt") + \
+        unified_diff("alpha\nBETA\ngamma\n", "alpha\nb\ngamma\n", "b.txt")
+    with FileService(temp_workspace) as service:
+        with pytest.raises(EditConflict) as raised:
+            service.apply_patch(diff)
+        [conflict] = raised.value.conflicts
+        assert (conflict.path, conflict.hunk, conflict.line) == ("b.txt", 1, 2)
+        assert (conflict.expected, conflict.actual) == ("BETA\n", "beta\n")
+        assert "b.txt:2: hunk 1 expected 'BETA\\n', found 'beta\\n'" in str(raised.value)
+        assert (temp_workspace / "a.txt").read_text() == "one\ntwo\nthree\n"
+        assert sorted(os.listdir(temp_workspace)) == ["a.txt", "b.txt"]
+
+        response = handle_message(service, {"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {
+            "name": "apply_patch", "arguments": {"diff": diff}}})
+        assert response["result"]["isError"]
+        assert json.loads(response["result"]["content"][0]["text"])["conflicts"][0]["line"] == 2
+        with pytest.raises(FileServiceError):
+            service.apply_patch("--- a/a.txt\n+++ b/a.txt\n@@ -1,2 +1,2 @@\n-one\n+1\n")
+
+
+def test_patch_changed_while_editing_changes_nothing(temp_workspace) -> None:
+    write_tree(temp_workspace, {"a.txt": "one\ntwo\n", "b.txt": "alpha\nbeta\n"})
+    diff = unified_diff("one\ntwo\n", "one\n2\n", "a.txt") + unified_diff("alpha\nbeta\n", "alpha\nb\n", "b.txt")
+    with FileService(temp_workspace) as service:
+        prepare = service._prepare_edit
+
+        def prepare_then_touch(path, hunks):
+            prepared = prepare(path, hunks)
+            if path == "b.txt":
+                (temp_workspace / "b.txt").write_text("alpha\nbeta\nappended by someone else\n")
+            return prepared
+
+        with mock.patch.object(service, "_prepare_edit", side_effect=prepare_then_touch):
+            with pytest.raises(FileServiceError, match="b.txt: changed while being edited"):
+                service.apply_patch(diff)
+    assert (temp_workspace / "a.txt").read_text() == "one\ntwo\n"
+    assert sorted(os.listdir(temp_workspace)) == ["a.txt", "b.txt"]
+
+
+def test_created_files_follow_the_umask_without_changing_it(temp_workspace) -> None:
+    with FileService(temp_workspace) as service, mock.patch.object(os, "umask", side_effect=AssertionError):
+        service.create("new.txt", "hello")
+    assert stat.S_IMODE((temp_workspace / "new.txt").stat().st_mode) == 0o666 & ~file_service._read_umask()
+
+
+def test_replace_lines_copies_unchanged_bytes(temp_workspace) -> None:
+    text = "".join(f"line {n}\n" for n in range(1, 200_001))
+    target = temp_workspace / "generated.py"
+    target.write_text(text)
+    with FileService(temp_workspace, mmap_threshold=1024) as service:
+        result = service.replace_lines("generated.py", 150_000, 150_001, "changed",
+                                       expected="line 150000\nline 150001\n")
+        lines = text.splitlines(keepends=True)
+        lines[149_999:150_001] = ["changed\n"]
+        assert target.read_text() == "".join(lines)
+        # Only the new line passed through Python
+        assert result.written == len("changed\n")
+        assert result.copied == len(text) - len("line 150000\nline 150001\n")
+
+        with pytest.raises(EditConflict) as raised:
+            service.replace_lines("generated.py", 150_000, 150_000, "again", expected="line 150000\n")
+        assert raised.value.conflicts[0].actual == "changed\n"
+        service.replace_lines("generated.py", 1, 0, "# header")
+        assert target.read_text().startswith("# header\nline 1\n")
+        with pytest.raises(EditConflict):
+            service.replace_lines("generated.py", 200_002, 200_002, "past the end")
+        # 200,000 lines again: two became one, then the header
+        service.replace_lines("generated.py", 200_001, 200_000, "appended\n")
+        assert target.read_text().endswith("line 200000\nappended\n")
+
+
+def test_mcp_tools(temp_workspace) -> None:
+    write_tree(temp_workspace, {"src/a.py": "import os\nprint(1)\n", "src/b.py": "import sys\n"})
+    with FileService(temp_workspace) as service:
+        tools = handle_message(service, {"jsonrpc": "2.0", "id": 1, "method": "tools/list"})
+        assert {tool["name"] for tool in tools["result"]["tools"]} >= {"read_files", "search", "read_lines"}
+
+        def call(name, **arguments):
+            response = handle_message(service, {"jsonrpc": "2.0", "id": 2, "method": "tools/call",
+                                                "params": {"name": name, "arguments": arguments}})
+            return response["result"]
+
+        result = call("read_files", paths=["src/a.py", "src/b.py"])
+        assert [entry["content"] for entry in json.loads(result["content"][0]["text"])] == \
+            ["import os\nprint(1)\n", "import sys\n"]
+        matches = json.loads(call("search", pattern="^import")["content"][0]["text"])
+        assert [(m["path"], m["line"]) for m in matches] == [("src/a.py", 1), ("src/b.py", 1)]
+        assert call("read_lines", path="../etc/passwd")["isError"]
+        edited = json.loads(call("replace_lines", path="src/b.py", start=1, end=1, content="import re",
+                                 expected="import sys\n")["content"][0]["text"])
+        assert edited["removed"] == 1 and (temp_workspace / "src/b.py").read_text() == "import re\n"
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 23: Line Range Reads Match The File
+@settings(max_examples=100, deadline=None)
+@given(lines=st.lists(st.text(alphabet=st.characters(blacklist_categories=("Cs",), blacklist_characters="\n\r"),
+                              max_size=40), max_size=300),
+       trailing_newline=st.booleans(),
+       ranges=st.lists(st.tuples(st.integers(min_value=1, max_value=320), st.integers(min_value=0, max_value=50),
+                                 st.booleans()), min_size=1, max_size=5))
+def test_line_range_reads_match_the_file(lines, trailing_newline, ranges) -> None:
+    """
+    Property 23: Line Range Reads Match The File
+
+    For any file content and any sequence of line ranges, reading a range
+    (through mmap, with checkpoints reused between reads) should return
+    exactly those lines of the file, as an editor numbers them.
+
+    Validates: Requirements 4.1, 4.2
+
+    Args:
+        lines: Line contents
+        trailing_newline: Whether the last line ends with a newline
+        ranges: (start, length, to end of file) triples
+    """
+    text = "\n".join(lines) + ("\n" if trailing_newline and lines else "")
+    temp_dir = Path(tempfile.mkdtemp())
+    try:
+        (temp_dir / "file.txt").write_text(text, encoding="utf-8", newline="")
+        # Small chunks, so reads cross many checkpoints
+        with FileService(temp_dir, mmap_threshold=1) as service, \
+                mock.patch.object(file_service, "LINE_CHUNK_BYTES", 16):
+            for start, length, to_end in ranges:
+                end = None if to_end else start + length
+                result = service.read_lines("file.txt", start, end)
+                # Property: the same lines as splitting the file
+                assert result.text == reference_lines(text, start, end)
+                assert result.count == len(re.findall(r"[^\n]*\n|[^\n]+$", result.text))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+# Feature: self-hosted-ai-coding-platform, Property 24: Applying A Diff Reproduces The New File
+@settings(max_examples=100, deadline=None)
+@given(old=st.lists(st.sampled_from(["a", "b", "c", "", "  d", "e\r"]), max_size=60),
+       edits=st.lists(st.tuples(st.integers(min_value=0, max_value=60), st.integers(min_value=0, max_value=3),
+                                st.lists(st.sampled_from(["x", "y", "", "a"]), max_size=3)), max_size=6),
+       old_newline=st.booleans(), new_newline=st.booleans(), large=st.booleans())
+def test_applying_a_diff_reproduces_the_new_file(old, edits, old_newline, new_newline, large) -> None:
+    """
+    Property 24: Applying A Diff Reproduces The New File
+
+    For any file and any changed version of it, applying the unified diff
+    between the two should leave exactly the changed version, whether the
+    file is edited in memory or through mmap and kernel copies.
+
+    Validates: Requirements 4.2, 4.3
+
+    Args:
+        old: Lines of the original file
+        edits: (position, lines removed, lines inserted) changes
+        old_newline: Whether the original ends with a newline
+        new_newline: Whether the changed version ends with a newline
+        large: Edit through mmap (tiny threshold) instead of in memory
+    """
+    new = list(old)
+    for position, removed, inserted in edits:
+        position = min(position, len(new))
+        new[position:position + removed] = inserted
+    old_text = "\n".join(old) + ("\n" if old_newline and old else "")
+    new_text = "\n".join(new) + ("\n" if new_newline and new else "")
+    temp_dir = Path(tempfile.mkdtemp())
+    try:
+        (temp_dir / "file.txt").write_text(old_text, encoding="utf-8", newline="")
+        with FileService(temp_dir, mmap_threshold=1 if large else 1 << 20) as service, \
+                mock.patch.object(file_service, "LINE_CHUNK_BYTES", 16):
+            diff = unified_diff(old_text, new_text, "file.txt")
+            if diff:
+                service.apply_patch(diff)
+        # Property: the file is now the changed version, byte for byte
+        assert (temp_dir / "file.txt").read_bytes() == new_text.encode("utf-8")
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
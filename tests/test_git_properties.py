@@ -15,6 +15,8 @@ import git
 import pytest
 from hypothesis import given, settings, strategies as st
 
+from strategies import commit_messages, project_names
+
 
 # ============================================================================
 # Test Fixtures and Helpers
@@ -83,15 +85,9 @@ def has_required_git_files(repo_path: Path) -> bool:
 # ============================================================================
 
 # Valid project name strategy
-# Project names should be alphanumeric with hyphens/underscores
-valid_project_names = st.text(
-    alphabet=st.characters(
-        whitelist_categories=("Lu", "Ll", "Nd"),
-        whitelist_characters="-_"
-    ),
-    min_size=1,
-    max_size=50
-).filter(lambda x: x and not x.startswith(("-", "_")) and not x.endswith(("-", "_")))
+# Project names should be alphanumeric with hyphens/underscores, starting and
+# ending with a letter or digit (built without filtering, see tests/strategies.py)
+valid_project_names = project_names()
 
 
 # ============================================================================
@@ -259,18 +255,7 @@ file_contents = st.text(
 
 # Valid commit message strategy
 # Messages should be descriptive with at least 2 words
-# Build messages from words to avoid excessive filtering
-word_strategy = st.text(
-    alphabet=st.characters(whitelist_categories=("Lu", "Ll", "Nd")),
-    min_size=1,
-    max_size=20
-).filter(lambda x: len(x.strip()) > 0)
-
-valid_commit_messages = st.lists(
-    word_strategy,
-    min_size=2,
-    max_size=10
-).map(lambda words: " ".join(words))
+valid_commit_messages = commit_messages(min_words=2, max_words=10)
 
 
 # Feature: self-hosted-ai-coding-platform, Property 4: Commit Message Non-Empty
@@ -11,6 +11,9 @@ from hypothesis import given, settings, strategies as st
 from typing import List, Tuple
 from urllib.parse import urlparse
 
+# Live requests are recorded and replayed from tests/cassettes (see replay.py)
+pytestmark = pytest.mark.cassette
+
 
 # ============================================================================
 # Configuration
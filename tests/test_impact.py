@@ -0,0 +1,184 @@
+"""
+Tests for the test impact analysis plugin.
+
+These tests run small pytest sessions with pytester and verify that the
+second run only selects tests affected by a change, and that failed, new
+and externally dependent tests always run.
+"""
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from impact import selection_reason
+
+pytest_plugins = ["pytester"]
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def project(pytester):
+    """A small suite with a data file, a helper module and a fixture."""
+    pytester.makeini("[pytest]\nimpact_full_run_hours = 24\n")
+    pytester.makeconftest("""
+        import pytest
+
+        @pytest.fixture
+        def greeting():
+            return "hello"
+    """)
+    pytester.makepyfile(helper="def double(x):\n    return 2 * x\n")
+    pytester.path.joinpath("data.txt").write_text("one\n")
+    pytester.makepyfile(test_helper="""
+        from helper import double
+
+        def test_uses_helper():
+            assert double(2) == 4
+    """)
+    pytester.makepyfile(test_suite="""
+        def test_reads_data():
+            with open("data.txt") as handle:
+                assert handle.read().startswith("one")
+
+        def test_uses_fixture(greeting):
+            assert greeting == "hello"
+
+        def test_plain():
+            assert True
+    """)
+    pytester.syspathinsert()
+    return pytester
+
+
+def run(pytester, *args):
+    return pytester.runpytest("-p", "impact", "--impact", *args)
+
+
+def ran(result) -> set:
+    return {report.nodeid.split("::")[-1]
+            for report in result.reprec.getreports("pytest_runtest_logreport")
+            if report.when == "call"}
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_second_run_skips_unaffected_tests(project) -> None:
+    """Nothing changed: every test is deselected and the run still succeeds."""
+    first = run(project)
+    first.assert_outcomes(passed=4)
+    first.stdout.fnmatch_lines(["impact: full run (no dependency map yet)*"])
+
+    second = run(project)
+    assert second.ret == 0
+    assert ran(second) == set()
+    second.stdout.fnmatch_lines(["impact: ran 0 of 4 tests*"])
+
+
+def test_changes_select_dependent_tests(project) -> None:
+    """Data files, imported modules, fixtures and test bodies are tracked separately."""
+    run(project)
+
+    project.path.joinpath("data.txt").write_text("one two\n")
+    assert ran(run(project)) == {"test_reads_data"}
+
+    project.makepyfile(helper="def double(x):\n    return x + x\n")
+    assert ran(run(project)) == {"test_uses_helper"}
+
+    project.makeconftest("""
+        import pytest
+
+        @pytest.fixture
+        def greeting():
+            return "hel" + "lo"
+    """)
+    assert ran(run(project)) == {"test_uses_fixture"}
+
+    source = project.path.joinpath("test_suite.py")
+    source.write_text(source.read_text().replace("assert True", "assert 1"))
+    assert ran(run(project)) == {"test_plain"}
+
+
+def test_failed_and_new_tests_always_run(project) -> None:
+    """A failing test reruns until it passes; a new test runs once."""
+    run(project)
+    project.path.joinpath("data.txt").write_text("zero\n")
+    run(project).assert_outcomes(failed=1)
+    # Still failing, although nothing changed since
+    run(project).assert_outcomes(failed=1)
+    project.path.joinpath("data.txt").write_text("one\n")
+    run(project).assert_outcomes(passed=1)
+    assert ran(run(project)) == set()
+
+    project.makepyfile(test_extra="def test_new():\n    assert True\n")
+    assert ran(run(project)) == {"test_new"}
+
+
+def test_external_commands_and_full_runs(project) -> None:
+    """Tests running non-git commands always run; --impact-full runs everything."""
+    project.makepyfile(test_external="""
+        import subprocess, sys
+
+        def test_runs_command():
+            subprocess.run([sys.executable, "-c", "pass"], check=True)
+    """)
+    run(project)
+    assert ran(run(project)) == {"test_runs_command"}
+
+    full = run(project, "--impact-full")
+    full.assert_outcomes(passed=5)
+    full.stdout.fnmatch_lines(["impact: full run (--impact-full)*"])
+
+    project.makeini("[pytest]\nimpact_full_run_hours = 0\n")
+    run(project).stdout.fnmatch_lines(["impact: full run (scheduled full run)*"])
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+dependency_maps = st.dictionaries(st.sampled_from([f"file:f{i}" for i in range(6)]),
+                                  st.sampled_from("abc"), max_size=6)
+
+
+# Feature: self-hosted-ai-coding-platform, Property 16: Affected Tests Are Selected
+@settings(max_examples=100, deadline=None)
+@given(
+    tests=st.dictionaries(st.sampled_from([f"test_{i}" for i in range(8)]),
+                          st.one_of(st.none(), st.fixed_dictionaries({
+                              "deps": dependency_maps,
+                              "outcome": st.sampled_from(["passed", "failed"]),
+                              "volatile": st.booleans()})),
+                          max_size=8),
+    current=dependency_maps,
+)
+def test_affected_tests_are_selected(tests, current) -> None:
+    """
+    Property 16: Affected Tests Are Selected
+
+    For any recorded dependency map and any current fingerprints, a test
+    should be selected exactly when it is new, failed last time, uses
+    external services, or one of its recorded dependencies changed.
+
+    Validates: Requirements 4.3
+
+    Args:
+        tests: Recorded entries by test (None for tests never recorded)
+        current: Current fingerprints (missing keys count as deleted)
+    """
+    def fingerprint(key):
+        return current.get(key, "missing")
+
+    for entry in tests.values():
+        selected = selection_reason(entry, fingerprint) is not None
+        affected = entry is None or entry["outcome"] == "failed" or entry["volatile"] or any(
+            fingerprint(key) != value for key, value in entry["deps"].items())
+        # Property: selection matches the tests the change affects
+        assert selected == affected
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
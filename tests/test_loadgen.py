@@ -0,0 +1,170 @@
+"""
+Tests for the concurrent session load generator.
+
+These tests verify the fake Ollama latency model, one simulated session's
+file writes and commits, and the throughput/latency report of a ramp.
+"""
+
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+import requests
+from hypothesis import given, settings, strategies as st
+
+from aicoding.fake_ollama import FakeOllama
+from aicoding.loadgen import (
+    CodingSession,
+    LoadGenerator,
+    OperationStats,
+    SessionProfile,
+    StageResult,
+    _Recorder,
+    find_knee,
+    percentile,
+    summarize,
+)
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield Path(temp_dir)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+SMALL_PROFILE = SessionProfile(turns=3, system_prompt_tokens=40, turn_prompt_tokens=(20, 40),
+                               response_tokens=16, files_per_turn=2, file_bytes=256, commit_every=1)
+
+
+def stage(concurrency: int, turns_per_second: float, mean: float) -> StageResult:
+    return StageResult(concurrency=concurrency, seconds=1.0, turns=int(turns_per_second),
+                       errors=0, turns_per_second=turns_per_second, llm_tokens_per_second=0.0,
+                       operations={"turn": OperationStats(count=1, mean=mean)})
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_fake_chat_honours_num_predict_and_parallel_slots() -> None:
+    """Replies have num_predict tokens and only `parallel` requests run at once."""
+    with FakeOllama(parallel=1, decode_tokens_per_second=100, prefill_tokens_per_second=1e9) as fake:
+        payload = {"model": "qwen2.5-coder:7b", "stream": False, "options": {"num_predict": 10},
+                   "messages": [{"role": "user", "content": "x" * 400}]}
+        result = requests.post(f"{fake.url}/api/chat", json=payload, timeout=10).json()
+        assert result["eval_count"] == 10
+        assert result["prompt_eval_count"] == 100
+        assert result["message"]["role"] == "assistant"
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=requests.post, args=(f"{fake.url}/api/chat",),
+                                    kwargs={"json": payload, "timeout": 10}) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 3 x 0.1 s decode, served one at a time
+        assert time.perf_counter() - started >= 0.29
+        assert fake.generate_requests == 4
+
+
+def test_session_writes_files_and_commits(temp_workspace) -> None:
+    """Each turn calls the model, writes files and commits them."""
+    with FakeOllama(time_scale=0.001) as fake:
+        recorder = _Recorder()
+        session = CodingSession("t", temp_workspace / "project", fake.url, "qwen2.5-coder:7b",
+                                SMALL_PROFILE, recorder)
+        session.setup()
+        for _ in range(SMALL_PROFILE.turns):
+            assert session.run_turn()
+
+    log = subprocess.run(["git", "-C", str(temp_workspace / "project"), "log", "--oneline"],
+                         capture_output=True, text=True, check=True).stdout
+    assert len(log.splitlines()) == SMALL_PROFILE.turns
+    assert list((temp_workspace / "project" / "src").rglob("*.py"))
+    assert len(recorder.latencies["llm"]) == SMALL_PROFILE.turns
+    assert len(recorder.latencies["commit"]) == SMALL_PROFILE.turns
+    # system prompt plus a user/assistant pair per turn
+    assert len(session.messages) == 1 + 2 * SMALL_PROFILE.turns
+
+
+def test_failed_llm_calls_are_counted_as_errors(temp_workspace) -> None:
+    """An unreachable model server shows up as errors, not a crash."""
+    generator = LoadGenerator("http://127.0.0.1:9", temp_workspace, profile=SMALL_PROFILE)
+    result = generator.run_stage(1, 0.2)
+    assert result.operations["llm"].errors > 0
+    assert result.operations["llm"].count == 0
+    assert result.errors > 0
+
+
+def test_ramp_finds_knee_at_server_parallelism(temp_workspace) -> None:
+    """Throughput stops scaling once sessions exceed the server's slots."""
+    profile = SessionProfile(turns=100, system_prompt_tokens=10, turn_prompt_tokens=(10, 10),
+                             response_tokens=4, files_per_turn=0, commit_every=1000)
+    with FakeOllama(parallel=2, decode_tokens_per_second=100, prefill_tokens_per_second=1e9) as fake:
+        generator = LoadGenerator(fake.url, temp_workspace, profile=profile)
+        results = generator.ramp([1, 2, 4], stage_seconds=0.8)
+
+    by_level = {result.concurrency: result for result in results}
+    assert by_level[2].turns_per_second > 1.5 * by_level[1].turns_per_second
+    assert by_level[4].turns_per_second < 1.3 * by_level[2].turns_per_second
+    assert by_level[4].operations["llm"].p50 > 1.5 * by_level[2].operations["llm"].p50
+    assert find_knee(results).concurrency == 2
+
+
+def test_find_knee_uses_throughput_over_latency() -> None:
+    """The knee is where throughput per unit of latency peaks."""
+    stages = [stage(1, 1.0, 1.0), stage(2, 1.9, 1.05), stage(4, 2.0, 2.0), stage(8, 2.0, 4.0)]
+    assert find_knee(stages).concurrency == 2
+    assert find_knee([]) is None
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 13: Latency Summary Is Ordered And Bounded
+@settings(max_examples=100, deadline=None)
+@given(latencies=st.lists(st.floats(min_value=0.0, max_value=600.0, allow_nan=False), max_size=300))
+def test_latency_summary_is_ordered_and_bounded(latencies) -> None:
+    """
+    Property 13: Latency Summary Is Ordered And Bounded
+
+    For any set of latencies, the summary should count every sample, have
+    min <= p50 <= p95 <= p99 <= max, report percentiles that are actual
+    samples, and keep the mean within the sample range.
+
+    Validates: Requirements 2.2
+
+    Args:
+        latencies: Observed operation latencies in seconds
+    """
+    summary = summarize(latencies)
+    assert summary.count == len(latencies)
+    if not latencies:
+        assert summary.p99 == 0.0
+        return
+
+    # Property: percentiles are ordered and bounded by the samples
+    assert min(latencies) <= summary.p50 <= summary.p95 <= summary.p99 <= summary.max == max(latencies)
+    assert min(latencies) - 1e-9 <= summary.mean <= max(latencies) + 1e-9
+
+    # Property: nearest-rank percentiles are real samples with enough samples at or below
+    for fraction in (0.5, 0.95, 0.99):
+        value = percentile(latencies, fraction)
+        assert value in latencies
+        assert sum(1 for sample in latencies if sample <= value) >= fraction * len(latencies)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
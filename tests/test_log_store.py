@@ -0,0 +1,252 @@
+"""
+Tests for the indexed, compressed container log store.
+
+These tests feed synthetic ``docker logs --timestamps`` streams into the
+store and verify that time-range plus keyword queries return exactly the
+lines a full scan would, while reading only the blocks that can match.
+"""
+
+import random
+import re
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from aicoding.log_store import (
+    LogStore,
+    QueryStats,
+    index_tokens,
+    main,
+    parse_docker_line,
+    parse_time,
+)
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield Path(temp_dir)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+# 2025-11-20T00:00:00Z
+BASE_TIME = 1763596800.0
+
+MESSAGES = [
+    "level=INFO source=server.go msg=\"request\" path=/api/chat status=200",
+    "level=INFO source=runner.go msg=\"model loaded\" model=deepseek-coder-v2:16b",
+    "level=WARN source=sched.go msg=\"gpu not found, running on cpu\"",
+    "INFO:     172.18.0.5:41234 - \"GET /api/options/models HTTP/1.1\" 200 OK",
+    "ERROR: connection refused while contacting http://ollama:11434",
+]
+
+
+def docker_line(timestamp: float, message: str) -> str:
+    seconds, micros = divmod(round(timestamp * 1e6), 1_000_000)
+    stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(seconds))
+    return f"{stamp}.{micros:06d}123Z {message}\n"
+
+
+def synthetic_stream(count: int, seconds: float, seed: int = 0) -> List[Tuple[float, str]]:
+    """(timestamp, message) pairs spread over ``seconds`` with rare errors."""
+    rng = random.Random(seed)
+    step = seconds / count
+    events = []
+    for i in range(count):
+        message = MESSAGES[4] if rng.random() < 0.01 else rng.choice(MESSAGES[:4])
+        events.append((round(BASE_TIME + i * step, 6), f"{message} req={i}"))
+    return events
+
+
+def scan(events, start, end, keywords):
+    """Reference answer: linear scan over all events (whole-word keywords)."""
+    patterns = [re.compile(rf"(?<!\w){re.escape(k)}(?!\w)", re.IGNORECASE) for k in keywords]
+    return [(ts, msg) for ts, msg in events
+            if start <= ts <= end and all(p.search(msg) for p in patterns)]
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_parse_docker_line() -> None:
+    """Docker timestamps are parsed to microseconds; bare lines pass through."""
+    timestamp, message = parse_docker_line("2025-11-20T00:00:01.500000789Z hello world\n")
+    assert timestamp == pytest.approx(BASE_TIME + 1.5)
+    assert message == "hello world"
+    assert parse_docker_line("no timestamp here") == (None, "no timestamp here")
+    assert parse_time("2h", now=10000.0) == 10000.0 - 7200
+    assert parse_time("2025-11-20T00:00:00") == BASE_TIME
+
+
+def test_index_tokens_skip_numbers_and_ids() -> None:
+    """Words are indexed; numbers and hex ids are not."""
+    tokens = index_tokens("ERROR req=12345 id=3f2a1b4c9d model=qwen2.5-coder")
+    assert {"error", "req", "id", "model", "qwen2", "coder"} <= tokens
+    assert "12345" not in tokens and "3f2a1b4c9d" not in tokens
+
+
+def test_query_reads_only_matching_blocks(temp_workspace) -> None:
+    """Keyword and time filters match a full scan but skip most blocks."""
+    events = synthetic_stream(20000, 3 * 86400)
+    with LogStore(temp_workspace, block_bytes=8 * 1024) as store:
+        store.ingest("ollama", (docker_line(ts, msg) for ts, msg in events))
+
+    store = LogStore(temp_workspace)
+    assert len(list((temp_workspace / "ollama").glob("*.seg"))) == 3
+
+    stats = QueryStats()
+    errors = store.query(keywords=["connection refused"], stats=stats)
+    assert [(r.timestamp, r.message) for r in errors] == scan(events, 0, float("inf"), ["connection refused"])
+    assert 0 < stats.blocks_read < stats.blocks_total
+
+    start, end = BASE_TIME + 86400 + 3600, BASE_TIME + 86400 + 7200
+    stats = QueryStats()
+    hour = store.query(start, end, stats=stats)
+    assert [(r.timestamp, r.message) for r in hour] == scan(events, start, end, [])
+    assert stats.partitions == 1
+    assert stats.blocks_read <= 4
+
+    assert store.query(keywords=["nonexistentword"], stats=QueryStats()) == []
+    # Keywords match whole words, like grep -iw
+    assert store.query(keywords=["connection refuse"]) == []
+
+
+def test_sources_are_merged_in_time_order(temp_workspace) -> None:
+    """Queries across sources interleave records by timestamp."""
+    with LogStore(temp_workspace) as store:
+        store.append("ollama", BASE_TIME + 1, "a")
+        store.append("openhands", BASE_TIME + 2, "b")
+        store.append("ollama", BASE_TIME + 3, "c")
+        records = store.query()
+        assert [(r.source, r.message) for r in records] == [("ollama", "a"), ("openhands", "b"), ("ollama", "c")]
+        assert [r.message for r in store.query(sources=["openhands"])] == ["b"]
+        assert [r.message for r in store.query(limit=1)] == ["c"]
+
+
+def test_resume_skips_already_stored_lines(temp_workspace) -> None:
+    """A restarted ingester continues after the last stored timestamp."""
+    events = synthetic_stream(500, 600)
+    lines = [docker_line(ts, msg) for ts, msg in events]
+    with LogStore(temp_workspace, block_bytes=4096) as store:
+        store.ingest("ollama", lines[:300])
+
+    store = LogStore(temp_workspace, block_bytes=4096)
+    last = store.last_timestamp("ollama")
+    assert last == events[299][0]
+    # docker logs --since replays from a second boundary; overlap is dropped
+    assert store.ingest("ollama", lines[250:], skip_until=last) == 200
+    assert [(r.timestamp, r.message) for r in store.query()] == events
+    store.close()
+
+
+def test_torn_block_is_discarded_on_reopen(temp_workspace) -> None:
+    """Bytes written after the last indexed block are truncated on reopen."""
+    with LogStore(temp_workspace) as store:
+        store.append("ollama", BASE_TIME, "first")
+    segment = next((temp_workspace / "ollama").glob("*.seg"))
+    with open(segment, "ab") as handle:
+        handle.write(b"\x00garbage from a crash")
+
+    with LogStore(temp_workspace) as store:
+        store.append("ollama", BASE_TIME + 1, "second")
+    assert [r.message for r in LogStore(temp_workspace).query()] == ["first", "second"]
+
+
+def test_retention_by_age_and_size(temp_workspace) -> None:
+    """Old partitions go first; the partition being written is kept."""
+    with LogStore(temp_workspace) as store:
+        for day in range(5):
+            for i in range(200):
+                store.append("ollama", BASE_TIME + day * 86400 + i, f"day {day} line {i} " + "x" * 50)
+
+    store = LogStore(temp_workspace)
+    result = store.apply_retention(max_age_seconds=2 * 86400, now=BASE_TIME + 5 * 86400)
+    assert len(result.removed) == 2
+    assert min(r.timestamp for r in store.query()) >= BASE_TIME + 2 * 86400
+
+    newest = sum(p.stat().st_size for p in (temp_workspace / "ollama").glob("20251124T*"))
+    result = store.apply_retention(max_bytes=newest)
+    assert len(result.removed) == 2
+    assert {r.message.split(" line")[0] for r in store.query()} == {"day 4"}
+
+    store.append("ollama", BASE_TIME + 4 * 86400 + 500, "still writing")
+    assert store.apply_retention(max_bytes=0).removed == []
+    store.close()
+
+
+def test_cli_query(temp_workspace, capsys) -> None:
+    """The query command prints matching lines with their source."""
+    with LogStore(temp_workspace) as store:
+        store.append("ollama", BASE_TIME, "level=ERROR msg=\"out of memory\"")
+        store.append("ollama", BASE_TIME + 1, "level=INFO msg=\"ok\"")
+    assert main(["--store", str(temp_workspace), "query", "--since", str(BASE_TIME), "memory"]) == 0
+    output = capsys.readouterr().out.strip().splitlines()
+    assert output == ["2025-11-20T00:00:00.000000Z [ollama] level=ERROR msg=\"out of memory\""]
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 11: Indexed Log Query Matches Full Scan
+@settings(max_examples=100, deadline=None)
+@given(
+    gaps=st.lists(st.floats(min_value=0.0, max_value=20000.0), min_size=1, max_size=150),
+    words=st.lists(st.sampled_from(["error", "warn", "model", "loaded", "GPU", "timeout", "ok"]),
+                   min_size=1, max_size=150),
+    window=st.tuples(st.floats(min_value=0.0, max_value=1.0), st.floats(min_value=0.0, max_value=1.0)),
+    keyword=st.sampled_from(["", "error", "model loaded", "gpu", "time", "timeout #1", "missing"]),
+    block_bytes=st.integers(min_value=64, max_value=4096),
+)
+def test_indexed_query_matches_full_scan(gaps, words, window, keyword, block_bytes) -> None:
+    """
+    Property 11: Indexed Log Query Matches Full Scan
+
+    For any log stream (spanning several partitions), block size, time
+    window and keyword, the indexed query should return exactly the lines a
+    linear scan of the stream returns, in timestamp order.
+
+    Validates: Requirements 10.3
+
+    Args:
+        gaps: Seconds between consecutive lines
+        words: Words used to build messages
+        window: Query range as fractions of the stream's time span
+        keyword: Keyword filter ("" for none)
+        block_bytes: Block size of the store
+    """
+    temp_dir = Path(tempfile.mkdtemp())
+    try:
+        events, timestamp = [], BASE_TIME
+        for i, gap in enumerate(gaps):
+            timestamp = round(timestamp + gap, 6)
+            message = " ".join(words[j % len(words)] for j in range(i, i + 3))
+            events.append((timestamp, f"{message} #{i}"))
+
+        with LogStore(temp_dir, block_bytes=block_bytes, partition_seconds=3600) as store:
+            store.ingest("ollama", (docker_line(ts, msg) for ts, msg in events))
+            span = events[-1][0] - BASE_TIME
+            start, end = sorted(BASE_TIME + f * span for f in window)
+            keywords = [keyword] if keyword else []
+
+            records = store.query(start, end, keywords)
+
+        # Property: indexed results equal a full scan
+        assert [(r.timestamp, r.message) for r in records] == scan(events, start, end, keywords)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
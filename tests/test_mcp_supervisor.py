@@ -0,0 +1,239 @@
+"""
+Tests for the MCP supervisor.
+
+These tests supervise the tiny echo MCP server (aicoding.fake_mcp), verifying
+npx resolution, that sessions share one warm server without mixing up
+responses, restarts after a crash, and chaining over the SSE transport.
+"""
+
+import io
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+import requests
+from hypothesis import given, settings, strategies as st
+
+from aicoding import mcp_supervisor
+from aicoding.mcp_supervisor import (
+    McpServer,
+    McpSupervisor,
+    ServerConfig,
+    SseConnection,
+    bridge,
+    load_config,
+    measure,
+    resolve_command,
+)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield Path(temp_dir)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def echo_config(name: str = "echo", startup_seconds: float = 0.0, **kwargs) -> ServerConfig:
+    return ServerConfig(name, sys.executable,
+                        ["-m", "aicoding.fake_mcp", "--startup-seconds", str(startup_seconds)],
+                        {"PYTHONPATH": str(REPO_ROOT)}, **kwargs)
+
+
+@pytest.fixture(scope="module")
+def echo_server():
+    """One supervised echo server shared by the tests of this module."""
+    server = McpServer(echo_config(), start_timeout=10).start()
+    yield server
+    server.stop()
+
+
+def call_tool(server: McpServer, tool: str, **arguments) -> dict:
+    return server.call("tools/call", {"name": tool, "arguments": arguments}, timeout=10)
+
+
+def text(response: dict) -> str:
+    return response["result"]["content"][0]["text"]
+
+
+class SseClient:
+    """An MCP client on the supervisor's SSE transport."""
+
+    def __init__(self, url: str) -> None:
+        self.messages = []
+        self.arrived = threading.Condition()
+        self.connection = SseConnection("client", url, self._receive, lambda: None, timeout=10)
+        self.connection.start()
+
+    def _receive(self, message: dict) -> None:
+        with self.arrived:
+            self.messages.append(message)
+            self.arrived.notify_all()
+
+    def request(self, request_id, method: str, params: dict = None) -> dict:
+        self.connection.send({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}})
+        with self.arrived:
+            assert self.arrived.wait_for(lambda: any(m.get("id") == request_id for m in self.messages), 10)
+            return next(m for m in self.messages if m.get("id") == request_id)
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_load_config_and_npx_resolution(temp_workspace) -> None:
+    config_file = temp_workspace / "mcp.json"
+    config_file.write_text(json.dumps({"mcpServers": {
+        "filesystem": {"command": "npx", "args": ["-y", "@modelcontextprotocol/server-filesystem", "/opt/workspace"]},
+        "github": {"command": "npx", "args": ["-y", "@modelcontextprotocol/server-github"],
+                   "env": {"GITHUB_TOKEN": "x"}},
+        "remote": {"url": "http://127.0.0.1:9999/sse"},
+    }}))
+    package = temp_workspace / "node_modules" / "@modelcontextprotocol" / "server-filesystem"
+    package.mkdir(parents=True)
+    (package / "package.json").write_text(json.dumps({"bin": {"mcp-server-filesystem": "dist/index.js"}}))
+
+    configs = load_config(config_file)
+    root = temp_workspace / "node_modules"
+    assert resolve_command(configs["filesystem"], root) == ["node", str(package / "dist/index.js"), "/opt/workspace"]
+    # Not installed globally: npx as configured
+    assert resolve_command(configs["github"], root) == ["npx", "-y", "@modelcontextprotocol/server-github"]
+    assert configs["github"].env == {"GITHUB_TOKEN": "x"}
+    assert configs["remote"].url == "http://127.0.0.1:9999/sse"
+
+    config_file.write_text(json.dumps({"mcpServers": {"broken": {"args": []}}}))
+    with pytest.raises(ValueError):
+        load_config(config_file)
+
+
+def test_tool_calls_skip_server_startup() -> None:
+    result = measure(echo_config(startup_seconds=0.3), calls=3, method="tools/call",
+                     params={"name": "echo", "arguments": {"text": "hi"}})
+    assert result["startup_ms"] >= 300
+    assert result["cold_p50_ms"] >= 300
+    assert result["warm_p50_ms"] < 50
+
+
+def test_sessions_share_one_server_concurrently(echo_server) -> None:
+    pid = echo_server.status()["pids"]
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda n: call_tool(echo_server, "sleep", seconds=0.3), range(4)))
+    assert [text(result) for result in results] == ["slept"] * 4
+    # Four 0.3 s calls overlapped on one server process
+    assert time.monotonic() - started < 1.0
+    assert echo_server.status()["pids"] == pid
+
+
+def test_sse_transport_and_http_endpoints() -> None:
+    with McpSupervisor({"echo": echo_config()}, start_timeout=10) as supervisor:
+        first, second = SseClient(f"{supervisor.url}/echo/sse"), SseClient(f"{supervisor.url}/echo/sse")
+        try:
+            initialize = first.request(1, "initialize", {"protocolVersion": "2024-11-05"})
+            assert initialize["result"]["serverInfo"]["name"] == "fake-mcp"
+            # Both sessions use id 7; each gets its own answer
+            answers = [first.request(7, "tools/call", {"name": "echo", "arguments": {"text": "first"}}),
+                       second.request(7, "tools/call", {"name": "echo", "arguments": {"text": "second"}})]
+            assert [text(answer) for answer in answers] == ["first", "second"]
+        finally:
+            first.close()
+            second.close()
+
+        response = requests.post(f"{supervisor.url}/echo/mcp", timeout=10, json={
+            "jsonrpc": "2.0", "id": "abc", "method": "tools/list"})
+        assert response.json()["id"] == "abc"
+        assert [tool["name"] for tool in response.json()["result"]["tools"]] == ["echo", "sleep", "crash"]
+        status = requests.get(f"{supervisor.url}/status", timeout=10).json()["echo"]
+        assert status["ready"] == 1 and status["requests"] == 3 and status["startup_ms"] > 0
+
+
+def test_crashed_server_is_restarted() -> None:
+    server = McpServer(echo_config(), start_timeout=10).start()
+    try:
+        pid = server.status()["pids"]
+        crashed = call_tool(server, "crash")
+        assert crashed["error"]["code"] == mcp_supervisor.SERVER_UNAVAILABLE
+        # The next call waits for the restart instead of failing
+        assert text(call_tool(server, "echo", text="back")) == "back"
+        status = server.status()
+        assert status["restarts"] == 1 and status["starts"] == 2
+        assert status["pids"] != pid
+    finally:
+        server.stop()
+
+
+def test_supervisor_chains_over_sse_and_bridges_stdio() -> None:
+    with McpSupervisor({"echo": echo_config()}, start_timeout=10) as upstream:
+        remote = ServerConfig("remote", url=f"{upstream.url}/echo/sse")
+        with McpSupervisor({"remote": remote}, start_timeout=10) as supervisor:
+            assert text(call_tool(supervisor.servers["remote"], "echo", text="relayed")) == "relayed"
+
+            stdin = io.StringIO(json.dumps({"jsonrpc": "2.0", "id": 5, "method": "ping"}) + "\n")
+            stdout = io.StringIO()
+            assert bridge(f"{supervisor.url}/remote/sse", stdin, stdout) == 0
+            assert json.loads(stdout.getvalue()) == {"jsonrpc": "2.0", "id": 5, "result": {}}
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 22: Responses Reach The Session That Asked
+@settings(max_examples=100, deadline=None)
+@given(calls=st.lists(st.tuples(st.integers(min_value=0, max_value=3), st.integers(min_value=0, max_value=3),
+                                st.text(max_size=20)), min_size=1, max_size=12))
+def test_responses_reach_the_session_that_asked(echo_server, calls) -> None:
+    """
+    Property 22: Responses Reach The Session That Asked
+
+    For any set of sessions sending requests with overlapping JSON-RPC ids
+    at the same time, each session should receive exactly one response per
+    request it sent, under its own id and with its own result.
+
+    Validates: Requirements 11.1, 11.2
+
+    Args:
+        echo_server: Shared supervised echo server
+        calls: (session, request id, text) triples
+    """
+    sessions = [echo_server.open_session() for _ in range(4)]
+    try:
+        sent = {}
+        for session_index, request_id, value in calls:
+            sent.setdefault(session_index, {}).setdefault(request_id, []).append(value)
+            echo_server.submit(sessions[session_index], {
+                "jsonrpc": "2.0", "id": request_id, "method": "tools/call",
+                "params": {"name": "echo", "arguments": {"text": value}}})
+        for session_index, session in enumerate(sessions):
+            expected = sent.get(session_index, {})
+            received = {}
+            for _ in range(sum(len(values) for values in expected.values())):
+                message = session.messages.get(timeout=10)
+                received.setdefault(message["id"], []).append(text(message))
+            # Property: own ids, own results, nothing more
+            assert {key: sorted(values) for key, values in received.items()} == \
+                {key: sorted(values) for key, values in expected.items()}
+            assert session.messages.empty()
+    finally:
+        for session in sessions:
+            echo_server.close_session(session)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
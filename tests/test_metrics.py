@@ -0,0 +1,279 @@
+"""
+Tests for the OpenMetrics exporter.
+
+These tests verify the exposition format, the probes against a fake Ollama
+and synthetic inputs, and that a scrape never waits for a slow probe.
+"""
+
+import math
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pytest
+import requests
+from hypothesis import given, settings, strategies as st
+
+from aicoding.fake_ollama import FakeOllama
+from aicoding.log_store import LogStore
+from aicoding.metrics import (
+    CONTENT_TYPE,
+    DockerProbe,
+    Exporter,
+    HostProbe,
+    OllamaProbe,
+    OllamaRequestLogProbe,
+    Probe,
+    Registry,
+    WorkspaceProbe,
+    parse_gin_line,
+    parse_go_duration,
+)
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield Path(temp_dir)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class SlowProbe(Probe):
+    """Probe that blocks until released, like a hung health check."""
+
+    name = "slow"
+
+    def __init__(self, registry):
+        super().__init__(registry, interval=60)
+        self.release = threading.Event()
+        self.gauge = registry.gauge("test_slow_value", "Set once the probe finishes")
+
+    def collect(self):
+        self.release.wait(10)
+        self.gauge.set(1)
+
+
+def samples(text: str) -> dict:
+    """Parse exposition text into {series: value}."""
+    values = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, _, value = line.rpartition(" ")
+            values[series] = float(value)
+    return values
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_exposition_format() -> None:
+    """Counters, gauges and histograms render as valid OpenMetrics text."""
+    registry = Registry()
+    registry.counter("app_requests", "Requests", ["path"]).inc(path='/a"b')
+    registry.gauge("app_temperature_celsius", "Temp", unit="celsius").set(21.5)
+    histogram = registry.histogram("app_latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+
+    text = registry.render().decode()
+    assert text.endswith("# EOF\n")
+    assert "# TYPE app_requests counter" in text
+    assert "# UNIT app_temperature_celsius celsius" in text
+    values = samples(text)
+    assert values['app_requests_total{path="/a\\"b"}'] == 1
+    assert values["app_temperature_celsius"] == 21.5
+    assert values['app_latency_seconds_bucket{le="0.1"}'] == 1
+    assert values['app_latency_seconds_bucket{le="1"}'] == 2
+    assert values['app_latency_seconds_bucket{le="+Inf"}'] == 3
+    assert values["app_latency_seconds_sum"] == pytest.approx(5.55)
+
+    with pytest.raises(ValueError):
+        registry.counter("app_requests", "Requests").inc()
+
+
+def test_render_is_cached_until_a_value_changes() -> None:
+    """Unchanged registries return the same rendered bytes."""
+    registry = Registry()
+    gauge = registry.gauge("app_value", "Value")
+    gauge.set(1)
+    first = registry.render()
+    assert registry.render() is first
+    gauge.set(2)
+    assert registry.render() is not first
+
+
+def test_gauge_replace_drops_stale_series() -> None:
+    """Replacing a gauge's series removes ones no longer reported."""
+    registry = Registry()
+    gauge = registry.gauge("app_loaded", "Loaded", ["model"])
+    gauge.replace([({"model": "a"}, 1), ({"model": "b"}, 1)])
+    gauge.replace([({"model": "b"}, 1)])
+    assert 'model="a"' not in registry.render().decode()
+
+
+def test_ollama_probe_reports_residency() -> None:
+    """Resident models from /api/ps become per-model gauges."""
+    registry = Registry()
+    with FakeOllama() as fake:
+        fake.loaded.append({"name": "qwen2.5-coder:7b", "size": 5_000_000_000, "size_vram": 0,
+                            "expires_at": "2099-01-01T00:00:00.123456789Z"})
+        probe = OllamaProbe(registry, fake.url)
+        probe.collect()
+        assert probe.up.value() == 1
+        assert probe.installed.value() == 2
+        assert probe.loaded.value(model="qwen2.5-coder:7b") == 1
+        assert probe.size.value(model="qwen2.5-coder:7b") == 5_000_000_000
+        assert probe.expires.value(model="qwen2.5-coder:7b") > 0
+
+        fake.loaded.clear()
+        probe.collect()
+        assert probe.loaded.value(model="qwen2.5-coder:7b") is None
+
+    with pytest.raises(requests.RequestException):
+        probe.collect()
+    assert probe.up.value() == 0
+
+
+def test_gin_log_lines_feed_latency_histogram(temp_workspace) -> None:
+    """Ollama access-log latencies are read from the log store."""
+    assert parse_go_duration("1m2.5s") == pytest.approx(62.5)
+    assert parse_go_duration("345µs") == pytest.approx(0.000345)
+    assert parse_gin_line('[GIN] 2025/11/20 - 10:00:00 | 200 |  12.5ms |  172.18.0.5 | POST     "/api/chat"') \
+        == ("/api/chat", "200", pytest.approx(0.0125))
+    assert parse_gin_line("level=INFO msg=hello") is None
+
+    registry = Registry()
+    with LogStore(temp_workspace) as store:
+        probe = OllamaRequestLogProbe(registry, store, since=1000.0)
+        store.append("ollama", 1001.0, '[GIN] 2025/11/20 - 10:00:00 | 200 |  2.5s |  172.18.0.5 | POST "/api/chat"')
+        store.append("ollama", 1002.0, '[GIN] 2025/11/20 - 10:00:01 | 500 |  40ms |  172.18.0.5 | POST "/x?y"')
+        probe.collect()
+        probe.collect()  # already-seen lines are not counted twice
+        store.append("ollama", 1003.0, '[GIN] 2025/11/20 - 10:00:02 | 200 |  1.5s |  172.18.0.5 | POST "/api/chat"')
+        probe.collect()
+
+    assert probe.duration.count(endpoint="/api/chat", status="200") == 2
+    assert probe.requests.value(endpoint="other", status="500") == 1
+
+
+def test_docker_probe_counts_restarts() -> None:
+    """Restart counts come from docker inspect; sandbox containers are skipped."""
+    outputs = {
+        "ps": "aaa\nbbb\nccc\n",
+        "inspect": "/ollama-kog123|3|true\n/openhands-kog456|0|true\n/openhands-runtime-9|0|true\n",
+    }
+    registry = Registry()
+    probe = DockerProbe(registry, runner=lambda cmd: outputs[cmd[1]])
+    probe.collect()
+    assert probe.restarts.value(container="ollama-kog123") == 3
+    assert probe.running.value(container="openhands-kog456") == 1
+    assert probe.restarts.value(container="openhands-runtime-9") is None
+
+
+def test_host_and_workspace_probes(temp_workspace) -> None:
+    """Host memory/disk and workspace timings are collected."""
+    meminfo = temp_workspace / "meminfo"
+    meminfo.write_text("MemTotal:       16384000 kB\nMemAvailable:    8192000 kB\n")
+    registry = Registry()
+    host = HostProbe(registry, paths=[temp_workspace], meminfo_path=str(meminfo))
+    host.collect()
+    assert host.memory.value(kind="total") == 16384000 * 1024
+    assert host.disk.value(path=str(temp_workspace), kind="size") > 0
+
+    project = temp_workspace / "projects" / "app"
+    project.mkdir(parents=True)
+    (project / "main.py").write_text("print('hi')\n")
+    subprocess.run(["git", "init", "-q", str(project)], check=True)
+    workspace = WorkspaceProbe(registry, temp_workspace / "projects")
+    workspace.collect()
+    assert workspace.totals.value(kind="files") == 1
+    assert workspace.operation.count(operation="scan") == 1
+    assert workspace.operation.count(operation="git_status") == 1
+
+
+def test_scrape_never_waits_for_slow_probe() -> None:
+    """A hung probe does not delay /metrics; its health is visible."""
+    registry = Registry()
+    slow = SlowProbe(registry)
+    with Exporter(registry, [slow], host="127.0.0.1", port=0) as exporter:
+        started = time.perf_counter()
+        response = requests.get(f"{exporter.url}/metrics", timeout=5)
+        assert time.perf_counter() - started < 1.0
+        assert response.headers["Content-Type"] == CONTENT_TYPE
+        assert "test_slow_value" not in samples(response.text)
+
+        slow.release.set()
+        deadline = time.time() + 5
+        while registry.gauge("aicoding_probe_success", "", ["probe"]).value(probe="slow") is None:
+            assert time.time() < deadline
+            time.sleep(0.01)
+        values = samples(requests.get(f"{exporter.url}/metrics", timeout=5).text)
+        assert values["test_slow_value"] == 1
+        assert values['aicoding_probe_success{probe="slow"}'] == 1
+        assert requests.get(f"{exporter.url}/nope", timeout=5).status_code == 404
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 12: Histogram Exposition Is Consistent
+@settings(max_examples=100, deadline=None)
+@given(
+    observations=st.lists(st.floats(min_value=0.0, max_value=1000.0, allow_nan=False), max_size=200),
+    buckets=st.lists(st.floats(min_value=0.001, max_value=500.0, allow_nan=False),
+                     min_size=1, max_size=12, unique=True),
+)
+def test_histogram_exposition_is_consistent(observations, buckets) -> None:
+    """
+    Property 12: Histogram Exposition Is Consistent
+
+    For any observations and bucket bounds, the rendered histogram should
+    have non-decreasing cumulative buckets, a +Inf bucket equal to the
+    count, a count equal to the number of observations, a sum equal to
+    their total, and each bucket should count exactly the observations at
+    or below its bound.
+
+    Validates: Requirements 8.3
+
+    Args:
+        observations: Observed values
+        buckets: Upper bucket bounds
+    """
+    registry = Registry()
+    histogram = registry.histogram("test_latency_seconds", "Latency", buckets=buckets)
+    for value in observations:
+        histogram.observe(value)
+
+    if not observations:
+        assert "test_latency_seconds_count" not in registry.render().decode()
+        return
+
+    values = samples(registry.render().decode())
+    bucket_series = [(series, value) for series, value in values.items() if "_bucket" in series]
+
+    # Property: cumulative buckets never decrease and end at +Inf == count
+    counts = [value for _, value in bucket_series]
+    assert counts == sorted(counts)
+    assert bucket_series[-1][0].endswith('le="+Inf"}')
+    assert counts[-1] == values["test_latency_seconds_count"] == len(observations)
+
+    # Property: each finite bucket counts the observations at or below its bound
+    for bound, (_, count) in zip(sorted(buckets), bucket_series):
+        assert count == sum(1 for value in observations if value <= bound)
+
+    # Property: sum matches
+    assert math.isclose(values["test_latency_seconds_sum"], sum(observations), rel_tol=1e-9, abs_tol=1e-9)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
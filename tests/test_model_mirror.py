@@ -0,0 +1,251 @@
+"""
+Tests for the fleet-local Ollama model mirror.
+
+These tests serve a synthetic Ollama model store over a loopback HTTP server
+and verify that ranged, resumable, parallel pulls produce byte-identical
+blobs, move only missing layers, and reject corrupted data.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+import requests
+from hypothesis import given, settings, strategies as st
+
+from aicoding.model_mirror import (
+    DigestMismatchError,
+    MirrorClient,
+    MirrorError,
+    MirrorServer,
+    ModelStore,
+    parse_model_ref,
+)
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield Path(temp_dir)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def add_model(store: ModelStore, model: str, layers: List[bytes]) -> Dict:
+    """Write blobs and a manifest for ``model``; the last layer is the config."""
+    entries = []
+    for data in layers:
+        digest = "sha256:" + hashlib.sha256(data).hexdigest()
+        path = store.blob_path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        entries.append({"mediaType": "application/vnd.ollama.image.model",
+                        "digest": digest, "size": len(data)})
+    manifest = {"schemaVersion": 2, "config": entries[-1], "layers": entries[:-1]}
+    # Formatted like a registry's, not like json.dumps' default
+    store.write_manifest(model, json.dumps(manifest, indent=2).encode("utf-8"))
+    return manifest
+
+
+def make_source(root: Path) -> ModelStore:
+    store = ModelStore(root / "source")
+    add_model(store, "qwen2.5-coder:7b", [os.urandom(300_000), b"template", b'{"config": 1}'])
+    return store
+
+
+class FailingClient(MirrorClient):
+    """Client whose connection drops after a number of chunks."""
+
+    def __init__(self, *args, fail_after: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.remaining = fail_after
+
+    def _fetch_chunk(self, namespace, name, blob, index):
+        if self.remaining <= 0:
+            raise requests.ConnectionError("connection reset")
+        self.remaining -= 1
+        return super()._fetch_chunk(namespace, name, blob, index)
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_parse_model_ref() -> None:
+    """References default to the library namespace and latest tag."""
+    assert parse_model_ref("deepseek-coder-v2:16b") == ("library", "deepseek-coder-v2", "16b")
+    assert parse_model_ref("team/coder") == ("team", "coder", "latest")
+    with pytest.raises(ValueError):
+        parse_model_ref("../../etc:passwd")
+
+
+def test_pull_copies_model_and_skips_present_blobs(temp_workspace) -> None:
+    """A pull installs identical blobs and manifest; a repeat moves nothing."""
+    source = make_source(temp_workspace)
+    target = ModelStore(temp_workspace / "target")
+    with MirrorServer(source, host="127.0.0.1", port=0) as server:
+        client = MirrorClient(server.url, target, node_id="node-b", chunk_bytes=64 * 1024)
+        stats = client.pull("qwen2.5-coder:7b")
+        assert stats.blobs_fetched == 3
+        assert stats.bytes_fetched == sum(s.stat().st_size for s in (source.root / "blobs").iterdir())
+        assert target.models() == ["qwen2.5-coder:7b"]
+        assert target.blobs() == source.blobs()
+        for digest in source.blobs():
+            assert target.blob_path(digest).read_bytes() == source.blob_path(digest).read_bytes()
+        # The manifest is installed byte for byte, so its digest does not change
+        manifest_path = ("library", "qwen2.5-coder", "7b")
+        assert target.manifest_path(*manifest_path).read_bytes() == source.manifest_path(*manifest_path).read_bytes()
+
+        again = client.pull("qwen2.5-coder:7b")
+        assert (again.blobs_fetched, again.blobs_present, again.bytes_fetched) == (0, 3, 0)
+
+
+def test_only_missing_layers_move(temp_workspace) -> None:
+    """Layers shared with an installed model are not transferred again."""
+    source = make_source(temp_workspace)
+    shared = source.blob_path(source.read_manifest("qwen2.5-coder:7b")["layers"][0]["digest"]).read_bytes()
+    add_model(source, "qwen2.5-coder:7b-tuned", [shared, b"new template", b'{"config": 2}'])
+    target = ModelStore(temp_workspace / "target")
+
+    with MirrorServer(source, host="127.0.0.1", port=0) as server:
+        client = MirrorClient(server.url, target, node_id="node-b")
+        client.pull("qwen2.5-coder:7b")
+        plan = requests.get(f"{server.url}/api/mirror/plan",
+                            params={"node": "node-b", "model": "qwen2.5-coder:7b-tuned"}).json()
+        assert plan["missing_bytes"] == len(b"new template") + len(b'{"config": 2}')
+
+        stats = client.pull("qwen2.5-coder:7b-tuned")
+        assert stats.blobs_present == 1
+        assert stats.bytes_fetched == plan["missing_bytes"]
+        assert set(server.nodes()["node-b"]["blobs"]) == source.blobs()
+
+
+def test_interrupted_pull_resumes(temp_workspace) -> None:
+    """Chunks finished before a failure are not downloaded again."""
+    source = make_source(temp_workspace)
+    target = ModelStore(temp_workspace / "target")
+    with MirrorServer(source, host="127.0.0.1", port=0) as server:
+        failing = FailingClient(server.url, target, workers=1, chunk_bytes=50_000, fail_after=3)
+        with pytest.raises(MirrorError):
+            failing.pull("qwen2.5-coder:7b")
+        assert target.models() == []
+        assert list((target.root / "blobs").glob("*-partial"))
+
+        stats = MirrorClient(server.url, target, chunk_bytes=50_000).pull("qwen2.5-coder:7b")
+        assert stats.bytes_resumed == 150_000
+        assert target.blobs() == source.blobs()
+        assert not list((target.root / "blobs").glob("*-partial*"))
+
+
+def test_corrupted_blob_is_rejected(temp_workspace) -> None:
+    """A blob whose content does not match its digest is never installed."""
+    source = make_source(temp_workspace)
+    digest = source.read_manifest("qwen2.5-coder:7b")["layers"][0]["digest"]
+    path = source.blob_path(digest)
+    data = bytearray(path.read_bytes())
+    data[1000] ^= 0xFF
+    path.write_bytes(bytes(data))
+    target = ModelStore(temp_workspace / "target")
+
+    with MirrorServer(source, host="127.0.0.1", port=0) as server:
+        with pytest.raises(DigestMismatchError):
+            MirrorClient(server.url, target, chunk_bytes=64 * 1024).pull("qwen2.5-coder:7b")
+    assert digest not in target.blobs()
+    assert target.models() == []
+    assert not list((target.root / "blobs").glob(f"{digest.replace(':', '-')}*"))
+
+
+def test_server_honours_ranges(temp_workspace) -> None:
+    """Blob requests support byte ranges and reject unsatisfiable ones."""
+    source = make_source(temp_workspace)
+    digest = source.read_manifest("qwen2.5-coder:7b")["layers"][0]["digest"]
+    data = source.blob_path(digest).read_bytes()
+    with MirrorServer(source, host="127.0.0.1", port=0) as server:
+        url = f"{server.url}/v2/library/qwen2.5-coder/blobs/{digest}"
+        partial = requests.get(url, headers={"Range": "bytes=100-199"})
+        assert partial.status_code == 206
+        assert partial.content == data[100:200]
+        assert partial.headers["Content-Range"] == f"bytes 100-199/{len(data)}"
+        assert requests.get(url, headers={"Range": f"bytes={len(data)}-"}).status_code == 416
+        reversed_range = requests.get(url, headers={"Range": "bytes=10-5"})
+        assert reversed_range.status_code == 416 and reversed_range.headers["Content-Length"] == "0"
+        assert requests.get(url).content == data
+        assert requests.get(f"{server.url}/v2/library/qwen2.5-coder/blobs/sha256:bad").status_code == 404
+        inventory = requests.get(f"{server.url}/api/mirror/inventory").json()
+        assert list(inventory["models"]) == ["qwen2.5-coder:7b"]
+
+
+def test_node_inventory_persists(temp_workspace) -> None:
+    """Reported node inventories survive a mirror restart."""
+    source = make_source(temp_workspace)
+    state = temp_workspace / "nodes.json"
+    with MirrorServer(source, host="127.0.0.1", port=0, state_file=state) as server:
+        MirrorClient(server.url, ModelStore(temp_workspace / "t"), node_id="node-c").pull("qwen2.5-coder:7b")
+    restarted = MirrorServer(source, state_file=state)
+    assert set(restarted.nodes()["node-c"]["blobs"]) == source.blobs()
+    assert restarted.plan("node-c", "qwen2.5-coder:7b")["missing"] == []
+    assert json.loads(state.read_text())
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 10: Mirrored Blobs Are Identical
+@settings(max_examples=100, deadline=None)
+@given(
+    sizes=st.lists(st.integers(min_value=0, max_value=20_000), min_size=1, max_size=4),
+    chunk_bytes=st.integers(min_value=1_000, max_value=25_000),
+    workers=st.integers(min_value=1, max_value=4),
+)
+def test_mirrored_blobs_are_identical(sizes, chunk_bytes, workers) -> None:
+    """
+    Property 10: Mirrored Blobs Are Identical
+
+    For any set of layer sizes, chunk size and worker count, pulling a model
+    through the mirror should install byte-identical blobs under their
+    digests along with the manifest, and leave no partial files behind.
+
+    Validates: Requirements 2.2
+
+    Args:
+        sizes: Byte size of each layer
+        chunk_bytes: Bytes per ranged request
+        workers: Parallel chunk downloads
+    """
+    temp_dir = Path(tempfile.mkdtemp())
+    try:
+        source = ModelStore(temp_dir / "source")
+        layers = [os.urandom(size) for size in sizes] + [b"{}"]
+        manifest = add_model(source, "deepseek-coder-v2:16b", layers)
+        target = ModelStore(temp_dir / "target")
+
+        with MirrorServer(source, host="127.0.0.1", port=0) as server:
+            client = MirrorClient(server.url, target, workers=workers, chunk_bytes=chunk_bytes)
+            client.pull("deepseek-coder-v2:16b")
+
+        # Property: every blob matches its digest
+        for digest in source.blobs():
+            data = target.blob_path(digest).read_bytes()
+            assert "sha256:" + hashlib.sha256(data).hexdigest() == digest
+
+        # Property: the manifest is installed unchanged
+        assert target.read_manifest("deepseek-coder-v2:16b") == manifest
+
+        # Property: no partial downloads remain
+        assert not list((target.root / "blobs").glob("*-partial*"))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,251 @@
+"""
+Tests for the opt-in profiling hooks.
+
+These tests switch profiling on in-process (and through the environment in
+a child interpreter) and verify the timers of decorated functions, wrapped
+subprocess and HTTP calls, the sampled stacks, the allocation reports, the
+signal toggle, and that nothing is recorded while profiling is off.
+"""
+
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+import requests
+from hypothesis import given, settings, strategies as st
+
+from aicoding import profiling
+from aicoding.fake_ollama import FakeOllama
+from aicoding.profiling import PROFILER, command_label, parse_kinds, timed, timer, timer_stats, top_frames
+from aicoding.profiling.__main__ import main
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = Path(tempfile.mkdtemp())
+    yield temp_dir
+    PROFILER.stop()
+    PROFILER.program = None
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@timed
+def sleepy(seconds: float) -> str:
+    time.sleep(seconds)
+    return "slept"
+
+
+@timed("custom name")
+def failing() -> None:
+    raise KeyError("boom")
+
+
+def spin(seconds: float) -> int:
+    deadline = time.perf_counter() + seconds
+    count = 0
+    while time.perf_counter() < deadline:
+        count += 1
+    return count
+
+
+def allocate() -> list:
+    return [bytearray(1024) for _ in range(2000)]
+
+
+def written(paths: list, suffix: str) -> Path:
+    [path] = [path for path in paths if path.name.endswith(suffix)]
+    return path
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_timers_cover_decorated_functions_subprocesses_and_http(temp_workspace) -> None:
+    sleepy(0.01)
+    assert timer_stats() == {} and not PROFILER.active
+    original_run = subprocess.run
+
+    PROFILER.start(["timers"], temp_workspace)
+    assert subprocess.run is not original_run
+    assert sleepy(0.05) == "slept"
+    with pytest.raises(KeyError):
+        failing()
+    with timer("block"):
+        spin(0.02)
+    subprocess.run(["git", "-C", str(temp_workspace), "init", "-q"], check=True)
+    subprocess.run("git --version", shell=True, capture_output=True, check=True)
+    with FakeOllama() as fake:
+        requests.get(f"{fake.url}/api/tags", timeout=10)
+        host = fake.url.split("//")[1]
+    paths = PROFILER.stop()
+    assert subprocess.run is original_run and not PROFILER.active
+
+    stats = json.loads(written(paths, ".timers.json").read_text())
+    sleeping = stats[f"{__name__}.sleepy"]
+    assert sleeping["calls"] == 1 and sleeping["wall"] >= 0.05 and sleeping["cpu"] < 0.04
+    assert stats["custom name"] == {**stats["custom name"], "calls": 1, "errors": 1}
+    assert stats["block"]["cpu"] > 0.01
+    assert stats["subprocess:git init"]["calls"] == 1 and stats["subprocess:git"]["calls"] == 1
+    assert stats[f"http:GET {host}"]["calls"] == 1
+    # Ordered by total wall time
+    walls = [value["wall"] for value in stats.values()]
+    assert walls == sorted(walls, reverse=True)
+    assert main(["timers", str(written(paths, ".timers.json"))]) == 0
+
+
+def test_sampler_and_allocation_reports(temp_workspace, capsys) -> None:
+    PROFILER.start(["sample", "alloc"], temp_workspace, interval=0.001)
+    spin(0.3)
+    kept = allocate()
+    first = PROFILER.dump()
+    kept += allocate()
+    paths = PROFILER.stop()
+    assert len(kept) == 4000
+
+    collapsed = written(paths, ".collapsed").read_text()
+    assert any(line.startswith("thread:MainThread;") and f"{__name__}:spin " in line
+               for line in collapsed.splitlines())
+    assert "profiling-sampler" not in collapsed
+    rows = {row["frame"]: row for row in top_frames(collapsed, limit=1000)}
+    # Every sample of the main thread is below its root frame
+    assert rows["thread:MainThread"]["total"] == max(row["total"] for row in rows.values())
+    assert rows[f"{__name__}:spin"]["self"] > 0
+
+    assert "test_profiling.py" in written(first, ".alloc.txt").read_text()
+    report = written(paths, ".alloc.txt").read_text()
+    assert "Growth since the previous dump:" in report and "test_profiling.py" in report
+    import tracemalloc
+    assert tracemalloc.Snapshot.load(str(written(paths, ".tracemalloc"))).traces
+    assert not tracemalloc.is_tracing()
+
+    assert main(["top", str(written(paths, ".collapsed")), "--limit", "5"]) == 0
+    assert "samples" in capsys.readouterr().out
+
+
+def test_signal_toggles_profiling(temp_workspace) -> None:
+    previous = signal.getsignal(signal.SIGUSR2)
+    signal.signal(signal.SIGUSR2, signal.SIG_DFL)
+    try:
+        assert profiling.install_signal_handler("SIGUSR2", ["timers"])
+        # The program's own handler is left alone
+        assert not profiling.install_signal_handler("SIGUSR2", ["timers"])
+        PROFILER.directory = temp_workspace
+        os.kill(os.getpid(), signal.SIGUSR2)
+        assert PROFILER.active and PROFILER.kinds == ["timers"]
+        sleepy(0.001)
+        os.kill(os.getpid(), signal.SIGUSR2)
+        assert not PROFILER.active
+        [path] = temp_workspace.glob("*.timers.json")
+        assert f"{__name__}.sleepy" in json.loads(path.read_text())
+    finally:
+        signal.signal(signal.SIGUSR2, previous)
+    assert not profiling.install_signal_handler("SIGNOPE")
+
+
+def test_environment_profiles_a_whole_run(temp_workspace) -> None:
+    script = temp_workspace / "tool.py"
+    script.write_text("import signal, subprocess, sys\n"
+                      "from pathlib import Path\n"
+                      "from aicoding.profiling import PROFILER, setup_from_environment\n"
+                      "from aicoding.workspace import create_file_at_path\n"
+                      "# Importing the package changes nothing in the process\n"
+                      "assert signal.getsignal(signal.SIGUSR2) == signal.SIG_DFL\n"
+                      "assert PROFILER.active == (sys.argv[2] == 'run')\n"
+                      "setup_from_environment()\n"
+                      "for number in range(20):\n"
+                      "    create_file_at_path(Path(sys.argv[1]) / f'src/{number}.py', 'x = 1\\n')\n"
+                      "subprocess.run(['git', 'init', '-q', sys.argv[1]], check=True)\n")
+    env = dict(os.environ, PROFILING="timers,alloc", PROFILING_DIR=str(temp_workspace / "profiles"),
+               PYTHONPATH=str(Path(__file__).resolve().parent.parent))
+    result = subprocess.run([sys.executable, str(script), str(temp_workspace / "project"), "env"], env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    [path] = (temp_workspace / "profiles").glob("tool-*.timers.json")
+    stats = json.loads(path.read_text())
+    assert stats["aicoding.workspace.create_file_at_path"]["calls"] == 20
+    assert stats["subprocess:git init"]["calls"] == 1
+    assert len(list((temp_workspace / "profiles").glob("tool-*.alloc.txt"))) == 1
+
+    # An explicit run keeps its own kinds and directory over the environment's
+    written = sorted((temp_workspace / "profiles").iterdir())
+    result = subprocess.run([sys.executable, "-m", "aicoding.profiling", "run", "--kinds", "timers", "--dir",
+                             str(temp_workspace / "run"), "--", str(script), str(temp_workspace / "other"), "run"],
+                            env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert [path.suffixes for path in (temp_workspace / "run").iterdir()] == [[".timers", ".json"]]
+    assert sorted((temp_workspace / "profiles").iterdir()) == written
+
+    assert parse_kinds("") == [] and parse_kinds("all") == list(profiling.KINDS)
+    with pytest.raises(ValueError):
+        parse_kinds("sample,nope")
+    assert command_label(["/usr/bin/git", "-c", "a=b", "--no-pager", "log"]) == "subprocess:git log"
+    assert command_label("ssh -o BatchMode=yes host uptime") == "subprocess:ssh"
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 28: Timed Functions Behave Like The Originals
+@settings(max_examples=100, deadline=None)
+@given(calls=st.lists(st.tuples(st.integers(), st.booleans()), max_size=20), enabled=st.booleans())
+def test_timed_functions_behave_like_the_originals(calls, enabled) -> None:
+    """
+    Property 28: Timed Functions Behave Like The Originals
+
+    For any sequence of calls, a timed function should return what the
+    undecorated function returns and raise what it raises, whether
+    profiling is on or off, and record exactly one call per call only while
+    timers are on.
+
+    Validates: Requirements 8.1, 8.2
+
+    Args:
+        calls: (argument, whether the call raises) pairs
+        enabled: Whether timers are on
+    """
+    def original(value: int, fail: bool) -> int:
+        if fail:
+            raise ValueError(value)
+        return value * 2
+
+    def recorded() -> tuple:
+        stats = timer_stats().get("property")
+        return (stats.calls, stats.errors) if stats else (0, 0)
+
+    wrapped = timed("property")(original)
+    if enabled:
+        PROFILER.start(["timers"])
+    before = recorded()
+    try:
+        for value, fail in calls:
+            if fail:
+                with pytest.raises(ValueError) as raised:
+                    wrapped(value, fail)
+                assert raised.value.args == (value,)
+            else:
+                assert wrapped(value, fail) == original(value, fail)
+        after = recorded()
+    finally:
+        PROFILER.stop(write=False)
+    # Property: one record per call while on, none while off
+    failures = sum(fail for _, fail in calls)
+    expected = (len(calls), failures) if enabled else (0, 0)
+    assert (after[0] - before[0], after[1] - before[1]) == expected
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
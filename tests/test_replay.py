@@ -0,0 +1,252 @@
+"""
+Tests for the record/replay cassettes.
+
+These tests record a small suite against a local HTTP server and a local
+command, then replay it with the server stopped, and verify drift reports,
+misses and the handling of an unreachable server.
+"""
+
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from hypothesis import given, settings, strategies as st
+
+from replay import Cassette, Session, command_key, http_key
+
+pytest_plugins = ["pytester"]
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+class Site:
+    """Local HTTP server redirecting every path to an https URL."""
+
+    def __init__(self) -> None:
+        self.target = "https://example.test"
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith("/page"):
+                    body = b"<html>page</html>"
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                self.send_response(301)
+                location = (site.target + self.path) if self.path.startswith("/r/") else "/page"
+                self.send_header("Location", location)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05},
+                                       daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def site():
+    server = Site()
+    yield server
+    server.stop()
+
+
+PYTHON = os.path.basename(sys.executable)
+
+
+@pytest.fixture
+def suite(pytester, site):
+    """A marked test module using the site and a command reading value.txt."""
+    pytester.path.joinpath("value.txt").write_text("1")
+    pytester.makepyfile(test_live=f"""
+        import subprocess, sys
+        import pytest, requests
+        from hypothesis import given, settings, strategies as st
+
+        pytestmark = pytest.mark.cassette(commands=[{PYTHON!r}])
+        URL = {site.url!r}
+
+        @settings(max_examples=100, deadline=None)
+        @given(path=st.sampled_from(["/a", "/b", "/c"]), query=st.sampled_from(["", "?x=1"]))
+        def test_redirects(path, query):
+            response = requests.get(URL + "/r" + path + query, allow_redirects=False, timeout=5)
+            assert response.status_code == 301
+            assert response.headers["Location"].startswith("https://")
+
+        def test_follows_redirects():
+            response = requests.get(URL + "/start", timeout=5)
+            assert response.text == "<html>page</html>"
+            assert [r.status_code for r in response.history] == [301]
+            assert response.url == URL + "/page"
+
+        def test_command():
+            result = subprocess.run([sys.executable, "-c", "print(open('value.txt').read())"],
+                                    capture_output=True, text=True, check=True)
+            assert result.stdout.strip() == "1"
+    """)
+    return pytester
+
+
+def run(pytester, *args):
+    return pytester.runpytest("-p", "replay", *args)
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_record_then_replay_offline(suite, site) -> None:
+    """A recorded suite replays without the server, quickly and with redirect history."""
+    run(suite, "--cassettes=record").assert_outcomes(passed=3)
+    cassette_file = suite.path / "cassettes" / "test_live.json.gz"
+    assert cassette_file.exists()
+    # Bodies are stored once; 6 redirect keys, the redirect chain and the command
+    cassette = Cassette.load(cassette_file)
+    assert len(cassette.tests["test_redirects"]) == 6
+    assert cassette_file.stat().st_size < 2048
+
+    site.stop()
+    suite.path.joinpath("value.txt").write_text("2")
+    started = time.perf_counter()
+    result = run(suite, "--cassettes=replay")
+    elapsed = time.perf_counter() - started
+    result.assert_outcomes(passed=3)
+    result.stdout.fnmatch_lines(["cassettes: replayed * interactions"])
+    assert elapsed < 1.0
+
+    # auto replays when a cassette exists
+    run(suite).assert_outcomes(passed=3)
+
+
+def test_replay_without_recording_fails(suite) -> None:
+    """In replay mode an unrecorded request fails instead of reaching the network."""
+    result = run(suite, "--cassettes=replay")
+    result.assert_outcomes(failed=3)
+    result.stdout.fnmatch_lines(["*no recorded interaction for 'GET http://127.0.0.1:*"])
+    # Without cassettes, auto runs live
+    run(suite).assert_outcomes(passed=3)
+
+
+def test_rerecording_reports_drift(suite, site) -> None:
+    """Changed redirect targets and command output are reported as drift."""
+    run(suite, "--cassettes=record")
+    result = run(suite, "--cassettes=record", "--cassette-drift-fail")
+    assert result.ret == 0
+    assert "cassette drift" not in result.stdout.str()
+
+    site.target = "http://example.test"
+    suite.path.joinpath("value.txt").write_text("1 ")
+    result = run(suite, "--cassettes=record", "--cassette-drift-fail")
+    assert result.ret == 1
+    result.stdout.fnmatch_lines([
+        "*cassette drift*",
+        "GET */r/a: location 'https://example.test/r/a' -> 'http://example.test/r/a'",
+    ])
+    assert "output changed" in result.stdout.str()
+
+
+def test_unreachable_server_keeps_recording(suite, site) -> None:
+    """Recording while the server is down keeps the previous recording."""
+    run(suite, "--cassettes=record")
+    before = (suite.path / "cassettes" / "test_live.json.gz").read_bytes()
+    site.stop()
+    result = run(suite, "--cassettes=record")
+    result.stdout.fnmatch_lines(["cassettes: kept previous recording of test_live.py::test_follows_redirects*"])
+    # The command was re-recorded unchanged, the HTTP tests kept: same file
+    assert (suite.path / "cassettes" / "test_live.json.gz").read_bytes() == before
+
+
+def test_request_keys() -> None:
+    """Keys include the method, URL and a hash of the body or input."""
+    request = requests.Request("POST", "http://host/api?x=1", data=b"{}").prepare()
+    assert http_key(request).startswith("POST http://host/api?x=1 #")
+    assert command_key(["ssh", "host", "docker ps --filter 'name=x'"]) == \
+        "ssh host 'docker ps --filter '\"'\"'name=x'\"'\"''"
+    assert command_key(["cat"], "data") != command_key(["cat"], "other")
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+header_values = st.text(alphabet=st.characters(min_codepoint=0x20, max_codepoint=0x7E), max_size=20)
+
+
+# Feature: self-hosted-ai-coding-platform, Property 17: Cassette Replay Reproduces Recordings
+@settings(max_examples=100, deadline=None)
+@given(
+    exchanges=st.lists(st.tuples(
+        st.sampled_from(["/", "/api", "/health"]),
+        st.integers(min_value=200, max_value=599),
+        st.dictionaries(st.sampled_from(["Location", "Content-Type", "X-Custom"]), header_values),
+        st.binary(max_size=64),
+    ), min_size=1, max_size=8),
+)
+def test_cassette_replay_reproduces_recordings(tmp_path_factory, exchanges) -> None:
+    """
+    Property 17: Cassette Replay Reproduces Recordings
+
+    For any sequence of HTTP responses, recording them, saving and loading
+    the cassette and replaying the same requests should return the same
+    status codes, headers and bodies in the same order, with repeated
+    responses to a key collapsed and the last one repeating.
+
+    Validates: Requirements 9.1
+
+    Args:
+        exchanges: (path, status, headers, body) of each live response
+    """
+    path = tmp_path_factory.mktemp("cassettes") / "test.json.gz"
+    adapter = requests.adapters.HTTPAdapter()
+    live = iter(exchanges)
+
+    def original(adapter, request, **kwargs):
+        _, status, headers, body = next(live)
+        response = requests.Response()
+        response.status_code, response.reason = status, "R"
+        response.headers = requests.structures.CaseInsensitiveDict(headers)
+        response._content = body
+        return response
+
+    def prepare(url_path):
+        return requests.Request("GET", "http://host" + url_path).prepare()
+
+    recorder = Session(Cassette(path), "test", "record", [])
+    for url_path, *_ in exchanges:
+        recorder.send(adapter, original, prepare(url_path))
+    recorder.commit()
+    recorder.cassette.save()
+
+    player = Session(Cassette.load(path), "test", "replay", [])
+    expected = {}
+    for url_path, status, headers, body in exchanges:
+        responses = expected.setdefault(url_path, [])
+        if not responses or responses[-1] != (status, headers, body):
+            responses.append((status, headers, body))
+    for url_path, responses in expected.items():
+        # Property: the distinct responses come back in order, then the last repeats
+        for status, headers, body in responses + responses[-1:]:
+            replayed = player.send(adapter, original, prepare(url_path))
+            assert (replayed.status_code, dict(replayed.headers), replayed.content) == (status, headers, body)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,202 @@
+"""
+Tests for partial, shallow and sparse repository import.
+
+These tests import local bare repositories over ``file://`` and verify that
+only the blobs of the sparse paths are fetched, that the object cache is
+shared between projects and hydrated in the background, that projects work
+as normal git repositories, and that history depth is honoured.
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from aicoding.repo_import import RepoCache, RepoImporter, RepoImportError, _auth_env, git
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+DIRECTORIES = ["api", "web", "libs/common", "libs/extra", "docs"]
+
+
+def make_upstream(root: Path, commits: int = 3) -> str:
+    """A bare repository with ``commits`` commits touching every directory; returns its file:// URL."""
+    source = root / "source"
+    git(["init", "-q", "--initial-branch=main", str(source)])
+    for number in range(commits):
+        for directory in DIRECTORIES:
+            path = source / directory / f"file_{number}.txt"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(f"{directory} {number}\n" * (number + 1))
+        (source / "README.md").write_text(f"revision {number}\n")
+        git(["add", "-A"], source)
+        git(["-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", f"commit {number}"], source)
+    bare = root / "upstream.git"
+    git(["clone", "-q", "--bare", str(source), str(bare)])
+    # What GitHub enables: partial clone filters
+    git(["config", "uploadpack.allowFilter", "true"], bare)
+    return f"file://{bare}"
+
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace with an upstream repository."""
+    temp_dir = Path(tempfile.mkdtemp())
+    yield temp_dir
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@pytest.fixture(scope="module")
+def shared_upstream():
+    temp_dir = Path(tempfile.mkdtemp())
+    yield make_upstream(temp_dir)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def importer_for(root: Path) -> RepoImporter:
+    return RepoImporter(root / "projects", RepoCache(root / "cache"))
+
+
+def checked_out(project: Path) -> dict:
+    return {path.relative_to(project).as_posix(): path.read_text() for path in sorted(project.rglob("*"))
+            if path.is_file() and ".git" not in path.relative_to(project).parts}
+
+
+def local_objects(project: Path) -> int:
+    counts = dict(line.split(": ") for line in git(["count-objects", "-v"], project).splitlines())
+    return int(counts["count"]) + int(counts["in-pack"])
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_sparse_shallow_import_fetches_only_needed_blobs(temp_workspace) -> None:
+    url = make_upstream(temp_workspace)
+    importer = importer_for(temp_workspace)
+    result = importer.import_repo(url, "app", depth=1, sparse=["api", "libs/common"], hydrate=False)
+    project = Path(result.path)
+
+    assert sorted(checked_out(project)) == ["README.md", "api/file_0.txt", "api/file_1.txt", "api/file_2.txt",
+                                            "libs/common/file_0.txt", "libs/common/file_1.txt",
+                                            "libs/common/file_2.txt"]
+    assert result.blobs_fetched == 7 and result.branch == "main"
+    # Everything is borrowed from the cache; the rest of the tree is not downloaded
+    assert local_objects(project) == 0
+    cache_path = Path(result.cache)
+    # web, libs/extra and docs were not fetched
+    assert len(importer.cache.missing_blobs(cache_path, result.commit)) == 3 * 3
+    assert git(["log", "--format=%s"], project).split("\n")[:-1] == ["commit 2"]
+
+    # A normal repository: upstream as origin, clean, can commit
+    assert git(["config", "remote.origin.url"], project).strip() == url
+    assert git(["status", "--porcelain"], project) == ""
+    (project / "api" / "new.txt").write_text("agent\n")
+    git(["add", "api/new.txt"], project)
+    git(["-c", "user.name=a", "-c", "user.email=a@a", "commit", "-q", "-m", "agent change"], project)
+    assert git(["rev-parse", "HEAD~1"], project).strip() == result.commit
+
+    with pytest.raises(RepoImportError):
+        importer.import_repo(url, "app")
+    with pytest.raises(RepoImportError):
+        importer.import_repo(url, "other", branch="missing")
+    assert not (temp_workspace / "projects" / "other").exists()
+
+
+def test_cache_is_shared_and_hydrated_in_background(temp_workspace) -> None:
+    url = make_upstream(temp_workspace)
+    importer = importer_for(temp_workspace)
+    first = importer.import_repo(url, "first", sparse=["web"])
+    assert first.hydrating is not None
+    assert importer.hydrations["first"].wait(timeout=60) == 0
+    assert importer.cache.missing_blobs(Path(first.cache), first.commit) == []
+
+    # Upstream gone: widening the checkout and a second import only need the cache
+    os.rename(temp_workspace / "upstream.git", temp_workspace / "moved.git")
+    git(["sparse-checkout", "disable"], Path(first.path))
+    assert "docs/file_2.txt" in checked_out(Path(first.path))
+    with pytest.raises(RepoImportError):
+        importer.import_repo(url, "second")
+    os.rename(temp_workspace / "moved.git", temp_workspace / "upstream.git")
+    second = importer.import_repo(url, "second", hydrate=False)
+    assert second.blobs_fetched == 0 and second.cache == first.cache
+    assert checked_out(Path(second.path)) == checked_out(Path(first.path))
+    [status] = importer.cache.status(count_missing=True)
+    assert status.imports == ["first", "second"] and status.missing_blobs == 0 and not status.shallow
+
+
+def test_new_upstream_commits_are_fetched(temp_workspace) -> None:
+    url = make_upstream(temp_workspace, commits=2)
+    importer = importer_for(temp_workspace)
+    old = importer.import_repo(url, "old", depth=1, hydrate=False)
+    source = temp_workspace / "source"
+    (source / "api" / "later.txt").write_text("later\n")
+    git(["add", "-A"], source)
+    git(["-c", "user.name=t", "-c", "user.email=t@t", "commit", "-q", "-m", "later"], source)
+    git(["push", "-q", str(temp_workspace / "upstream.git"), "main"], source)
+
+    new = importer.import_repo(url, "new", hydrate=False)
+    assert new.commit != old.commit
+    assert (Path(new.path) / "api" / "later.txt").read_text() == "later\n"
+    # Full history requested: the cache was unshallowed
+    assert git(["rev-list", "--count", "HEAD"], Path(new.path)).strip() == "3"
+    # The first project still works from the cache
+    assert git(["status", "--porcelain"], Path(old.path)) == ""
+
+
+def test_token_only_sent_to_github() -> None:
+    assert _auth_env("file:///tmp/repo.git", "secret") == {}
+    assert _auth_env("https://gitlab.com/org/repo.git", "secret") == {}
+    env = _auth_env("https://github.com/org/repo.git", "secret")
+    assert env["GIT_CONFIG_KEY_0"] == "http.https://github.com/.extraheader"
+    assert "secret" not in env["GIT_CONFIG_VALUE_0"]
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 26: Sparse Import Matches The Upstream Tree
+@settings(max_examples=100, deadline=None)
+@given(sparse=st.lists(st.sampled_from(DIRECTORIES), unique=True, max_size=3),
+       depth=st.one_of(st.none(), st.integers(min_value=1, max_value=4)))
+def test_sparse_import_matches_the_upstream_tree(shared_upstream, sparse, depth) -> None:
+    """
+    Property 26: Sparse Import Matches The Upstream Tree
+
+    For any set of sparse directories and any history depth, an imported
+    project should contain exactly the upstream files below those
+    directories (plus top-level files), with the upstream content, and the
+    requested number of commits.
+
+    Validates: Requirements 5.1, 5.2
+
+    Args:
+        shared_upstream: file:// URL of the upstream repository
+        sparse: Directories to check out (empty: everything)
+        depth: Commits of history (None: all)
+    """
+    workspace = Path(tempfile.mkdtemp())
+    try:
+        result = importer_for(workspace).import_repo(shared_upstream, "app", depth=depth, sparse=sparse,
+                                                     hydrate=False)
+        upstream = Path(shared_upstream[len("file://"):])
+        listing = git(["ls-tree", "-r", "--name-only", "main"], upstream).split()
+        expected = {path: git(["show", f"main:{path}"], upstream) for path in listing
+                    if not sparse or "/" not in path or any(path.startswith(d + "/") for d in sparse)}
+        # Property: the same files with the same content, and the requested history
+        assert checked_out(Path(result.path)) == expected
+        commits = int(git(["rev-list", "--count", "HEAD"], Path(result.path)))
+        assert commits == (min(depth, 3) if depth else 3)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
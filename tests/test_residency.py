@@ -0,0 +1,285 @@
+"""
+Tests for the model residency manager.
+
+These tests run the manager against a fake Ollama that simulates model
+memory and load times, and verify budgeting, eviction, the swap-storm
+rejections and the event log.
+"""
+
+import json
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+import requests
+from hypothesis import given, settings, strategies as st
+
+from aicoding.fake_ollama import FakeOllama
+from aicoding.residency import GIB, LOAD, READY, REJECT, ResidencyManager, ResidencyRejected
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield Path(temp_dir)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+HOST_BYTES = 20 * GIB
+OTHER_BYTES = 3 * GIB
+SIZES = {"big": 11 * GIB, "small": 5 * GIB, "tiny": 1 * GIB}
+
+
+class Clock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def fake_server(**kwargs) -> FakeOllama:
+    # 11 GiB loads in ~0.05 s
+    return FakeOllama(models=list(SIZES), memory_bytes=HOST_BYTES, model_sizes=SIZES,
+                      load_bytes_per_second=200 * GIB, **kwargs)
+
+
+def make_manager(fake: FakeOllama, **kwargs) -> ResidencyManager:
+    """Manager whose telemetry reflects the fake's resident models."""
+    def meminfo():
+        return {"MemTotal": HOST_BYTES, "MemAvailable": HOST_BYTES - OTHER_BYTES - fake.resident_bytes()}
+    kwargs.setdefault("reserve_bytes", 2 * GIB)
+    kwargs.setdefault("clock", Clock())
+    return ResidencyManager(fake.url, meminfo_reader=meminfo, **kwargs)
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_fake_ollama_simulates_loads_and_eviction() -> None:
+    """Requests load models, evicting least recently used ones when full."""
+    with fake_server() as fake:
+        chat = {"messages": [{"role": "user", "content": "hi"}], "stream": False,
+                "options": {"num_predict": 1}}
+        first = requests.post(f"{fake.url}/api/chat", json=dict(chat, model="big"), timeout=10).json()
+        assert first["load_duration"] > 0
+        again = requests.post(f"{fake.url}/api/chat", json=dict(chat, model="big"), timeout=10).json()
+        assert again["load_duration"] == 0
+
+        requests.post(f"{fake.url}/api/generate", json={"model": "small"}, timeout=10)
+        assert fake.resident_bytes() == 16 * GIB
+        # 11 + 5 + 11 > 20: a second big model would evict the LRU one
+        fake.model_sizes["big2"] = 11 * GIB
+        requests.post(f"{fake.url}/api/generate", json={"model": "big2"}, timeout=10)
+        assert [entry["name"] for entry in fake.loaded] == ["small", "big2"]
+        assert fake.evictions == 1
+
+        reply = requests.post(f"{fake.url}/api/generate", json={"model": "small", "keep_alive": 0},
+                              timeout=10).json()
+        assert reply["done_reason"] == "unload"
+        assert [entry["name"] for entry in requests.get(f"{fake.url}/api/ps").json()["models"]] == ["big2"]
+
+
+def test_budget_and_footprints_come_from_telemetry() -> None:
+    """Budget is available memory plus resident models minus the reserve."""
+    with fake_server() as fake:
+        manager = make_manager(fake)
+        manager.refresh()
+        assert manager.budget() == HOST_BYTES - OTHER_BYTES - 2 * GIB
+        # Before loading, the size is estimated from the size on disk
+        manager.plan("small")
+        assert manager.footprint("small") == int(int(5 * GIB * 0.8) * 1.25)
+
+        with manager.acquire("small") as decision:
+            assert decision.action == LOAD
+        manager.refresh()
+        assert manager.footprint("small") == 5 * GIB
+        # Resident memory is not counted against the budget twice
+        assert manager.budget() == HOST_BYTES - OTHER_BYTES - 2 * GIB
+
+        capped = make_manager(fake, budget_bytes=4 * GIB)
+        assert capped.budget() == 4 * GIB
+        assert capped.plan("big").action == REJECT
+
+
+def test_models_that_fit_stay_resident() -> None:
+    """Alternating between models that fit together loads each once."""
+    with fake_server() as fake:
+        manager = make_manager(fake)
+        for model in ["small", "tiny", "small", "tiny", "small"]:
+            with manager.acquire(model):
+                pass
+        assert fake.loads == 2
+        assert fake.unloads == 0
+        assert manager.plan("tiny").action == READY
+
+
+def test_idle_lru_model_is_evicted_and_logged(temp_workspace) -> None:
+    """Loading a model that does not fit unloads the least recently used idle model."""
+    log = temp_workspace / "events.jsonl"
+    with fake_server() as fake:
+        clock = Clock()
+        manager = make_manager(fake, clock=clock, event_log=log)
+        with manager.acquire("small"):
+            pass
+        with manager.acquire("tiny"):
+            pass
+        clock.now += 300
+        with manager.acquire("big") as decision:
+            assert decision.evict == ["small"]
+        assert {entry["name"] for entry in fake.loaded} == {"tiny", "big"}
+        # The manager freed memory first: Ollama never had to evict on its own
+        assert fake.evictions == 0
+
+    events = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [(e["action"], e["model"]) for e in events] == [
+        ("load", "small"), ("load", "tiny"), ("unload", "small"), ("load", "big")]
+    assert all(event["seconds"] > 0 for event in events)
+    assert events[-1]["size"] == 11 * GIB
+    assert "small" in events[-1]["reason"]
+
+
+def test_swap_storms_are_rejected() -> None:
+    """Recently loaded, busy or rate-limited models are not evicted."""
+    with fake_server() as fake:
+        clock = Clock()
+        manager = make_manager(fake, clock=clock, min_residency_seconds=60, max_swaps=2,
+                               swap_window_seconds=1000)
+        with manager.acquire("big"):
+            pass
+
+        # Loaded 10 s ago: evicting it for "small" + "tiny" would thrash
+        clock.now += 10
+        with manager.acquire("tiny"):
+            pass
+        clock.now += 10
+        with pytest.raises(ResidencyRejected) as excinfo:
+            with manager.acquire("small"):
+                pass
+        assert excinfo.value.retry_after == pytest.approx(40)
+
+        # In flight: never evicted, however old
+        clock.now += 100
+        release = threading.Event()
+        entered = threading.Event()
+
+        def serve_big():
+            with manager.acquire("big"):
+                entered.set()
+                release.wait(10)
+
+        worker = threading.Thread(target=serve_big)
+        worker.start()
+        entered.wait(10)
+        with pytest.raises(ResidencyRejected, match="busy"):
+            with manager.acquire("small"):
+                pass
+        release.set()
+        worker.join()
+
+        # Swap rate limit: two evicting loads, then rejections until the window passes
+        for model in ["small", "big"]:
+            clock.now += 100
+            with manager.acquire(model) as decision:
+                assert decision.evict
+        clock.now += 100
+        with pytest.raises(ResidencyRejected, match="swap limit") as excinfo:
+            with manager.acquire("small"):
+                pass
+        assert excinfo.value.retry_after > 0
+        assert manager.events[-1].action == REJECT
+        clock.now += 1000
+        with manager.acquire("small"):
+            pass
+
+        # Never fits
+        manager.footprints["huge-model"] = 40 * GIB
+        with pytest.raises(ResidencyRejected, match="budget"):
+            with manager.acquire("huge-model"):
+                pass
+
+
+def test_unload_idle_keeps_pinned_and_recent_models() -> None:
+    """Only unpinned models idle for long enough are unloaded."""
+    with fake_server() as fake:
+        clock = Clock()
+        manager = make_manager(fake, clock=clock, pinned=["tiny"])
+        for model in ["tiny", "small"]:
+            with manager.acquire(model):
+                pass
+        clock.now += 1000
+        assert manager.unload_idle(600) == ["small"]
+        assert [entry["name"] for entry in fake.loaded] == ["tiny"]
+        status = manager.status()
+        assert status["used_bytes"] == 1 * GIB
+        assert status["resident"][0]["model"] == "tiny"
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 14: Model Residency Stays Within Budget
+@settings(max_examples=100, deadline=None)
+@given(
+    sizes=st.lists(st.integers(min_value=1, max_value=12), min_size=2, max_size=4),
+    requests_seq=st.lists(st.tuples(st.integers(min_value=0, max_value=3),
+                                    st.integers(min_value=0, max_value=200)), max_size=15),
+)
+def test_model_residency_stays_within_budget(sizes, requests_seq) -> None:
+    """
+    Property 14: Model Residency Stays Within Budget
+
+    For any model sizes and any sequence of requests, the models the manager
+    keeps loaded should never exceed the memory budget, a served request's
+    model should be resident while it runs, Ollama should never have to
+    evict a model on its own, and every load and unload should be recorded.
+
+    Validates: Requirements 2.2
+
+    Args:
+        sizes: Model sizes in GiB
+        requests_seq: (model index, seconds since the previous request) pairs
+    """
+    models = {f"m{i}": size * GIB for i, size in enumerate(sizes)}
+    budget = 15 * GIB
+    fake = FakeOllama(models=list(models), memory_bytes=HOST_BYTES, model_sizes=models,
+                      load_bytes_per_second=1e15).start()
+    try:
+        clock = Clock()
+        manager = make_manager(fake, clock=clock, budget_bytes=budget, min_residency_seconds=30,
+                               max_swaps=3, swap_window_seconds=300)
+        for index, gap in requests_seq:
+            model = f"m{index % len(sizes)}"
+            clock.now += gap
+            try:
+                with manager.acquire(model):
+                    # Property: the requested model is resident while serving
+                    assert model in {entry["name"] for entry in fake.loaded}
+            except ResidencyRejected:
+                assert fake.resident_bytes() + manager.footprint(model) > budget
+
+            # Property: resident models fit in the budget
+            assert fake.resident_bytes() <= budget
+
+        # Property: the manager made every eviction and logged every transition
+        assert fake.evictions == 0
+        actions = [event.action for event in manager.events]
+        assert actions.count("load") == fake.loads
+        assert actions.count("unload") == fake.unloads
+    finally:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,295 @@
+"""
+Tests for the runtime warm pool.
+
+These tests run the pool and its Docker socket proxy against the fake
+Docker API, verifying hand-off latency, replenishing, reaping of idle and
+leaked runtimes and that only ready, matching runtimes are handed out.
+"""
+
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from aicoding.fake_docker import FakeDocker
+from aicoding.runtime_pool import (
+    POOL_LABEL,
+    RUNTIME_PREFIX,
+    WARM_PREFIX,
+    DockerAPI,
+    DockerError,
+    DockerProxy,
+    RuntimePool,
+    fingerprint,
+    fixed_host_ports,
+    is_ready,
+)
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield Path(temp_dir)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def runtime_config(image: str = "runtime:1", port: int = 30000, session_key: str = "key1",
+                   host_port: str = "") -> dict:
+    """A runtime create request; ``host_port`` "" lets Docker pick the published port."""
+    return {"Image": image, "Env": [f"port={port}", f"SESSION_API_KEY={session_key}", "DEBUG=false"],
+            "Cmd": ["python", "-m", "openhands.runtime.action_execution_server", str(port)],
+            "Hostname": "runtime", "ExposedPorts": {f"{port}/tcp": {}},
+            "HostConfig": {"PortBindings": {f"{port}/tcp": [{"HostPort": host_port}]}, "Memory": 1 << 30},
+            "Healthcheck": {"Test": ["CMD", "true"]}, "Labels": {"app": "openhands"}}
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_fingerprint_ignores_host_name_and_pool_labels() -> None:
+    config = runtime_config()
+    relabeled = dict(config, Hostname="elsewhere", Labels={"app": "openhands", POOL_LABEL: "warm"})
+    assert fingerprint(config) == fingerprint(relabeled)
+    assert fingerprint(config) != fingerprint(runtime_config("runtime:2"))
+    assert fingerprint(config) != fingerprint(dict(config, Env=["port=30000", "DEBUG=true"]))
+    assert fingerprint(config) != fingerprint(dict(config, HostConfig={"Memory": 2 << 30}))
+
+
+def test_fingerprint_keeps_session_key_and_ports_unless_asked_not_to() -> None:
+    config = runtime_config()
+    for other in (runtime_config(session_key="key2"), runtime_config(port=31234),
+                  runtime_config(host_port="30000")):
+        assert fingerprint(config) != fingerprint(other)
+        assert fingerprint(config, per_session=False) == fingerprint(other, per_session=False)
+    assert fingerprint(config, per_session=False) != fingerprint(runtime_config("runtime:2"), per_session=False)
+
+
+def test_fixed_host_ports_leaves_out_ports_docker_picks() -> None:
+    assert fixed_host_ports(runtime_config()) == []
+    assert fixed_host_ports(runtime_config(host_port="30000")) == ["30000"]
+    assert fixed_host_ports({"Image": "runtime:1"}) == []
+
+
+def test_pool_hands_off_faster_than_cold_boot_and_replenishes(temp_workspace) -> None:
+    with FakeDocker(str(temp_workspace / "docker.sock"), boot_seconds=0.3) as docker:
+        api = DockerAPI(docker.url)
+        pool = RuntimePool(api, runtime_config(), size=2, idle_timeout=0, interval=0.05).start()
+        try:
+            assert pool.wait_warm(timeout=5)
+            container_id = pool.claim(RUNTIME_PREFIX + "session1")
+            assert container_id is not None
+            assert docker.names()[RUNTIME_PREFIX + "session1"] == "running"
+            assert is_ready(api.inspect(container_id))
+            # The claimed runtime is replaced in the background
+            assert pool.wait_warm(timeout=5)
+            status = pool.status()
+            assert status["hits"] == 1 and status["ready"] == 2
+            latency = status["session_start_ms"]
+            assert latency["without_pool_p50"] >= 300
+            assert latency["with_pool_p50"] < latency["without_pool_p50"] / 10
+        finally:
+            pool.stop()
+        assert [name for name in docker.names() if name.startswith(WARM_PREFIX)] == []
+
+
+def test_claim_without_ready_runtime_misses(temp_workspace) -> None:
+    with FakeDocker(str(temp_workspace / "docker.sock"), boot_seconds=60) as docker:
+        pool = RuntimePool(DockerAPI(docker.url), runtime_config(), size=1, idle_timeout=0).start()
+        try:
+            assert pool.claim(RUNTIME_PREFIX + "session1") is None
+            assert pool.status()["misses"] == 1
+        finally:
+            pool.stop()
+
+
+def test_reap_removes_idle_and_leaked_runtimes_of_the_pool(temp_workspace) -> None:
+    clock = FakeClock()
+    with FakeDocker(str(temp_workspace / "docker.sock")) as docker:
+        api = DockerAPI(docker.url)
+        pooled = dict(runtime_config(), Labels={"app": "openhands", POOL_LABEL: "warm"})
+        for name in ("idle", "busy", "crashed"):
+            api.start(api.create(pooled, RUNTIME_PREFIX + name))
+        # Runtimes OpenHands created itself, one of a closed conversation
+        for name in ("own-idle", "closed"):
+            api.start(api.create(runtime_config(), RUNTIME_PREFIX + name))
+        api.create(pooled, WARM_PREFIX + "orphan")
+        api.create(runtime_config(), "unrelated")
+        docker.exit(RUNTIME_PREFIX + "crashed")
+        docker.exit(RUNTIME_PREFIX + "closed")
+        docker.busy.add(RUNTIME_PREFIX + "busy")
+        pool = RuntimePool(api, size=0, idle_timeout=600, leak_grace=120, clock=clock)
+        kept = {RUNTIME_PREFIX + "own-idle", RUNTIME_PREFIX + "closed", "unrelated"}
+
+        pool.reap()
+        assert set(docker.names()) == {RUNTIME_PREFIX + name for name in ("idle", "busy", "crashed")} | kept
+
+        clock.now += 601
+        pool.reap()
+        assert set(docker.names()) == {RUNTIME_PREFIX + "busy"} | kept
+        assert pool.stats.reaped_idle == 1 and pool.stats.reaped_leaked == 2
+        assert pool.stats.freed_bytes == docker.memory_bytes
+
+
+def test_template_change_recycles_warm_runtimes(temp_workspace) -> None:
+    with FakeDocker(str(temp_workspace / "docker.sock"), boot_seconds=0.05) as docker:
+        api = DockerAPI(docker.url)
+        pool = RuntimePool(api, runtime_config(), size=2, idle_timeout=0, interval=0.05).start()
+        try:
+            assert pool.wait_warm(timeout=5)
+            assert pool.set_template(runtime_config("runtime:2"))
+            assert pool.wait_warm(timeout=5)
+            images = {api.inspect(runtime.id)["Config"]["Image"] for runtime in pool.warm}
+            assert images == {"runtime:2"}
+            assert pool.status()["recycled"] == 2
+        finally:
+            pool.stop()
+
+
+def test_proxy_hands_off_matching_creates_and_passes_others_through(temp_workspace) -> None:
+    with FakeDocker(str(temp_workspace / "docker.sock"), boot_seconds=0.05) as docker:
+        pool = RuntimePool(DockerAPI(docker.url), size=1, idle_timeout=0, interval=0.05).start()
+        proxy = DockerProxy(pool, str(temp_workspace / "proxy.sock"), docker.url)
+        try:
+            with proxy:
+                client = DockerAPI(f"unix://{proxy.path}")
+                # The first runtime create teaches the pool the template
+                first = client.create(runtime_config(), RUNTIME_PREFIX + "session1")
+                client.start(first)
+                assert pool.wait_warm(timeout=5)
+
+                warm_ids = {runtime.id for runtime in pool.warm}
+                request = dict(runtime_config(), Hostname="session2")
+                second = client.create(request, RUNTIME_PREFIX + "session2")
+                client.start(second)
+                assert second in warm_ids
+                handed_off = client.inspect(RUNTIME_PREFIX + "session2")
+                assert is_ready(handed_off)
+                assert handed_off["Name"] == "/" + RUNTIME_PREFIX + "session2"
+
+                other = client.create({"Image": "postgres"}, "database")
+                assert client.inspect(other)["Config"]["Image"] == "postgres"
+                assert client.request("GET", "/_pool/status")["hits"] == 1
+        finally:
+            pool.stop()
+
+
+def test_handed_off_runtime_has_the_requested_key_and_ports(temp_workspace) -> None:
+    with FakeDocker(str(temp_workspace / "docker.sock"), boot_seconds=0.05) as docker:
+        pool = RuntimePool(DockerAPI(docker.url), runtime_config(), size=1, idle_timeout=0, interval=0.05).start()
+        proxy = DockerProxy(pool, str(temp_workspace / "proxy.sock"), docker.url)
+        try:
+            with proxy:
+                client = DockerAPI(f"unix://{proxy.path}")
+                assert pool.wait_warm(timeout=5)
+                request = runtime_config()
+                handed_off = client.inspect(client.create(request, RUNTIME_PREFIX + "session1"))["Config"]
+                assert handed_off["Env"] == request["Env"] and handed_off["Cmd"] == request["Cmd"]
+                assert handed_off["ExposedPorts"] == request["ExposedPorts"]
+                assert handed_off["HostConfig"]["PortBindings"] == request["HostConfig"]["PortBindings"]
+                assert pool.wait_warm(timeout=5)
+
+                # Another session's key and ports: created as asked, and warming stops
+                warm_ids = {runtime.id for runtime in pool.warm}
+                request = runtime_config(port=30001, session_key="key2")
+                created = client.inspect(client.create(request, RUNTIME_PREFIX + "session2"))
+                assert created["Id"] not in warm_ids
+                assert created["Config"]["Env"] == request["Env"]
+                assert created["Config"]["ExposedPorts"] == request["ExposedPorts"]
+                status = client.request("GET", "/_pool/status")
+                assert status["hits"] == 1 and status["misses"] == 1
+                assert "per session" in status["disabled"] and status["ready"] == 0
+                assert pool.template == runtime_config()
+                assert not any(name.startswith(WARM_PREFIX) for name in docker.names())
+        finally:
+            pool.stop()
+
+
+def test_pool_does_not_warm_runtimes_publishing_fixed_host_ports(temp_workspace) -> None:
+    with FakeDocker(str(temp_workspace / "docker.sock"), boot_seconds=0.05) as docker:
+        api = DockerAPI(docker.url)
+        config = runtime_config(host_port="30000")
+        pool = RuntimePool(api, config, size=2, idle_timeout=0, interval=0.05).start()
+        try:
+            assert pool.fill() == 0
+            assert "30000" in pool.status()["disabled"]
+            assert not any(name.startswith(WARM_PREFIX) for name in docker.names())
+        finally:
+            pool.stop()
+        # Copies of it could not all run: the host port is taken by the first
+        api.start(api.create(config, RUNTIME_PREFIX + "session1"))
+        with pytest.raises(DockerError, match="port is already allocated"):
+            api.start(api.create(config, RUNTIME_PREFIX + "session2"))
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 21: Pool Never Hands Out Unready Or Mismatched Runtimes
+@settings(max_examples=100, deadline=None)
+@given(steps=st.lists(st.sampled_from(["claim", "claim", "new-image", "crash-warm"]), min_size=1, max_size=6))
+def test_pool_never_hands_out_unready_or_mismatched_runtimes(steps) -> None:
+    """
+    Property 21: Pool Never Hands Out Unready Or Mismatched Runtimes
+
+    For any interleaving of session starts, runtime image changes and warm
+    runtimes crashing, every runtime the pool hands out should be running,
+    healthy and built from the current template, and stopping the pool
+    should leave no warm runtime behind.
+
+    Validates: Requirements 2.5, 8.2
+
+    Args:
+        steps: Sequence of events
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        with FakeDocker(str(Path(temp_dir) / "docker.sock"), create_seconds=0, boot_seconds=0.02) as docker:
+            api = DockerAPI(docker.url)
+            image = 1
+            pool = RuntimePool(api, runtime_config(f"runtime:{image}"), size=2, idle_timeout=0,
+                               interval=0.02).start()
+            try:
+                for number, step in enumerate(steps):
+                    if step == "new-image":
+                        image += 1
+                        pool.set_template(runtime_config(f"runtime:{image}"))
+                    elif step == "crash-warm":
+                        for name in docker.names():
+                            if name.startswith(WARM_PREFIX):
+                                docker.exit(name)
+                                break
+                    else:
+                        time.sleep(0.01)
+                        container_id = pool.claim(f"{RUNTIME_PREFIX}session{number}")
+                        if container_id is not None:
+                            container = api.inspect(container_id)
+                            # Property: handed-out runtimes are ready and current
+                            assert is_ready(container)
+                            assert container["Config"]["Image"] == f"runtime:{image}"
+            finally:
+                pool.stop()
+            assert [name for name in docker.names() if name.startswith(WARM_PREFIX)] == []
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -8,6 +8,9 @@ import subprocess
 import time
 import pytest
 
+# ssh calls are recorded and replayed from tests/cassettes (see replay.py)
+pytestmark = pytest.mark.cassette(commands=["ssh"])
+
 # Service names that should have auto-restart enabled
 SERVICES = ["ollama", "openhands"]
 
@@ -0,0 +1,242 @@
+"""
+Tests for copy-on-write project snapshots.
+
+These tests snapshot synthetic projects in a temporary workspace and verify
+that data is shared instead of copied, that restores only touch what
+changed, the retention ring, the batching write hook of the file service,
+and that snapshot files rewritten in place are reported instead of restored.
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from aicoding.file_service import FileService
+from aicoding.snapshots import MODES, SnapshotError, SnapshotStore
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    workspace = Path(temp_dir)
+    (workspace / "projects").mkdir()
+    yield workspace
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def make_project(workspace: Path, name: str = "app") -> Path:
+    project = workspace / "projects" / name
+    for rel_path, content in {
+        "README.md": "# app\n", "src/main.py": "print('hello')\n", "src/util.py": "X = 1\n",
+        ".git/HEAD": "ref: refs/heads/main\n", "node_modules/dep/index.js": "module.exports = 1\n",
+    }.items():
+        path = project / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    os.chmod(project / "src/main.py", 0o755)
+    os.symlink("src/main.py", project / "run")
+    return project
+
+
+def tree_state(root: Path, skip: str = "node_modules") -> dict:
+    """Everything below ``root`` (except ``skip``) as path -> description."""
+    state = {}
+    for path in sorted(root.rglob("*")):
+        rel_path = path.relative_to(root).as_posix()
+        if rel_path.split("/")[0] == skip:
+            continue
+        if path.is_symlink():
+            state[rel_path] = ("link", os.readlink(path))
+        elif path.is_dir():
+            state[rel_path] = ("dir",)
+        else:
+            state[rel_path] = ("file", path.read_bytes(), path.stat().st_mode & 0o777)
+    return state
+
+
+def store_for(workspace: Path, **kwargs) -> SnapshotStore:
+    return SnapshotStore(workspace / "snapshots", workspace / "projects", **kwargs)
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_restore_touches_only_what_changed(temp_workspace) -> None:
+    project = make_project(temp_workspace)
+    store = store_for(temp_workspace)
+    original = tree_state(project)
+    snapshot = store.take("app", label="before agent")
+    assert snapshot.files == 4 and snapshot.mode in MODES
+
+    with FileService(project) as service:
+        service.write("src/main.py", "print('broken')\n")
+        service.create("src/new/generated.py", "x = 2\n")
+    (project / "README.md").unlink()
+    (project / "run").unlink()
+    os.symlink("src/util.py", project / "run")
+    (project / "node_modules/dep/index.js").write_text("changed by npm\n")
+
+    changes = store.diff("app", snapshot.id)
+    assert sorted(changes.changed) == ["run", "src/main.py"]
+    assert changes.missing == ["README.md"]
+    assert sorted(changes.extra) == ["src/new", "src/new/generated.py"]
+    assert changes.unchanged == 2
+
+    modified = tree_state(project)
+    report = store.restore("app", snapshot.id)
+    assert tree_state(project) == original
+    assert sorted(report.restored) == ["README.md", "run", "src/main.py"]
+    assert sorted(report.removed) == ["src/new", "src/new/generated.py"]
+    assert report.unchanged == 2
+    # Dependency caches are not part of snapshots
+    assert (project / "node_modules/dep/index.js").read_text() == "changed by npm\n"
+
+    # The state before the restore was kept, so the restore can be undone
+    assert store.restore("app", report.backup).restored
+    assert tree_state(project) == modified
+
+
+def test_snapshot_shares_file_data(temp_workspace) -> None:
+    project = make_project(temp_workspace)
+    shared = store_for(temp_workspace).take("app")
+    tree = temp_workspace / "snapshots/app" / shared.id / "tree"
+    if shared.mode == "hardlink":
+        assert os.stat(tree / "src/util.py").st_ino == os.stat(project / "src/util.py").st_ino
+    copied = store_for(temp_workspace, mode="copy").take("app")
+    assert copied.mode == "copy"
+    copy_tree = temp_workspace / "snapshots/app" / copied.id / "tree"
+    assert os.stat(copy_tree / "src/util.py").st_ino != os.stat(project / "src/util.py").st_ino
+    assert (copy_tree / "src/util.py").read_text() == "X = 1\n"
+    assert os.readlink(copy_tree / "run") == "src/main.py"
+    with pytest.raises(SnapshotError):
+        store_for(temp_workspace).take("missing")
+
+
+def test_retention_ring_and_write_batches(temp_workspace) -> None:
+    project = make_project(temp_workspace)
+    store = store_for(temp_workspace, retention=3, batch_seconds=3600)
+    for _ in range(5):
+        store.take("app")
+    assert [snapshot.id for snapshot in store.list("app")] == ["000003", "000004", "000005"]
+
+    store = store_for(temp_workspace, retention=10, batch_seconds=3600)
+    with FileService(project, before_write=store.before_write) as service:
+        service.write("src/main.py", "print(1)\n")
+        service.replace_lines("src/util.py", 1, 1, "X = 2")
+    snapshots = store.list("app")
+    # One snapshot for the batch, taken before its first write
+    assert len(snapshots) == 4 and snapshots[-1].label == "before writing src/main.py"
+    tree = temp_workspace / "snapshots/app" / snapshots[-1].id / "tree"
+    assert (tree / "src/main.py").read_text() == "print('hello')\n"
+    assert store.before_write(temp_workspace / "projects") is None
+
+    store.batch_seconds = 0
+    with FileService(project, before_write=store.before_write) as service:
+        service.write("src/main.py", "print(2)\n")
+        service.write("src/main.py", "print(3)\n")
+    assert len(store.list("app")) == 6
+
+
+def test_restore_oldest_snapshot_at_full_retention(temp_workspace) -> None:
+    project = make_project(temp_workspace)
+    store = store_for(temp_workspace, retention=2)
+    original = tree_state(project)
+    oldest = store.take("app")
+    with FileService(project) as service:
+        service.write("src/main.py", "print('second')\n")
+        service.create("src/extra.py", "Y = 2\n")
+        store.take("app")
+        service.write("README.md", "# changed\n")
+
+    # The backup fills the ring past its size while the oldest snapshot is still being read
+    report = store.restore("app", oldest.id)
+    assert tree_state(project) == original
+    assert report.removed == ["src/extra.py"]
+    assert [snapshot.id for snapshot in store.list("app")] == ["000002", report.backup]
+
+
+def test_files_rewritten_in_place_are_reported(temp_workspace) -> None:
+    project = make_project(temp_workspace)
+    store = store_for(temp_workspace, mode="hardlink")
+    snapshot = store.take("app")
+    if snapshot.mode != "hardlink":
+        pytest.skip("hardlinks not available here")
+    (project / "src/util.py").unlink()
+    # Truncates and rewrites the shared inode, not a new file
+    with open(project / "src/main.py", "r+") as handle:
+        handle.write("#")
+    assert store.verify("app") == {snapshot.id: ["src/main.py"]}
+    with pytest.raises(SnapshotError, match="src/main.py"):
+        store.restore("app", snapshot.id)
+    # Nothing was changed by the refused restore
+    assert not (project / "src/util.py").exists()
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+names = st.sampled_from(["a.py", "b.txt", "sub/c.py", "sub/deeper/d.md", "e"])
+
+
+# Feature: self-hosted-ai-coding-platform, Property 25: Restore Returns The Snapshot State
+@settings(max_examples=100, deadline=None)
+@given(initial=st.dictionaries(names, st.binary(max_size=64), min_size=1),
+       actions=st.lists(st.tuples(st.sampled_from(["write", "delete", "chmod"]), names, st.binary(max_size=64)),
+                        max_size=8),
+       mode=st.sampled_from(MODES))
+def test_restore_returns_the_snapshot_state(initial, actions, mode) -> None:
+    """
+    Property 25: Restore Returns The Snapshot State
+
+    For any project and any sequence of agent writes, deletions and mode
+    changes after a snapshot, restoring the snapshot should bring back
+    exactly the snapshotted tree, touching only the paths that differ.
+
+    Validates: Requirements 4.2, 4.3
+
+    Args:
+        initial: Files of the project when the snapshot is taken
+        actions: (action, path, content) changes made afterwards
+        mode: Preferred way of sharing file data
+    """
+    workspace = Path(tempfile.mkdtemp())
+    try:
+        project = workspace / "projects" / "app"
+        project.mkdir(parents=True)
+        store = store_for(workspace, mode=mode)
+        with FileService(project) as service:
+            for rel_path, content in initial.items():
+                service.create(rel_path, content.decode("latin-1"))
+            snapshot = store.take("app")
+            original = tree_state(project)
+            for action, rel_path, content in actions:
+                if action == "write":
+                    service.write(rel_path, content.decode("latin-1"))
+                elif (project / rel_path).exists():
+                    if action == "delete":
+                        (project / rel_path).unlink()
+                    else:
+                        os.chmod(project / rel_path, 0o700)
+        changes = store.diff("app", snapshot.id)
+        report = store.restore("app", snapshot.id)
+        # Property: the snapshotted tree, with only differing paths touched
+        assert tree_state(project) == original
+        assert len(report.restored) + len(report.removed) == \
+            len(changes.changed) + len(changes.missing) + len(changes.extra)
+    finally:
+        shutil.rmtree(workspace, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
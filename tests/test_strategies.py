@@ -0,0 +1,118 @@
+"""
+Tests for the shared Hypothesis strategies.
+
+These tests verify that the strategies only produce valid names, never
+reject an example, and reach their edge cases.
+"""
+
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+from hypothesis import find, given, settings
+from hypothesis.internal.observability import with_observability_callback
+
+from strategies import (
+    DEEP_MAX_DEPTH,
+    EXTENSIONS,
+    NAME_MAX,
+    commit_messages,
+    path_components,
+    project_names,
+    relative_paths,
+)
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+def is_valid_component(name: str) -> bool:
+    return (0 < len(name.encode("utf-8")) <= NAME_MAX and name not in (".", "..")
+            and not name.startswith(".") and not name.endswith(".")
+            and all(char.isalnum() or char in "-_." for char in name))
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_edge_cases_are_reachable() -> None:
+    """Deep, non-ASCII and maximum-length examples are generated."""
+    assert len(find(relative_paths(), lambda p: len(p.parts) > 8).parts) > 8
+    assert len(find(path_components(), lambda n: len(n.encode("utf-8")) == NAME_MAX).encode()) == NAME_MAX
+    assert not find(project_names(), lambda n: not n.isascii()).isascii()
+    assert len(find(project_names(), lambda n: len(n) == 50)) == 50
+    assert len(find(commit_messages(), lambda m: len(m.split()) == 10).split()) == 10
+
+
+def test_strategies_never_reject_examples() -> None:
+    """No generated example is discarded by a filter or assume."""
+    observations = []
+
+    @settings(max_examples=200, database=None, deadline=None)
+    @given(path=relative_paths(), project=project_names(), message=commit_messages())
+    def consume(path, project, message):
+        pass
+
+    with with_observability_callback(observations.append):
+        consume()
+    statuses = [getattr(obs, "status", None) for obs in observations]
+    # The engine may still overrun its size limit on its own; nothing is filtered
+    assert not [obs for obs in observations
+                if getattr(obs, "status", None) == "gave_up" and "satisfy" in obs.status_reason]
+    assert statuses.count("passed") >= 200
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 15: Generated Workspace Names Are Valid
+@settings(max_examples=100, deadline=None)
+@given(relative_path=relative_paths(), project_name=project_names(), message=commit_messages())
+def test_generated_workspace_names_are_valid(relative_path, project_name, message) -> None:
+    """
+    Property 15: Generated Workspace Names Are Valid
+
+    For any generated relative path, project name and commit message, every
+    path component should be a usable file name, the file should carry a
+    known extension, the path should be creatable inside a workspace, the
+    project name should start and end with a letter or digit, and the
+    commit message should have at least two words.
+
+    Validates: Requirements 4.1, 5.2, 5.3
+
+    Args:
+        relative_path: Generated relative file path
+        project_name: Generated project name
+        message: Generated commit message
+    """
+    # Property: components are valid names and the file has an extension
+    assert 1 <= len(relative_path.parts) <= DEEP_MAX_DEPTH
+    assert all(is_valid_component(part) for part in relative_path.parts)
+    assert relative_path.suffix[1:] in EXTENSIONS
+
+    # Property: the path can be created
+    temp_workspace = Path(tempfile.mkdtemp(prefix="test_workspace_"))
+    try:
+        file_path = temp_workspace / relative_path
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text("x", encoding="utf-8")
+        assert file_path.relative_to(temp_workspace).parts == relative_path.parts
+    finally:
+        shutil.rmtree(temp_workspace, ignore_errors=True)
+
+    # Property: project names start and end with a letter or digit
+    assert 1 <= len(project_name) <= 50
+    assert project_name[0].isalnum() and project_name[-1].isalnum()
+    assert all(char.isalnum() or char in "-_" for char in project_name)
+
+    # Property: commit messages have at least two words
+    assert 2 <= len(message.split()) <= 10
+    assert message == message.strip()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,209 @@
+"""
+Tests for the tokenizer-aware prompt budgeter.
+
+These tests verify that prompts are fitted to the per-model budget, that
+recent and relevant content is preferred, and that token counts are cached.
+"""
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from aicoding.models import ModelProfile, get_profile, normalize_model_name
+from aicoding.token_budget import (
+    ContextItem,
+    HeuristicTokenizer,
+    PromptBudgeter,
+    TokenCounter,
+    truncate_to_tokens,
+)
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+class WordTokenizer:
+    """One token per whitespace-separated word; easy to reason about."""
+
+    name = "words"
+
+    def __init__(self):
+        self.calls = 0
+
+    def count(self, text: str) -> int:
+        self.calls += 1
+        return len(text.split())
+
+
+def make_budgeter(model: str = "qwen2.5-coder:7b", **kwargs) -> PromptBudgeter:
+    """Budgeter with a word tokenizer so budgets are exact in tests."""
+    return PromptBudgeter(model, counter=TokenCounter(model, tokenizer=WordTokenizer()), **kwargs)
+
+
+def words(n: int, word: str = "lorem") -> str:
+    return " ".join([word] * n)
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_model_profiles_pin_context_size() -> None:
+    """Both installed models have a fixed num_ctx and OpenHands names resolve."""
+    assert normalize_model_name("ollama/deepseek-coder-v2:16b") == "deepseek-coder-v2:16b"
+    profile = get_profile("ollama/qwen2.5-coder:7b")
+    assert profile.num_ctx > profile.reserve_output_tokens > 0
+    assert get_profile("unknown:1b").num_ctx > 0
+
+
+def test_heuristic_tokenizer_tracks_text_length() -> None:
+    """Longer text never counts as fewer tokens and code lands near chars/3.5."""
+    tokenizer = HeuristicTokenizer(get_profile("deepseek-coder-v2:16b"))
+    code = "def parse_config(path):\n    with open(path) as handle:\n        return json.load(handle)\n"
+    assert 0 < tokenizer.count(code) < len(code)
+    assert tokenizer.count(code * 2) >= tokenizer.count(code)
+    assert tokenizer.count("") == 0
+
+
+def test_counter_caches_by_content() -> None:
+    """Repeated content is counted once."""
+    tokenizer = WordTokenizer()
+    counter = TokenCounter("qwen2.5-coder:7b", tokenizer=tokenizer, max_entries=2)
+    assert counter.count("a b c") == 3
+    assert counter.count("a b c") == 3
+    assert (counter.hits, counter.misses, tokenizer.calls) == (1, 1, 1)
+
+    counter.count("d")
+    counter.count("e")  # evicts "a b c"
+    counter.count("a b c")
+    assert tokenizer.calls == 4
+
+
+def test_truncate_keeps_head_and_tail() -> None:
+    """Truncation respects the limit and keeps both ends of the text."""
+    text = " ".join(f"w{i}" for i in range(100))
+    short = truncate_to_tokens(text, 20, lambda t: len(t.split()))
+    assert len(short.split()) <= 20
+    assert short.startswith("w0") and short.endswith("w99")
+
+
+def test_fitting_prompt_is_unchanged() -> None:
+    """Prompts within budget pass through untouched with num_ctx pinned."""
+    budgeter = make_budgeter()
+    messages = [{"role": "system", "content": "be helpful"}, {"role": "user", "content": "hi"}]
+    result = budgeter.fit(messages)
+    assert result.messages == messages
+    assert result.tokens_saved == 0
+    assert result.options == {"num_ctx": budgeter.profile.num_ctx}
+
+
+def test_history_prefers_recent_and_relevant_messages() -> None:
+    """Old irrelevant turns are dropped and summarised; relevant ones survive."""
+    budgeter = make_budgeter(summary_tokens=60, keep_recent=1)
+    budget = budgeter.budget
+    filler = budget // 6
+    messages = [{"role": "system", "content": "system prompt"}]
+    messages.append({"role": "user", "content": "database migration plan " + words(filler)})
+    for i in range(6):
+        messages.append({"role": "assistant", "content": f"chatter {i} " + words(filler)})
+    messages.append({"role": "user", "content": "continue the database migration"})
+
+    result = budgeter.fit(messages)
+    contents = [m["content"] for m in result.messages]
+
+    assert result.tokens_after <= budget
+    assert result.tokens_saved > 0
+    assert result.summarized and result.messages[1]["content"].startswith("Summary of")
+    assert contents[0] == "system prompt"
+    assert contents[-1] == "continue the database migration"
+    # The relevant opening message outranks equally old chatter
+    assert any(c.startswith("database migration plan") for c in contents)
+    assert any(c.startswith("chatter 5") for c in contents)
+    assert not any(c.startswith("chatter 0") for c in contents)
+
+
+def test_context_items_taken_by_relevance() -> None:
+    """File context is kept by score and the overflow item is truncated."""
+    budgeter = make_budgeter(file_share=1.0, min_truncated_tokens=10)
+    budget = budgeter.budget
+    context = [
+        ContextItem("low.py", words(budget // 2, "low"), score=0.1),
+        ContextItem("high.py", words(budget // 2, "high"), score=0.9),
+        ContextItem("mid.py", words(budget // 2, "mid"), score=0.5),
+    ]
+    result = budgeter.fit([{"role": "user", "content": "question"}], context)
+    labels = [item.label for item in result.context]
+    assert labels[:2] == ["high.py", "mid.py"]
+    assert result.tokens_after <= budget
+    assert result.truncated_items + result.dropped_items >= 1
+
+
+def test_oversized_latest_message_is_truncated() -> None:
+    """A single message larger than the budget is shortened, not rejected."""
+    budgeter = make_budgeter()
+    result = budgeter.fit([{"role": "user", "content": words(budgeter.budget * 2)}])
+    assert result.tokens_after <= budgeter.budget
+    assert budgeter.totals.tokens_saved == result.tokens_saved > 0
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+message_strategy = st.builds(
+    lambda role, n, word: {"role": role, "content": words(n, word)},
+    st.sampled_from(["user", "assistant"]),
+    st.integers(min_value=0, max_value=400),
+    st.sampled_from(["alpha", "beta", "gamma", "delta"]),
+)
+
+
+# Feature: self-hosted-ai-coding-platform, Property 9: Prompt Fits Model Budget
+@settings(max_examples=100, deadline=None)
+@given(
+    history=st.lists(message_strategy, min_size=1, max_size=20),
+    context_sizes=st.lists(st.integers(min_value=0, max_value=600), max_size=6),
+    num_ctx=st.integers(min_value=300, max_value=2000),
+)
+def test_fitted_prompt_never_exceeds_budget(history, context_sizes, num_ctx) -> None:
+    """
+    Property 9: Prompt Fits Model Budget
+
+    For any conversation and file context, the fitted prompt should fit the
+    model's prompt budget, keep the latest message and system prompt, keep
+    messages in chronological order, and report the tokens it saved.
+
+    Validates: Requirements 3.4
+
+    Args:
+        history: Conversation messages, oldest first
+        context_sizes: Word counts of offered file context items
+        num_ctx: Model context window
+    """
+    profile = ModelProfile("test-model", 0.0, 0.0, num_ctx, 100, 3.5)
+    budgeter = make_budgeter()
+    budgeter.profile = profile
+    messages = [{"role": "system", "content": "system"}] + history
+    context = [ContextItem(f"f{i}", words(n, "ctx"), score=i) for i, n in enumerate(context_sizes)]
+
+    result = budgeter.fit(messages, context)
+
+    # Property: the prompt fits the budget
+    assert result.tokens_after <= budgeter.budget
+
+    # Property: system prompt and latest message are kept, in place
+    assert result.messages[0] == messages[0]
+    assert result.messages[-1]["role"] == messages[-1]["role"]
+    assert messages[-1]["content"].startswith(result.messages[-1]["content"].split("\n")[0])
+
+    # Property: kept history preserves chronological order
+    original = [id(m) for m in messages]
+    kept = [original.index(id(m)) for m in result.messages if id(m) in original]
+    assert kept == sorted(kept)
+
+    # Property: savings are reported accurately
+    assert result.tokens_saved == result.tokens_before - result.tokens_after >= 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,232 @@
+"""
+Tests for end-to-end request tracing.
+
+These tests run a load generator session through the tracing LLM gateway
+in front of the in-process fake Ollama, then check the recorded spans: one
+trace per turn, context carried across the gateway hop, Ollama's phases as
+children, workspace and git spans, and the waterfall and session views.
+"""
+
+import json
+import random
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+import requests
+from hypothesis import given, settings, strategies as st
+
+from aicoding.fake_ollama import FakeOllama
+from aicoding.file_service import FileService, handle_message
+from aicoding.loadgen import CodingSession, SessionProfile, _Recorder
+from aicoding.repo_import import git
+from aicoding.tracing import (
+    NOOP_SPAN, TRACER, LLMGateway, Span, SpanContext, Tracer, conversation_key, exclusive_times, extract, inject,
+    load_spans, main, select, span, summarize_sessions, wall_time,
+)
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = Path(tempfile.mkdtemp())
+    yield temp_dir
+    TRACER.configure(temp_dir / "unused", 0.0)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def by_name(spans: list, name: str) -> list:
+    return [item for item in spans if item.name == name]
+
+
+def nested_spans(rng: random.Random, start: float, end: float, depth: int, parent: str, spans: list) -> None:
+    """Children running one after another inside [start, end], recursively."""
+    cuts = sorted(rng.uniform(start, end) for _ in range(2 * rng.randint(0, 3)))
+    for child_start, child_end in zip(cuts[::2], cuts[1::2]):
+        span_id = f"{len(spans):016x}"
+        kind = rng.choice(["llm", "git", "workspace", "runtime"])
+        name = rng.choice(["llm.prefill", "llm.generate"]) if kind == "llm" else f"{kind}.op"
+        spans.append(Span(name, kind, "a" * 32, span_id, parent, child_start, child_end - child_start))
+        if depth > 0:
+            nested_spans(rng, child_start, child_end, depth - 1, span_id, spans)
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_context_propagation_and_sampling(temp_workspace) -> None:
+    context = SpanContext("4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7", True, "user 42/é,x=y")
+    headers = inject(context=context)
+    assert headers["traceparent"] == "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+    assert extract({"TraceParent": headers["traceparent"], "Baggage": "a=b, " + headers["baggage"]}) == \
+        SpanContext(context.trace_id, context.span_id, True, context.session, remote=True)
+    for malformed in ("00-xyz-00f067aa0ba902b7-01", "ff-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01",
+                      "00-00000000000000000000000000000000-00f067aa0ba902b7-01"):
+        assert extract({"traceparent": malformed}) is None
+    assert inject() == {}
+
+    # Off: nothing is created or written
+    TRACER.configure(temp_workspace / "traces", 0.0)
+    assert span("idle") is NOOP_SPAN
+    # Sessions are sampled the same way by every process
+    half, other = Tracer(temp_workspace, 0.5), Tracer(temp_workspace, 0.5)
+    decisions = [half.sampled("0" * 32, f"session-{number}") for number in range(2000)]
+    assert decisions == [other.sampled("f" * 32, f"session-{number}") for number in range(2000)]
+    assert 0.45 < sum(decisions) / len(decisions) < 0.55
+    # A parent's decision wins over the rate
+    TRACER.configure(temp_workspace / "traces", 1.0)
+    with span("remote child", parent=SpanContext("1" * 32, "2" * 16, False, remote=True)) as current:
+        assert current is NOOP_SPAN
+        with span("grandchild") as inner:
+            assert inner is NOOP_SPAN
+    with span("root", session="s1") as root:
+        with span("child", kind="git") as child:
+            assert child.parent_id == root.span_id and child.session == "s1"
+        with pytest.raises(ValueError):
+            with span("broken"):
+                raise ValueError("boom")
+    spans = load_spans(temp_workspace / "traces")
+    assert [item.name for item in spans] == ["root", "child", "broken"]
+    assert by_name(spans, "broken")[0].status == "error"
+
+    chat = [{"role": "system", "content": "You are a coder"}, {"role": "user", "content": "Fix the bug"}]
+    assert conversation_key({"messages": chat}) == conversation_key(
+        {"messages": chat + [{"role": "assistant", "content": "Done"}, {"role": "user", "content": "Thanks"}]})
+    assert conversation_key({"messages": chat}) != conversation_key({"messages": chat[:1] + [
+        {"role": "user", "content": [{"type": "text", "text": "Another task"}]}]})
+    assert conversation_key({"messages": chat[:1]}) is None
+    assert conversation_key({"prompt": "Write a parser"}).startswith("conv-")
+
+
+def test_gateway_traces_sessions_end_to_end(temp_workspace, capsys) -> None:
+    traces = temp_workspace / "traces"
+    TRACER.configure(traces, 1.0, "loadgen")
+    profile = SessionProfile(system_prompt_tokens=200, turn_prompt_tokens=(100, 200), response_tokens=16,
+                             files_per_turn=2, file_bytes=256, commit_every=2)
+    with FakeOllama(time_scale=0.05) as fake, \
+            LLMGateway(fake.url, tracer=Tracer(traces, 1.0, "llm-gateway")) as gateway:
+        session = CodingSession("session-1", temp_workspace / "project", gateway.url, "qwen2.5-coder:7b",
+                                profile, _Recorder())
+        session.setup()
+        assert session.run_turn() and session.run_turn()
+
+        # Streaming through the gateway without trace headers: grouped by conversation
+        payload = {"model": "qwen2.5-coder:7b", "prompt": "Write a parser", "options": {"num_predict": 4}}
+        direct = requests.post(f"{fake.url}/api/generate", json=payload, timeout=30)
+        proxied = requests.post(f"{gateway.url}/api/generate", json=payload, timeout=30)
+        assert proxied.status_code == 200 and proxied.headers["Content-Type"] == "application/x-ndjson"
+        assert [json.loads(line)["response"] for line in proxied.text.splitlines()] == \
+            [json.loads(line)["response"] for line in direct.text.splitlines()]
+        assert requests.get(f"{gateway.url}/api/tags", timeout=10).json() == \
+            requests.get(f"{fake.url}/api/tags", timeout=10).json()
+    with LLMGateway("http://127.0.0.1:9", tracer=Tracer(traces, 1.0, "llm-gateway")) as broken:
+        assert requests.get(f"{broken.url}/api/tags", timeout=10).status_code == 502
+    TRACER.flush()
+
+    spans = load_spans(traces)
+    turn = select(spans, "session-1")
+    assert len({item.trace_id for item in turn}) == 2 and len(by_name(turn, "session.turn")) == 2
+    # The gateway continued the client's trace across the HTTP hop
+    calls, proxied_calls = by_name(turn, "llm.call"), by_name(turn, "llm.request")
+    assert {item.parent_id for item in proxied_calls} == {item.span_id for item in calls}
+    assert {item.service for item in proxied_calls} == {"llm-gateway"}
+    for request in proxied_calls:
+        phases = {item.name: item for item in turn if item.parent_id == request.span_id}
+        # llm.wait: what Ollama's total duration does not explain by the phases
+        assert {"llm.prefill", "llm.generate"} <= set(phases) <= {"llm.wait", "llm.prefill", "llm.generate"}
+        assert phases["llm.generate"].attributes["tokens"] == 16
+        assert request.start <= phases["llm.prefill"].start < phases["llm.generate"].start
+        assert phases["llm.generate"].end <= request.end + 0.01
+    assert len(by_name(turn, "workspace.create_file_at_path")) == 4
+    assert {item.name for item in turn if item.kind == "git"} == {"git.add", "git.commit"}
+    times = exclusive_times(turn)
+    assert times["llm.generate"] > 0 and times["llm.prefill"] > 0
+    assert sum(times.values()) == pytest.approx(wall_time(turn), rel=0.05)
+
+    [streamed] = [item for item in by_name(spans, "llm.request") if item.attributes["path"] == "/api/generate"]
+    assert streamed.session == conversation_key(payload) and "time_to_first_byte" in streamed.attributes
+    [failed] = [item for item in spans if item.status == "error"]
+    assert failed.attributes["path"] == "/api/tags" and "error" in failed.attributes
+    summary = {item.session: item for item in summarize_sessions(spans)}["session-1"]
+    assert summary.traces == 2 and summary.llm_seconds > 0 and summary.errors == 0
+
+    assert main(["--dir", str(traces), "sessions"]) == 0
+    assert "session-1" in capsys.readouterr().out
+    assert main(["--dir", str(traces), "waterfall", "session-1"]) == 0
+    output = capsys.readouterr().out
+    assert "llm.prefill" in output and "[llm-gateway]" in output and "Time by category" in output
+    assert main(["--dir", str(traces), "waterfall", proxied_calls[0].trace_id[:12]]) == 0
+    assert main(["--dir", str(traces), "waterfall", "missing"]) == 1
+
+
+def test_workspace_and_git_spans_join_the_callers_trace(temp_workspace) -> None:
+    traces = temp_workspace / "traces"
+    TRACER.configure(traces, 0.0, "file-service")
+    (temp_workspace / "root").mkdir()
+    with FileService(temp_workspace / "root") as service:
+        # Off unless the caller's context is sampled
+        handle_message(service, {"id": 1, "method": "tools/call",
+                                 "params": {"name": "write_file", "arguments": {"path": "a.py", "content": "x"}}})
+        meta = inject(context=SpanContext("3" * 32, "4" * 16, True, "session-2"))
+        handle_message(service, {"id": 2, "method": "tools/call",
+                                 "params": {"name": "read_many", "arguments": {"paths": ["a.py"]}, "_meta": meta}})
+        handle_message(service, {"id": 3, "method": "tools/call",
+                                 "params": {"name": "read_lines", "arguments": {"path": "nope.py", "start": 1},
+                                            "_meta": meta}})
+    TRACER.configure(sample_rate=1.0)
+    git(["init", "-q", str(temp_workspace / "repo")])
+    TRACER.flush()
+
+    spans = load_spans(traces)
+    assert [item.name for item in spans] == ["workspace.read_many", "workspace.read_lines", "git.init"]
+    read, failed, init = spans
+    assert read.parent_id == "4" * 16 and read.trace_id == "3" * 32 and read.session == "session-2"
+    assert failed.status == "error" and init.kind == "git" and init.parent_id is None
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 29: Exclusive Times Add Up To The Wall Time
+@settings(max_examples=100, deadline=None)
+@given(seed=st.integers(min_value=0, max_value=2 ** 32), roots=st.integers(min_value=1, max_value=4),
+       depth=st.integers(min_value=0, max_value=3))
+def test_exclusive_times_add_up_to_the_wall_time(seed, roots, depth) -> None:
+    """
+    Property 29: Exclusive Times Add Up To The Wall Time
+
+    For any session of root spans whose descendants run one after another
+    inside their parents, the exclusive time charged to the categories of
+    the waterfall should add up to the wall time the roots cover, so no
+    time is counted twice or lost.
+
+    Validates: Requirements 8.1, 8.3
+
+    Args:
+        seed: Seed of the span layout
+        roots: Root spans (turns) of the session
+        depth: Nesting levels below each root
+    """
+    rng = random.Random(seed)
+    spans = []
+    for number in range(roots):
+        start = number * 10 + rng.uniform(0, 5)
+        root = Span("session.turn", "session", "a" * 32, f"root{number:012x}", None, start, rng.uniform(0.1, 5))
+        spans.append(root)
+        nested_spans(rng, root.start, root.end, depth, root.span_id, spans)
+    times = exclusive_times(spans)
+    # Property: every second of the session is charged exactly once
+    assert sum(times.values()) == pytest.approx(sum(item.duration for item in spans if item.parent_id is None))
+    assert sum(times.values()) == pytest.approx(wall_time(spans))
+    assert all(seconds >= 0 for seconds in times.values())
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
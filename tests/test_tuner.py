@@ -0,0 +1,204 @@
+"""
+Tests for the Ollama runtime parameter tuner.
+
+These tests sweep the in-process fake Ollama simulating a CPU host, and
+verify that the host model penalizes oversubscribed threads and rejects
+settings that do not fit in memory, that the sweep picks the cores' thread
+count, caches and resumes its trials and writes a profile the gateway
+applies, and that the Pareto front holds exactly the non-dominated trials.
+"""
+
+import json
+
+import pytest
+import requests
+from hypothesis import given, settings, strategies as st
+
+from aicoding.affinity import AffinityScheduler, main as affinity_main
+from aicoding.fake_ollama import FakeOllama
+from aicoding.tuner import (
+    OBJECTIVES, Grid, OllamaTarget, Trial, TrialCache, TuningError, build_mix, dominates, main, mix_tokens,
+    pareto_front, read_profile, recommend, sweep,
+)
+
+MODEL = "qwen2.5-coder:7b"
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+def sweep_args(directory, *extra: str) -> list:
+    """A small mock sweep: one model, three thread counts, two parallel values."""
+    return ["--dir", str(directory), "sweep", "--mock", "--model", MODEL, "--num-thread", "2", "4", "8",
+            "--num-batch", "512", "--num-ctx", "8192", "--parallel", "1", "2", "--repetitions", "1",
+            "--time-scale", "0.001", *extra]
+
+
+def trial_lines(directory) -> list:
+    return (directory / "trials.jsonl").read_text().splitlines()
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_fake_host_models_threads_and_memory() -> None:
+    with FakeOllama(cpu_cores=4, memory_bytes=12 * 1024 ** 3, parallel=4) as fake:
+        # Threads beyond the cores are slower than the cores themselves
+        assert fake.rates({"num_thread": 8})[0] < fake.rates({"num_thread": 4})[0]
+        assert fake.rates({"num_thread": 2})[0] < fake.rates({"num_thread": 4})[0]
+        # Bigger batches prefill faster, a longer context is slower
+        assert fake.rates({"num_batch": 1024})[0] > fake.rates({"num_batch": 256})[0]
+        assert fake.rates({"num_ctx": 32768})[1] < fake.rates({"num_ctx": 4096})[1]
+
+        def generate(num_ctx: int) -> requests.Response:
+            return requests.post(f"{fake.url}/api/generate", timeout=30, json={
+                "model": MODEL, "prompt": "p", "stream": False, "options": {"num_ctx": num_ctx, "num_predict": 1}})
+
+        assert generate(4096).status_code == 200
+        # The KV cache of four 32k slots does not fit
+        rejected = generate(32768)
+        assert rejected.status_code == 500 and "more system memory" in rejected.json()["error"]
+
+
+def test_mock_sweep_writes_resumable_profile(tmp_path, capsys) -> None:
+    assert main(sweep_args(tmp_path, "--max-trials", "4")) == 0
+    assert len(trial_lines(tmp_path)) == 4
+    assert read_profile(tmp_path / "profile.json")["complete"] is False
+    assert "2 trial(s) left" in capsys.readouterr().out
+
+    # The rerun measures only the missing trials, the next one none
+    assert main(sweep_args(tmp_path)) == 0
+    assert len(trial_lines(tmp_path)) == 6
+    assert main(sweep_args(tmp_path)) == 0
+    assert len(trial_lines(tmp_path)) == 6
+
+    profile = read_profile(tmp_path / "profile.json")
+    chosen = profile["models"][MODEL]
+    # One thread per core beats oversubscribing them
+    assert profile["complete"] and chosen["options"] == {"num_ctx": 8192, "num_batch": 512, "num_thread": 4}
+    assert all(point["num_thread"] == 4 for point in chosen["pareto"])
+    env = (tmp_path / "ollama.env").read_text()
+    assert f"OLLAMA_NUM_PARALLEL={profile['parallel']}\n" in env and "LLM_NUM_CTX=8192\n" in env
+    capsys.readouterr()
+    assert main(["--dir", str(tmp_path), "show"]) == 0
+    assert "num_thread=4" in capsys.readouterr().out
+
+    # A num_ctx too small for the prompt mix is refused
+    assert main(sweep_args(tmp_path, "--num-ctx", "2048")) == 1
+    assert main(["--dir", str(tmp_path / "none"), "show"]) == 1
+
+
+def test_sweep_rejects_infeasible_settings(tmp_path) -> None:
+    assert main(["--dir", str(tmp_path), "sweep", "--mock", "--mock-memory-gb", "12", "--model", MODEL,
+                 "--num-thread", "4", "--num-batch", "512", "--num-ctx", "8192", "32768", "--parallel", "1",
+                 "--repetitions", "1", "--time-scale", "0.001"]) == 0
+    trials = [json.loads(line) for line in trial_lines(tmp_path)]
+    assert sorted((trial["options"]["num_ctx"], bool(trial["error"])) for trial in trials) == [
+        (8192, False), (32768, True)]
+    assert read_profile(tmp_path / "profile.json")["models"][MODEL]["options"]["num_ctx"] == 8192
+
+
+def test_ollama_target_restarts_for_parallel(tmp_path) -> None:
+    marker = tmp_path / "parallel"
+    with FakeOllama() as fake:
+        # Without a restart command the server's value must be stated, and only it is swept
+        with pytest.raises(TuningError):
+            OllamaTarget(fake.url).check([1])
+        with pytest.raises(TuningError):
+            OllamaTarget(fake.url, parallel=1).check([1, 2])
+        OllamaTarget(fake.url, parallel=1).check([1])
+        assert main(["--dir", str(tmp_path), "sweep", "--ollama-url", fake.url, "--model", MODEL]) == 1
+
+        target = OllamaTarget(fake.url, f"echo {{parallel}} >> {marker}", parallel=1, restore_parallel=4)
+        # The first group restarts whatever the server runs with
+        with target.serve(1):
+            assert marker.read_text().split() == ["1"]
+        with target.serve(1):
+            pass
+        with target.serve(2) as url:
+            assert url == fake.url and marker.read_text().split() == ["1", "2"]
+        target.restore()
+        assert marker.read_text().split() == ["1", "2", "4"]
+        target.restore()
+        assert marker.read_text().split() == ["1", "2", "4"]
+        assert target.fingerprint(MODEL)["backend"] == "ollama"
+
+    # A sweep leaves the server as it found it
+    marker.unlink()
+    with FakeOllama(time_scale=0.001) as fake:
+        target = OllamaTarget(fake.url, f"echo {{parallel}} >> {marker}", restore_parallel=1)
+        grid = Grid(num_thread=[4], num_batch=[512], parallel=[1, 2], num_ctx=[8192])
+        trials, missing = sweep(target, [MODEL], grid, TrialCache(tmp_path), repetitions=1)
+        assert (len(trials), missing) == (2, 0)
+        assert marker.read_text().split() == ["1", "2", "1"]
+
+        failing = OllamaTarget(fake.url, "exit 3", parallel=4)
+        with pytest.raises(TuningError):
+            with failing.serve(4):
+                pass
+        assert failing.parallel is None
+
+
+def test_profile_options_are_pinned_by_the_gateway(tmp_path) -> None:
+    scheduler = AffinityScheduler(["http://node"], options={
+        f"ollama/{MODEL}": {"num_ctx": 4096, "num_thread": 4, "temperature": 0.1}})
+    payload = {"model": MODEL, "prompt": "p", "options": {"num_thread": 8, "temperature": 0.7}}
+    assert scheduler.normalize(payload)
+    assert payload["options"] == {"num_ctx": 4096, "num_thread": 4, "temperature": 0.7}
+    (tmp_path / "profile.json").write_text("[]")
+    assert affinity_main(["serve", "--profile", str(tmp_path / "profile.json")]) == 1
+
+
+def test_prompt_mix_is_deterministic() -> None:
+    first, second = build_mix(MODEL), build_mix(MODEL)
+    assert first == second and len(first) == 3
+    assert mix_tokens() > max(request["num_predict"] for request in first)
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+trial_points = st.lists(st.tuples(st.integers(min_value=0, max_value=50), st.integers(min_value=1, max_value=50),
+                                  st.booleans()), max_size=25)
+
+
+# Feature: self-hosted-ai-coding-platform, Property 31: Pareto Front Holds the Non-Dominated Settings
+@settings(max_examples=100, deadline=None)
+@given(points=trial_points, objective=st.sampled_from(OBJECTIVES))
+def test_pareto_front_holds_non_dominated_settings(points, objective) -> None:
+    """
+    Property 31: Pareto Front Holds the Non-Dominated Settings
+
+    For any set of trials, the Pareto front should hold exactly the feasible
+    trials that no feasible trial beats in throughput without losing in
+    latency (or the other way round), and the recommended setting should be
+    on the front for every objective.
+
+    Validates: Requirements 2.3, 2.5
+
+    Args:
+        points: (throughput, p95 latency, feasible) of each trial
+        objective: Recommendation objective
+    """
+    trials = [Trial(str(number), MODEL, 1, {"num_thread": number}, "mock", requests=1, throughput=float(throughput),
+                    latency_p95=float(latency), error="" if feasible else "out of memory")
+              for number, (throughput, latency, feasible) in enumerate(points)]
+    feasible = [trial for trial in trials if trial.feasible]
+    front = pareto_front(trials)
+
+    # Property: the front is the feasible trials nothing dominates
+    assert {trial.key for trial in front} == {
+        trial.key for trial in feasible if not any(dominates(other, trial) for other in feasible)}
+    assert all(not dominates(first, second) for first in front for second in front)
+    # Property: the recommendation is one of them
+    chosen = recommend(front, objective)
+    assert (chosen is None) == (not feasible)
+    if chosen is not None:
+        assert chosen in front
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,441 @@
+"""
+Tests for the update orchestrator.
+
+These tests prefetch images from a local fake registry and update services
+on the fake container runtime, verifying bandwidth limits and resumption,
+that traffic only moves to ready containers, draining and rollback.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+import requests
+from hypothesis import given, settings, strategies as st
+
+from aicoding.fake_runtime import FakeRuntime
+from aicoding.updater import (
+    ContainerRuntime,
+    ContainerSpec,
+    DockerRuntime,
+    ImagePrefetcher,
+    Service,
+    TrafficSwitch,
+    UpdateError,
+    Updater,
+    parse_image_ref,
+)
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    yield Path(temp_dir)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def digest(data: bytes) -> str:
+    return f"sha256:{hashlib.sha256(data).hexdigest()}"
+
+
+class FakeRegistry:
+    """Registry v2 API with bearer-token auth, multi-arch indexes and ranged blobs."""
+
+    def __init__(self) -> None:
+        self.manifests = {}
+        self.blobs = {}
+        self.served = 0
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b"", headers=()):
+                self.send_response(status)
+                for key, value in headers:
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/token"):
+                    self._send(200, json.dumps({"token": "secret"}).encode())
+                    return
+                if self.headers.get("Authorization") != "Bearer secret":
+                    realm = f'Bearer realm="http://{self.headers["Host"]}/token",service="fake"'
+                    self._send(401, headers=[("WWW-Authenticate", realm)])
+                    return
+                match = re.match(r"/v2/(.+)/(manifests|blobs)/(.+)$", self.path)
+                key = (match.group(1), match.group(3))
+                if match.group(2) == "manifests":
+                    media_type, body = registry.manifests[key]
+                    self._send(200, body, [("Content-Type", media_type)])
+                    return
+                body = registry.blobs[match.group(3)]
+                start = int(re.match(r"bytes=(\d+)-", self.headers.get("Range", "bytes=0-")).group(1))
+                registry.served += len(body) - start
+                self._send(206 if start else 200, body[start:])
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.host = f"127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    def publish(self, repository: str, tag: str, labels: dict, layers: list) -> str:
+        """Publish a linux/arm64 + linux/amd64 image; returns the image id."""
+        config = json.dumps({"config": {"Labels": labels}}, sort_keys=True).encode()
+        self.blobs[digest(config)] = config
+        for layer in layers:
+            self.blobs[digest(layer)] = layer
+        manifest = json.dumps({
+            "schemaVersion": 2,
+            "mediaType": "application/vnd.docker.distribution.manifest.v2+json",
+            "config": {"digest": digest(config), "size": len(config)},
+            "layers": [{"digest": digest(layer), "size": len(layer)} for layer in layers],
+        }).encode()
+        self.manifests[(repository, digest(manifest))] = ("application/vnd.docker.distribution.manifest.v2+json",
+                                                         manifest)
+        index = json.dumps({
+            "schemaVersion": 2,
+            "mediaType": "application/vnd.oci.image.index.v1+json",
+            "manifests": [{"digest": "sha256:" + "0" * 64, "platform": {"os": "linux", "architecture": "amd64"}},
+                          {"digest": digest(manifest), "platform": {"os": "linux", "architecture": "arm64"}}],
+        }).encode()
+        self.manifests[(repository, tag)] = ("application/vnd.oci.image.index.v1+json", index)
+        return digest(config)
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def registry():
+    server = FakeRegistry()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def runtime():
+    fake = FakeRuntime()
+    yield fake
+    fake.close()
+
+
+def make_service(image: str = "openhands:latest") -> Service:
+    return Service("openhands", image, 3000, "/", "blue-green", (free_port(), free_port()))
+
+
+def deploy(runtime: FakeRuntime, service: Service, labels: dict):
+    """Run the first version of ``service`` behind a traffic switch."""
+    runtime.add_image(service.image, labels)
+    runtime.run(ContainerSpec("openhands", service.image, ports={3000: ("127.0.0.1", service.slots[0])},
+                              env=["LLM_MODEL=ollama/deepseek-coder-v2:16b"]))
+    return TrafficSwitch(("127.0.0.1", service.slots[0]), "127.0.0.1", 0)
+
+
+def make_updater(runtime, service, switch, **kwargs) -> Updater:
+    kwargs.setdefault("state_file", None)
+    return Updater(runtime, {service.name: service}, switches={service.name: switch},
+                   ready_timeout=2.0, probe_interval=0.02, drain_timeout=2.0, **kwargs)
+
+
+class Traffic:
+    """Clients making new connections through the switch until stopped."""
+
+    def __init__(self, url: str, path: str = "/") -> None:
+        self.results = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, args=(url + path,), daemon=True)
+        self._thread.start()
+
+    def _loop(self, url: str) -> None:
+        while not self._stop.is_set():
+            try:
+                response = requests.get(url, headers={"Connection": "close"}, timeout=5)
+                self.results.append((response.status_code, response.text))
+            except requests.RequestException as e:
+                self.results.append((0, str(e)))
+
+    def stop(self) -> list:
+        self._stop.set()
+        self._thread.join()
+        return self.results
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_parse_image_ref() -> None:
+    """References resolve to the registry Docker itself would use."""
+    assert parse_image_ref("ollama/ollama:latest") == ("registry-1.docker.io", "ollama/ollama", "latest")
+    assert parse_image_ref("ubuntu") == ("registry-1.docker.io", "library/ubuntu", "latest")
+    assert parse_image_ref("ghcr.io/all-hands-ai/openhands:0.9") == ("ghcr.io", "all-hands-ai/openhands", "0.9")
+    assert parse_image_ref("localhost:5000/app@sha256:ab") == ("localhost:5000", "app", "sha256:ab")
+
+
+def test_incomplete_runtime_fails_when_built() -> None:
+    """A runtime missing an operation is rejected before any update starts."""
+    class NoRename(FakeRuntime):
+        rename = ContainerRuntime.rename
+
+    with pytest.raises(TypeError, match="rename"):
+        NoRename()
+
+
+def test_docker_runtime_keeps_published_interfaces() -> None:
+    """Recreating a container publishes its ports on the interfaces it had."""
+    container = {"Id": "abc", "Name": "/ollama", "Image": "sha256:1", "State": {"Running": True},
+                 "Config": {"Image": "ollama/ollama:latest", "Env": [], "Labels": {}},
+                 "HostConfig": {"PortBindings": {"11434/tcp": [{"HostIp": "", "HostPort": "11434"}],
+                                                 "9090/tcp": [{"HostIp": "127.0.0.1", "HostPort": "9091"}]},
+                                "RestartPolicy": {"Name": "unless-stopped"}},
+                 "NetworkSettings": {"Networks": {}}}
+    commands = []
+
+    def runner(command):
+        commands.append(command)
+        stdout = json.dumps([container]) if command[1] == "inspect" else "[]"
+        return subprocess.CompletedProcess(command, 0, stdout, "")
+
+    runtime = DockerRuntime(runner)
+    spec = runtime.inspect("ollama").spec
+    assert spec.ports == {11434: ("", 11434), 9090: ("127.0.0.1", 9091)}
+    runtime.run(spec)
+    published = [commands[-1][i + 1] for i, arg in enumerate(commands[-1]) if arg == "--publish"]
+    assert published == ["11434:11434", "127.0.0.1:9091:9090"]
+
+
+def test_prefetch_is_limited_resumable_and_incremental(temp_workspace, registry, runtime) -> None:
+    """Downloads respect the bandwidth limit, resume, and skip unchanged layers and images."""
+    base, app = os.urandom(200_000), os.urandom(100_000)
+    ref = f"{registry.host}/all-hands-ai/openhands:latest"
+    image_id = registry.publish("all-hands-ai/openhands", "latest", {"fake.version": "1"}, [base, app])
+    prefetcher = ImagePrefetcher(runtime, temp_workspace, bytes_per_second=400_000, arch="arm64")
+
+    # An interrupted download left half of the base layer
+    partial = temp_workspace / "blobs" / "sha256" / (digest(base).split(":")[1] + ".partial")
+    partial.parent.mkdir(parents=True)
+    partial.write_bytes(base[:100_000])
+    result = prefetcher.ensure(ref)
+    assert result.loaded and result.image_id == image_id == runtime.image_id(ref)
+    assert result.bytes_downloaded - registry.served == 0
+    assert 200_000 <= result.bytes_downloaded < 200_000 + 1000  # 100k of base + app + config
+    # 200 kB at 400 kB/s, after a 100 kB burst
+    assert result.seconds >= 0.2
+
+    # Unchanged image: nothing is downloaded or loaded
+    again = prefetcher.ensure(ref)
+    assert not again.loaded and again.bytes_downloaded == 0
+
+    # A new release shares the base layer; the old app layer is dropped from the cache
+    new_app = os.urandom(50_000)
+    new_id = registry.publish("all-hands-ai/openhands", "latest", {"fake.version": "2"}, [base, new_app])
+    update = prefetcher.ensure(ref)
+    assert update.loaded and runtime.image_id(ref) == new_id
+    assert 50_000 <= update.bytes_downloaded < 51_000 and update.bytes_cached >= 200_000
+    cached = set(os.listdir(temp_workspace / "blobs" / "sha256"))
+    assert digest(app).split(":")[1] not in cached and digest(new_app).split(":")[1] in cached
+    assert runtime.loaded == [image_id, new_id]
+
+
+def test_blue_green_update_has_no_failed_requests(temp_workspace, runtime) -> None:
+    """Traffic moves to the new container only once it is ready; no request fails."""
+    service = make_service()
+    with deploy(runtime, service, {"fake.version": "1"}) as switch:
+        updater = make_updater(runtime, service, switch, state_file=temp_workspace / "state.json")
+        traffic = Traffic(switch.url)
+        time.sleep(0.1)
+        runtime.add_image(service.image, {"fake.version": "2", "fake.startup_seconds": "0.3"})
+        report = updater.update("openhands")
+        time.sleep(0.1)
+        results = traffic.stop()
+
+    assert report.status == "updated" and report.container == "openhands-green"
+    assert report.ready_seconds >= 0.3
+    assert all(status == 200 for status, _ in results), [r for r in results if r[0] != 200][:3]
+    versions = [body for _, body in results]
+    switched = versions.index("version=2")
+    assert set(versions[:switched]) == {"version=1"} and set(versions[switched:]) == {"version=2"}
+    # The old container is gone; the new one kept the configuration
+    assert list(runtime.containers) == ["openhands-green"]
+    green = runtime.inspect("openhands-green").spec
+    assert green.env == ["LLM_MODEL=ollama/deepseek-coder-v2:16b"]
+    assert green.ports == {3000: ("127.0.0.1", service.slots[1])}
+    assert json.loads((temp_workspace / "state.json").read_text())["active"] == {"openhands": "openhands-green"}
+
+    # Nothing new: nothing happens; the next release goes back to the blue slot
+    assert updater.update("openhands").status == "up-to-date"
+    runtime.add_image(service.image, {"fake.version": "3"})
+    with TrafficSwitch(("127.0.0.1", service.slots[1]), "127.0.0.1", 0) as switch:
+        updater.switches["openhands"] = switch
+        assert updater.update("openhands").container == "openhands-blue"
+        assert requests.get(switch.url).text == "version=3"
+
+
+@pytest.mark.parametrize("labels, reason", [
+    ({"fake.healthy": "false"}, "did not become ready"),
+    ({"fake.healthy_for": "3"}, "verification through the switch failed"),
+])
+def test_failed_release_is_rolled_back(runtime, labels, reason) -> None:
+    """A release failing readiness or verification leaves the old container serving."""
+    service = make_service()
+    with deploy(runtime, service, {"fake.version": "1"}) as switch:
+        updater = make_updater(runtime, service, switch)
+        runtime.add_image(service.image, dict(labels, **{"fake.version": "2"}))
+        report = updater.update("openhands")
+        assert report.status == "rolled-back" and reason in report.reason
+        assert list(runtime.containers) == ["openhands"]
+        assert switch.backend == ("127.0.0.1", service.slots[0])
+        assert requests.get(switch.url).text == "version=1"
+
+
+def test_old_container_is_drained(runtime) -> None:
+    """Requests in flight on the old container complete before it is stopped."""
+    service = make_service()
+    with deploy(runtime, service, {"fake.version": "1"}) as switch:
+        updater = make_updater(runtime, service, switch)
+        slow = {}
+        thread = threading.Thread(target=lambda: slow.update(
+            response=requests.get(switch.url + "/slow?seconds=0.6", timeout=5)))
+        thread.start()
+        time.sleep(0.1)
+        runtime.add_image(service.image, {"fake.version": "2"})
+        report = updater.update("openhands")
+        thread.join()
+    assert report.status == "updated" and report.drain_seconds > 0.1
+    assert slow["response"].status_code == 200 and slow["response"].text == "version=1"
+
+
+def test_recreate_restores_the_previous_container(runtime) -> None:
+    """Ollama-style updates recreate in place and put the old container back on failure."""
+    port = free_port()
+    service = Service("ollama", "ollama:latest", 11434, "/api/version", "recreate")
+    runtime.add_image(service.image, {"fake.version": "1"})
+    runtime.run(ContainerSpec("ollama-kogccog8g0ok", service.image, ports={11434: ("127.0.0.1", port)}))
+    updater = Updater(runtime, {"ollama": service}, state_file=None, ready_timeout=1.0, probe_interval=0.02)
+
+    runtime.add_image(service.image, {"fake.version": "2", "fake.healthy": "false"})
+    report = updater.update("ollama")
+    assert report.status == "rolled-back"
+    assert list(runtime.containers) == ["ollama-kogccog8g0ok"]
+    assert requests.get(f"http://127.0.0.1:{port}/api/version").text == "version=1"
+
+    runtime.add_image(service.image, {"fake.version": "3", "fake.startup_seconds": "0.2"})
+    report = updater.update("ollama")
+    assert report.status == "updated" and 0.2 <= report.downtime_seconds < 1.0
+    assert requests.get(f"http://127.0.0.1:{port}/api/version").text == "version=3"
+
+
+def test_recreate_restores_the_previous_container_when_run_fails(runtime, monkeypatch) -> None:
+    """A new container that cannot even start (port taken) leaves the old one running."""
+    port = free_port()
+    service = Service("ollama", "ollama:latest", 11434, "/api/version", "recreate")
+    runtime.add_image(service.image, {"fake.version": "1"})
+    runtime.run(ContainerSpec("ollama", service.image, ports={11434: ("127.0.0.1", port)}))
+    updater = Updater(runtime, {"ollama": service}, state_file=None, ready_timeout=1.0, probe_interval=0.02)
+    runtime.add_image(service.image, {"fake.version": "2"})
+
+    def run_created_but_not_started(spec: ContainerSpec) -> None:
+        # Like docker run: the container is created, then starting it fails
+        FakeRuntime.run(runtime, spec)
+        runtime.stop(spec.name)
+        raise UpdateError("port is already allocated")
+
+    monkeypatch.setattr(runtime, "run", run_created_but_not_started)
+    report = updater.update("ollama")
+    assert report.status == "failed" and "port is already allocated" in report.reason
+    assert {name: container.running for name, container in runtime.containers.items()} == {"ollama": True}
+    assert requests.get(f"http://127.0.0.1:{port}/api/version").text == "version=1"
+
+
+def test_blue_green_removes_the_new_container_when_run_fails(runtime, monkeypatch) -> None:
+    """A new slot container that cannot even start (port taken) is removed; the old one keeps serving."""
+    service = make_service()
+    with deploy(runtime, service, {"fake.version": "1"}) as switch:
+        updater = make_updater(runtime, service, switch)
+        runtime.add_image(service.image, {"fake.version": "2"})
+
+        def run_created_but_not_started(spec: ContainerSpec) -> None:
+            # Like docker run: the container is created, then starting it fails
+            FakeRuntime.run(runtime, spec)
+            runtime.stop(spec.name)
+            raise UpdateError("port is already allocated")
+
+        monkeypatch.setattr(runtime, "run", run_created_but_not_started)
+        report = updater.update("openhands")
+        assert report.status == "failed" and "port is already allocated" in report.reason
+        assert {name: container.running for name, container in runtime.containers.items()} == {"openhands": True}
+        assert requests.get(switch.url).text == "version=1"
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 20: Updates Only Route To Ready Containers
+@settings(max_examples=100, deadline=None)
+@given(releases=st.lists(st.sampled_from(["healthy", "unhealthy", "flaky"]), min_size=1, max_size=3))
+def test_updates_only_route_to_ready_containers(releases) -> None:
+    """
+    Property 20: Updates Only Route To Ready Containers
+
+    For any sequence of releases, some of which never become ready or fail
+    after the switch, every update should leave exactly one container of
+    the service, the switch should point at it, and it should serve the
+    most recent release that passed its checks.
+
+    Validates: Requirements 8.1, 8.2
+
+    Args:
+        releases: Behaviour of each successive release
+    """
+    runtime = FakeRuntime()
+    service = make_service()
+    labels = {"healthy": {}, "unhealthy": {"fake.healthy": "false"}, "flaky": {"fake.healthy_for": "3"}}
+    try:
+        with deploy(runtime, service, {"fake.version": "0"}) as switch:
+            updater = Updater(runtime, {service.name: service}, switches={service.name: switch}, state_file=None,
+                              ready_timeout=0.1, probe_interval=0.01, verify_probes=2, drain_timeout=0.5)
+            expected = "version=0"
+            for number, release in enumerate(releases, start=1):
+                runtime.add_image(service.image, dict(labels[release], **{"fake.version": str(number)}))
+                report = updater.update("openhands")
+                if release == "healthy":
+                    expected = f"version={number}"
+                # Property: one container, behind the switch, serving the last good release
+                assert report.status == ("updated" if release == "healthy" else "rolled-back")
+                assert len(runtime.containers) == 1
+                container = next(iter(runtime.containers.values()))
+                assert switch.backend == ("127.0.0.1", container.spec.ports[3000][1])
+                assert requests.get(switch.url + "/slow?seconds=0").text == expected
+    finally:
+        runtime.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
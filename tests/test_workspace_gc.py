@@ -0,0 +1,278 @@
+"""
+Tests for the bounded-size workspace garbage collector.
+
+These tests run the collector on a synthetic workspace with controlled
+access times, a fake clock and a fake disk, and verify the incremental
+index, LRU eviction of temp data, the emergency watermark, archiving of
+idle projects and the IO budget.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from aicoding.workspace_gc import IOBudget, WorkspaceGC, WorkspaceIndex
+
+
+# ============================================================================
+# Test Fixtures and Helpers
+# ============================================================================
+
+@pytest.fixture
+def temp_workspace():
+    """Create a temporary workspace directory for testing."""
+    temp_dir = tempfile.mkdtemp()
+    workspace = Path(temp_dir)
+    (workspace / "temp").mkdir()
+    (workspace / "projects").mkdir()
+    yield workspace
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+# File times lie in the future so that reading them never updates atime
+# (relatime only updates atimes older than mtime/ctime or a day)
+NOW = time.time() + 60 * 86400
+MINUTE, DAY = 60, 86400
+
+
+def make_entry(parent: Path, name: str, size: int, age: float, files: int = 1) -> Path:
+    """Create a directory of ``files`` files totalling ``size`` bytes, last used ``age`` ago."""
+    entry = parent / name
+    (entry / "sub").mkdir(parents=True)
+    stamp = NOW - age
+    for index in range(files):
+        path = entry / ("sub" if index % 2 else "") / f"f{index}"
+        path.write_bytes(b"x" * (size // files + (size % files if index == 0 else 0)))
+        os.utime(path, (stamp, stamp))
+    for directory in (entry / "sub", entry):
+        os.utime(directory, (stamp, stamp))
+    return entry
+
+
+class FakeDisk:
+    """Free space of a disk whose only variable content is workspace temp data."""
+
+    def __init__(self, workspace: Path, total: int, other_used: int) -> None:
+        self.workspace = workspace
+        self.total = total
+        self.other_used = other_used
+        self.calls = 0
+
+    def __call__(self, path: Path) -> float:
+        self.calls += 1
+        used = sum(p.stat().st_size for p in (self.workspace / "temp").rglob("*") if p.is_file())
+        return 1 - (self.other_used + used) / self.total
+
+
+def make_gc(workspace: Path, **kwargs) -> WorkspaceGC:
+    kwargs.setdefault("free_fraction", lambda path: 0.5)
+    kwargs.setdefault("budget", IOBudget(1e12, 1e12))
+    kwargs.setdefault("project_idle_seconds", 0)
+    return WorkspaceGC(workspace, clock=lambda: NOW, **kwargs)
+
+
+# ============================================================================
+# Unit Tests
+# ============================================================================
+
+def test_index_lists_only_changed_directories(temp_workspace) -> None:
+    """After the first pass, only directories whose entries changed are listed again."""
+    for index in range(20):
+        make_entry(temp_workspace / "temp", f"job-{index}", 100, DAY, files=3)
+    index = WorkspaceIndex([temp_workspace / "temp"], IOBudget(1e12, 1e12))
+    index.scan()
+    assert index.listed == 41  # temp, 20 entries, 20 subdirectories
+    assert index.usage(temp_workspace / "temp" / "job-3")[:2] == (100, 3)
+
+    index.scan(refresh_dirs=0)
+    assert index.listed == 41
+
+    (temp_workspace / "temp" / "job-3" / "sub" / "new").write_bytes(b"y" * 50)
+    shutil.rmtree(temp_workspace / "temp" / "job-4")
+    index.scan(refresh_dirs=0)
+    assert index.listed == 43  # job-3/sub and temp
+    assert index.usage(temp_workspace / "temp" / "job-3")[:2] == (150, 4)
+    assert index.usage(temp_workspace / "temp" / "job-4") == (0, 0, 0.0)
+
+    # In-place growth is picked up by the round-robin refresh
+    with open(temp_workspace / "temp" / "job-5" / "f0", "ab") as handle:
+        handle.write(b"z" * 25)
+    os.utime(temp_workspace / "temp" / "job-5" / "f0", (NOW, NOW))
+    for _ in range(3):
+        index.scan(refresh_dirs=20)
+    assert index.usage(temp_workspace / "temp" / "job-5") == (125, 3, NOW)
+
+    # The index survives restarts
+    index.save(temp_workspace / "state.json")
+    restored = WorkspaceIndex([temp_workspace / "temp"], IOBudget(1e12, 1e12))
+    restored.load(temp_workspace / "state.json")
+    restored.scan(refresh_dirs=0)
+    assert restored.listed == 0 and restored.dirs == index.dirs
+
+
+def test_temp_is_evicted_least_recently_used_first(temp_workspace) -> None:
+    """Over quota, the oldest entries go first; entries in use are never touched."""
+    temp = temp_workspace / "temp"
+    for name, age in (("a", 5 * DAY), ("b", 3 * DAY), ("c", DAY), ("d", MINUTE)):
+        make_entry(temp, name, 400, age)
+    (temp / "loose.log").write_bytes(b"l" * 100)
+    os.utime(temp / "loose.log", (NOW - 4 * DAY, NOW - 4 * DAY))
+
+    report = make_gc(temp_workspace, temp_quota_bytes=1000).collect()
+    assert report.evicted == ["a", "loose.log", "b"]
+    assert report.evicted_bytes == 900 and report.temp_bytes == 800
+    assert sorted(os.listdir(temp)) == [".gc-trash", "c", "d"]
+    assert os.listdir(temp / ".gc-trash") == []
+
+    report = make_gc(temp_workspace, temp_quota_bytes=100).collect()
+    assert report.evicted == ["c"] and report.blocked
+    assert (temp / "d" / "f0").exists()
+
+    # Within the quota nothing is evicted
+    assert make_gc(temp_workspace, temp_quota_bytes=1000).collect().evicted == []
+
+
+def test_low_disk_reclaims_to_the_target_watermark(temp_workspace) -> None:
+    """Low free space evicts below the quota; critical free space lifts the budget."""
+    temp = temp_workspace / "temp"
+    for index, age in enumerate((4 * DAY, 3 * DAY, 2 * DAY, 5 * MINUTE)):
+        make_entry(temp, f"e{index}", 1000, age)
+    disk = FakeDisk(temp_workspace, total=20_000, other_used=10_000)  # 30% free
+    report = make_gc(temp_workspace, temp_quota_bytes=10 ** 9, free_fraction=disk).collect()
+    assert report.emergency is False and report.evicted == []
+
+    disk.other_used = 13_200  # 14% free: reclaim until 20% is free
+    report = make_gc(temp_workspace, temp_quota_bytes=10 ** 9, free_fraction=disk).collect()
+    assert report.evicted == ["e0", "e1"] and report.free_fraction == pytest.approx(0.24)
+
+    disk.other_used = 17_900  # 0.5% free: no throttling, short idle protection
+    sleeps = []
+    report = make_gc(temp_workspace, temp_quota_bytes=10 ** 9, free_fraction=disk,
+                     budget=IOBudget(1, 1, sleep=sleeps.append)).collect()
+    assert report.emergency and report.evicted == ["e2", "e3"]
+    assert sleeps == [] and report.throttled_seconds == 0
+
+
+def test_idle_projects_are_archived_and_restored(temp_workspace) -> None:
+    """Idle projects become verified archives and come back unchanged."""
+    projects = temp_workspace / "projects"
+    old = make_entry(projects, "old-app", 3000, 40 * DAY - 1, files=5)
+    (old / "empty").mkdir()
+    (old / "link").symlink_to("f0")
+    for path in (old / "empty", old):
+        os.utime(path, (NOW - 40 * DAY, NOW - 40 * DAY))
+    make_entry(projects, "active", 100, DAY)
+    expected = {str(p.relative_to(old)): (p.is_symlink(), p.read_bytes() if p.is_file() else None)
+                for p in old.rglob("*")}
+
+    report = make_gc(temp_workspace, project_idle_seconds=30 * DAY).collect()
+    assert report.archived == ["old-app"] and report.archived_bytes == 3000
+    assert sorted(os.listdir(projects)) == ["active"]
+    archive = temp_workspace / "archive" / "old-app.tar.gz"
+    assert archive.exists() and archive.stat().st_size < 3000
+
+    gc = make_gc(temp_workspace)
+    restored = gc.restore("old-app")
+    assert {str(p.relative_to(restored)): (p.is_symlink(), p.read_bytes() if p.is_file() else None)
+            for p in restored.rglob("*")} == expected
+    assert not archive.exists()
+    with pytest.raises(FileExistsError):
+        gc.restore("old-app")
+
+
+def test_rescans_do_not_make_projects_look_used(temp_workspace) -> None:
+    """Listing a directory updates its atime; that is not a use of the project."""
+    old = make_entry(temp_workspace / "projects", "old-app", 3000, 40 * DAY, files=4)
+    gc = make_gc(temp_workspace, project_idle_seconds=30 * DAY)
+    gc.index.scan()
+    # What relatime does to the directories the scan listed
+    for directory in (old, old / "sub"):
+        os.utime(directory, (NOW, NOW - 40 * DAY))
+    gc.index.scan(refresh_dirs=len(gc.index.dirs))
+    assert gc.projects()[0].last_access == pytest.approx(NOW - 40 * DAY)
+    assert gc.collect().archived == ["old-app"]
+
+
+def test_io_budget_spreads_work_out() -> None:
+    """The budget turns a burst of operations into short waits at the configured rate."""
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    budget = IOBudget(bytes_per_second=1000, ops_per_second=100, clock=lambda: now[0], sleep=sleep)
+    for _ in range(200):
+        budget.take(ops=1, nbytes=10)
+    # 200 ops and 2000 bytes at 100 ops/s and 1000 B/s: about 2 seconds
+    assert now[0] == pytest.approx(2.0, abs=0.3)
+    assert max(sleeps) <= 0.02
+
+    budget.unlimited = True
+    budget.take(ops=10 ** 6, nbytes=10 ** 9)
+    assert now[0] == pytest.approx(2.0, abs=0.3)
+
+
+# ============================================================================
+# Property-Based Tests
+# ============================================================================
+
+# Feature: self-hosted-ai-coding-platform, Property 19: Temp Eviction Is Least Recently Used
+@settings(max_examples=100, deadline=None)
+@given(
+    entries=st.lists(st.tuples(st.integers(min_value=1, max_value=500),
+                               st.integers(min_value=0, max_value=30 * DAY)),
+                     min_size=1, max_size=12, unique_by=lambda entry: entry[1]),
+    quota=st.integers(min_value=0, max_value=3000),
+)
+def test_temp_eviction_is_least_recently_used(entries, quota) -> None:
+    """
+    Property 19: Temp Eviction Is Least Recently Used
+
+    For any set of temp entries and quota, the collector should evict a
+    least-recently-used prefix of the entries, never an entry used within
+    the idle protection, and leave temp within the quota unless every
+    remaining entry is in use.
+
+    Validates: Requirements 2.5, 8.4
+
+    Args:
+        entries: (size, seconds since last use) of each temp entry
+        quota: Temp quota in bytes
+    """
+    temp_dir = Path(tempfile.mkdtemp())
+    try:
+        (temp_dir / "temp").mkdir()
+        for index, (size, age) in enumerate(entries):
+            make_entry(temp_dir / "temp", f"entry-{index}", size, age)
+        report = make_gc(temp_dir, temp_quota_bytes=quota, min_idle_seconds=600).collect()
+
+        by_age = [f"entry-{index}" for index, _ in
+                  sorted(enumerate(entries), key=lambda item: -item[1][1])]
+        # Property: the oldest entries are evicted, in order
+        assert report.evicted == by_age[:len(report.evicted)]
+        ages = {f"entry-{index}": age for index, (_, age) in enumerate(entries)}
+        assert all(ages[name] >= 600 for name in report.evicted)
+        remaining = sum(size for index, (size, _) in enumerate(entries)
+                        if f"entry-{index}" not in report.evicted)
+        assert report.temp_bytes == remaining
+        # Property: within quota, or blocked by an entry in use
+        if remaining > quota:
+            assert report.blocked and ages[by_age[len(report.evicted)]] < 600
+        elif report.evicted:
+            last = entries[int(report.evicted[-1].split("-")[1])][0]
+            assert remaining + last > quota
+        assert sorted(os.listdir(temp_dir / "temp")) == sorted(
+            [".gc-trash"] * bool(report.evicted) + by_age[len(report.evicted):])
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])